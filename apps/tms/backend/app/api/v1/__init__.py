@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from . import customers, carriers, facilities, quote_requests, quotes, shipments, tenders, tracking, documents, invoices, work_items, ai, analytics, emails, customs, loadboards, accounting, carrier_portal, customer_portal, automation, notifications, desks, approvals, automations, customer_contacts, customer_facilities, pricing_playbooks, carrier_compliance, document_inbox, billing, edi, rate_tables, communications, rbac, driver_app, search, tenant, shipment_ops, carrier_payables
+from . import customers, carriers, facilities, quote_requests, quotes, shipments, tenders, tracking, documents, invoices, work_items, ai, analytics, emails, customs, loadboards, accounting, carrier_portal, customer_portal, automation, notifications, desks, approvals, automations, customer_contacts, customer_facilities, pricing_playbooks, carrier_compliance, document_inbox, billing, edi, rate_tables, communications, rbac, driver_app, search, tenant, shipment_ops, carrier_payables, admin
 
 router = APIRouter()
 
@@ -9,6 +9,9 @@ router.include_router(carriers.router, prefix="/carriers", tags=["carriers"])
 router.include_router(facilities.router, prefix="/facilities", tags=["facilities"])
 router.include_router(quote_requests.router, prefix="/quote-requests", tags=["quote-requests"])
 router.include_router(quotes.router, prefix="/quotes", tags=["quotes"])
+# Before shipments, so its fixed paths (import-template, consolidation-suggestions, ...)
+# are not captured by GET /shipments/{shipment_id}
+router.include_router(shipment_ops.router, prefix="/shipments", tags=["shipment-ops"])
 router.include_router(shipments.router, prefix="/shipments", tags=["shipments"])
 router.include_router(tenders.router, prefix="/tenders", tags=["tenders"])
 router.include_router(tracking.router, prefix="/tracking", tags=["tracking"])
@@ -41,5 +44,5 @@ router.include_router(rbac.router, prefix="/rbac", tags=["rbac"])
 router.include_router(driver_app.router, prefix="/driver-app", tags=["driver-app"])
 router.include_router(search.router, prefix="/search", tags=["search"])
 router.include_router(tenant.router, prefix="/tenant", tags=["tenant"])
-router.include_router(shipment_ops.router, prefix="/shipments", tags=["shipment-ops"])
 router.include_router(carrier_payables.router, prefix="/carrier-payables", tags=["carrier-payables"])
+router.include_router(admin.router, prefix="/admin", tags=["admin"])
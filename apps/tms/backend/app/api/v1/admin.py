@@ -0,0 +1,55 @@
+"""
+Operational endpoints for Expertly TMS.
+
+``/admin/query-profile`` reports command timings by query shape from this
+API process, its recent slow operations, and the findings of the last query
+plan audit (collection scans, in-memory sorts, unindexable regexes and the
+recommended index). ``POST /admin/query-profile/audit`` runs the audit now
+instead of waiting for the periodic one. ``/admin/timers`` reports durable
+timer counts and how late the most overdue timer is.
+"""
+
+import json
+
+from fastapi import APIRouter, Query
+
+from app.database import get_database
+from app.services.query_profiler import QUERY_AUDIT_TOP_SHAPES, query_auditor, query_profiler
+from app.services.timer_service import timer_scheduler
+
+router = APIRouter()
+
+
+@router.get("/query-profile")
+async def get_query_profile(limit: int = Query(25, ge=1, le=200)):
+    """Top query shapes and slow operations here, plus flagged audit findings."""
+    db = get_database()
+    flagged = await db.query_shapes.find(
+        {"audit.flags.0": {"$exists": True}},
+        {"sample": 0},
+    ).sort("total_ms", -1).to_list(limit)
+    for doc in flagged:
+        doc.pop("_id")
+        doc["shape"] = json.loads(doc["shape"])
+    return {
+        "since": query_profiler.started_at,
+        "slow_query_ms": query_profiler.slow_query_ms,
+        "shapes_dropped": query_profiler.dropped,
+        "top_shapes": query_profiler.top(limit),
+        "slow_queries": query_profiler.slow_samples(limit),
+        "flagged": flagged,
+    }
+
+
+@router.post("/query-profile/audit")
+async def run_query_audit(limit: int = Query(QUERY_AUDIT_TOP_SHAPES, ge=1, le=200)):
+    """Flush this process's shapes and explain the top shapes by total time."""
+    await query_auditor.flush()
+    findings = await query_auditor.audit(limit)
+    return {"audited": len(findings), "findings": findings}
+
+
+@router.get("/timers")
+async def get_timer_stats():
+    """Durable timers by kind and status, and the current firing lag."""
+    return await timer_scheduler.stats()
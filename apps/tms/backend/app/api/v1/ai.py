@@ -373,6 +373,21 @@ async def create_work_items_from_exceptions(data: CreateWorkItemsRequest):
     )
 
 
+@router.get("/exceptions/metrics")
+async def get_exception_detector_metrics():
+    """Per-detector timings of the exception engine since start-up."""
+    return ExceptionDetectionService.metrics()
+
+
+@router.post("/exceptions/rebuild")
+async def rebuild_exception_index():
+    """Regenerate the open-exception index from source data."""
+    counts = await ExceptionDetectionService.rebuild()
+    if counts is None:
+        raise HTTPException(status_code=409, detail="An exception index rebuild is already running")
+    return {"open_exceptions": counts}
+
+
 # ==========================================
 # AI Auto-Assign Carrier
 # ==========================================
@@ -1,11 +1,28 @@
+import os
 from typing import List, Optional
 from datetime import datetime, timedelta
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from bson import ObjectId
 
 from app.database import get_database
 from app.services.exception_detection import ExceptionDetectionService
+from app.services.analytics_rollups import (
+    AnalyticsRollupService,
+    LOW_MARGIN_PERCENT,
+    resolve_ids,
+    sum_rows,
+)
+from app.services.custom_reports import build_report_pipeline, clean_report_row, primary_source
+from app.services.report_scheduler import (
+    SCHEDULED_REPORT_TIMER,
+    calculate_next_run,
+    report_scheduler,
+    schedule_report_timer,
+)
+from app.services.timer_service import timer_scheduler
+from app.services.report_writers import MEDIA_TYPES, report_extension
 
 router = APIRouter()
 
@@ -370,59 +387,29 @@ class MarginDashboardResponse(BaseModel):
 
 @router.get("/margins", response_model=MarginDashboardResponse)
 async def get_margin_dashboard(days: int = 30):
-    """Get margin analytics dashboard data."""
+    """Get margin analytics dashboard data.
+
+    Totals come from the daily analytics rollups, so the cost depends on the
+    number of days and customers/carriers/lanes rather than shipments.
+    """
     db = get_database()
 
     # Calculate date range
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
 
-    # Get all shipments in date range with financial data
-    pipeline = [
-        {
-            "$match": {
-                "created_at": {"$gte": start_date, "$lte": end_date},
-                "customer_price": {"$gt": 0}
-            }
-        },
-        {
-            "$lookup": {
-                "from": "customers",
-                "localField": "customer_id",
-                "foreignField": "_id",
-                "as": "customer"
-            }
-        },
-        {
-            "$lookup": {
-                "from": "carriers",
-                "localField": "carrier_id",
-                "foreignField": "_id",
-                "as": "carrier"
-            }
-        },
-        {
-            "$addFields": {
-                "customer_name": {"$arrayElemAt": ["$customer.name", 0]},
-                "carrier_name": {"$arrayElemAt": ["$carrier.name", 0]},
-                "origin_city": {"$arrayElemAt": ["$stops.city", 0]},
-                "origin_state": {"$arrayElemAt": ["$stops.state", 0]},
-                "dest_city": {"$arrayElemAt": ["$stops.city", -1]},
-                "dest_state": {"$arrayElemAt": ["$stops.state", -1]},
-            }
-        }
-    ]
-
-    cursor = db.shipments.aggregate(pipeline)
-    shipments = await cursor.to_list(10000)
+    customer_rows = await AnalyticsRollupService.get_rows("customer", start_date)
+    carrier_rows = await AnalyticsRollupService.get_rows("carrier", start_date)
+    lane_rows = await AnalyticsRollupService.get_rows("lane", start_date)
 
-    # Calculate summary
-    total_revenue = sum(s.get("customer_price", 0) or 0 for s in shipments)
-    total_cost = sum(s.get("carrier_cost", 0) or 0 for s in shipments)
+    # Calculate summary (every priced shipment has exactly one customer row)
+    by_customer_totals = sum_rows(customer_rows)
+    total_revenue = sum(m["revenue"] for m in by_customer_totals.values())
+    total_cost = sum(m["cost"] for m in by_customer_totals.values())
     total_margin = total_revenue - total_cost
-    shipment_count = len(shipments)
+    shipment_count = sum(m["shipment_count"] for m in by_customer_totals.values())
     avg_margin_percent = (total_margin / total_revenue * 100) if total_revenue > 0 else 0
-    low_margin_count = sum(1 for s in shipments if (s.get("margin_percent") or 0) < 10)
+    low_margin_count = sum(m["low_margin_count"] for m in by_customer_totals.values())
 
     summary = MarginSummary(
         total_revenue=total_revenue,
@@ -434,170 +421,138 @@ async def get_margin_dashboard(days: int = 30):
     )
 
     # By Customer
-    customer_data = {}
-    for s in shipments:
-        cid = str(s.get("customer_id", "unknown"))
-        if cid not in customer_data:
-            customer_data[cid] = {
-                "customer_id": cid,
-                "customer_name": s.get("customer_name") or "Unknown",
-                "total_revenue": 0,
-                "total_cost": 0,
-                "shipment_count": 0
-            }
-        customer_data[cid]["total_revenue"] += s.get("customer_price", 0) or 0
-        customer_data[cid]["total_cost"] += s.get("carrier_cost", 0) or 0
-        customer_data[cid]["shipment_count"] += 1
-
-    by_customer = []
-    for cid, data in customer_data.items():
-        margin = data["total_revenue"] - data["total_cost"]
-        margin_pct = (margin / data["total_revenue"] * 100) if data["total_revenue"] > 0 else 0
-        by_customer.append(CustomerMargin(
-            customer_id=data["customer_id"],
-            customer_name=data["customer_name"],
-            total_revenue=data["total_revenue"],
-            total_cost=data["total_cost"],
-            total_margin=margin,
-            avg_margin_percent=round(margin_pct, 1),
-            shipment_count=data["shipment_count"]
-        ))
-    by_customer.sort(key=lambda x: x.total_margin, reverse=True)
+    top_customers = sorted(
+        by_customer_totals.items(), key=lambda kv: kv[1]["revenue"] - kv[1]["cost"], reverse=True
+    )[:10]
+    customer_names = {
+        str(c["_id"]): c.get("name")
+        async for c in db.customers.find({"_id": {"$in": resolve_ids(k for k, _ in top_customers)}}, {"name": 1})
+    }
+    by_customer = [
+        CustomerMargin(
+            customer_id=cid,
+            customer_name=customer_names.get(cid) or "Unknown",
+            total_revenue=m["revenue"],
+            total_cost=m["cost"],
+            total_margin=m["revenue"] - m["cost"],
+            avg_margin_percent=round(_margin_pct(m["revenue"], m["cost"]), 1),
+            shipment_count=m["shipment_count"],
+        )
+        for cid, m in top_customers
+    ]
 
-    # By Carrier
-    carrier_data = {}
-    for s in shipments:
-        carrier_id = s.get("carrier_id")
-        if not carrier_id:
-            continue
-        cid = str(carrier_id)
-        if cid not in carrier_data:
-            carrier_data[cid] = {
-                "carrier_id": cid,
-                "carrier_name": s.get("carrier_name") or "Unknown",
-                "total_revenue": 0,
-                "total_cost": 0,
-                "shipment_count": 0
-            }
-        carrier_data[cid]["total_revenue"] += s.get("customer_price", 0) or 0
-        carrier_data[cid]["total_cost"] += s.get("carrier_cost", 0) or 0
-        carrier_data[cid]["shipment_count"] += 1
-
-    by_carrier = []
-    for cid, data in carrier_data.items():
-        margin = data["total_revenue"] - data["total_cost"]
-        margin_pct = (margin / data["total_revenue"] * 100) if data["total_revenue"] > 0 else 0
-        by_carrier.append(CarrierMargin(
-            carrier_id=data["carrier_id"],
-            carrier_name=data["carrier_name"],
-            total_revenue=data["total_revenue"],
-            total_cost=data["total_cost"],
-            total_margin=margin,
-            avg_margin_percent=round(margin_pct, 1),
-            shipment_count=data["shipment_count"]
-        ))
-    by_carrier.sort(key=lambda x: x.total_margin, reverse=True)
+    # By Carrier (priced shipments only)
+    carrier_totals = {k: m for k, m in sum_rows(carrier_rows).items() if m["priced_count"] > 0}
+    top_carriers = sorted(
+        carrier_totals.items(), key=lambda kv: kv[1]["revenue"] - kv[1]["priced_cost"], reverse=True
+    )[:10]
+    carrier_names = {
+        str(c["_id"]): c.get("name")
+        async for c in db.carriers.find({"_id": {"$in": resolve_ids(k for k, _ in top_carriers)}}, {"name": 1})
+    }
+    by_carrier = [
+        CarrierMargin(
+            carrier_id=cid,
+            carrier_name=carrier_names.get(cid) or "Unknown",
+            total_revenue=m["revenue"],
+            total_cost=m["priced_cost"],
+            total_margin=m["revenue"] - m["priced_cost"],
+            avg_margin_percent=round(_margin_pct(m["revenue"], m["priced_cost"]), 1),
+            shipment_count=m["priced_count"],
+        )
+        for cid, m in top_carriers
+    ]
 
     # By Lane
-    lane_data = {}
-    for s in shipments:
-        origin = f"{s.get('origin_city', 'Unknown')}, {s.get('origin_state', '??')}"
-        dest = f"{s.get('dest_city', 'Unknown')}, {s.get('dest_state', '??')}"
-        lane_key = f"{origin}|{dest}"
-
-        if lane_key not in lane_data:
-            lane_data[lane_key] = {
-                "origin": origin,
-                "destination": dest,
-                "total_revenue": 0,
-                "total_cost": 0,
-                "shipment_count": 0
-            }
-        lane_data[lane_key]["total_revenue"] += s.get("customer_price", 0) or 0
-        lane_data[lane_key]["total_cost"] += s.get("carrier_cost", 0) or 0
-        lane_data[lane_key]["shipment_count"] += 1
-
+    lane_labels = {row["key"]: (row["origin"], row["destination"]) for row in lane_rows}
     by_lane = []
-    for key, data in lane_data.items():
-        margin = data["total_revenue"] - data["total_cost"]
-        margin_pct = (margin / data["total_revenue"] * 100) if data["total_revenue"] > 0 else 0
+    for key, m in sum_rows(lane_rows).items():
+        origin, destination = lane_labels[key]
         by_lane.append(LaneMargin(
-            origin=data["origin"],
-            destination=data["destination"],
-            total_revenue=data["total_revenue"],
-            total_cost=data["total_cost"],
-            total_margin=margin,
-            avg_margin_percent=round(margin_pct, 1),
-            shipment_count=data["shipment_count"]
+            origin=origin,
+            destination=destination,
+            total_revenue=m["revenue"],
+            total_cost=m["cost"],
+            total_margin=m["revenue"] - m["cost"],
+            avg_margin_percent=round(_margin_pct(m["revenue"], m["cost"]), 1),
+            shipment_count=m["shipment_count"],
         ))
     by_lane.sort(key=lambda x: x.total_margin, reverse=True)
     by_lane = by_lane[:20]  # Top 20 lanes
 
     # Trends by day
-    trend_data = {}
-    for s in shipments:
-        date_str = s.get("created_at", datetime.utcnow()).strftime("%Y-%m-%d")
-        if date_str not in trend_data:
-            trend_data[date_str] = {
-                "date": date_str,
-                "total_revenue": 0,
-                "total_cost": 0,
-                "shipment_count": 0
-            }
-        trend_data[date_str]["total_revenue"] += s.get("customer_price", 0) or 0
-        trend_data[date_str]["total_cost"] += s.get("carrier_cost", 0) or 0
-        trend_data[date_str]["shipment_count"] += 1
-
     trends = []
-    for date_str in sorted(trend_data.keys()):
-        data = trend_data[date_str]
-        margin = data["total_revenue"] - data["total_cost"]
-        margin_pct = (margin / data["total_revenue"] * 100) if data["total_revenue"] > 0 else 0
+    for date_str, m in sorted(sum_rows(customer_rows, group_by="day").items()):
         trends.append(MarginTrend(
-            date=data["date"],
-            total_revenue=data["total_revenue"],
-            total_cost=data["total_cost"],
-            total_margin=margin,
-            avg_margin_percent=round(margin_pct, 1),
-            shipment_count=data["shipment_count"]
+            date=date_str,
+            total_revenue=m["revenue"],
+            total_cost=m["cost"],
+            total_margin=m["revenue"] - m["cost"],
+            avg_margin_percent=round(_margin_pct(m["revenue"], m["cost"]), 1),
+            shipment_count=m["shipment_count"],
         ))
 
-    # Low margin shipments (below 10%)
+    # Low margin shipments (below 10%) - computed server-side, only 10 rows returned
+    low_pipeline = [
+        {"$match": {"created_at": {"$gte": start_date, "$lte": end_date}, "customer_price": {"$gt": 0}}},
+        {"$addFields": {
+            "_margin": {"$subtract": ["$customer_price", {"$ifNull": ["$carrier_cost", 0]}]},
+        }},
+        {"$addFields": {"_margin_pct": {"$multiply": [{"$divide": ["$_margin", "$customer_price"]}, 100]}}},
+        {"$match": {"_margin_pct": {"$lt": LOW_MARGIN_PERCENT}}},
+        {"$sort": {"_margin_pct": 1}},
+        {"$limit": 10},
+        {"$project": {
+            "shipment_number": 1, "customer_id": 1, "carrier_id": 1, "customer_price": 1, "carrier_cost": 1,
+            "created_at": 1, "stops.city": 1, "stops.state": 1, "_margin": 1, "_margin_pct": 1,
+        }},
+    ]
+    low_docs = await db.shipments.aggregate(low_pipeline).to_list(10)
+    low_customer_names = {
+        c["_id"]: c.get("name")
+        async for c in db.customers.find({"_id": {"$in": [s["customer_id"] for s in low_docs if s.get("customer_id")]}}, {"name": 1})
+    }
+    low_carrier_names = {
+        c["_id"]: c.get("name")
+        async for c in db.carriers.find({"_id": {"$in": [s["carrier_id"] for s in low_docs if s.get("carrier_id")]}}, {"name": 1})
+    }
+
     low_margin_shipments = []
-    for s in shipments:
-        margin_pct = s.get("margin_percent") or 0
-        if margin_pct < 10:
-            origin = f"{s.get('origin_city', 'Unknown')}, {s.get('origin_state', '??')}"
-            dest = f"{s.get('dest_city', 'Unknown')}, {s.get('dest_state', '??')}"
-            low_margin_shipments.append(LowMarginShipment(
-                shipment_id=str(s["_id"]),
-                shipment_number=s.get("shipment_number", ""),
-                customer_name=s.get("customer_name"),
-                carrier_name=s.get("carrier_name"),
-                origin=origin,
-                destination=dest,
-                customer_price=s.get("customer_price", 0) or 0,
-                carrier_cost=s.get("carrier_cost", 0) or 0,
-                margin=s.get("margin", 0) or 0,
-                margin_percent=margin_pct,
-                created_at=s.get("created_at", datetime.utcnow())
-            ))
-    low_margin_shipments.sort(key=lambda x: x.margin_percent)
-    low_margin_shipments = low_margin_shipments[:10]  # Top 10 lowest
+    for s in low_docs:
+        stops = s.get("stops", [])
+        origin_stop = stops[0] if stops else {}
+        dest_stop = stops[-1] if stops else {}
+        low_margin_shipments.append(LowMarginShipment(
+            shipment_id=str(s["_id"]),
+            shipment_number=s.get("shipment_number", ""),
+            customer_name=low_customer_names.get(s.get("customer_id")),
+            carrier_name=low_carrier_names.get(s.get("carrier_id")),
+            origin=f"{origin_stop.get('city', 'Unknown')}, {origin_stop.get('state', '??')}",
+            destination=f"{dest_stop.get('city', 'Unknown')}, {dest_stop.get('state', '??')}",
+            customer_price=s.get("customer_price", 0) or 0,
+            carrier_cost=s.get("carrier_cost", 0) or 0,
+            margin=s["_margin"],
+            margin_percent=round(s["_margin_pct"], 1),
+            created_at=s.get("created_at", datetime.utcnow())
+        ))
 
     return MarginDashboardResponse(
         summary=summary,
-        by_customer=by_customer[:10],  # Top 10
-        by_carrier=by_carrier[:10],  # Top 10
+        by_customer=by_customer,  # Top 10
+        by_carrier=by_carrier,  # Top 10
         by_lane=by_lane,
         trends=trends,
         low_margin_shipments=low_margin_shipments
     )
 
 
+def _margin_pct(revenue: int, cost: int) -> float:
+    return ((revenue - cost) / revenue * 100) if revenue > 0 else 0
+
+
 @router.get("/carrier-performance", response_model=CarrierPerformanceResponse)
 async def get_carrier_performance(days: int = 30):
-    """Get carrier performance analytics."""
+    """Get carrier performance analytics from the daily carrier rollups."""
     db = get_database()
 
     # Calculate date range
@@ -605,134 +560,31 @@ async def get_carrier_performance(days: int = 30):
     start_date = end_date - timedelta(days=days)
     prev_start = start_date - timedelta(days=days)
 
-    # Get all carriers
-    carriers_cursor = db.carriers.find({"status": {"$ne": "do_not_use"}})
-    all_carriers = await carriers_cursor.to_list(1000)
-    carrier_map = {str(c["_id"]): c for c in all_carriers}
+    total_carriers = await db.carriers.count_documents({"status": {"$ne": "do_not_use"}})
 
-    # Get shipments in current period
-    pipeline = [
-        {
-            "$match": {
-                "created_at": {"$gte": start_date, "$lte": end_date},
-                "carrier_id": {"$exists": True, "$ne": None}
-            }
-        },
-        {
-            "$lookup": {
-                "from": "carriers",
-                "localField": "carrier_id",
-                "foreignField": "_id",
-                "as": "carrier"
-            }
-        },
-        {
-            "$addFields": {
-                "carrier_name": {"$arrayElemAt": ["$carrier.name", 0]},
-                "mc_number": {"$arrayElemAt": ["$carrier.mc_number", 0]},
-            }
-        }
-    ]
-    cursor = db.shipments.aggregate(pipeline)
-    shipments = await cursor.to_list(10000)
+    rows = await AnalyticsRollupService.get_rows("carrier", start_date)
+    prev_rows = await AnalyticsRollupService.get_rows("carrier", prev_start, end=start_date)
 
-    # Get tenders for acceptance rate
-    tenders_cursor = db.tenders.find({
-        "created_at": {"$gte": start_date, "$lte": end_date}
-    })
-    tenders = await tenders_cursor.to_list(10000)
-
-    # Get previous period shipments for trend calculation
-    prev_pipeline = [
-        {
-            "$match": {
-                "created_at": {"$gte": prev_start, "$lt": start_date},
-                "carrier_id": {"$exists": True, "$ne": None}
-            }
-        }
-    ]
-    prev_cursor = db.shipments.aggregate(prev_pipeline)
-    prev_shipments = await prev_cursor.to_list(10000)
-
-    # Aggregate by carrier
-    carrier_data = {}
-    for s in shipments:
-        carrier_id = s.get("carrier_id")
-        if not carrier_id:
-            continue
-        cid = str(carrier_id)
-
-        if cid not in carrier_data:
-            carrier_data[cid] = {
-                "carrier_id": cid,
-                "carrier_name": s.get("carrier_name") or "Unknown",
-                "mc_number": s.get("mc_number"),
-                "shipment_count": 0,
-                "on_time_count": 0,
-                "late_count": 0,
-                "total_miles": 0,
-                "total_cost": 0,
-                "exception_count": 0,
-            }
+    # Only carriers that moved freight in the period are ranked; tender-only
+    # rows still feed acceptance rates for those carriers.
+    carrier_totals = {k: m for k, m in sum_rows(rows).items() if m["shipment_count"] > 0}
+    prev_carrier_totals = sum_rows(prev_rows)
 
-        carrier_data[cid]["shipment_count"] += 1
-        carrier_data[cid]["total_cost"] += s.get("carrier_cost", 0) or 0
-        carrier_data[cid]["total_miles"] += s.get("total_miles", 0) or 0
-
-        # Check delivery status
-        status = s.get("status", "")
-        if status == "delivered":
-            # Check if delivered on time (simplified - actual delivery vs scheduled)
-            delivered_at = s.get("delivered_at")
-            scheduled_delivery = s.get("scheduled_delivery")
-            if delivered_at and scheduled_delivery:
-                if delivered_at <= scheduled_delivery:
-                    carrier_data[cid]["on_time_count"] += 1
-                else:
-                    carrier_data[cid]["late_count"] += 1
-            else:
-                # Assume on-time if no dates to compare
-                carrier_data[cid]["on_time_count"] += 1
-
-    # Calculate tender acceptance rates
-    tender_stats = {}
-    for t in tenders:
-        carrier_id = t.get("carrier_id")
-        if not carrier_id:
-            continue
-        cid = str(carrier_id)
-        if cid not in tender_stats:
-            tender_stats[cid] = {"accepted": 0, "declined": 0, "total": 0}
-
-        tender_stats[cid]["total"] += 1
-        status = t.get("status", "")
-        if status == "accepted":
-            tender_stats[cid]["accepted"] += 1
-        elif status == "declined":
-            tender_stats[cid]["declined"] += 1
-
-    # Calculate previous period performance for trend
-    prev_carrier_data = {}
-    for s in prev_shipments:
-        carrier_id = s.get("carrier_id")
-        if not carrier_id:
-            continue
-        cid = str(carrier_id)
-        if cid not in prev_carrier_data:
-            prev_carrier_data[cid] = {"shipment_count": 0, "on_time_count": 0}
-        prev_carrier_data[cid]["shipment_count"] += 1
-        status = s.get("status", "")
-        if status == "delivered":
-            prev_carrier_data[cid]["on_time_count"] += 1
+    carrier_docs = {
+        str(c["_id"]): c
+        async for c in db.carriers.find(
+            {"_id": {"$in": resolve_ids(carrier_totals.keys())}}, {"name": 1, "mc_number": 1}
+        )
+    }
 
     # Build carrier performance list
     carriers_list = []
-    for cid, data in carrier_data.items():
-        tender_info = tender_stats.get(cid, {"accepted": 0, "declined": 0, "total": 0})
-        tender_rate = (tender_info["accepted"] / tender_info["total"] * 100) if tender_info["total"] > 0 else 100
+    for cid, data in carrier_totals.items():
+        tender_total = data["tender_count"]
+        tender_rate = (data["tender_accepted"] / tender_total * 100) if tender_total > 0 else 100
 
         on_time_rate = (data["on_time_count"] / data["shipment_count"] * 100) if data["shipment_count"] > 0 else 100
-        avg_cost_per_mile = (data["total_cost"] / data["total_miles"]) if data["total_miles"] > 0 else 0
+        avg_cost_per_mile = (data["cost"] / data["miles"]) if data["miles"] > 0 else 0
 
         # Calculate composite performance score (weighted average)
         # 40% on-time, 30% tender acceptance, 20% cost efficiency, 10% volume
@@ -747,9 +599,9 @@ async def get_carrier_performance(days: int = 30):
         )
 
         # Calculate trend
-        prev_data = prev_carrier_data.get(cid)
+        prev_data = prev_carrier_totals.get(cid)
         if prev_data and prev_data["shipment_count"] > 0:
-            prev_on_time_rate = (prev_data["on_time_count"] / prev_data["shipment_count"] * 100)
+            prev_on_time_rate = (prev_data["delivered_count"] / prev_data["shipment_count"] * 100)
             if on_time_rate > prev_on_time_rate + 5:
                 trend = "improving"
             elif on_time_rate < prev_on_time_rate - 5:
@@ -759,21 +611,22 @@ async def get_carrier_performance(days: int = 30):
         else:
             trend = "stable"
 
+        carrier = carrier_docs.get(cid, {})
         carriers_list.append(CarrierPerformanceDetail(
             carrier_id=cid,
-            carrier_name=data["carrier_name"],
-            mc_number=data["mc_number"],
+            carrier_name=carrier.get("name") or "Unknown",
+            mc_number=carrier.get("mc_number"),
             shipment_count=data["shipment_count"],
             on_time_delivery_count=data["on_time_count"],
             on_time_rate=round(on_time_rate, 1),
             late_delivery_count=data["late_count"],
-            tender_accepted_count=tender_info["accepted"],
-            tender_declined_count=tender_info["declined"],
+            tender_accepted_count=data["tender_accepted"],
+            tender_declined_count=data["tender_declined"],
             tender_acceptance_rate=round(tender_rate, 1),
             avg_cost_per_mile=round(avg_cost_per_mile, 2),
-            total_miles=data["total_miles"],
-            total_cost=data["total_cost"],
-            exception_count=data["exception_count"],
+            total_miles=data["miles"],
+            total_cost=data["cost"],
+            exception_count=0,
             performance_score=round(performance_score, 1),
             trend=trend
         ))
@@ -789,7 +642,7 @@ async def get_carrier_performance(days: int = 30):
     top_performer = carriers_list[0] if carriers_list else None
 
     summary = CarrierPerformanceSummary(
-        total_carriers=len(all_carriers),
+        total_carriers=total_carriers,
         active_carriers=active_carriers,
         avg_on_time_rate=round(avg_on_time, 1),
         avg_tender_acceptance=round(avg_tender, 1),
@@ -798,32 +651,16 @@ async def get_carrier_performance(days: int = 30):
     )
 
     # Calculate daily trends
-    trend_data = {}
-    for s in shipments:
-        date_str = s.get("created_at", datetime.utcnow()).strftime("%Y-%m-%d")
-        if date_str not in trend_data:
-            trend_data[date_str] = {
-                "date": date_str,
-                "on_time_count": 0,
-                "total_count": 0,
-                "total_cost": 0,
-                "total_miles": 0
-            }
-        trend_data[date_str]["total_count"] += 1
-        trend_data[date_str]["total_cost"] += s.get("carrier_cost", 0) or 0
-        trend_data[date_str]["total_miles"] += s.get("total_miles", 0) or 0
-        if s.get("status") == "delivered":
-            trend_data[date_str]["on_time_count"] += 1
-
     trends = []
-    for date_str in sorted(trend_data.keys()):
-        data = trend_data[date_str]
-        on_time_rate = (data["on_time_count"] / data["total_count"] * 100) if data["total_count"] > 0 else 100
-        avg_cpm = (data["total_cost"] / data["total_miles"]) if data["total_miles"] > 0 else 0
+    for date_str, data in sorted(sum_rows(rows, group_by="day").items()):
+        if data["shipment_count"] == 0:
+            continue
+        on_time_rate = data["delivered_count"] / data["shipment_count"] * 100
+        avg_cpm = (data["cost"] / data["miles"]) if data["miles"] > 0 else 0
         trends.append(CarrierPerformanceTrend(
             date=date_str,
             on_time_rate=round(on_time_rate, 1),
-            shipment_count=data["total_count"],
+            shipment_count=data["shipment_count"],
             avg_cost_per_mile=round(avg_cpm, 2)
         ))
 
@@ -848,6 +685,7 @@ class ScheduledReportCreate(BaseModel):
     time_of_day: str = "08:00"  # HH:MM
     timezone: str = "America/New_York"
     is_active: bool = True
+    saved_report_id: Optional[str] = None  # run a saved custom report instead of report_type
 
 
 class ScheduledReportResponse(BaseModel):
@@ -867,6 +705,7 @@ class ScheduledReportResponse(BaseModel):
     next_run_at: Optional[str] = None
     created_at: str
     ai_suggested_defaults: Optional[dict] = None
+    saved_report_id: Optional[str] = None
 
 
 class ReportHistoryEntry(BaseModel):
@@ -876,41 +715,15 @@ class ReportHistoryEntry(BaseModel):
     generated_at: str
     format: str
     recipients: List[str]
-    status: str  # sent, failed, pending
+    status: str  # pending, running, completed, failed
     download_url: Optional[str] = None
     file_size_bytes: Optional[int] = None
+    row_count: Optional[int] = None
+    duration_ms: Optional[int] = None
+    completed_at: Optional[str] = None
     error_message: Optional[str] = None
 
 
-def _calculate_next_run(frequency: str, time_of_day: str, day_of_week: Optional[int], day_of_month: Optional[int]) -> datetime:
-    """Calculate the next run time for a scheduled report."""
-    now = datetime.utcnow()
-    hour, minute = int(time_of_day.split(":")[0]), int(time_of_day.split(":")[1])
-
-    if frequency == "daily":
-        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        if next_run <= now:
-            next_run += timedelta(days=1)
-    elif frequency == "weekly":
-        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        days_ahead = (day_of_week or 0) - now.weekday()
-        if days_ahead <= 0:
-            days_ahead += 7
-        next_run += timedelta(days=days_ahead)
-    elif frequency == "monthly":
-        dom = day_of_month or 1
-        next_run = now.replace(day=min(dom, 28), hour=hour, minute=minute, second=0, microsecond=0)
-        if next_run <= now:
-            if now.month == 12:
-                next_run = next_run.replace(year=now.year + 1, month=1)
-            else:
-                next_run = next_run.replace(month=now.month + 1)
-    else:
-        next_run = now + timedelta(days=1)
-
-    return next_run
-
-
 @router.post("/scheduled-reports", response_model=ScheduledReportResponse)
 async def create_scheduled_report(data: ScheduledReportCreate):
     """Create a scheduled report delivery."""
@@ -948,7 +761,7 @@ async def create_scheduled_report(data: ScheduledReportCreate):
             "suggested_filters": {},
         }
 
-    next_run = _calculate_next_run(data.frequency, data.time_of_day, data.day_of_week, data.day_of_month)
+    next_run = calculate_next_run(data.frequency, data.time_of_day, data.day_of_week, data.day_of_month)
 
     report_doc = {
         "report_type": data.report_type,
@@ -962,6 +775,7 @@ async def create_scheduled_report(data: ScheduledReportCreate):
         "time_of_day": data.time_of_day,
         "timezone": data.timezone,
         "is_active": data.is_active,
+        "saved_report_id": data.saved_report_id,
         "last_sent_at": None,
         "next_run_at": next_run,
         "created_at": now,
@@ -969,6 +783,7 @@ async def create_scheduled_report(data: ScheduledReportCreate):
     }
 
     result = await db.scheduled_reports.insert_one(report_doc)
+    await schedule_report_timer(report_doc)
 
     return ScheduledReportResponse(
         id=str(result.inserted_id),
@@ -987,6 +802,7 @@ async def create_scheduled_report(data: ScheduledReportCreate):
         next_run_at=next_run.isoformat(),
         created_at=now.isoformat(),
         ai_suggested_defaults=ai_defaults,
+        saved_report_id=data.saved_report_id,
     )
 
 
@@ -1014,6 +830,7 @@ async def list_scheduled_reports():
             last_sent_at=r["last_sent_at"].isoformat() if r.get("last_sent_at") else None,
             next_run_at=r["next_run_at"].isoformat() if r.get("next_run_at") else None,
             created_at=r.get("created_at", datetime.utcnow()).isoformat(),
+            saved_report_id=r.get("saved_report_id"),
         )
         for r in reports
     ]
@@ -1071,11 +888,12 @@ async def update_scheduled_report(report_id: str, data: ScheduledReportUpdate):
     day_of_month = data.day_of_month if data.day_of_month is not None else existing.get("day_of_month")
 
     if any(f is not None for f in [data.frequency, data.time_of_day, data.day_of_week, data.day_of_month]):
-        update_fields["next_run_at"] = _calculate_next_run(frequency, time_of_day, day_of_week, day_of_month)
+        update_fields["next_run_at"] = calculate_next_run(frequency, time_of_day, day_of_week, day_of_month)
 
     await db.scheduled_reports.update_one({"_id": ObjectId(report_id)}, {"$set": update_fields})
 
     updated = await db.scheduled_reports.find_one({"_id": ObjectId(report_id)})
+    await schedule_report_timer(updated)
     return ScheduledReportResponse(
         id=str(updated["_id"]),
         report_type=updated.get("report_type", ""),
@@ -1102,52 +920,34 @@ async def delete_scheduled_report(report_id: str):
     result = await db.scheduled_reports.delete_one({"_id": ObjectId(report_id)})
     if result.deleted_count == 0:
         return {"status": "not_found"}
+    await timer_scheduler.cancel(SCHEDULED_REPORT_TIMER, report_id)
     return {"status": "deleted"}
 
 
 @router.post("/scheduled-reports/{report_id}/run-now")
 async def run_scheduled_report_now(report_id: str):
-    """Trigger immediate execution of a scheduled report."""
+    """Trigger immediate execution of a scheduled report.
+
+    The report renders in the background on the report scheduler, within
+    its concurrency limit; poll the history entry for its status and
+    download URL.
+    """
     db = get_database()
-    now = datetime.utcnow()
 
     report = await db.scheduled_reports.find_one({"_id": ObjectId(report_id)})
     if not report:
         return {"status": "not_found"}
 
-    # Create a history entry for this run
-    history_doc = {
-        "scheduled_report_id": ObjectId(report_id),
-        "report_name": report.get("report_name", ""),
-        "generated_at": now,
-        "format": report.get("format", "pdf"),
-        "recipients": report.get("recipients", []),
-        "status": "sent",
-        "download_url": None,
-        "file_size_bytes": None,
-        "error_message": None,
-    }
-
-    result = await db.report_history.insert_one(history_doc)
-
-    # Update last_sent_at and next_run_at on the schedule
-    next_run = _calculate_next_run(
-        report.get("frequency", "daily"),
-        report.get("time_of_day", "08:00"),
-        report.get("day_of_week"),
-        report.get("day_of_month"),
-    )
-    await db.scheduled_reports.update_one(
-        {"_id": ObjectId(report_id)},
-        {"$set": {"last_sent_at": now, "next_run_at": next_run, "updated_at": now}},
-    )
+    history_id = await report_scheduler.run_now(report)
+    if history_id is None:
+        raise HTTPException(status_code=429, detail="Too many reports running, try again shortly")
 
     return {
-        "status": "sent",
-        "history_id": str(result.inserted_id),
+        "status": "running",
+        "history_id": str(history_id),
         "report_name": report.get("report_name", ""),
         "recipients": report.get("recipients", []),
-        "generated_at": now.isoformat(),
+        "generated_at": datetime.utcnow().isoformat(),
     }
 
 
@@ -1169,12 +969,33 @@ async def get_report_history(limit: int = 50):
             status=e.get("status", "pending"),
             download_url=e.get("download_url"),
             file_size_bytes=e.get("file_size_bytes"),
+            row_count=e.get("row_count"),
+            duration_ms=e.get("duration_ms"),
+            completed_at=e["completed_at"].isoformat() if e.get("completed_at") else None,
             error_message=e.get("error_message"),
         )
         for e in entries
     ]
 
 
+@router.get("/scheduled-reports/history/{history_id}/download")
+async def download_report(history_id: str):
+    """Download the artifact of a completed report run."""
+    db = get_database()
+    entry = await db.report_history.find_one({"_id": ObjectId(history_id)})
+    if not entry or entry.get("status") != "completed" or not entry.get("storage_path"):
+        raise HTTPException(status_code=404, detail="Report artifact not found")
+    if not os.path.exists(entry["storage_path"]):
+        raise HTTPException(status_code=410, detail="Report artifact has expired")
+
+    extension = report_extension(entry.get("format", "pdf"))
+    return FileResponse(
+        entry["storage_path"],
+        media_type=MEDIA_TYPES[extension],
+        filename=f"{entry.get('report_name') or 'report'}.{extension}",
+    )
+
+
 # ============ Custom Report Builder ============
 
 class CustomReportBuildRequest(BaseModel):
@@ -1311,126 +1132,14 @@ async def build_custom_report(data: CustomReportBuildRequest):
 
     rows = []
     all_columns = data.columns or []
-
-    # Build pipeline based on primary data source
-    primary_source = data.data_sources[0] if data.data_sources else "shipments"
-    collection = db[primary_source]
-
-    # Build match stage from filters
-    match_stage: dict = {}
-    if data.filters:
-        for f in data.filters:
-            field = f.get("field", "")
-            operator = f.get("operator", "equals")
-            value = f.get("value")
-
-            if operator == "equals":
-                match_stage[field] = value
-            elif operator == "not_equals":
-                match_stage[field] = {"$ne": value}
-            elif operator == "greater_than":
-                match_stage[field] = {"$gt": value}
-            elif operator == "less_than":
-                match_stage[field] = {"$lt": value}
-            elif operator == "contains":
-                match_stage[field] = {"$regex": str(value), "$options": "i"}
-            elif operator == "in":
-                match_stage[field] = {"$in": value if isinstance(value, list) else [value]}
-            elif operator == "date_after":
-                match_stage[field] = {"$gte": datetime.fromisoformat(str(value))}
-            elif operator == "date_before":
-                match_stage[field] = {"$lte": datetime.fromisoformat(str(value))}
-
-    pipeline: list = []
-    if match_stage:
-        pipeline.append({"$match": match_stage})
-
-    # Add lookups for joined data sources
-    if "customers" in data.data_sources and primary_source != "customers":
-        pipeline.append({
-            "$lookup": {
-                "from": "customers",
-                "localField": "customer_id",
-                "foreignField": "_id",
-                "as": "_customer",
-            }
-        })
-        pipeline.append({"$addFields": {"customer_name": {"$arrayElemAt": ["$_customer.name", 0]}}})
-
-    if "carriers" in data.data_sources and primary_source != "carriers":
-        pipeline.append({
-            "$lookup": {
-                "from": "carriers",
-                "localField": "carrier_id",
-                "foreignField": "_id",
-                "as": "_carrier",
-            }
-        })
-        pipeline.append({"$addFields": {"carrier_name": {"$arrayElemAt": ["$_carrier.name", 0]}}})
-
-    # Grouping and aggregations
-    if data.grouping:
-        group_id = {g: f"${g}" for g in data.grouping}
-        group_stage: dict = {"_id": group_id}
-
-        if data.aggregations:
-            for agg in data.aggregations:
-                field = agg.get("field", "")
-                func = agg.get("function", "sum")
-                alias = f"{func}_{field}"
-                if func == "sum":
-                    group_stage[alias] = {"$sum": f"${field}"}
-                elif func == "avg":
-                    group_stage[alias] = {"$avg": f"${field}"}
-                elif func == "count":
-                    group_stage[alias] = {"$sum": 1}
-                elif func == "min":
-                    group_stage[alias] = {"$min": f"${field}"}
-                elif func == "max":
-                    group_stage[alias] = {"$max": f"${field}"}
-
-        group_stage["count"] = {"$sum": 1}
-        pipeline.append({"$group": group_stage})
-
-    # Sort
-    if data.sort_by:
-        sort_dir = -1 if data.sort_order == "desc" else 1
-        pipeline.append({"$sort": {data.sort_by: sort_dir}})
-    else:
-        pipeline.append({"$sort": {"created_at": -1}})
-
-    # Limit
-    pipeline.append({"$limit": min(data.limit, 1000)})
-
-    # Project only requested columns
-    if all_columns and not data.grouping:
-        project_stage = {col: 1 for col in all_columns}
-        project_stage["_id"] = 0
-        pipeline.append({"$project": project_stage})
+    config = data.model_dump()
+    collection = db[primary_source(config)]
+    pipeline = build_report_pipeline(config, limit=min(data.limit, 1000))
 
     try:
         cursor = collection.aggregate(pipeline)
         raw_rows = await cursor.to_list(min(data.limit, 1000))
-
-        for row in raw_rows:
-            clean_row = {}
-            for key, val in row.items():
-                if key.startswith("_"):
-                    continue
-                if isinstance(val, ObjectId):
-                    clean_row[key] = str(val)
-                elif isinstance(val, datetime):
-                    clean_row[key] = val.isoformat()
-                elif isinstance(val, dict):
-                    # Flatten group _id
-                    if key == "_id" and data.grouping:
-                        for gk, gv in val.items():
-                            clean_row[gk] = str(gv) if isinstance(gv, ObjectId) else gv
-                    else:
-                        clean_row[key] = val
-                else:
-                    clean_row[key] = val
-            rows.append(clean_row)
+        rows = [clean_report_row(row, data.grouping) for row in raw_rows]
     except Exception:
         rows = []
 
@@ -1602,92 +1311,34 @@ async def get_customer_profitability(
         target_customer_ids = [customer_id]
     if compare_ids:
         target_customer_ids.extend(compare_ids.split(","))
-
-    # Build match filter
-    match_filter: dict = {
-        "created_at": {"$gte": start_date},
-        "customer_price": {"$gt": 0},
+    keys = [cid for cid in target_customer_ids if ObjectId.is_valid(cid)] or None
+
+    # Current and previous period rollups (priced shipments only)
+    rows = await AnalyticsRollupService.get_rows("customer", start_date, keys=keys)
+    prev_rows = await AnalyticsRollupService.get_rows("customer", prev_start, end=start_date, keys=keys)
+
+    customer_data = sum_rows(rows)
+    prev_margins = sum_rows(prev_rows)
+
+    # Monthly breakdown per customer
+    monthly: dict = {}
+    for row in rows:
+        month = monthly.setdefault(row["key"], {}).setdefault(row["day"][:7], {"revenue": 0, "cost": 0, "count": 0})
+        month["revenue"] += row["metrics"].get("revenue", 0)
+        month["cost"] += row["metrics"].get("cost", 0)
+        month["count"] += row["metrics"].get("shipment_count", 0)
+
+    customer_names = {
+        str(c["_id"]): c.get("name")
+        async for c in db.customers.find({"_id": {"$in": resolve_ids(customer_data.keys())}}, {"name": 1})
     }
-    if target_customer_ids:
-        try:
-            match_filter["customer_id"] = {"$in": [ObjectId(cid) for cid in target_customer_ids]}
-        except Exception:
-            pass
-
-    # Current period shipments
-    pipeline = [
-        {"$match": match_filter},
-        {
-            "$lookup": {
-                "from": "customers",
-                "localField": "customer_id",
-                "foreignField": "_id",
-                "as": "customer",
-            }
-        },
-        {
-            "$addFields": {
-                "customer_name": {"$arrayElemAt": ["$customer.name", 0]},
-            }
-        },
-    ]
-
-    cursor = db.shipments.aggregate(pipeline)
-    shipments = await cursor.to_list(10000)
-
-    # Previous period for trend
-    prev_filter = dict(match_filter)
-    prev_filter["created_at"] = {"$gte": prev_start, "$lt": start_date}
-    prev_cursor = db.shipments.aggregate([{"$match": prev_filter}])
-    prev_shipments = await prev_cursor.to_list(10000)
-
-    # Aggregate by customer
-    customer_data: dict = {}
-    for s in shipments:
-        cid = str(s.get("customer_id", "unknown"))
-        if cid not in customer_data:
-            customer_data[cid] = {
-                "customer_id": cid,
-                "customer_name": s.get("customer_name") or "Unknown",
-                "total_revenue": 0,
-                "carrier_cost": 0,
-                "accessorial_cost": 0,
-                "quick_pay_discount": 0,
-                "other_cost": 0,
-                "shipment_count": 0,
-                "monthly": {},
-            }
-        cd = customer_data[cid]
-        cd["total_revenue"] += s.get("customer_price", 0) or 0
-        cd["carrier_cost"] += s.get("carrier_cost", 0) or 0
-        cd["accessorial_cost"] += s.get("accessorial_charges", 0) or 0
-        cd["quick_pay_discount"] += s.get("quick_pay_discount", 0) or 0
-        cd["other_cost"] += s.get("other_costs", 0) or 0
-        cd["shipment_count"] += 1
-
-        # Monthly breakdown
-        month_key = s.get("created_at", now).strftime("%Y-%m")
-        if month_key not in cd["monthly"]:
-            cd["monthly"][month_key] = {"revenue": 0, "cost": 0, "count": 0}
-        cd["monthly"][month_key]["revenue"] += s.get("customer_price", 0) or 0
-        cd["monthly"][month_key]["cost"] += s.get("carrier_cost", 0) or 0
-        cd["monthly"][month_key]["count"] += 1
-
-    # Previous period by customer
-    prev_margins: dict = {}
-    for s in prev_shipments:
-        cid = str(s.get("customer_id", "unknown"))
-        if cid not in prev_margins:
-            prev_margins[cid] = {"revenue": 0, "cost": 0}
-        prev_margins[cid]["revenue"] += s.get("customer_price", 0) or 0
-        prev_margins[cid]["cost"] += s.get("carrier_cost", 0) or 0
 
     # Build response
     results = []
     for cid, cd in customer_data.items():
-        total_cost = cd["carrier_cost"] + cd["accessorial_cost"] + cd["quick_pay_discount"] + cd["other_cost"]
-        total_margin = cd["total_revenue"] - total_cost
-        margin_pct = (total_margin / cd["total_revenue"] * 100) if cd["total_revenue"] > 0 else 0
+        total_cost = cd["cost"] + cd["accessorial_cost"] + cd["quick_pay_discount"] + cd["other_cost"]
+        total_margin = cd["revenue"] - total_cost
+        margin_pct = (total_margin / cd["revenue"] * 100) if cd["revenue"] > 0 else 0
 
         # Trend
         prev = prev_margins.get(cid, {})
@@ -1705,8 +1356,9 @@ async def get_customer_profitability(
 
         # Monthly data
         monthly_data = []
-        for month_key in sorted(cd["monthly"].keys()):
-            m = cd["monthly"][month_key]
+        customer_months = monthly.get(cid, {})
+        for month_key in sorted(customer_months.keys()):
+            m = customer_months[month_key]
             m_margin = m["revenue"] - m["cost"]
             m_pct = (m_margin / m["revenue"] * 100) if m["revenue"] > 0 else 0
             monthly_data.append({
@@ -1725,9 +1377,9 @@ async def get_customer_profitability(
         if trend_dir == "declining":
             ai_insights.append(f"Profitability declining by {abs(change):.1f}pp vs previous period. Investigate cost increases or rate erosion.")
         if cd["quick_pay_discount"] > 0:
-            qp_impact = (cd["quick_pay_discount"] / cd["total_revenue"] * 100) if cd["total_revenue"] > 0 else 0
+            qp_impact = (cd["quick_pay_discount"] / cd["revenue"] * 100) if cd["revenue"] > 0 else 0
             ai_insights.append(f"Quick-pay discounts represent {qp_impact:.1f}% of revenue. Evaluate if quick-pay terms need adjustment.")
-        if cd["accessorial_cost"] > cd["total_revenue"] * 0.1:
+        if cd["accessorial_cost"] > cd["revenue"] * 0.1:
             ai_insights.append("Accessorial costs exceed 10% of revenue. Review accessorial billing and carrier charges.")
         if cd["shipment_count"] > 0 and total_margin / cd["shipment_count"] < 5000:  # less than $50 per shipment
             ai_insights.append("Average margin per shipment is below $50. Volume may not justify resource allocation.")
@@ -1738,11 +1390,11 @@ async def get_customer_profitability(
 
         results.append({
             "customer_id": cid,
-            "customer_name": cd["customer_name"],
+            "customer_name": customer_names.get(cid) or "Unknown",
             "period": period,
-            "total_revenue": cd["total_revenue"],
+            "total_revenue": cd["revenue"],
             "cost_breakdown": {
-                "carrier_cost": cd["carrier_cost"],
+                "carrier_cost": cd["cost"],
                 "accessorial_cost": cd["accessorial_cost"],
                 "quick_pay_discount": cd["quick_pay_discount"],
                 "other_cost": cd["other_cost"],
@@ -1751,7 +1403,7 @@ async def get_customer_profitability(
             "total_margin": total_margin,
             "margin_percent": round(margin_pct, 1),
             "shipment_count": cd["shipment_count"],
-            "avg_revenue_per_shipment": cd["total_revenue"] // cd["shipment_count"] if cd["shipment_count"] > 0 else 0,
+            "avg_revenue_per_shipment": cd["revenue"] // cd["shipment_count"] if cd["shipment_count"] > 0 else 0,
             "avg_margin_per_shipment": total_margin // cd["shipment_count"] if cd["shipment_count"] > 0 else 0,
             "trend_direction": trend_dir,
             "trend_change_percent": round(change, 1),
@@ -1874,15 +1526,9 @@ async def get_lane_intelligence(days: int = 90, limit: int = 20):
                 "customer_price": {"$gt": 0},
             }
         },
-        {
-            "$addFields": {
-                "origin_state": {"$arrayElemAt": ["$stops.state", 0]},
-                "dest_state": {"$arrayElemAt": ["$stops.state", -1]},
-            }
-        },
         {
             "$group": {
-                "_id": {"origin_state": "$origin_state", "destination_state": "$dest_state"},
+                "_id": {"origin_state": "$origin_state", "destination_state": "$destination_state"},
                 "volume": {"$sum": 1},
                 "avg_rate": {"$avg": "$customer_price"},
                 "avg_cost": {"$avg": "$carrier_cost"},
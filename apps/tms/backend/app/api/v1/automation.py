@@ -10,6 +10,7 @@ from app.models.base import utc_now
 from app.services.waterfall_service import WaterfallService, WaterfallConfig
 from app.services.auto_assignment_service import AutoAssignmentService, AssignmentRule
 from app.services.invoice_automation_service import InvoiceAutomationService
+from app.services.document_queue import document_queue
 
 router = APIRouter()
 
@@ -256,36 +257,17 @@ async def process_delivered_shipments():
 # ============================================================================
 
 @router.post("/documents/classify/{document_id}")
-async def classify_document(document_id: str, background_tasks: BackgroundTasks):
+async def classify_document(document_id: str):
     """Trigger AI classification for a document."""
-    from app.services.document_processing import get_document_processor
-
-    processor = get_document_processor()
-
-    # Run in background
-    async def process():
-        try:
-            await processor.process_document(document_id)
-        except Exception as e:
-            # Log error
-            db = get_database()
-            await db.documents.update_one(
-                {"_id": ObjectId(document_id)},
-                {"$set": {"extraction_error": str(e)}}
-            )
-
-    background_tasks.add_task(process)
+    await document_queue.enqueue(document_id, source="classify")
 
     return {"status": "processing", "document_id": document_id}
 
 
 @router.post("/documents/process-pending")
-async def process_pending_documents(background_tasks: BackgroundTasks, limit: int = 10):
-    """Process documents pending extraction. Run periodically."""
-    from app.services.document_processing import get_document_processor
-
+async def process_pending_documents(limit: int = 10):
+    """Queue documents pending extraction. Run periodically."""
     db = get_database()
-    processor = get_document_processor()
 
     # Find documents pending processing
     pending = await db.documents.find({
@@ -296,18 +278,8 @@ async def process_pending_documents(background_tasks: BackgroundTasks, limit: in
         "mime_type": {"$in": ["image/jpeg", "image/png", "image/gif", "image/webp", "application/pdf"]}
     }).limit(limit).to_list(limit)
 
-    processed_ids = []
-    for doc in pending:
-        doc_id = str(doc["_id"])
-        processed_ids.append(doc_id)
-
-        async def process(did=doc_id):
-            try:
-                await processor.process_document(did)
-            except Exception:
-                pass
-
-        background_tasks.add_task(process)
+    processed_ids = [str(doc["_id"]) for doc in pending]
+    await document_queue.enqueue_many(processed_ids, source="pending")
 
     return {"status": "processing", "count": len(processed_ids), "document_ids": processed_ids}
 
@@ -14,7 +14,7 @@ from app.schemas.automation import (
     TestAutomationResponse,
     MatchedRuleResult,
 )
-from app.services.automation_engine import test_rules
+from app.services.automation_engine import AutomationRuleCache, flush_trigger_stats, test_rules
 from app.services.websocket_manager import manager
 
 router = APIRouter()
@@ -49,6 +49,8 @@ async def list_automations(
 ):
     """List all automation rules with optional filters."""
     db = get_database()
+    # Include buffered trigger counts and shadow results
+    await flush_trigger_stats()
 
     query = {}
     if trigger:
@@ -68,6 +70,7 @@ async def list_automations(
 async def get_automation(rule_id: str):
     """Get a single automation rule with its shadow log."""
     db = get_database()
+    await flush_trigger_stats()
 
     doc = await db.automation_rules.find_one({"_id": ObjectId(rule_id)})
     if not doc:
@@ -87,6 +90,7 @@ async def create_automation(data: AutomationRuleCreate):
 
     rule = AutomationRule(**rule_data)
     await db.automation_rules.insert_one(rule.model_dump_mongo())
+    AutomationRuleCache.invalidate()
 
     await manager.broadcast("automation_created", {
         "rule_id": str(rule.id),
@@ -100,6 +104,7 @@ async def create_automation(data: AutomationRuleCreate):
 async def update_automation(rule_id: str, data: AutomationRuleUpdate):
     """Update an automation rule."""
     db = get_database()
+    await flush_trigger_stats()
 
     doc = await db.automation_rules.find_one({"_id": ObjectId(rule_id)})
     if not doc:
@@ -125,6 +130,7 @@ async def update_automation(rule_id: str, data: AutomationRuleUpdate):
         {"_id": ObjectId(rule_id)},
         {"$set": rule.model_dump_mongo()}
     )
+    AutomationRuleCache.invalidate()
 
     await manager.broadcast("automation_updated", {
         "rule_id": str(rule.id),
@@ -142,6 +148,7 @@ async def delete_automation(rule_id: str):
     result = await db.automation_rules.delete_one({"_id": ObjectId(rule_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Automation rule not found")
+    AutomationRuleCache.invalidate()
 
     await manager.broadcast("automation_deleted", {"rule_id": rule_id})
 
@@ -152,6 +159,7 @@ async def delete_automation(rule_id: str):
 async def toggle_automation(rule_id: str):
     """Enable or disable an automation rule."""
     db = get_database()
+    await flush_trigger_stats()
 
     doc = await db.automation_rules.find_one({"_id": ObjectId(rule_id)})
     if not doc:
@@ -165,6 +173,7 @@ async def toggle_automation(rule_id: str):
         {"_id": ObjectId(rule_id)},
         {"$set": {"enabled": rule.enabled, "updated_at": rule.updated_at}}
     )
+    AutomationRuleCache.invalidate()
 
     await manager.broadcast("automation_toggled", {
         "rule_id": str(rule.id),
@@ -179,6 +188,7 @@ async def toggle_automation(rule_id: str):
 async def update_rollout(rule_id: str, data: RolloutUpdateRequest):
     """Change the rollout stage and percentage of an automation rule."""
     db = get_database()
+    await flush_trigger_stats()
 
     doc = await db.automation_rules.find_one({"_id": ObjectId(rule_id)})
     if not doc:
@@ -197,6 +207,7 @@ async def update_rollout(rule_id: str, data: RolloutUpdateRequest):
             "updated_at": rule.updated_at,
         }}
     )
+    AutomationRuleCache.invalidate()
 
     await manager.broadcast("automation_rollout_changed", {
         "rule_id": str(rule.id),
@@ -242,6 +253,7 @@ async def test_automation(data: TestAutomationRequest):
 async def get_automation_log(rule_id: str):
     """Get the shadow mode execution log for an automation rule."""
     db = get_database()
+    await flush_trigger_stats()
 
     doc = await db.automation_rules.find_one({"_id": ObjectId(rule_id)})
     if not doc:
@@ -3,8 +3,8 @@ aging reports, quick pay, factoring, carrier invoice processing, and rate confir
 
 import logging
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
-from fastapi import APIRouter, HTTPException
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, BackgroundTasks, HTTPException
 from pydantic import BaseModel, Field
 from bson import ObjectId
 
@@ -16,6 +16,16 @@ from app.services.billing_service import (
     match_carrier_bill,
     get_billing_summary,
 )
+from app.services.batch_invoicing import (
+    BatchInvoicer,
+    classify_shipments,
+    create_batch_job,
+    claim_batch_run,
+    invoice_all,
+    release_batch_run,
+    run_batch_job,
+)
+from app.services.aging import AgingService
 from app.services.number_generator import NumberGenerator
 from app.services.websocket_manager import manager
 from app.models.base import utc_now
@@ -581,163 +591,147 @@ async def batch_generate_invoices(data: BatchInvoiceRequest):
     """
     Generate invoices for multiple delivered shipments in bulk.
     Can consolidate by customer for combined invoices.
+
+    Runs inline; use ``POST /batch-jobs`` for month-end runs over thousands
+    of shipments.
     """
-    db = get_database()
-    results: List[BatchInvoiceResult] = []
-    created = 0
-    skipped = 0
-    errors = 0
-
-    # If no shipment_ids provided but customer_id given, find all delivered uninvoiced shipments
-    shipment_ids = data.shipment_ids
-    if not shipment_ids and data.customer_id:
-        query: Dict[str, Any] = {"status": "delivered", "customer_id": ObjectId(data.customer_id)}
-        shipments = await db.shipments.find(query).to_list(500)
-        # Filter out already-invoiced
-        for s in shipments:
-            existing = await db.invoices.find_one({"shipment_ids": s["_id"]})
-            if not existing:
-                shipment_ids.append(str(s["_id"]))
-
-    if not shipment_ids:
+    if not data.shipment_ids and not data.customer_id:
         return BatchInvoiceResponse(total_processed=0, created=0, skipped=0, errors=0, results=[])
 
-    if data.consolidate_by_customer:
-        # Group shipments by customer
-        customer_shipments: Dict[str, List[dict]] = {}
-        for sid in shipment_ids:
-            try:
-                shipment = await db.shipments.find_one({"_id": ObjectId(sid)})
-                if not shipment:
-                    results.append(BatchInvoiceResult(shipment_id=sid, status="error", message="Shipment not found"))
-                    errors += 1
-                    continue
-                if shipment["status"] != "delivered":
-                    results.append(BatchInvoiceResult(shipment_id=sid, status="skipped", message="Not delivered"))
-                    skipped += 1
-                    continue
-                existing = await db.invoices.find_one({"shipment_ids": ObjectId(sid)})
-                if existing:
-                    results.append(BatchInvoiceResult(shipment_id=sid, status="skipped", message=f"Already invoiced: {existing.get('invoice_number')}"))
-                    skipped += 1
-                    continue
-                cust_id = str(shipment["customer_id"])
-                if cust_id not in customer_shipments:
-                    customer_shipments[cust_id] = []
-                customer_shipments[cust_id].append(shipment)
-            except Exception as e:
-                results.append(BatchInvoiceResult(shipment_id=sid, status="error", message=str(e)))
-                errors += 1
-
-        # Create one consolidated invoice per customer
-        for cust_id, cust_shipments in customer_shipments.items():
-            try:
-                customer = await db.customers.find_one({"_id": ObjectId(cust_id)})
-                if not customer:
-                    for s in cust_shipments:
-                        results.append(BatchInvoiceResult(shipment_id=str(s["_id"]), status="error", message="Customer not found"))
-                        errors += 1
-                    continue
-
-                line_items = []
-                shipment_oids = []
-                for s in cust_shipments:
-                    origin = s["stops"][0] if s.get("stops") else {}
-                    dest = s["stops"][-1] if s.get("stops") and len(s["stops"]) > 1 else {}
-                    line_items.append(InvoiceLineItem(
-                        description=f"Freight ({s.get('shipment_number', '?')}): {origin.get('city', 'Origin')}, {origin.get('state', '')} -> {dest.get('city', 'Dest')}, {dest.get('state', '')}",
-                        quantity=1,
-                        unit_price=s.get("customer_price", 0),
-                        shipment_id=str(s["_id"]),
-                    ))
-                    shipment_oids.append(s["_id"])
-
-                invoice_number = await NumberGenerator.get_next_invoice_number()
-                now = utc_now()
-                payment_terms = customer.get("payment_terms", 30)
-
-                invoice = Invoice(
-                    invoice_number=invoice_number,
-                    customer_id=ObjectId(cust_id),
-                    shipment_ids=shipment_oids,
-                    billing_name=customer["name"],
-                    billing_email=customer.get("billing_email"),
-                    billing_address=customer.get("address_line1"),
-                    line_items=line_items,
-                    invoice_date=now,
-                    due_date=now + timedelta(days=payment_terms),
-                    internal_notes=f"Batch consolidated invoice for {len(cust_shipments)} shipments",
-                )
-                invoice.calculate_totals()
-
-                if data.auto_send:
-                    invoice.transition_to(InvoiceStatus.PENDING)
-                    invoice.transition_to(InvoiceStatus.SENT)
-
-                await db.invoices.insert_one(invoice.model_dump_mongo())
-
-                for s in cust_shipments:
-                    results.append(BatchInvoiceResult(
-                        shipment_id=str(s["_id"]),
-                        invoice_id=str(invoice.id),
-                        invoice_number=invoice.invoice_number,
-                        total=invoice.total,
-                        status="created",
-                        message=f"Consolidated invoice {invoice.invoice_number}",
-                    ))
-                    created += 1
-            except Exception as e:
-                for s in cust_shipments:
-                    results.append(BatchInvoiceResult(shipment_id=str(s["_id"]), status="error", message=str(e)))
-                    errors += 1
-    else:
-        # Create individual invoices
-        for sid in shipment_ids:
-            try:
-                invoice = await generate_invoice_from_shipment(sid)
-                if data.auto_send:
-                    invoice.transition_to(InvoiceStatus.PENDING)
-                    invoice.transition_to(InvoiceStatus.SENT)
-                    await db.invoices.update_one(
-                        {"_id": invoice.id},
-                        {"$set": invoice.model_dump_mongo()},
-                    )
-                results.append(BatchInvoiceResult(
-                    shipment_id=sid,
-                    invoice_id=str(invoice.id),
-                    invoice_number=invoice.invoice_number,
-                    total=invoice.total,
-                    status="created",
-                    message="Invoice created",
-                ))
-                created += 1
-            except ValueError as e:
-                msg = str(e)
-                if "already exists" in msg.lower():
-                    results.append(BatchInvoiceResult(shipment_id=sid, status="skipped", message=msg))
-                    skipped += 1
-                else:
-                    results.append(BatchInvoiceResult(shipment_id=sid, status="error", message=msg))
-                    errors += 1
-            except Exception as e:
-                results.append(BatchInvoiceResult(shipment_id=sid, status="error", message=str(e)))
-                errors += 1
+    owner = f"inline:{ObjectId()}"
+    if not await claim_batch_run(owner):
+        raise HTTPException(status_code=409, detail="A batch invoicing job is already running")
+
+    async def renew_lease(progress: BatchInvoicer, after):
+        # Stop before the next chunk once another run has taken the lease over
+        if not await claim_batch_run(owner, renew=True):
+            raise HTTPException(
+                status_code=409,
+                detail=f"Batch invoicing lease was taken over by another run after {progress.invoices} invoices",
+            )
+
+    invoicer = BatchInvoicer(data.consolidate_by_customer, data.auto_send)
+    try:
+        shipment_ids = None
+        if data.shipment_ids:
+            results, shipment_ids = await classify_shipments(data.shipment_ids)
+            for result in results:
+                invoicer.record(result)
+        if shipment_ids is None or shipment_ids:
+            await invoice_all(invoicer, customer_id=data.customer_id, shipment_ids=shipment_ids, on_chunk=renew_lease)
+    finally:
+        await release_batch_run(owner)
 
     await manager.broadcast("billing:batch_invoices_generated", {
-        "created": created,
-        "skipped": skipped,
-        "errors": errors,
+        "created": invoicer.created,
+        "skipped": invoicer.skipped,
+        "errors": invoicer.errors,
     })
 
     return BatchInvoiceResponse(
-        total_processed=len(shipment_ids),
-        created=created,
-        skipped=skipped,
-        errors=errors,
-        results=results,
+        total_processed=len(invoicer.results),
+        created=invoicer.created,
+        skipped=invoicer.skipped,
+        errors=invoicer.errors,
+        results=[BatchInvoiceResult(**r) for r in invoicer.results],
+    )
+
+
+class BatchInvoiceJobResponse(BaseModel):
+    """State of a background batch invoicing job."""
+    id: str
+    status: str  # "pending", "running", "completed", "failed"
+    customer_id: Optional[str] = None
+    consolidate_by_customer: bool
+    auto_send: bool
+    created: int
+    skipped: int
+    errors: int
+    invoice_count: int
+    error_details: List[BatchInvoiceResult]
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+
+def batch_job_to_response(doc: dict) -> BatchInvoiceJobResponse:
+    return BatchInvoiceJobResponse(
+        id=str(doc["_id"]),
+        status=doc["status"],
+        customer_id=doc.get("customer_id"),
+        consolidate_by_customer=doc["consolidate_by_customer"],
+        auto_send=doc["auto_send"],
+        created=doc["created"],
+        skipped=doc["skipped"],
+        errors=doc["errors"],
+        invoice_count=doc["invoice_count"],
+        error_details=[BatchInvoiceResult(**r) for r in doc.get("error_details", [])],
+        error=doc.get("error"),
+        created_at=doc["created_at"],
+        started_at=doc.get("started_at"),
+        heartbeat_at=doc.get("heartbeat_at"),
+        completed_at=doc.get("completed_at"),
     )
 
 
+@router.post("/batch-jobs", response_model=BatchInvoiceJobResponse)
+async def start_batch_invoice_job(data: BatchInvoiceRequest, background_tasks: BackgroundTasks):
+    """
+    Start batch invoice generation as a background job.
+
+    With no shipment_ids or customer_id the job invoices every delivered,
+    uninvoiced shipment. Progress is broadcast as
+    ``billing:batch_invoice_progress``; a failed job can be resumed.
+    """
+    db = get_database()
+    if data.customer_id and not ObjectId.is_valid(data.customer_id):
+        raise HTTPException(status_code=400, detail="Invalid customer ID")
+
+    job_id = await create_batch_job(
+        data.customer_id,
+        data.shipment_ids or None,
+        data.consolidate_by_customer,
+        data.auto_send,
+    )
+    if not await claim_batch_run(job_id):
+        await db.invoice_batch_jobs.delete_one({"_id": ObjectId(job_id)})
+        raise HTTPException(status_code=409, detail="A batch invoicing job is already running")
+    background_tasks.add_task(run_batch_job, job_id)
+    return batch_job_to_response(await db.invoice_batch_jobs.find_one({"_id": ObjectId(job_id)}))
+
+
+@router.get("/batch-jobs/{job_id}", response_model=BatchInvoiceJobResponse)
+async def get_batch_invoice_job(job_id: str):
+    """Get the progress of a batch invoicing job."""
+    db = get_database()
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+    doc = await db.invoice_batch_jobs.find_one({"_id": ObjectId(job_id)})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return batch_job_to_response(doc)
+
+
+@router.post("/batch-jobs/{job_id}/resume", response_model=BatchInvoiceJobResponse)
+async def resume_batch_invoice_job(job_id: str, background_tasks: BackgroundTasks):
+    """Resume a failed or stalled batch invoicing job from its last checkpoint."""
+    db = get_database()
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+    doc = await db.invoice_batch_jobs.find_one({"_id": ObjectId(job_id)})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    if doc["status"] == "completed":
+        raise HTTPException(status_code=400, detail="Batch job already completed")
+    if not await claim_batch_run(job_id):
+        raise HTTPException(status_code=409, detail="A batch invoicing job is already running")
+
+    background_tasks.add_task(run_batch_job, job_id)
+    return batch_job_to_response(doc)
+
+
 # ============================================================================
 # AR Aging Report (Feature: 36c73d09)
 # ============================================================================
@@ -763,109 +757,17 @@ class AgingReportResponse(BaseModel):
 
 
 @router.get("/aging-report", response_model=AgingReportResponse)
-async def get_ar_aging_report(customer_id: Optional[str] = None):
+async def get_ar_aging_report(customer_id: Optional[str] = None, as_of: Optional[date] = None):
     """
     Get AR aging report with buckets: Current, 1-30, 31-60, 61-90, 91-120, 120+ days.
-    Shows customer-level and invoice-level detail.
-    """
-    db = get_database()
-    now = utc_now()
+    Shows customer-level and invoice-level detail (the oldest invoices per bucket).
 
-    query: Dict[str, Any] = {"status": {"$in": ["sent", "partial"]}}
-    if customer_id:
-        query["customer_id"] = ObjectId(customer_id)
-
-    invoices = await db.invoices.find(query).sort("due_date", 1).to_list(5000)
-
-    bucket_defs = [
-        ("current", "Current", 0),
-        ("1_30", "1-30 Days", 30),
-        ("31_60", "31-60 Days", 60),
-        ("61_90", "61-90 Days", 90),
-        ("91_120", "91-120 Days", 120),
-        ("120_plus", "120+ Days", None),
-    ]
-
-    buckets = {b[0]: AgingBucket(bucket=b[0], label=b[1]) for b in bucket_defs}
-    entity_totals: Dict[str, Dict[str, Any]] = {}
-
-    for inv_doc in invoices:
-        inv = Invoice(**inv_doc)
-        amount_due = inv.amount_due
-        if amount_due <= 0:
-            continue
-
-        due_date = inv.due_date or inv.invoice_date
-        days_past = (now - due_date).days if due_date else 0
-
-        # Determine bucket
-        if days_past <= 0:
-            bucket_key = "current"
-        elif days_past <= 30:
-            bucket_key = "1_30"
-        elif days_past <= 60:
-            bucket_key = "31_60"
-        elif days_past <= 90:
-            bucket_key = "61_90"
-        elif days_past <= 120:
-            bucket_key = "91_120"
-        else:
-            bucket_key = "120_plus"
-
-        item = {
-            "id": str(inv.id),
-            "invoice_number": inv.invoice_number,
-            "customer_id": str(inv.customer_id),
-            "billing_name": inv.billing_name,
-            "amount_due": amount_due,
-            "total": inv.total,
-            "due_date": due_date.isoformat() if due_date else None,
-            "days_past_due": max(0, days_past),
-            "status": inv.status.value,
-        }
-
-        buckets[bucket_key].total_amount += amount_due
-        buckets[bucket_key].count += 1
-        buckets[bucket_key].items.append(item)
-
-        # Track by customer
-        cust_key = str(inv.customer_id)
-        if cust_key not in entity_totals:
-            entity_totals[cust_key] = {
-                "entity_id": cust_key,
-                "entity_name": inv.billing_name,
-                "total_outstanding": 0,
-                "invoice_count": 0,
-                "current": 0,
-                "past_due_1_30": 0,
-                "past_due_31_60": 0,
-                "past_due_61_90": 0,
-                "past_due_91_120": 0,
-                "past_due_120_plus": 0,
-            }
-        entity_totals[cust_key]["total_outstanding"] += amount_due
-        entity_totals[cust_key]["invoice_count"] += 1
-        bucket_field_map = {
-            "current": "current",
-            "1_30": "past_due_1_30",
-            "31_60": "past_due_31_60",
-            "61_90": "past_due_61_90",
-            "91_120": "past_due_91_120",
-            "120_plus": "past_due_120_plus",
-        }
-        entity_totals[cust_key][bucket_field_map[bucket_key]] += amount_due
-
-    total_outstanding = sum(b.total_amount for b in buckets.values())
-    total_count = sum(b.count for b in buckets.values())
-
-    return AgingReportResponse(
-        report_type="ar",
-        as_of_date=now,
-        total_outstanding=total_outstanding,
-        total_count=total_count,
-        buckets=list(buckets.values()),
-        by_entity=sorted(entity_totals.values(), key=lambda x: x["total_outstanding"], reverse=True),
-    )
+    With ``as_of``, returns the stored snapshot for that day instead.
+    """
+    if as_of:
+        return await _aging_snapshot("ar", as_of, customer_id)
+    report = await AgingService.ar_report(ObjectId(customer_id) if customer_id else None)
+    return AgingReportResponse(**report)
 
 
 # ============================================================================
@@ -893,122 +795,58 @@ class PayablesAgingResponse(BaseModel):
 
 
 @router.get("/payables-aging", response_model=PayablesAgingResponse)
-async def get_payables_aging_report(carrier_id: Optional[str] = None):
+async def get_payables_aging_report(carrier_id: Optional[str] = None, as_of: Optional[date] = None):
     """
     Get AP aging report with buckets matching AR, plus cash flow projection.
-    Shows carrier-level and payment-level detail.
-    """
-    db = get_database()
-    now = utc_now()
+    Shows carrier-level and payment-level detail (the oldest bills per bucket).
 
-    query: Dict[str, Any] = {"status": {"$in": ["received", "matched", "disputed", "approved"]}}
-    if carrier_id:
-        query["carrier_id"] = ObjectId(carrier_id)
+    With ``as_of``, returns the stored snapshot for that day instead.
+    """
+    if as_of:
+        return await _aging_snapshot("ap", as_of, carrier_id)
+    report = await AgingService.ap_report(ObjectId(carrier_id) if carrier_id else None)
+    return PayablesAgingResponse(**report)
 
-    bills = await db.carrier_bills.find(query).sort("due_date", 1).to_list(5000)
 
-    buckets = {
-        "current": AgingBucket(bucket="current", label="Current"),
-        "1_30": AgingBucket(bucket="1_30", label="1-30 Days"),
-        "31_60": AgingBucket(bucket="31_60", label="31-60 Days"),
-        "61_90": AgingBucket(bucket="61_90", label="61-90 Days"),
-        "90_plus": AgingBucket(bucket="90_plus", label="90+ Days"),
-    }
-    carrier_totals: Dict[str, Dict[str, Any]] = {}
+async def _aging_snapshot(report_type: str, as_of: date, entity_id: Optional[str]) -> dict:
+    if entity_id:
+        raise HTTPException(status_code=400, detail="Aging snapshots cover all entities; omit the entity filter")
+    report = await AgingService.get_snapshot(report_type, as_of)
+    if not report:
+        raise HTTPException(status_code=404, detail=f"No {report_type.upper()} aging snapshot for {as_of}")
+    return report
 
-    # Cache carrier names
-    carrier_cache: Dict[str, str] = {}
 
-    for bill_doc in bills:
-        amount = bill_doc.get("amount", 0)
-        due_date = bill_doc.get("due_date") or bill_doc.get("received_date", now)
-        days_past = (now - due_date).days if due_date else 0
-
-        carrier_oid = bill_doc.get("carrier_id")
-        carrier_str = str(carrier_oid) if carrier_oid else "unknown"
-        if carrier_str not in carrier_cache:
-            carrier_doc = await db.carriers.find_one({"_id": carrier_oid}) if carrier_oid else None
-            carrier_cache[carrier_str] = carrier_doc["name"] if carrier_doc else "Unknown Carrier"
-
-        if days_past <= 0:
-            bucket_key = "current"
-        elif days_past <= 30:
-            bucket_key = "1_30"
-        elif days_past <= 60:
-            bucket_key = "31_60"
-        elif days_past <= 90:
-            bucket_key = "61_90"
-        else:
-            bucket_key = "90_plus"
-
-        item = {
-            "id": str(bill_doc["_id"]),
-            "bill_number": bill_doc.get("bill_number"),
-            "carrier_id": carrier_str,
-            "carrier_name": carrier_cache[carrier_str],
-            "amount": amount,
-            "due_date": due_date.isoformat() if due_date else None,
-            "days_past_due": max(0, days_past),
-            "status": bill_doc.get("status"),
-        }
-
-        buckets[bucket_key].total_amount += amount
-        buckets[bucket_key].count += 1
-        buckets[bucket_key].items.append(item)
-
-        # By carrier
-        if carrier_str not in carrier_totals:
-            carrier_totals[carrier_str] = {
-                "entity_id": carrier_str,
-                "entity_name": carrier_cache[carrier_str],
-                "total_outstanding": 0,
-                "bill_count": 0,
-                "current": 0,
-                "past_due_1_30": 0,
-                "past_due_31_60": 0,
-                "past_due_61_90": 0,
-                "past_due_90_plus": 0,
-            }
-        carrier_totals[carrier_str]["total_outstanding"] += amount
-        carrier_totals[carrier_str]["bill_count"] += 1
-        cf_map = {
-            "current": "current",
-            "1_30": "past_due_1_30",
-            "31_60": "past_due_31_60",
-            "61_90": "past_due_61_90",
-            "90_plus": "past_due_90_plus",
-        }
-        carrier_totals[carrier_str][cf_map[bucket_key]] += amount
-
-    # Cash flow projection: next 8 weeks
-    projections = []
-    for week_offset in range(8):
-        week_start = now + timedelta(weeks=week_offset)
-        week_end = week_start + timedelta(days=6)
-        week_bills = [
-            b for b in bills
-            if b.get("due_date") and week_start.date() <= b["due_date"].date() <= week_end.date()
-        ]
-        projections.append(CashFlowProjection(
-            week_start=week_start.strftime("%Y-%m-%d"),
-            week_end=week_end.strftime("%Y-%m-%d"),
-            expected_outflow=sum(b.get("amount", 0) for b in week_bills),
-            bill_count=len(week_bills),
-        ))
+class AgingSnapshotSummary(BaseModel):
+    """A stored aging snapshot."""
+    report_type: str
+    as_of_date: str
+    total_outstanding: int
+    total_count: int
+    created_at: datetime
 
-    total_outstanding = sum(b.total_amount for b in buckets.values())
-    total_count = sum(b.count for b in buckets.values())
 
-    return PayablesAgingResponse(
-        as_of_date=now,
-        total_outstanding=total_outstanding,
-        total_count=total_count,
-        buckets=list(buckets.values()),
-        by_carrier=sorted(carrier_totals.values(), key=lambda x: x["total_outstanding"], reverse=True),
-        cash_flow_projection=projections,
+@router.post("/aging-snapshots", response_model=AgingSnapshotSummary)
+async def take_aging_snapshot(report_type: str = "ar"):
+    """Store today's AR or AP aging totals (e.g. at month-end close)."""
+    if report_type not in ("ar", "ap"):
+        raise HTTPException(status_code=400, detail="report_type must be 'ar' or 'ap'")
+    doc = await AgingService.take_snapshot(report_type)
+    return AgingSnapshotSummary(
+        report_type=report_type,
+        as_of_date=doc["as_of_date"],
+        total_outstanding=doc["report"]["total_outstanding"],
+        total_count=doc["report"]["total_count"],
+        created_at=doc["created_at"],
     )
 
 
+@router.get("/aging-snapshots", response_model=List[AgingSnapshotSummary])
+async def list_aging_snapshots(report_type: Optional[str] = None):
+    """List stored aging snapshots, newest first."""
+    return [AgingSnapshotSummary(**s) for s in await AgingService.list_snapshots(report_type)]
+
+
 # ============================================================================
 # Quick Pay Options (Feature: 54674d64)
 # ============================================================================
@@ -13,6 +13,7 @@ from app.models.carrier_compliance import (
     ComplianceType,
     ComplianceStatus,
 )
+from app.services.exception_detection import ExceptionDetectionService
 
 logger = logging.getLogger(__name__)
 
@@ -1211,6 +1212,7 @@ async def get_full_compliance_status(carrier_id: str):
             {"_id": ObjectId(carrier_id)},
             {"$set": {"status": "suspended", "updated_at": now}},
         )
+        await ExceptionDetectionService.apply_carrier(carrier_id)
         auto_blocked = True
         overall_status = "suspended"
         logger.info(
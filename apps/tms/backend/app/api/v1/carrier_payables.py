@@ -10,7 +10,7 @@ Dedicated endpoints for managing carrier accounts payable:
 
 import logging
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from bson import ObjectId
@@ -18,6 +18,7 @@ from bson import ObjectId
 from app.database import get_database
 from app.models.carrier_bill import CarrierBill, CarrierBillStatus
 from app.models.base import utc_now
+from app.services.aging import AgingService
 from app.services.websocket_manager import manager
 
 logger = logging.getLogger(__name__)
@@ -356,118 +357,22 @@ async def get_payables_dashboard():
 
 
 @router.get("/aging-report", response_model=PayablesAgingReportResponse)
-async def get_payables_aging_report(carrier_id: Optional[str] = None):
+async def get_payables_aging_report(carrier_id: Optional[str] = None, as_of: Optional[date] = None):
     """
     Get AP aging report by bucket: Current, 1-30, 31-60, 61-90, 90+ days.
     Includes carrier-level breakdown and 8-week cash flow projection.
-    """
-    db = get_database()
-    now = utc_now()
-
-    query: Dict[str, Any] = {"status": {"$in": ["received", "matched", "disputed", "approved"]}}
-    if carrier_id:
-        query["carrier_id"] = ObjectId(carrier_id)
-
-    bills = await db.carrier_bills.find(query).sort("due_date", 1).to_list(5000)
-
-    buckets = {
-        "current": AgingBucket(bucket="current", label="Current"),
-        "1_30": AgingBucket(bucket="1_30", label="1-30 Days"),
-        "31_60": AgingBucket(bucket="31_60", label="31-60 Days"),
-        "61_90": AgingBucket(bucket="61_90", label="61-90 Days"),
-        "90_plus": AgingBucket(bucket="90_plus", label="90+ Days"),
-    }
-    carrier_totals: Dict[str, Dict[str, Any]] = {}
-    carrier_cache: Dict[str, str] = {}
-
-    for bill_doc in bills:
-        amount = bill_doc.get("amount", 0)
-        due_date = bill_doc.get("due_date") or bill_doc.get("received_date", now)
-        days_past = (now - due_date).days if due_date else 0
-
-        carrier_oid = bill_doc.get("carrier_id")
-        carrier_str = str(carrier_oid) if carrier_oid else "unknown"
-        if carrier_str not in carrier_cache:
-            carrier_doc = await db.carriers.find_one({"_id": carrier_oid}) if carrier_oid else None
-            carrier_cache[carrier_str] = carrier_doc["name"] if carrier_doc else "Unknown Carrier"
-
-        if days_past <= 0:
-            bucket_key = "current"
-        elif days_past <= 30:
-            bucket_key = "1_30"
-        elif days_past <= 60:
-            bucket_key = "31_60"
-        elif days_past <= 90:
-            bucket_key = "61_90"
-        else:
-            bucket_key = "90_plus"
-
-        item = {
-            "id": str(bill_doc["_id"]),
-            "bill_number": bill_doc.get("bill_number"),
-            "carrier_id": carrier_str,
-            "carrier_name": carrier_cache[carrier_str],
-            "amount": amount,
-            "due_date": due_date.isoformat() if due_date else None,
-            "days_past_due": max(0, days_past),
-            "status": bill_doc.get("status"),
-        }
-
-        buckets[bucket_key].total_amount += amount
-        buckets[bucket_key].count += 1
-        buckets[bucket_key].items.append(item)
-
-        # By carrier
-        if carrier_str not in carrier_totals:
-            carrier_totals[carrier_str] = {
-                "entity_id": carrier_str,
-                "entity_name": carrier_cache[carrier_str],
-                "total_outstanding": 0,
-                "bill_count": 0,
-                "current": 0,
-                "past_due_1_30": 0,
-                "past_due_31_60": 0,
-                "past_due_61_90": 0,
-                "past_due_90_plus": 0,
-            }
-        carrier_totals[carrier_str]["total_outstanding"] += amount
-        carrier_totals[carrier_str]["bill_count"] += 1
-        cf_map = {
-            "current": "current",
-            "1_30": "past_due_1_30",
-            "31_60": "past_due_31_60",
-            "61_90": "past_due_61_90",
-            "90_plus": "past_due_90_plus",
-        }
-        carrier_totals[carrier_str][cf_map[bucket_key]] += amount
-
-    # Cash flow projection: next 8 weeks
-    projections = []
-    for week_offset in range(8):
-        week_start = now + timedelta(weeks=week_offset)
-        week_end = week_start + timedelta(days=6)
-        week_bills = [
-            b for b in bills
-            if b.get("due_date") and week_start.date() <= b["due_date"].date() <= week_end.date()
-        ]
-        projections.append(CashFlowProjection(
-            week_start=week_start.strftime("%Y-%m-%d"),
-            week_end=week_end.strftime("%Y-%m-%d"),
-            expected_outflow=sum(b.get("amount", 0) for b in week_bills),
-            bill_count=len(week_bills),
-        ))
 
-    total_outstanding = sum(b.total_amount for b in buckets.values())
-    total_count = sum(b.count for b in buckets.values())
-
-    return PayablesAgingReportResponse(
-        as_of_date=now,
-        total_outstanding=total_outstanding,
-        total_count=total_count,
-        buckets=list(buckets.values()),
-        by_carrier=sorted(carrier_totals.values(), key=lambda x: x["total_outstanding"], reverse=True),
-        cash_flow_projection=projections,
-    )
+    With ``as_of``, returns the stored snapshot for that day instead.
+    """
+    if as_of:
+        if carrier_id:
+            raise HTTPException(status_code=400, detail="Aging snapshots cover all carriers; omit carrier_id")
+        report = await AgingService.get_snapshot("ap", as_of)
+        if not report:
+            raise HTTPException(status_code=404, detail=f"No AP aging snapshot for {as_of}")
+        return report
+    report = await AgingService.ap_report(ObjectId(carrier_id) if carrier_id else None)
+    return PayablesAgingReportResponse(**report)
 
 
 # ============================================================================
@@ -13,6 +13,9 @@ from app.models.portal import (
     CarrierPortalSession, PortalNotification
 )
 from app.models.tender import TenderStatus
+from app.services.shipment_changes import shipment_changes
+from app.services.exception_detection import ExceptionDetectionService
+from app.services.reference_index import ReferenceIndexService
 
 router = APIRouter()
 
@@ -207,42 +210,39 @@ async def get_available_loads(authorization: str = Header(None)):
     carrier = await get_current_carrier(authorization)
     db = get_database()
 
-    # Get pending tenders for this carrier
-    tenders = await db.tenders.find({
-        "carrier_id": carrier["_id"],
-        "status": TenderStatus.SENT.value
-    }).sort("created_at", -1).to_list(100)
+    # Shipments from the portal read model with a sent tender to this carrier
+    shipments = await db.portal_shipments.find(
+        {"open_tenders.carrier_id": carrier["_id"]}
+    ).to_list(None)
 
-    loads = []
-    for tender in tenders:
-        shipment = await db.shipments.find_one({"_id": tender["shipment_id"]})
-        if not shipment:
-            continue
-
-        # Get origin/destination from stops
-        stops = shipment.get("stops", [])
-        origin = next((s for s in stops if s.get("stop_type") == "pickup"), {})
-        dest = next((s for s in stops if s.get("stop_type") == "delivery"), {})
+    offers = [
+        (tender, shipment)
+        for shipment in shipments
+        for tender in shipment["open_tenders"]
+        if tender["carrier_id"] == carrier["_id"]
+    ]
+    offers.sort(key=lambda offer: offer[0].get("created_at") or datetime.min, reverse=True)
 
-        loads.append(AvailableLoadResponse(
+    return [
+        AvailableLoadResponse(
             id=str(shipment["_id"]),
             shipment_number=shipment.get("shipment_number", ""),
-            origin_city=origin.get("city", ""),
-            origin_state=origin.get("state", ""),
-            destination_city=dest.get("city", ""),
-            destination_state=dest.get("state", ""),
+            origin_city=shipment.get("origin_city", ""),
+            origin_state=shipment.get("origin_state", ""),
+            destination_city=shipment.get("destination_city", ""),
+            destination_state=shipment.get("destination_state", ""),
             pickup_date=shipment.get("pickup_date"),
             delivery_date=shipment.get("delivery_date"),
-            equipment_type=shipment.get("equipment_type", "van"),
+            equipment_type=shipment.get("equipment_type") or "van",
             weight_lbs=shipment.get("weight_lbs"),
             offered_rate=tender.get("offered_rate", 0),
-            tender_id=str(tender["_id"]),
+            tender_id=str(tender["tender_id"]),
             tender_status=tender.get("status", "sent"),
-            posted_at=tender.get("created_at", utc_now()),
+            posted_at=tender.get("created_at") or utc_now(),
             expires_at=tender.get("expires_at"),
-        ))
-
-    return loads
+        )
+        for tender, shipment in offers[:100]
+    ]
 
 
 # ============================================================================
@@ -297,6 +297,7 @@ async def respond_to_tender(data: TenderResponseRequest, authorization: str = He
                 "$push": {"negotiation_history": negotiation_event},
             }
         )
+        await shipment_changes.tender_changed(data.tender_id)
 
         # Update shipment with carrier
         await db.shipments.update_one(
@@ -309,16 +310,20 @@ async def respond_to_tender(data: TenderResponseRequest, authorization: str = He
                 }
             }
         )
+        await shipment_changes.shipment_changed(tender["shipment_id"])
 
         # Decline other tenders for this shipment
+        sibling_filter = {
+            "shipment_id": tender["shipment_id"],
+            "_id": {"$ne": ObjectId(data.tender_id)},
+            "status": {"$in": [TenderStatus.SENT.value, TenderStatus.COUNTER_OFFERED.value]},
+        }
+        cancelled_ids = await db.tenders.distinct("_id", sibling_filter)
         await db.tenders.update_many(
-            {
-                "shipment_id": tender["shipment_id"],
-                "_id": {"$ne": ObjectId(data.tender_id)},
-                "status": {"$in": [TenderStatus.SENT.value, TenderStatus.COUNTER_OFFERED.value]},
-            },
+            sibling_filter,
             {"$set": {"status": TenderStatus.CANCELLED.value, "updated_at": now}}
         )
+        await shipment_changes.tenders_changed(cancelled_ids)
 
         # Auto-remove load board postings for this shipment
         await db.loadboard_postings.update_many(
@@ -357,6 +362,7 @@ async def respond_to_tender(data: TenderResponseRequest, authorization: str = He
                 "$push": {"negotiation_history": negotiation_event},
             }
         )
+        await shipment_changes.tender_changed(data.tender_id)
 
         return {"status": "declined", "message": "Tender declined"}
 
@@ -458,6 +464,7 @@ async def carrier_accept_tender(tender_id: str, data: CarrierAcceptTenderRequest
             "$push": {"negotiation_history": negotiation_event},
         }
     )
+    await shipment_changes.tender_changed(tender_id)
 
     # Update shipment
     await db.shipments.update_one(
@@ -468,16 +475,20 @@ async def carrier_accept_tender(tender_id: str, data: CarrierAcceptTenderRequest
             "updated_at": now,
         }}
     )
+    await shipment_changes.shipment_changed(tender["shipment_id"])
 
     # Cancel other tenders
+    sibling_filter = {
+        "shipment_id": tender["shipment_id"],
+        "_id": {"$ne": ObjectId(tender_id)},
+        "status": {"$in": [TenderStatus.SENT.value, TenderStatus.COUNTER_OFFERED.value]},
+    }
+    cancelled_ids = await db.tenders.distinct("_id", sibling_filter)
     await db.tenders.update_many(
-        {
-            "shipment_id": tender["shipment_id"],
-            "_id": {"$ne": ObjectId(tender_id)},
-            "status": {"$in": [TenderStatus.SENT.value, TenderStatus.COUNTER_OFFERED.value]},
-        },
+        sibling_filter,
         {"$set": {"status": TenderStatus.CANCELLED.value, "updated_at": now}}
     )
+    await shipment_changes.tenders_changed(cancelled_ids)
 
     # Auto-remove load board postings
     await db.loadboard_postings.update_many(
@@ -530,6 +541,7 @@ async def carrier_decline_tender(tender_id: str, data: CarrierDeclineTenderReque
             "$push": {"negotiation_history": negotiation_event},
         }
     )
+    await shipment_changes.tender_changed(tender_id)
 
     return {"status": "declined", "message": "Tender declined"}
 
@@ -602,6 +614,7 @@ async def carrier_counter_offer(tender_id: str, data: CarrierCounterOfferRequest
                 "$push": {"negotiation_history": {"$each": [negotiation_event, accept_event]}},
             }
         )
+        await shipment_changes.tender_changed(tender_id)
 
         # Update shipment
         await db.shipments.update_one(
@@ -612,16 +625,20 @@ async def carrier_counter_offer(tender_id: str, data: CarrierCounterOfferRequest
                 "updated_at": now,
             }}
         )
+        await shipment_changes.shipment_changed(tender["shipment_id"])
 
         # Cancel other tenders
+        sibling_filter = {
+            "shipment_id": tender["shipment_id"],
+            "_id": {"$ne": ObjectId(tender_id)},
+            "status": {"$in": [TenderStatus.SENT.value, TenderStatus.COUNTER_OFFERED.value]},
+        }
+        cancelled_ids = await db.tenders.distinct("_id", sibling_filter)
         await db.tenders.update_many(
-            {
-                "shipment_id": tender["shipment_id"],
-                "_id": {"$ne": ObjectId(tender_id)},
-                "status": {"$in": [TenderStatus.SENT.value, TenderStatus.COUNTER_OFFERED.value]},
-            },
+            sibling_filter,
             {"$set": {"status": TenderStatus.CANCELLED.value, "updated_at": now}}
         )
+        await shipment_changes.tenders_changed(cancelled_ids)
 
         # Auto-remove load board postings
         await db.loadboard_postings.update_many(
@@ -648,6 +665,7 @@ async def carrier_counter_offer(tender_id: str, data: CarrierCounterOfferRequest
                 "$push": {"negotiation_history": negotiation_event},
             }
         )
+        await shipment_changes.tender_changed(tender_id)
 
         # Also save to counter_offers collection for tracking
         await db.counter_offers.insert_one({
@@ -707,6 +725,7 @@ async def upload_carrier_document(data: DocumentUploadRequest, authorization: st
     }
 
     await db.documents.insert_one(doc)
+    await ExceptionDetectionService.apply_shipment(doc["shipment_id"])
 
     # Create notification for broker
     await db.portal_notifications.insert_one({
@@ -762,31 +781,26 @@ async def get_my_loads(
     if status:
         query["status"] = status
 
-    shipments = await db.shipments.find(query).sort("pickup_date", 1).to_list(100)
+    shipments = await db.portal_shipments.find(query).sort("pickup_date", 1).to_list(100)
 
-    loads = []
-    for shipment in shipments:
-        stops = shipment.get("stops", [])
-        origin = next((s for s in stops if s.get("stop_type") == "pickup"), {})
-        dest = next((s for s in stops if s.get("stop_type") == "delivery"), {})
-
-        loads.append(MyLoadResponse(
+    return [
+        MyLoadResponse(
             id=str(shipment["_id"]),
             shipment_number=shipment.get("shipment_number", ""),
-            status=shipment.get("status", "booked"),
-            origin_city=origin.get("city", ""),
-            origin_state=origin.get("state", ""),
-            destination_city=dest.get("city", ""),
-            destination_state=dest.get("state", ""),
+            status=shipment.get("status") or "booked",
+            origin_city=shipment.get("origin_city", ""),
+            origin_state=shipment.get("origin_state", ""),
+            destination_city=shipment.get("destination_city", ""),
+            destination_state=shipment.get("destination_state", ""),
             pickup_date=shipment.get("pickup_date"),
             delivery_date=shipment.get("delivery_date"),
-            equipment_type=shipment.get("equipment_type", "van"),
+            equipment_type=shipment.get("equipment_type") or "van",
             weight_lbs=shipment.get("weight_lbs"),
-            rate=shipment.get("carrier_cost", 0),
-            booked_at=shipment.get("created_at", utc_now()),
-        ))
-
-    return loads
+            rate=shipment.get("carrier_cost") or 0,
+            booked_at=shipment.get("created_at") or utc_now(),
+        )
+        for shipment in shipments
+    ]
 
 
 @router.get("/loads/{shipment_id}")
@@ -897,6 +911,7 @@ async def update_tracking(data: TrackingUpdateRequest, authorization: str = Head
         {"_id": ObjectId(data.shipment_id)},
         {"$set": update}
     )
+    await shipment_changes.shipment_changed(data.shipment_id)
 
     return {"status": "updated", "event_type": data.event_type}
 
@@ -1626,6 +1641,7 @@ async def approve_onboarding(onboarding_id: str, data: ApproveOnboardingRequest
     )
 
     await db.carriers.insert_one(carrier.model_dump_mongo())
+    await ReferenceIndexService.apply_carrier(carrier.id)
 
     await db.carrier_onboardings.update_one(
         {"_id": ObjectId(onboarding_id)},
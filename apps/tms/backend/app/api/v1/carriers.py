@@ -5,6 +5,8 @@ from bson import ObjectId
 from app.database import get_database
 from app.models.carrier import Carrier, CarrierStatus, EquipmentType
 from app.schemas.carrier import CarrierCreate, CarrierUpdate, CarrierResponse
+from app.services.exception_detection import ExceptionDetectionService
+from app.services.reference_index import ReferenceIndexService
 
 router = APIRouter()
 
@@ -92,6 +94,7 @@ async def create_carrier(data: CarrierCreate):
 
     carrier = Carrier(**data.model_dump())
     await db.carriers.insert_one(carrier.model_dump_mongo())
+    await ReferenceIndexService.apply_carrier(carrier.id)
 
     return carrier_to_response(carrier)
 
@@ -125,6 +128,8 @@ async def update_carrier(carrier_id: str, data: CarrierUpdate):
         {"_id": ObjectId(carrier_id)},
         {"$set": carrier.model_dump_mongo()}
     )
+    await ExceptionDetectionService.apply_carrier(carrier_id)
+    await ReferenceIndexService.apply_carrier(carrier_id)
 
     return carrier_to_response(carrier)
 
@@ -137,6 +142,7 @@ async def delete_carrier(carrier_id: str):
     result = await db.carriers.delete_one({"_id": ObjectId(carrier_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Carrier not found")
+    await ReferenceIndexService.apply_carrier(carrier_id)
 
     return {"success": True}
 
@@ -9,6 +9,7 @@ from bson import ObjectId
 from app.database import get_database
 from app.models.base import utc_now
 from app.models.portal import CustomerPortalSession, PortalNotification
+from app.services.portal_read_model import eta_confidence
 
 router = APIRouter()
 
@@ -272,31 +273,26 @@ async def get_customer_shipments(
             {"bol_number": {"$regex": search, "$options": "i"}},
         ]
 
-    shipments = await db.shipments.find(query).sort("created_at", -1).skip(offset).limit(limit).to_list(limit)
+    shipments = await db.portal_shipments.find(query).sort("created_at", -1).skip(offset).limit(limit).to_list(limit)
 
-    result = []
-    for s in shipments:
-        stops = s.get("stops", [])
-        origin = next((st for st in stops if st.get("stop_type") == "pickup"), {})
-        dest = next((st for st in stops if st.get("stop_type") == "delivery"), {})
-
-        result.append(CustomerShipmentResponse(
+    return [
+        CustomerShipmentResponse(
             id=str(s["_id"]),
             shipment_number=s.get("shipment_number", ""),
-            status=s.get("status", "booked"),
-            origin_city=origin.get("city", ""),
-            origin_state=origin.get("state", ""),
-            destination_city=dest.get("city", ""),
-            destination_state=dest.get("state", ""),
+            status=s.get("status") or "booked",
+            origin_city=s.get("origin_city", ""),
+            origin_state=s.get("origin_state", ""),
+            destination_city=s.get("destination_city", ""),
+            destination_state=s.get("destination_state", ""),
             pickup_date=s.get("pickup_date"),
             delivery_date=s.get("delivery_date"),
-            equipment_type=s.get("equipment_type", "van"),
+            equipment_type=s.get("equipment_type") or "van",
             last_location=s.get("last_known_location"),
             eta=s.get("eta"),
-            created_at=s.get("created_at", utc_now()),
-        ))
-
-    return result
+            created_at=s.get("created_at") or utc_now(),
+        )
+        for s in shipments
+    ]
 
 
 @router.get("/shipments/{shipment_id}")
@@ -722,68 +718,43 @@ async def get_customer_tracking_dashboard(authorization: str = Header(None)):
     db = get_database()
     customer_id = customer["_id"]
 
-    # Get all active shipments
+    # Active shipments from the portal read model, latest event included
     active_statuses = ["booked", "pending_pickup", "in_transit", "out_for_delivery"]
-    active_shipments = await db.shipments.find({
+    active_shipments = await db.portal_shipments.find({
         "customer_id": customer_id,
         "status": {"$in": active_statuses}
     }).sort("created_at", -1).to_list(100)
 
+    now = utc_now()
     shipment_tracking = []
     for s in active_shipments:
-        stops = s.get("stops", [])
-        origin = next((st for st in stops if st.get("stop_type") == "pickup"), {})
-        dest = next((st for st in stops if st.get("stop_type") == "delivery"), {})
-
-        # Get latest tracking event
-        latest_event = await db.tracking_events.find_one(
-            {"shipment_id": s["_id"]},
-            sort=[("event_timestamp", -1)]
-        )
-
-        # Calculate ETA confidence
-        eta_confidence = None
-        if s.get("eta") and s.get("delivery_date"):
-            # Higher confidence when GPS data is recent
-            last_check = s.get("last_check_call")
-            if last_check:
-                hours_since = (utc_now() - last_check).total_seconds() / 3600
-                if hours_since < 1:
-                    eta_confidence = 0.95
-                elif hours_since < 4:
-                    eta_confidence = 0.80
-                elif hours_since < 8:
-                    eta_confidence = 0.60
-                else:
-                    eta_confidence = 0.40
-
+        latest_event = s.get("latest_event")
         shipment_tracking.append({
             "id": str(s["_id"]),
             "shipment_number": s.get("shipment_number"),
             "status": s.get("status"),
-            "origin_city": origin.get("city", ""),
-            "origin_state": origin.get("state", ""),
-            "destination_city": dest.get("city", ""),
-            "destination_state": dest.get("state", ""),
+            "origin_city": s.get("origin_city", ""),
+            "origin_state": s.get("origin_state", ""),
+            "destination_city": s.get("destination_city", ""),
+            "destination_state": s.get("destination_state", ""),
             "pickup_date": s.get("pickup_date"),
             "delivery_date": s.get("delivery_date"),
             "eta": s.get("eta"),
-            "eta_confidence": eta_confidence,
+            "eta_confidence": eta_confidence(s, now),
             "last_location": s.get("last_known_location"),
             "last_update": s.get("last_check_call"),
             "latest_event": {
                 "event_type": latest_event.get("event_type"),
-                "timestamp": latest_event.get("event_timestamp"),
-                "location": f"{latest_event.get('location_city', '')}, {latest_event.get('location_state', '')}".strip(", "),
+                "timestamp": latest_event.get("timestamp"),
+                "location": latest_event.get("location"),
             } if latest_event else None,
             "latitude": latest_event.get("latitude") if latest_event else None,
             "longitude": latest_event.get("longitude") if latest_event else None,
         })
 
     # Get recently delivered (last 7 days)
-    from datetime import timedelta
-    seven_days_ago = utc_now() - timedelta(days=7)
-    recent_delivered = await db.shipments.find({
+    seven_days_ago = now - timedelta(days=7)
+    recent_delivered = await db.portal_shipments.find({
         "customer_id": customer_id,
         "status": "delivered",
         "actual_delivery_date": {"$gte": seven_days_ago},
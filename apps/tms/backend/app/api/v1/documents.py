@@ -4,13 +4,14 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Background
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from bson import ObjectId
-import aiofiles
 import os
-import uuid
 
 from app.database import get_database
 from app.models.document import Document, DocumentType, ExtractionStatus, ExtractedDocumentField
+from app.services.exception_detection import ExceptionDetectionService
 from app.services.document_processing import get_document_processor
+from app.services.document_queue import document_queue
+from app.services.document_storage import DocumentStorage
 from app.services.document_classification import (
     classify_document as classify_by_pattern,
     get_workflow_routing,
@@ -19,9 +20,6 @@ from app.services.document_classification import (
 
 router = APIRouter()
 
-UPLOAD_DIR = "/app/uploads"
-
-
 class ExtractedFieldResponse(BaseModel):
     field_name: str
     value: Optional[str] = None
@@ -36,6 +34,7 @@ class DocumentResponse(BaseModel):
     original_filename: str
     mime_type: str
     size_bytes: int
+    content_hash: Optional[str] = None
     shipment_id: Optional[str] = None
     quote_id: Optional[str] = None
     carrier_id: Optional[str] = None
@@ -85,6 +84,7 @@ def doc_to_response(doc: dict) -> DocumentResponse:
         original_filename=doc["original_filename"],
         mime_type=doc["mime_type"],
         size_bytes=doc["size_bytes"],
+        content_hash=doc.get("content_hash"),
         shipment_id=str(doc["shipment_id"]) if doc.get("shipment_id") else None,
         quote_id=str(doc["quote_id"]) if doc.get("quote_id") else None,
         carrier_id=str(doc["carrier_id"]) if doc.get("carrier_id") else None,
@@ -156,6 +156,12 @@ async def list_pending_review():
     return [doc_to_response(d) for d in documents]
 
 
+@router.get("/processing-queue")
+async def get_processing_queue_stats():
+    """Document AI queue depth, recent latency and provider load."""
+    return await document_queue.stats()
+
+
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(document_id: str):
     """Get a document by ID."""
@@ -170,7 +176,7 @@ async def get_document(document_id: str):
 
 @router.get("/{document_id}/download")
 async def download_document(document_id: str):
-    """Download the actual document file."""
+    """Download the actual document file. Supports ``Range`` requests."""
     db = get_database()
 
     doc = await db.documents.find_one({"_id": ObjectId(document_id)})
@@ -181,16 +187,18 @@ async def download_document(document_id: str):
     if not os.path.exists(filepath):
         raise HTTPException(status_code=404, detail="File not found on disk")
 
+    # Stored content never changes, so its hash is a strong validator
+    headers = {"ETag": f'"{doc["content_hash"]}"'} if doc.get("content_hash") else None
     return FileResponse(
         filepath,
         filename=doc["original_filename"],
         media_type=doc["mime_type"],
+        headers=headers,
     )
 
 
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     document_type: DocumentType = Form(...),
     shipment_id: Optional[str] = Form(None),
@@ -203,18 +211,10 @@ async def upload_document(
     """Upload a document and optionally process it with AI."""
     db = get_database()
 
-    # Generate unique filename
+    # Stream the file into content-addressed storage
+    stored = await DocumentStorage.save_upload(file)
     ext = os.path.splitext(file.filename)[1] if file.filename else ""
-    filename = f"{uuid.uuid4()}{ext}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-
-    # Ensure upload directory exists
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-    # Save file
-    async with aiofiles.open(filepath, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    filename = f"{stored.content_hash}{ext}"
 
     # Auto-classify document by filename if type is "other"
     actual_document_type = document_type.value
@@ -244,9 +244,10 @@ async def upload_document(
         "filename": filename,
         "original_filename": file.filename or "unknown",
         "mime_type": file.content_type or "application/octet-stream",
-        "size_bytes": len(content),
-        "storage_path": filepath,
+        "size_bytes": stored.size_bytes,
+        "storage_path": stored.path,
         "storage_provider": "local",
+        "content_hash": stored.content_hash,
         "shipment_id": ObjectId(shipment_id) if shipment_id else None,
         "carrier_id": ObjectId(carrier_id) if carrier_id else None,
         "customer_id": ObjectId(customer_id) if customer_id else None,
@@ -263,25 +264,18 @@ async def upload_document(
 
     result = await db.documents.insert_one(doc_data)
     doc_data["_id"] = result.inserted_id
+    if doc_data.get("shipment_id"):
+        await ExceptionDetectionService.apply_shipment(doc_data["shipment_id"])
 
     # Queue AI processing in background
     if auto_process:
-        background_tasks.add_task(process_document_background, str(result.inserted_id))
+        await document_queue.enqueue(str(result.inserted_id), source=source)
 
     return doc_to_response(doc_data)
 
 
-async def process_document_background(document_id: str):
-    """Background task to process a document with AI."""
-    try:
-        processor = get_document_processor()
-        await processor.process_document(document_id)
-    except Exception as e:
-        print(f"Error processing document {document_id}: {e}")
-
-
 @router.post("/{document_id}/process", response_model=DocumentResponse)
-async def process_document(document_id: str, background_tasks: BackgroundTasks):
+async def process_document(document_id: str):
     """Manually trigger AI processing for a document."""
     db = get_database()
 
@@ -289,14 +283,8 @@ async def process_document(document_id: str, background_tasks: BackgroundTasks):
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    # Queue processing
-    background_tasks.add_task(process_document_background, document_id)
-
-    # Update status to pending
-    await db.documents.update_one(
-        {"_id": ObjectId(document_id)},
-        {"$set": {"extraction_status": ExtractionStatus.PENDING.value}}
-    )
+    # Queue processing (marks the document pending)
+    await document_queue.enqueue(document_id, source="manual")
     doc["extraction_status"] = ExtractionStatus.PENDING.value
 
     return doc_to_response(doc)
@@ -367,14 +355,11 @@ async def delete_document(document_id: str):
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    # Delete file
-    try:
-        os.remove(doc["storage_path"])
-    except OSError:
-        pass
-
     await db.documents.delete_one({"_id": ObjectId(document_id)})
 
+    # Delete the file unless another document shares its content
+    await DocumentStorage.release(doc["storage_path"], doc.get("content_hash"))
+
     return {"success": True}
 
 
@@ -744,7 +729,6 @@ async def get_classification_types():
 
 @router.post("/batch-upload")
 async def batch_upload_documents(
-    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     document_type: DocumentType = Form(DocumentType.OTHER),
     shipment_id: Optional[str] = Form(None),
@@ -753,26 +737,22 @@ async def batch_upload_documents(
 ):
     """Upload multiple documents at once with optional AI classification."""
     db = get_database()
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
 
     results = []
     for file in files:
+        stored = await DocumentStorage.save_upload(file)
         ext = os.path.splitext(file.filename)[1] if file.filename else ""
-        filename = f"{uuid.uuid4()}{ext}"
-        filepath = os.path.join(UPLOAD_DIR, filename)
-
-        async with aiofiles.open(filepath, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        filename = f"{stored.content_hash}{ext}"
 
         doc_data = {
             "document_type": document_type.value,
             "filename": filename,
             "original_filename": file.filename or "unknown",
             "mime_type": file.content_type or "application/octet-stream",
-            "size_bytes": len(content),
-            "storage_path": filepath,
+            "size_bytes": stored.size_bytes,
+            "storage_path": stored.path,
             "storage_provider": "local",
+            "content_hash": stored.content_hash,
             "shipment_id": ObjectId(shipment_id) if shipment_id else None,
             "source": source,
             "extraction_status": "pending" if auto_classify else "skipped",
@@ -786,15 +766,20 @@ async def batch_upload_documents(
         doc_data["_id"] = result.inserted_id
 
         if auto_classify:
-            background_tasks.add_task(process_document_background, str(result.inserted_id))
+            await document_queue.enqueue(str(result.inserted_id), source=source)
 
         results.append({
             "id": str(result.inserted_id),
             "filename": file.filename,
             "status": "uploaded",
             "auto_classify": auto_classify,
+            "deduplicated": stored.deduplicated,
         })
 
+    # Every file is attached to the same shipment; re-evaluate it once
+    if shipment_id and results:
+        await ExceptionDetectionService.apply_shipment(shipment_id)
+
     return {
         "status": "uploaded",
         "total_files": len(results),
@@ -831,17 +816,12 @@ async def upload_shipment_photos(
     if not shipment:
         raise HTTPException(status_code=404, detail="Shipment not found")
 
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
     uploaded_photos = []
 
     for file in files:
+        stored = await DocumentStorage.save_upload(file)
         ext = os.path.splitext(file.filename)[1] if file.filename else ".jpg"
-        filename = f"photo_{uuid.uuid4()}{ext}"
-        filepath = os.path.join(UPLOAD_DIR, filename)
-
-        async with aiofiles.open(filepath, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        filename = f"photo_{stored.content_hash}{ext}"
 
         photo_doc = {
             "_id": ObjectId(),
@@ -850,8 +830,9 @@ async def upload_shipment_photos(
             "filename": filename,
             "original_filename": file.filename or "photo",
             "mime_type": file.content_type or "image/jpeg",
-            "size_bytes": len(content),
-            "storage_path": filepath,
+            "size_bytes": stored.size_bytes,
+            "storage_path": stored.path,
+            "content_hash": stored.content_hash,
             "notes": notes,
             "annotations": [],
             "ai_analysis": None,
@@ -863,7 +844,7 @@ async def upload_shipment_photos(
             "id": str(photo_doc["_id"]),
             "filename": file.filename,
             "category": category,
-            "size_bytes": len(content),
+            "size_bytes": stored.size_bytes,
         })
 
     return {
@@ -982,7 +963,6 @@ class ScanUploadRequest(BaseModel):
 @router.post("/scan-upload")
 async def upload_scanned_document(
     data: ScanUploadRequest,
-    background_tasks: BackgroundTasks,
 ):
     """Upload a document captured via mobile camera/scanner.
 
@@ -1017,14 +997,9 @@ async def upload_scanned_document(
     }
     ext = ext_map.get(mime_type, ".jpg")
 
-    # Generate unique filename
-    filename = f"scan_{uuid.uuid4()}{ext}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
     # Save file
-    async with aiofiles.open(filepath, 'wb') as f:
-        await f.write(image_bytes)
+    stored = await DocumentStorage.save_bytes(image_bytes)
+    filename = f"scan_{stored.content_hash}{ext}"
 
     # Auto-classify by filename if provided
     original_filename = data.filename or f"scan{ext}"
@@ -1053,9 +1028,10 @@ async def upload_scanned_document(
         "filename": filename,
         "original_filename": original_filename,
         "mime_type": mime_type,
-        "size_bytes": len(image_bytes),
-        "storage_path": filepath,
+        "size_bytes": stored.size_bytes,
+        "storage_path": stored.path,
         "storage_provider": "local",
+        "content_hash": stored.content_hash,
         "shipment_id": ObjectId(data.shipment_id) if data.shipment_id else None,
         "carrier_id": ObjectId(data.carrier_id) if data.carrier_id else None,
         "source": data.source,
@@ -1070,16 +1046,18 @@ async def upload_scanned_document(
 
     result = await db.documents.insert_one(doc_data)
     doc_data["_id"] = result.inserted_id
+    if doc_data.get("shipment_id"):
+        await ExceptionDetectionService.apply_shipment(doc_data["shipment_id"])
 
     # Queue AI processing in background
     if data.auto_process:
-        background_tasks.add_task(process_document_background, str(result.inserted_id))
+        await document_queue.enqueue(str(result.inserted_id), source=data.source)
 
     return doc_to_response(doc_data)
 
 
 @router.post("/{document_id}/ocr")
-async def extract_ocr_text(document_id: str, background_tasks: BackgroundTasks):
+async def extract_ocr_text(document_id: str):
     """Run OCR text extraction on a document."""
     db = get_database()
 
@@ -1088,12 +1066,7 @@ async def extract_ocr_text(document_id: str, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=404, detail="Document not found")
 
     # Queue AI processing
-    background_tasks.add_task(process_document_background, document_id)
-
-    await db.documents.update_one(
-        {"_id": ObjectId(document_id)},
-        {"$set": {"extraction_status": "pending"}}
-    )
+    await document_queue.enqueue(document_id, source="ocr")
 
     return {
         "status": "processing",
@@ -17,6 +17,9 @@ from app.models.tracking import TrackingEvent, TrackingEventType
 from app.models.driver import Driver
 from app.models.driver_checkin import DriverCheckin, CheckinEventType
 from app.models.base import utc_now
+from app.services.live_position_service import LivePositionService
+from app.services.shipment_changes import shipment_changes
+from app.services.portal_read_model import PortalReadModelService
 
 router = APIRouter()
 
@@ -318,6 +321,9 @@ async def update_load_status(shipment_id: str, driver_id: str, data: StatusUpdat
     )
     await db.tracking_events.insert_one(event.model_dump_mongo())
 
+    # After the event, so the portal read model shows it as the latest
+    await shipment_changes.shipment_changed(shipment.id)
+
     return {"success": True, "new_status": new_status.value}
 
 
@@ -373,6 +379,18 @@ async def submit_checkin(shipment_id: str, driver_id: str, data: CheckinRequest)
         {"_id": ObjectId(shipment_id)},
         {"$set": update_data}
     )
+    await PortalReadModelService.apply_shipment(shipment.id)
+
+    if location:
+        await LivePositionService.record_position(
+            shipment.id,
+            data.location_lat,
+            data.location_lng,
+            source="driver_app",
+            driver_id=driver.id,
+            carrier_id=shipment.carrier_id,
+            reported_at=now,
+        )
 
     return {"success": True, "checkin_id": str(checkin.id)}
 
@@ -419,6 +437,7 @@ async def upload_pod(shipment_id: str, driver_id: str, data: PODUploadRequest):
         source="driver_app",
     )
     await db.tracking_events.insert_one(event.model_dump_mongo())
+    await PortalReadModelService.apply_shipment(shipment.id)
 
     return {"success": True, "checkin_id": str(checkin.id)}
 
@@ -468,6 +487,7 @@ async def report_exception(shipment_id: str, driver_id: str, data: ExceptionRequ
         is_exception=True,
     )
     await db.tracking_events.insert_one(event.model_dump_mongo())
+    await PortalReadModelService.apply_shipment(shipment.id)
 
     return {"success": True, "checkin_id": str(checkin.id)}
 
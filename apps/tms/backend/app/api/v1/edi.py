@@ -1,16 +1,27 @@
 """EDI API endpoints for managing trading partners and EDI messages."""
 
+import codecs
 from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from bson import ObjectId
 
 from app.database import get_database
 from app.models.edi_message import EDIMessage, EDIMessageType, EDIDirection, EDIMessageStatus
 from app.models.edi_trading_partner import EDITradingPartner, ConnectionType
-from app.services.edi_parser import parse_edi_message, generate_997_acknowledgment, generate_edi_210, generate_edi_990
+from app.services.edi_parser import (
+    InterchangeReader,
+    TransactionSet,
+    parse_edi_message,
+    parse_transaction_set,
+    generate_997_acknowledgment,
+    generate_edi_210,
+    generate_edi_990,
+)
 from app.models.base import utc_now
+from app.models.shipment import lane_fields
+from app.services.shipment_changes import shipment_changes
 
 router = APIRouter()
 
@@ -116,6 +127,16 @@ class EDIMessageResponse(BaseModel):
     trading_partner_name: Optional[str] = None
 
 
+class EDIBulkIngestResponse(BaseModel):
+    """Result of ingesting a multi-transaction interchange."""
+    received: int
+    stored: int
+    parsed: int
+    errors: int
+    by_type: dict[str, int]
+    error_details: list[dict]
+
+
 class EDIParsePreview(BaseModel):
     """Preview parsed EDI content without saving."""
     raw_content: str
@@ -378,6 +399,97 @@ async def receive_edi_message(data: EDIMessageCreate):
     return await message_to_response(doc)
 
 
+_MESSAGE_TYPES = {t.value for t in EDIMessageType}
+
+# Messages per insert_many during bulk ingest
+BULK_INSERT_BATCH_SIZE = 500
+# Error details returned from a bulk ingest (all errors are still counted)
+BULK_MAX_ERROR_DETAILS = 100
+
+
+@router.post("/messages/bulk", response_model=EDIBulkIngestResponse)
+async def bulk_ingest_edi_messages(
+    request: Request,
+    trading_partner_id: Optional[str] = None,
+    direction: EDIDirection = EDIDirection.INBOUND,
+):
+    """Ingest a full interchange (any number of ST/SE transaction sets).
+
+    The raw X12 text is sent as the request body and parsed while it streams
+    in; separators are read from the ISA header (falling back to the trading
+    partner's settings). Each transaction set is stored as its own EDI
+    message, inserted in batches.
+    """
+    db = get_database()
+
+    element_sep = "*"
+    segment_term = "~"
+    if trading_partner_id and not ObjectId.is_valid(trading_partner_id):
+        raise HTTPException(status_code=400, detail="Invalid trading partner ID")
+    partner_oid = ObjectId(trading_partner_id) if trading_partner_id else None
+    if partner_oid:
+        partner = await db.edi_trading_partners.find_one({"_id": partner_oid})
+        if partner:
+            element_sep = partner.get("element_separator", "*")
+            segment_term = partner.get("segment_terminator", "~")
+
+    reader = InterchangeReader(default_element_separator=element_sep, default_segment_terminator=segment_term)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    result = {"received": 0, "stored": 0, "parsed": 0, "errors": 0, "by_type": {}, "error_details": []}
+    batch: list[dict] = []
+
+    async def flush():
+        if batch:
+            await db.edi_messages.insert_many(batch, ordered=False)
+            result["stored"] += len(batch)
+            batch.clear()
+
+    def add(ts: TransactionSet):
+        result["received"] += 1
+        parsed = parse_transaction_set(ts)
+        detected_type = parsed.get("transaction_type")
+        envelope = ts.envelope
+        if "error" in parsed:
+            result["errors"] += 1
+            if len(result["error_details"]) < BULK_MAX_ERROR_DETAILS:
+                result["error_details"].append({
+                    "st_control_number": envelope.get("st_control_number"),
+                    "error": parsed["error"],
+                })
+        if detected_type not in _MESSAGE_TYPES:
+            # Unsupported or unidentifiable sets are counted but not stored
+            return
+        result["by_type"][detected_type] = result["by_type"].get(detected_type, 0) + 1
+        if "error" not in parsed:
+            result["parsed"] += 1
+        message = EDIMessage(
+            message_type=EDIMessageType(detected_type),
+            direction=direction,
+            status=EDIMessageStatus.PARSED if "error" not in parsed else EDIMessageStatus.ERROR,
+            raw_content=ts.to_raw(reader.element_separator, reader.segment_terminator),
+            parsed_data=parsed,
+            trading_partner_id=partner_oid,
+            isa_control_number=envelope.get("isa_control_number"),
+            gs_control_number=envelope.get("gs_control_number"),
+            st_control_number=envelope.get("st_control_number"),
+            error_messages=[parsed["error"]] if "error" in parsed else [],
+        )
+        batch.append(message.model_dump_mongo())
+
+    async for chunk in request.stream():
+        for ts in reader.feed(decoder.decode(chunk)):
+            add(ts)
+        if len(batch) >= BULK_INSERT_BATCH_SIZE:
+            await flush()
+    for ts in reader.feed(decoder.decode(b"", final=True)) + reader.close():
+        add(ts)
+    await flush()
+
+    if result["received"] == 0:
+        raise HTTPException(status_code=400, detail="No EDI transaction sets found in request body")
+    return EDIBulkIngestResponse(**result)
+
+
 @router.get("/messages/{message_id}", response_model=EDIMessageResponse)
 async def get_edi_message(message_id: str):
     """Get a specific EDI message."""
@@ -849,6 +961,7 @@ async def generate_edi_990(tender_id: str, data: EDI990GenerateRequest = EDI990G
         {"_id": ObjectId(tender_id)},
         {"$set": tender_update},
     )
+    await shipment_changes.tender_changed(tender_id)
 
     doc = await db.edi_messages.find_one({"_id": message.id})
     return await message_to_response(doc)
@@ -1146,6 +1259,7 @@ async def accept_204_tender(tender_id: str, data: EDI204AcceptRequest = EDI204Ac
         "customer_price": price_cents, "carrier_cost": 0,
         "internal_notes": f"Created from EDI 204. {data.notes or ''}",
         "created_at": utc_now(), "updated_at": utc_now(),
+        **lane_fields(stops),
     }
     if tender.get("pickup_date"):
         try:
@@ -1159,6 +1273,7 @@ async def accept_204_tender(tender_id: str, data: EDI204AcceptRequest = EDI204Ac
             pass
 
     await db.shipments.insert_one(shipment_doc)
+    await shipment_changes.shipment_changed(shipment_doc["_id"])
     await db.edi_204_tenders.update_one({"_id": ObjectId(tender_id)},
         {"$set": {"status": "accepted", "shipment_id": shipment_doc["_id"],
                   "accepted_at": utc_now(), "updated_at": utc_now()}})
@@ -187,6 +187,7 @@ async def process_inbound_email(db, email_id: str):
         reference_numbers=classification.get("reference_numbers", {}),
         from_email=email.get("from_email", ""),
         subject=email.get("subject", ""),
+        body=email.get("body_text") or email.get("body_html") or "",
     )
 
     # Update the email with classification and matches
@@ -6,6 +6,7 @@ from bson import ObjectId
 from app.database import get_database
 from app.models.invoice import Invoice, InvoiceStatus, InvoicePayment
 from app.schemas.invoice import InvoiceCreate, InvoiceUpdate, InvoiceResponse, InvoicePaymentCreate
+from app.services.exception_detection import ExceptionDetectionService
 from app.services.number_generator import NumberGenerator
 
 router = APIRouter()
@@ -97,6 +98,7 @@ async def create_invoice(data: InvoiceCreate):
     invoice.calculate_totals()
 
     await db.invoices.insert_one(invoice.model_dump_mongo())
+    await ExceptionDetectionService.apply_invoice(invoice.id)
 
     return invoice_to_response(invoice)
 
@@ -134,6 +136,7 @@ async def update_invoice(invoice_id: str, data: InvoiceUpdate):
         {"_id": ObjectId(invoice_id)},
         {"$set": invoice.model_dump_mongo()}
     )
+    await ExceptionDetectionService.apply_invoice(invoice_id)
 
     return invoice_to_response(invoice)
 
@@ -154,6 +157,7 @@ async def send_invoice(invoice_id: str):
         {"_id": ObjectId(invoice_id)},
         {"$set": invoice.model_dump_mongo()}
     )
+    await ExceptionDetectionService.apply_invoice(invoice_id)
 
     return invoice_to_response(invoice)
 
@@ -183,6 +187,7 @@ async def record_payment(invoice_id: str, data: InvoicePaymentCreate):
         {"_id": ObjectId(invoice_id)},
         {"$set": invoice.model_dump_mongo()}
     )
+    await ExceptionDetectionService.apply_invoice(invoice_id)
 
     return invoice_to_response(invoice)
 
@@ -308,5 +313,6 @@ async def create_invoice_from_shipment(shipment_id: str):
     invoice.due_date = invoice.invoice_date + timedelta(days=customer.get("payment_terms", 30))
 
     await db.invoices.insert_one(invoice.model_dump_mongo())
+    await ExceptionDetectionService.apply_invoice(invoice.id)
 
     return invoice_to_response(invoice)
@@ -7,6 +7,7 @@ from app.models.quote_request import QuoteRequest, QuoteRequestStatus
 from app.models.work_item import WorkItem, WorkItemType, WorkItemStatus
 from app.schemas.quote_request import QuoteRequestCreate, QuoteRequestUpdate, QuoteRequestResponse
 from app.services.ai_extraction import AIExtractionService
+from app.services.reference_index import ReferenceIndexService
 
 router = APIRouter()
 
@@ -216,6 +217,7 @@ async def create_quote_from_request(quote_request_id: str):
     )
 
     await db.quotes.insert_one(quote.model_dump_mongo())
+    await ReferenceIndexService.apply_quote(quote.id)
 
     # Update quote request
     quote_request.quote_id = quote.id
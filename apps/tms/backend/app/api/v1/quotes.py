@@ -14,6 +14,8 @@ from app.schemas.quote import (
 )
 from app.services.number_generator import NumberGenerator
 from app.services.ai_extraction import AIExtractionService
+from app.services.shipment_changes import shipment_changes
+from app.services.reference_index import ReferenceIndexService
 
 router = APIRouter()
 
@@ -166,6 +168,7 @@ async def create_quote(data: QuoteCreate):
     quote.calculate_totals()
 
     await db.quotes.insert_one(quote.model_dump_mongo())
+    await ReferenceIndexService.apply_quote(quote.id)
 
     return quote_to_response(quote)
 
@@ -306,6 +309,7 @@ async def book_quote(quote_id: str):
     )
 
     await db.shipments.insert_one(shipment.model_dump_mongo())
+    await shipment_changes.shipment_changed(shipment.id)
 
     # Update quote
     quote.transition_to(QuoteStatus.ACCEPTED)
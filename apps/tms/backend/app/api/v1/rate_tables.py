@@ -9,6 +9,7 @@ from bson import ObjectId
 from app.database import get_database
 from app.models.rate_table import RateTable, LaneRate
 from app.models.base import utc_now
+from app.services.rate_lane_index import RateLaneIndex
 
 router = APIRouter()
 
@@ -253,6 +254,7 @@ async def create_rate_table(data: RateTableCreate):
     )
 
     await db.rate_tables.insert_one(rate_table.model_dump_mongo())
+    RateLaneIndex.invalidate()
     doc = await db.rate_tables.find_one({"_id": rate_table.id})
     return await rate_table_to_response(doc)
 
@@ -300,6 +302,7 @@ async def update_rate_table(table_id: str, data: RateTableUpdate):
         {"_id": ObjectId(table_id)},
         {"$set": update_data},
     )
+    RateLaneIndex.invalidate()
 
     updated = await db.rate_tables.find_one({"_id": ObjectId(table_id)})
     return await rate_table_to_response(updated)
@@ -312,6 +315,7 @@ async def delete_rate_table(table_id: str):
     result = await db.rate_tables.delete_one({"_id": ObjectId(table_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Rate table not found")
+    RateLaneIndex.invalidate()
     return {"status": "deleted", "id": table_id}
 
 
@@ -327,68 +331,15 @@ async def lookup_rate(data: RateLookupRequest):
     Searches active, non-expired rate tables for matching lanes.
     If customer_id is provided, only searches that customer's tables.
     """
-    db = get_database()
-    now = utc_now()
-
-    query: dict = {
-        "is_active": True,
-        "$or": [
-            {"expiry_date": None},
-            {"expiry_date": {"$gte": now}},
-        ],
-        "effective_date": {"$lte": now},
-    }
-    if data.customer_id:
-        query["customer_id"] = ObjectId(data.customer_id)
-
-    cursor = db.rate_tables.find(query)
-    tables = await cursor.to_list(1000)
-
-    results: list[RateLookupResult] = []
-
-    for table in tables:
-        # Look up customer name
-        customer_name = None
-        customer = await db.customers.find_one({"_id": table["customer_id"]})
-        if customer:
-            customer_name = customer.get("name")
-
-        for lane in table.get("lanes", []):
-            # Match origin/dest states
-            if lane["origin_state"].upper() != data.origin_state.upper():
-                continue
-            if lane["dest_state"].upper() != data.dest_state.upper():
-                continue
-            # Match equipment type
-            if lane.get("equipment_type", "van").lower() != data.equipment_type.lower():
-                continue
-            # Match weight range if specified
-            if data.weight_lbs is not None:
-                min_w = lane.get("min_weight")
-                max_w = lane.get("max_weight")
-                if min_w is not None and data.weight_lbs < min_w:
-                    continue
-                if max_w is not None and data.weight_lbs > max_w:
-                    continue
-
-            results.append(RateLookupResult(
-                rate_table_id=str(table["_id"]),
-                rate_table_name=table["name"],
-                customer_id=str(table["customer_id"]),
-                customer_name=customer_name,
-                origin_state=lane["origin_state"],
-                dest_state=lane["dest_state"],
-                equipment_type=lane.get("equipment_type", "van"),
-                rate_per_mile=lane.get("rate_per_mile"),
-                flat_rate=lane.get("flat_rate"),
-                fuel_surcharge_pct=lane.get("fuel_surcharge_pct", 0.0),
-                min_charge=lane.get("min_charge"),
-                effective_date=table["effective_date"],
-                expiry_date=table.get("expiry_date"),
-                notes=lane.get("notes"),
-            ))
-
-    return results
+    index = await RateLaneIndex.get()
+    matches = index.lookup(
+        data.origin_state,
+        data.dest_state,
+        data.equipment_type,
+        weight_lbs=data.weight_lbs,
+        customer_id=data.customer_id,
+    )
+    return [RateLookupResult(**fields) for fields in matches]
 
 
 # ============================================================================
@@ -413,6 +364,7 @@ async def bulk_import_lanes(table_id: str, data: BulkImportRequest):
         {"_id": ObjectId(table_id)},
         {"$set": {"lanes": combined, "updated_at": utc_now()}},
     )
+    RateLaneIndex.invalidate()
 
     updated = await db.rate_tables.find_one({"_id": ObjectId(table_id)})
     return await rate_table_to_response(updated)
@@ -2,9 +2,21 @@
 Unified search endpoint for Expertly TMS.
 
 Searches across shipments, customers, and carriers using MongoDB text
-indexes with relevance scoring and cursor-based pagination.
+indexes with relevance scoring and cursor-based pagination. Collections are
+searched concurrently, each with a single ``$facet`` aggregation that returns
+the page and (on a cache miss) the match count. Results are ordered by
+``(score desc, type, _id)`` so the opaque cursor pages stably across
+collections.
+
+``/search/typeahead`` answers the search box from anchored prefix queries on
+indexed identifiers (shipment numbers, MC/DOT numbers, customer codes).
 """
 
+import asyncio
+import base64
+import json
+import re
+import time
 from typing import Optional, Literal
 
 from bson import ObjectId
@@ -37,6 +49,18 @@ class SearchResponse(BaseModel):
     entity_type: str
 
 
+class TypeaheadItem(BaseModel):
+    id: str
+    type: Literal["shipment", "customer", "carrier"]
+    title: str
+    subtitle: str
+
+
+class TypeaheadResponse(BaseModel):
+    results: list[TypeaheadItem]
+    query: str
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
@@ -82,53 +106,140 @@ def _serialize_doc(doc: dict) -> dict:
     return out
 
 
+
+
+# Match counts are the expensive part of a text search and barely move while
+# someone pages through results, so they are cached per (type, query).
+TOTAL_CACHE_TTL_SECONDS = 60
+TOTAL_CACHE_MAX_ENTRIES = 2048
+_total_cache: dict[tuple[str, str], tuple[float, int]] = {}
+
+
+def _cached_total(entity_type: str, query: str) -> Optional[int]:
+    entry = _total_cache.get((entity_type, query))
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _store_total(entity_type: str, query: str, total: int) -> None:
+    if len(_total_cache) >= TOTAL_CACHE_MAX_ENTRIES:
+        _total_cache.clear()
+    _total_cache[(entity_type, query)] = (time.monotonic() + TOTAL_CACHE_TTL_SECONDS, total)
+
+
+def _encode_cursor(item: SearchResultItem) -> str:
+    raw = json.dumps([item.score, item.type, item.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[tuple[float, str, ObjectId]]:
+    """Decode a cursor into ``(score, type, _id)``; invalid cursors start from the top."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, entity_type, doc_id = json.loads(raw)
+        return float(score), str(entity_type), ObjectId(doc_id)
+    except Exception:
+        return None
+
+
+def _after_cursor(entity_type: str, after: tuple[float, str, ObjectId]) -> dict:
+    """Filter for documents ordered after the cursor in ``(score desc, type, _id)``."""
+    score, cursor_type, doc_id = after
+    if entity_type < cursor_type:
+        return {"score": {"$lt": score}}
+    if entity_type > cursor_type:
+        return {"score": {"$lte": score}}
+    return {"$or": [{"score": {"$lt": score}}, {"score": score, "_id": {"$gt": doc_id}}]}
+
+
 async def _search_collection(
     collection_name: str,
     query: str,
     entity_type: str,
     limit: int,
-    cursor: Optional[str],
+    after: Optional[tuple[float, str, ObjectId]],
 ) -> tuple[list[SearchResultItem], int]:
     """Run a text search on a single collection and return scored results."""
     db = get_database()
     meta = _SEARCHABLE_COLLECTIONS[entity_type]
-    collection = db[collection_name]
 
-    # Build text search filter
-    text_filter: dict = {"$text": {"$search": query}}
-    if cursor:
-        try:
-            text_filter["_id"] = {"$gt": ObjectId(cursor)}
-        except Exception:
-            pass
+    hits: list[dict] = []
+    if after:
+        hits.append({"$match": _after_cursor(entity_type, after)})
+    hits += [{"$sort": {"score": -1, "_id": 1}}, {"$limit": limit}]
+
+    facets: dict = {"hits": hits}
+    total = _cached_total(entity_type, query)
+    if total is None:
+        facets["total"] = [{"$count": "n"}]
+
+    pipeline = [
+        {"$match": {"$text": {"$search": query}}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$facet": facets},
+    ]
+    facet = (await db[collection_name].aggregate(pipeline).to_list(1))[0]
+    if total is None:
+        total = facet["total"][0]["n"] if facet["total"] else 0
+        _store_total(entity_type, query, total)
+
+    results = [
+        SearchResultItem(
+            id=str(doc["_id"]),
+            type=entity_type,  # type: ignore[arg-type]
+            title=_build_title(doc, meta["title_field"]),
+            subtitle=_build_subtitle(doc, meta["subtitle_template"]),
+            score=doc.get("score", 0.0),
+            data=_serialize_doc(doc),
+        )
+        for doc in facet["hits"]
+    ]
+    return results, total
 
-    # Project the text score for relevance ranking
-    projection = {"score": {"$meta": "textScore"}}
 
-    total = await collection.count_documents({"$text": {"$search": query}})
+def _prefix(value: str) -> dict:
+    return {"$regex": f"^{re.escape(value)}"}
 
-    cursor_result = (
-        collection.find(text_filter, projection)
-        .sort([("score", {"$meta": "textScore"})])
-        .limit(limit)
-    )
 
-    results: list[SearchResultItem] = []
-    async for doc in cursor_result:
-        doc_id = str(doc["_id"])
-        serialized = _serialize_doc(doc)
-        results.append(
-            SearchResultItem(
-                id=doc_id,
-                type=entity_type,  # type: ignore[arg-type]
-                title=_build_title(doc, meta["title_field"]),
-                subtitle=_build_subtitle(doc, meta["subtitle_template"]),
-                score=doc.get("score", 0.0),
-                data=serialized,
-            )
+async def _typeahead_collection(entity_type: str, query: str, limit: int) -> list[TypeaheadItem]:
+    """Anchored prefix lookups on indexed identifier fields of one collection."""
+    db = get_database()
+    meta = _SEARCHABLE_COLLECTIONS[entity_type]
+    term = query.strip().upper()
+
+    if entity_type == "shipment":
+        filter_ = {"shipment_number": _prefix(term)}
+        sort_field = "shipment_number"
+        projection = ["shipment_number", "status"]
+    elif entity_type == "customer":
+        filter_ = {"code": _prefix(term)}
+        sort_field = "code"
+        projection = ["name", "code", "city", "state", "status"]
+    else:
+        digits = term.removeprefix("MC").lstrip("-# ")
+        clauses = [{"mc_number": _prefix(term)}]
+        if digits.isdigit():
+            clauses += [{"mc_number": _prefix(f"MC-{digits}")}, {"dot_number": _prefix(digits)}]
+        filter_ = {"$or": clauses}
+        sort_field = None  # each $or branch already walks its index in prefix order
+        projection = ["name", "mc_number", "dot_number"]
+
+    cursor = db[meta["collection"]].find(filter_, projection)
+    if sort_field:
+        cursor = cursor.sort(sort_field, 1)
+    docs = await cursor.limit(limit).to_list(limit)
+    return [
+        TypeaheadItem(
+            id=str(doc["_id"]),
+            type=entity_type,  # type: ignore[arg-type]
+            title=_build_title(doc, meta["title_field"]),
+            subtitle=_build_subtitle(doc, meta["subtitle_template"]),
         )
-
-    return results, total
+        for doc in docs
+    ]
 
 
 # ---------------------------------------------------------------------------
@@ -140,13 +251,14 @@ async def unified_search(
     q: str = Query(..., min_length=1, description="Search query"),
     type: str = Query("all", description="Entity type: shipment, customer, carrier, or all"),
     limit: int = Query(20, ge=1, le=100, description="Max results per page"),
-    cursor: Optional[str] = Query(None, description="Cursor for pagination (last _id)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's next_cursor"),
 ) -> SearchResponse:
     """
     Search across TMS entities using MongoDB text search.
 
     Results are ranked by relevance score. When ``type=all`` the results
-    from all collections are merged and sorted by score.
+    from all collections are merged and sorted by score, and the cursor
+    continues the merged ordering.
     """
     entity_types: list[str]
     if type == "all":
@@ -156,37 +268,56 @@ async def unified_search(
     else:
         return SearchResponse(results=[], total=0, query=q, entity_type=type)
 
-    all_results: list[SearchResultItem] = []
-    total_count = 0
-
-    for et in entity_types:
-        meta = _SEARCHABLE_COLLECTIONS[et]
-        try:
-            results, count = await _search_collection(
-                collection_name=meta["collection"],
+    after = _decode_cursor(cursor)
+    outcomes = await asyncio.gather(
+        *(
+            _search_collection(
+                collection_name=_SEARCHABLE_COLLECTIONS[et]["collection"],
                 query=q,
                 entity_type=et,
                 limit=limit,
-                cursor=cursor if len(entity_types) == 1 else None,
+                after=after,
             )
-            all_results.extend(results)
-            total_count += count
-        except Exception:
-            # Collection may not have text index yet; silently skip.
-            pass
-
-    # Sort merged results by score descending, take top `limit`
-    all_results.sort(key=lambda r: r.score, reverse=True)
-    page = all_results[:limit]
+            for et in entity_types
+        ),
+        return_exceptions=True,
+    )
 
-    next_cursor_value: Optional[str] = None
-    if page:
-        next_cursor_value = page[-1].id
+    all_results: list[SearchResultItem] = []
+    total_count = 0
+    for outcome in outcomes:
+        # Collection may not have text index yet; silently skip.
+        if isinstance(outcome, Exception):
+            continue
+        results, count = outcome
+        all_results.extend(results)
+        total_count += count
+
+    all_results.sort(key=lambda r: (-r.score, r.type, r.id))
+    page = all_results[:limit]
 
     return SearchResponse(
         results=page,
         total=total_count,
-        next_cursor=next_cursor_value if len(page) == limit else None,
+        next_cursor=_encode_cursor(page[-1]) if len(page) == limit else None,
         query=q,
         entity_type=type,
     )
+
+
+@router.get("/typeahead", response_model=TypeaheadResponse)
+async def typeahead(
+    q: str = Query(..., min_length=1, description="Identifier prefix"),
+    limit: int = Query(8, ge=1, le=25, description="Max results per entity type"),
+) -> TypeaheadResponse:
+    """
+    Prefix matches on shipment numbers, carrier MC/DOT numbers and customer codes.
+
+    Every lookup is an anchored, case-sensitive prefix on an indexed field
+    (the query is upper-cased to match stored identifiers), so each is a
+    tight index range scan.
+    """
+    groups = await asyncio.gather(
+        *(_typeahead_collection(et, q, limit) for et in _SEARCHABLE_COLLECTIONS)
+    )
+    return TypeaheadResponse(results=[item for group in groups for item in group], query=q)
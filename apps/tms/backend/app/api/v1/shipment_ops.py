@@ -11,18 +11,31 @@ import csv
 import io
 import json
 import math
+import os
+import tempfile
 import uuid
 import logging
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+import aiofiles
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, UploadFile, File, Form
 from pydantic import BaseModel, Field
 from bson import ObjectId
 
 from app.database import get_database
-from app.models.shipment import Shipment, ShipmentStatus, Stop, StopType
+from app.models.shipment import Shipment, ShipmentStatus, Stop
 from app.models.base import MongoModel, PyObjectId, utc_now
 from app.services.number_generator import NumberGenerator
 from app.services.websocket_manager import manager
+from app.services.shipment_changes import shipment_changes
+from app.services.consolidation import DEFAULT_WINDOW_HOURS, ConsolidationService
+from app.services.shipment_import import (
+    ShipmentImporter,
+    create_import_job,
+    fail_stale_import_jobs,
+    read_import_columns,
+    run_import_job,
+)
+from app.services.route_optimizer import distance_matrix, optimize_many, route_distance
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -138,7 +151,7 @@ COLUMN_MAPPING_HINTS = {
     "origin_zip": ["origin zip", "pickup zip", "ship from zip", "from zip", "o_zip"],
     "origin_address": ["origin address", "pickup address", "ship from address", "from address"],
     "destination_city": ["dest city", "delivery city", "ship to city", "to city", "destination", "consignee city", "d_city"],
-    "destination_state": ["dest state", "delivery state", "ship to state", "to state", "d_state", "consignee state"],
+    "destination_state": ["destination state", "dest state", "delivery state", "ship to state", "to state", "d_state", "consignee state"],
     "destination_zip": ["dest zip", "delivery zip", "ship to zip", "to zip", "d_zip"],
     "destination_address": ["dest address", "delivery address", "ship to address", "to address"],
     "pickup_date": ["pickup date", "ship date", "pickup", "pick up date", "ready date", "pu date"],
@@ -270,6 +283,10 @@ async def preview_bulk_import(
     )
 
 
+IMPORT_FILE_TYPES = ("csv", "tsv", "txt", "xlsx")
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
 class BulkImportRequest(BaseModel):
     rows: list[dict]
     customer_id: str
@@ -278,10 +295,12 @@ class BulkImportRequest(BaseModel):
 
 @router.post("/bulk-import", response_model=BulkImportResult)
 async def bulk_import_shipments(data: BulkImportRequest):
-    """Import multiple shipments from pre-validated data."""
+    """Import multiple shipments from pre-validated data.
+
+    Rows are inserted in chunks, each with one block of shipment numbers
+    and one ``insert_many``. Use ``/bulk-import/file`` for large files.
+    """
     db = get_database()
-    shipment_ids = []
-    errors = []
     customer_oid = ObjectId(data.customer_id)
 
     # Verify customer exists
@@ -289,112 +308,111 @@ async def bulk_import_shipments(data: BulkImportRequest):
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
 
-    for i, row in enumerate(data.rows):
-        try:
-            # Apply column mapping
-            mapped = {}
-            for source_col, target_field in data.column_mapping.items():
-                if source_col in row and row[source_col]:
-                    mapped[target_field] = row[source_col]
-
-            # Build stops
-            stops = []
-            if mapped.get("origin_city"):
-                stops.append(Stop(
-                    stop_number=1,
-                    stop_type=StopType.PICKUP,
-                    address=mapped.get("origin_address", ""),
-                    city=mapped["origin_city"],
-                    state=mapped.get("origin_state", ""),
-                    zip_code=mapped.get("origin_zip", ""),
-                ))
-            if mapped.get("destination_city"):
-                stops.append(Stop(
-                    stop_number=2,
-                    stop_type=StopType.DELIVERY,
-                    address=mapped.get("destination_address", ""),
-                    city=mapped["destination_city"],
-                    state=mapped.get("destination_state", ""),
-                    zip_code=mapped.get("destination_zip", ""),
-                ))
-
-            shipment_number = await NumberGenerator.get_next_shipment_number()
-
-            # Parse numeric fields
-            weight = None
-            if mapped.get("weight_lbs"):
-                try:
-                    weight = int(float(str(mapped["weight_lbs"]).replace(",", "")))
-                except (ValueError, TypeError):
-                    pass
-
-            price = 0
-            if mapped.get("customer_price"):
-                try:
-                    price = int(float(str(mapped["customer_price"]).replace(",", "").replace("$", "")) * 100)
-                except (ValueError, TypeError):
-                    pass
-
-            # Parse dates
-            pickup_date = None
-            if mapped.get("pickup_date"):
-                try:
-                    pickup_date = datetime.fromisoformat(mapped["pickup_date"])
-                except (ValueError, TypeError):
-                    try:
-                        pickup_date = datetime.strptime(mapped["pickup_date"], "%m/%d/%Y")
-                    except (ValueError, TypeError):
-                        pass
-
-            delivery_date = None
-            if mapped.get("delivery_date"):
-                try:
-                    delivery_date = datetime.fromisoformat(mapped["delivery_date"])
-                except (ValueError, TypeError):
-                    try:
-                        delivery_date = datetime.strptime(mapped["delivery_date"], "%m/%d/%Y")
-                    except (ValueError, TypeError):
-                        pass
-
-            shipment = Shipment(
-                shipment_number=shipment_number,
-                customer_id=customer_oid,
-                stops=stops,
-                equipment_type=mapped.get("equipment_type", "van"),
-                weight_lbs=weight,
-                commodity=mapped.get("commodity"),
-                piece_count=int(mapped["piece_count"]) if mapped.get("piece_count") else None,
-                pallet_count=int(mapped["pallet_count"]) if mapped.get("pallet_count") else None,
-                special_requirements=mapped.get("special_requirements"),
-                customer_price=price,
-                pickup_date=pickup_date,
-                delivery_date=delivery_date,
-                bol_number=mapped.get("reference_number"),
-                internal_notes=f"Bulk imported row {i+1}",
-            )
-
-            await db.shipments.insert_one(shipment.model_dump_mongo())
-            shipment_ids.append(str(shipment.id))
+    importer = ShipmentImporter(customer_oid, data.column_mapping, validate=False)
+    await importer.import_rows(data.rows)
 
-        except Exception as e:
-            errors.append({"row": i + 1, "error": str(e)})
-            logger.error(f"Bulk import row {i+1} failed: {e}")
-
-    if shipment_ids:
+    if importer.shipment_ids:
         await manager.broadcast("bulk_import_complete", {
-            "count": len(shipment_ids),
+            "count": len(importer.shipment_ids),
             "customer_id": data.customer_id,
         })
 
     return BulkImportResult(
         total_processed=len(data.rows),
-        successful=len(shipment_ids),
-        failed=len(errors),
-        shipment_ids=shipment_ids,
-        errors=errors,
+        successful=importer.successful,
+        failed=importer.failed,
+        shipment_ids=importer.shipment_ids,
+        errors=importer.errors,
     )
 
 
+@router.post("/bulk-import/file")
+async def bulk_import_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    customer_id: str = Form(...),
+    column_mapping: Optional[str] = Form(None),
+):
+    """Import a CSV/TSV/XLSX file as a background job.
+
+    The upload is spooled to disk and the job id returned immediately; rows
+    are then streamed, validated and inserted in chunks. ``column_mapping``
+    is a JSON object of source column -> shipment field; when omitted the
+    AI column mapping is detected from the header. Poll
+    ``/bulk-import/jobs/{job_id}`` or listen for ``bulk_import_progress``.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+
+    ext = file.filename.lower().split(".")[-1]
+    if ext not in IMPORT_FILE_TYPES:
+        raise HTTPException(status_code=400, detail="Only CSV, TSV and XLSX files supported")
+
+    db = get_database()
+    customer = await db.customers.find_one({"_id": ObjectId(customer_id)})
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+
+    fd, path = tempfile.mkstemp(prefix="shipment-import-", suffix=f".{ext}")
+    os.close(fd)
+    try:
+        async with aiofiles.open(path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                await f.write(chunk)
+
+        if column_mapping:
+            try:
+                mapping = json.loads(column_mapping)
+            except json.JSONDecodeError:
+                mapping = None
+            if not isinstance(mapping, dict) or not all(
+                isinstance(k, str) and isinstance(v, str) for k, v in mapping.items()
+            ):
+                raise HTTPException(
+                    status_code=400, detail="column_mapping must be a JSON object of column names to fields"
+                )
+        else:
+            try:
+                columns = read_import_columns(path, ext)
+            except Exception:
+                raise HTTPException(status_code=400, detail="Could not read file")
+            if not columns:
+                raise HTTPException(status_code=400, detail="No columns found in file")
+            mapping = ai_detect_column_mapping(columns)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    job_id = await create_import_job(customer_id, file.filename, mapping)
+    background_tasks.add_task(run_import_job, job_id, path, ext)
+    return {"job_id": job_id, "status": "pending", "column_mapping": mapping}
+
+
+@router.get("/bulk-import/jobs/{job_id}")
+async def get_bulk_import_job(job_id: str):
+    """Progress and result of a bulk import job."""
+    db = get_database()
+    await fail_stale_import_jobs()
+    job = await db.import_jobs.find_one({"_id": ObjectId(job_id)})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return {
+        "id": str(job["_id"]),
+        "status": job["status"],
+        "customer_id": str(job["customer_id"]),
+        "filename": job.get("filename"),
+        "column_mapping": job.get("column_mapping", {}),
+        "processed": job.get("processed", 0),
+        "successful": job.get("successful", 0),
+        "failed": job.get("failed", 0),
+        "errors": job.get("errors", []),
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "completed_at": job.get("completed_at"),
+    }
+
+
 @router.get("/import-template")
 async def get_import_template():
     """Get CSV template for bulk import."""
@@ -594,6 +612,7 @@ async def split_shipment(shipment_id: str, data: SplitRequest):
                 customer_notes=parent_shipment.customer_notes,
             )
             await db.shipments.insert_one(child.model_dump_mongo())
+            await shipment_changes.shipment_changed(child.id)
             child_shipments.append(child)
     else:
         # Auto split by weight
@@ -626,6 +645,7 @@ async def split_shipment(shipment_id: str, data: SplitRequest):
                 customer_notes=parent_shipment.customer_notes,
             )
             await db.shipments.insert_one(child.model_dump_mongo())
+            await shipment_changes.shipment_changed(child.id)
             child_shipments.append(child)
 
     # Store parent-child relationship
@@ -639,6 +659,7 @@ async def split_shipment(shipment_id: str, data: SplitRequest):
             "updated_at": utc_now(),
         }}
     )
+    await shipment_changes.shipment_changed(shipment_id)
 
     # Store parent reference on children
     for child in child_shipments:
@@ -742,6 +763,7 @@ async def consolidate_shipments(data: ConsolidateRequest):
     )
 
     await db.shipments.insert_one(consolidated.model_dump_mongo())
+    await shipment_changes.shipment_changed(consolidated.id)
 
     # Mark originals as consolidated
     for s in shipments:
@@ -754,6 +776,7 @@ async def consolidate_shipments(data: ConsolidateRequest):
                 "updated_at": utc_now(),
             }}
         )
+        await shipment_changes.shipment_changed(s.id)
 
     return {
         "status": "consolidated",
@@ -767,75 +790,19 @@ async def consolidate_shipments(data: ConsolidateRequest):
 
 
 @router.get("/consolidation-suggestions")
-async def get_consolidation_suggestions():
-    """AI suggests LTL consolidation opportunities based on compatible lanes/dates."""
-    db = get_database()
-
-    # Get booked shipments that could be consolidated
-    cursor = db.shipments.find({
-        "status": "booked",
-        "carrier_id": None,  # Only unassigned
-    }).sort("pickup_date", 1)
-    shipments = await cursor.to_list(500)
+async def get_consolidation_suggestions(
+    window_hours: float = Query(DEFAULT_WINDOW_HOURS, gt=0, le=168),
+    proximity_miles: float = Query(0, ge=0, le=250),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """AI suggests LTL consolidation opportunities based on compatible lanes/dates.
 
-    if len(shipments) < 2:
-        return {"suggestions": []}
-
-    # Group by lane (origin state -> destination state) and date proximity
-    lane_groups: dict = {}
-    for s in shipments:
-        stops = s.get("stops", [])
-        if len(stops) < 2:
-            continue
-        origin = stops[0]
-        dest = stops[-1]
-        lane_key = f"{origin.get('state', '')}_{dest.get('state', '')}"
-
-        if lane_key not in lane_groups:
-            lane_groups[lane_key] = []
-        lane_groups[lane_key].append(s)
-
-    suggestions = []
-    for lane_key, group in lane_groups.items():
-        if len(group) < 2:
-            continue
-
-        # Check date compatibility (within 2 days)
-        compatible = []
-        for i, s1 in enumerate(group):
-            for s2 in group[i+1:]:
-                pd1 = s1.get("pickup_date")
-                pd2 = s2.get("pickup_date")
-                if pd1 and pd2:
-                    diff = abs((pd1 - pd2).total_seconds()) / 3600
-                    if diff <= 48:  # Within 2 days
-                        if s1 not in compatible:
-                            compatible.append(s1)
-                        if s2 not in compatible:
-                            compatible.append(s2)
-
-        if len(compatible) >= 2:
-            total_weight = sum(s.get("weight_lbs", 0) or 0 for s in compatible)
-            total_price = sum(s.get("customer_price", 0) or 0 for s in compatible)
-            estimated_savings = int(total_price * 0.15)  # ~15% savings from consolidation
-
-            origin_state, dest_state = lane_key.split("_")
-            suggestions.append({
-                "lane": f"{origin_state} -> {dest_state}",
-                "shipment_count": len(compatible),
-                "shipment_ids": [str(s["_id"]) for s in compatible],
-                "shipment_numbers": [s.get("shipment_number", "") for s in compatible],
-                "total_weight_lbs": total_weight,
-                "total_revenue": total_price,
-                "estimated_savings": estimated_savings,
-                "compatible_dates": True,
-                "utilization_percent": min(round(total_weight / 44000 * 100, 1), 100) if total_weight else 0,
-            })
-
-    # Sort by potential savings
-    suggestions.sort(key=lambda x: x["estimated_savings"], reverse=True)
-
-    return {"suggestions": suggestions[:20]}
+    Covers every unassigned booked shipment. Loads match on origin and
+    destination state, or with ``proximity_miles`` on stop coordinates, and
+    each suggestion fits one truck of the loads' equipment type.
+    """
+    suggestions = await ConsolidationService.suggestions(window_hours, proximity_miles, limit)
+    return {"suggestions": suggestions}
 
 
 # ============================================================================
@@ -1025,6 +992,7 @@ async def book_from_template(template_id: str):
     )
 
     await db.shipments.insert_one(shipment.model_dump_mongo())
+    await shipment_changes.shipment_changed(shipment.id)
 
     # Update template stats
     await db.load_templates.update_one(
@@ -1390,6 +1358,9 @@ class StopCoordinate(BaseModel):
     stop_type: Optional[str] = None
 
 
+MAX_ROUTE_BATCH = 500
+
+
 class RouteOptimizeRequest(BaseModel):
     stops: list[StopCoordinate]
     optimize_for: str = "distance"  # distance, time
@@ -1397,65 +1368,27 @@ class RouteOptimizeRequest(BaseModel):
     fixed_last: bool = True   # Keep last stop fixed (destination)
 
 
-@router.post("/optimize-route")
-async def optimize_route(data: RouteOptimizeRequest):
-    """Calculate optimal route for multi-stop loads."""
-    if len(data.stops) < 2:
-        raise HTTPException(status_code=400, detail="Need at least 2 stops")
+class RouteOptimizeBatchRequest(BaseModel):
+    routes: list[RouteOptimizeRequest] = Field(..., max_length=MAX_ROUTE_BATCH)
 
-    stops = data.stops
 
-    if len(stops) <= 3:
-        # For 2-3 stops, compute direct route
-        optimized_order = list(range(len(stops)))
-    else:
-        # Simple nearest-neighbor heuristic for route optimization
-        # Keep first and last fixed if specified
-        fixed_start = 0 if data.fixed_first else None
-        fixed_end = len(stops) - 1 if data.fixed_last else None
-
-        # Get intermediate stops to optimize
-        intermediate_indices = [
-            i for i in range(len(stops))
-            if i != fixed_start and i != fixed_end
-        ]
+async def _current_fuel_price(db) -> float:
+    """Latest DOE diesel price, falling back to $4.00."""
+    try:
+        latest_doe = await db.doe_fuel_prices.find_one(sort=[("date", -1)])
+        if latest_doe:
+            return latest_doe.get("price", 4.00)
+    except Exception:
+        pass
+    return 4.00
 
-        # Nearest neighbor algorithm
-        if fixed_start is not None:
-            current = fixed_start
-            optimized_order = [current]
-        else:
-            current = 0
-            optimized_order = [current]
-
-        remaining = set(intermediate_indices)
-        while remaining:
-            nearest = min(
-                remaining,
-                key=lambda idx: _haversine_distance(
-                    stops[current].latitude, stops[current].longitude,
-                    stops[idx].latitude, stops[idx].longitude,
-                ),
-            )
-            optimized_order.append(nearest)
-            remaining.remove(nearest)
-            current = nearest
-
-        if fixed_end is not None and fixed_end not in optimized_order:
-            optimized_order.append(fixed_end)
-
-    # Calculate distances for both original and optimized routes
-    def calc_route_distance(order: list[int]) -> float:
-        total = 0.0
-        for i in range(len(order) - 1):
-            s1 = stops[order[i]]
-            s2 = stops[order[i+1]]
-            total += _haversine_distance(s1.latitude, s1.longitude, s2.latitude, s2.longitude)
-        return total
-
-    original_order = list(range(len(stops)))
-    original_distance = calc_route_distance(original_order)
-    optimized_distance = calc_route_distance(optimized_order)
+
+def _route_result(stops: list[StopCoordinate], optimized_order: list[int], fuel_price: float) -> dict:
+    """Distances, legs and fuel estimate for an optimized stop order."""
+    matrix = distance_matrix([(s.latitude, s.longitude) for s in stops])
+
+    original_distance = route_distance(matrix, list(range(len(stops))))
+    optimized_distance = route_distance(matrix, optimized_order)
 
     transit_hours = _estimate_transit_hours(optimized_distance)
     deadhead_saved = max(0, original_distance - optimized_distance)
@@ -1465,7 +1398,7 @@ async def optimize_route(data: RouteOptimizeRequest):
     for i in range(len(optimized_order) - 1):
         s1 = stops[optimized_order[i]]
         s2 = stops[optimized_order[i+1]]
-        leg_distance = _haversine_distance(s1.latitude, s1.longitude, s2.latitude, s2.longitude)
+        leg_distance = matrix[optimized_order[i]][optimized_order[i+1]]
         legs.append({
             "from_index": optimized_order[i],
             "to_index": optimized_order[i+1],
@@ -1476,13 +1409,6 @@ async def optimize_route(data: RouteOptimizeRequest):
         })
 
     # Estimate fuel cost (avg 6.5 mpg, using DOE price)
-    fuel_price = 4.00
-    try:
-        latest_doe = await db.doe_fuel_prices.find_one(sort=[("date", -1)])
-        if latest_doe:
-            fuel_price = latest_doe.get("price", 4.00)
-    except Exception:
-        pass
     estimated_fuel_gallons = round(optimized_distance / 6.5, 1)
     estimated_fuel_cost = round(estimated_fuel_gallons * fuel_price, 2)
 
@@ -1512,6 +1438,43 @@ async def optimize_route(data: RouteOptimizeRequest):
     }
 
 
+@router.post("/optimize-route")
+async def optimize_route(data: RouteOptimizeRequest):
+    """Calculate optimal route for multi-stop loads.
+
+    Builds a nearest-neighbour route and improves it with 2-opt and Or-opt
+    local search, keeping the first/last stop in place when fixed.
+    """
+    if len(data.stops) < 2:
+        raise HTTPException(status_code=400, detail="Need at least 2 stops")
+
+    db = get_database()
+    coords = [(s.latitude, s.longitude) for s in data.stops]
+    # Large searches run in a worker process to keep the event loop free
+    (optimized_order,) = await optimize_many([(coords, data.fixed_first, data.fixed_last)])
+
+    return _route_result(data.stops, optimized_order, await _current_fuel_price(db))
+
+
+@router.post("/optimize-route/batch")
+async def optimize_routes_batch(data: RouteOptimizeBatchRequest):
+    """Optimize many multi-stop loads in one call, in parallel worker processes."""
+    for i, route in enumerate(data.routes):
+        if len(route.stops) < 2:
+            raise HTTPException(status_code=400, detail=f"Route {i}: need at least 2 stops")
+
+    db = get_database()
+    orders = await optimize_many([
+        ([(s.latitude, s.longitude) for s in route.stops], route.fixed_first, route.fixed_last)
+        for route in data.routes
+    ])
+    fuel_price = await _current_fuel_price(db)
+    return {
+        "routes": [_route_result(route.stops, order, fuel_price) for route, order in zip(data.routes, orders)],
+        "total": len(orders),
+    }
+
+
 # ============================================================================
 # 10. Simple Route Calculate (two-point)
 # ============================================================================
@@ -12,6 +12,8 @@ from app.schemas.shipment import ShipmentCreate, ShipmentUpdate, ShipmentRespons
 from app.services.number_generator import NumberGenerator
 from app.services.carrier_matching import CarrierMatchingService
 from app.services.websocket_manager import manager
+from app.services.shipment_changes import shipment_changes
+from app.services.portal_read_model import PortalReadModelService
 
 router = APIRouter()
 
@@ -121,6 +123,7 @@ async def create_shipment(data: ShipmentCreate):
 
     shipment = Shipment(**shipment_data)
     await db.shipments.insert_one(shipment.model_dump_mongo())
+    await shipment_changes.shipment_changed(shipment.id)
 
     # Create work item if no carrier assigned
     if not shipment.carrier_id:
@@ -170,6 +173,7 @@ async def update_shipment(shipment_id: str, data: ShipmentUpdate):
         {"_id": ObjectId(shipment_id)},
         {"$set": shipment.model_dump_mongo()}
     )
+    await shipment_changes.shipment_changed(shipment.id)
 
     await manager.broadcast("shipment_updated", {"id": shipment_id})
     return shipment_to_response(shipment)
@@ -220,6 +224,9 @@ async def transition_shipment(shipment_id: str, data: TransitionRequest):
         )
         await db.tracking_events.insert_one(event.model_dump_mongo())
 
+    # After the event, so the portal read model shows it as the latest
+    await shipment_changes.shipment_changed(shipment.id)
+
     await manager.broadcast("shipment_status_changed", {"id": shipment_id, "status": data.status})
     return shipment_to_response(shipment)
 
@@ -309,6 +316,7 @@ async def add_tracking_event(shipment_id: str, data: CheckCallRequest):
         {"_id": ObjectId(shipment_id)},
         {"$set": update_data}
     )
+    await PortalReadModelService.apply_shipment(shipment.id)
 
     await manager.broadcast("tracking_update", {"shipment_id": shipment_id})
     return {"success": True, "event_id": str(event.id)}
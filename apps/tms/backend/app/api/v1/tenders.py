@@ -9,6 +9,7 @@ from app.models.tender import Tender, TenderStatus
 from app.models.shipment import ShipmentStatus
 from app.models.work_item import WorkItem, WorkItemType, WorkItemStatus
 from app.services.websocket_manager import manager
+from app.services.shipment_changes import shipment_changes
 
 router = APIRouter()
 
@@ -133,6 +134,7 @@ async def create_tender(data: TenderCreate):
     )
 
     await db.tenders.insert_one(tender.model_dump_mongo())
+    await shipment_changes.tender_changed(tender.id)
 
     await manager.broadcast("tender_created", {"id": str(tender.id), "shipment_id": data.shipment_id})
     return tender_to_response(tender)
@@ -172,6 +174,7 @@ async def send_tender(tender_id: str, data: SendTenderRequest):
         {"_id": ObjectId(tender_id)},
         {"$set": tender.model_dump_mongo()}
     )
+    await shipment_changes.tender_changed(tender.id)
 
     # Create work item to track response
     work_item = WorkItem(
@@ -223,6 +226,7 @@ async def accept_tender(tender_id: str, data: AcceptTenderRequest):
         {"_id": ObjectId(tender_id)},
         {"$set": tender.model_dump_mongo()}
     )
+    await shipment_changes.tender_changed(tender.id)
 
     # Update shipment with carrier
     update_data = {
@@ -237,16 +241,20 @@ async def accept_tender(tender_id: str, data: AcceptTenderRequest):
         {"_id": tender.shipment_id},
         {"$set": update_data}
     )
+    await shipment_changes.shipment_changed(tender.shipment_id)
 
     # Decline other pending tenders for this shipment
+    sibling_filter = {
+        "shipment_id": tender.shipment_id,
+        "_id": {"$ne": tender.id},
+        "status": {"$in": [TenderStatus.DRAFT, TenderStatus.SENT, TenderStatus.COUNTER_OFFERED]},
+    }
+    cancelled_ids = await db.tenders.distinct("_id", sibling_filter)
     await db.tenders.update_many(
-        {
-            "shipment_id": tender.shipment_id,
-            "_id": {"$ne": tender.id},
-            "status": {"$in": [TenderStatus.DRAFT, TenderStatus.SENT, TenderStatus.COUNTER_OFFERED]},
-        },
+        sibling_filter,
         {"$set": {"status": TenderStatus.CANCELLED}}
     )
+    await shipment_changes.tenders_changed(cancelled_ids)
 
     # Complete work items
     await db.work_items.update_many(
@@ -304,6 +312,7 @@ async def decline_tender(tender_id: str, data: DeclineTenderRequest):
         {"_id": ObjectId(tender_id)},
         {"$set": tender.model_dump_mongo()}
     )
+    await shipment_changes.tender_changed(tender.id)
 
     await manager.broadcast("tender_declined", {"id": str(tender.id)})
     return tender_to_response(tender)
@@ -387,6 +396,7 @@ async def create_counter_offer(tender_id: str, data: CounterOfferRequest):
                 "response_notes": f"Auto-accepted counter-offer (within {auto_accept_range}% range)",
             }}
         )
+        await shipment_changes.tender_changed(tender_id)
         # Update shipment with carrier
         await db.shipments.update_one(
             {"_id": tender_doc["shipment_id"]},
@@ -396,6 +406,7 @@ async def create_counter_offer(tender_id: str, data: CounterOfferRequest):
                 "updated_at": now,
             }}
         )
+        await shipment_changes.shipment_changed(tender_doc["shipment_id"])
         await manager.broadcast("tender_accepted", {"id": tender_id, "auto_accepted": True})
     else:
         await db.tenders.update_one(
@@ -461,6 +472,7 @@ async def accept_counter_offer(tender_id: str, data: AcceptCounterRequest):
             "response_notes": data.notes or "Counter-offer accepted",
         }}
     )
+    await shipment_changes.tender_changed(tender_id)
 
     # Update shipment
     await db.shipments.update_one(
@@ -471,6 +483,7 @@ async def accept_counter_offer(tender_id: str, data: AcceptCounterRequest):
             "updated_at": now,
         }}
     )
+    await shipment_changes.shipment_changed(tender_doc["shipment_id"])
 
     # Track negotiation event
     negotiation_event = {
@@ -487,14 +500,17 @@ async def accept_counter_offer(tender_id: str, data: AcceptCounterRequest):
     )
 
     # Cancel other tenders for this shipment
+    sibling_filter = {
+        "shipment_id": tender_doc["shipment_id"],
+        "_id": {"$ne": ObjectId(tender_id)},
+        "status": {"$in": [TenderStatus.DRAFT.value, TenderStatus.SENT.value, TenderStatus.COUNTER_OFFERED.value]},
+    }
+    cancelled_ids = await db.tenders.distinct("_id", sibling_filter)
     await db.tenders.update_many(
-        {
-            "shipment_id": tender_doc["shipment_id"],
-            "_id": {"$ne": ObjectId(tender_id)},
-            "status": {"$in": [TenderStatus.DRAFT.value, TenderStatus.SENT.value, TenderStatus.COUNTER_OFFERED.value]},
-        },
+        sibling_filter,
         {"$set": {"status": TenderStatus.CANCELLED.value, "updated_at": now}}
     )
+    await shipment_changes.tenders_changed(cancelled_ids)
 
     # Auto-remove load board postings when load is covered
     await db.loadboard_postings.update_many(
@@ -605,6 +621,7 @@ async def broker_counter_offer(tender_id: str, data: BrokerCounterOfferRequest):
             "$push": {"negotiation_history": negotiation_event},
         }
     )
+    await shipment_changes.tender_changed(tender_id)
 
     # Save to counter_offers collection
     existing_count = await db.counter_offers.count_documents({"tender_id": ObjectId(tender_id)})
@@ -944,6 +961,7 @@ async def start_waterfall(tender_id_or_shipment_id: str, data: StartWaterfallReq
     )
     tender.transition_to(TenderStatus.SENT)
     await db.tenders.insert_one(tender.model_dump_mongo())
+    await shipment_changes.tender_changed(tender.id)
 
     await manager.broadcast("waterfall_started", {
         "waterfall_id": str(waterfall_doc["_id"]),
@@ -3,13 +3,18 @@ import secrets
 from typing import List, Optional
 from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError
 from bson import ObjectId
 
 from app.database import get_database
 from app.models.tracking import TrackingEvent, TrackingEventType
 from app.models.geofence import Geofence, GeofenceType, GeofenceTrigger, TrackingLink, PODCapture
 from app.services.tracking_service import TrackingService
+from app.services.geofence_index import GeofenceIndex
+from app.services.auto_tracking import AutoTrackingService
+from app.services.live_position_service import LivePositionService
+from app.services.shipment_changes import shipment_changes
+from app.services.portal_read_model import PortalReadModelService
 
 logger = logging.getLogger(__name__)
 
@@ -122,6 +127,7 @@ async def create_tracking_event(data: TrackingEventCreate):
                 }
             }
         )
+    await PortalReadModelService.apply_shipment(event.shipment_id)
 
     return event_to_response(event)
 
@@ -202,9 +208,9 @@ async def update_gps_location(data: GPSUpdateRequest):
 class GeofenceCreate(BaseModel):
     name: str
     geofence_type: GeofenceType = GeofenceType.CUSTOM
-    latitude: float
-    longitude: float
-    radius_meters: int = 500
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    radius_meters: int = Field(500, gt=0)
     trigger: GeofenceTrigger = GeofenceTrigger.BOTH
     shipment_id: Optional[str] = None
     facility_id: Optional[str] = None
@@ -304,6 +310,7 @@ async def create_geofence(data: GeofenceCreate):
     )
 
     await db.geofences.insert_one(gf.model_dump_mongo())
+    GeofenceIndex.invalidate()
     return geofence_to_response(gf)
 
 
@@ -314,6 +321,7 @@ async def delete_geofence(geofence_id: str):
     result = await db.geofences.delete_one({"_id": ObjectId(geofence_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Geofence not found")
+    GeofenceIndex.invalidate()
     return {"status": "deleted"}
 
 
@@ -330,6 +338,7 @@ async def toggle_geofence(geofence_id: str):
         {"_id": ObjectId(geofence_id)},
         {"$set": {"is_active": new_status}}
     )
+    GeofenceIndex.invalidate()
     return {"is_active": new_status}
 
 
@@ -761,6 +770,9 @@ async def capture_enhanced_pod(shipment_id: str, data: EnhancedPODCaptureRequest
             {"_id": shipment_oid},
             {"$set": {"status": "delivered", "actual_delivery_date": datetime.utcnow(), "updated_at": datetime.utcnow()}}
         )
+        await shipment_changes.shipment_changed(shipment_oid)
+    else:
+        await PortalReadModelService.apply_shipment(shipment_oid)
 
     if shipment.get("customer_id"):
         await db.portal_notifications.insert_one({
@@ -945,16 +957,6 @@ async def driver_location_update(data: DriverLocationUpdateRequest):
     }
     await db.driver_checkins.insert_one(checkin_doc)
 
-    # Use TrackingService to update shipment location and check geofences
-    result = await TrackingService.update_shipment_location(
-        shipment_id=data.shipment_id,
-        latitude=data.latitude,
-        longitude=data.longitude,
-        city=data.city,
-        state=data.state,
-        source=data.source,
-    )
-
     # Calculate ETA to delivery stop
     eta = None
     distance_remaining = None
@@ -971,11 +973,19 @@ async def driver_location_update(data: DriverLocationUpdateRequest):
         eta = eta_dt
         distance_remaining = round(dist, 1)
 
-        # Update ETA on shipment
-        await db.shipments.update_one(
-            {"_id": shipment_oid},
-            {"$set": {"eta": eta, "updated_at": datetime.utcnow()}}
-        )
+    # Use TrackingService to update shipment location (and ETA) and check geofences
+    result = await TrackingService.update_shipment_location(
+        shipment_id=data.shipment_id,
+        latitude=data.latitude,
+        longitude=data.longitude,
+        city=data.city,
+        state=data.state,
+        source=data.source,
+        driver_id=checkin_doc["driver_id"],
+        heading=data.heading,
+        speed_mph=data.speed_mph,
+        eta=eta,
+    )
 
     location_str = f"{data.city}, {data.state}" if data.city and data.state else None
 
@@ -990,6 +1000,30 @@ async def driver_location_update(data: DriverLocationUpdateRequest):
     )
 
 
+# ============================================================================
+# Real-Time Driver Locations (Feature #6)
+# ============================================================================
+
+class DriverLocationResponse(BaseModel):
+    driver_id: str
+    driver_name: str
+    carrier_id: Optional[str] = None
+    carrier_name: Optional[str] = None
+    latitude: float
+    longitude: float
+    city: Optional[str] = None
+    state: Optional[str] = None
+    heading: Optional[float] = None
+    speed_mph: Optional[float] = None
+    last_updated: datetime
+    current_shipment_id: Optional[str] = None
+    current_shipment_number: Optional[str] = None
+    shipment_status: Optional[str] = None
+    eta: Optional[datetime] = None
+    origin: Optional[str] = None
+    destination: Optional[str] = None
+
+
 class LiveMapResponse(BaseModel):
     """Response for live map with all in-transit shipment locations."""
     total_active: int
@@ -1001,10 +1035,7 @@ class LiveMapResponse(BaseModel):
 @router.get("/live-map", response_model=LiveMapResponse)
 async def get_live_map():
     """Get all in-transit shipment locations with ETA info for the live map.
-    Aggregates data from driver checkins and tracking events."""
-    db = get_database()
-
-    # Get driver locations (reuses existing logic)
+    Served from the latest-position read model maintained on each GPS update."""
     locations = await get_driver_locations()
 
     in_transit = len([d for d in locations if d.shipment_status == "in_transit"])
@@ -1075,6 +1106,7 @@ async def request_driver_location(shipment_id: str, data: RequestLocationRequest
         source="system",
     )
     await db.tracking_events.insert_one(event.model_dump_mongo())
+    await PortalReadModelService.apply_shipment(shipment_oid)
 
     return RequestLocationResponse(
         tracking_link_token=token,
@@ -1155,9 +1187,17 @@ async def update_geofence_alerts(geofence_id: str, data: dict):
 # Automated Tracking Updates
 # ============================================================================
 
+class GpsPoint(BaseModel):
+    """One telematics position; points without a fix are skipped by the walk."""
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    speed_mph: float = 0
+    timestamp: Optional[datetime] = None
+
+
 class AutoTrackingRequest(BaseModel):
     shipment_id: str
-    gps_points: List[dict]
+    gps_points: List[GpsPoint]
 
 
 class AutoTrackingResponse(BaseModel):
@@ -1170,98 +1210,79 @@ class AutoTrackingResponse(BaseModel):
     distance_remaining_miles: Optional[float] = None
 
 
+class BulkAutoTrackingRequest(BaseModel):
+    """ELD/telematics feed: points for many shipments, each carrying its ``shipment_id``."""
+    points: List[dict]
+
+
+class RejectedGpsPoint(BaseModel):
+    index: int
+    error: str
+
+
+class BulkAutoTrackingResponse(BaseModel):
+    points_received: int
+    results: List[AutoTrackingResponse]
+    unknown_shipment_ids: List[str]
+    points_rejected: int = 0
+    rejected_points: List[RejectedGpsPoint] = []
+
+
+MAX_BULK_TRACKING_POINTS = 50000
+MAX_REPORTED_REJECTIONS = 100
+
+
 @router.post("/auto-update", response_model=AutoTrackingResponse)
 async def automated_tracking_update(data: AutoTrackingRequest):
     """Auto-generate tracking events from GPS data. Detects state transitions."""
-    db = get_database()
     shipment_oid = ObjectId(data.shipment_id)
-
-    shipment = await db.shipments.find_one({"_id": shipment_oid})
-    if not shipment:
+    points = [point.model_dump() for point in data.gps_points]
+    results = await AutoTrackingService.process({shipment_oid: points})
+    if shipment_oid not in results:
         raise HTTPException(status_code=404, detail="Shipment not found")
-
-    events_generated = 0
-    detected_states = []
-    current_state = shipment.get("status")
-    stops = shipment.get("stops", [])
-    pickup_stop = next((s for s in stops if s.get("stop_type") == "pickup"), None)
-    delivery_stop = next((s for s in stops if s.get("stop_type") == "delivery"), None)
-
-    for point in data.gps_points:
-        lat = point.get("latitude")
-        lon = point.get("longitude")
-        ts = point.get("timestamp")
-        speed = point.get("speed_mph", 0)
-        if not lat or not lon:
+    return AutoTrackingResponse(shipment_id=data.shipment_id, **results[shipment_oid])
+
+
+@router.post("/auto-update/bulk", response_model=BulkAutoTrackingResponse)
+async def bulk_automated_tracking_update(data: BulkAutoTrackingRequest):
+    """Auto-generate tracking events for many shipments from one telematics batch.
+
+    Points are grouped by ``shipment_id`` and walked in the order received.
+    Unknown or malformed shipment ids, and points whose position, speed or
+    timestamp do not parse, are reported rather than failing the batch.
+    """
+    if len(data.points) > MAX_BULK_TRACKING_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_TRACKING_POINTS} points per request")
+
+    points_by_shipment: dict = {}
+    unknown: List[str] = []
+    rejected: List[RejectedGpsPoint] = []
+    points_rejected = 0
+    for index, point in enumerate(data.points):
+        shipment_id = str(point.get("shipment_id", ""))
+        if not ObjectId.is_valid(shipment_id):
+            if shipment_id not in unknown:
+                unknown.append(shipment_id)
             continue
-
-        timestamp = datetime.fromisoformat(ts) if isinstance(ts, str) else datetime.utcnow()
-        proximity = 0.008
-
-        near_pickup = (pickup_stop and pickup_stop.get("latitude") and
-                       abs(lat - pickup_stop["latitude"]) < proximity and abs(lon - pickup_stop["longitude"]) < proximity)
-        near_delivery = (delivery_stop and delivery_stop.get("latitude") and
-                         abs(lat - delivery_stop["latitude"]) < proximity and abs(lon - delivery_stop["longitude"]) < proximity)
-
-        new_event_type = None
-        new_status = None
-
-        if near_pickup and speed < 5 and current_state in ["booked", "pending_pickup"]:
-            new_event_type = TrackingEventType.ARRIVED_AT_PICKUP
-            new_status = "pending_pickup"
-            detected_states.append("arrived_at_pickup")
-        elif not near_pickup and current_state == "pending_pickup" and speed > 10:
-            new_event_type = TrackingEventType.DEPARTED_PICKUP
-            new_status = "in_transit"
-            detected_states.append("departed_pickup")
-        elif near_delivery and speed < 5 and current_state == "in_transit":
-            new_event_type = TrackingEventType.ARRIVED_AT_DELIVERY
-            new_status = "out_for_delivery"
-            detected_states.append("arrived_at_delivery")
-        elif speed > 10 and current_state == "in_transit":
-            last_event = await db.tracking_events.find_one(
-                {"shipment_id": shipment_oid, "source": "auto_gps"}, sort=[("event_timestamp", -1)]
-            )
-            if not last_event or (timestamp - last_event["event_timestamp"]).total_seconds() > 7200:
-                new_event_type = TrackingEventType.CHECK_CALL
-                detected_states.append("in_transit")
-
-        if new_event_type:
-            event = TrackingEvent(
-                shipment_id=shipment_oid, event_type=new_event_type,
-                event_timestamp=timestamp, reported_at=datetime.utcnow(),
-                latitude=lat, longitude=lon,
-                description=f"Auto-detected: {new_event_type.value}", source="auto_gps",
-            )
-            await db.tracking_events.insert_one(event.model_dump_mongo())
-            events_generated += 1
-
-            if new_status and new_status != current_state:
-                await db.shipments.update_one(
-                    {"_id": shipment_oid},
-                    {"$set": {"status": new_status, "last_check_call": datetime.utcnow(), "updated_at": datetime.utcnow()}}
-                )
-                current_state = new_status
-
-    eta = None
-    distance_remaining = None
-    if data.gps_points and delivery_stop and delivery_stop.get("latitude"):
-        last_point = data.gps_points[-1]
-        if last_point.get("latitude") and last_point.get("longitude"):
-            eta, distance_remaining = TrackingService.calculate_eta(
-                last_point["latitude"], last_point["longitude"],
-                delivery_stop["latitude"], delivery_stop["longitude"],
-            )
-
-    next_check = None
-    if distance_remaining:
-        hours = 4 if distance_remaining > 200 else (2 if distance_remaining > 50 else 1)
-        next_check = datetime.utcnow() + timedelta(hours=hours)
-
-    return AutoTrackingResponse(
-        shipment_id=data.shipment_id, events_generated=events_generated,
-        detected_states=detected_states, current_state=current_state,
-        next_check_call_at=next_check, eta=eta, distance_remaining_miles=distance_remaining,
+        try:
+            gps_point = GpsPoint.model_validate(point)
+        except ValidationError as e:
+            points_rejected += 1
+            if len(rejected) < MAX_REPORTED_REJECTIONS:
+                error = e.errors()[0]
+                field = ".".join(str(part) for part in error["loc"])
+                rejected.append(RejectedGpsPoint(index=index, error=f"{field}: {error['msg']}"))
+            continue
+        points_by_shipment.setdefault(ObjectId(shipment_id), []).append(gps_point.model_dump())
+
+    results = await AutoTrackingService.process(points_by_shipment) if points_by_shipment else {}
+    unknown += [str(oid) for oid in points_by_shipment if oid not in results]
+    return BulkAutoTrackingResponse(
+        points_received=len(data.points),
+        results=[AutoTrackingResponse(shipment_id=str(oid), **r) for oid, r in results.items()],
+        unknown_shipment_ids=unknown,
+        points_rejected=points_rejected,
+        rejected_points=rejected,
     )
 
 
@@ -1374,6 +1395,7 @@ async def create_mobile_pod_link(data: MobilePODLinkCreate):
         source="system",
     )
     await db.tracking_events.insert_one(event.model_dump_mongo())
+    await PortalReadModelService.apply_shipment(shipment_oid)
 
     return MobilePODLinkResponse(
         id=str(link_doc["_id"]),
@@ -1539,6 +1561,9 @@ async def submit_mobile_pod(token: str, data: MobilePODSubmission):
                 "updated_at": datetime.utcnow(),
             }}
         )
+        await shipment_changes.shipment_changed(shipment_oid)
+    else:
+        await PortalReadModelService.apply_shipment(shipment_oid)
 
     # Deactivate the POD link after use
     await db.tracking_links.update_one(
@@ -1619,6 +1644,7 @@ async def auto_create_geofences(shipment_id: str, data: AutoGeofenceRequest):
         "shipment_id": shipment_oid,
         "geofence_type": {"$in": ["pickup", "delivery"]},
     })
+    GeofenceIndex.invalidate()
 
     created_geofences = []
     for stop in stops:
@@ -1649,6 +1675,7 @@ async def auto_create_geofences(shipment_id: str, data: AutoGeofenceRequest):
             alert_push=data.alert_dispatcher,
         )
         await db.geofences.insert_one(gf.model_dump_mongo())
+        GeofenceIndex.invalidate()
         created_geofences.append(geofence_to_response(gf))
 
     # Store auto-update-status preference on the shipment
@@ -1763,7 +1790,19 @@ async def submit_location_share(token: str, data: LocationShareUpdate):
     }
     await db.driver_checkins.insert_one(checkin_doc)
 
-    # Use TrackingService for location update + geofence check
+    # Calculate ETA
+    eta = None
+    distance_remaining = None
+    stops = shipment.get("stops", [])
+    delivery_stop = next((s for s in stops if s.get("stop_type") == "delivery"), None)
+    if delivery_stop and delivery_stop.get("latitude") and delivery_stop.get("longitude"):
+        eta, dist = TrackingService.calculate_eta(
+            data.latitude, data.longitude,
+            delivery_stop["latitude"], delivery_stop["longitude"],
+        )
+        distance_remaining = round(dist, 1)
+
+    # Use TrackingService for location + ETA update and geofence check
     result = await TrackingService.update_shipment_location(
         shipment_id=str(shipment_oid),
         latitude=data.latitude,
@@ -1771,6 +1810,10 @@ async def submit_location_share(token: str, data: LocationShareUpdate):
         city=data.city,
         state=data.state,
         source="location_share_link",
+        driver_id=checkin_doc["driver_id"],
+        heading=data.heading,
+        speed_mph=data.speed_mph,
+        eta=eta,
     )
 
     # Update link usage
@@ -1779,22 +1822,6 @@ async def submit_location_share(token: str, data: LocationShareUpdate):
         {"$inc": {"view_count": 1}, "$set": {"last_viewed_at": datetime.utcnow()}}
     )
 
-    # Calculate ETA
-    eta = None
-    distance_remaining = None
-    stops = shipment.get("stops", [])
-    delivery_stop = next((s for s in stops if s.get("stop_type") == "delivery"), None)
-    if delivery_stop and delivery_stop.get("latitude") and delivery_stop.get("longitude"):
-        eta, dist = TrackingService.calculate_eta(
-            data.latitude, data.longitude,
-            delivery_stop["latitude"], delivery_stop["longitude"],
-        )
-        distance_remaining = round(dist, 1)
-        await db.shipments.update_one(
-            {"_id": shipment_oid},
-            {"$set": {"eta": eta, "updated_at": datetime.utcnow()}}
-        )
-
     return LocationShareResponse(
         status="received",
         shipment_number=shipment.get("shipment_number"),
@@ -1877,6 +1904,7 @@ async def capture_photo_with_metadata(data: PhotoCaptureRequest):
             is_exception=True,
         )
         await db.tracking_events.insert_one(event.model_dump_mongo())
+        await PortalReadModelService.apply_shipment(shipment_oid)
 
     return PhotoCaptureResponse(
         id=str(photo_doc["_id"]),
@@ -1920,165 +1948,13 @@ async def get_shipment_photos_tagged(shipment_id: str, category: Optional[str] =
     ]
 
 
-# ============================================================================
-# Real-Time Driver Locations (Feature #6)
-# ============================================================================
-
-class DriverLocationResponse(BaseModel):
-    driver_id: str
-    driver_name: str
-    carrier_id: Optional[str] = None
-    carrier_name: Optional[str] = None
-    latitude: float
-    longitude: float
-    city: Optional[str] = None
-    state: Optional[str] = None
-    heading: Optional[float] = None
-    speed_mph: Optional[float] = None
-    last_updated: datetime
-    current_shipment_id: Optional[str] = None
-    current_shipment_number: Optional[str] = None
-    shipment_status: Optional[str] = None
-    eta: Optional[datetime] = None
-    origin: Optional[str] = None
-    destination: Optional[str] = None
-
-
 @router.get("/driver-locations", response_model=List[DriverLocationResponse])
 async def get_driver_locations():
-    """Get real-time locations for all active drivers with current load info."""
-    db = get_database()
-
-    # Get driver checkins from the last 24 hours (recent GPS updates)
-    cutoff = datetime.utcnow() - timedelta(hours=24)
-
-    # Aggregate latest position per driver
-    pipeline = [
-        {"$match": {"created_at": {"$gte": cutoff}, "latitude": {"$exists": True, "$ne": None}}},
-        {"$sort": {"created_at": -1}},
-        {"$group": {
-            "_id": "$driver_id",
-            "latitude": {"$first": "$latitude"},
-            "longitude": {"$first": "$longitude"},
-            "city": {"$first": "$city"},
-            "state": {"$first": "$state"},
-            "heading": {"$first": "$heading"},
-            "speed_mph": {"$first": "$speed_mph"},
-            "last_updated": {"$first": "$created_at"},
-            "shipment_id": {"$first": "$shipment_id"},
-        }},
-    ]
-
-    checkins = await db.driver_checkins.aggregate(pipeline).to_list(500)
-
-    # Also check tracking events with GPS data
-    tracking_pipeline = [
-        {"$match": {
-            "reported_at": {"$gte": cutoff},
-            "latitude": {"$exists": True, "$ne": None},
-            "source": {"$in": ["gps", "driver_app", "auto_gps"]},
-        }},
-        {"$sort": {"reported_at": -1}},
-        {"$group": {
-            "_id": "$shipment_id",
-            "latitude": {"$first": "$latitude"},
-            "longitude": {"$first": "$longitude"},
-            "location_city": {"$first": "$location_city"},
-            "location_state": {"$first": "$location_state"},
-            "last_updated": {"$first": "$reported_at"},
-        }},
-    ]
-
-    tracking_positions = await db.tracking_events.aggregate(tracking_pipeline).to_list(500)
-
-    results = []
-
-    # Process driver checkins
-    seen_shipments = set()
-    for checkin in checkins:
-        driver_id = checkin["_id"]
-        driver = await db.drivers.find_one({"_id": driver_id})
-        if not driver:
-            continue
-
-        driver_name = driver.get("name", "Unknown Driver")
-        carrier_id = driver.get("carrier_id")
-        carrier_name = None
-        if carrier_id:
-            carrier = await db.carriers.find_one({"_id": carrier_id})
-            if carrier:
-                carrier_name = carrier.get("name")
-
-        shipment_info = {}
-        shipment_id = checkin.get("shipment_id")
-        if shipment_id:
-            seen_shipments.add(str(shipment_id))
-            shipment = await db.shipments.find_one({"_id": shipment_id})
-            if shipment:
-                stops = shipment.get("stops", [])
-                origin = stops[0] if stops else {}
-                dest = stops[-1] if len(stops) > 1 else {}
-                shipment_info = {
-                    "current_shipment_id": str(shipment["_id"]),
-                    "current_shipment_number": shipment.get("shipment_number"),
-                    "shipment_status": shipment.get("status"),
-                    "eta": shipment.get("eta"),
-                    "origin": f"{origin.get('city', '')}, {origin.get('state', '')}",
-                    "destination": f"{dest.get('city', '')}, {dest.get('state', '')}",
-                }
-
-        results.append(DriverLocationResponse(
-            driver_id=str(driver_id),
-            driver_name=driver_name,
-            carrier_id=str(carrier_id) if carrier_id else None,
-            carrier_name=carrier_name,
-            latitude=checkin["latitude"],
-            longitude=checkin["longitude"],
-            city=checkin.get("city"),
-            state=checkin.get("state"),
-            heading=checkin.get("heading"),
-            speed_mph=checkin.get("speed_mph"),
-            last_updated=checkin["last_updated"],
-            **shipment_info,
-        ))
-
-    # Process tracking positions for shipments not covered by driver checkins
-    for tp in tracking_positions:
-        shipment_id = tp["_id"]
-        if str(shipment_id) in seen_shipments:
-            continue
-
-        shipment = await db.shipments.find_one({"_id": shipment_id})
-        if not shipment or shipment.get("status") not in ("in_transit", "pending_pickup", "out_for_delivery"):
-            continue
-
-        stops = shipment.get("stops", [])
-        origin = stops[0] if stops else {}
-        dest = stops[-1] if len(stops) > 1 else {}
-
-        carrier_name = None
-        carrier_id = shipment.get("carrier_id")
-        if carrier_id:
-            carrier = await db.carriers.find_one({"_id": carrier_id})
-            if carrier:
-                carrier_name = carrier.get("name")
-
-        results.append(DriverLocationResponse(
-            driver_id=f"shipment_{shipment_id}",
-            driver_name=f"Driver ({shipment.get('shipment_number', '')})",
-            carrier_id=str(carrier_id) if carrier_id else None,
-            carrier_name=carrier_name,
-            latitude=tp["latitude"],
-            longitude=tp["longitude"],
-            city=tp.get("location_city"),
-            state=tp.get("location_state"),
-            last_updated=tp["last_updated"],
-            current_shipment_id=str(shipment_id),
-            current_shipment_number=shipment.get("shipment_number"),
-            shipment_status=shipment.get("status"),
-            eta=shipment.get("eta"),
-            origin=f"{origin.get('city', '')}, {origin.get('state', '')}",
-            destination=f"{dest.get('city', '')}, {dest.get('state', '')}",
-        ))
-
-    return results
+    """Get real-time locations for all active drivers with current load info.
+
+    Reads the maintained ``latest_positions`` collection and resolves drivers,
+    carriers and shipments in bulk, so the cost is a fixed handful of queries
+    regardless of fleet size.
+    """
+    rows = await LivePositionService.get_live_positions(max_age_hours=24)
+    return [DriverLocationResponse(**row) for row in rows]
@@ -2,6 +2,7 @@
 
 import logging
 import json
+from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 from app.services.websocket_manager import manager
@@ -12,20 +13,27 @@ router = APIRouter()
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, topics: Optional[str] = None):
     """
     WebSocket endpoint for real-time TMS updates.
 
     Clients connect here to receive broadcast events for shipments,
     work items, tenders, and other entity changes.
 
+    By default a connection receives every event (the ``global`` topic).
+    Pass ``?topics=shipment:<id>,desk:<id>`` to receive only those topics, or
+    change subscriptions at runtime:
+    {"type": "subscribe", "topics": [...]} / {"type": "unsubscribe", "topics": [...]}
+    Both reply with {"type": "subscriptions", "topics": [...]}.
+
     Supports ping/pong keepalive: send {"type": "ping"} to receive {"type": "pong"}.
     """
-    await manager.connect(websocket)
+    initial_topics = [t.strip() for t in topics.split(",") if t.strip()] if topics else None
+    await manager.connect(websocket, initial_topics)
 
     try:
         while True:
-            # Wait for messages from client (keepalive pings)
+            # Wait for messages from client (keepalive pings, subscriptions)
             raw = await websocket.receive_text()
 
             try:
@@ -36,7 +44,14 @@ async def websocket_endpoint(websocket: WebSocket):
             msg_type = message.get("type")
 
             if msg_type == "ping":
-                await websocket.send_text(json.dumps({"type": "pong"}))
+                manager.send_text(websocket, json.dumps({"type": "pong"}))
+            elif msg_type in ("subscribe", "unsubscribe"):
+                requested = [t for t in message.get("topics") or [] if isinstance(t, str)]
+                if msg_type == "subscribe":
+                    current = manager.subscribe(websocket, requested)
+                else:
+                    current = manager.unsubscribe(websocket, requested)
+                manager.send_text(websocket, json.dumps({"type": "subscriptions", "topics": sorted(current)}))
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
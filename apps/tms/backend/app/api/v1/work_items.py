@@ -151,7 +151,7 @@ async def create_work_item(data: WorkItemCreate):
     work_item = WorkItem(**wi_data)
     await db.work_items.insert_one(work_item.model_dump_mongo())
 
-    await manager.broadcast("work_item_created", {"id": str(work_item.id), "work_type": work_item.work_type})
+    await manager.broadcast("work_item_created", {"id": str(work_item.id), "work_type": work_item.work_type, "desk_id": work_item.desk_id})
     return work_item_to_response(work_item)
 
 
@@ -203,7 +203,7 @@ async def complete_work_item(work_item_id: str, data: CompleteWorkItemRequest):
         {"$set": work_item.model_dump_mongo()}
     )
 
-    await manager.broadcast("work_item_completed", {"id": str(work_item.id)})
+    await manager.broadcast("work_item_completed", {"id": str(work_item.id), "desk_id": work_item.desk_id})
     return work_item_to_response(work_item)
 
 
@@ -252,5 +252,5 @@ async def assign_work_item(work_item_id: str, data: AssignWorkItemRequest):
         {"$set": work_item.model_dump_mongo()}
     )
 
-    await manager.broadcast("work_item_assigned", {"id": str(work_item.id), "assigned_to": data.user_id})
+    await manager.broadcast("work_item_assigned", {"id": str(work_item.id), "assigned_to": data.user_id, "desk_id": work_item.desk_id})
     return work_item_to_response(work_item)
@@ -20,10 +20,30 @@ class Settings(BaseSettings):
 
     # AI (for email extraction and drafting)
     anthropic_api_key: str = ""
+    # Account-wide provider budget, split evenly across the API processes
+    # (``api_replicas``) that share the document queue
+    anthropic_max_concurrent: int = 4
+    anthropic_requests_per_minute: int = 50
+    api_replicas: int = 1
 
     # Admin API (for AI config)
     admin_api_url: str = "https://admin-api.ai.devintensive.com"
 
+    # Scheduled reports
+    report_scheduler_enabled: bool = True
+    report_artifact_dir: str = "/app/reports"
+
+    # Durable timers (tender expiry, scheduled reports, exception sweeps)
+    timers_enabled: bool = True
+
+    # Document AI processing
+    document_workers_enabled: bool = True
+    document_workers: int = 4
+
+    # Query profiling: command timings by shape, periodic explain of the top shapes
+    query_profiler_enabled: bool = True
+    slow_query_ms: int = 100
+
     # App URLs
     app_base_url: str = "https://tms.ai.devintensive.com"
     frontend_url: str = "https://tms.ai.devintensive.com"
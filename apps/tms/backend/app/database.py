@@ -16,7 +16,14 @@ async def connect_to_mongo() -> None:
     settings = get_settings()
 
     logger.info(f"Connecting to MongoDB at {settings.mongodb_url}")
-    _client = AsyncIOMotorClient(settings.mongodb_url)
+    listeners = []
+    if settings.query_profiler_enabled:
+        # Imported here: the profiler's auditor reads the database through this module
+        from app.services.query_profiler import query_profiler
+
+        query_profiler.slow_query_ms = settings.slow_query_ms
+        listeners.append(query_profiler)
+    _client = AsyncIOMotorClient(settings.mongodb_url, event_listeners=listeners)
     _database = _client[settings.database_name]
 
     # Verify connection
@@ -8,6 +8,14 @@ from app.database import connect_to_mongo, close_mongo_connection, check_databas
 from app.utils.seed import seed_database, ensure_indexes
 from app.api.v1 import router as api_router
 from app.api.v1.websocket import router as ws_router
+from app.services.websocket_manager import manager as ws_manager
+from app.services.route_optimizer import shutdown_pool as shutdown_route_pool
+from app.services.automation_engine import trigger_stats_flusher
+from app.services.document_queue import document_queue
+from app.services.query_profiler import query_auditor
+from app.services.timer_service import timer_scheduler
+from app.services.report_scheduler import report_scheduler
+from app.services.shipment_import import fail_stale_import_jobs
 
 settings = get_settings()
 
@@ -28,16 +36,33 @@ async def lifespan(app: FastAPI):
 
     # Always ensure indexes exist (idempotent, safe to run on every startup)
     await ensure_indexes()
+    await fail_stale_import_jobs()
 
     # Seed database in dev mode
     if settings.skip_auth:
         logger.info("Dev mode enabled (SKIP_AUTH=true), seeding database")
         await seed_database()
 
+    if settings.report_scheduler_enabled:
+        report_scheduler.start()
+    if settings.document_workers_enabled:
+        document_queue.start()
+    if settings.query_profiler_enabled:
+        query_auditor.start()
+    if settings.timers_enabled:
+        timer_scheduler.start()
+    trigger_stats_flusher.start()
+
     yield
 
     # Shutdown
     logger.info("Shutting down Expertly TMS API")
+    shutdown_route_pool()
+    await timer_scheduler.stop()
+    await report_scheduler.stop()
+    await document_queue.stop()
+    await query_auditor.stop()
+    await trigger_stats_flusher.stop()
     await close_mongo_connection()
 
 
@@ -76,7 +101,8 @@ async def health_check():
     db_connected = await check_database_connection()
     return {
         "status": "healthy" if db_connected else "degraded",
-        "database": "connected" if db_connected else "disconnected"
+        "database": "connected" if db_connected else "disconnected",
+        "websockets": ws_manager.stats(),
     }
 
 
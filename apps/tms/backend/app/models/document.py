@@ -52,6 +52,7 @@ class Document(MongoModel):
     # Storage
     storage_path: str  # Path in file storage
     storage_provider: str = "local"  # "local", "s3", etc.
+    content_hash: Optional[str] = None  # SHA-256 of the file; shared by duplicate uploads
 
     # Links (one of these should be set)
     shipment_id: Optional[PyObjectId] = None
@@ -69,6 +70,7 @@ class Document(MongoModel):
     extraction_started_at: Optional[datetime] = None
     extraction_completed_at: Optional[datetime] = None
     extraction_error: Optional[str] = None
+    extraction_cache_hit: bool = False  # Reused the extraction of identical content
 
     # OCR Results
     ocr_text: Optional[str] = None  # Full extracted text
@@ -32,6 +32,7 @@ class Geofence(MongoModel):
     latitude: float
     longitude: float
     radius_meters: int = 500  # Default 500m radius
+    location: Optional[dict] = None  # GeoJSON point for the 2dsphere index; set from latitude/longitude
 
     # Polygon (optional, for complex shapes)
     polygon_points: Optional[List[dict]] = None  # List of {lat, lng}
@@ -58,6 +59,11 @@ class Geofence(MongoModel):
     # Status
     is_active: bool = True
 
+    def __init__(self, **data):
+        super().__init__(**data)
+        if self.location is None and -90 <= self.latitude <= 90 and -180 <= self.longitude <= 180:
+            self.location = {"type": "Point", "coordinates": [self.longitude, self.latitude]}
+
 
 class GeofenceEvent(MongoModel):
     """Record of a geofence trigger event."""
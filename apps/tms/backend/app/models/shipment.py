@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, Field
 
 from .base import MongoModel, PyObjectId, utc_now
@@ -67,6 +67,33 @@ class Stop(BaseModel):
         return self.actual_departure is not None
 
 
+def lane_key(origin_state: Optional[str], destination_state: Optional[str]) -> str:
+    """The state lane key stored on shipments, e.g. ``"IL-TX"``."""
+    return f"{(origin_state or '').strip().upper()}-{(destination_state or '').strip().upper()}"
+
+
+def lane_fields(stops: list) -> Dict[str, Any]:
+    """Lane fields denormalized from the first and last stops (dicts or ``Stop``)."""
+    if not stops:
+        return dict.fromkeys(SHIPMENT_LANE_FIELDS)
+    ends = [s if isinstance(s, dict) else s.model_dump() for s in (stops[0], stops[-1])]
+    fields: Dict[str, Any] = {}
+    for prefix, stop in zip(("origin", "destination"), ends):
+        zip_code = str(stop.get("zip_code") or "").strip()
+        fields[f"{prefix}_city"] = (stop.get("city") or "").strip() or None
+        fields[f"{prefix}_state"] = (stop.get("state") or "").strip().upper() or None
+        fields[f"{prefix}_zip3"] = zip_code[:3] if len(zip_code) >= 3 else None
+    fields["lane_key"] = lane_key(fields["origin_state"], fields["destination_state"])
+    return fields
+
+
+SHIPMENT_LANE_FIELDS = (
+    "origin_city", "origin_state", "origin_zip3",
+    "destination_city", "destination_state", "destination_zip3",
+    "lane_key",
+)
+
+
 class Shipment(MongoModel):
     """A booked shipment."""
 
@@ -86,6 +113,16 @@ class Shipment(MongoModel):
     # Stops (supports multi-stop shipments)
     stops: List[Stop] = Field(default_factory=list)
 
+    # Lane, denormalized from the first and last stops on every write so
+    # lane queries can match indexed fields (see lane_fields)
+    origin_city: Optional[str] = None
+    origin_state: Optional[str] = None
+    origin_zip3: Optional[str] = None
+    destination_city: Optional[str] = None
+    destination_state: Optional[str] = None
+    destination_zip3: Optional[str] = None
+    lane_key: Optional[str] = None
+
     # Load details
     equipment_type: str = "van"
     weight_lbs: Optional[int] = None
@@ -155,6 +192,12 @@ class Shipment(MongoModel):
                 return True
         return False
 
+    def model_dump_mongo(self, **kwargs) -> dict:
+        """Dump for MongoDB with the lane fields refreshed from the stops."""
+        for name, value in lane_fields(self.stops).items():
+            setattr(self, name, value)
+        return super().model_dump_mongo(**kwargs)
+
     def can_transition_to(self, new_status: ShipmentStatus) -> bool:
         """Check if status transition is valid."""
         return new_status in SHIPMENT_STATUS_TRANSITIONS.get(self.status, [])
@@ -0,0 +1,392 @@
+"""AR and AP aging computed in the database.
+
+Each report is two aggregations over the same stages: open invoices (or
+carrier bills) get their amount due, days past due and bucket computed
+server-side. A ``$facet`` then groups them into bucket totals and, for
+payables, the 8-week cash flow projection, while per-customer (per-carrier)
+totals by bucket come back from their own cursor, so the entity breakdown
+is not bound by the 16MB limit on the single ``$facet`` result document.
+Only group rows and a capped list of the oldest items per bucket come back,
+so totals are exact however many documents are open.
+
+Month-end (or any day's) figures can be kept with :meth:`AgingService.take_snapshot`,
+which stores the report without item detail in ``aging_snapshots`` keyed by
+report type and as-of date. The per-customer (per-carrier) breakdown goes
+to ``aging_snapshot_entities``, one document per entity keyed by snapshot
+id, so a snapshot is not bound by the 16MB document limit either.
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.database import get_database
+from app.models.base import utc_now
+
+AR_OPEN_STATUSES = ["sent", "partial"]
+AP_OPEN_STATUSES = ["received", "matched", "disputed", "approved"]
+
+# (key, label, last day past due in the bucket); the last bucket is open-ended
+AR_BUCKETS: List[Tuple[str, str, Optional[int]]] = [
+    ("current", "Current", 0),
+    ("1_30", "1-30 Days", 30),
+    ("31_60", "31-60 Days", 60),
+    ("61_90", "61-90 Days", 90),
+    ("91_120", "91-120 Days", 120),
+    ("120_plus", "120+ Days", None),
+]
+AP_BUCKETS: List[Tuple[str, str, Optional[int]]] = [
+    ("current", "Current", 0),
+    ("1_30", "1-30 Days", 30),
+    ("31_60", "31-60 Days", 60),
+    ("61_90", "61-90 Days", 90),
+    ("90_plus", "90+ Days", None),
+]
+
+# Oldest items returned per bucket; totals and counts always cover every item
+AGING_ITEMS_PER_BUCKET = 1000
+CASH_FLOW_WEEKS = 8
+DAY_MS = 86_400_000
+SNAPSHOT_ENTITY_BATCH = 1000
+
+# Report field holding the entity breakdown, by report type
+SNAPSHOT_ENTITY_FIELDS = {"ar": "by_entity", "ap": "by_carrier"}
+
+_AR_ITEM = {
+    "id": "$_id",
+    "invoice_number": "$invoice_number",
+    "customer_id": "$customer_id",
+    "billing_name": "$billing_name",
+    "amount_due": "$amount_due",
+    "total": "$total",
+    "due_date": "$due",
+    "days_past_due": "$days_past",
+    "status": "$status",
+}
+_AP_ITEM = {
+    "id": "$_id",
+    "bill_number": "$bill_number",
+    "carrier_id": "$carrier_id",
+    "amount": "$amount_due",
+    "due_date": "$due",
+    "days_past_due": "$days_past",
+    "status": "$status",
+}
+
+
+def entity_bucket_field(bucket: str) -> str:
+    return bucket if bucket == "current" else f"past_due_{bucket}"
+
+
+def _bucket_switch(buckets: List[Tuple[str, str, Optional[int]]]) -> dict:
+    return {"$switch": {
+        "branches": [
+            {"case": {"$lte": ["$days_past", limit]}, "then": key}
+            for key, _, limit in buckets if limit is not None
+        ],
+        "default": buckets[-1][0],
+    }}
+
+
+def aging_pipeline(
+    match: dict,
+    amount: Any,
+    due: Any,
+    item: dict,
+    entity_field: str,
+    name_field: Optional[str],
+    buckets: List[Tuple[str, str, Optional[int]]],
+    as_of: datetime,
+    items_per_bucket: int = AGING_ITEMS_PER_BUCKET,
+    positive_only: bool = False,
+    extra_facets: Optional[dict] = None,
+) -> Tuple[List[dict], List[dict]]:
+    """Bucket-total and entity-total pipelines over the same stages.
+
+    The first ends in a ``$facet`` with ``buckets`` and any ``extra_facets``;
+    the second returns one row per entity and bucket.
+
+    ``amount`` and ``due`` are expressions for the amount due and the date
+    aging counts from; days past due are whole days as of ``as_of``, rounded
+    down like ``timedelta.days``.
+    """
+    pipeline: List[dict] = [
+        {"$match": match},
+        {"$addFields": {"amount_due": amount, "due": due}},
+    ]
+    if positive_only:
+        pipeline.append({"$match": {"amount_due": {"$gt": 0}}})
+    pipeline += [
+        {"$addFields": {"days_past": {"$cond": [
+            {"$eq": [{"$ifNull": ["$due", None]}, None]},
+            0,
+            {"$floor": {"$divide": [{"$subtract": [as_of, "$due"]}, DAY_MS]}},
+        ]}}},
+        {"$addFields": {"bucket": _bucket_switch(buckets)}},
+    ]
+
+    bucket_group: dict = {"_id": "$bucket", "total_amount": {"$sum": "$amount_due"}, "count": {"$sum": 1}}
+    if items_per_bucket:
+        bucket_group["items"] = {"$topN": {
+            "n": items_per_bucket, "sortBy": {"due": 1, "_id": 1}, "output": item,
+        }}
+    entity_group: dict = {
+        "_id": {"entity": f"${entity_field}", "bucket": "$bucket"},
+        "total": {"$sum": "$amount_due"},
+        "count": {"$sum": 1},
+    }
+    if name_field:
+        entity_group["name"] = {"$first": f"${name_field}"}
+
+    facet_pipeline = pipeline + [{"$facet": {
+        "buckets": [{"$group": bucket_group}],
+        **(extra_facets or {}),
+    }}]
+    return facet_pipeline, pipeline + [{"$group": entity_group}]
+
+
+async def _run_aging(collection, pipelines: Tuple[List[dict], List[dict]]) -> dict:
+    """Facet results with the entity rows, streamed from their own cursor, under ``entities``."""
+    facet_pipeline, entity_pipeline = pipelines
+    facets, entities = await asyncio.gather(
+        collection.aggregate(facet_pipeline, allowDiskUse=True).to_list(1),
+        collection.aggregate(entity_pipeline, allowDiskUse=True).to_list(None),
+    )
+    return {**facets[0], "entities": entities}
+
+
+def _item(row: dict) -> dict:
+    row = dict(row)
+    for key in ("id", "customer_id", "carrier_id"):
+        if key in row:
+            row[key] = str(row[key]) if row[key] is not None else None
+    row["due_date"] = row["due_date"].isoformat() if row.get("due_date") else None
+    row["days_past_due"] = max(0, int(row.get("days_past_due") or 0))
+    return row
+
+
+def _assemble(
+    facets: dict,
+    buckets: List[Tuple[str, str, Optional[int]]],
+    count_field: str,
+    names: Dict[Any, str],
+    default_name: str,
+) -> Tuple[List[dict], List[dict]]:
+    """Bucket dicts and entity totals sorted by amount outstanding."""
+    by_key = {row["_id"]: row for row in facets["buckets"]}
+    bucket_rows = [
+        {
+            "bucket": key,
+            "label": label,
+            "total_amount": by_key.get(key, {}).get("total_amount", 0),
+            "count": by_key.get(key, {}).get("count", 0),
+            "items": [_item(i) for i in by_key.get(key, {}).get("items", [])],
+        }
+        for key, label, _ in buckets
+    ]
+
+    entities: Dict[Any, dict] = {}
+    for row in facets["entities"]:
+        entity = row["_id"].get("entity")
+        totals = entities.get(entity)
+        if totals is None:
+            totals = entities[entity] = {
+                "entity_id": str(entity) if entity is not None else "unknown",
+                "entity_name": names.get(entity) or row.get("name") or default_name,
+                "total_outstanding": 0,
+                count_field: 0,
+                **{entity_bucket_field(key): 0 for key, _, _ in buckets},
+            }
+        totals["total_outstanding"] += row["total"]
+        totals[count_field] += row["count"]
+        totals[entity_bucket_field(row["_id"]["bucket"])] += row["total"]
+
+    return bucket_rows, sorted(entities.values(), key=lambda x: x["total_outstanding"], reverse=True)
+
+
+def _report(report_type: str, as_of: datetime, bucket_rows: List[dict]) -> dict:
+    return {
+        "report_type": report_type,
+        "as_of_date": as_of,
+        "total_outstanding": sum(b["total_amount"] for b in bucket_rows),
+        "total_count": sum(b["count"] for b in bucket_rows),
+        "buckets": bucket_rows,
+    }
+
+
+class AgingService:
+    """Accounts receivable and payable aging reports."""
+
+    @staticmethod
+    async def ar_report(
+        customer_id: Optional[ObjectId] = None,
+        as_of: Optional[datetime] = None,
+        items_per_bucket: int = AGING_ITEMS_PER_BUCKET,
+    ) -> dict:
+        """AR aging over open invoices: Current, 1-30, 31-60, 61-90, 91-120, 120+ days."""
+        db = get_database()
+        as_of = as_of or utc_now()
+        match: Dict[str, Any] = {"status": {"$in": AR_OPEN_STATUSES}}
+        if customer_id:
+            match["customer_id"] = customer_id
+
+        pipelines = aging_pipeline(
+            match,
+            amount={"$subtract": [{"$ifNull": ["$total", 0]}, {"$ifNull": ["$amount_paid", 0]}]},
+            due={"$ifNull": ["$due_date", "$invoice_date"]},
+            item=_AR_ITEM,
+            entity_field="customer_id",
+            name_field="billing_name",
+            buckets=AR_BUCKETS,
+            as_of=as_of,
+            items_per_bucket=items_per_bucket,
+            positive_only=True,
+        )
+        facets = await _run_aging(db.invoices, pipelines)
+        bucket_rows, by_entity = _assemble(facets, AR_BUCKETS, "invoice_count", {}, "")
+        return {**_report("ar", as_of, bucket_rows), "by_entity": by_entity}
+
+    @staticmethod
+    async def ap_report(
+        carrier_id: Optional[ObjectId] = None,
+        as_of: Optional[datetime] = None,
+        items_per_bucket: int = AGING_ITEMS_PER_BUCKET,
+    ) -> dict:
+        """AP aging over open carrier bills, with an 8-week cash flow projection."""
+        db = get_database()
+        as_of = as_of or utc_now()
+        match: Dict[str, Any] = {"status": {"$in": AP_OPEN_STATUSES}}
+        if carrier_id:
+            match["carrier_id"] = carrier_id
+
+        # Weeks start on the as-of day; a bill falls in the week containing its due date
+        today = as_of.replace(hour=0, minute=0, second=0, microsecond=0)
+        cash_flow = [
+            {"$match": {"due_date": {"$gte": today, "$lt": today + timedelta(weeks=CASH_FLOW_WEEKS)}}},
+            {"$group": {
+                "_id": {"$floor": {"$divide": [{"$subtract": ["$due_date", today]}, 7 * DAY_MS]}},
+                "expected_outflow": {"$sum": "$amount_due"},
+                "bill_count": {"$sum": 1},
+            }},
+        ]
+        pipelines = aging_pipeline(
+            match,
+            amount={"$ifNull": ["$amount", 0]},
+            due={"$ifNull": ["$due_date", {"$ifNull": ["$received_date", as_of]}]},
+            item=_AP_ITEM,
+            entity_field="carrier_id",
+            name_field=None,
+            buckets=AP_BUCKETS,
+            as_of=as_of,
+            items_per_bucket=items_per_bucket,
+            extra_facets={"cash_flow": cash_flow},
+        )
+        facets = await _run_aging(db.carrier_bills, pipelines)
+
+        carrier_ids = [row["_id"]["entity"] for row in facets["entities"] if row["_id"].get("entity")]
+        names = {
+            c["_id"]: c.get("name")
+            async for c in db.carriers.find({"_id": {"$in": list(set(carrier_ids))}}, {"name": 1})
+        }
+        bucket_rows, by_carrier = _assemble(facets, AP_BUCKETS, "bill_count", names, "Unknown Carrier")
+        item_names = {str(k): v for k, v in names.items()}
+        for bucket in bucket_rows:
+            for item in bucket["items"]:
+                item["carrier_id"] = item["carrier_id"] or "unknown"
+                item["carrier_name"] = item_names.get(item["carrier_id"]) or "Unknown Carrier"
+
+        weeks = {int(row["_id"]): row for row in facets["cash_flow"]}
+        projections = []
+        for week in range(CASH_FLOW_WEEKS):
+            week_start = as_of + timedelta(weeks=week)
+            projections.append({
+                "week_start": week_start.strftime("%Y-%m-%d"),
+                "week_end": (week_start + timedelta(days=6)).strftime("%Y-%m-%d"),
+                "expected_outflow": weeks.get(week, {}).get("expected_outflow", 0),
+                "bill_count": weeks.get(week, {}).get("bill_count", 0),
+            })
+
+        return {**_report("ap", as_of, bucket_rows), "by_carrier": by_carrier, "cash_flow_projection": projections}
+
+    @staticmethod
+    async def take_snapshot(report_type: str, as_of: Optional[datetime] = None) -> dict:
+        """Compute a report and store it (without item detail) for its as-of day.
+
+        The entity breakdown is stored as separate documents and left out of
+        the returned snapshot.
+        """
+        db = get_database()
+        as_of = as_of or utc_now()
+        if report_type == "ar":
+            report = await AgingService.ar_report(as_of=as_of, items_per_bucket=0)
+        else:
+            report = await AgingService.ap_report(as_of=as_of, items_per_bucket=0)
+        entities = report.pop(SNAPSHOT_ENTITY_FIELDS[report_type])
+        doc = {
+            "report_type": report_type,
+            "as_of_date": as_of.date().isoformat(),
+            "report": report,
+            "entity_count": len(entities),
+            "created_at": utc_now(),
+        }
+        stored = await db.aging_snapshots.find_one_and_replace(
+            {"report_type": report_type, "as_of_date": doc["as_of_date"]},
+            doc,
+            projection={"_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        snapshot_id = stored["_id"]
+        await db.aging_snapshot_entities.delete_many({"snapshot_id": snapshot_id})
+        for start in range(0, len(entities), SNAPSHOT_ENTITY_BATCH):
+            batch = entities[start:start + SNAPSHOT_ENTITY_BATCH]
+            await db.aging_snapshot_entities.insert_many(
+                [{"snapshot_id": snapshot_id, "position": start + i, **entity} for i, entity in enumerate(batch)],
+                ordered=False,
+            )
+        return {**doc, "_id": snapshot_id}
+
+    @staticmethod
+    async def get_snapshot(report_type: str, as_of: date) -> Optional[dict]:
+        """The stored report for a day, with its entity breakdown, or None."""
+        db = get_database()
+        doc = await db.aging_snapshots.find_one(
+            {"report_type": report_type, "as_of_date": as_of.isoformat()}
+        )
+        if not doc:
+            return None
+        report = doc["report"]
+        # Snapshots taken before the breakdown moved out keep it inline
+        entity_field = SNAPSHOT_ENTITY_FIELDS[report_type]
+        if entity_field not in report:
+            report[entity_field] = [
+                entity
+                async for entity in db.aging_snapshot_entities.find(
+                    {"snapshot_id": doc["_id"]}, {"_id": 0, "snapshot_id": 0, "position": 0}
+                ).sort("position", 1)
+            ]
+        as_of_date = report["as_of_date"]
+        if as_of_date.tzinfo is None:
+            report["as_of_date"] = as_of_date.replace(tzinfo=timezone.utc)
+        return report
+
+    @staticmethod
+    async def list_snapshots(report_type: Optional[str] = None, limit: int = 36) -> List[dict]:
+        """Stored snapshots, newest first, without their entity breakdown."""
+        query = {"report_type": report_type} if report_type else {}
+        cursor = get_database().aging_snapshots.find(
+            query, {"report_type": 1, "as_of_date": 1, "created_at": 1,
+                    "report.total_outstanding": 1, "report.total_count": 1},
+        ).sort("as_of_date", -1).limit(limit)
+        return [
+            {
+                "report_type": doc["report_type"],
+                "as_of_date": doc["as_of_date"],
+                "total_outstanding": doc["report"]["total_outstanding"],
+                "total_count": doc["report"]["total_count"],
+                "created_at": doc["created_at"],
+            }
+            async for doc in cursor
+        ]
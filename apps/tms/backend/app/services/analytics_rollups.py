@@ -0,0 +1,408 @@
+"""Daily analytics rollups for margin, carrier and customer dashboards.
+
+Each shipment and tender contributes metrics to a small set of daily rows in
+``analytics_rollups`` (one per customer, carrier and lane it belongs to). The
+contribution last applied for every source document is kept in
+``analytics_rollup_contributions``; on each write the new contribution is
+swapped in atomically and only the difference is ``$inc``-ed into the rows.
+Dashboards then read O(days x entities) rows instead of O(shipments)
+documents.
+
+Contributions are updated through :data:`app.services.shipment_changes.shipment_changes`,
+which every shipment and tender write path notifies. Rows can always be
+regenerated from source data with :meth:`rebuild` (see
+``scripts/rebuild_analytics_rollups.py``).
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from bson import ObjectId
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+
+from app.database import get_database
+from app.services.shipment_changes import shipment_changes
+
+logger = logging.getLogger(__name__)
+
+# Low-margin threshold used by the margin dashboard (percent)
+LOW_MARGIN_PERCENT = 10
+
+# Shipment fields needed to compute a contribution
+SHIPMENT_PROJECTION = {
+    "customer_id": 1,
+    "carrier_id": 1,
+    "status": 1,
+    "customer_price": 1,
+    "carrier_cost": 1,
+    "accessorial_charges": 1,
+    "quick_pay_discount": 1,
+    "other_costs": 1,
+    "total_miles": 1,
+    "stops.city": 1,
+    "stops.state": 1,
+    "delivered_at": 1,
+    "actual_delivery_date": 1,
+    "scheduled_delivery": 1,
+    "delivery_date": 1,
+    "created_at": 1,
+}
+
+TENDER_PROJECTION = {"shipment_id": 1, "carrier_id": 1, "status": 1, "created_at": 1}
+
+_BATCH_SIZE = 1000
+
+
+def day_key(value: datetime) -> str:
+    """Rollup day bucket (UTC) for a timestamp."""
+    return value.strftime("%Y-%m-%d")
+
+
+def _row(dimension: str, key: str, day: str, metrics: Dict[str, int], **labels: Any) -> dict:
+    return {
+        "_id": f"{dimension}:{key}:{day}",
+        "dimension": dimension,
+        "key": key,
+        "day": day,
+        "labels": labels,
+        "metrics": metrics,
+    }
+
+
+def shipment_rows(shipment: dict) -> List[dict]:
+    """Rollup rows a shipment contributes to, with its metrics for each.
+
+    Customer and lane rows only count priced shipments (``customer_price > 0``)
+    to match the margin and profitability dashboards; carrier rows count every
+    shipment with a carrier and track the priced subset separately.
+    """
+    created_at = shipment.get("created_at")
+    if not created_at:
+        return []
+    day = day_key(created_at)
+
+    price = shipment.get("customer_price") or 0
+    cost = shipment.get("carrier_cost") or 0
+    status = shipment.get("status")
+
+    delivered = status == "delivered"
+    on_time = late = 0
+    if delivered:
+        delivered_at = shipment.get("delivered_at") or shipment.get("actual_delivery_date")
+        scheduled = shipment.get("scheduled_delivery") or shipment.get("delivery_date")
+        if delivered_at and scheduled and delivered_at > scheduled:
+            late = 1
+        else:
+            # Assume on-time if no dates to compare
+            on_time = 1
+
+    low_margin = 0
+    if price > 0 and (price - cost) / price * 100 < LOW_MARGIN_PERCENT:
+        low_margin = 1
+
+    metrics = {
+        "shipment_count": 1,
+        "revenue": price,
+        "cost": cost,
+        "accessorial_cost": shipment.get("accessorial_charges") or 0,
+        "quick_pay_discount": shipment.get("quick_pay_discount") or 0,
+        "other_cost": shipment.get("other_costs") or 0,
+        "low_margin_count": low_margin,
+        "miles": shipment.get("total_miles") or 0,
+        "delivered_count": int(delivered),
+        "on_time_count": on_time,
+        "late_count": late,
+    }
+
+    rows = []
+    if price > 0:
+        rows.append(_row("customer", str(shipment.get("customer_id") or "unknown"), day, metrics))
+
+        stops = shipment.get("stops") or []
+        origin_stop = stops[0] if stops else {}
+        dest_stop = stops[-1] if stops else {}
+        origin = f"{origin_stop.get('city') or 'Unknown'}, {origin_stop.get('state') or '??'}"
+        destination = f"{dest_stop.get('city') or 'Unknown'}, {dest_stop.get('state') or '??'}"
+        rows.append(_row("lane", f"{origin}|{destination}", day, metrics, origin=origin, destination=destination))
+
+    if shipment.get("carrier_id"):
+        carrier_metrics = {
+            **metrics,
+            "priced_count": 1 if price > 0 else 0,
+            "priced_cost": cost if price > 0 else 0,
+        }
+        rows.append(_row("carrier", str(shipment["carrier_id"]), day, carrier_metrics))
+
+    return rows
+
+
+def tender_rows(tender: dict) -> List[dict]:
+    """Rollup rows a tender contributes to (carrier acceptance counts)."""
+    if not tender.get("carrier_id") or not tender.get("created_at"):
+        return []
+    status = tender.get("status")
+    metrics = {
+        "tender_count": 1,
+        "tender_accepted": int(status == "accepted"),
+        "tender_declined": int(status == "declined"),
+    }
+    return [_row("carrier", str(tender["carrier_id"]), day_key(tender["created_at"]), metrics)]
+
+
+def _row_deltas(old_rows: Iterable[dict], new_rows: Iterable[dict]) -> Dict[str, dict]:
+    """Net metric change per rollup row between two contributions."""
+    deltas: Dict[str, dict] = {}
+    for sign, rows in ((-1, old_rows), (1, new_rows)):
+        for row in rows:
+            entry = deltas.setdefault(row["_id"], {
+                "dimension": row["dimension"],
+                "key": row["key"],
+                "day": row["day"],
+                "labels": row.get("labels") or {},
+                "metrics": defaultdict(int),
+            })
+            for name, value in row["metrics"].items():
+                entry["metrics"][name] += sign * value
+    for entry in deltas.values():
+        entry["metrics"] = {k: v for k, v in entry["metrics"].items() if v}
+    return {row_id: entry for row_id, entry in deltas.items() if entry["metrics"]}
+
+
+def _row_update(row_id: str, entry: dict) -> UpdateOne:
+    return UpdateOne(
+        {"_id": row_id},
+        {
+            "$inc": {f"metrics.{name}": value for name, value in entry["metrics"].items()},
+            "$setOnInsert": {
+                "dimension": entry["dimension"],
+                "key": entry["key"],
+                "day": entry["day"],
+                **entry["labels"],
+            },
+        },
+        upsert=True,
+    )
+
+
+class AnalyticsRollupService:
+    """Maintains and reads the ``analytics_rollups`` collection."""
+
+    @staticmethod
+    async def _replace_contribution(source_id: str, rows: List[dict]) -> List[dict]:
+        """Store a source's new contribution atomically; returns the rows it replaced."""
+        db = get_database()
+        if rows:
+            previous = await db.analytics_rollup_contributions.find_one_and_replace(
+                {"_id": source_id},
+                {"_id": source_id, "day": rows[0]["day"], "rows": rows},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        else:
+            previous = await db.analytics_rollup_contributions.find_one_and_delete({"_id": source_id})
+        return previous["rows"] if previous else []
+
+    @staticmethod
+    async def _apply_deltas(old_rows: Iterable[dict], new_rows: Iterable[dict]) -> None:
+        deltas = _row_deltas(old_rows, new_rows)
+        if deltas:
+            db = get_database()
+            await db.analytics_rollups.bulk_write(
+                [_row_update(row_id, entry) for row_id, entry in deltas.items()],
+                ordered=False,
+            )
+
+    @staticmethod
+    async def _swap_contribution(source_id: str, rows: List[dict]) -> None:
+        previous = await AnalyticsRollupService._replace_contribution(source_id, rows)
+        await AnalyticsRollupService._apply_deltas(previous, rows)
+
+    @staticmethod
+    async def apply_shipment(shipment_id: Union[str, ObjectId]) -> None:
+        """Bring the rollups in line with the current state of a shipment.
+
+        A deleted shipment has its contribution removed. Failures are logged
+        rather than raised: rollups are derived data and are repaired by
+        :meth:`rebuild`.
+        """
+        db = get_database()
+        shipment_oid = ObjectId(shipment_id) if isinstance(shipment_id, str) else shipment_id
+        try:
+            shipment = await db.shipments.find_one({"_id": shipment_oid}, SHIPMENT_PROJECTION)
+            rows = shipment_rows(shipment) if shipment else []
+            await AnalyticsRollupService._swap_contribution(f"shipment:{shipment_oid}", rows)
+        except Exception as e:
+            logger.warning(f"Analytics rollup update failed for shipment {shipment_oid}: {e}")
+
+    @staticmethod
+    async def apply_shipments(shipment_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Bring the rollups in line with several shipments at once.
+
+        The shipments are read with one ``$in`` query and the summed deltas
+        applied with one ``bulk_write``; each contribution is still swapped
+        atomically, with the swaps running concurrently.
+        """
+        db = get_database()
+        oids = list({ObjectId(i) if isinstance(i, str) else i for i in shipment_ids})
+        if not oids:
+            return
+        try:
+            shipments = {
+                s["_id"]: s
+                async for s in db.shipments.find({"_id": {"$in": oids}}, SHIPMENT_PROJECTION)
+            }
+            new_rows = {oid: shipment_rows(shipments[oid]) if oid in shipments else [] for oid in oids}
+            previous = await asyncio.gather(*(
+                AnalyticsRollupService._replace_contribution(f"shipment:{oid}", rows)
+                for oid, rows in new_rows.items()
+            ))
+            await AnalyticsRollupService._apply_deltas(
+                [row for rows in previous for row in rows],
+                [row for rows in new_rows.values() for row in rows],
+            )
+        except Exception as e:
+            logger.warning(f"Analytics rollup update failed for {len(oids)} shipments: {e}")
+
+    @staticmethod
+    async def apply_new_shipments(shipments: List[dict]) -> None:
+        """Add the contributions of freshly inserted shipments in bulk.
+
+        The shipments must have no previous contribution, so nothing needs
+        swapping: contributions are inserted and the summed deltas applied
+        with one ``bulk_write``.
+        """
+        db = get_database()
+        try:
+            contributions = []
+            all_rows: List[dict] = []
+            for shipment in shipments:
+                rows = shipment_rows(shipment)
+                if rows:
+                    contributions.append({"_id": f"shipment:{shipment['_id']}", "day": rows[0]["day"], "rows": rows})
+                    all_rows.extend(rows)
+            if contributions:
+                await db.analytics_rollup_contributions.insert_many(contributions, ordered=False)
+            deltas = _row_deltas([], all_rows)
+            if deltas:
+                await db.analytics_rollups.bulk_write(
+                    [_row_update(row_id, entry) for row_id, entry in deltas.items()],
+                    ordered=False,
+                )
+        except Exception as e:
+            logger.warning(f"Analytics rollup bulk update failed for {len(shipments)} shipments: {e}")
+
+    @staticmethod
+    async def apply_tender(tender_id: Union[str, ObjectId]) -> None:
+        """Bring the carrier tender counts in line with a tender's status."""
+        db = get_database()
+        tender_oid = ObjectId(tender_id) if isinstance(tender_id, str) else tender_id
+        try:
+            tender = await db.tenders.find_one({"_id": tender_oid}, TENDER_PROJECTION)
+            rows = tender_rows(tender) if tender else []
+            await AnalyticsRollupService._swap_contribution(f"tender:{tender_oid}", rows)
+        except Exception as e:
+            logger.warning(f"Analytics rollup update failed for tender {tender_oid}: {e}")
+
+    @staticmethod
+    async def rebuild(since: Optional[datetime] = None) -> Dict[str, int]:
+        """Recompute rollups from shipments and tenders.
+
+        With ``since`` only days on or after that date are rebuilt; otherwise
+        everything is dropped and regenerated. Source documents are streamed,
+        so memory is bounded by the number of rollup rows, not shipments.
+        """
+        db = get_database()
+        day_filter: Dict[str, Any] = {}
+        created_filter: Dict[str, Any] = {}
+        if since:
+            start = since.replace(hour=0, minute=0, second=0, microsecond=0)
+            day_filter = {"day": {"$gte": day_key(start)}}
+            created_filter = {"created_at": {"$gte": start}}
+
+        await db.analytics_rollups.delete_many(day_filter)
+        await db.analytics_rollup_contributions.delete_many(day_filter)
+
+        totals: Dict[str, dict] = {}
+        counts = {"shipments": 0, "tenders": 0}
+
+        sources = (
+            ("shipments", "shipment", db.shipments, SHIPMENT_PROJECTION, shipment_rows),
+            ("tenders", "tender", db.tenders, TENDER_PROJECTION, tender_rows),
+        )
+        for label, prefix, collection, projection, compute in sources:
+            batch = []
+            async for doc in collection.find(created_filter, projection).batch_size(_BATCH_SIZE):
+                rows = compute(doc)
+                if not rows:
+                    continue
+                counts[label] += 1
+                source_id = f"{prefix}:{doc['_id']}"
+                batch.append(ReplaceOne(
+                    {"_id": source_id},
+                    {"_id": source_id, "day": rows[0]["day"], "rows": rows},
+                    upsert=True,
+                ))
+                for row_id, entry in _row_deltas([], rows).items():
+                    total = totals.setdefault(row_id, {**entry, "metrics": defaultdict(int)})
+                    for name, value in entry["metrics"].items():
+                        total["metrics"][name] += value
+                if len(batch) >= _BATCH_SIZE:
+                    await db.analytics_rollup_contributions.bulk_write(batch, ordered=False)
+                    batch = []
+            if batch:
+                await db.analytics_rollup_contributions.bulk_write(batch, ordered=False)
+
+        updates = [_row_update(row_id, {**entry, "metrics": dict(entry["metrics"])}) for row_id, entry in totals.items()]
+        for i in range(0, len(updates), _BATCH_SIZE):
+            await db.analytics_rollups.bulk_write(updates[i:i + _BATCH_SIZE], ordered=False)
+
+        counts["rows"] = len(updates)
+        logger.info(f"Rebuilt analytics rollups: {counts}")
+        return counts
+
+    @staticmethod
+    async def get_rows(
+        dimension: str,
+        start: datetime,
+        end: Optional[datetime] = None,
+        keys: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """Rollup rows for a dimension with ``start <= day < end``.
+
+        ``start`` is widened to the start of its day, so a "last 30 days"
+        window includes the whole first day.
+        """
+        db = get_database()
+        day_range: Dict[str, str] = {"$gte": day_key(start)}
+        if end:
+            day_range["$lt"] = day_key(end)
+        query: Dict[str, Any] = {"dimension": dimension, "day": day_range}
+        if keys is not None:
+            query["key"] = {"$in": keys}
+        return await db.analytics_rollups.find(query).to_list(None)
+
+
+def sum_rows(rows: Iterable[dict], group_by: str = "key") -> Dict[str, Dict[str, Any]]:
+    """Sum rollup row metrics grouped by ``key`` or ``day`` (or any row field)."""
+    grouped: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        bucket = grouped.setdefault(row[group_by], defaultdict(int))
+        for name, value in row.get("metrics", {}).items():
+            bucket[name] += value
+    return grouped
+
+
+def resolve_ids(keys: Iterable[str]) -> List[ObjectId]:
+    """ObjectIds for the rollup keys that are valid ids (skips ``unknown``)."""
+    return [ObjectId(k) for k in keys if ObjectId.is_valid(k)]
+
+
+shipment_changes.subscribe(
+    "Analytics rollups",
+    shipment=AnalyticsRollupService.apply_shipment,
+    shipments=AnalyticsRollupService.apply_shipments,
+    new_shipments=AnalyticsRollupService.apply_new_shipments,
+    tender=AnalyticsRollupService.apply_tender,
+)
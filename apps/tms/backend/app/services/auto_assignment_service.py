@@ -6,6 +6,7 @@ from bson import ObjectId
 from app.database import get_database
 from app.models.base import utc_now
 from app.services.waterfall_service import WaterfallService, WaterfallConfig
+from app.services.shipment_changes import shipment_changes
 
 logger = logging.getLogger(__name__)
 
@@ -257,6 +258,7 @@ class AutoAssignmentService:
                 "updated_at": utc_now(),
             }
             result = await db.tenders.insert_one(tender)
+            await shipment_changes.tender_changed(result.inserted_id)
 
             return {
                 "status": "tender_sent",
@@ -466,6 +468,7 @@ class AutoAssignmentService:
                 "updated_at": utc_now(),
             }
             result = await db.tenders.insert_one(tender)
+            await shipment_changes.tender_changed(result.inserted_id)
 
             logger.info(
                 f"Auto-tendered shipment {shipment_id} to carrier {top['carrier_name']} "
@@ -514,6 +517,7 @@ class AutoAssignmentService:
                     "updated_at": utc_now(),
                 }
                 result = await db.tenders.insert_one(tender)
+                await shipment_changes.tender_changed(result.inserted_id)
                 return {
                     "status": "tender_sent",
                     "tender_id": str(result.inserted_id),
@@ -0,0 +1,238 @@
+"""Batch GPS auto-tracking for shipments.
+
+Telematics feeds post hundreds of GPS points per call. Each shipment's points
+are walked by a pure state machine (:func:`walk_points`) that decides stop
+arrivals and departures and check-call intervals locally. The resulting
+tracking events for every shipment in a call are written with one
+``insert_many`` and status changes with one ``bulk_write``; the only reads
+are one shipments ``$in`` and one aggregation for each shipment's latest
+auto-GPS event.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.database import get_database
+from app.models.tracking import TrackingEvent, TrackingEventType
+from app.services.shipment_changes import shipment_changes
+from app.services.live_position_service import LivePositionService
+from app.services.portal_read_model import PortalReadModelService
+from app.services.tracking_service import TrackingService
+
+AUTO_GPS_SOURCE = "auto_gps"
+# A point within this many degrees of a stop (lat and lon) is at the stop
+STOP_PROXIMITY_DEGREES = 0.008
+STOPPED_MPH = 5
+MOVING_MPH = 10
+# Minimum gap between auto-generated in-transit check calls
+CHECK_CALL_INTERVAL_SECONDS = 7200
+
+_SHIPMENT_FIELDS = {"status": 1, "stops": 1, "carrier_id": 1}
+
+
+@dataclass
+class DetectedEvent:
+    event_type: TrackingEventType
+    timestamp: datetime
+    latitude: float
+    longitude: float
+
+
+@dataclass
+class WalkResult:
+    """Outcome of walking one shipment's GPS points."""
+    status: Optional[str]
+    status_changed: bool = False
+    events: List[DetectedEvent] = field(default_factory=list)
+    detected_states: List[str] = field(default_factory=list)
+
+
+def _near(stop: Optional[dict], latitude: float, longitude: float) -> bool:
+    return bool(
+        stop and stop.get("latitude")
+        and abs(latitude - stop["latitude"]) < STOP_PROXIMITY_DEGREES
+        and abs(longitude - stop["longitude"]) < STOP_PROXIMITY_DEGREES
+    )
+
+
+def _timestamp(value, now: datetime) -> datetime:
+    """Point timestamps as naive UTC (how Mongo returns event timestamps)."""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+    else:
+        return now
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def stops_of(shipment: dict) -> tuple:
+    """The (pickup, delivery) stops of a shipment, if any."""
+    stops = shipment.get("stops", [])
+    return (
+        next((s for s in stops if s.get("stop_type") == "pickup"), None),
+        next((s for s in stops if s.get("stop_type") == "delivery"), None),
+    )
+
+
+def walk_points(
+    points: List[dict],
+    status: Optional[str],
+    pickup_stop: Optional[dict],
+    delivery_stop: Optional[dict],
+    last_auto_gps_at: Optional[datetime],
+    now: datetime,
+) -> WalkResult:
+    """Run the auto-tracking state machine over a shipment's points, in order.
+
+    ``last_auto_gps_at`` is the timestamp of the shipment's latest auto-GPS
+    event; events detected along the way count toward the check-call
+    interval just as stored ones do. ``now`` (naive UTC) stamps points that
+    carry no timestamp.
+    """
+    result = WalkResult(status=status)
+    initial_status = status
+
+    for point in points:
+        lat = point.get("latitude")
+        lon = point.get("longitude")
+        speed = point.get("speed_mph", 0)
+        if not lat or not lon:
+            continue
+        timestamp = _timestamp(point.get("timestamp"), now)
+        near_pickup = _near(pickup_stop, lat, lon)
+
+        event_type = None
+        if near_pickup and speed < STOPPED_MPH and status in ["booked", "pending_pickup"]:
+            event_type, status = TrackingEventType.ARRIVED_AT_PICKUP, "pending_pickup"
+            result.detected_states.append("arrived_at_pickup")
+        elif not near_pickup and status == "pending_pickup" and speed > MOVING_MPH:
+            event_type, status = TrackingEventType.DEPARTED_PICKUP, "in_transit"
+            result.detected_states.append("departed_pickup")
+        elif _near(delivery_stop, lat, lon) and speed < STOPPED_MPH and status == "in_transit":
+            event_type, status = TrackingEventType.ARRIVED_AT_DELIVERY, "out_for_delivery"
+            result.detected_states.append("arrived_at_delivery")
+        elif speed > MOVING_MPH and status == "in_transit":
+            if not last_auto_gps_at or (timestamp - last_auto_gps_at).total_seconds() > CHECK_CALL_INTERVAL_SECONDS:
+                event_type = TrackingEventType.CHECK_CALL
+                result.detected_states.append("in_transit")
+
+        if event_type:
+            result.events.append(DetectedEvent(event_type, timestamp, lat, lon))
+            if last_auto_gps_at is None or timestamp > last_auto_gps_at:
+                last_auto_gps_at = timestamp
+
+    result.status = status
+    result.status_changed = status != initial_status
+    return result
+
+
+def _next_check_call(distance_remaining: Optional[float], now: datetime) -> Optional[datetime]:
+    if not distance_remaining:
+        return None
+    hours = 4 if distance_remaining > 200 else (2 if distance_remaining > 50 else 1)
+    return now + timedelta(hours=hours)
+
+
+class AutoTrackingService:
+    """Applies batches of GPS points to shipments."""
+
+    @staticmethod
+    async def process(points_by_shipment: Dict[ObjectId, List[dict]]) -> Dict[ObjectId, dict]:
+        """Walk each shipment's points and commit the results in bulk.
+
+        Returns a result dict per shipment found (events_generated,
+        detected_states, current_state, next_check_call_at, eta,
+        distance_remaining_miles); unknown shipments are left out.
+        """
+        db = get_database()
+        now = datetime.utcnow()
+        shipment_ids = list(points_by_shipment)
+
+        shipments = {
+            s["_id"]: s
+            async for s in db.shipments.find({"_id": {"$in": shipment_ids}}, _SHIPMENT_FIELDS)
+        }
+        if not shipments:
+            return {}
+        last_auto_gps = {
+            row["_id"]: row["last"]
+            async for row in db.tracking_events.aggregate([
+                {"$match": {"shipment_id": {"$in": list(shipments)}, "source": AUTO_GPS_SOURCE}},
+                {"$group": {"_id": "$shipment_id", "last": {"$max": "$event_timestamp"}}},
+            ])
+        }
+
+        results: Dict[ObjectId, dict] = {}
+        events: List[dict] = []
+        status_updates: List[UpdateOne] = []
+        changed: List[ObjectId] = []
+        positions: List[dict] = []
+
+        for shipment_oid, shipment in shipments.items():
+            points = points_by_shipment[shipment_oid]
+            pickup_stop, delivery_stop = stops_of(shipment)
+            walk = walk_points(
+                points, shipment.get("status"), pickup_stop, delivery_stop, last_auto_gps.get(shipment_oid), now
+            )
+
+            events += [
+                TrackingEvent(
+                    shipment_id=shipment_oid, event_type=e.event_type,
+                    event_timestamp=e.timestamp, reported_at=now,
+                    latitude=e.latitude, longitude=e.longitude,
+                    description=f"Auto-detected: {e.event_type.value}", source=AUTO_GPS_SOURCE,
+                ).model_dump_mongo()
+                for e in walk.events
+            ]
+            if walk.status_changed:
+                status_updates.append(UpdateOne(
+                    {"_id": shipment_oid},
+                    {"$set": {"status": walk.status, "last_check_call": now, "updated_at": now}},
+                ))
+                changed.append(shipment_oid)
+
+            last_fix = next((p for p in reversed(points) if p.get("latitude") and p.get("longitude")), None)
+            if last_fix:
+                positions.append({
+                    "shipment_id": shipment_oid,
+                    "latitude": last_fix["latitude"],
+                    "longitude": last_fix["longitude"],
+                    "source": AUTO_GPS_SOURCE,
+                    "carrier_id": shipment.get("carrier_id"),
+                    "speed_mph": last_fix.get("speed_mph"),
+                })
+
+            eta = distance_remaining = None
+            last_point = points[-1] if points else None
+            if last_point and last_point.get("latitude") and last_point.get("longitude") \
+                    and delivery_stop and delivery_stop.get("latitude"):
+                eta, distance_remaining = TrackingService.calculate_eta(
+                    last_point["latitude"], last_point["longitude"],
+                    delivery_stop["latitude"], delivery_stop["longitude"],
+                )
+
+            results[shipment_oid] = {
+                "events_generated": len(walk.events),
+                "detected_states": walk.detected_states,
+                "current_state": walk.status,
+                "next_check_call_at": _next_check_call(distance_remaining, now),
+                "eta": eta,
+                "distance_remaining_miles": distance_remaining,
+            }
+
+        if events:
+            await db.tracking_events.insert_many(events, ordered=False)
+        if status_updates:
+            await db.shipments.bulk_write(status_updates, ordered=False)
+            await shipment_changes.shipments_changed(changed)
+        if events:
+            # Shipments whose status changed were refreshed through shipment_changes
+            await PortalReadModelService.apply_shipments({e["shipment_id"] for e in events} - set(changed))
+        await LivePositionService.record_positions(positions)
+        return results
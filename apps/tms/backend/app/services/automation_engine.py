@@ -1,11 +1,23 @@
-"""Automation engine for evaluating and executing automation rules."""
-
+"""Automation engine for evaluating and executing automation rules.
+
+Enabled rules are compiled once into per-trigger lists of closures
+(:class:`AutomationRuleCache`), so ``process_trigger`` matches an event
+against hundreds of rules without touching the database. Trigger counters
+and shadow-mode logs are buffered and written with periodic ``bulk_write``
+flushes (:func:`flush_trigger_stats`), run by :data:`trigger_stats_flusher`
+every ``STATS_FLUSH_INTERVAL_SECONDS`` and on shutdown. A failed flush
+merges its counts back into the buffer for the next one.
+"""
+
+import asyncio
 import logging
 import random
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from bson import ObjectId
+from pymongo import UpdateOne
 
 from app.database import get_database
 from app.models.automation import (
@@ -14,6 +26,8 @@ from app.models.automation import (
     AutomationTrigger,
     RolloutStage,
 )
+from app.models.base import utc_now
+from app.services.shipment_changes import shipment_changes
 
 logger = logging.getLogger(__name__)
 
@@ -184,6 +198,7 @@ async def execute_action(
                         {"_id": entity_id},
                         {"$set": {"status": new_status, "updated_at": datetime.utcnow()}}
                     )
+                    await shipment_changes.shipment_changed(entity_id)
                 elif "work_type" in entity_data:
                     await db.work_items.update_one(
                         {"_id": entity_id},
@@ -205,6 +220,7 @@ async def execute_action(
                     {"_id": entity_id},
                     {"$set": {"carrier_id": ObjectId(carrier_id), "updated_at": datetime.utcnow()}}
                 )
+                await shipment_changes.shipment_changed(entity_id)
             result["executed"] = True
         else:
             result["executed"] = False
@@ -248,30 +264,313 @@ async def execute_action(
     return result
 
 
+# ============================================================================
+# Compiled rules
+# ============================================================================
+
+# Seconds a compiled rule set is served before re-reading (covers writes made
+# by other processes; local writes invalidate immediately)
+RULE_CACHE_TTL_SECONDS = 30.0
+
+Check = Callable[[dict], bool]
+
+
+def _never(data: dict) -> bool:
+    return False
+
+
+def _compile_path(path: str) -> Callable[[dict], Any]:
+    """Pre-split a dot path into a resolver equivalent to :func:`_resolve_dotpath`."""
+    parts = tuple(path.split("."))
+    if len(parts) == 1:
+        key = parts[0]
+
+        def resolve_key(data: dict) -> Any:
+            return data.get(key)
+        return resolve_key
+
+    def resolve(data: dict) -> Any:
+        current = data
+        for part in parts:
+            if not isinstance(current, dict):
+                return None
+            current = current.get(part)
+            if current is None:
+                return None
+        return current
+    return resolve
+
+
+def compile_condition(condition: dict) -> Check:
+    """Turn a condition into a closure with the semantics of :func:`evaluate_condition`.
+
+    Operands are normalised once (stringified, lower-cased, parsed as float)
+    so evaluation is a path lookup and a comparison.
+    """
+    resolve = _compile_path(condition.get("field", ""))
+    operator = condition.get("operator", "equals")
+    expected = condition.get("value")
+
+    if operator in ("equals", "not_equals"):
+        target = str(expected)
+        negate = operator == "not_equals"
+
+        def check_equals(data: dict) -> bool:
+            actual = resolve(data)
+            return actual is not None and (str(actual) == target) != negate
+        return check_equals
+
+    if operator in ("greater_than", "less_than"):
+        try:
+            bound = float(expected)
+        except (ValueError, TypeError):
+            return _never
+        greater = operator == "greater_than"
+
+        def check_compare(data: dict) -> bool:
+            actual = resolve(data)
+            if actual is None:
+                return False
+            try:
+                value = float(actual)
+            except (ValueError, TypeError):
+                return False
+            return value > bound if greater else value < bound
+        return check_compare
+
+    if operator == "contains":
+        needle = str(expected).lower()
+
+        def check_contains(data: dict) -> bool:
+            actual = resolve(data)
+            return actual is not None and needle in str(actual).lower()
+        return check_contains
+
+    if operator == "in":
+        if isinstance(expected, list):
+            options = frozenset(str(v) for v in expected)
+        else:
+            # Treat comma-separated string as list
+            options = frozenset(v.strip() for v in str(expected).split(","))
+
+        def check_in(data: dict) -> bool:
+            actual = resolve(data)
+            return actual is not None and str(actual) in options
+        return check_in
+
+    if operator == "starts_with":
+        prefix = str(expected).lower()
+
+        def check_starts_with(data: dict) -> bool:
+            actual = resolve(data)
+            return actual is not None and str(actual).lower().startswith(prefix)
+        return check_starts_with
+
+    return _never
+
+
+class CompiledRule:
+    """An enabled rule with its conditions compiled to closures."""
+
+    __slots__ = (
+        "id", "name", "trigger", "conditions", "checks", "action", "action_config",
+        "rollout_stage", "rollout_percentage", "priority",
+    )
+
+    def __init__(self, rule: AutomationRule):
+        self.id = rule.id
+        self.name = rule.name
+        self.trigger = rule.trigger.value
+        self.conditions = rule.conditions
+        self.checks: Tuple[Check, ...] = tuple(compile_condition(c) for c in rule.conditions)
+        self.action = rule.action
+        self.action_config = rule.action_config
+        self.rollout_stage = rule.rollout_stage
+        self.rollout_percentage = rule.rollout_percentage
+        self.priority = rule.priority
+
+    def matches(self, entity_data: dict) -> bool:
+        """True when every condition holds (AND logic)."""
+        for check in self.checks:
+            if not check(entity_data):
+                return False
+        return True
+
+
+_rules: Optional[Dict[str, List[CompiledRule]]] = None
+_rules_expires = 0.0
+_rules_generation = 0
+_rules_lock = asyncio.Lock()
+
+
+class AutomationRuleCache:
+    """Process-wide compiled rules for enabled automations, by trigger."""
+
+    @staticmethod
+    async def get() -> Dict[str, List[CompiledRule]]:
+        """Compiled rules by trigger, highest priority first."""
+        global _rules, _rules_expires
+        if _rules is not None and _rules_expires > time.monotonic():
+            return _rules
+        async with _rules_lock:
+            if _rules is not None and _rules_expires > time.monotonic():
+                return _rules
+            generation = _rules_generation
+            rules = await AutomationRuleCache.build()
+            # A rule written during the build may be missing; serve once, don't keep
+            if generation == _rules_generation:
+                _rules, _rules_expires = rules, time.monotonic() + RULE_CACHE_TTL_SECONDS
+            return rules
+
+    @staticmethod
+    async def build() -> Dict[str, List[CompiledRule]]:
+        """Compile every enabled rule."""
+        db = get_database()
+        by_trigger: Dict[str, List[CompiledRule]] = {}
+        async for doc in db.automation_rules.find({"enabled": True}).sort("priority", -1):
+            try:
+                rule = CompiledRule(AutomationRule(**doc))
+            except Exception as e:
+                logger.warning(f"Skipping invalid automation rule {doc.get('_id')}: {e}")
+                continue
+            by_trigger.setdefault(rule.trigger, []).append(rule)
+        return by_trigger
+
+    @staticmethod
+    def invalidate() -> None:
+        """Drop the compiled rules; the next trigger recompiles them."""
+        global _rules, _rules_generation
+        _rules = None
+        _rules_generation += 1
+
+
+# ============================================================================
+# Trigger statistics
+# ============================================================================
+
+# Pending trigger counters and shadow-log entries are written with one
+# bulk_write once this many have accumulated or this much time has passed
+STATS_FLUSH_MAX_EVENTS = 500
+STATS_FLUSH_INTERVAL_SECONDS = 5.0
+SHADOW_LOG_SIZE = 20
+
+# rule id -> {"count", "last_triggered_at", "shadow_log"}
+_pending_stats: Dict[ObjectId, dict] = {}
+_pending_events = 0
+_last_flush = time.monotonic()
+
+
+def record_rule_trigger(rule_id: ObjectId, shadow_result: Optional[dict] = None) -> None:
+    """Buffer a trigger (and shadow-mode result) for the next stats flush."""
+    global _pending_events
+    now = utc_now()
+    stats = _pending_stats.setdefault(rule_id, {"count": 0, "last_triggered_at": now, "shadow_log": []})
+    stats["count"] += 1
+    stats["last_triggered_at"] = now
+    if shadow_result is not None:
+        stats["shadow_log"].append({**shadow_result, "timestamp": now.isoformat()})
+        del stats["shadow_log"][:-SHADOW_LOG_SIZE]
+    _pending_events += 1
+
+
+async def flush_trigger_stats() -> int:
+    """Write buffered trigger counters and shadow logs; returns rules updated.
+
+    Counters are ``$inc``-ed and shadow entries ``$push``-ed with a slice, so
+    flushes from several processes combine instead of overwriting.
+    """
+    global _pending_stats, _pending_events, _last_flush
+    pending, pending_events, _pending_stats = _pending_stats, _pending_events, {}
+    _pending_events = 0
+    _last_flush = time.monotonic()
+    if not pending:
+        return 0
+
+    ops = []
+    for rule_id, stats in pending.items():
+        update: Dict[str, Any] = {
+            "$inc": {"trigger_count": stats["count"]},
+            "$max": {"last_triggered_at": stats["last_triggered_at"], "updated_at": stats["last_triggered_at"]},
+        }
+        if stats["shadow_log"]:
+            update["$push"] = {"shadow_log": {"$each": stats["shadow_log"], "$slice": -SHADOW_LOG_SIZE}}
+        ops.append(UpdateOne({"_id": rule_id}, update))
+    try:
+        await get_database().automation_rules.bulk_write(ops, ordered=False)
+    except Exception as e:
+        logger.warning(f"Failed to flush trigger stats for {len(ops)} automation rules: {e}")
+        _merge_unflushed(pending, pending_events)
+        return 0
+    return len(ops)
+
+
+def _merge_unflushed(pending: Dict[ObjectId, dict], events: int) -> None:
+    """Put the stats of a failed flush back ahead of those buffered since."""
+    global _pending_events
+    for rule_id, stats in pending.items():
+        newer = _pending_stats.get(rule_id)
+        if newer is not None:
+            stats["count"] += newer["count"]
+            stats["last_triggered_at"] = max(stats["last_triggered_at"], newer["last_triggered_at"])
+            stats["shadow_log"] = (stats["shadow_log"] + newer["shadow_log"])[-SHADOW_LOG_SIZE:]
+        _pending_stats[rule_id] = stats
+    _pending_events += events
+
+
+async def _maybe_flush_trigger_stats() -> None:
+    if _pending_events >= STATS_FLUSH_MAX_EVENTS or (
+        _pending_events and time.monotonic() - _last_flush >= STATS_FLUSH_INTERVAL_SECONDS
+    ):
+        await flush_trigger_stats()
+
+
+class TriggerStatsFlusher:
+    """Flushes buffered trigger stats every ``STATS_FLUSH_INTERVAL_SECONDS``."""
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(STATS_FLUSH_INTERVAL_SECONDS)
+            try:
+                await _maybe_flush_trigger_stats()
+            except Exception as e:
+                logger.error(f"Trigger stats flush failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await flush_trigger_stats()
+
+
+trigger_stats_flusher = TriggerStatsFlusher()
+
+
 async def process_trigger(
     trigger_type: AutomationTrigger,
     entity_data: dict,
+    explain: bool = False,
 ) -> List[dict]:
     """Process a trigger event against all matching automation rules.
 
-    Finds enabled rules matching the trigger, evaluates conditions, and
-    executes actions based on rollout stage.
+    Evaluates the compiled enabled rules for the trigger and executes actions
+    based on rollout stage. Matching needs no database access; trigger
+    counters and shadow logs are buffered and flushed in bulk. With
+    ``explain=True`` each result carries per-condition details.
 
     Returns a list of result dicts for each rule processed.
     """
-    db = get_database()
-
-    # Find all enabled rules for this trigger, ordered by priority desc
-    cursor = db.automation_rules.find({
-        "trigger": trigger_type,
-        "enabled": True,
-    }).sort("priority", -1)
-
-    rules_docs = await cursor.to_list(200)
+    rules_by_trigger = await AutomationRuleCache.get()
     results = []
 
-    for doc in rules_docs:
-        rule = AutomationRule(**doc)
+    for rule in rules_by_trigger.get(getattr(trigger_type, "value", trigger_type), ()):
         result = {
             "rule_id": str(rule.id),
             "rule_name": rule.name,
@@ -287,11 +586,10 @@ async def process_trigger(
             continue
 
         # Evaluate conditions
-        conditions_met, condition_details = evaluate_conditions(
-            rule.conditions, entity_data
-        )
+        conditions_met = rule.matches(entity_data)
         result["conditions_met"] = conditions_met
-        result["condition_details"] = condition_details
+        if explain:
+            result["condition_details"] = evaluate_conditions(rule.conditions, entity_data)[1]
 
         if not conditions_met:
             result["skipped"] = True
@@ -309,22 +607,12 @@ async def process_trigger(
             result["shadow"] = True
 
             # Record to shadow log
-            rule.record_shadow_result({
+            record_rule_trigger(rule.id, {
                 "conditions_met": conditions_met,
                 "action_would_fire": True,
                 "action": rule.action,
                 "entity_id": str(entity_data.get("_id", "")),
             })
-            rule.record_trigger()
-            await db.automation_rules.update_one(
-                {"_id": rule.id},
-                {"$set": {
-                    "shadow_log": rule.shadow_log,
-                    "trigger_count": rule.trigger_count,
-                    "last_triggered_at": rule.last_triggered_at,
-                    "updated_at": rule.updated_at,
-                }}
-            )
 
         elif rule.rollout_stage == RolloutStage.PARTIAL:
             # Execute based on rollout_percentage
@@ -343,15 +631,7 @@ async def process_trigger(
                 result["partial_executed"] = False
                 result["reason"] = f"Random roll {roll} exceeded rollout percentage {rule.rollout_percentage}"
 
-            rule.record_trigger()
-            await db.automation_rules.update_one(
-                {"_id": rule.id},
-                {"$set": {
-                    "trigger_count": rule.trigger_count,
-                    "last_triggered_at": rule.last_triggered_at,
-                    "updated_at": rule.updated_at,
-                }}
-            )
+            record_rule_trigger(rule.id)
 
         elif rule.rollout_stage == RolloutStage.FULL:
             # Execute for real
@@ -361,18 +641,11 @@ async def process_trigger(
             result["action_result"] = action_result
             result["executed"] = True
 
-            rule.record_trigger()
-            await db.automation_rules.update_one(
-                {"_id": rule.id},
-                {"$set": {
-                    "trigger_count": rule.trigger_count,
-                    "last_triggered_at": rule.last_triggered_at,
-                    "updated_at": rule.updated_at,
-                }}
-            )
+            record_rule_trigger(rule.id)
 
         results.append(result)
 
+    await _maybe_flush_trigger_stats()
     return results
 
 
@@ -0,0 +1,518 @@
+"""Set-based batch invoice generation.
+
+Uninvoiced delivered shipments are found with one aggregation per chunk: a
+``$lookup`` against ``invoices.shipment_ids`` keeps only shipments with no
+invoice (an anti-join). Each chunk then loads its customers with one ``$in``,
+writes its invoices with one unordered ``insert_many`` under placeholder
+numbers and then numbers the inserted ones from one ``$inc``, so a failed
+insert never uses up a number of the gapless invoice sequence.
+
+Only one batch run (background job or inline request) invoices at a time:
+each run holds the lease in ``invoice_batch_locks``, taken atomically before
+it starts and renewed after every chunk.
+
+Large runs are background jobs in ``invoice_batch_jobs``. A job walks
+shipments (or customers, when consolidating) in ``_id`` order and stores its
+position after every chunk, so a failed or interrupted job resumes where it
+stopped; shipments invoiced meanwhile drop out of the anti-join.
+"""
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.database import get_database
+from app.models.base import utc_now
+from app.models.invoice import Invoice, InvoiceLineItem, InvoiceStatus
+from app.services.exception_detection import ExceptionDetectionService
+from app.services.number_generator import NumberGenerator
+from app.services.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+# Shipments (or customers, when consolidating) per chunk
+BATCH_CHUNK_SIZE = 200
+CONSOLIDATE_CHUNK_CUSTOMERS = 50
+# Errors kept on a job document
+MAX_JOB_ERRORS = 100
+# A run that has not renewed its lease (or job heartbeat) for this long is considered dead
+STALE_JOB_MINUTES = 15
+# Lock document held by the batch run that is invoicing
+BATCH_LOCK_ID = "batch_invoicing"
+# Invoice numbers of inserted invoices not yet numbered
+PENDING_NUMBER_PREFIX = "PENDING-"
+
+SHIPMENT_FIELDS = {
+    "customer_id": 1,
+    "status": 1,
+    "shipment_number": 1,
+    "customer_price": 1,
+    "stops.city": 1,
+    "stops.state": 1,
+}
+
+_INVOICE_LOOKUP = {
+    "$lookup": {
+        "from": "invoices",
+        "localField": "_id",
+        "foreignField": "shipment_ids",
+        "pipeline": [{"$limit": 1}, {"$project": {"invoice_number": 1}}],
+        "as": "invoice",
+    }
+}
+
+
+def _uninvoiced(match: Dict[str, Any]) -> List[dict]:
+    """Pipeline stages for delivered shipments matching ``match`` with no invoice."""
+    return [
+        {"$match": {"status": "delivered", **match}},
+        _INVOICE_LOOKUP,
+        {"$match": {"invoice": {"$size": 0}}},
+    ]
+
+
+def _scope(customer_id: Optional[str], shipment_ids: Optional[List[str]]) -> Dict[str, Any]:
+    scope: Dict[str, Any] = {}
+    if customer_id:
+        scope["customer_id"] = ObjectId(customer_id)
+    if shipment_ids is not None:
+        scope["_id"] = {"$in": [ObjectId(sid) for sid in shipment_ids if ObjectId.is_valid(sid)]}
+    return scope
+
+
+def _and(*conditions: Dict[str, Any]) -> Dict[str, Any]:
+    conditions = [c for c in conditions if c]
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions} if conditions else {}
+
+
+def _lane(shipment: dict) -> str:
+    stops = shipment.get("stops") or []
+    origin = stops[0] if stops else {}
+    dest = stops[-1] if len(stops) > 1 else {}
+    return (
+        f"{origin.get('city', 'Origin')}, {origin.get('state', '')} "
+        f"-> {dest.get('city', 'Dest')}, {dest.get('state', '')}"
+    )
+
+
+async def classify_shipments(shipment_ids: List[str]) -> tuple[List[dict], List[str]]:
+    """Results for requested shipments that can't be invoiced, and the rest.
+
+    Returns ``(results, invoiceable_ids)``; one aggregation covers all ids.
+    """
+    db = get_database()
+    results = []
+    valid = []
+    for sid in shipment_ids:
+        if ObjectId.is_valid(sid):
+            valid.append(ObjectId(sid))
+        else:
+            results.append({"shipment_id": sid, "status": "error", "message": "Invalid shipment id"})
+
+    found = {}
+    async for doc in db.shipments.aggregate([
+        {"$match": {"_id": {"$in": valid}}},
+        _INVOICE_LOOKUP,
+        {"$project": {"status": 1, "invoice": 1}},
+    ]):
+        found[doc["_id"]] = doc
+
+    invoiceable = []
+    for oid in valid:
+        doc = found.get(oid)
+        if not doc:
+            results.append({"shipment_id": str(oid), "status": "error", "message": "Shipment not found"})
+        elif doc.get("status") != "delivered":
+            results.append({"shipment_id": str(oid), "status": "skipped", "message": "Not delivered"})
+        elif doc["invoice"]:
+            results.append({
+                "shipment_id": str(oid),
+                "status": "skipped",
+                "message": f"Already invoiced: {doc['invoice'][0].get('invoice_number')}",
+            })
+        else:
+            invoiceable.append(str(oid))
+    return results, invoiceable
+
+
+class BatchInvoicer:
+    """Creates invoices for chunks of shipments, accumulating results."""
+
+    def __init__(self, consolidate: bool = False, auto_send: bool = False, keep_results: bool = True):
+        self.consolidate = consolidate
+        self.auto_send = auto_send
+        self.keep_results = keep_results
+        self.created = 0
+        self.skipped = 0
+        self.errors = 0
+        self.invoices = 0
+        self.results: List[dict] = []
+
+    def record(self, result: dict) -> None:
+        status = result["status"]
+        if status == "created":
+            self.created += 1
+        elif status == "skipped":
+            self.skipped += 1
+        else:
+            self.errors += 1
+        if self.keep_results or (status == "error" and len(self.results) < MAX_JOB_ERRORS):
+            self.results.append(result)
+
+    def _invoice(self, customer: dict, shipments: List[dict], number: str) -> Invoice:
+        now = utc_now()
+        if self.consolidate:
+            line_items = [
+                InvoiceLineItem(
+                    description=f"Freight ({s.get('shipment_number', '?')}): {_lane(s)}",
+                    quantity=1,
+                    unit_price=s.get("customer_price", 0),
+                    shipment_id=str(s["_id"]),
+                )
+                for s in shipments
+            ]
+            notes = f"Batch consolidated invoice for {len(shipments)} shipments"
+        else:
+            (s,) = shipments
+            line_items = [InvoiceLineItem(
+                description=f"Freight: {_lane(s)}",
+                quantity=1,
+                unit_price=s.get("customer_price", 0),
+                shipment_id=str(s["_id"]),
+            )]
+            notes = None
+
+        invoice = Invoice(
+            invoice_number=number,
+            customer_id=customer["_id"],
+            shipment_ids=[s["_id"] for s in shipments],
+            billing_name=customer["name"],
+            billing_email=customer.get("billing_email"),
+            billing_address=customer.get("address_line1"),
+            line_items=line_items,
+            invoice_date=now,
+            due_date=now + timedelta(days=customer.get("payment_terms", 30)),
+            internal_notes=notes,
+        )
+        invoice.calculate_totals()
+        if self.auto_send:
+            invoice.transition_to(InvoiceStatus.PENDING)
+            invoice.transition_to(InvoiceStatus.SENT)
+        return invoice
+
+    async def invoice_chunk(self, shipments: List[dict]) -> None:
+        """Invoice a chunk of uninvoiced delivered shipments."""
+        if not shipments:
+            return
+        db = get_database()
+        customer_ids = list({s["customer_id"] for s in shipments})
+        customers = {
+            c["_id"]: c
+            async for c in db.customers.find(
+                {"_id": {"$in": customer_ids}},
+                {"name": 1, "billing_email": 1, "address_line1": 1, "payment_terms": 1},
+            )
+        }
+
+        groups: List[List[dict]] = []
+        if self.consolidate:
+            by_customer: Dict[Any, List[dict]] = {}
+            for s in shipments:
+                by_customer.setdefault(s["customer_id"], []).append(s)
+            groups = list(by_customer.values())
+        else:
+            groups = [[s] for s in shipments]
+
+        billable = []
+        for group in groups:
+            if group[0]["customer_id"] not in customers:
+                for s in group:
+                    self.record({"shipment_id": str(s["_id"]), "status": "error", "message": "Customer not found"})
+            else:
+                billable.append(group)
+        if not billable:
+            return
+
+        invoices = []
+        for group in billable:
+            try:
+                invoice = self._invoice(customers[group[0]["customer_id"]], group, PENDING_NUMBER_PREFIX)
+                invoice.invoice_number = f"{PENDING_NUMBER_PREFIX}{invoice.id}"
+                invoices.append((group, invoice))
+            except Exception as e:
+                for s in group:
+                    self.record({"shipment_id": str(s["_id"]), "status": "error", "message": str(e)})
+        if not invoices:
+            return
+
+        failed: Dict[int, str] = {}
+        try:
+            await db.invoices.insert_many([inv.model_dump_mongo() for _, inv in invoices], ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "insert failed") for err in e.details.get("writeErrors", [])}
+
+        # Numbers are reserved only now, for invoices that were written
+        inserted = [invoice for i, (_, invoice) in enumerate(invoices) if i not in failed]
+        numbers = await number_pending_invoices([invoice.id for invoice in inserted])
+        for invoice in inserted:
+            invoice.invoice_number = numbers[invoice.id]
+
+        if self.auto_send and inserted:
+            # Sent invoices start their due-date watch
+            await ExceptionDetectionService.apply_invoices([invoice.id for invoice in inserted])
+
+        for i, (group, invoice) in enumerate(invoices):
+            if i in failed:
+                for s in group:
+                    self.record({"shipment_id": str(s["_id"]), "status": "error", "message": failed[i]})
+                continue
+            self.invoices += 1
+            for s in group:
+                self.record({
+                    "shipment_id": str(s["_id"]),
+                    "invoice_id": str(invoice.id),
+                    "invoice_number": invoice.invoice_number,
+                    "total": invoice.total,
+                    "status": "created",
+                    "message": f"Consolidated invoice {invoice.invoice_number}" if self.consolidate else "Invoice created",
+                })
+
+
+async def number_pending_invoices(invoice_ids: Optional[List[ObjectId]] = None) -> Dict[ObjectId, str]:
+    """Give inserted invoices still holding a placeholder their invoice numbers.
+
+    Numbers are reserved only for invoices that exist, in ``_id`` order.
+    Without ``invoice_ids`` every placeholder is numbered, which repairs
+    invoices left behind by a run that died between insert and numbering.
+    """
+    db = get_database()
+    if invoice_ids is None:
+        invoice_ids = [
+            doc["_id"] async for doc in db.invoices.find(
+                {"invoice_number": {"$regex": f"^{PENDING_NUMBER_PREFIX}"}}, {"_id": 1}
+            ).sort("_id", 1)
+        ]
+    if not invoice_ids:
+        return {}
+    invoice_ids = sorted(invoice_ids)
+    numbers = dict(zip(invoice_ids, await NumberGenerator.reserve_numbers("invoice", "INV", len(invoice_ids))))
+    await db.invoices.bulk_write(
+        [UpdateOne({"_id": oid}, {"$set": {"invoice_number": number}}) for oid, number in numbers.items()],
+        ordered=False,
+    )
+    return numbers
+
+
+async def next_chunk(scope: Dict[str, Any], consolidate: bool, after: Optional[ObjectId]) -> tuple[List[dict], Optional[ObjectId]]:
+    """Next chunk of uninvoiced shipments after the ``after`` checkpoint.
+
+    Checkpoints are shipment ids, or customer ids when consolidating (a
+    customer's shipments always land in the same chunk). Returns the
+    shipments and the new checkpoint (None when done).
+    """
+    db = get_database()
+    if consolidate:
+        position = {"customer_id": {"$gt": after}} if after else {}
+        customers = [
+            doc["_id"] async for doc in db.shipments.aggregate(
+                _uninvoiced(_and(scope, position)) + [
+                    {"$group": {"_id": "$customer_id"}},
+                    {"$sort": {"_id": 1}},
+                    {"$limit": CONSOLIDATE_CHUNK_CUSTOMERS},
+                ]
+            )
+        ]
+        if not customers:
+            return [], None
+        shipments = await db.shipments.aggregate(
+            _uninvoiced(_and(scope, {"customer_id": {"$in": customers}})) + [
+                {"$project": SHIPMENT_FIELDS},
+                {"$sort": {"customer_id": 1, "_id": 1}},
+            ]
+        ).to_list(None)
+        return shipments, customers[-1]
+
+    position = {"_id": {"$gt": after}} if after else {}
+    stages = _uninvoiced(_and(scope, position))
+    # Sort before the lookup so the scan stops once the chunk is full
+    stages.insert(1, {"$sort": {"_id": 1}})
+    shipments = await db.shipments.aggregate(
+        stages + [{"$limit": BATCH_CHUNK_SIZE}, {"$project": SHIPMENT_FIELDS}]
+    ).to_list(None)
+    if not shipments:
+        return [], None
+    return shipments, shipments[-1]["_id"]
+
+
+async def invoice_all(
+    invoicer: BatchInvoicer,
+    customer_id: Optional[str] = None,
+    shipment_ids: Optional[List[str]] = None,
+    after: Optional[ObjectId] = None,
+    on_chunk=None,
+) -> None:
+    """Invoice every uninvoiced delivered shipment in scope, chunk by chunk.
+
+    ``on_chunk(invoicer, checkpoint)`` is awaited after every chunk.
+    """
+    scope = _scope(customer_id, shipment_ids)
+    await number_pending_invoices()
+    while True:
+        shipments, after = await next_chunk(scope, invoicer.consolidate, after)
+        if not shipments:
+            break
+        await invoicer.invoice_chunk(shipments)
+        if on_chunk:
+            await on_chunk(invoicer, after)
+
+
+# ============================================================================
+# Background jobs
+# ============================================================================
+
+def _job_counters(invoicer: BatchInvoicer) -> dict:
+    return {
+        "created": invoicer.created,
+        "skipped": invoicer.skipped,
+        "errors": invoicer.errors,
+        "invoice_count": invoicer.invoices,
+        "error_details": invoicer.results,
+    }
+
+
+async def claim_batch_run(owner: str, renew: bool = False) -> bool:
+    """Take the batch invoicing lease for ``owner``, or ``renew`` the one it holds.
+
+    A claim fails while any run (including ``owner``'s own, so a job can't
+    be resumed twice) holds a lease renewed within ``STALE_JOB_MINUTES``;
+    the conditional upsert makes the check and the claim one atomic write.
+    """
+    db = get_database()
+    now = utc_now()
+    held = {"owner": owner} if renew else {"lease_until": {"$lt": now}}
+    try:
+        await db.invoice_batch_locks.update_one(
+            {"_id": BATCH_LOCK_ID, **held},
+            {"$set": {"owner": owner, "lease_until": now + timedelta(minutes=STALE_JOB_MINUTES)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def release_batch_run(owner: str) -> None:
+    await get_database().invoice_batch_locks.delete_one({"_id": BATCH_LOCK_ID, "owner": owner})
+
+
+async def create_batch_job(
+    customer_id: Optional[str],
+    shipment_ids: Optional[List[str]],
+    consolidate_by_customer: bool,
+    auto_send: bool,
+) -> str:
+    """Record a pending job; ``shipment_ids=None`` covers every delivered shipment in scope."""
+    db = get_database()
+    job_id = ObjectId()
+    await db.invoice_batch_jobs.insert_one({
+        "_id": job_id,
+        "status": "pending",
+        "customer_id": customer_id,
+        "shipment_ids": shipment_ids,
+        "consolidate_by_customer": consolidate_by_customer,
+        "auto_send": auto_send,
+        "checkpoint": None,
+        "classified": False,
+        "created": 0,
+        "skipped": 0,
+        "errors": 0,
+        "invoice_count": 0,
+        "error_details": [],
+        "created_at": utc_now(),
+    })
+    return str(job_id)
+
+
+async def run_batch_job(job_id: str) -> None:
+    """Run (or resume) a batch invoicing job from its checkpoint.
+
+    The caller must have claimed the run for ``job_id`` with
+    :func:`claim_batch_run`; the lease is renewed after every chunk and
+    released when the job ends.
+    """
+    db = get_database()
+    job_oid = ObjectId(job_id)
+    try:
+        job = await db.invoice_batch_jobs.find_one_and_update(
+            {"_id": job_oid},
+            {
+                "$set": {"status": "running", "heartbeat_at": utc_now()},
+                "$unset": {"error": ""},
+                "$min": {"started_at": utc_now()},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        invoicer = BatchInvoicer(job["consolidate_by_customer"], job["auto_send"], keep_results=False)
+        # Counters continue from the previous run when resuming
+        invoicer.created, invoicer.skipped, invoicer.errors = job["created"], job["skipped"], job["errors"]
+        invoicer.invoices, invoicer.results = job["invoice_count"], job["error_details"]
+
+        # None means every delivered shipment in scope; a list (possibly
+        # empty after classification) restricts the job to those ids
+        shipment_ids = job.get("shipment_ids")
+        if shipment_ids is not None and not job["classified"]:
+            results, shipment_ids = await classify_shipments(shipment_ids)
+            for result in results:
+                invoicer.record(result)
+            await db.invoice_batch_jobs.update_one(
+                {"_id": job_oid},
+                {"$set": {**_job_counters(invoicer), "classified": True, "shipment_ids": shipment_ids}},
+            )
+
+        async def checkpoint(progress: BatchInvoicer, after):
+            if not await claim_batch_run(job_id, renew=True):
+                raise RuntimeError("Batch invoicing lease was taken over by another run")
+            await db.invoice_batch_jobs.update_one(
+                {"_id": job_oid},
+                {"$set": {**_job_counters(progress), "checkpoint": after, "heartbeat_at": utc_now()}},
+            )
+            await manager.broadcast("billing:batch_invoice_progress", {
+                "job_id": job_id,
+                "created": progress.created,
+                "skipped": progress.skipped,
+                "errors": progress.errors,
+                "invoice_count": progress.invoices,
+            })
+
+        if shipment_ids is None or shipment_ids:
+            await invoice_all(
+                invoicer,
+                customer_id=job.get("customer_id"),
+                shipment_ids=shipment_ids,
+                after=job.get("checkpoint"),
+                on_chunk=checkpoint,
+            )
+
+        await db.invoice_batch_jobs.update_one(
+            {"_id": job_oid},
+            {"$set": {**_job_counters(invoicer), "status": "completed", "completed_at": utc_now()}},
+        )
+        await manager.broadcast("billing:batch_invoices_generated", {
+            "job_id": job_id,
+            "created": invoicer.created,
+            "skipped": invoicer.skipped,
+            "errors": invoicer.errors,
+        })
+    except Exception as e:
+        logger.error(f"Batch invoice job {job_id} failed: {e}")
+        await db.invoice_batch_jobs.update_one(
+            {"_id": job_oid},
+            {"$set": {"status": "failed", "error": str(e), "completed_at": utc_now()}},
+        )
+    finally:
+        await release_batch_run(job_id)
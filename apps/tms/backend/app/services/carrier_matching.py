@@ -9,6 +9,8 @@ from bson import ObjectId
 from app.database import get_database
 from app.models.carrier import Carrier, CarrierStatus, EquipmentType
 from app.models.base import utc_now
+from app.models.shipment import lane_key
+from app.services.lane_stats import LaneStatsService
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +54,9 @@ class CarrierMatchingService:
         - Available capacity (+10)
         - Preferred lane match (+15)
         - Recent activity (+10)
+
+        Lane history and the lane average rate come from one cached lane
+        table, so scoring makes no per-carrier queries.
         """
         db = get_database()
 
@@ -63,6 +68,9 @@ class CarrierMatchingService:
 
         carriers = await db.carriers.find(query).to_list(100)
 
+        lane = await LaneStatsService.get_lane(origin_state, destination_state)
+        avg_rate = lane.avg_rate_per_mile(equipment_type)
+
         matches = []
         for carrier_doc in carriers:
             carrier = Carrier(**carrier_doc)
@@ -70,11 +78,7 @@ class CarrierMatchingService:
             reasons = []
 
             # Check lane history
-            lane_loads = await self._get_lane_history(
-                carrier.id,
-                origin_state,
-                destination_state,
-            )
+            lane_loads = lane.carrier(str(carrier.id)).loads
             if lane_loads > 0:
                 score += min(30, lane_loads * 5)
                 reasons.append(f"Ran this lane {lane_loads} times")
@@ -125,13 +129,6 @@ class CarrierMatchingService:
                 elif days_since_load > 90:
                     score -= 10
 
-            # Estimate cost based on lane history
-            avg_rate = await self._get_avg_lane_rate(
-                origin_state,
-                destination_state,
-                equipment_type,
-            )
-
             matches.append(CarrierMatch(
                 carrier_id=str(carrier.id),
                 carrier_name=carrier.name,
@@ -149,59 +146,6 @@ class CarrierMatchingService:
 
         return matches[:limit]
 
-    async def _get_lane_history(
-        self,
-        carrier_id: ObjectId,
-        origin_state: str,
-        destination_state: str,
-    ) -> int:
-        """Count how many loads this carrier has done on this lane."""
-        db = get_database()
-
-        # Query shipments for this carrier on this lane
-        count = await db.shipments.count_documents({
-            "carrier_id": carrier_id,
-            "stops.0.state": origin_state,  # First stop (pickup) state
-            "status": {"$in": ["delivered", "in_transit"]},
-        })
-
-        return count
-
-    async def _get_avg_lane_rate(
-        self,
-        origin_state: str,
-        destination_state: str,
-        equipment_type: str,
-    ) -> Optional[float]:
-        """Get average rate per mile for a lane."""
-        db = get_database()
-
-        # Aggregate recent shipments on this lane
-        pipeline = [
-            {
-                "$match": {
-                    "equipment_type": equipment_type,
-                    "stops.0.state": origin_state,
-                    "status": "delivered",
-                    "carrier_cost": {"$gt": 0},
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "avg_cost": {"$avg": "$carrier_cost"},
-                    "count": {"$sum": 1},
-                }
-            }
-        ]
-
-        results = await db.shipments.aggregate(pipeline).to_list(1)
-        if results and results[0]["count"] >= 3:
-            # Return as rate per dollar (simplified)
-            return results[0]["avg_cost"] / 100 / 500  # Assume 500 miles average
-
-        return None
-
     async def get_carrier_lane_stats(
         self,
         carrier_id: str,
@@ -214,9 +158,9 @@ class CarrierMatchingService:
         pipeline = [
             {
                 "$match": {
-                    "carrier_id": ObjectId(carrier_id),
-                    "stops.0.state": origin_state,
+                    "lane_key": lane_key(origin_state, destination_state),
                     "status": "delivered",
+                    "carrier_id": ObjectId(carrier_id),
                 }
             },
             {
@@ -293,49 +237,8 @@ class CarrierMatchingService:
 
         now = datetime.now(timezone.utc)
 
-        # Get lane history for all carriers at once
-        lane_pipeline = [
-            {
-                "$match": {
-                    "status": "delivered",
-                    "carrier_id": {"$ne": None},
-                }
-            },
-            {
-                "$addFields": {
-                    "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                    "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                }
-            },
-            {
-                "$match": {
-                    "o_state": origin_state,
-                    "d_state": dest_state,
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$carrier_id",
-                    "lane_count": {"$sum": 1},
-                    "avg_cost": {"$avg": "$carrier_cost"},
-                    "on_time_count": {
-                        "$sum": {
-                            "$cond": [
-                                {"$lte": [
-                                    {"$ifNull": ["$delivered_at", "$updated_at"]},
-                                    {"$ifNull": ["$scheduled_delivery", "$delivery_date"]},
-                                ]},
-                                1, 0,
-                            ]
-                        }
-                    },
-                    "total_delivered": {"$sum": 1},
-                    "last_load_date": {"$max": "$created_at"},
-                }
-            },
-        ]
-        lane_data = await db.shipments.aggregate(lane_pipeline).to_list(500)
-        lane_map = {str(d["_id"]): d for d in lane_data if d.get("_id")}
+        # Lane history for all carriers at once
+        lane = await LaneStatsService.get_lane(origin_state, dest_state)
 
         # Get tender acceptance rates
         tender_pipeline = [
@@ -360,8 +263,7 @@ class CarrierMatchingService:
         tender_data = await db.tenders.aggregate(tender_pipeline).to_list(500)
         tender_map = {str(d["_id"]): d for d in tender_data if d.get("_id")}
 
-        # Get lane average rate
-        lane_avg_rate = await self._get_avg_lane_rate(origin_state, dest_state, equipment_type)
+        lane_avg_rate = lane.avg_rate_per_mile(equipment_type)
 
         rankings = []
         for carrier_doc in carriers:
@@ -373,8 +275,8 @@ class CarrierMatchingService:
             # Weight recent performance more heavily
 
             # Feature 1: Lane Experience (0-25 points)
-            lane_info = lane_map.get(cid, {})
-            lane_count = lane_info.get("lane_count", 0)
+            lane_info = lane.carrier(cid)
+            lane_count = lane_info.delivered_count
             if lane_count > 0:
                 lane_score = min(25, lane_count * 4)
                 explanation.append(f"{lane_count} loads on this lane")
@@ -383,8 +285,8 @@ class CarrierMatchingService:
 
             # Feature 2: On-time Performance (0-30 points)
             # Weight by lane-specific data first, fall back to overall
-            if lane_info.get("total_delivered", 0) > 0:
-                lane_otp = (lane_info["on_time_count"] / lane_info["total_delivered"]) * 100
+            if lane_info.delivered_count > 0:
+                lane_otp = (lane_info.on_time_count / lane_info.delivered_count) * 100
             elif carrier.on_time_percentage is not None:
                 lane_otp = carrier.on_time_percentage
             else:
@@ -413,7 +315,7 @@ class CarrierMatchingService:
                 claims_score = 5  # Neutral
 
             # Feature 4: Rate Competitiveness (0-15 points)
-            carrier_avg_cost = lane_info.get("avg_cost", 0)
+            carrier_avg_cost = lane_info.avg_cost
             if carrier_avg_cost > 0 and customer_price > 0:
                 rate_ratio = carrier_avg_cost / customer_price
                 rate_score = max(0, 15 - rate_ratio * 12)
@@ -440,7 +342,7 @@ class CarrierMatchingService:
 
             # Feature 6: Recency (0-10 points) - Recent activity = more reliable
             recency_score = 5
-            last_load = lane_info.get("last_load_date") or carrier.last_load_at
+            last_load = lane_info.last_load_date or carrier.last_load_at
             if last_load:
                 days_since = (now - last_load).days
                 if days_since < 7:
@@ -535,27 +437,17 @@ class CarrierMatchingService:
         """
         db = get_database()
         now = datetime.now(timezone.utc)
+        lane = lane_key(origin_state, destination_state)
 
         # Get recent rate data (last 90 days)
         pipeline = [
             {
                 "$match": {
+                    "lane_key": lane,
+                    "equipment_type": equipment_type,
                     "status": "delivered",
-                    "carrier_cost": {"$gt": 0},
                     "created_at": {"$gte": now - timedelta(days=90)},
-                }
-            },
-            {
-                "$addFields": {
-                    "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                    "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                }
-            },
-            {
-                "$match": {
-                    "o_state": origin_state,
-                    "d_state": destination_state,
-                    "equipment_type": equipment_type,
+                    "carrier_cost": {"$gt": 0},
                 }
             },
             {
@@ -574,29 +466,14 @@ class CarrierMatchingService:
         results = await db.shipments.aggregate(pipeline).to_list(1)
 
         if not results or results[0]["count"] < 2:
-            # Insufficient data - use broader lane data
-            broader_pipeline = list(pipeline)
-            broader_pipeline[0]["$match"]["created_at"] = {"$gte": now - timedelta(days=180)}
-            broader_pipeline[3].pop("$match", None)
-            # Re-run without equipment filter
+            # Insufficient data - use broader lane data without the equipment filter
             broader_pipeline2 = [
                 {
                     "$match": {
+                        "lane_key": lane,
                         "status": "delivered",
-                        "carrier_cost": {"$gt": 0},
                         "created_at": {"$gte": now - timedelta(days=180)},
-                    }
-                },
-                {
-                    "$addFields": {
-                        "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                        "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                    }
-                },
-                {
-                    "$match": {
-                        "o_state": origin_state,
-                        "d_state": destination_state,
+                        "carrier_cost": {"$gt": 0},
                     }
                 },
                 {
@@ -637,21 +514,10 @@ class CarrierMatchingService:
         recent_pipeline = [
             {
                 "$match": {
+                    "lane_key": lane,
                     "status": "delivered",
-                    "carrier_cost": {"$gt": 0},
                     "created_at": {"$gte": now - timedelta(days=30)},
-                }
-            },
-            {
-                "$addFields": {
-                    "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                    "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                }
-            },
-            {
-                "$match": {
-                    "o_state": origin_state,
-                    "d_state": destination_state,
+                    "carrier_cost": {"$gt": 0},
                 }
             },
             {
@@ -0,0 +1,292 @@
+"""Consolidation suggestions over the open book of unassigned shipments.
+
+Loads are bucketed by equipment type and lane, and each bucket is sorted by
+pickup time. Groups are formed greedily by sweeping loads in pickup order:
+the earliest ungrouped load anchors a group and takes the following
+ungrouped loads whose pickup falls within the window of the anchor's, until
+the equipment's weight or pallet capacity is reached. Finding a group's
+candidates is a binary search into each bucket, so a sweep over n loads is
+O(n log n) plus the size of the windows it scans; grouped loads are skipped
+in constant amortized time.
+
+By lane, loads match on origin and destination state. With a proximity
+radius, loads whose first and last stops carry coordinates match instead
+when both ends are within the radius of the anchor's; they are bucketed by
+a grid cell of their origin so only neighbouring cells are searched. Loads
+without coordinates fall back to the state lane.
+
+Grouping is CPU-bound, so books larger than ``CONSOLIDATION_INLINE_MAX_LOADS``
+are grouped in the route optimizer's worker processes, off the event loop.
+"""
+import math
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.database import get_database
+from app.services.route_optimizer import haversine_miles, run_in_pool
+
+# Usable capacity by equipment type; other types use the van figures
+EQUIPMENT_CAPACITY: Dict[str, Tuple[int, Optional[int]]] = {
+    # (max weight lbs, max pallets or None)
+    "van": (44000, 26),
+    "reefer": (43000, 26),
+    "flatbed": (48000, None),
+    "step_deck": (48000, None),
+}
+DEFAULT_WINDOW_HOURS = 48
+# Share of combined revenue a consolidation is estimated to save
+CONSOLIDATION_SAVINGS_RATE = 0.15
+MILES_PER_DEGREE_LAT = 69.0
+# Larger books are grouped in worker processes rather than on the event loop
+CONSOLIDATION_INLINE_MAX_LOADS = 1000
+
+CONSOLIDATION_FIELDS = {
+    "shipment_number": 1,
+    "equipment_type": 1,
+    "pickup_date": 1,
+    "weight_lbs": 1,
+    "pallet_count": 1,
+    "customer_price": 1,
+    "stops.state": 1,
+    "stops.latitude": 1,
+    "stops.longitude": 1,
+}
+
+
+def capacity_for(equipment_type: Optional[str]) -> Tuple[int, Optional[int]]:
+    return EQUIPMENT_CAPACITY.get((equipment_type or "van").lower(), EQUIPMENT_CAPACITY["van"])
+
+
+@dataclass(slots=True)
+class Load:
+    """The fields of an open shipment needed to consolidate it."""
+    id: object
+    shipment_number: str
+    equipment_type: str
+    pickup: datetime
+    weight_lbs: int
+    pallets: int
+    revenue: int
+    origin_state: str
+    dest_state: str
+    origin: Optional[Tuple[float, float]] = None
+    dest: Optional[Tuple[float, float]] = None
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> Optional["Load"]:
+        """A load from a shipment document; None if it has no lane or pickup date."""
+        stops = doc.get("stops") or []
+        if len(stops) < 2 or not doc.get("pickup_date"):
+            return None
+        first, last = stops[0], stops[-1]
+        return cls(
+            id=doc["_id"],
+            shipment_number=doc.get("shipment_number", ""),
+            equipment_type=(doc.get("equipment_type") or "van").lower(),
+            pickup=doc["pickup_date"],
+            weight_lbs=doc.get("weight_lbs") or 0,
+            pallets=doc.get("pallet_count") or 0,
+            revenue=doc.get("customer_price") or 0,
+            origin_state=first.get("state", ""),
+            dest_state=last.get("state", ""),
+            origin=_coordinate(first),
+            dest=_coordinate(last),
+        )
+
+
+def _coordinate(stop: dict) -> Optional[Tuple[float, float]]:
+    lat, lon = stop.get("latitude"), stop.get("longitude")
+    return (lat, lon) if lat is not None and lon is not None else None
+
+
+class _Buckets:
+    """Loads keyed by lane, each bucket sorted by pickup time."""
+
+    def __init__(self, loads: Iterable[Load], proximity_miles: float):
+        self.proximity_miles = proximity_miles
+        self.cell_degrees = proximity_miles / MILES_PER_DEGREE_LAT if proximity_miles else 0.0
+        grouped: Dict[Hashable, List[Load]] = {}
+        for load in loads:
+            grouped.setdefault(self.key(load), []).append(load)
+        self.loads: Dict[Hashable, List[Load]] = {}
+        self.pickups: Dict[Hashable, List[datetime]] = {}
+        # Per bucket, a skip pointer to the next ungrouped position at or
+        # after each index (path-compressed), so sweeps pass over grouped
+        # loads without revisiting them.
+        self.next: Dict[Hashable, List[int]] = {}
+        self.position: Dict[int, Tuple[Hashable, int]] = {}
+        for key, bucket in grouped.items():
+            bucket.sort(key=lambda x: x.pickup)
+            self.loads[key] = bucket
+            self.pickups[key] = [x.pickup for x in bucket]
+            self.next[key] = list(range(len(bucket) + 1))
+            for index, load in enumerate(bucket):
+                self.position[id(load)] = (key, index)
+
+    def _ungrouped(self, key: Hashable, index: int) -> int:
+        nxt = self.next[key]
+        root = index
+        while nxt[root] != root:
+            root = nxt[root]
+        while nxt[index] != root:
+            nxt[index], index = root, nxt[index]
+        return root
+
+    def is_grouped(self, load: Load) -> bool:
+        key, index = self.position[id(load)]
+        return self._ungrouped(key, index) != index
+
+    def mark_grouped(self, load: Load) -> None:
+        key, index = self.position[id(load)]
+        self.next[key][index] = index + 1
+
+    def _by_proximity(self, load: Load) -> bool:
+        return bool(self.proximity_miles and load.origin and load.dest)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    def key(self, load: Load) -> Hashable:
+        if self._by_proximity(load):
+            return (load.equipment_type, "cell", *self._cell(*load.origin))
+        return (load.equipment_type, load.origin_state, load.dest_state)
+
+    def search_keys(self, load: Load) -> List[Hashable]:
+        """Buckets that can hold loads compatible with ``load``."""
+        if not self._by_proximity(load):
+            return [self.key(load)]
+        i, j = self._cell(*load.origin)
+        # A degree of longitude shrinks with latitude, so search wider
+        span = math.ceil(1 / max(math.cos(math.radians(abs(load.origin[0]) + self.cell_degrees)), 0.05))
+        return [
+            (load.equipment_type, "cell", i + di, j + dj)
+            for di in (-1, 0, 1) for dj in range(-span, span + 1)
+        ]
+
+    def _near(self, a: Tuple[float, float], b: Tuple[float, float]) -> bool:
+        # Points further apart in latitude alone can't be within the radius
+        if abs(a[0] - b[0]) > self.cell_degrees:
+            return False
+        return haversine_miles(a[0], a[1], b[0], b[1]) <= self.proximity_miles
+
+    def compatible(self, anchor: Load, load: Load) -> bool:
+        if not self._by_proximity(anchor):
+            return True
+        return (
+            self._by_proximity(load)
+            and self._near(anchor.dest, load.dest)
+            and self._near(anchor.origin, load.origin)
+        )
+
+    def window(self, anchor: Load, window: timedelta) -> List[Load]:
+        """Ungrouped loads in the anchor's buckets picking up within the window after it."""
+        found: List[Load] = []
+        for key in self.search_keys(anchor):
+            pickups = self.pickups.get(key)
+            if not pickups:
+                continue
+            bucket = self.loads[key]
+            index = self._ungrouped(key, bisect_left(pickups, anchor.pickup))
+            hi = bisect_right(pickups, anchor.pickup + window)
+            while index < hi:
+                found.append(bucket[index])
+                index = self._ungrouped(key, index + 1)
+        if len(found) > 1:
+            found.sort(key=lambda x: x.pickup)
+        return found
+
+
+def find_consolidations(
+    loads: List[Load],
+    window_hours: float = DEFAULT_WINDOW_HOURS,
+    proximity_miles: float = 0.0,
+) -> List[List[Load]]:
+    """Groups of two or more loads that fit one truck, in anchor pickup order."""
+    buckets = _Buckets(loads, proximity_miles)
+    window = timedelta(hours=window_hours)
+    groups: List[List[Load]] = []
+
+    for anchor in sorted(loads, key=lambda x: x.pickup):
+        if buckets.is_grouped(anchor):
+            continue
+        max_weight, max_pallets = capacity_for(anchor.equipment_type)
+        if anchor.weight_lbs > max_weight:
+            continue
+        weight, pallets = anchor.weight_lbs, anchor.pallets
+        group = [anchor]
+        for load in buckets.window(anchor, window):
+            if load is anchor or not buckets.compatible(anchor, load):
+                continue
+            if weight + load.weight_lbs > max_weight:
+                continue
+            if max_pallets is not None and pallets + load.pallets > max_pallets:
+                continue
+            group.append(load)
+            weight += load.weight_lbs
+            pallets += load.pallets
+            if weight == max_weight or pallets == max_pallets:
+                break
+        if len(group) >= 2:
+            for load in group:
+                buckets.mark_grouped(load)
+            groups.append(group)
+    return groups
+
+
+def suggestion(group: List[Load]) -> dict:
+    anchor = group[0]
+    max_weight, _ = capacity_for(anchor.equipment_type)
+    total_weight = sum(x.weight_lbs for x in group)
+    total_price = sum(x.revenue for x in group)
+    return {
+        "lane": f"{anchor.origin_state} -> {anchor.dest_state}",
+        "equipment_type": anchor.equipment_type,
+        "shipment_count": len(group),
+        "shipment_ids": [str(x.id) for x in group],
+        "shipment_numbers": [x.shipment_number for x in group],
+        "total_weight_lbs": total_weight,
+        "total_pallets": sum(x.pallets for x in group),
+        "total_revenue": total_price,
+        "estimated_savings": int(total_price * CONSOLIDATION_SAVINGS_RATE),
+        "compatible_dates": True,
+        "pickup_window_start": anchor.pickup.isoformat(),
+        "pickup_window_end": max(x.pickup for x in group).isoformat(),
+        "utilization_percent": min(round(total_weight / max_weight * 100, 1), 100) if total_weight else 0,
+    }
+
+
+def ranked_suggestions(loads: List[Load], window_hours: float, proximity_miles: float, limit: int) -> List[dict]:
+    """The ``limit`` suggestions with the highest estimated savings."""
+    suggestions = [suggestion(g) for g in find_consolidations(loads, window_hours, proximity_miles)]
+    suggestions.sort(key=lambda x: x["estimated_savings"], reverse=True)
+    return suggestions[:limit]
+
+
+class ConsolidationService:
+    """Consolidation suggestions for unassigned booked shipments."""
+
+    @staticmethod
+    async def open_loads() -> List[Load]:
+        """Every booked shipment without a carrier, as loads."""
+        db = get_database()
+        cursor = db.shipments.find({"status": "booked", "carrier_id": None}, CONSOLIDATION_FIELDS)
+        loads = []
+        async for doc in cursor.batch_size(5000):
+            load = Load.from_doc(doc)
+            if load:
+                loads.append(load)
+        return loads
+
+    @staticmethod
+    async def suggestions(
+        window_hours: float = DEFAULT_WINDOW_HOURS,
+        proximity_miles: float = 0.0,
+        limit: int = 20,
+    ) -> List[dict]:
+        """Consolidation groups across the open book, highest estimated savings first."""
+        loads = await ConsolidationService.open_loads()
+        if len(loads) > CONSOLIDATION_INLINE_MAX_LOADS:
+            return await run_in_pool(ranked_suggestions, loads, window_hours, proximity_miles, limit)
+        return ranked_suggestions(loads, window_hours, proximity_miles, limit)
@@ -0,0 +1,171 @@
+"""Aggregation pipelines for custom reports.
+
+A report config has the fields of ``CustomReportBuildRequest``
+(data_sources, columns, filters, grouping, aggregations, sort_by,
+sort_order). The interactive builder runs the pipeline with a row cap;
+scheduled reports stream the same pipeline without one.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+# Built-in scheduled report types, as custom report configs
+REPORT_TYPE_CONFIGS: Dict[str, dict] = {
+    "shipment_summary": {
+        "data_sources": ["shipments", "customers", "carriers"],
+        "columns": [
+            "shipment_number", "status", "customer_name", "carrier_name", "equipment_type",
+            "pickup_date", "delivery_date", "customer_price", "carrier_cost",
+        ],
+    },
+    "margin_report": {
+        "data_sources": ["shipments", "customers"],
+        "columns": [],
+        "grouping": ["customer_name"],
+        "aggregations": [
+            {"field": "customer_price", "function": "sum"},
+            {"field": "carrier_cost", "function": "sum"},
+        ],
+        "sort_by": "sum_customer_price",
+    },
+    "carrier_performance": {
+        "data_sources": ["shipments", "carriers"],
+        "columns": [],
+        "filters": [{"field": "carrier_id", "operator": "not_equals", "value": None}],
+        "grouping": ["carrier_name"],
+        "aggregations": [{"field": "carrier_cost", "function": "sum"}],
+        "sort_by": "count",
+    },
+    "ar_aging": {
+        "data_sources": ["invoices", "customers"],
+        "columns": ["invoice_number", "customer_name", "status", "invoice_date", "due_date", "total", "amount_paid"],
+        "filters": [{"field": "status", "operator": "in", "value": ["sent", "partial", "overdue"]}],
+        "sort_by": "due_date",
+        "sort_order": "asc",
+    },
+}
+
+
+def _match_stage(filters: Optional[List[dict]]) -> dict:
+    match_stage: dict = {}
+    for f in filters or []:
+        field = f.get("field", "")
+        operator = f.get("operator", "equals")
+        value = f.get("value")
+
+        if operator == "equals":
+            match_stage[field] = value
+        elif operator == "not_equals":
+            match_stage[field] = {"$ne": value}
+        elif operator == "greater_than":
+            match_stage[field] = {"$gt": value}
+        elif operator == "less_than":
+            match_stage[field] = {"$lt": value}
+        elif operator == "contains":
+            match_stage[field] = {"$regex": str(value), "$options": "i"}
+        elif operator == "in":
+            match_stage[field] = {"$in": value if isinstance(value, list) else [value]}
+        elif operator == "date_after":
+            match_stage[field] = {"$gte": datetime.fromisoformat(str(value))}
+        elif operator == "date_before":
+            match_stage[field] = {"$lte": datetime.fromisoformat(str(value))}
+    return match_stage
+
+
+def primary_source(config: dict) -> str:
+    data_sources = config.get("data_sources") or []
+    return data_sources[0] if data_sources else "shipments"
+
+
+def build_report_pipeline(config: dict, limit: Optional[int] = None) -> List[dict]:
+    """The aggregation pipeline for a report config, run on :func:`primary_source`."""
+    data_sources = config.get("data_sources") or []
+    primary = primary_source(config)
+    grouping = config.get("grouping")
+    columns = config.get("columns") or []
+
+    pipeline: list = []
+    match_stage = _match_stage(config.get("filters"))
+    if match_stage:
+        pipeline.append({"$match": match_stage})
+
+    # Add lookups for joined data sources
+    if "customers" in data_sources and primary != "customers":
+        pipeline.append({
+            "$lookup": {
+                "from": "customers",
+                "localField": "customer_id",
+                "foreignField": "_id",
+                "as": "_customer",
+            }
+        })
+        pipeline.append({"$addFields": {"customer_name": {"$arrayElemAt": ["$_customer.name", 0]}}})
+
+    if "carriers" in data_sources and primary != "carriers":
+        pipeline.append({
+            "$lookup": {
+                "from": "carriers",
+                "localField": "carrier_id",
+                "foreignField": "_id",
+                "as": "_carrier",
+            }
+        })
+        pipeline.append({"$addFields": {"carrier_name": {"$arrayElemAt": ["$_carrier.name", 0]}}})
+
+    # Grouping and aggregations
+    if grouping:
+        group_stage: dict = {"_id": {g: f"${g}" for g in grouping}}
+        for agg in config.get("aggregations") or []:
+            field = agg.get("field", "")
+            func = agg.get("function", "sum")
+            alias = f"{func}_{field}"
+            if func == "sum":
+                group_stage[alias] = {"$sum": f"${field}"}
+            elif func == "avg":
+                group_stage[alias] = {"$avg": f"${field}"}
+            elif func == "count":
+                group_stage[alias] = {"$sum": 1}
+            elif func == "min":
+                group_stage[alias] = {"$min": f"${field}"}
+            elif func == "max":
+                group_stage[alias] = {"$max": f"${field}"}
+        group_stage["count"] = {"$sum": 1}
+        pipeline.append({"$group": group_stage})
+
+    # Sort
+    if config.get("sort_by"):
+        sort_dir = -1 if config.get("sort_order", "desc") == "desc" else 1
+        pipeline.append({"$sort": {config["sort_by"]: sort_dir}})
+    else:
+        pipeline.append({"$sort": {"created_at": -1}})
+
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+
+    # Project only requested columns
+    if columns and not grouping:
+        project_stage = {col: 1 for col in columns}
+        project_stage["_id"] = 0
+        pipeline.append({"$project": project_stage})
+
+    return pipeline
+
+
+def clean_report_row(row: dict, grouping: Optional[List[str]] = None) -> Dict[str, Any]:
+    """JSON-friendly row: ids and dates as strings, group keys flattened."""
+    clean_row = {}
+    for key, val in row.items():
+        if key == "_id" and grouping and isinstance(val, dict):
+            # Flatten group _id
+            for gk, gv in val.items():
+                clean_row[gk] = str(gv) if isinstance(gv, ObjectId) else gv
+        elif key.startswith("_"):
+            continue
+        elif isinstance(val, ObjectId):
+            clean_row[key] = str(val)
+        elif isinstance(val, datetime):
+            clean_row[key] = val.isoformat()
+        else:
+            clean_row[key] = val
+    return clean_row
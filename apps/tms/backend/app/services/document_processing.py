@@ -6,9 +6,19 @@ Uses Claude's vision capabilities to:
 2. Classify document types
 3. Extract structured fields based on document type
 4. Suggest shipment matches
+
+Classification and field extraction are cached per file content in
+``document_extractions``, keyed by the document's ``content_hash`` and
+``EXTRACTION_PROMPT_VERSION``, so the same file uploaded again (a POD
+arriving by email and through the portal) reuses the first extraction
+instead of calling the model twice. Model calls go through the shared
+``anthropic`` provider limiter.
 """
 
+import asyncio
 import os
+import re
+import weakref
 import base64
 import json
 from datetime import datetime
@@ -24,6 +34,28 @@ from app.models.document import (
     ExtractedDocumentField,
 )
 from app.database import get_database
+from app.services.provider_limits import provider_limiter
+from app.services.reference_index import ReferenceIndexService, candidate
+
+# Bump when the prompts or model change so cached extractions are redone
+EXTRACTION_PROMPT_VERSION = "1"
+EXTRACTION_MODEL = "claude-sonnet-4-20250514"
+
+
+# Serializes extraction of identical files so concurrent duplicates call the model once
+_extraction_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _extraction_lock(content_hash: str) -> asyncio.Lock:
+    lock = _extraction_locks.get(content_hash)
+    if lock is None:
+        lock = asyncio.Lock()
+        _extraction_locks[content_hash] = lock
+    return lock
+
+
+def _extraction_key(content_hash: str) -> str:
+    return f"{content_hash}:{EXTRACTION_PROMPT_VERSION}"
 
 
 # Document type extraction templates
@@ -124,7 +156,7 @@ class DocumentProcessor:
     """Processes documents using AI for extraction and classification."""
 
     def __init__(self):
-        self.client = anthropic.Anthropic(
+        self.client = anthropic.AsyncAnthropic(
             api_key=os.getenv("ANTHROPIC_API_KEY")
         )
         self.db = get_database()
@@ -156,16 +188,10 @@ class DocumentProcessor:
         )
 
         try:
-            # Read the file
             file_path = doc_data["storage_path"]
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"File not found: {file_path}")
 
-            # Get file content as base64
-            with open(file_path, "rb") as f:
-                file_content = f.read()
-            file_base64 = base64.standard_b64encode(file_content).decode("utf-8")
-
             # Determine media type
             mime_type = doc_data.get("mime_type", "image/jpeg")
             if mime_type not in ["image/jpeg", "image/png", "image/gif", "image/webp", "application/pdf"]:
@@ -181,16 +207,27 @@ class DocumentProcessor:
                 )
                 return await self._get_document(document_id)
 
-            # Step 1: Classify and extract text
-            classification, ocr_text, ocr_confidence = await self._classify_document(
-                file_base64, mime_type, doc_data.get("document_type")
-            )
-
-            # Step 2: Extract fields based on document type
+            # Steps 1 and 2: classify, extract text and fields (cached by content)
+            content_hash = doc_data.get("content_hash")
+            if content_hash:
+                async with _extraction_lock(content_hash):
+                    cached = await self._cached_extraction(content_hash, doc_data.get("document_type"))
+                    if cached:
+                        classification, ocr_text, ocr_confidence, extracted_fields = cached
+                    else:
+                        classification, ocr_text, ocr_confidence, extracted_fields = await self._extract(
+                            file_path, mime_type, doc_data.get("document_type")
+                        )
+                        await self._store_extraction(
+                            content_hash, doc_data.get("document_type"),
+                            classification, ocr_text, ocr_confidence, extracted_fields,
+                        )
+            else:
+                cached = None
+                classification, ocr_text, ocr_confidence, extracted_fields = await self._extract(
+                    file_path, mime_type, doc_data.get("document_type")
+                )
             doc_type = classification or DocumentType(doc_data.get("document_type", "other"))
-            extracted_fields = await self._extract_fields(
-                file_base64, mime_type, doc_type
-            )
 
             # Step 3: Find matching shipments
             suggested_shipments, match_confidence = await self._find_matching_shipments(
@@ -204,6 +241,7 @@ class DocumentProcessor:
                 "ocr_text": ocr_text,
                 "ocr_confidence": ocr_confidence,
                 "extracted_fields": [f.model_dump() for f in extracted_fields] if extracted_fields else [],
+                "extraction_cache_hit": cached is not None,
             }
 
             if classification and classification != DocumentType(doc_data.get("document_type", "other")):
@@ -240,6 +278,72 @@ class DocumentProcessor:
             )
             raise
 
+    async def _extract(
+        self,
+        file_path: str,
+        mime_type: str,
+        existing_type: Optional[str],
+    ) -> Tuple[Optional[DocumentType], str, float, List[ExtractedDocumentField]]:
+        """Classify the file and extract its fields with the model."""
+        with open(file_path, "rb") as f:
+            file_content = f.read()
+        file_base64 = base64.standard_b64encode(file_content).decode("utf-8")
+
+        # Step 1: Classify and extract text
+        classification, ocr_text, ocr_confidence = await self._classify_document(
+            file_base64, mime_type, existing_type
+        )
+
+        # Step 2: Extract fields based on document type
+        doc_type = classification or DocumentType(existing_type or "other")
+        extracted_fields = await self._extract_fields(
+            file_base64, mime_type, doc_type
+        )
+        return classification, ocr_text, ocr_confidence, extracted_fields
+
+    async def _cached_extraction(
+        self,
+        content_hash: str,
+        existing_type: Optional[str],
+    ) -> Optional[Tuple[Optional[DocumentType], str, float, List[ExtractedDocumentField]]]:
+        """A previous extraction of the same content, if it applies to this document.
+
+        Without a confident classification the fields were extracted for the
+        uploader's type, so the entry is only reused for the same type.
+        """
+        entry = await self.db.document_extractions.find_one({"_id": _extraction_key(content_hash)})
+        if not entry:
+            return None
+        if not entry.get("classification") and entry.get("hint_type") != existing_type:
+            return None
+        classification = DocumentType(entry["classification"]) if entry.get("classification") else None
+        fields = [ExtractedDocumentField(**f) for f in entry.get("extracted_fields", [])]
+        return classification, entry.get("ocr_text", ""), entry.get("ocr_confidence", 0.0), fields
+
+    async def _store_extraction(
+        self,
+        content_hash: str,
+        existing_type: Optional[str],
+        classification: Optional[DocumentType],
+        ocr_text: str,
+        ocr_confidence: float,
+        extracted_fields: List[ExtractedDocumentField],
+    ) -> None:
+        await self.db.document_extractions.replace_one(
+            {"_id": _extraction_key(content_hash)},
+            {
+                "content_hash": content_hash,
+                "prompt_version": EXTRACTION_PROMPT_VERSION,
+                "classification": classification.value if classification else None,
+                "hint_type": existing_type,
+                "ocr_text": ocr_text,
+                "ocr_confidence": ocr_confidence,
+                "extracted_fields": [f.model_dump() for f in extracted_fields] if extracted_fields else [],
+                "created_at": datetime.utcnow(),
+            },
+            upsert=True,
+        )
+
     async def _classify_document(
         self,
         file_base64: str,
@@ -274,29 +378,30 @@ Respond in JSON format:
   "ocr_text": "Full extracted text here..."
 }"""
 
-        response = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": mime_type,
-                                "data": file_base64,
+        async with provider_limiter("anthropic"):
+            response = await self.client.messages.create(
+                model=EXTRACTION_MODEL,
+                max_tokens=4000,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": mime_type,
+                                    "data": file_base64,
+                                },
                             },
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt,
-                        },
-                    ],
-                }
-            ],
-        )
+                            {
+                                "type": "text",
+                                "text": prompt,
+                            },
+                        ],
+                    }
+                ],
+            )
 
         # Parse response
         response_text = response.content[0].text
@@ -352,29 +457,30 @@ Format:
   }}
 }}"""
 
-        response = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": mime_type,
-                                "data": file_base64,
+        async with provider_limiter("anthropic"):
+            response = await self.client.messages.create(
+                model=EXTRACTION_MODEL,
+                max_tokens=4000,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": mime_type,
+                                    "data": file_base64,
+                                },
                             },
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt,
-                        },
-                    ],
-                }
-            ],
-        )
+                            {
+                                "type": "text",
+                                "text": prompt,
+                            },
+                        ],
+                    }
+                ],
+            )
 
         # Parse response
         response_text = response.content[0].text
@@ -433,42 +539,36 @@ Format:
         matched_ids = []
         match_confidence = 0.0
 
-        # Search by reference numbers
-        if reference_numbers:
-            for ref in reference_numbers:
-                if not ref:
-                    continue
-                cursor = self.db.shipments.find({
-                    "$or": [
-                        {"shipment_number": {"$regex": ref, "$options": "i"}},
-                        {"reference_numbers": {"$elemMatch": {"$regex": ref, "$options": "i"}}},
-                        {"pro_number": {"$regex": ref, "$options": "i"}},
-                    ]
-                })
-                async for shipment in cursor:
-                    sid = shipment["_id"]
-                    if sid not in matched_ids:
-                        matched_ids.append(sid)
-                        match_confidence = max(match_confidence, 0.9)
+        # Resolve reference numbers and the carrier's MC/DOT number with one
+        # lookup on the reference index
+        mc_number = fields.get("mc_number") or fields.get("carrier_mc_number")
+        candidates = [candidate(ref) for ref in reference_numbers if isinstance(ref, (str, int))]
+        candidates += [candidate(fields.get(name), kind) for name, kind in (("bol_number", "bol"), ("po_number", "po"))]
+        candidates += [candidate(mc_number, kind) for kind in ("mc", "dot")]
+        candidates = [c for c in candidates if c]
+        entries = [e for found in await ReferenceIndexService.resolve(candidates) for e in found]
+
+        for entry in entries:
+            if entry["entity_type"] == "shipment" and entry["entity_id"] not in matched_ids:
+                matched_ids.append(entry["entity_id"])
+                match_confidence = max(match_confidence, 0.9)
 
         # Try matching by carrier MC number (for rate confirmations, carrier invoices)
-        mc_number = fields.get("mc_number") or fields.get("carrier_mc_number")
-        if mc_number and not matched_ids:
-            carrier = await self.db.carriers.find_one({"mc_number": mc_number})
-            if carrier:
-                cursor = self.db.shipments.find({"carrier_id": carrier["_id"]})
-                async for shipment in cursor:
-                    if shipment["_id"] not in matched_ids:
-                        matched_ids.append(shipment["_id"])
-                        match_confidence = max(match_confidence, 0.7)
+        carrier_ids = [e["entity_id"] for e in entries if e["entity_type"] == "carrier"]
+        if carrier_ids and not matched_ids:
+            cursor = self.db.shipments.find({"carrier_id": carrier_ids[0]})
+            async for shipment in cursor:
+                if shipment["_id"] not in matched_ids:
+                    matched_ids.append(shipment["_id"])
+                    match_confidence = max(match_confidence, 0.7)
 
         # Try matching by origin/destination (for rate confirmations)
         origin_city = fields.get("origin_city")
         dest_city = fields.get("destination_city")
         if origin_city and dest_city and not matched_ids:
             cursor = self.db.shipments.find({
-                "stops.0.city": {"$regex": origin_city, "$options": "i"},
-                "stops.-1.city": {"$regex": dest_city, "$options": "i"},
+                "origin_city": {"$regex": re.escape(origin_city), "$options": "i"},
+                "destination_city": {"$regex": re.escape(dest_city), "$options": "i"},
             })
             async for shipment in cursor:
                 if shipment["_id"] not in matched_ids:
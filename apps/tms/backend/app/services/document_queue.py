@@ -0,0 +1,297 @@
+"""Durable queue and bounded worker pool for document AI processing.
+
+Documents to process are recorded as jobs in ``document_jobs`` rather than
+run as request background tasks, so a burst of uploads is drained at the
+pool's pace and survives a restart. Each of ``document_workers`` workers
+claims the oldest available job with an atomic ``find_one_and_update`` (so
+several API processes share one queue), runs
+:meth:`DocumentProcessor.process_document` under a timeout and records the
+outcome. Failed jobs are retried with exponential backoff up to
+``DOCUMENT_JOB_MAX_ATTEMPTS``; a job left running past its timeout by a
+dead process is requeued while it has attempts left. A partial unique
+index keeps one queued job per document, so a job that would be requeued
+while the document is already queued again is cancelled instead. The document's
+``extraction_status`` follows the job, so a timed-out or abandoned
+extraction never stays ``processing``.
+
+Model calls are bounded separately by the provider limiter (see
+:mod:`app.services.provider_limits`), and identical files reuse a cached
+extraction, so workers mostly wait on the provider rather than the API.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import get_settings
+from app.database import get_database
+from app.models.document import ExtractionStatus
+from app.services.document_processing import get_document_processor
+from app.services.provider_limits import provider_limiter
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_JOB_MAX_ATTEMPTS = 3
+DOCUMENT_JOB_RETRY_SECONDS = 30  # doubled after each failed attempt
+DOCUMENT_JOB_TIMEOUT_SECONDS = 300
+DOCUMENT_QUEUE_POLL_SECONDS = 5
+# Window for the latency figures in queue stats
+DOCUMENT_QUEUE_STATS_MINUTES = 60
+
+
+class DocumentQueue:
+    """Enqueues document processing jobs and runs them on a worker pool."""
+
+    def __init__(self) -> None:
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.busy = 0
+
+    def _notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def enqueue(self, document_id: str, source: str = "upload") -> None:
+        """Queue a document for processing; a document already queued is not added twice."""
+        await self.enqueue_many([document_id], source)
+
+    async def enqueue_many(self, document_ids: Iterable[str], source: str = "upload") -> int:
+        db = get_database()
+        now = datetime.utcnow()
+        document_ids = list(document_ids)
+        queued = 0
+        for document_id in document_ids:
+            try:
+                result = await db.document_jobs.update_one(
+                    {"document_id": ObjectId(document_id), "status": "queued"},
+                    {"$setOnInsert": {
+                        "source": source,
+                        "attempts": 0,
+                        "enqueued_at": now,
+                        "available_at": now,
+                    }},
+                    upsert=True,
+                )
+            except DuplicateKeyError:
+                # A concurrent enqueue inserted the queued job first
+                continue
+            queued += 1 if result.upserted_id else 0
+        await db.documents.update_many(
+            {"_id": {"$in": [ObjectId(d) for d in document_ids]}},
+            {"$set": {"extraction_status": "pending"}},
+        )
+        self._notify()
+        return queued
+
+    async def claim(self) -> Optional[dict]:
+        """Claim the oldest available job; None when the queue is empty."""
+        now = datetime.utcnow()
+        return await get_database().document_jobs.find_one_and_update(
+            {"status": "queued", "available_at": {"$lte": now}},
+            {"$set": {"status": "running", "started_at": now}, "$inc": {"attempts": 1}},
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def run_job(self, job: dict) -> None:
+        """Process a claimed job and record its outcome."""
+        db = get_database()
+        started = time.perf_counter()
+        timing = {
+            "wait_ms": round((job["started_at"] - job["enqueued_at"]).total_seconds() * 1000),
+        }
+        try:
+            if not await db.documents.find_one({"_id": job["document_id"]}, {"_id": 1}):
+                await db.document_jobs.update_one({"_id": job["_id"]}, {"$set": {
+                    "status": "cancelled", "completed_at": datetime.utcnow(), "error": "Document deleted",
+                }})
+                return
+            processor = get_document_processor()
+            await asyncio.wait_for(
+                processor.process_document(str(job["document_id"])), DOCUMENT_JOB_TIMEOUT_SECONDS
+            )
+        except asyncio.CancelledError:
+            # Shutting down; hand the job back without counting the attempt
+            await asyncio.shield(self._requeue(job["_id"], {"available_at": datetime.utcnow()}, {"attempts": -1}))
+            raise
+        except Exception as e:
+            error = "Timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+            await self._fail(job, error, started)
+            logger.warning(f"Document job {job['_id']} attempt {job['attempts']} failed: {error}")
+            return
+
+        await db.document_jobs.update_one({"_id": job["_id"]}, {"$set": {
+            "status": "done",
+            "completed_at": datetime.utcnow(),
+            "duration_ms": round((time.perf_counter() - started) * 1000),
+            **timing,
+        }})
+
+    @staticmethod
+    async def _requeue(job_id: ObjectId, update: dict, inc: Optional[dict] = None) -> bool:
+        """Put a job back on the queue; False if its document was queued again meanwhile.
+
+        The newer queued job covers the document, so this one is cancelled.
+        """
+        db = get_database()
+        change = {"$set": {**update, "status": "queued"}}
+        if inc:
+            change["$inc"] = inc
+        try:
+            await db.document_jobs.update_one({"_id": job_id}, change)
+        except DuplicateKeyError:
+            await db.document_jobs.update_one({"_id": job_id}, {"$set": {
+                "status": "cancelled", "completed_at": datetime.utcnow(), "error": "Superseded by a newer job",
+            }})
+            return False
+        return True
+
+    async def _fail(self, job: dict, error: str, started: float) -> None:
+        update = {
+            "error": error,
+            "duration_ms": round((time.perf_counter() - started) * 1000),
+        }
+        if job["attempts"] < DOCUMENT_JOB_MAX_ATTEMPTS:
+            delay = DOCUMENT_JOB_RETRY_SECONDS * 2 ** (job["attempts"] - 1)
+            await self._requeue(job["_id"], {**update, "available_at": datetime.utcnow() + timedelta(seconds=delay)})
+            extraction_status = ExtractionStatus.PENDING
+        else:
+            update.update(status="failed", completed_at=datetime.utcnow())
+            await get_database().document_jobs.update_one({"_id": job["_id"]}, {"$set": update})
+            extraction_status = ExtractionStatus.FAILED
+        await self._set_extraction([job["document_id"]], extraction_status, error)
+
+    async def requeue_stale(self) -> int:
+        """Requeue jobs left running past their timeout by a stopped process.
+
+        Jobs that have used all their attempts fail instead. Returns the
+        number requeued.
+        """
+        db = get_database()
+        now = datetime.utcnow()
+        stale = {
+            "status": "running",
+            "started_at": {"$lt": now - timedelta(seconds=DOCUMENT_JOB_TIMEOUT_SECONDS * 2)},
+        }
+        exhausted = {**stale, "attempts": {"$gte": DOCUMENT_JOB_MAX_ATTEMPTS}}
+        failed_ids = await db.document_jobs.distinct("document_id", exhausted)
+        if failed_ids:
+            await db.document_jobs.update_many(
+                exhausted, {"$set": {"status": "failed", "completed_at": now, "error": "Interrupted"}}
+            )
+            await self._set_extraction(failed_ids, ExtractionStatus.FAILED, "Interrupted")
+
+        retry = {**stale, "attempts": {"$lt": DOCUMENT_JOB_MAX_ATTEMPTS}}
+        retry_jobs = await db.document_jobs.find(retry, {"document_id": 1}).to_list(None)
+        if not retry_jobs:
+            return 0
+        requeued = 0
+        for job in retry_jobs:
+            if await self._requeue(job["_id"], {"available_at": now, "error": "Interrupted"}):
+                requeued += 1
+        await self._set_extraction(list({j["document_id"] for j in retry_jobs}), ExtractionStatus.PENDING, "Interrupted")
+        return requeued
+
+    @staticmethod
+    async def _set_extraction(document_ids: List[ObjectId], status: ExtractionStatus, error: str) -> None:
+        # A timeout or a dead process stops the processor before it records the outcome
+        await get_database().documents.update_many(
+            {"_id": {"$in": document_ids}},
+            {"$set": {"extraction_status": status.value, "extraction_error": error}},
+        )
+
+    async def process_next(self) -> bool:
+        """Claim and run one job; False when nothing was available."""
+        job = await self.claim()
+        if not job:
+            return False
+        self.busy += 1
+        try:
+            await self.run_job(job)
+        finally:
+            self.busy -= 1
+        return True
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            # Cleared before draining, so a job enqueued meanwhile wakes us again
+            self._wakeup.clear()
+            try:
+                if index == 0:
+                    await self.requeue_stale()
+                while await self.process_next():
+                    pass
+            except Exception as e:
+                logger.error(f"Document worker {index} failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), DOCUMENT_QUEUE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, workers: Optional[int] = None) -> None:
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        count = workers or get_settings().document_workers
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(count)]
+
+    async def stop(self) -> None:
+        """Stop the workers; jobs they were running go back on the queue."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._wakeup = None
+
+    async def stats(self) -> dict:
+        """Queue depth and latency over the last ``DOCUMENT_QUEUE_STATS_MINUTES``."""
+        db = get_database()
+        now = datetime.utcnow()
+        since = now - timedelta(minutes=DOCUMENT_QUEUE_STATS_MINUTES)
+        counts = {
+            row["_id"]: row["count"]
+            async for row in db.document_jobs.aggregate([
+                {"$match": {"status": {"$in": ["queued", "running"]}}},
+                {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+            ])
+        }
+        oldest = await db.document_jobs.find_one(
+            {"status": "queued"}, {"enqueued_at": 1}, sort=[("enqueued_at", 1)]
+        )
+        recent = await db.document_jobs.aggregate([
+            {"$match": {"status": {"$in": ["done", "failed"]}, "completed_at": {"$gte": since}}},
+            {"$group": {
+                "_id": None,
+                "completed": {"$sum": {"$cond": [{"$eq": ["$status", "done"]}, 1, 0]}},
+                "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}},
+                "avg_wait_ms": {"$avg": "$wait_ms"},
+                "max_wait_ms": {"$max": "$wait_ms"},
+                "avg_duration_ms": {"$avg": "$duration_ms"},
+                "max_duration_ms": {"$max": "$duration_ms"},
+            }},
+        ]).to_list(1)
+        window = recent[0] if recent else {}
+        window.pop("_id", None)
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "oldest_queued_seconds": round((now - oldest["enqueued_at"]).total_seconds()) if oldest else 0,
+            "workers": len(self._workers),
+            "busy_workers": self.busy,
+            "window_minutes": DOCUMENT_QUEUE_STATS_MINUTES,
+            "completed": window.get("completed", 0),
+            "failed": window.get("failed", 0),
+            "avg_wait_ms": round(window["avg_wait_ms"]) if window.get("avg_wait_ms") is not None else None,
+            "max_wait_ms": window.get("max_wait_ms"),
+            "avg_duration_ms": round(window["avg_duration_ms"]) if window.get("avg_duration_ms") is not None else None,
+            "max_duration_ms": window.get("max_duration_ms"),
+            "provider": provider_limiter("anthropic").stats(),
+        }
+
+
+document_queue = DocumentQueue()
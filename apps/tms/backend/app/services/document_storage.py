@@ -0,0 +1,170 @@
+"""Content-addressed local storage for uploaded documents and photos.
+
+Uploads are streamed to a temporary file in ``STORAGE_CHUNK_BYTES`` chunks
+while their SHA-256 is computed, then moved to ``objects/<aa>/<sha256>``
+under ``UPLOAD_DIR``. A file whose content is already stored is discarded,
+so the same POD arriving by email, the driver app and the portal is kept
+once. Document records carry the hash as ``content_hash``; a stored object
+is removed only when no document or photo references it any more.
+
+An upload that dedupes against an object finds it before its own record is
+written, so releasing an object never removes it on the spot: it schedules
+a ``storage_release`` timer (see :mod:`app.services.timer_service`) that
+re-checks the references after ``STORAGE_RELEASE_GRACE_SECONDS``. Deduping
+touches the object's modification time, and an object touched within the
+grace period is checked again later rather than removed.
+
+Files are immutable once stored, so a download can send the hash as its
+ETag and serve ``Range`` requests from the object directly.
+"""
+import hashlib
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import aiofiles
+from fastapi import UploadFile
+
+from app.database import get_database
+from app.services.timer_service import register_timer_handler, timer_scheduler
+
+UPLOAD_DIR = "/app/uploads"
+STORAGE_CHUNK_BYTES = 1024 * 1024
+STORAGE_RELEASE_TIMER = "storage_release"
+# Longer than any upload takes from deduping to writing its record
+STORAGE_RELEASE_GRACE_SECONDS = 600
+
+
+@dataclass
+class StoredFile:
+    content_hash: str
+    path: str
+    size_bytes: int
+    deduplicated: bool
+
+
+def object_path(content_hash: str) -> str:
+    return os.path.join(UPLOAD_DIR, "objects", content_hash[:2], content_hash)
+
+
+def _touch(path: str) -> bool:
+    """Mark a stored object as just deduped against; False if it is not stored."""
+    try:
+        os.utime(path)
+    except OSError:
+        return False
+    return True
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def _referenced(content_hash: str) -> bool:
+    db = get_database()
+    if await db.documents.find_one({"content_hash": content_hash}, {"_id": 1}):
+        return True
+    return bool(await db.shipment_photos.find_one({"content_hash": content_hash}, {"_id": 1}))
+
+
+def _commit(tmp_path: str, content_hash: str, size: int) -> StoredFile:
+    """Move a fully written temp file into place, or drop it if already stored."""
+    path = object_path(content_hash)
+    if _touch(path):
+        os.remove(tmp_path)
+        return StoredFile(content_hash, path, size, deduplicated=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Atomic on one filesystem; a concurrent identical upload just replaces
+    # the object with the same bytes.
+    os.replace(tmp_path, path)
+    return StoredFile(content_hash, path, size, deduplicated=False)
+
+
+def _tmp_path() -> str:
+    tmp_dir = os.path.join(UPLOAD_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    return os.path.join(tmp_dir, uuid.uuid4().hex)
+
+
+class DocumentStorage:
+    """Streams uploads into content-addressed storage."""
+
+    @staticmethod
+    async def save_upload(upload: UploadFile) -> StoredFile:
+        """Stream an upload to disk in chunks, hashing as it goes."""
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = _tmp_path()
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                while chunk := await upload.read(STORAGE_CHUNK_BYTES):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return _commit(tmp_path, digest.hexdigest(), size)
+
+    @staticmethod
+    async def save_bytes(data: bytes) -> StoredFile:
+        """Store content already in memory (e.g. decoded base64 scans)."""
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = object_path(content_hash)
+        if _touch(path):
+            return StoredFile(content_hash, path, len(data), deduplicated=True)
+        tmp_path = _tmp_path()
+        async with aiofiles.open(tmp_path, "wb") as f:
+            await f.write(data)
+        return _commit(tmp_path, content_hash, len(data))
+
+    @staticmethod
+    async def release(storage_path: str, content_hash: Optional[str]) -> None:
+        """Remove a file once nothing references it.
+
+        Call after the referencing record is deleted. Files stored before
+        content addressing (no hash) belong to a single record and are
+        removed at once; shared objects after the grace period.
+        """
+        if not content_hash:
+            _remove(storage_path)
+            return
+        if await _referenced(content_hash):
+            return
+        await timer_scheduler.schedule(
+            STORAGE_RELEASE_TIMER,
+            content_hash,
+            datetime.utcnow() + timedelta(seconds=STORAGE_RELEASE_GRACE_SECONDS),
+            {"content_hash": content_hash, "storage_path": storage_path},
+        )
+
+    @staticmethod
+    async def remove_if_unreferenced(payload: dict) -> None:
+        """Remove a released object unless an upload has referenced or deduped against it since."""
+        content_hash, path = payload["content_hash"], payload["storage_path"]
+        if await _referenced(content_hash):
+            return
+        try:
+            touched_ago = time.time() - os.path.getmtime(path)
+        except OSError:
+            return
+        if touched_ago < STORAGE_RELEASE_GRACE_SECONDS:
+            # Deduped against meanwhile; its record may not be written yet
+            await timer_scheduler.schedule(
+                STORAGE_RELEASE_TIMER,
+                content_hash,
+                datetime.utcnow() + timedelta(seconds=STORAGE_RELEASE_GRACE_SECONDS - touched_ago),
+                payload,
+            )
+            return
+        _remove(path)
+
+
+register_timer_handler(STORAGE_RELEASE_TIMER, DocumentStorage.remove_if_unreferenced)
@@ -4,6 +4,12 @@ This implements simple parsers that extract key fields from segment-delimited
 EDI format. Each EDI message uses segment terminators (typically ~) and element
 separators (typically *) to delimit data.
 
+Interchanges are tokenized in a single streaming pass (``iter_segments``);
+``iter_transaction_sets`` groups segments into ST/SE transaction sets and
+yields them lazily, so large multi-transaction files never need to be held in
+memory. Each ``TransactionSet`` indexes its segments by ID once, and the
+per-type parsers read from that index.
+
 EDI Transaction Sets:
 - 204: Motor Carrier Load Tender (shipper sends load details to carrier)
 - 214: Transportation Carrier Shipment Status (carrier sends status updates)
@@ -13,25 +19,123 @@ EDI Transaction Sets:
 
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, Iterator, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_ELEMENT_SEPARATOR = "*"
+DEFAULT_SEGMENT_TERMINATOR = "~"
+
+# The ISA segment is fixed-width: element separator at offset 3, component
+# separator at 104 and segment terminator at 105.
+_ISA_LENGTH = 106
+
+
+class TransactionSet:
+    """One ST..SE transaction set with its envelope and a segment-ID index."""
+
+    __slots__ = ("segments", "envelope", "header_segments", "_index")
+
+    def __init__(self, segments: list[list[str]], envelope: dict,
+                 header_segments: Optional[list[list[str]]] = None):
+        self.segments = segments
+        self.envelope = envelope
+        self.header_segments = header_segments or []
+        index: dict[str, list[list[str]]] = {}
+        for seg in segments:
+            if seg:
+                index.setdefault(seg[0], []).append(seg)
+        self._index = index
+
+    def find(self, segment_id: str) -> list[list[str]]:
+        """All segments with the given ID, in document order."""
+        return self._index.get(segment_id, [])
+
+    def first(self, segment_id: str) -> Optional[list[str]]:
+        """The first segment with the given ID, if any."""
+        found = self._index.get(segment_id)
+        return found[0] if found else None
+
+    @property
+    def transaction_type(self) -> Optional[str]:
+        st = self.first("ST")
+        return _get_element(st, 1) or None if st else None
+
+    def to_raw(self, element_separator: str = DEFAULT_ELEMENT_SEPARATOR,
+               segment_terminator: str = DEFAULT_SEGMENT_TERMINATOR) -> str:
+        """Serialize the set (with its ISA/GS headers) back to EDI text."""
+        return "".join(
+            element_separator.join(seg) + segment_terminator
+            for seg in (*self.header_segments, *self.segments)
+        )
+
+
+def detect_delimiters(head: str) -> Optional[tuple[str, str]]:
+    """Read ``(element_separator, segment_terminator)`` from an ISA header.
+
+    Returns None when ``head`` does not start with a complete ISA segment.
+    """
+    head = head.lstrip()
+    if not head.startswith("ISA") or len(head) < _ISA_LENGTH:
+        return None
+    element_separator = head[3]
+    segment_terminator = head[_ISA_LENGTH - 1]
+    if segment_terminator == "\r" and head[_ISA_LENGTH:_ISA_LENGTH + 1] == "\n":
+        segment_terminator = "\n"
+    return element_separator, segment_terminator
+
+
+def _iter_chunks(source: Union[str, Iterable[str]], chunk_size: int = 65536) -> Iterator[str]:
+    if isinstance(source, str):
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i + chunk_size]
+    else:
+        yield from source
+
+
+class SegmentTokenizer:
+    """Incremental segment splitter: feed text chunks, get complete segments."""
+
+    def __init__(self, segment_terminator: str = DEFAULT_SEGMENT_TERMINATOR,
+                 element_separator: str = DEFAULT_ELEMENT_SEPARATOR):
+        self.segment_terminator = segment_terminator
+        self.element_separator = element_separator
+        # Line breaks are formatting noise unless they are the terminator itself
+        noise = "".join(c for c in "\r\n" if c != segment_terminator)
+        self._table = str.maketrans("", "", noise)
+        self._buffer = ""
+
+    def _split(self, raw: str) -> Optional[list[str]]:
+        seg = raw.strip()
+        return seg.split(self.element_separator) if seg else None
+
+    def feed(self, chunk: str) -> list[list[str]]:
+        chunk = chunk.translate(self._table)
+        self._buffer += chunk
+        if self.segment_terminator not in chunk:
+            return []
+        *complete, self._buffer = self._buffer.split(self.segment_terminator)
+        return [seg for seg in map(self._split, complete) if seg]
+
+    def close(self) -> list[list[str]]:
+        seg = self._split(self._buffer)
+        self._buffer = ""
+        return [seg] if seg else []
+
+
+def iter_segments(chunks: Iterable[str], segment_terminator: str = DEFAULT_SEGMENT_TERMINATOR,
+                  element_separator: str = DEFAULT_ELEMENT_SEPARATOR) -> Iterator[list[str]]:
+    """Tokenize EDI text arriving in chunks into element lists, one pass."""
+    tokenizer = SegmentTokenizer(segment_terminator, element_separator)
+    for chunk in chunks:
+        yield from tokenizer.feed(chunk)
+    yield from tokenizer.close()
+
 
 def parse_edi_segments(raw_content: str, segment_terminator: str = "~",
                        element_separator: str = "*") -> list[list[str]]:
     """Split raw EDI content into a list of segments, each split into elements."""
-    # Clean up whitespace/newlines that may be mixed in
-    cleaned = raw_content.replace("\n", "").replace("\r", "").strip()
-    # Split into segments
-    raw_segments = cleaned.split(segment_terminator)
-    segments = []
-    for seg in raw_segments:
-        seg = seg.strip()
-        if seg:
-            elements = seg.split(element_separator)
-            segments.append(elements)
-    return segments
+    return list(iter_segments(_iter_chunks(raw_content), segment_terminator, element_separator))
 
 
 def _find_segments(segments: list[list[str]], segment_id: str) -> list[list[str]]:
@@ -69,62 +173,195 @@ def _parse_edi_time(time_str: str) -> Optional[str]:
     return f"{time_str[:2]}:{time_str[2:4]}"
 
 
+def _isa_envelope(isa: list[str]) -> dict:
+    return {
+        "isa_sender_qualifier": _get_element(isa, 5),
+        "isa_sender_id": _get_element(isa, 6).strip(),
+        "isa_receiver_qualifier": _get_element(isa, 7),
+        "isa_receiver_id": _get_element(isa, 8).strip(),
+        "isa_date": _get_element(isa, 9),
+        "isa_time": _get_element(isa, 10),
+        "isa_control_number": _get_element(isa, 13),
+    }
+
+
+def _gs_envelope(gs: list[str]) -> dict:
+    return {
+        "gs_functional_id": _get_element(gs, 1),
+        "gs_sender_code": _get_element(gs, 2),
+        "gs_receiver_code": _get_element(gs, 3),
+        "gs_date": _get_element(gs, 4),
+        "gs_time": _get_element(gs, 5),
+        "gs_control_number": _get_element(gs, 6),
+    }
+
+
+def _st_envelope(st: list[str]) -> dict:
+    return {
+        "st_transaction_set": _get_element(st, 1),
+        "st_control_number": _get_element(st, 2),
+    }
+
+
 def parse_interchange_envelope(segments: list[list[str]]) -> dict:
     """Extract ISA/GS envelope information."""
     envelope = {}
+    for seg_id, extract in (("ISA", _isa_envelope), ("GS", _gs_envelope), ("ST", _st_envelope)):
+        found = next((s for s in segments if s and s[0] == seg_id), None)
+        if found:
+            envelope.update(extract(found))
+    return envelope
 
-    isa_segs = _find_segments(segments, "ISA")
-    if isa_segs:
-        isa = isa_segs[0]
-        envelope["isa_sender_qualifier"] = _get_element(isa, 5)
-        envelope["isa_sender_id"] = _get_element(isa, 6).strip()
-        envelope["isa_receiver_qualifier"] = _get_element(isa, 7)
-        envelope["isa_receiver_id"] = _get_element(isa, 8).strip()
-        envelope["isa_date"] = _get_element(isa, 9)
-        envelope["isa_time"] = _get_element(isa, 10)
-        envelope["isa_control_number"] = _get_element(isa, 13)
-
-    gs_segs = _find_segments(segments, "GS")
-    if gs_segs:
-        gs = gs_segs[0]
-        envelope["gs_functional_id"] = _get_element(gs, 1)
-        envelope["gs_sender_code"] = _get_element(gs, 2)
-        envelope["gs_receiver_code"] = _get_element(gs, 3)
-        envelope["gs_date"] = _get_element(gs, 4)
-        envelope["gs_time"] = _get_element(gs, 5)
-        envelope["gs_control_number"] = _get_element(gs, 6)
-
-    st_segs = _find_segments(segments, "ST")
-    if st_segs:
-        st = st_segs[0]
-        envelope["st_transaction_set"] = _get_element(st, 1)
-        envelope["st_control_number"] = _get_element(st, 2)
 
-    return envelope
+def _transaction_from_content(raw_content: str, element_separator: str,
+                              segment_terminator: str) -> TransactionSet:
+    """Treat a whole message as one transaction set (single-message API)."""
+    segments = parse_edi_segments(raw_content, segment_terminator, element_separator)
+    return TransactionSet(segments, parse_interchange_envelope(segments))
 
 
-def parse_204(raw_content: str, element_separator: str = "*",
-              segment_terminator: str = "~") -> dict:
-    """Parse EDI 204 - Motor Carrier Load Tender.
+class InterchangeReader:
+    """Push-style interchange reader for streamed input (e.g. request bodies).
 
-    Key segments:
-    - B2: Beginning segment (standard carrier alpha code, reference identification)
-    - B2A: Set purpose (original, change, cancellation)
-    - L11: Business instructions/reference numbers
-    - NTE: Notes
-    - N1/N3/N4: Name/address (shipper, consignee, etc.)
-    - N7: Equipment details
-    - S5: Stop-off details (stop sequence, reason)
-    - G62: Date/time
-    - AT8: Shipment weight/packaging/quantity data
-    - L5: Description marks and numbers
+    ``feed`` text chunks as they arrive and collect the completed transaction
+    sets it returns; call ``close`` at the end. Separators not given are
+    detected from the ISA header, falling back to the defaults. Each set's
+    envelope carries the ISA and GS fields in effect plus its own ST fields.
+    Content without any ST segment is returned as a single set, like
+    ``parse_edi_message``.
     """
-    segments = parse_edi_segments(raw_content, segment_terminator, element_separator)
-    envelope = parse_interchange_envelope(segments)
 
+    def __init__(self, element_separator: Optional[str] = None,
+                 segment_terminator: Optional[str] = None,
+                 default_element_separator: str = DEFAULT_ELEMENT_SEPARATOR,
+                 default_segment_terminator: str = DEFAULT_SEGMENT_TERMINATOR):
+        self._element_separator = element_separator
+        self._segment_terminator = segment_terminator
+        self._defaults = (default_element_separator, default_segment_terminator)
+        self._head = ""
+        self._tokenizer: Optional[SegmentTokenizer] = None
+        self._isa: Optional[list[str]] = None
+        self._gs: Optional[list[str]] = None
+        self._interchange: dict = {}
+        self._current: Optional[list[list[str]]] = None
+        self._loose: list[list[str]] = []
+        self._yielded = False
+
+    @property
+    def element_separator(self) -> str:
+        return self._tokenizer.element_separator if self._tokenizer else self._defaults[0]
+
+    @property
+    def segment_terminator(self) -> str:
+        return self._tokenizer.segment_terminator if self._tokenizer else self._defaults[1]
+
+    def _start(self) -> None:
+        detected = detect_delimiters(self._head)
+        element_separator = self._element_separator or (detected[0] if detected else self._defaults[0])
+        segment_terminator = self._segment_terminator or (detected[1] if detected else self._defaults[1])
+        self._tokenizer = SegmentTokenizer(segment_terminator, element_separator)
+
+    def feed(self, chunk: str) -> list[TransactionSet]:
+        if self._tokenizer is None:
+            self._head += chunk
+            if len(self._head.lstrip()) < _ISA_LENGTH + 1:
+                return []
+            self._start()
+            chunk, self._head = self._head, ""
+        return self._consume(self._tokenizer.feed(chunk))
+
+    def close(self) -> list[TransactionSet]:
+        if self._tokenizer is None:
+            self._start()
+            sets = self._consume(self._tokenizer.feed(self._head))
+        else:
+            sets = []
+        sets += self._consume(self._tokenizer.close())
+
+        if self._current is not None:
+            # Missing SE: still hand back what was received
+            sets.append(self._close_set())
+        elif not self._yielded and not sets and self._loose:
+            sets.append(TransactionSet(self._loose, dict(self._interchange)))
+        return sets
+
+    def _close_set(self) -> TransactionSet:
+        current, self._current = self._current, None
+        envelope = {**self._interchange, **_st_envelope(current[0])}
+        self._yielded = True
+        return TransactionSet(current, envelope, [s for s in (self._isa, self._gs) if s])
+
+    def _consume(self, segments: list[list[str]]) -> list[TransactionSet]:
+        sets = []
+        for seg in segments:
+            seg_id = seg[0]
+            if self._current is not None:
+                self._current.append(seg)
+                if seg_id == "SE":
+                    sets.append(self._close_set())
+            elif seg_id == "ST":
+                self._current = [seg]
+            elif seg_id == "ISA":
+                self._isa, self._gs = seg, None
+                self._interchange = _isa_envelope(seg)
+            elif seg_id == "GS":
+                self._gs = seg
+                self._interchange = {**(_isa_envelope(self._isa) if self._isa else {}), **_gs_envelope(seg)}
+            elif seg_id not in ("GE", "IEA"):
+                self._loose.append(seg)
+        return sets
+
+
+def iter_transaction_sets(source: Union[str, Iterable[str]],
+                          element_separator: Optional[str] = None,
+                          segment_terminator: Optional[str] = None) -> Iterator[TransactionSet]:
+    """Lazily yield each ST..SE transaction set in an interchange.
+
+    ``source`` is the EDI text or an iterable of text chunks; see
+    ``InterchangeReader`` for delimiter detection and envelope handling.
+    """
+    reader = InterchangeReader(element_separator, segment_terminator)
+    for chunk in _iter_chunks(source):
+        yield from reader.feed(chunk)
+    yield from reader.close()
+
+
+def _parse_party_blocks(ts: TransactionSet, entity_map: dict, with_ids: bool) -> list[dict]:
+    """N1/N3/N4 party loops."""
+    parties = []
+    current_party: Optional[dict] = None
+    for seg in ts.segments:
+        seg_id = seg[0] if seg else ""
+        if seg_id == "N1":
+            if current_party:
+                parties.append(current_party)
+            entity_code = _get_element(seg, 1)
+            current_party = {
+                "role": entity_map.get(entity_code, entity_code),
+                "name": _get_element(seg, 2),
+            }
+            if with_ids:
+                current_party["id_qualifier"] = _get_element(seg, 3)
+                current_party["id_number"] = _get_element(seg, 4)
+        elif seg_id == "N3" and current_party:
+            current_party["address_line1"] = _get_element(seg, 1)
+            if with_ids:
+                current_party["address_line2"] = _get_element(seg, 2)
+        elif seg_id == "N4" and current_party:
+            current_party["city"] = _get_element(seg, 1)
+            current_party["state"] = _get_element(seg, 2)
+            current_party["zip_code"] = _get_element(seg, 3)
+            if with_ids:
+                current_party["country"] = _get_element(seg, 4)
+    if current_party:
+        parties.append(current_party)
+    return parties
+
+
+def _parse_204(ts: TransactionSet) -> dict:
     result = {
         "transaction_type": "204",
-        "envelope": envelope,
+        "envelope": ts.envelope,
         "purpose": None,
         "reference_numbers": [],
         "stops": [],
@@ -135,21 +372,20 @@ def parse_204(raw_content: str, element_separator: str = "*",
     }
 
     # B2 - Beginning segment
-    b2_segs = _find_segments(segments, "B2")
-    if b2_segs:
-        b2 = b2_segs[0]
+    b2 = ts.first("B2")
+    if b2:
         result["scac"] = _get_element(b2, 2)
         result["shipment_id"] = _get_element(b2, 4)
 
     # B2A - Set purpose
-    b2a_segs = _find_segments(segments, "B2A")
-    if b2a_segs:
-        purpose_code = _get_element(b2a_segs[0], 1)
+    b2a = ts.first("B2A")
+    if b2a:
+        purpose_code = _get_element(b2a, 1)
         purpose_map = {"00": "original", "01": "cancellation", "04": "change"}
         result["purpose"] = purpose_map.get(purpose_code, purpose_code)
 
     # L11 - Reference numbers
-    for l11 in _find_segments(segments, "L11"):
+    for l11 in ts.find("L11"):
         ref_num = _get_element(l11, 1)
         ref_qual = _get_element(l11, 2)
         if ref_num:
@@ -159,44 +395,21 @@ def parse_204(raw_content: str, element_separator: str = "*",
             })
 
     # NTE - Notes
-    for nte in _find_segments(segments, "NTE"):
+    for nte in ts.find("NTE"):
         note_code = _get_element(nte, 1)
         note_text = _get_element(nte, 2)
         if note_text:
             result["notes"].append({"code": note_code, "text": note_text})
 
     # N1/N3/N4 - Party/address blocks
-    current_party: Optional[dict] = None
-    for seg in segments:
-        seg_id = seg[0] if seg else ""
-        if seg_id == "N1":
-            if current_party:
-                result["parties"].append(current_party)
-            entity_code = _get_element(seg, 1)
-            entity_map = {
-                "SH": "shipper", "CN": "consignee", "SF": "ship_from",
-                "ST": "ship_to", "BT": "bill_to", "CA": "carrier",
-            }
-            current_party = {
-                "role": entity_map.get(entity_code, entity_code),
-                "name": _get_element(seg, 2),
-                "id_qualifier": _get_element(seg, 3),
-                "id_number": _get_element(seg, 4),
-            }
-        elif seg_id == "N3" and current_party:
-            current_party["address_line1"] = _get_element(seg, 1)
-            current_party["address_line2"] = _get_element(seg, 2)
-        elif seg_id == "N4" and current_party:
-            current_party["city"] = _get_element(seg, 1)
-            current_party["state"] = _get_element(seg, 2)
-            current_party["zip_code"] = _get_element(seg, 3)
-            current_party["country"] = _get_element(seg, 4)
-    if current_party:
-        result["parties"].append(current_party)
+    result["parties"] = _parse_party_blocks(ts, {
+        "SH": "shipper", "CN": "consignee", "SF": "ship_from",
+        "ST": "ship_to", "BT": "bill_to", "CA": "carrier",
+    }, with_ids=True)
 
     # S5 - Stop-off details
     current_stop: Optional[dict] = None
-    for seg in segments:
+    for seg in ts.segments:
         seg_id = seg[0] if seg else ""
         if seg_id == "S5":
             if current_stop:
@@ -222,9 +435,8 @@ def parse_204(raw_content: str, element_separator: str = "*",
         result["stops"].append(current_stop)
 
     # N7 - Equipment
-    n7_segs = _find_segments(segments, "N7")
-    if n7_segs:
-        n7 = n7_segs[0]
+    n7 = ts.first("N7")
+    if n7:
         result["equipment"] = {
             "equipment_number": _get_element(n7, 1),
             "equipment_type": _get_element(n7, 5) if len(n7) > 5 else "",
@@ -232,9 +444,8 @@ def parse_204(raw_content: str, element_separator: str = "*",
         }
 
     # AT8 - Weight/packaging data
-    at8_segs = _find_segments(segments, "AT8")
-    if at8_segs:
-        at8 = at8_segs[0]
+    at8 = ts.first("AT8")
+    if at8:
         result["weight"] = {
             "weight_qualifier": _get_element(at8, 1),
             "weight_unit": _get_element(at8, 2),
@@ -245,37 +456,61 @@ def parse_204(raw_content: str, element_separator: str = "*",
     return result
 
 
-def parse_214(raw_content: str, element_separator: str = "*",
+def parse_204(raw_content: str, element_separator: str = "*",
               segment_terminator: str = "~") -> dict:
-    """Parse EDI 214 - Transportation Carrier Shipment Status Message.
+    """Parse EDI 204 - Motor Carrier Load Tender.
 
     Key segments:
-    - B10: Beginning segment (reference ID, shipment ID, SCAC)
-    - L11: Reference numbers
-    - AT7: Shipment status details (status code, reason, date/time, location)
-    - MS1: Equipment/container/gen code (city, state)
-    - MS2: Equipment or container status
+    - B2: Beginning segment (standard carrier alpha code, reference identification)
+    - B2A: Set purpose (original, change, cancellation)
+    - L11: Business instructions/reference numbers
+    - NTE: Notes
+    - N1/N3/N4: Name/address (shipper, consignee, etc.)
+    - N7: Equipment details
+    - S5: Stop-off details (stop sequence, reason)
+    - G62: Date/time
+    - AT8: Shipment weight/packaging/quantity data
+    - L5: Description marks and numbers
     """
-    segments = parse_edi_segments(raw_content, segment_terminator, element_separator)
-    envelope = parse_interchange_envelope(segments)
-
+    return _parse_204(_transaction_from_content(raw_content, element_separator, segment_terminator))
+
+
+# AT7 status codes
+_214_STATUS_MAP = {
+    "AF": "carrier_departed_pickup",
+    "AG": "estimated_delivery",
+    "AI": "in_transit_to_destination",
+    "AM": "arrived_at_delivery",
+    "AP": "arrived_at_pickup",
+    "AV": "available_for_delivery",
+    "CD": "carrier_departed",
+    "D1": "delivered",
+    "OA": "out_for_delivery",
+    "PR": "pickup_request",
+    "RL": "rail_departure",
+    "X1": "arrived_at_customs",
+    "X3": "customs_released",
+    "X6": "en_route_to_delivery",
+}
+
+
+def _parse_214(ts: TransactionSet) -> dict:
     result = {
         "transaction_type": "214",
-        "envelope": envelope,
+        "envelope": ts.envelope,
         "reference_numbers": [],
         "status_updates": [],
     }
 
     # B10 - Beginning segment
-    b10_segs = _find_segments(segments, "B10")
-    if b10_segs:
-        b10 = b10_segs[0]
+    b10 = ts.first("B10")
+    if b10:
         result["reference_id"] = _get_element(b10, 1)
         result["shipment_id"] = _get_element(b10, 2)
         result["scac"] = _get_element(b10, 3)
 
     # L11 - Reference numbers
-    for l11 in _find_segments(segments, "L11"):
+    for l11 in ts.find("L11"):
         ref_num = _get_element(l11, 1)
         ref_qual = _get_element(l11, 2)
         if ref_num:
@@ -285,32 +520,15 @@ def parse_214(raw_content: str, element_separator: str = "*",
             })
 
     # AT7 - Shipment status details
-    for at7 in _find_segments(segments, "AT7"):
+    for at7 in ts.find("AT7"):
         status_code = _get_element(at7, 1)
         reason_code = _get_element(at7, 2)
         date_val = _get_element(at7, 5) if len(at7) > 5 else ""
         time_val = _get_element(at7, 6) if len(at7) > 6 else ""
 
-        status_map = {
-            "AF": "carrier_departed_pickup",
-            "AG": "estimated_delivery",
-            "AI": "in_transit_to_destination",
-            "AM": "arrived_at_delivery",
-            "AP": "arrived_at_pickup",
-            "AV": "available_for_delivery",
-            "CD": "carrier_departed",
-            "D1": "delivered",
-            "OA": "out_for_delivery",
-            "PR": "pickup_request",
-            "RL": "rail_departure",
-            "X1": "arrived_at_customs",
-            "X3": "customs_released",
-            "X6": "en_route_to_delivery",
-        }
-
         update = {
             "status_code": status_code,
-            "status_description": status_map.get(status_code, status_code),
+            "status_description": _214_STATUS_MAP.get(status_code, status_code),
             "reason_code": reason_code,
             "date": _parse_edi_date(date_val),
             "time": _parse_edi_time(time_val),
@@ -318,9 +536,8 @@ def parse_214(raw_content: str, element_separator: str = "*",
         result["status_updates"].append(update)
 
     # MS1 - Equipment, Shipment or Real Property Location
-    ms1_segs = _find_segments(segments, "MS1")
-    if ms1_segs:
-        ms1 = ms1_segs[0]
+    ms1 = ts.first("MS1")
+    if ms1:
         result["location"] = {
             "city": _get_element(ms1, 1),
             "state": _get_element(ms1, 2),
@@ -330,25 +547,24 @@ def parse_214(raw_content: str, element_separator: str = "*",
     return result
 
 
-def parse_210(raw_content: str, element_separator: str = "*",
+def parse_214(raw_content: str, element_separator: str = "*",
               segment_terminator: str = "~") -> dict:
-    """Parse EDI 210 - Motor Carrier Freight Details and Invoice.
+    """Parse EDI 214 - Transportation Carrier Shipment Status Message.
 
     Key segments:
-    - B3: Beginning segment (invoice number, shipment ID, payment method, amounts)
-    - N1/N3/N4: Parties (remit to, bill to, shipper, consignee)
-    - N9: Reference numbers
-    - L5: Description of commodity
-    - L0: Line item - quantity and weight
-    - L1: Rate and charges
-    - L3: Total weight and charges
+    - B10: Beginning segment (reference ID, shipment ID, SCAC)
+    - L11: Reference numbers
+    - AT7: Shipment status details (status code, reason, date/time, location)
+    - MS1: Equipment/container/gen code (city, state)
+    - MS2: Equipment or container status
     """
-    segments = parse_edi_segments(raw_content, segment_terminator, element_separator)
-    envelope = parse_interchange_envelope(segments)
+    return _parse_214(_transaction_from_content(raw_content, element_separator, segment_terminator))
 
+
+def _parse_210(ts: TransactionSet) -> dict:
     result = {
         "transaction_type": "210",
-        "envelope": envelope,
+        "envelope": ts.envelope,
         "reference_numbers": [],
         "parties": [],
         "line_items": [],
@@ -357,9 +573,8 @@ def parse_210(raw_content: str, element_separator: str = "*",
     }
 
     # B3 - Beginning segment for carrier invoice
-    b3_segs = _find_segments(segments, "B3")
-    if b3_segs:
-        b3 = b3_segs[0]
+    b3 = ts.first("B3")
+    if b3:
         result["invoice_number"] = _get_element(b3, 2)
         result["shipment_id"] = _get_element(b3, 3)
         result["payment_method"] = _get_element(b3, 4)
@@ -369,7 +584,7 @@ def parse_210(raw_content: str, element_separator: str = "*",
         result["delivery_date"] = _parse_edi_date(_get_element(b3, 12)) if len(b3) > 12 else None
 
     # N9 - Reference numbers
-    for n9 in _find_segments(segments, "N9"):
+    for n9 in ts.find("N9"):
         ref_qual = _get_element(n9, 1)
         ref_num = _get_element(n9, 2)
         if ref_num:
@@ -379,33 +594,14 @@ def parse_210(raw_content: str, element_separator: str = "*",
             })
 
     # N1/N3/N4 - Party/address blocks
-    current_party: Optional[dict] = None
-    for seg in segments:
-        seg_id = seg[0] if seg else ""
-        if seg_id == "N1":
-            if current_party:
-                result["parties"].append(current_party)
-            entity_code = _get_element(seg, 1)
-            entity_map = {
-                "RE": "remit_to", "BT": "bill_to", "SH": "shipper",
-                "CN": "consignee", "CA": "carrier",
-            }
-            current_party = {
-                "role": entity_map.get(entity_code, entity_code),
-                "name": _get_element(seg, 2),
-            }
-        elif seg_id == "N3" and current_party:
-            current_party["address_line1"] = _get_element(seg, 1)
-        elif seg_id == "N4" and current_party:
-            current_party["city"] = _get_element(seg, 1)
-            current_party["state"] = _get_element(seg, 2)
-            current_party["zip_code"] = _get_element(seg, 3)
-    if current_party:
-        result["parties"].append(current_party)
+    result["parties"] = _parse_party_blocks(ts, {
+        "RE": "remit_to", "BT": "bill_to", "SH": "shipper",
+        "CN": "consignee", "CA": "carrier",
+    }, with_ids=False)
 
     # L5 / L0 / L1 - Line items and charges
     current_item: Optional[dict] = None
-    for seg in segments:
+    for seg in ts.segments:
         seg_id = seg[0] if seg else ""
         if seg_id == "L5":
             if current_item:
@@ -430,9 +626,8 @@ def parse_210(raw_content: str, element_separator: str = "*",
         result["line_items"].append(current_item)
 
     # L3 - Total weight and charges
-    l3_segs = _find_segments(segments, "L3")
-    if l3_segs:
-        l3 = l3_segs[0]
+    l3 = ts.first("L3")
+    if l3:
         result["total"] = {
             "weight": _get_element(l3, 1),
             "weight_qualifier": _get_element(l3, 2),
@@ -444,33 +639,38 @@ def parse_210(raw_content: str, element_separator: str = "*",
     return result
 
 
-def parse_990(raw_content: str, element_separator: str = "*",
+def parse_210(raw_content: str, element_separator: str = "*",
               segment_terminator: str = "~") -> dict:
-    """Parse EDI 990 - Response to a Load Tender.
+    """Parse EDI 210 - Motor Carrier Freight Details and Invoice.
 
     Key segments:
-    - B1: Beginning segment (SCAC, shipment ID, date)
+    - B3: Beginning segment (invoice number, shipment ID, payment method, amounts)
+    - N1/N3/N4: Parties (remit to, bill to, shipper, consignee)
     - N9: Reference numbers
+    - L5: Description of commodity
+    - L0: Line item - quantity and weight
+    - L1: Rate and charges
+    - L3: Total weight and charges
     """
-    segments = parse_edi_segments(raw_content, segment_terminator, element_separator)
-    envelope = parse_interchange_envelope(segments)
+    return _parse_210(_transaction_from_content(raw_content, element_separator, segment_terminator))
+
 
+def _parse_990(ts: TransactionSet) -> dict:
     result = {
         "transaction_type": "990",
-        "envelope": envelope,
+        "envelope": ts.envelope,
         "reference_numbers": [],
     }
 
     # B1 - Beginning segment
-    b1_segs = _find_segments(segments, "B1")
-    if b1_segs:
-        b1 = b1_segs[0]
+    b1 = ts.first("B1")
+    if b1:
         result["scac"] = _get_element(b1, 1)
         result["shipment_id"] = _get_element(b1, 2)
         result["date"] = _parse_edi_date(_get_element(b1, 3))
 
     # N9 - Reference numbers (including response code)
-    for n9 in _find_segments(segments, "N9"):
+    for n9 in ts.find("N9"):
         ref_qual = _get_element(n9, 1)
         ref_num = _get_element(n9, 2)
         if ref_num:
@@ -486,52 +686,70 @@ def parse_990(raw_content: str, element_separator: str = "*",
     return result
 
 
-def parse_edi_message(raw_content: str, message_type: Optional[str] = None,
-                      element_separator: str = "*",
-                      segment_terminator: str = "~") -> dict:
-    """Parse an EDI message, auto-detecting type if not specified.
-
-    Args:
-        raw_content: The raw EDI content string
-        message_type: Optional message type override ("204", "214", "210", "990")
-        element_separator: Element separator character (default: *)
-        segment_terminator: Segment terminator character (default: ~)
+def parse_990(raw_content: str, element_separator: str = "*",
+              segment_terminator: str = "~") -> dict:
+    """Parse EDI 990 - Response to a Load Tender.
 
-    Returns:
-        Parsed data dictionary with extracted fields
+    Key segments:
+    - B1: Beginning segment (SCAC, shipment ID, date)
+    - N9: Reference numbers
     """
-    # Auto-detect message type from ST segment if not specified
-    if not message_type:
-        segments = parse_edi_segments(raw_content, segment_terminator, element_separator)
-        st_segs = _find_segments(segments, "ST")
-        if st_segs:
-            message_type = _get_element(st_segs[0], 1)
+    return _parse_990(_transaction_from_content(raw_content, element_separator, segment_terminator))
 
-    if not message_type:
-        return {"error": "Could not determine EDI message type", "raw_content": raw_content}
 
-    parsers = {
-        "204": parse_204,
-        "214": parse_214,
-        "210": parse_210,
-        "990": parse_990,
-    }
+_SET_PARSERS = {
+    "204": _parse_204,
+    "214": _parse_214,
+    "210": _parse_210,
+    "990": _parse_990,
+}
 
-    parser = parsers.get(message_type)
+
+def parse_transaction_set(ts: TransactionSet, message_type: Optional[str] = None) -> dict:
+    """Parse an already-tokenized transaction set.
+
+    Errors are returned in the result (``error`` key) rather than raised,
+    matching ``parse_edi_message``.
+    """
+    message_type = message_type or ts.transaction_type
+    if not message_type:
+        return {"error": "Could not determine EDI message type"}
+
+    parser = _SET_PARSERS.get(message_type)
     if not parser:
-        return {"error": f"Unsupported EDI message type: {message_type}", "raw_content": raw_content}
+        return {"error": f"Unsupported EDI message type: {message_type}"}
 
     try:
-        return parser(raw_content, element_separator, segment_terminator)
+        return parser(ts)
     except Exception as e:
         logger.error(f"Error parsing EDI {message_type}: {e}")
         return {
             "error": f"Parse error: {str(e)}",
             "transaction_type": message_type,
-            "raw_content": raw_content,
         }
 
 
+def parse_edi_message(raw_content: str, message_type: Optional[str] = None,
+                      element_separator: str = "*",
+                      segment_terminator: str = "~") -> dict:
+    """Parse an EDI message, auto-detecting type if not specified.
+
+    Args:
+        raw_content: The raw EDI content string
+        message_type: Optional message type override ("204", "214", "210", "990")
+        element_separator: Element separator character (default: *)
+        segment_terminator: Segment terminator character (default: ~)
+
+    Returns:
+        Parsed data dictionary with extracted fields
+    """
+    ts = _transaction_from_content(raw_content, element_separator, segment_terminator)
+    parsed = parse_transaction_set(ts, message_type)
+    if "error" in parsed:
+        parsed["raw_content"] = raw_content
+    return parsed
+
+
 def generate_997_acknowledgment(original_message: dict,
                                 accept: bool = True,
                                 error_codes: Optional[list[str]] = None,
@@ -12,6 +12,13 @@ from datetime import datetime
 
 from anthropic import Anthropic
 
+from app.services.reference_index import (
+    SCAN_MAX_CHARS,
+    ReferenceIndexService,
+    candidate,
+    reference_scanner,
+)
+
 
 # Email classification prompt
 CLASSIFICATION_PROMPT = """You are an AI assistant for a Transportation Management System (TMS) used by freight brokers.
@@ -64,6 +71,18 @@ Respond in JSON format:
 }}"""
 
 
+# Kind of each group of extracted reference numbers; None matches any
+# non-carrier reference, as the model files PRO and BOL numbers as shipments
+REFERENCE_KINDS = {
+    "shipment_numbers": None,
+    "quote_numbers": None,
+    "po_numbers": None,
+    "other_refs": None,
+    "mc_numbers": "mc",
+    "dot_numbers": "dot",
+}
+
+
 class EmailClassificationService:
     """Service for classifying emails and matching them to TMS entities."""
 
@@ -134,6 +153,7 @@ class EmailClassificationService:
         reference_numbers: Dict[str, List[str]],
         from_email: str,
         subject: str,
+        body: str = "",
     ) -> Dict[str, Any]:
         """
         Try to match an email to existing TMS entities.
@@ -143,6 +163,7 @@ class EmailClassificationService:
             reference_numbers: Extracted reference numbers from classification
             from_email: Sender email address
             subject: Email subject
+            body: Email body, scanned for labelled references with the subject
 
         Returns:
             Dict with matched entity IDs and match confidence
@@ -158,57 +179,34 @@ class EmailClassificationService:
             "auto_matched": False,
         }
 
-        # Try to match by shipment numbers
-        shipment_refs = reference_numbers.get("shipment_numbers", [])
-        for ref in shipment_refs:
-            # Try exact match on shipment_number
-            shipment = await db.shipments.find_one({
-                "$or": [
-                    {"shipment_number": ref},
-                    {"shipment_number": {"$regex": ref, "$options": "i"}},
-                    {"customer_ref": ref},
-                ]
-            })
-            if shipment:
-                matches["shipment_id"] = str(shipment["_id"])
-                matches["shipment_ids"].append(str(shipment["_id"]))
+        # Model-extracted references and those labelled in the subject and body,
+        # resolved together with one lookup on the reference index
+        extracted = [
+            candidate(ref, REFERENCE_KINDS[group])
+            for group in REFERENCE_KINDS
+            for ref in reference_numbers.get(group) or []
+        ]
+        extracted = [c for c in extracted if c]
+        scanned = reference_scanner.scan(f"{subject}\n{body}"[:SCAN_MAX_CHARS])
+        resolved = await ReferenceIndexService.resolve(extracted + scanned)
+        extracted_entries = [e for entries in resolved[:len(extracted)] for e in entries]
+        scanned_entries = [e for entries in resolved[len(extracted):] for e in entries]
+
+        for entry in extracted_entries:
+            if entry["entity_type"] == "shipment":
+                matches["shipment_id"] = str(entry["entity_id"])
+                if matches["shipment_id"] not in matches["shipment_ids"]:
+                    matches["shipment_ids"].append(matches["shipment_id"])
                 matches["match_confidence"] = 0.9
                 matches["auto_matched"] = True
 
-        # Try to match by quote numbers
-        quote_refs = reference_numbers.get("quote_numbers", [])
-        for ref in quote_refs:
-            quote = await db.quotes.find_one({
-                "$or": [
-                    {"quote_number": ref},
-                    {"quote_number": {"$regex": ref, "$options": "i"}},
-                ]
-            })
-            if quote:
-                matches["quote_id"] = str(quote["_id"])
-                if not matches["auto_matched"]:
-                    matches["match_confidence"] = 0.85
-                    matches["auto_matched"] = True
-
-        # Try to match by carrier MC/DOT
-        mc_numbers = reference_numbers.get("mc_numbers", [])
-        dot_numbers = reference_numbers.get("dot_numbers", [])
-
-        for mc in mc_numbers:
-            carrier = await db.carriers.find_one({"mc_number": mc})
-            if carrier:
-                matches["carrier_id"] = str(carrier["_id"])
-                if not matches["auto_matched"]:
-                    matches["match_confidence"] = 0.8
-                    matches["auto_matched"] = True
-
-        for dot in dot_numbers:
-            carrier = await db.carriers.find_one({"dot_number": dot})
-            if carrier:
-                matches["carrier_id"] = str(carrier["_id"])
-                if not matches["auto_matched"]:
-                    matches["match_confidence"] = 0.8
-                    matches["auto_matched"] = True
+        for entity_type, confidence in (("quote", 0.85), ("carrier", 0.8)):
+            for entry in extracted_entries:
+                if entry["entity_type"] == entity_type:
+                    matches[f"{entity_type}_id"] = str(entry["entity_id"])
+                    if not matches["auto_matched"]:
+                        matches["match_confidence"] = confidence
+                        matches["auto_matched"] = True
 
         # Try to match by email domain to customer/carrier
         email_domain = from_email.split("@")[-1] if "@" in from_email else None
@@ -242,29 +240,16 @@ class EmailClassificationService:
                     matches["match_confidence"] = 0.7
                     matches["auto_matched"] = True
 
-        # Check subject line for shipment numbers (common pattern)
-        if not matches["shipment_id"]:
-            # Look for patterns like "RE: Load 12345" or "Shipment SHP-00001"
-            subject_patterns = [
-                r'(?:load|shipment|ship|shp|pro)[#:\s-]*(\w+-?\d+)',
-                r'(?:quote|qt)[#:\s-]*(\w+-?\d+)',
-            ]
-            for pattern in subject_patterns:
-                match = re.search(pattern, subject, re.IGNORECASE)
-                if match:
-                    ref = match.group(1)
-                    shipment = await db.shipments.find_one({
-                        "$or": [
-                            {"shipment_number": {"$regex": ref, "$options": "i"}},
-                            {"customer_ref": {"$regex": ref, "$options": "i"}},
-                        ]
-                    })
-                    if shipment:
-                        matches["shipment_id"] = str(shipment["_id"])
-                        matches["shipment_ids"].append(str(shipment["_id"]))
-                        matches["match_confidence"] = 0.75
-                        matches["auto_matched"] = True
-                        break
+        # References labelled in the text ("RE: Load 12345", "Shipment S-2026-00001")
+        for entry in scanned_entries:
+            entity_id = str(entry["entity_id"])
+            if entry["entity_type"] == "shipment" and not matches["shipment_id"]:
+                matches["shipment_id"] = entity_id
+                matches["shipment_ids"].append(entity_id)
+                matches["match_confidence"] = 0.75
+                matches["auto_matched"] = True
+            elif entry["entity_type"] in ("quote", "carrier") and not matches[f"{entry['entity_type']}_id"]:
+                matches[f"{entry['entity_type']}_id"] = entity_id
 
         return matches
 
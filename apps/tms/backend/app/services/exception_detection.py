@@ -1,11 +1,81 @@
-"""Smart exception detection service with pattern recognition."""
-from typing import List, Optional
-from datetime import datetime, timedelta
+"""Smart exception detection service with pattern recognition.
+
+Exceptions are kept in a persistent open-exception index
+(``exceptions_open``, one document per exception type and source entity)
+instead of being recomputed by rescanning collections on every request.
+
+Each detector is a pure function of one shipment, carrier, invoice or tender
+(plus a little batched context such as POD/BOL presence) that returns the
+exception, if any, and the next time its answer can change on its own (a
+pickup entering the 24h window, a check call going stale). Write paths call
+the ``apply_*`` methods to re-evaluate only the entities they touched; the
+next check times live in ``exception_watch`` and are swept before the index
+is read, so time-driven exceptions open, escalate and close without a scan.
+An ``exception_sweep`` timer (see :mod:`app.services.timer_service`) is kept
+at the earliest next check, so they also change on time between reads: an
+in-transit shipment's overdue check call opens within seconds of its
+deadline. Each process remembers when it last armed the timer and only
+writes it for an earlier check (or once the remembered time is stale), so
+routine writes such as GPS pings don't all upsert the same timer document.
+
+:meth:`ExceptionDetectionService.rebuild` regenerates the index from source
+data, running every entity type's detectors concurrently. Rebuilds hold a
+lease in ``exception_engine_state`` so two never interleave their deletes
+and re-inserts; the first read after deploy builds the index unless another
+rebuild already is, in which case it only sweeps. Per-detector timings are
+available from :meth:`ExceptionDetectionService.metrics`.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
 from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
 
 from app.database import get_database
 from app.models.base import utc_now
 from app.models.work_item import WorkItemType, WorkItemStatus
+from app.services.shipment_changes import shipment_changes
+from app.services.timer_service import register_timer_handler, timer_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Entities re-evaluated per batch (rebuilds and sweeps)
+EVALUATE_BATCH_SIZE = 1000
+# Due entities handled per sweep
+SWEEP_LIMIT = 5000
+# Open exceptions with hour/day counts in their message are re-rendered this often
+HOURLY_REFRESH = timedelta(hours=1)
+DAILY_REFRESH = timedelta(days=1)
+
+ACTIVE_SHIPMENT_STATUSES = ["booked", "pending_pickup", "in_transit", "out_for_delivery"]
+
+EXCEPTION_SWEEP_TIMER = "exception_sweep"
+# How long a process trusts the sweep time it last armed; other processes'
+# sweeps re-arm the shared timer without telling it
+SWEEP_ARM_TRUST_SECONDS = 60
+
+# (due time, monotonic time written) of the sweep timer this process last armed
+_sweep_armed: Optional[Tuple[datetime, float]] = None
+
+REBUILD_LOCK_ID = "rebuild_lock"
+# A rebuild renews its lease every batch; one not renewed this long has died
+REBUILD_LEASE_MINUTES = 10
+
+
+async def _arm_sweep(due_at: datetime, force: bool = False) -> None:
+    """Move the sweep timer to ``due_at`` unless this process knows it fires sooner."""
+    global _sweep_armed
+    if not force and _sweep_armed is not None:
+        armed_at, written = _sweep_armed
+        now = datetime.utcnow()
+        if armed_at <= due_at and now < armed_at and time.monotonic() - written < SWEEP_ARM_TRUST_SECONDS:
+            return
+    await timer_scheduler.schedule(EXCEPTION_SWEEP_TIMER, "next", due_at, earliest=True)
+    _sweep_armed = (due_at, time.monotonic())
 
 
 class ExceptionType:
@@ -28,356 +98,630 @@ class ExceptionSeverity:
     LOW = "low"
 
 
-class ExceptionDetectionService:
-    """Service for proactive exception detection."""
-
-    @staticmethod
-    async def detect_all_exceptions() -> List[dict]:
-        """Run all exception detection rules and return findings."""
-        db = get_database()
-        all_exceptions = []
-
-        # 1. No carrier assigned close to pickup
-        exceptions = await ExceptionDetectionService._detect_no_carrier()
-        all_exceptions.extend(exceptions)
-
-        # 2. Overdue check calls
-        exceptions = await ExceptionDetectionService._detect_overdue_check_calls()
-        all_exceptions.extend(exceptions)
-
-        # 3. Late pickups
-        exceptions = await ExceptionDetectionService._detect_late_pickups()
-        all_exceptions.extend(exceptions)
-
-        # 4. Late deliveries
-        exceptions = await ExceptionDetectionService._detect_late_deliveries()
-        all_exceptions.extend(exceptions)
-
-        # 5. Carrier compliance issues
-        exceptions = await ExceptionDetectionService._detect_carrier_compliance()
-        all_exceptions.extend(exceptions)
-
-        # 6. Low margin shipments
-        exceptions = await ExceptionDetectionService._detect_low_margin()
-        all_exceptions.extend(exceptions)
+# A detector returns (exception or None, next time the result may change or None)
+Finding = Tuple[Optional[dict], Optional[datetime]]
+
+
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC, the form Mongo returns; aware values are converted."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _earliest(now: datetime, *times: Optional[datetime]) -> Optional[datetime]:
+    """The earliest of ``times`` still in the future."""
+    future = [t for t in times if t is not None and t > now]
+    return min(future) if future else None
+
+
+# ============================================================================
+# Detectors
+# ============================================================================
+
+def _detect_no_carrier(s: dict, now: datetime, ctx: dict) -> Finding:
+    """No carrier assigned within 24 hours of pickup."""
+    pickup = _naive(s.get("pickup_date"))
+    if s.get("carrier_id") is not None or s.get("status") not in ("booked", "pending_pickup") or not pickup:
+        return None, None
+    if pickup <= now:
+        return None, None
+    if pickup >= now + timedelta(hours=24):
+        return None, pickup - timedelta(hours=24)
+
+    hours_until = (pickup - now).total_seconds() / 3600
+    return {
+        "type": ExceptionType.NO_CARRIER,
+        "severity": ExceptionSeverity.HIGH if hours_until < 12 else ExceptionSeverity.MEDIUM,
+        "shipment_id": str(s["_id"]),
+        "shipment_number": s.get("shipment_number"),
+        "message": f"No carrier assigned. Pickup in {int(hours_until)} hours.",
+        "data": {"hours_until_pickup": hours_until},
+    }, _earliest(now, pickup - timedelta(hours=12), pickup, now + HOURLY_REFRESH)
+
+
+def _detect_overdue_check_call(s: dict, now: datetime, ctx: dict) -> Finding:
+    """In-transit shipments without a check call in 4 hours."""
+    if s.get("status") != "in_transit":
+        return None, None
+    last_check = _naive(s.get("last_check_call"))
+    if last_check and last_check >= now - timedelta(hours=4):
+        return None, last_check + timedelta(hours=4)
+
+    hours_since = (now - last_check).total_seconds() / 3600 if last_check else None
+    return {
+        "type": ExceptionType.OVERDUE_CHECK_CALL,
+        "severity": ExceptionSeverity.HIGH if hours_since is None or hours_since > 8 else ExceptionSeverity.MEDIUM,
+        "shipment_id": str(s["_id"]),
+        "shipment_number": s.get("shipment_number"),
+        "message": f"No check call in {int(hours_since)} hours." if last_check else "No check calls recorded.",
+        "data": {"hours_since_check": hours_since},
+    }, _earliest(now, last_check + timedelta(hours=8) if last_check else None, now + HOURLY_REFRESH)
+
+
+def _detect_late_pickup(s: dict, now: datetime, ctx: dict) -> Finding:
+    """Pending pickups past their pickup date."""
+    pickup = _naive(s.get("pickup_date"))
+    if s.get("status") != "pending_pickup" or not pickup:
+        return None, None
+    if pickup >= now:
+        return None, pickup
+
+    hours_late = (now - pickup).total_seconds() / 3600
+    return {
+        "type": ExceptionType.LATE_PICKUP,
+        "severity": ExceptionSeverity.HIGH,
+        "shipment_id": str(s["_id"]),
+        "shipment_number": s.get("shipment_number"),
+        "message": f"Pickup is {int(hours_late)} hours overdue.",
+        "data": {"hours_late": hours_late},
+    }, now + HOURLY_REFRESH
+
+
+def _detect_late_delivery(s: dict, now: datetime, ctx: dict) -> Finding:
+    """Shipments still moving past their delivery date."""
+    delivery = _naive(s.get("delivery_date"))
+    if s.get("status") not in ("in_transit", "out_for_delivery") or not delivery:
+        return None, None
+    if delivery >= now:
+        return None, delivery
+
+    hours_late = (now - delivery).total_seconds() / 3600
+    return {
+        "type": ExceptionType.LATE_DELIVERY,
+        "severity": ExceptionSeverity.HIGH,
+        "shipment_id": str(s["_id"]),
+        "shipment_number": s.get("shipment_number"),
+        "message": f"Delivery is {int(hours_late)} hours overdue.",
+        "data": {"hours_late": hours_late},
+    }, now + HOURLY_REFRESH
+
+
+def _detect_low_margin(s: dict, now: datetime, ctx: dict) -> Finding:
+    """Active shipments with a margin under 10%."""
+    customer_price = s.get("customer_price") or 0
+    if s.get("status") not in ("booked", "pending_pickup", "in_transit") or customer_price <= 0:
+        return None, None
+    carrier_cost = s.get("carrier_cost") or 0
+    margin_percent = ((customer_price - carrier_cost) / customer_price) * 100
+    if margin_percent >= 10:
+        return None, None
+
+    return {
+        "type": ExceptionType.LOW_MARGIN,
+        "severity": ExceptionSeverity.LOW if margin_percent > 5 else ExceptionSeverity.MEDIUM,
+        "shipment_id": str(s["_id"]),
+        "shipment_number": s.get("shipment_number"),
+        "message": f"Margin is only {margin_percent:.1f}%.",
+        "data": {
+            "margin_percent": margin_percent,
+            "customer_price": customer_price,
+            "carrier_cost": carrier_cost,
+        },
+    }, None
+
+
+def _detect_missing_documents(s: dict, now: datetime, ctx: dict) -> Finding:
+    """Shipments delivered in the last 24 hours without a POD or BOL."""
+    delivered = _naive(s.get("actual_delivery_date"))
+    if s.get("status") != "delivered" or not delivered or delivered <= now - timedelta(hours=24):
+        return None, None
+
+    missing = []
+    if s["_id"] not in ctx["pod"]:
+        missing.append("POD")
+    if s["_id"] not in ctx["bol"]:
+        missing.append("BOL")
+    if not missing:
+        return None, None
+
+    return {
+        "type": ExceptionType.DOCUMENT_MISSING,
+        "severity": ExceptionSeverity.MEDIUM,
+        "shipment_id": str(s["_id"]),
+        "shipment_number": s.get("shipment_number"),
+        "message": f"Missing documents: {', '.join(missing)}",
+        "data": {"missing_documents": missing},
+        # Hourly as well, for documents classified as BOL after upload
+    }, _earliest(now, delivered + timedelta(hours=24), now + HOURLY_REFRESH)
+
+
+def _detect_carrier_compliance(c: dict, now: datetime, ctx: dict) -> Finding:
+    """Active carriers with insurance expiring within 30 days and active shipments."""
+    expiration = _naive(c.get("insurance_expiration"))
+    if c.get("status") != "active" or not expiration or expiration <= now:
+        return None, None
+    if expiration >= now + timedelta(days=30):
+        return None, expiration - timedelta(days=30)
+    active_shipments = ctx["active_shipments"].get(c["_id"], 0)
+    if not active_shipments:
+        # Re-evaluated when a shipment is assigned to the carrier
+        return None, None
+
+    days_until = (expiration - now).days
+    return {
+        "type": ExceptionType.CARRIER_COMPLIANCE,
+        "severity": ExceptionSeverity.HIGH if days_until < 7 else ExceptionSeverity.MEDIUM,
+        "carrier_id": str(c["_id"]),
+        "carrier_name": c.get("name"),
+        "message": f"Insurance expires in {days_until} days. {active_shipments} active shipments.",
+        "data": {
+            "days_until_expiration": days_until,
+            "active_shipments": active_shipments,
+            "expiration_date": expiration.isoformat(),
+        },
+    }, _earliest(now, expiration - timedelta(days=7), expiration, now + DAILY_REFRESH)
+
+
+def _detect_overdue_invoice(inv: dict, now: datetime, ctx: dict) -> Finding:
+    """Sent or partially paid invoices past their due date."""
+    due_date = _naive(inv.get("due_date"))
+    if inv.get("status") not in ("sent", "partial") or not due_date:
+        return None, None
+    if due_date >= now:
+        return None, due_date
+
+    days_overdue = (now - due_date).days
+    amount_due = (inv.get("total") or 0) - (inv.get("amount_paid") or 0)
+    return {
+        "type": ExceptionType.INVOICE_OVERDUE,
+        "severity": ExceptionSeverity.HIGH if days_overdue > 30 else ExceptionSeverity.MEDIUM,
+        "invoice_id": str(inv["_id"]),
+        "invoice_number": inv.get("invoice_number"),
+        "customer_id": str(inv.get("customer_id")),
+        "message": f"Invoice {days_overdue} days overdue. Amount: ${amount_due / 100:.2f}",
+        "data": {
+            "days_overdue": days_overdue,
+            "amount_due": amount_due,
+        },
+    }, now + DAILY_REFRESH
+
+
+def _detect_tender_no_response(t: dict, now: datetime, ctx: dict) -> Finding:
+    """Tenders sent over 4 hours ago without a response."""
+    sent_at = _naive(t.get("sent_at"))
+    if t.get("status") != "sent" or not sent_at:
+        return None, None
+    if sent_at >= now - timedelta(hours=4):
+        return None, sent_at + timedelta(hours=4)
+
+    hours_waiting = (now - sent_at).total_seconds() / 3600
+    return {
+        "type": ExceptionType.TENDER_NO_RESPONSE,
+        "severity": ExceptionSeverity.MEDIUM if hours_waiting < 8 else ExceptionSeverity.HIGH,
+        "tender_id": str(t["_id"]),
+        "shipment_id": str(t.get("shipment_id")),
+        "carrier_name": ctx["carrier_names"].get(t.get("carrier_id"), "Unknown"),
+        "message": f"No response in {int(hours_waiting)} hours.",
+        "data": {"hours_waiting": hours_waiting},
+    }, _earliest(now, sent_at + timedelta(hours=8), now + HOURLY_REFRESH)
+
+
+# ============================================================================
+# Entity kinds: fields, batched context and rebuild candidates
+# ============================================================================
+
+async def _shipment_context(db, shipments: List[dict]) -> dict:
+    ids = [s["_id"] for s in shipments if s.get("status") == "delivered"]
+    if not ids:
+        return {"pod": set(), "bol": set()}
+    pod, bol = await asyncio.gather(
+        db.pod_captures.distinct("shipment_id", {"shipment_id": {"$in": ids}}),
+        db.documents.distinct("shipment_id", {"shipment_id": {"$in": ids}, "document_type": "bol"}),
+    )
+    return {"pod": set(pod), "bol": set(bol)}
+
+
+async def _carrier_context(db, carriers: List[dict]) -> dict:
+    # Only carriers inside the 30-day window need their shipments counted
+    now = utc_now().replace(tzinfo=None)
+    ids = [
+        c["_id"] for c in carriers
+        if c.get("status") == "active"
+        and c.get("insurance_expiration")
+        and now < _naive(c["insurance_expiration"]) < now + timedelta(days=30)
+    ]
+    counts = {}
+    if ids:
+        async for row in db.shipments.aggregate([
+            {"$match": {"carrier_id": {"$in": ids}, "status": {"$in": ["booked", "pending_pickup", "in_transit"]}}},
+            {"$group": {"_id": "$carrier_id", "count": {"$sum": 1}}},
+        ]):
+            counts[row["_id"]] = row["count"]
+    return {"active_shipments": counts}
+
+
+async def _tender_context(db, tenders: List[dict]) -> dict:
+    ids = list({t.get("carrier_id") for t in tenders if t.get("carrier_id")})
+    names = {}
+    if ids:
+        async for c in db.carriers.find({"_id": {"$in": ids}}, {"name": 1}):
+            names[c["_id"]] = c.get("name")
+    return {"carrier_names": names}
+
+
+async def _no_context(db, entities: List[dict]) -> dict:
+    return {}
+
+
+class _Kind:
+    def __init__(
+        self,
+        collection: str,
+        fields: Dict[str, int],
+        detectors: List[Callable[[dict, datetime, dict], Finding]],
+        context: Callable,
+        candidates: Callable[[datetime], dict],
+    ):
+        self.collection = collection
+        self.fields = fields
+        self.detectors = detectors
+        self.context = context
+        self.candidates = candidates
+
+
+KINDS: Dict[str, _Kind] = {
+    "shipment": _Kind(
+        "shipments",
+        {
+            "shipment_number": 1, "status": 1, "carrier_id": 1, "pickup_date": 1, "delivery_date": 1,
+            "actual_delivery_date": 1, "last_check_call": 1, "customer_price": 1, "carrier_cost": 1,
+        },
+        [
+            _detect_no_carrier,
+            _detect_overdue_check_call,
+            _detect_late_pickup,
+            _detect_late_delivery,
+            _detect_low_margin,
+            _detect_missing_documents,
+        ],
+        _shipment_context,
+        lambda now: {"$or": [
+            {"status": {"$in": ACTIVE_SHIPMENT_STATUSES}},
+            {"status": "delivered", "actual_delivery_date": {"$gt": now - timedelta(hours=24)}},
+        ]},
+    ),
+    "carrier": _Kind(
+        "carriers",
+        {"name": 1, "status": 1, "insurance_expiration": 1},
+        [_detect_carrier_compliance],
+        _carrier_context,
+        lambda now: {"status": "active", "insurance_expiration": {"$gt": now}},
+    ),
+    "invoice": _Kind(
+        "invoices",
+        {"invoice_number": 1, "customer_id": 1, "status": 1, "due_date": 1, "total": 1, "amount_paid": 1},
+        [_detect_overdue_invoice],
+        _no_context,
+        lambda now: {"status": {"$in": ["sent", "partial"]}},
+    ),
+    "tender": _Kind(
+        "tenders",
+        {"shipment_id": 1, "carrier_id": 1, "status": 1, "sent_at": 1},
+        [_detect_tender_no_response],
+        _tender_context,
+        lambda now: {"status": "sent"},
+    ),
+}
+
+
+# ============================================================================
+# Metrics
+# ============================================================================
+
+# detector name -> {"runs", "entities", "total_ms", "max_ms", "last_ms"}
+_metrics: Dict[str, Dict[str, float]] = {}
+
+
+def _record(name: str, elapsed_ms: float, entities: int) -> None:
+    m = _metrics.setdefault(name, {"runs": 0, "entities": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0})
+    m["runs"] += 1
+    m["entities"] += entities
+    m["total_ms"] += elapsed_ms
+    m["last_ms"] = elapsed_ms
+    m["max_ms"] = max(m["max_ms"], elapsed_ms)
+
+
+def _oid(value: Union[str, ObjectId]) -> ObjectId:
+    return ObjectId(value) if isinstance(value, str) else value
 
-        # 7. Missing documents
-        exceptions = await ExceptionDetectionService._detect_missing_documents()
-        all_exceptions.extend(exceptions)
 
-        # 8. Overdue invoices
-        exceptions = await ExceptionDetectionService._detect_overdue_invoices()
-        all_exceptions.extend(exceptions)
-
-        # 9. Unanswered tenders
-        exceptions = await ExceptionDetectionService._detect_tender_no_response()
-        all_exceptions.extend(exceptions)
-
-        return all_exceptions
+class ExceptionDetectionService:
+    """Service for proactive exception detection."""
 
     @staticmethod
-    async def _detect_no_carrier() -> List[dict]:
-        """Detect shipments without carriers close to pickup."""
-        db = get_database()
-        now = utc_now()
-        threshold_24h = now + timedelta(hours=24)
-        threshold_12h = now + timedelta(hours=12)
-
-        shipments = await db.shipments.find({
-            "carrier_id": None,
-            "status": {"$in": ["booked", "pending_pickup"]},
-            "pickup_date": {"$lt": threshold_24h, "$gt": now}
-        }).to_list(100)
+    def evaluate(kind: str, entities: List[dict], ctx: dict, now: datetime) -> Tuple[List[dict], Dict[Any, Optional[datetime]]]:
+        """Run a kind's detectors over a batch of entities.
 
+        Returns the exceptions found and, per entity id, the next time any
+        detector's answer may change without a write.
+        """
+        spec = KINDS[kind]
         exceptions = []
-        for s in shipments:
-            pickup = s.get("pickup_date")
-            hours_until = (pickup - now).total_seconds() / 3600 if pickup else 0
-
-            exceptions.append({
-                "type": ExceptionType.NO_CARRIER,
-                "severity": ExceptionSeverity.HIGH if hours_until < 12 else ExceptionSeverity.MEDIUM,
-                "shipment_id": str(s["_id"]),
-                "shipment_number": s.get("shipment_number"),
-                "message": f"No carrier assigned. Pickup in {int(hours_until)} hours.",
-                "data": {"hours_until_pickup": hours_until},
-                "detected_at": now,
-            })
-
-        return exceptions
+        next_checks: Dict[Any, Optional[datetime]] = {e["_id"]: None for e in entities}
+        for detector in spec.detectors:
+            start = time.perf_counter()
+            for entity in entities:
+                exc, next_check = detector(entity, now, ctx)
+                if exc:
+                    exc["source"] = f"{kind}:{entity['_id']}"
+                    exceptions.append(exc)
+                if next_check:
+                    current = next_checks[entity["_id"]]
+                    next_checks[entity["_id"]] = next_check if current is None else min(current, next_check)
+            _record(detector.__name__.removeprefix("_detect_"), (time.perf_counter() - start) * 1000, len(entities))
+        return exceptions, next_checks
 
     @staticmethod
-    async def _detect_overdue_check_calls() -> List[dict]:
-        """Detect shipments with overdue check calls."""
+    async def _apply(kind: str, ids: List[ObjectId], entities: Optional[List[dict]] = None, replace_all: bool = False) -> int:
+        """Re-evaluate entities of one kind and write their exceptions and next checks.
+
+        ``ids`` are every entity being refreshed (missing ones have their
+        exceptions closed). Returns the number of open exceptions written.
+        """
+        if not ids:
+            return 0
         db = get_database()
-        now = utc_now()
-        threshold_4h = now - timedelta(hours=4)
-        threshold_8h = now - timedelta(hours=8)
-
-        shipments = await db.shipments.find({
-            "status": "in_transit",
-            "$or": [
-                {"last_check_call": {"$lt": threshold_4h}},
-                {"last_check_call": None}
-            ]
-        }).to_list(100)
-
-        exceptions = []
-        for s in shipments:
-            last_check = s.get("last_check_call")
-            hours_since = (now - last_check).total_seconds() / 3600 if last_check else float('inf')
-
-            exceptions.append({
-                "type": ExceptionType.OVERDUE_CHECK_CALL,
-                "severity": ExceptionSeverity.HIGH if hours_since > 8 else ExceptionSeverity.MEDIUM,
-                "shipment_id": str(s["_id"]),
-                "shipment_number": s.get("shipment_number"),
-                "message": f"No check call in {int(hours_since)} hours." if last_check else "No check calls recorded.",
-                "data": {"hours_since_check": hours_since},
-                "detected_at": now,
-            })
-
-        return exceptions
+        spec = KINDS[kind]
+        now = utc_now().replace(tzinfo=None)
+
+        start = time.perf_counter()
+        if entities is None:
+            entities = await db[spec.collection].find({"_id": {"$in": ids}}, spec.fields).to_list(None)
+        ctx = await spec.context(db, entities)
+        _record(f"load:{kind}", (time.perf_counter() - start) * 1000, len(entities))
+
+        exceptions, next_checks = ExceptionDetectionService.evaluate(kind, entities, ctx, now)
+
+        start = time.perf_counter()
+        sources = [f"{kind}:{i}" for i in ids]
+        open_ops: List[Any] = []
+        if not replace_all:
+            open_ops.append(DeleteMany({
+                "source": {"$in": sources},
+                "_id": {"$nin": [f"{e['type']}:{e['source']}" for e in exceptions]},
+            }))
+        for exc in exceptions:
+            open_ops.append(UpdateOne(
+                {"_id": f"{exc['type']}:{exc['source']}"},
+                {"$set": {**exc, "detected_at": now}, "$setOnInsert": {"first_detected_at": now}},
+                upsert=True,
+            ))
+        watch_ops: List[Any] = []
+        for entity_id in ids:
+            next_check = next_checks.get(entity_id)
+            key = f"{kind}:{entity_id}"
+            if next_check:
+                watch_ops.append(UpdateOne(
+                    {"_id": key},
+                    {"$set": {"kind": kind, "entity_id": entity_id, "next_check_at": next_check}},
+                    upsert=True,
+                ))
+            elif not replace_all:
+                watch_ops.append(DeleteOne({"_id": key}))
+        if open_ops:
+            await db.exceptions_open.bulk_write(open_ops, ordered=False)
+        if watch_ops:
+            await db.exception_watch.bulk_write(watch_ops, ordered=False)
+        upcoming = [t for t in next_checks.values() if t]
+        if upcoming:
+            await _arm_sweep(min(upcoming))
+        _record(f"write:{kind}", (time.perf_counter() - start) * 1000, len(ids))
+        return len(exceptions)
 
     @staticmethod
-    async def _detect_late_pickups() -> List[dict]:
-        """Detect late pickups."""
-        db = get_database()
-        now = utc_now()
+    async def _apply_safely(kind: str, ids: Iterable[Union[str, ObjectId]]) -> None:
+        ids = list({_oid(i) for i in ids if i})
+        try:
+            await ExceptionDetectionService._apply(kind, ids)
+        except Exception as e:
+            logger.warning(f"Exception index update failed for {len(ids)} {kind}(s): {e}")
 
-        shipments = await db.shipments.find({
-            "status": "pending_pickup",
-            "pickup_date": {"$lt": now}
-        }).to_list(100)
+    @staticmethod
+    async def apply_shipments(shipment_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Re-evaluate shipments after a write, and the carriers they use.
 
-        exceptions = []
-        for s in shipments:
-            pickup = s.get("pickup_date")
-            hours_late = (now - pickup).total_seconds() / 3600 if pickup else 0
-
-            exceptions.append({
-                "type": ExceptionType.LATE_PICKUP,
-                "severity": ExceptionSeverity.HIGH,
-                "shipment_id": str(s["_id"]),
-                "shipment_number": s.get("shipment_number"),
-                "message": f"Pickup is {int(hours_late)} hours overdue.",
-                "data": {"hours_late": hours_late},
-                "detected_at": now,
-            })
-
-        return exceptions
+        Failures are logged rather than raised: the index is derived data and
+        is repaired by :meth:`rebuild`.
+        """
+        db = get_database()
+        shipment_ids = list({_oid(i) for i in shipment_ids if i})
+        if not shipment_ids:
+            return
+        try:
+            shipments = await db.shipments.find(
+                {"_id": {"$in": shipment_ids}}, KINDS["shipment"].fields
+            ).to_list(None)
+            await ExceptionDetectionService._apply("shipment", shipment_ids, shipments)
+        except Exception as e:
+            logger.warning(f"Exception index update failed for {len(shipment_ids)} shipment(s): {e}")
+            return
+        # Active shipment counts feed the carrier compliance detector
+        await ExceptionDetectionService._apply_safely(
+            "carrier", [s["carrier_id"] for s in shipments if s.get("carrier_id")]
+        )
 
     @staticmethod
-    async def _detect_late_deliveries() -> List[dict]:
-        """Detect late deliveries."""
-        db = get_database()
-        now = utc_now()
+    async def apply_shipment(shipment_id: Union[str, ObjectId]) -> None:
+        """Re-evaluate one shipment (see :meth:`apply_shipments`)."""
+        await ExceptionDetectionService.apply_shipments([shipment_id])
 
-        shipments = await db.shipments.find({
-            "status": {"$in": ["in_transit", "out_for_delivery"]},
-            "delivery_date": {"$lt": now}
-        }).to_list(100)
+    @staticmethod
+    async def apply_new_shipments(shipments: List[dict]) -> None:
+        """Evaluate freshly inserted shipments in one batch."""
+        await ExceptionDetectionService.apply_shipments([s["_id"] for s in shipments])
 
-        exceptions = []
-        for s in shipments:
-            delivery = s.get("delivery_date")
-            hours_late = (now - delivery).total_seconds() / 3600 if delivery else 0
-
-            exceptions.append({
-                "type": ExceptionType.LATE_DELIVERY,
-                "severity": ExceptionSeverity.HIGH,
-                "shipment_id": str(s["_id"]),
-                "shipment_number": s.get("shipment_number"),
-                "message": f"Delivery is {int(hours_late)} hours overdue.",
-                "data": {"hours_late": hours_late},
-                "detected_at": now,
-            })
-
-        return exceptions
+    @staticmethod
+    async def apply_carrier(carrier_id: Union[str, ObjectId]) -> None:
+        """Re-evaluate a carrier after its status or insurance changes."""
+        await ExceptionDetectionService._apply_safely("carrier", [carrier_id])
 
     @staticmethod
-    async def _detect_carrier_compliance() -> List[dict]:
-        """Detect carrier compliance issues."""
-        db = get_database()
-        now = utc_now()
-        threshold_30d = now + timedelta(days=30)
-        threshold_7d = now + timedelta(days=7)
+    async def apply_invoices(invoice_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Re-evaluate invoices after a write (status, due date, payments)."""
+        await ExceptionDetectionService._apply_safely("invoice", invoice_ids)
 
-        # Find carriers with expiring insurance
-        carriers = await db.carriers.find({
-            "status": "active",
-            "insurance_expiration": {"$lt": threshold_30d, "$gt": now}
-        }).to_list(100)
+    @staticmethod
+    async def apply_invoice(invoice_id: Union[str, ObjectId]) -> None:
+        """Re-evaluate one invoice."""
+        await ExceptionDetectionService._apply_safely("invoice", [invoice_id])
 
-        exceptions = []
-        for c in carriers:
-            expiration = c.get("insurance_expiration")
-            days_until = (expiration - now).days if expiration else 0
-
-            # Check if carrier has active shipments
-            active_shipments = await db.shipments.count_documents({
-                "carrier_id": c["_id"],
-                "status": {"$in": ["booked", "pending_pickup", "in_transit"]}
-            })
-
-            if active_shipments > 0:
-                exceptions.append({
-                    "type": ExceptionType.CARRIER_COMPLIANCE,
-                    "severity": ExceptionSeverity.HIGH if days_until < 7 else ExceptionSeverity.MEDIUM,
-                    "carrier_id": str(c["_id"]),
-                    "carrier_name": c.get("name"),
-                    "message": f"Insurance expires in {days_until} days. {active_shipments} active shipments.",
-                    "data": {
-                        "days_until_expiration": days_until,
-                        "active_shipments": active_shipments,
-                        "expiration_date": expiration.isoformat() if expiration else None,
-                    },
-                    "detected_at": now,
-                })
-
-        return exceptions
+    @staticmethod
+    async def apply_tenders(tender_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Re-evaluate tenders after a status change."""
+        await ExceptionDetectionService._apply_safely("tender", tender_ids)
 
     @staticmethod
-    async def _detect_low_margin() -> List[dict]:
-        """Detect shipments with low margins."""
-        db = get_database()
-        now = utc_now()
+    async def apply_tender(tender_id: Union[str, ObjectId]) -> None:
+        """Re-evaluate one tender (see :meth:`apply_tenders`)."""
+        await ExceptionDetectionService.apply_tenders([tender_id])
 
-        # Find recent shipments with low margin (under 10%)
-        shipments = await db.shipments.find({
-            "status": {"$in": ["booked", "pending_pickup", "in_transit"]},
-            "customer_price": {"$gt": 0},
-        }).to_list(500)
+    @staticmethod
+    async def sweep_due() -> int:
+        """Re-evaluate entities whose next check time has passed.
 
-        exceptions = []
-        for s in shipments:
-            customer_price = s.get("customer_price", 0)
-            carrier_cost = s.get("carrier_cost", 0)
-
-            if customer_price > 0:
-                margin_percent = ((customer_price - carrier_cost) / customer_price) * 100
-
-                if margin_percent < 10:
-                    exceptions.append({
-                        "type": ExceptionType.LOW_MARGIN,
-                        "severity": ExceptionSeverity.LOW if margin_percent > 5 else ExceptionSeverity.MEDIUM,
-                        "shipment_id": str(s["_id"]),
-                        "shipment_number": s.get("shipment_number"),
-                        "message": f"Margin is only {margin_percent:.1f}%.",
-                        "data": {
-                            "margin_percent": margin_percent,
-                            "customer_price": customer_price,
-                            "carrier_cost": carrier_cost,
-                        },
-                        "detected_at": now,
-                    })
-
-        return exceptions
+        Kinds are swept concurrently. Returns the number of entities swept.
+        """
+        db = get_database()
+        now = utc_now().replace(tzinfo=None)
+        due: Dict[str, List[ObjectId]] = {}
+        async for doc in db.exception_watch.find(
+            {"next_check_at": {"$lte": now}}, {"kind": 1, "entity_id": 1}
+        ).sort("next_check_at", 1).limit(SWEEP_LIMIT):
+            due.setdefault(doc["kind"], []).append(doc["entity_id"])
+        if not due:
+            return 0
+
+        async def sweep_kind(kind: str, ids: List[ObjectId]) -> None:
+            for i in range(0, len(ids), EVALUATE_BATCH_SIZE):
+                await ExceptionDetectionService._apply(kind, ids[i:i + EVALUATE_BATCH_SIZE])
+
+        await asyncio.gather(*(sweep_kind(kind, ids) for kind, ids in due.items()))
+        return sum(len(ids) for ids in due.values())
 
     @staticmethod
-    async def _detect_missing_documents() -> List[dict]:
-        """Detect delivered shipments missing required documents."""
+    async def sweep_on_timer(payload: dict) -> None:
+        """Sweep due entities, then keep the sweep timer at the next check left."""
         db = get_database()
-        now = utc_now()
-        threshold_24h = now - timedelta(hours=24)
-
-        # Find delivered shipments from the last 24 hours
-        shipments = await db.shipments.find({
-            "status": "delivered",
-            "actual_delivery_date": {"$gt": threshold_24h}
-        }).to_list(100)
-
-        exceptions = []
-        for s in shipments:
-            # Check for POD
-            pod = await db.pod_captures.find_one({"shipment_id": s["_id"]})
-            bol = await db.documents.find_one({
-                "shipment_id": s["_id"],
-                "document_type": "bol"
-            })
-
-            missing = []
-            if not pod:
-                missing.append("POD")
-            if not bol:
-                missing.append("BOL")
-
-            if missing:
-                exceptions.append({
-                    "type": ExceptionType.DOCUMENT_MISSING,
-                    "severity": ExceptionSeverity.MEDIUM,
-                    "shipment_id": str(s["_id"]),
-                    "shipment_number": s.get("shipment_number"),
-                    "message": f"Missing documents: {', '.join(missing)}",
-                    "data": {"missing_documents": missing},
-                    "detected_at": now,
-                })
-
-        return exceptions
+        await ExceptionDetectionService.sweep_due()
+        upcoming = await db.exception_watch.find_one({}, {"next_check_at": 1}, sort=[("next_check_at", 1)])
+        if upcoming:
+            await _arm_sweep(upcoming["next_check_at"], force=True)
 
     @staticmethod
-    async def _detect_overdue_invoices() -> List[dict]:
-        """Detect overdue invoices."""
+    async def _claim_rebuild(owner: str, renew: bool = False) -> bool:
+        """Take the rebuild lease for ``owner``, or ``renew`` the one it holds."""
         db = get_database()
         now = utc_now()
+        held = {"owner": owner} if renew else {"lease_until": {"$lt": now}}
+        try:
+            await db.exception_engine_state.update_one(
+                {"_id": REBUILD_LOCK_ID, **held},
+                {"$set": {"owner": owner, "lease_until": now + timedelta(minutes=REBUILD_LEASE_MINUTES)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
 
-        invoices = await db.invoices.find({
-            "status": {"$in": ["sent", "partial"]},
-            "due_date": {"$lt": now}
-        }).to_list(100)
+    @staticmethod
+    async def rebuild() -> Optional[Dict[str, int]]:
+        """Regenerate the open-exception index from source data.
 
-        exceptions = []
-        for inv in invoices:
-            due_date = inv.get("due_date")
-            days_overdue = (now - due_date).days if due_date else 0
-
-            exceptions.append({
-                "type": ExceptionType.INVOICE_OVERDUE,
-                "severity": ExceptionSeverity.HIGH if days_overdue > 30 else ExceptionSeverity.MEDIUM,
-                "invoice_id": str(inv["_id"]),
-                "invoice_number": inv.get("invoice_number"),
-                "customer_id": str(inv.get("customer_id")),
-                "message": f"Invoice {days_overdue} days overdue. Amount: ${inv.get('amount_due', 0) / 100:.2f}",
-                "data": {
-                    "days_overdue": days_overdue,
-                    "amount_due": inv.get("amount_due", 0),
-                },
-                "detected_at": now,
-            })
-
-        return exceptions
+        Every entity kind is streamed and evaluated concurrently, without
+        row caps. Returns the number of open exceptions per kind, or None
+        when another rebuild holds the lease.
+        """
+        db = get_database()
+        owner = str(ObjectId())
+        if not await ExceptionDetectionService._claim_rebuild(owner):
+            return None
+        try:
+            return await ExceptionDetectionService._rebuild(owner)
+        finally:
+            await db.exception_engine_state.delete_one({"_id": REBUILD_LOCK_ID, "owner": owner})
 
     @staticmethod
-    async def _detect_tender_no_response() -> List[dict]:
-        """Detect tenders with no response."""
+    async def _rebuild(owner: str) -> Dict[str, int]:
         db = get_database()
-        now = utc_now()
-        threshold_4h = now - timedelta(hours=4)
+        now = utc_now().replace(tzinfo=None)
+        await db.exceptions_open.delete_many({})
+        await db.exception_watch.delete_many({})
+
+        async def apply_batch(kind: str, batch: List[dict]) -> int:
+            if not await ExceptionDetectionService._claim_rebuild(owner, renew=True):
+                raise RuntimeError("Exception index rebuild lease was taken over by another rebuild")
+            return await ExceptionDetectionService._apply(kind, [e["_id"] for e in batch], batch, replace_all=True)
+
+        async def rebuild_kind(kind: str) -> int:
+            spec = KINDS[kind]
+            total = 0
+            batch: List[dict] = []
+            cursor = db[spec.collection].find(spec.candidates(now), spec.fields).batch_size(EVALUATE_BATCH_SIZE)
+            async for entity in cursor:
+                batch.append(entity)
+                if len(batch) >= EVALUATE_BATCH_SIZE:
+                    total += await apply_batch(kind, batch)
+                    batch = []
+            if batch:
+                total += await apply_batch(kind, batch)
+            return total
+
+        results = await asyncio.gather(*(rebuild_kind(kind) for kind in KINDS))
+        await db.exception_engine_state.update_one(
+            {"_id": "state"}, {"$set": {"rebuilt_at": utc_now()}}, upsert=True
+        )
+        return dict(zip(KINDS, results))
 
-        tenders = await db.tenders.find({
-            "status": "sent",
-            "sent_at": {"$lt": threshold_4h}
-        }).to_list(100)
-
-        exceptions = []
-        for t in tenders:
-            sent_at = t.get("sent_at")
-            hours_waiting = (now - sent_at).total_seconds() / 3600 if sent_at else 0
+    @staticmethod
+    async def _refresh() -> None:
+        """Build the index on first use, then sweep due entities.
 
-            carrier = await db.carriers.find_one({"_id": t.get("carrier_id")})
+        A read that finds another rebuild under way serves the partial
+        index (kept current by writes and sweeps) rather than waiting.
+        """
+        db = get_database()
+        if not await db.exception_engine_state.find_one({"_id": "state"}):
+            if await ExceptionDetectionService.rebuild() is not None:
+                return
+        await ExceptionDetectionService.sweep_due()
 
-            exceptions.append({
-                "type": ExceptionType.TENDER_NO_RESPONSE,
-                "severity": ExceptionSeverity.MEDIUM if hours_waiting < 8 else ExceptionSeverity.HIGH,
-                "tender_id": str(t["_id"]),
-                "shipment_id": str(t.get("shipment_id")),
-                "carrier_name": carrier.get("name") if carrier else "Unknown",
-                "message": f"No response in {int(hours_waiting)} hours.",
-                "data": {"hours_waiting": hours_waiting},
-                "detected_at": now,
-            })
+    @staticmethod
+    def metrics() -> Dict[str, Dict[str, float]]:
+        """Per-detector timings (plus ``load:*``/``write:*`` stages) since start-up."""
+        return {
+            name: {**m, "avg_ms": m["total_ms"] / m["runs"] if m["runs"] else 0.0}
+            for name, m in sorted(_metrics.items())
+        }
 
-        return exceptions
+    @staticmethod
+    async def detect_all_exceptions() -> List[dict]:
+        """Return every open exception from the index."""
+        db = get_database()
+        await ExceptionDetectionService._refresh()
+        return await db.exceptions_open.find(
+            {}, {"_id": 0, "source": 0, "first_detected_at": 0}
+        ).sort("detected_at", -1).to_list(None)
 
     @staticmethod
     async def create_work_items_from_exceptions(
@@ -389,25 +733,35 @@ class ExceptionDetectionService:
             return []
 
         db = get_database()
-        work_item_ids = []
-
-        for exc in exceptions:
-            if exc["severity"] != ExceptionSeverity.HIGH:
-                continue  # Only create work items for high severity
+        high = [exc for exc in exceptions if exc["severity"] == ExceptionSeverity.HIGH]  # Only high severity
+        if not high:
+            return []
 
-            # Check if work item already exists for this exception
-            existing = await db.work_items.find_one({
+        # One query for the open exception work items already covering these entities
+        refs = {"shipment_id": set(), "carrier_id": set(), "invoice_id": set()}
+        for exc in high:
+            for field, ids in refs.items():
+                if exc.get(field) and ObjectId.is_valid(exc[field]):
+                    ids.add(ObjectId(exc[field]))
+        covered = set()
+        async for item in db.work_items.find(
+            {
                 "work_type": WorkItemType.EXCEPTION.value,
                 "status": {"$in": [WorkItemStatus.OPEN.value, WorkItemStatus.IN_PROGRESS.value]},
-                "$or": [
-                    {"shipment_id": ObjectId(exc.get("shipment_id"))} if exc.get("shipment_id") else {},
-                    {"carrier_id": ObjectId(exc.get("carrier_id"))} if exc.get("carrier_id") else {},
-                    {"invoice_id": ObjectId(exc.get("invoice_id"))} if exc.get("invoice_id") else {},
-                ]
-            })
-
-            if existing:
+                "$or": [{field: {"$in": list(ids)}} for field, ids in refs.items() if ids],
+            },
+            {"shipment_id": 1, "carrier_id": 1, "invoice_id": 1},
+        ):
+            for field in refs:
+                if item.get(field):
+                    covered.add((field, item[field]))
+
+        work_items = []
+        for exc in high:
+            keys = [(field, ObjectId(exc[field])) for field in refs if exc.get(field) and ObjectId.is_valid(exc[field])]
+            if any(key in covered for key in keys):
                 continue
+            covered.update(keys)
 
             work_item = {
                 "work_type": WorkItemType.EXCEPTION.value,
@@ -422,18 +776,14 @@ class ExceptionDetectionService:
                 "created_at": utc_now(),
                 "updated_at": utc_now(),
             }
+            for field, value in keys:
+                work_item[field] = value
+            work_items.append(work_item)
 
-            if exc.get("shipment_id"):
-                work_item["shipment_id"] = ObjectId(exc["shipment_id"])
-            if exc.get("carrier_id"):
-                work_item["carrier_id"] = ObjectId(exc["carrier_id"])
-            if exc.get("invoice_id"):
-                work_item["invoice_id"] = ObjectId(exc["invoice_id"])
-
-            result = await db.work_items.insert_one(work_item)
-            work_item_ids.append(str(result.inserted_id))
-
-        return work_item_ids
+        if not work_items:
+            return []
+        result = await db.work_items.insert_many(work_items)
+        return [str(i) for i in result.inserted_ids]
 
     @staticmethod
     async def get_exception_summary() -> dict:
@@ -459,3 +809,16 @@ class ExceptionDetectionService:
             "by_severity": by_severity,
             "exceptions": exceptions,
         }
+
+
+register_timer_handler(EXCEPTION_SWEEP_TIMER, ExceptionDetectionService.sweep_on_timer)
+
+
+shipment_changes.subscribe(
+    "Exception detection",
+    shipment=ExceptionDetectionService.apply_shipment,
+    shipments=ExceptionDetectionService.apply_shipments,
+    new_shipments=ExceptionDetectionService.apply_new_shipments,
+    tender=ExceptionDetectionService.apply_tender,
+    tenders=ExceptionDetectionService.apply_tenders,
+)
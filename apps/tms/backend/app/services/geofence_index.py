@@ -0,0 +1,323 @@
+"""In-memory spatial index of active geofences for GPS ingestion.
+
+Each GPS ping used to load up to 100 geofences, measure the distance to
+every one and look up the latest event per fence to detect a transition.
+The index buckets active fences into a lat/lon grid so a ping only measures
+the fences whose bounding box covers its cell, and a per-shipment
+inside/outside cache means only real enter/exit transitions touch the
+database.
+
+Geofences also carry a GeoJSON ``location`` backed by a ``2dsphere`` index.
+With more than ``MAX_INDEXED_GEOFENCES`` active fences the grid is not built
+and candidates come from a ``$geoWithin`` query instead.
+
+The geofence endpoints call :meth:`GeofenceIndex.invalidate` on every write;
+the TTL bounds staleness from writes made by other processes.
+
+A shipment's inside/outside state per fence is stored in
+``geofence_states`` and cached per process for ``STATE_TTL_SECONDS``
+(shipments with no stored state yet are seeded from ``geofence_events``).
+The cache only decides which transitions to attempt: each one flips the
+stored state with a conditional write, and an event is reported only when
+the flip succeeds, so several API processes never write the same enter or
+exit twice.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.database import get_database
+from app.models.base import utc_now
+from app.models.geofence import GeofenceTrigger
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the index is rebuilt even without an invalidation
+GEOFENCE_INDEX_TTL_SECONDS = 60
+# Grid cell size; a 0.1 degree cell is about 11 km north-south
+GRID_CELL_DEGREES = 0.1
+# Above this many active fences, candidates come from the 2dsphere index
+MAX_INDEXED_GEOFENCES = 250_000
+# Seconds before a shipment's inside/outside state is re-read from events
+STATE_TTL_SECONDS = 600
+MAX_TRACKED_SHIPMENTS = 100_000
+
+# Matches TrackingService.calculate_distance (3959 mi) so boundaries agree
+EARTH_RADIUS_METERS = 3959 * 1609.34
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_METERS / 180
+
+_GEOFENCE_FIELDS = {
+    "shipment_id": 1,
+    "name": 1,
+    "geofence_type": 1,
+    "trigger": 1,
+    "latitude": 1,
+    "longitude": 1,
+    "radius_meters": 1,
+}
+
+Cell = Tuple[int, int]
+
+
+def _cell(latitude: float, longitude: float) -> Cell:
+    return (math.floor(latitude / GRID_CELL_DEGREES), math.floor(longitude / GRID_CELL_DEGREES))
+
+
+@dataclass(slots=True)
+class IndexedGeofence:
+    """The fields of an active geofence needed to test a ping."""
+    id: ObjectId
+    shipment_id: Optional[ObjectId]
+    name: str
+    geofence_type: str
+    trigger: str
+    latitude: float
+    longitude: float
+    radius_meters: float
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "IndexedGeofence":
+        return cls(
+            id=doc["_id"],
+            shipment_id=doc.get("shipment_id"),
+            name=doc.get("name", ""),
+            geofence_type=doc.get("geofence_type", "custom"),
+            trigger=doc.get("trigger", GeofenceTrigger.BOTH.value),
+            latitude=doc["latitude"],
+            longitude=doc["longitude"],
+            radius_meters=doc.get("radius_meters", 500),
+        )
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        """Haversine distance from the center is within the radius."""
+        lat1 = math.radians(latitude)
+        lat2 = math.radians(self.latitude)
+        a = (math.sin((lat2 - lat1) / 2) ** 2
+             + math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(self.longitude - longitude) / 2) ** 2)
+        return 2 * EARTH_RADIUS_METERS * math.atan2(math.sqrt(a), math.sqrt(1 - a)) <= self.radius_meters
+
+    def fires_on(self, transition: GeofenceTrigger) -> bool:
+        return self.trigger in (transition.value, GeofenceTrigger.BOTH.value)
+
+    def cells(self) -> Iterable[Cell]:
+        """Grid cells overlapped by the fence's bounding box."""
+        dlat = self.radius_meters / METERS_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(self.latitude)), 0.01)
+        lat_lo, lon_lo = _cell(self.latitude - dlat, self.longitude - dlon)
+        lat_hi, lon_hi = _cell(self.latitude + dlat, self.longitude + dlon)
+        for i in range(lat_lo, lat_hi + 1):
+            for j in range(lon_lo, lon_hi + 1):
+                yield (i, j)
+
+
+class SpatialIndex:
+    """Active geofences bucketed by grid cell, or a 2dsphere fallback."""
+
+    def __init__(self, fences: Optional[List[IndexedGeofence]], max_radius: float = 0.0):
+        self.grid: Optional[Dict[Cell, List[IndexedGeofence]]] = None
+        self.by_id: Dict[ObjectId, IndexedGeofence] = {}
+        self.max_radius = max_radius
+        if fences is not None:
+            self.grid = {}
+            for fence in fences:
+                self.by_id[fence.id] = fence
+                for cell in fence.cells():
+                    self.grid.setdefault(cell, []).append(fence)
+
+    async def candidates(
+        self, shipment_oid: ObjectId, latitude: float, longitude: float
+    ) -> List[IndexedGeofence]:
+        """Global and shipment fences whose bounding box covers the point."""
+        if self.grid is not None:
+            return [
+                f for f in self.grid.get(_cell(latitude, longitude), ())
+                if f.shipment_id is None or f.shipment_id == shipment_oid
+            ]
+        db = get_database()
+        docs = await db.geofences.find(
+            {
+                "location": {"$geoWithin": {"$centerSphere": [
+                    [longitude, latitude], self.max_radius / EARTH_RADIUS_METERS
+                ]}},
+                "$or": [{"shipment_id": shipment_oid}, {"shipment_id": None}],
+                "is_active": True,
+            },
+            _GEOFENCE_FIELDS,
+        ).to_list(None)
+        return [IndexedGeofence.from_doc(d) for d in docs]
+
+    async def fences(self, ids: Iterable[ObjectId]) -> List[IndexedGeofence]:
+        """Active fences by id; ids of removed or inactive fences are dropped."""
+        ids = list(ids)
+        if self.grid is not None:
+            return [self.by_id[i] for i in ids if i in self.by_id]
+        db = get_database()
+        docs = await db.geofences.find({"_id": {"$in": ids}, "is_active": True}, _GEOFENCE_FIELDS).to_list(None)
+        return [IndexedGeofence.from_doc(d) for d in docs]
+
+
+_index: Optional[SpatialIndex] = None
+_index_expires = 0.0
+_generation = 0
+_build_lock = asyncio.Lock()
+
+# shipment _id -> (expires at, ids of fences the shipment is inside)
+_states: "OrderedDict[ObjectId, Tuple[float, Set[ObjectId]]]" = OrderedDict()
+
+
+class GeofenceIndex:
+    """Process-wide spatial index over active geofences."""
+
+    @staticmethod
+    async def get() -> SpatialIndex:
+        """The current index, rebuilt when invalidated or past its TTL."""
+        global _index, _index_expires
+        if _index is not None and _index_expires > time.monotonic():
+            return _index
+        async with _build_lock:
+            if _index is not None and _index_expires > time.monotonic():
+                return _index
+            generation = _generation
+            index = await GeofenceIndex.build()
+            # A write during the build may not be reflected; serve it once
+            # but don't keep it.
+            if generation == _generation:
+                _index, _index_expires = index, time.monotonic() + GEOFENCE_INDEX_TTL_SECONDS
+            return index
+
+    @staticmethod
+    async def build() -> SpatialIndex:
+        """Bucket all active geofences into the grid."""
+        db = get_database()
+        active = await db.geofences.count_documents({"is_active": True})
+        if active > MAX_INDEXED_GEOFENCES:
+            rows = await db.geofences.aggregate([
+                {"$match": {"is_active": True}},
+                {"$group": {"_id": None, "max_radius": {"$max": "$radius_meters"}}},
+            ]).to_list(1)
+            logger.info(f"Geofence index: {active} active fences, using the 2dsphere index")
+            return SpatialIndex(None, max_radius=rows[0]["max_radius"] if rows else 0.0)
+
+        docs = await db.geofences.find({"is_active": True}, _GEOFENCE_FIELDS).to_list(None)
+        index = SpatialIndex([IndexedGeofence.from_doc(d) for d in docs])
+        logger.info(f"Built geofence index: {len(docs)} fences in {len(index.grid)} cells")
+        return index
+
+    @staticmethod
+    def invalidate() -> None:
+        """Drop the index; the next lookup rebuilds it."""
+        global _index, _generation
+        _index = None
+        _generation += 1
+
+    @staticmethod
+    async def inside(shipment_oid: ObjectId) -> Set[ObjectId]:
+        """Fences the shipment was last inside, from its stored state (or latest events)."""
+        entry = _states.get(shipment_oid)
+        if entry and entry[0] > time.monotonic():
+            _states.move_to_end(shipment_oid)
+            return entry[1]
+
+        db = get_database()
+        states = await db.geofence_states.find(
+            {"shipment_id": shipment_oid}, {"geofence_id": 1, "inside": 1}
+        ).to_list(None)
+        if states:
+            inside = {row["geofence_id"] for row in states if row["inside"]}
+        else:
+            latest = await db.geofence_events.aggregate([
+                {"$match": {"shipment_id": shipment_oid}},
+                {"$sort": {"event_timestamp": -1}},
+                {"$group": {"_id": "$geofence_id", "event_type": {"$first": "$event_type"}}},
+            ]).to_list(None)
+            inside = {row["_id"] for row in latest if row["event_type"] == GeofenceTrigger.ENTER.value}
+
+        # Another ping for this shipment may have seeded it meanwhile
+        entry = _states.get(shipment_oid)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        GeofenceIndex.set_inside(shipment_oid, inside)
+        return inside
+
+    @staticmethod
+    async def flip(shipment_oid: ObjectId, geofence_id: ObjectId, inside: bool) -> bool:
+        """Record that the shipment entered (or left) a fence; False if that was already recorded.
+
+        The filter expects the opposite state (or no state yet), so of
+        several processes seeing the same transition only one write matches;
+        the others' upserts collide on ``_id``.
+        """
+        try:
+            result = await get_database().geofence_states.update_one(
+                {"_id": f"{shipment_oid}:{geofence_id}", "inside": {"$ne": inside}},
+                {"$set": {
+                    "shipment_id": shipment_oid,
+                    "geofence_id": geofence_id,
+                    "inside": inside,
+                    "updated_at": utc_now(),
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return bool(result.modified_count or result.upserted_id)
+
+    @staticmethod
+    def set_inside(shipment_oid: ObjectId, inside: Set[ObjectId]) -> None:
+        _states[shipment_oid] = (time.monotonic() + STATE_TTL_SECONDS, inside)
+        _states.move_to_end(shipment_oid)
+        while len(_states) > MAX_TRACKED_SHIPMENTS:
+            _states.popitem(last=False)
+
+    @staticmethod
+    def forget(shipment_oid: ObjectId) -> None:
+        """Drop a shipment's cached state so the next ping re-reads it."""
+        _states.pop(shipment_oid, None)
+
+    @staticmethod
+    def reset_states() -> None:
+        """Forget all inside/outside state (tests and benchmarks)."""
+        _states.clear()
+
+    @staticmethod
+    async def transitions(
+        shipment_oid: ObjectId, latitude: float, longitude: float
+    ) -> List[Tuple[IndexedGeofence, GeofenceTrigger]]:
+        """Enter/exit transitions caused by a ping that the fence's trigger fires on.
+
+        Inside/outside state is tracked for every fence regardless of its
+        trigger, so an exit-only fence still knows when it was entered. Only
+        transitions this call recorded with :meth:`flip` are returned.
+        """
+        index = await GeofenceIndex.get()
+        candidates = await index.candidates(shipment_oid, latitude, longitude)
+        was_inside = await GeofenceIndex.inside(shipment_oid)
+
+        now_inside = [f for f in candidates if f.contains(latitude, longitude)]
+        now_ids = {f.id for f in now_inside}
+        exited_ids = was_inside - now_ids
+        # No awaits between reading and replacing the state, so concurrent
+        # pings for one shipment can't both see the same transition.
+        GeofenceIndex.set_inside(shipment_oid, now_ids)
+
+        changes = [(f.id, f, GeofenceTrigger.ENTER) for f in now_inside if f.id not in was_inside]
+        if exited_ids:
+            exited = {f.id: f for f in await index.fences(exited_ids)}
+            # Removed or inactive fences still get their state closed
+            changes += [(i, exited.get(i), GeofenceTrigger.EXIT) for i in exited_ids]
+
+        result = []
+        for fence_id, fence, trigger in changes:
+            if not await GeofenceIndex.flip(shipment_oid, fence_id, trigger == GeofenceTrigger.ENTER):
+                # Another process recorded it first; our cached state was stale
+                GeofenceIndex.forget(shipment_oid)
+            elif fence and fence.fires_on(trigger):
+                result.append((fence, trigger))
+        return result
@@ -6,6 +6,7 @@ from app.database import get_database
 from app.models.base import utc_now
 from app.models.invoice import InvoiceStatus
 from app.models.work_item import WorkItemType, WorkItemStatus
+from app.services.exception_detection import ExceptionDetectionService
 from app.services.number_generator import NumberGenerator
 
 
@@ -113,6 +114,7 @@ class InvoiceAutomationService:
                     }
                 }
             )
+            await ExceptionDetectionService.apply_invoice(result.inserted_id)
 
             # Create notification for customer
             await db.portal_notifications.insert_one({
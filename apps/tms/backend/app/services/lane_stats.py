@@ -0,0 +1,350 @@
+"""Per-carrier lane statistics for carrier matching.
+
+``lane_stats`` holds one document per (carrier, origin state, destination
+state, equipment) with load counts, cost totals and on-time counts
+materialized from in-transit and delivered shipments. Like the analytics
+rollups, each shipment's last contribution is kept (in
+``lane_stat_contributions``) and swapped on every write so only the
+difference is ``$inc``-ed.
+
+Matching reads a whole lane (all carriers and equipment) with one query and
+keeps it in a small in-process cache with TTL eviction, so scoring 100-200
+carriers needs no per-carrier queries.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from bson import ObjectId
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+
+from app.database import get_database
+from app.services.shipment_changes import shipment_changes
+
+logger = logging.getLogger(__name__)
+
+# Shipment statuses that count as lane experience
+LANE_STATUSES = ("delivered", "in_transit")
+
+# Shipment fields needed to compute a lane contribution
+LANE_SHIPMENT_FIELDS = {
+    "carrier_id": 1,
+    "status": 1,
+    "equipment_type": 1,
+    "carrier_cost": 1,
+    "stops.state": 1,
+    "delivered_at": 1,
+    "updated_at": 1,
+    "scheduled_delivery": 1,
+    "delivery_date": 1,
+    "created_at": 1,
+}
+
+# Seconds a lane table stays in the in-process cache
+LANE_CACHE_TTL_SECONDS = 300
+LANE_CACHE_MAX_ENTRIES = 2048
+
+# Minimum priced loads before a lane average rate is trusted
+MIN_RATE_SAMPLES = 3
+
+_BATCH_SIZE = 1000
+
+_lane_cache: Dict[Tuple[str, str], Tuple[float, "LaneTable"]] = {}
+
+
+@dataclass
+class CarrierLaneStats:
+    """One carrier's history on a lane, summed across equipment types."""
+    delivered_count: int = 0
+    in_transit_count: int = 0
+    cost_total: int = 0
+    cost_count: int = 0
+    on_time_count: int = 0
+    last_load_date: Optional[datetime] = None
+
+    @property
+    def loads(self) -> int:
+        return self.delivered_count + self.in_transit_count
+
+    @property
+    def avg_cost(self) -> float:
+        return self.cost_total / self.cost_count if self.cost_count else 0
+
+
+@dataclass
+class LaneTable:
+    """All lane statistics for an origin/destination state pair."""
+    carriers: Dict[str, CarrierLaneStats] = field(default_factory=dict)
+    equipment_costs: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+
+    @classmethod
+    def from_rows(cls, rows) -> "LaneTable":
+        table = cls()
+        costs: Dict[str, list] = defaultdict(lambda: [0, 0])
+        for row in rows:
+            metrics = row.get("metrics", {})
+            stats = table.carriers.setdefault(row["carrier_id"], CarrierLaneStats())
+            stats.delivered_count += metrics.get("delivered_count", 0)
+            stats.in_transit_count += metrics.get("in_transit_count", 0)
+            stats.cost_total += metrics.get("cost_total", 0)
+            stats.cost_count += metrics.get("cost_count", 0)
+            stats.on_time_count += metrics.get("on_time_count", 0)
+            last = row.get("last_load_date")
+            if last and (stats.last_load_date is None or last > stats.last_load_date):
+                stats.last_load_date = last
+            equipment = costs[row.get("equipment_type") or ""]
+            equipment[0] += metrics.get("cost_total", 0)
+            equipment[1] += metrics.get("cost_count", 0)
+        table.equipment_costs = {k: (v[0], v[1]) for k, v in costs.items()}
+        return table
+
+    def carrier(self, carrier_id: str) -> CarrierLaneStats:
+        return self.carriers.get(carrier_id) or CarrierLaneStats()
+
+    def avg_rate_per_mile(self, equipment_type: str) -> Optional[float]:
+        """Average delivered carrier cost for the equipment, as rate per mile."""
+        equipment_type = getattr(equipment_type, "value", equipment_type)
+        total, count = self.equipment_costs.get(equipment_type, (0, 0))
+        if count >= MIN_RATE_SAMPLES:
+            # Simplified: assume 500 miles average
+            return total / count / 100 / 500
+        return None
+
+
+def _stops_states(shipment: dict) -> Tuple[str, str]:
+    stops = shipment.get("stops") or []
+    if not stops:
+        return "", ""
+    return stops[0].get("state") or "", stops[-1].get("state") or ""
+
+
+def lane_stat_row(shipment: dict) -> Optional[dict]:
+    """Lane statistics contribution of a shipment, or None if it has none."""
+    status = shipment.get("status")
+    carrier_id = shipment.get("carrier_id")
+    if status not in LANE_STATUSES or not carrier_id:
+        return None
+
+    origin_state, destination_state = _stops_states(shipment)
+    equipment_type = shipment.get("equipment_type") or ""
+    cost = shipment.get("carrier_cost") or 0
+    delivered = status == "delivered"
+
+    on_time = 0
+    if delivered:
+        delivered_at = shipment.get("delivered_at") or shipment.get("updated_at")
+        scheduled = shipment.get("scheduled_delivery") or shipment.get("delivery_date")
+        if delivered_at and scheduled and delivered_at <= scheduled:
+            on_time = 1
+
+    return {
+        "_id": f"{carrier_id}:{origin_state}:{destination_state}:{equipment_type}",
+        "carrier_id": str(carrier_id),
+        "origin_state": origin_state,
+        "destination_state": destination_state,
+        "equipment_type": equipment_type,
+        "last_load_date": shipment.get("created_at") if delivered else None,
+        "metrics": {
+            "delivered_count": int(delivered),
+            "in_transit_count": int(not delivered),
+            "cost_total": cost if delivered and cost > 0 else 0,
+            "cost_count": int(delivered and cost > 0),
+            "on_time_count": on_time,
+        },
+    }
+
+
+def _lane_updates(old: Optional[dict], new: Optional[dict]) -> Dict[str, UpdateOne]:
+    """``$inc`` updates that move lane stats from ``old`` to ``new``."""
+    deltas: Dict[str, dict] = {}
+    for sign, row in ((-1, old), (1, new)):
+        if not row:
+            continue
+        entry = deltas.setdefault(row["_id"], {"row": row, "metrics": defaultdict(int)})
+        entry["row"] = row
+        for name, value in row["metrics"].items():
+            entry["metrics"][name] += sign * value
+
+    updates = {}
+    for row_id, entry in deltas.items():
+        row = entry["row"]
+        update: Dict[str, Any] = {
+            "$inc": {f"metrics.{k}": v for k, v in entry["metrics"].items() if v},
+            "$setOnInsert": {
+                "carrier_id": row["carrier_id"],
+                "origin_state": row["origin_state"],
+                "destination_state": row["destination_state"],
+                "equipment_type": row["equipment_type"],
+            },
+        }
+        if new and row_id == new["_id"] and new.get("last_load_date") and old != new:
+            update["$max"] = {"last_load_date": new["last_load_date"]}
+        if not update["$inc"] and "$max" not in update:
+            continue
+        if not update["$inc"]:
+            del update["$inc"]
+        updates[row_id] = UpdateOne({"_id": row_id}, update, upsert=True)
+    return updates
+
+
+def _invalidate(*rows: Optional[dict]) -> None:
+    for row in rows:
+        if row:
+            _lane_cache.pop((row["origin_state"], row["destination_state"]), None)
+
+
+class LaneStatsService:
+    """Maintains and reads the ``lane_stats`` collection."""
+
+    @staticmethod
+    async def apply_shipment(shipment_id: Union[str, ObjectId], shipment: Optional[dict] = None) -> None:
+        """Bring lane statistics in line with the current state of a shipment.
+
+        ``shipment`` may be passed when the caller already loaded it with
+        ``LANE_SHIPMENT_FIELDS``. Failures are logged; :meth:`rebuild`
+        repairs any drift.
+        """
+        db = get_database()
+        shipment_oid = ObjectId(shipment_id) if isinstance(shipment_id, str) else shipment_id
+        try:
+            if shipment is None:
+                shipment = await db.shipments.find_one({"_id": shipment_oid}, LANE_SHIPMENT_FIELDS)
+            row = lane_stat_row(shipment) if shipment else None
+            old_row = await LaneStatsService._replace_contribution(shipment_oid, row)
+
+            updates = _lane_updates(old_row, row)
+            if updates:
+                await db.lane_stats.bulk_write(list(updates.values()), ordered=False)
+            _invalidate(old_row, row)
+        except Exception as e:
+            logger.warning(f"Lane stats update failed for shipment {shipment_oid}: {e}")
+
+    @staticmethod
+    async def _replace_contribution(shipment_oid: ObjectId, row: Optional[dict]) -> Optional[dict]:
+        """Store a shipment's new lane row atomically; returns the row it replaced."""
+        db = get_database()
+        if row:
+            previous = await db.lane_stat_contributions.find_one_and_replace(
+                {"_id": shipment_oid},
+                {"_id": shipment_oid, "row": row},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        else:
+            previous = await db.lane_stat_contributions.find_one_and_delete({"_id": shipment_oid})
+        return previous["row"] if previous else None
+
+    @staticmethod
+    async def apply_shipments(shipment_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Bring lane statistics in line with several shipments at once.
+
+        The shipments are read with one ``$in`` query and the lane updates
+        written with one ``bulk_write``; each contribution is still swapped
+        atomically, with the swaps running concurrently.
+        """
+        db = get_database()
+        oids = list({ObjectId(i) if isinstance(i, str) else i for i in shipment_ids})
+        if not oids:
+            return
+        try:
+            rows = {oid: None for oid in oids}
+            async for shipment in db.shipments.find({"_id": {"$in": oids}}, LANE_SHIPMENT_FIELDS):
+                rows[shipment["_id"]] = lane_stat_row(shipment)
+            old_rows = await asyncio.gather(*(
+                LaneStatsService._replace_contribution(oid, row) for oid, row in rows.items()
+            ))
+            updates = [
+                update
+                for old_row, row in zip(old_rows, rows.values())
+                for update in _lane_updates(old_row, row).values()
+            ]
+            if updates:
+                await db.lane_stats.bulk_write(updates, ordered=False)
+            _invalidate(*old_rows, *rows.values())
+        except Exception as e:
+            logger.warning(f"Lane stats update failed for {len(oids)} shipments: {e}")
+
+    @staticmethod
+    async def apply_new_shipments(shipments: List[dict]) -> None:
+        """Add the contributions of freshly inserted shipments already on a lane."""
+        for shipment in shipments:
+            if lane_stat_row(shipment):
+                await LaneStatsService.apply_shipment(shipment["_id"], shipment)
+
+    @staticmethod
+    async def get_lane(origin_state: str, destination_state: str) -> LaneTable:
+        """Lane table for a state pair, served from the TTL cache when fresh."""
+        key = (origin_state, destination_state)
+        now = time.monotonic()
+        cached = _lane_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        db = get_database()
+        rows = await db.lane_stats.find({
+            "origin_state": origin_state,
+            "destination_state": destination_state,
+        }).to_list(None)
+        table = LaneTable.from_rows(rows)
+
+        if len(_lane_cache) >= LANE_CACHE_MAX_ENTRIES:
+            for stale in [k for k, (expires, _) in _lane_cache.items() if expires <= now]:
+                del _lane_cache[stale]
+            if len(_lane_cache) >= LANE_CACHE_MAX_ENTRIES:
+                _lane_cache.clear()
+        _lane_cache[key] = (now + LANE_CACHE_TTL_SECONDS, table)
+        return table
+
+    @staticmethod
+    def clear_cache() -> None:
+        _lane_cache.clear()
+
+    @staticmethod
+    async def rebuild() -> Dict[str, int]:
+        """Recompute ``lane_stats`` from all in-transit and delivered shipments."""
+        db = get_database()
+        await db.lane_stats.delete_many({})
+        await db.lane_stat_contributions.delete_many({})
+
+        totals: Dict[str, dict] = {}
+        batch = []
+        shipments = 0
+        query = {"status": {"$in": list(LANE_STATUSES)}, "carrier_id": {"$ne": None}}
+        async for doc in db.shipments.find(query, LANE_SHIPMENT_FIELDS).batch_size(_BATCH_SIZE):
+            row = lane_stat_row(doc)
+            if not row:
+                continue
+            shipments += 1
+            batch.append(ReplaceOne({"_id": doc["_id"]}, {"_id": doc["_id"], "row": row}, upsert=True))
+            total = totals.setdefault(row["_id"], {**row, "metrics": defaultdict(int)})
+            for name, value in row["metrics"].items():
+                total["metrics"][name] += value
+            last = row.get("last_load_date")
+            if last and (total.get("last_load_date") is None or last > total["last_load_date"]):
+                total["last_load_date"] = last
+            if len(batch) >= _BATCH_SIZE:
+                await db.lane_stat_contributions.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await db.lane_stat_contributions.bulk_write(batch, ordered=False)
+
+        docs = [{**row, "metrics": dict(row["metrics"])} for row in totals.values()]
+        for i in range(0, len(docs), _BATCH_SIZE):
+            await db.lane_stats.insert_many(docs[i:i + _BATCH_SIZE], ordered=False)
+
+        _lane_cache.clear()
+        counts = {"shipments": shipments, "rows": len(docs)}
+        logger.info(f"Rebuilt lane stats: {counts}")
+        return counts
+
+
+shipment_changes.subscribe(
+    "Lane stats",
+    shipment=LaneStatsService.apply_shipment,
+    shipments=LaneStatsService.apply_shipments,
+    new_shipments=LaneStatsService.apply_new_shipments,
+)
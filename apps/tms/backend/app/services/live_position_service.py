@@ -0,0 +1,348 @@
+"""Latest-position read model for the live driver map.
+
+Every GPS ping upserts one document per shipment into ``latest_positions``, so
+the live map reads the current fleet with a single indexed query and resolves
+drivers, carriers and shipments with one ``$in`` query each, independent of
+fleet size. Drivers who check in without a shipment have no row there;
+their latest check-ins are merged in from ``driver_checkins`` by one
+grouped query over the shipment-less check-ins alone.
+:meth:`LivePositionService.rebuild_from_history` seeds the collection from
+recent history (see ``scripts/rebuild_live_positions.py``).
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Union
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.database import get_database
+from app.models.base import utc_now
+
+
+# Shipment statuses shown on the map when no driver record can be resolved
+ACTIVE_MAP_STATUSES = ("in_transit", "pending_pickup", "out_for_delivery")
+
+# Projection used when resolving shipments for map rows
+_SHIPMENT_PROJECTION = {
+    "shipment_number": 1,
+    "status": 1,
+    "eta": 1,
+    "stops.city": 1,
+    "stops.state": 1,
+    "carrier_id": 1,
+}
+
+
+class LivePositionService:
+    """Maintains and reads the ``latest_positions`` collection."""
+
+    @staticmethod
+    async def record_position(
+        shipment_id: Union[str, ObjectId],
+        latitude: float,
+        longitude: float,
+        city: Optional[str] = None,
+        state: Optional[str] = None,
+        source: str = "gps",
+        driver_id: Optional[Any] = None,
+        carrier_id: Optional[ObjectId] = None,
+        heading: Optional[float] = None,
+        speed_mph: Optional[float] = None,
+        reported_at: Optional[datetime] = None,
+    ) -> None:
+        """Upsert the latest known position for a shipment.
+
+        Fields that are not supplied (city, state, driver, heading, speed)
+        keep their previous value so a plain GPS ping does not erase the last
+        known location or driver attribution recorded by the driver app. A
+        ping older than the stored position is ignored.
+        """
+        db = get_database()
+        shipment_oid = ObjectId(shipment_id) if isinstance(shipment_id, str) else shipment_id
+        update = _position_fields(
+            shipment_oid, latitude, longitude, city=city, state=state, source=source, driver_id=driver_id,
+            carrier_id=carrier_id, heading=heading, speed_mph=speed_mph, reported_at=reported_at,
+        )
+        try:
+            await db.latest_positions.update_one(_newer_than_stored(update), {"$set": update}, upsert=True)
+        except DuplicateKeyError:
+            # A newer position is already stored; the upsert's insert collided with it
+            pass
+
+    @staticmethod
+    async def record_positions(positions: List[dict]) -> None:
+        """Upsert the latest positions of many shipments with one ``bulk_write``.
+
+        Each entry holds the keyword arguments of :meth:`record_position`.
+        """
+        if not positions:
+            return
+        db = get_database()
+        requests = []
+        for position in positions:
+            fields = _position_fields(**position)
+            requests.append(UpdateOne(_newer_than_stored(fields), {"$set": fields}, upsert=True))
+        try:
+            await db.latest_positions.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys are stale pings losing to a stored newer position
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+    @staticmethod
+    async def get_live_positions(max_age_hours: int = 24) -> List[dict]:
+        """Return map rows for every shipment with a recent position.
+
+        Drivers whose latest check-in has no shipment are added from
+        ``driver_checkins`` unless a shipment row already shows them. Issues
+        at most five queries: positions, shipment-less check-ins, shipments,
+        drivers and carriers. Rows mirror ``DriverLocationResponse`` field
+        names.
+        """
+        db = get_database()
+        cutoff = utc_now() - timedelta(hours=max_age_hours)
+
+        positions = await db.latest_positions.find(
+            {"last_updated": {"$gte": cutoff}}
+        ).sort("last_updated", -1).to_list(None)
+        mapped_drivers = {p["driver_id"] for p in positions if p.get("driver_id") is not None}
+        checkins = [
+            c async for c in db.driver_checkins.aggregate(_unassigned_checkins_pipeline(cutoff))
+            if c["driver_id"] not in mapped_drivers
+        ]
+        if not positions and not checkins:
+            return []
+
+        shipment_ids = [p["shipment_id"] for p in positions]
+        driver_ids = list(mapped_drivers | {c["driver_id"] for c in checkins})
+
+        shipments = {
+            s["_id"]: s
+            async for s in db.shipments.find({"_id": {"$in": shipment_ids}}, _SHIPMENT_PROJECTION)
+        }
+        drivers = {}
+        if driver_ids:
+            drivers = {
+                d["_id"]: d
+                async for d in db.drivers.find({"_id": {"$in": driver_ids}}, {"name": 1, "carrier_id": 1})
+            }
+
+        carrier_ids = {d.get("carrier_id") for d in drivers.values()}
+        carrier_ids |= {s.get("carrier_id") for s in shipments.values()}
+        carrier_ids.discard(None)
+        carrier_names = {}
+        if carrier_ids:
+            carrier_names = {
+                c["_id"]: c.get("name")
+                async for c in db.carriers.find({"_id": {"$in": list(carrier_ids)}}, {"name": 1})
+            }
+
+        rows = []
+        for pos in sorted(positions + checkins, key=lambda p: _as_naive(p["last_updated"]), reverse=True):
+            shipment = shipments.get(pos.get("shipment_id"))
+            driver = drivers.get(pos.get("driver_id"))
+
+            if driver:
+                carrier_id = driver.get("carrier_id")
+                row = {
+                    "driver_id": str(driver["_id"]),
+                    "driver_name": driver.get("name", "Unknown Driver"),
+                }
+            else:
+                # No resolvable driver: fall back to a shipment-level marker
+                # for loads that are actually moving.
+                if not shipment or shipment.get("status") not in ACTIVE_MAP_STATUSES:
+                    continue
+                carrier_id = shipment.get("carrier_id")
+                row = {
+                    "driver_id": f"shipment_{pos['shipment_id']}",
+                    "driver_name": f"Driver ({shipment.get('shipment_number', '')})",
+                }
+
+            row.update({
+                "carrier_id": str(carrier_id) if carrier_id else None,
+                "carrier_name": carrier_names.get(carrier_id),
+                "latitude": pos["latitude"],
+                "longitude": pos["longitude"],
+                "city": pos.get("city"),
+                "state": pos.get("state"),
+                "heading": pos.get("heading"),
+                "speed_mph": pos.get("speed_mph"),
+                "last_updated": pos["last_updated"],
+            })
+            if shipment:
+                row.update(_shipment_summary(shipment))
+            rows.append(row)
+
+        return rows
+
+    @staticmethod
+    async def rebuild_from_history(max_age_hours: int = 24) -> int:
+        """Seed ``latest_positions`` from recent check-ins and tracking events.
+
+        Used once when the collection is introduced (or after data repair);
+        normal operation keeps it current through ``record_position``.
+        Returns the number of shipments written.
+        """
+        db = get_database()
+        cutoff = utc_now() - timedelta(hours=max_age_hours)
+
+        latest: Dict[ObjectId, dict] = {}
+
+        tracking_pipeline = [
+            {"$match": {
+                "reported_at": {"$gte": cutoff},
+                "latitude": {"$exists": True, "$ne": None},
+            }},
+            {"$sort": {"reported_at": -1}},
+            {"$group": {
+                "_id": "$shipment_id",
+                "latitude": {"$first": "$latitude"},
+                "longitude": {"$first": "$longitude"},
+                "city": {"$first": "$location_city"},
+                "state": {"$first": "$location_state"},
+                "source": {"$first": "$source"},
+                "last_updated": {"$first": "$reported_at"},
+            }},
+        ]
+        async for tp in db.tracking_events.aggregate(tracking_pipeline):
+            latest[tp.pop("_id")] = tp
+
+        checkin_pipeline = [
+            {"$match": {
+                "created_at": {"$gte": cutoff},
+                "latitude": {"$exists": True, "$ne": None},
+                "shipment_id": {"$ne": None},
+            }},
+            {"$sort": {"created_at": -1}},
+            {"$group": {
+                "_id": "$shipment_id",
+                "driver_id": {"$first": "$driver_id"},
+                "latitude": {"$first": "$latitude"},
+                "longitude": {"$first": "$longitude"},
+                "city": {"$first": "$city"},
+                "state": {"$first": "$state"},
+                "heading": {"$first": "$heading"},
+                "speed_mph": {"$first": "$speed_mph"},
+                "source": {"$first": "$source"},
+                "last_updated": {"$first": "$created_at"},
+            }},
+        ]
+        async for ci in db.driver_checkins.aggregate(checkin_pipeline):
+            shipment_id = ci.pop("_id")
+            existing = latest.get(shipment_id)
+            # Check-ins carry driver attribution, so keep it even when a
+            # tracking event is slightly newer.
+            if existing and _as_naive(existing["last_updated"]) > _as_naive(ci["last_updated"]):
+                existing["driver_id"] = ci["driver_id"]
+            else:
+                latest[shipment_id] = ci
+
+        if latest:
+            await db.latest_positions.bulk_write(
+                [
+                    UpdateOne({"_id": shipment_id}, {"$set": {"shipment_id": shipment_id, **fields}}, upsert=True)
+                    for shipment_id, fields in latest.items()
+                ],
+                ordered=False,
+            )
+
+        return len(latest)
+
+
+def _position_fields(
+    shipment_id: Union[str, ObjectId],
+    latitude: float,
+    longitude: float,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    source: str = "gps",
+    driver_id: Optional[Any] = None,
+    carrier_id: Optional[ObjectId] = None,
+    heading: Optional[float] = None,
+    speed_mph: Optional[float] = None,
+    reported_at: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """``$set`` fields of a latest-position upsert; unsupplied optionals are left out."""
+    update: Dict[str, Any] = {
+        "shipment_id": ObjectId(shipment_id) if isinstance(shipment_id, str) else shipment_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "source": source,
+        "last_updated": reported_at or utc_now(),
+    }
+    if city is not None:
+        update["city"] = city
+    if state is not None:
+        update["state"] = state
+    if driver_id is not None:
+        update["driver_id"] = driver_id
+    if carrier_id is not None:
+        update["carrier_id"] = carrier_id
+    if heading is not None:
+        update["heading"] = heading
+    if speed_mph is not None:
+        update["speed_mph"] = speed_mph
+    return update
+
+
+def _newer_than_stored(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Upsert filter matching the shipment's row unless it holds a newer position.
+
+    When the row is newer the filter matches nothing and the upsert's insert
+    fails on the duplicate ``_id``, which callers treat as a stale ping.
+    """
+    return {
+        "_id": fields["shipment_id"],
+        "$or": [
+            {"last_updated": {"$lt": fields["last_updated"]}},
+            {"last_updated": {"$exists": False}},
+        ],
+    }
+
+
+def _unassigned_checkins_pipeline(cutoff: datetime) -> List[dict]:
+    """Latest recent check-in per driver among check-ins without a shipment."""
+    return [
+        {"$match": {
+            "created_at": {"$gte": cutoff},
+            "shipment_id": None,
+            "latitude": {"$exists": True, "$ne": None},
+        }},
+        {"$sort": {"created_at": -1}},
+        {"$group": {
+            "_id": "$driver_id",
+            "latitude": {"$first": "$latitude"},
+            "longitude": {"$first": "$longitude"},
+            "city": {"$first": "$city"},
+            "state": {"$first": "$state"},
+            "heading": {"$first": "$heading"},
+            "speed_mph": {"$first": "$speed_mph"},
+            "last_updated": {"$first": "$created_at"},
+        }},
+        {"$project": {
+            "_id": 0, "driver_id": "$_id", "latitude": 1, "longitude": 1, "city": 1, "state": 1,
+            "heading": 1, "speed_mph": 1, "last_updated": 1,
+        }},
+    ]
+
+
+def _shipment_summary(shipment: dict) -> dict:
+    """Shipment fields shown on a map marker."""
+    stops = shipment.get("stops", [])
+    origin = stops[0] if stops else {}
+    dest = stops[-1] if len(stops) > 1 else {}
+    return {
+        "current_shipment_id": str(shipment["_id"]),
+        "current_shipment_number": shipment.get("shipment_number"),
+        "shipment_status": shipment.get("status"),
+        "eta": shipment.get("eta"),
+        "origin": f"{origin.get('city', '')}, {origin.get('state', '')}",
+        "destination": f"{dest.get('city', '')}, {dest.get('state', '')}",
+    }
+
+
+def _as_naive(value: datetime) -> datetime:
+    """Drop tzinfo so naive and aware UTC timestamps compare."""
+    return value.replace(tzinfo=None) if value.tzinfo else value
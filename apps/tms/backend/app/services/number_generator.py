@@ -1,14 +1,38 @@
+"""Sequential numbers for quotes, shipments and invoices.
+
+Numbers come from one ``sequences`` document per (type, year), advanced with
+atomic ``$inc``. By default each process leases a block of ``LEASE_SIZE``
+numbers with a single ``$inc`` and hands them out from memory, so an
+allocation usually costs no round-trip and needs no lock. Leases are
+disjoint, so numbers stay unique across uvicorn workers and containers;
+the trade-off is that numbers from different processes interleave and a
+process that exits abandons the rest of its block.
+
+Sequences in ``GAPLESS_SEQUENCES`` (invoices) skip leasing and advance the
+counter by one per number, so they are consecutive in issue order.
+"""
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Tuple
 import asyncio
 
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
 from app.database import get_database
 
 
 class NumberGenerator:
     """Generate sequential numbers for quotes, shipments, invoices."""
 
+    # Numbers leased per process per refill
+    LEASE_SIZE = 100
+    # Sequences that must not have gaps from unused leases
+    GAPLESS_SEQUENCES = {"invoice"}
+    PREFIXES = {"quote": "Q", "shipment": "S", "invoice": "INV"}
+
     _locks: Dict[str, asyncio.Lock] = {}
+    # (database, sequence_type, year) -> [next number, last number] of the lease
+    _leases: Dict[Tuple[str, str, int], List[int]] = {}
 
     @classmethod
     def _get_lock(cls, sequence_type: str) -> asyncio.Lock:
@@ -17,6 +41,54 @@ class NumberGenerator:
             cls._locks[sequence_type] = asyncio.Lock()
         return cls._locks[sequence_type]
 
+    @classmethod
+    async def _increment(cls, sequence_type: str, year: int, count: int) -> int:
+        """Advance a sequence by ``count``; returns the new counter value."""
+        db = get_database()
+        try:
+            result = await db.sequences.find_one_and_update(
+                {"type": sequence_type, "year": year},
+                {"$inc": {"current": count}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Another process created the document first; it exists now
+            result = await db.sequences.find_one_and_update(
+                {"type": sequence_type, "year": year},
+                {"$inc": {"current": count}},
+                return_document=ReturnDocument.AFTER,
+            )
+        return result["current"]
+
+    @classmethod
+    async def allocate(cls, sequence_type: str) -> Tuple[int, int]:
+        """
+        Allocate the next value of a sequence.
+
+        Returns:
+            ``(year, number)``
+        """
+        year = datetime.now().year
+        if sequence_type in cls.GAPLESS_SEQUENCES:
+            return year, await cls._increment(sequence_type, year, 1)
+
+        key = (getattr(get_database(), "name", ""), sequence_type, year)
+        lease = cls._leases.get(key)
+        if lease is None or lease[0] > lease[1]:
+            async with cls._get_lock(sequence_type):
+                # Another task may have refilled while we waited
+                lease = cls._leases.get(key)
+                if lease is None or lease[0] > lease[1]:
+                    last = await cls._increment(sequence_type, year, cls.LEASE_SIZE)
+                    lease = [last - cls.LEASE_SIZE + 1, last]
+                    for stale in [k for k in cls._leases if k[1] == sequence_type and k[2] != year]:
+                        del cls._leases[stale]
+                    cls._leases[key] = lease
+        number = lease[0]
+        lease[0] += 1
+        return year, number
+
     @classmethod
     async def get_next_number(cls, sequence_type: str, prefix: str) -> str:
         """
@@ -29,22 +101,35 @@ class NumberGenerator:
         Returns:
             Formatted number like "Q-2024-00001"
         """
-        lock = cls._get_lock(sequence_type)
+        year, current = await cls.allocate(sequence_type)
+        return f"{prefix}-{year}-{current:05d}"
 
-        async with lock:
-            db = get_database()
-            year = datetime.now().year
+    @classmethod
+    async def generate(cls, sequence_type: str) -> str:
+        """Get the next number for a known sequence type, using its usual prefix."""
+        return await cls.get_next_number(sequence_type, cls.PREFIXES[sequence_type])
 
-            # Find or create the sequence document
-            result = await db.sequences.find_one_and_update(
-                {"type": sequence_type, "year": year},
-                {"$inc": {"current": 1}},
-                upsert=True,
-                return_document=True,
-            )
+    @classmethod
+    async def reserve_numbers(cls, sequence_type: str, prefix: str, count: int) -> List[str]:
+        """
+        Reserve a contiguous block of numbers with a single atomic ``$inc``.
 
-            current = result["current"]
-            return f"{prefix}-{year}-{current:05d}"
+        Used by bulk operations so N numbers cost one round-trip instead of N.
+
+        Returns:
+            ``count`` formatted numbers in ascending order
+        """
+        if count <= 0:
+            return []
+
+        year = datetime.now().year
+        last = await cls._increment(sequence_type, year, count)
+        return [f"{prefix}-{year}-{n:05d}" for n in range(last - count + 1, last + 1)]
+
+    @classmethod
+    def reset_leases(cls) -> None:
+        """Forget leased blocks (the unused numbers are skipped)."""
+        cls._leases.clear()
 
     @classmethod
     async def get_next_quote_number(cls) -> str:
@@ -56,6 +141,11 @@ class NumberGenerator:
         """Get next shipment number."""
         return await cls.get_next_number("shipment", "S")
 
+    @classmethod
+    async def reserve_shipment_numbers(cls, count: int) -> List[str]:
+        """Reserve a block of shipment numbers."""
+        return await cls.reserve_numbers("shipment", "S", count)
+
     @classmethod
     async def get_next_invoice_number(cls) -> str:
         """Get next invoice number."""
@@ -7,7 +7,7 @@ to ensure indexes are created on startup.
 
 import logging
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
+from pymongo import IndexModel, ASCENDING, DESCENDING, GEOSPHERE, TEXT
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +36,9 @@ INDEXES: dict[str, list[IndexModel]] = {
         IndexModel(
             [
                 ("shipment_number", TEXT),
+                ("pro_number", TEXT),
+                ("bol_number", TEXT),
+                ("stops.city", TEXT),
                 ("origin_city", TEXT),
                 ("origin_state", TEXT),
                 ("destination_city", TEXT),
@@ -45,6 +48,9 @@ INDEXES: dict[str, list[IndexModel]] = {
             name="shipments_text",
             weights={
                 "shipment_number": 10,
+                "pro_number": 8,
+                "bol_number": 8,
+                "stops.city": 5,
                 "origin_city": 5,
                 "destination_city": 5,
                 "origin_state": 3,
@@ -138,7 +144,8 @@ INDEXES: dict[str, list[IndexModel]] = {
 
     # ── Tracking Events ────────────────────────────────────────────────────
     "tracking_events": [
-        IndexModel([("shipment_id", ASCENDING), ("timestamp", DESCENDING)], name="shipment_time"),
+        IndexModel([("shipment_id", ASCENDING), ("event_timestamp", DESCENDING)], name="shipment_time"),
+        IndexModel([("reported_at", DESCENDING)], name="reported_at"),
         IndexModel([("event_type", ASCENDING)], name="event_type"),
     ],
 
@@ -175,6 +182,7 @@ INDEXES: dict[str, list[IndexModel]] = {
         IndexModel([("shipment_id", ASCENDING)], name="shipment_id", sparse=True),
         IndexModel([("facility_id", ASCENDING)], name="facility_id", sparse=True),
         IndexModel([("is_active", ASCENDING)], name="is_active"),
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
     ],
 
     # ── Emails ─────────────────────────────────────────────────────────────
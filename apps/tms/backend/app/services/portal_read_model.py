@@ -0,0 +1,280 @@
+"""Per-shipment read model for the carrier and customer portals.
+
+``portal_shipments`` holds one document per shipment with everything the
+portal list pages show: the shipment summary with origin and destination
+resolved from its stops, the latest tracking event, the inputs to the ETA
+confidence and the tenders still awaiting a carrier's answer. Each portal
+page is then a single indexed query on this collection instead of a loop
+over shipments or tenders with a ``find_one`` or latest-event lookup per
+row, so portal polling no longer adds load to the core collections.
+
+Documents are refreshed from source data after writes: shipments and
+tenders through :data:`app.services.shipment_changes.shipment_changes`
+(which every shipment and tender write path notifies), and tracking events
+where they are recorded. A refresh costs one indexed
+read each of the shipment, its latest event and its open tenders.
+:meth:`PortalReadModelService.rebuild` regenerates the collection (see
+``scripts/rebuild_portal_read_model.py``).
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Union
+
+from bson import ObjectId
+from pymongo import DeleteOne, ReplaceOne
+
+from app.database import get_database
+from app.services.shipment_changes import shipment_changes
+from app.models.tender import TenderStatus
+
+logger = logging.getLogger(__name__)
+
+# Shipment fields copied into the read model
+PORTAL_SHIPMENT_PROJECTION = {
+    "shipment_number": 1,
+    "status": 1,
+    "customer_id": 1,
+    "carrier_id": 1,
+    "stops.stop_type": 1,
+    "stops.city": 1,
+    "stops.state": 1,
+    "pickup_date": 1,
+    "delivery_date": 1,
+    "actual_delivery_date": 1,
+    "equipment_type": 1,
+    "weight_lbs": 1,
+    "carrier_cost": 1,
+    "bol_number": 1,
+    "eta": 1,
+    "last_known_location": 1,
+    "last_check_call": 1,
+    "created_at": 1,
+}
+
+_TENDER_PROJECTION = {
+    "shipment_id": 1,
+    "carrier_id": 1,
+    "offered_rate": 1,
+    "status": 1,
+    "created_at": 1,
+    "expires_at": 1,
+}
+
+# ETA confidence by hours since the last check call (first bound that applies)
+ETA_CONFIDENCE_STEPS = ((1, 0.95), (4, 0.80), (8, 0.60))
+ETA_CONFIDENCE_FLOOR = 0.40
+
+_BATCH_SIZE = 1000
+
+
+def _naive(value: datetime) -> datetime:
+    """Naive UTC, the form Mongo returns; aware values are converted."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def eta_confidence(doc: dict, now: Optional[datetime] = None) -> Optional[float]:
+    """Confidence in a shipment's ETA, higher the more recent its last check call.
+
+    Derived when the page is read rather than stored, since it decays with
+    time; None without an ETA, a delivery date and a check call.
+    """
+    last_check = doc.get("last_check_call")
+    if not (doc.get("eta") and doc.get("delivery_date") and last_check):
+        return None
+    now = _naive(now) if now else datetime.utcnow()
+    hours_since = (now - _naive(last_check)).total_seconds() / 3600
+    for hours, confidence in ETA_CONFIDENCE_STEPS:
+        if hours_since < hours:
+            return confidence
+    return ETA_CONFIDENCE_FLOOR
+
+
+def _latest_event_summary(event: Optional[dict]) -> Optional[dict]:
+    if not event:
+        return None
+    location = f"{event.get('location_city') or ''}, {event.get('location_state') or ''}".strip(", ")
+    return {
+        "event_type": event.get("event_type"),
+        "timestamp": event.get("event_timestamp"),
+        "location": location,
+        "latitude": event.get("latitude"),
+        "longitude": event.get("longitude"),
+    }
+
+
+def _open_tender(tender: dict) -> dict:
+    return {
+        "tender_id": tender["_id"],
+        "carrier_id": tender.get("carrier_id"),
+        "offered_rate": tender.get("offered_rate") or 0,
+        "status": tender.get("status"),
+        "created_at": tender.get("created_at"),
+        "expires_at": tender.get("expires_at"),
+    }
+
+
+def portal_document(
+    shipment: dict,
+    latest_event: Optional[dict] = None,
+    open_tenders: Iterable[dict] = (),
+) -> dict:
+    """Read-model document for a shipment, its latest tracking event and sent tenders."""
+    stops = shipment.get("stops") or []
+    origin = next((s for s in stops if s.get("stop_type") == "pickup"), {})
+    dest = next((s for s in stops if s.get("stop_type") == "delivery"), {})
+    return {
+        "_id": shipment["_id"],
+        "shipment_number": shipment.get("shipment_number") or "",
+        "status": shipment.get("status"),
+        "customer_id": shipment.get("customer_id"),
+        "carrier_id": shipment.get("carrier_id"),
+        "origin_city": origin.get("city") or "",
+        "origin_state": origin.get("state") or "",
+        "destination_city": dest.get("city") or "",
+        "destination_state": dest.get("state") or "",
+        "pickup_date": shipment.get("pickup_date"),
+        "delivery_date": shipment.get("delivery_date"),
+        "actual_delivery_date": shipment.get("actual_delivery_date"),
+        "equipment_type": shipment.get("equipment_type"),
+        "weight_lbs": shipment.get("weight_lbs"),
+        "carrier_cost": shipment.get("carrier_cost"),
+        "bol_number": shipment.get("bol_number"),
+        "eta": shipment.get("eta"),
+        "last_known_location": shipment.get("last_known_location"),
+        "last_check_call": shipment.get("last_check_call"),
+        "created_at": shipment.get("created_at"),
+        "latest_event": _latest_event_summary(latest_event),
+        "open_tenders": sorted(
+            (_open_tender(t) for t in open_tenders),
+            key=lambda t: t["created_at"] or datetime.min,
+            reverse=True,
+        ),
+        "refreshed_at": datetime.utcnow(),
+    }
+
+
+async def _build(db, shipments: List[dict]) -> List[dict]:
+    """Read-model documents for shipments, with one query each for events and tenders."""
+    if not shipments:
+        return []
+    ids = [s["_id"] for s in shipments]
+
+    latest: Dict[ObjectId, dict] = {}
+    async for row in db.tracking_events.aggregate([
+        {"$match": {"shipment_id": {"$in": ids}}},
+        {"$sort": {"shipment_id": 1, "event_timestamp": -1}},
+        {"$group": {
+            "_id": "$shipment_id",
+            "event_type": {"$first": "$event_type"},
+            "event_timestamp": {"$first": "$event_timestamp"},
+            "location_city": {"$first": "$location_city"},
+            "location_state": {"$first": "$location_state"},
+            "latitude": {"$first": "$latitude"},
+            "longitude": {"$first": "$longitude"},
+        }},
+    ]):
+        latest[row["_id"]] = row
+
+    tenders: Dict[ObjectId, List[dict]] = {}
+    async for tender in db.tenders.find(
+        {"shipment_id": {"$in": ids}, "status": TenderStatus.SENT.value}, _TENDER_PROJECTION
+    ):
+        tenders.setdefault(tender["shipment_id"], []).append(tender)
+
+    return [portal_document(s, latest.get(s["_id"]), tenders.get(s["_id"], [])) for s in shipments]
+
+
+class PortalReadModelService:
+    """Maintains the ``portal_shipments`` collection."""
+
+    @staticmethod
+    async def apply_shipments(shipment_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Refresh the read-model documents of shipments; deleted ones are removed.
+
+        Failures are logged rather than raised: the collection is derived
+        data and is repaired by :meth:`rebuild`.
+        """
+        oids = list({ObjectId(i) if isinstance(i, str) else i for i in shipment_ids})
+        if not oids:
+            return
+        db = get_database()
+        try:
+            shipments = await db.shipments.find({"_id": {"$in": oids}}, PORTAL_SHIPMENT_PROJECTION).to_list(None)
+            docs = await _build(db, shipments)
+            found = {doc["_id"] for doc in docs}
+            requests = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs]
+            requests += [DeleteOne({"_id": oid}) for oid in oids if oid not in found]
+            await db.portal_shipments.bulk_write(requests, ordered=False)
+        except Exception as e:
+            logger.warning(f"Portal read model update failed for {len(oids)} shipments: {e}")
+
+    @staticmethod
+    async def apply_shipment(shipment_id: Union[str, ObjectId]) -> None:
+        await PortalReadModelService.apply_shipments([shipment_id])
+
+    @staticmethod
+    async def apply_new_shipments(shipments: List[dict]) -> None:
+        """Add documents for freshly inserted shipments, which have no events or tenders yet."""
+        if not shipments:
+            return
+        try:
+            await get_database().portal_shipments.bulk_write(
+                [ReplaceOne({"_id": s["_id"]}, portal_document(s), upsert=True) for s in shipments],
+                ordered=False,
+            )
+        except Exception as e:
+            logger.warning(f"Portal read model bulk update failed for {len(shipments)} shipments: {e}")
+
+    @staticmethod
+    async def apply_tenders(tender_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Refresh the documents of tenders' shipments, which list their open tenders."""
+        oids = list({ObjectId(i) if isinstance(i, str) else i for i in tender_ids})
+        if not oids:
+            return
+        try:
+            shipment_ids = await get_database().tenders.distinct("shipment_id", {"_id": {"$in": oids}})
+        except Exception as e:
+            logger.warning(f"Portal read model update failed for {len(oids)} tenders: {e}")
+            return
+        await PortalReadModelService.apply_shipments(i for i in shipment_ids if i)
+
+    @staticmethod
+    async def apply_tender(tender_id: Union[str, ObjectId]) -> None:
+        await PortalReadModelService.apply_tenders([tender_id])
+
+    @staticmethod
+    async def rebuild() -> int:
+        """Regenerate the collection from shipments, tracking events and tenders."""
+        db = get_database()
+        await db.portal_shipments.delete_many({})
+        count = 0
+        batch: List[dict] = []
+        cursor = db.shipments.find({}, PORTAL_SHIPMENT_PROJECTION).batch_size(_BATCH_SIZE)
+        async for shipment in cursor:
+            batch.append(shipment)
+            if len(batch) >= _BATCH_SIZE:
+                count += await PortalReadModelService._insert(db, batch)
+                batch = []
+        if batch:
+            count += await PortalReadModelService._insert(db, batch)
+        logger.info(f"Rebuilt portal read model: {count} shipments")
+        return count
+
+    @staticmethod
+    async def _insert(db, shipments: List[dict]) -> int:
+        docs = await _build(db, shipments)
+        if docs:
+            await db.portal_shipments.insert_many(docs, ordered=False)
+        return len(docs)
+
+
+shipment_changes.subscribe(
+    "Portal read model",
+    shipment=PortalReadModelService.apply_shipment,
+    shipments=PortalReadModelService.apply_shipments,
+    new_shipments=PortalReadModelService.apply_new_shipments,
+    tender=PortalReadModelService.apply_tender,
+    tenders=PortalReadModelService.apply_tenders,
+)
@@ -16,6 +16,7 @@ from bson import ObjectId
 
 from app.database import get_database
 from app.models.base import utc_now
+from app.models.shipment import lane_key
 
 logger = logging.getLogger(__name__)
 
@@ -202,26 +203,14 @@ class PredictiveService:
         pipeline = [
             {
                 "$match": {
+                    "lane_key": lane_key(origin_state, destination_state),
                     "created_at": {"$gte": start_date},
                     "carrier_cost": {"$gt": 0},
                 }
             },
-            {
-                "$addFields": {
-                    "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                    "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                    "month": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
-                }
-            },
-            {
-                "$match": {
-                    "o_state": origin_state,
-                    "d_state": destination_state,
-                }
-            },
             {
                 "$group": {
-                    "_id": "$month",
+                    "_id": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
                     "avg_rate": {"$avg": "$carrier_cost"},
                     "min_rate": {"$min": "$carrier_cost"},
                     "max_rate": {"$max": "$carrier_cost"},
@@ -369,6 +358,7 @@ class PredictiveService:
         """
         db = get_database()
         now = utc_now()
+        lane = lane_key(origin_state, destination_state)
 
         if target_date:
             try:
@@ -388,22 +378,11 @@ class PredictiveService:
         lane_carriers_pipeline = [
             {
                 "$match": {
+                    "lane_key": lane,
                     "status": "delivered",
                     "carrier_id": {"$ne": None},
                 }
             },
-            {
-                "$addFields": {
-                    "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                    "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                }
-            },
-            {
-                "$match": {
-                    "o_state": origin_state,
-                    "d_state": destination_state,
-                }
-            },
             {
                 "$group": {
                     "_id": "$carrier_id",
@@ -420,6 +399,7 @@ class PredictiveService:
         target_week_end = target + timedelta(days=3)
 
         current_demand = await db.shipments.count_documents({
+            "lane_key": lane,
             "carrier_id": None,
             "status": {"$in": ["booked", "pending_pickup"]},
         })
@@ -429,25 +409,13 @@ class PredictiveService:
         volume_pipeline = [
             {
                 "$match": {
+                    "lane_key": lane,
                     "created_at": {"$gte": lookback},
                 }
             },
-            {
-                "$addFields": {
-                    "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                    "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                    "week": {"$dateToString": {"format": "%Y-W%V", "date": "$created_at"}},
-                }
-            },
-            {
-                "$match": {
-                    "o_state": origin_state,
-                    "d_state": destination_state,
-                }
-            },
             {
                 "$group": {
-                    "_id": "$week",
+                    "_id": {"$dateToString": {"format": "%Y-W%V", "date": "$created_at"}},
                     "volume": {"$sum": 1},
                 }
             },
@@ -547,15 +515,9 @@ class PredictiveService:
                     "created_at": {"$gte": now - timedelta(days=90)},
                 }
             },
-            {
-                "$addFields": {
-                    "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                    "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                }
-            },
             {
                 "$group": {
-                    "_id": {"origin": "$o_state", "dest": "$d_state"},
+                    "_id": {"origin": "$origin_state", "dest": "$destination_state"},
                     "volume": {"$sum": 1},
                 }
             },
@@ -606,20 +568,9 @@ class PredictiveService:
         pipeline = [
             {
                 "$match": {
-                    "carrier_id": ObjectId(carrier_id),
+                    "lane_key": lane_key(origin_state, destination_state),
                     "status": "delivered",
-                }
-            },
-            {
-                "$addFields": {
-                    "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                    "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                }
-            },
-            {
-                "$match": {
-                    "o_state": origin_state,
-                    "d_state": destination_state,
+                    "carrier_id": ObjectId(carrier_id),
                 }
             },
             {
@@ -668,21 +619,10 @@ class PredictiveService:
         pipeline = [
             {
                 "$match": {
+                    "lane_key": lane_key(origin_state, destination_state),
                     "status": "delivered",
                 }
             },
-            {
-                "$addFields": {
-                    "o_state": {"$arrayElemAt": ["$stops.state", 0]},
-                    "d_state": {"$arrayElemAt": ["$stops.state", -1]},
-                }
-            },
-            {
-                "$match": {
-                    "o_state": origin_state,
-                    "d_state": destination_state,
-                }
-            },
             {
                 "$group": {
                     "_id": None,
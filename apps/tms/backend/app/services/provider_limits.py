@@ -0,0 +1,81 @@
+"""Per-provider limits on outbound AI requests.
+
+Each provider gets a :class:`ProviderLimiter` that caps requests in flight
+and spaces request starts to stay under a requests-per-minute budget, so
+bursts of work (a thousand emailed PODs) queue here instead of being
+rejected by the provider. Limits come from settings and are account-wide:
+each process enforces its share, the budget divided by ``api_replicas``,
+since every replica runs document workers against the shared queue.
+"""
+import asyncio
+import time
+from typing import Dict
+
+from app.config import get_settings
+
+
+class ProviderLimiter:
+    """Async context manager limiting concurrency and request rate."""
+
+    def __init__(self, max_concurrent: int, requests_per_minute: int):
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_start = 0.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+
+    async def __aenter__(self) -> "ProviderLimiter":
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self._interval
+            if start > now:
+                try:
+                    await asyncio.sleep(start - now)
+                except BaseException:
+                    self._slots.release()
+                    raise
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.requests += 1
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "requests_per_minute": self.requests_per_minute,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+        }
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+
+
+def provider_limiter(provider: str) -> ProviderLimiter:
+    """The shared limiter for a provider (currently ``"anthropic"``)."""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        settings = get_settings()
+        limits = {
+            "anthropic": (settings.anthropic_max_concurrent, settings.anthropic_requests_per_minute),
+        }
+        max_concurrent, requests_per_minute = limits[provider]
+        replicas = max(1, settings.api_replicas)
+        limiter = _limiters[provider] = ProviderLimiter(
+            max(1, max_concurrent // replicas),
+            # 0 means no rate limit
+            max(1, requests_per_minute // replicas) if requests_per_minute else 0,
+        )
+    return limiter
@@ -0,0 +1,456 @@
+"""Command profiling and query-plan auditing for TMS Mongo access.
+
+:class:`QueryProfiler` is a PyMongo command listener registered on the
+Motor client (see :func:`app.database.connect_to_mongo`), so every command
+the API sends is timed without wrapping collection calls. Commands that
+read or write by filter are grouped by *shape*: collection, command, the
+filter with its values replaced by their operator structure, the sort and
+the pipeline stage names. Counts and timings are kept per shape, with the
+last command seen as a sample. Operations slower than ``slow_query_ms``
+are also kept in a bounded list of slow samples.
+
+:class:`QueryAuditor` periodically flushes shape statistics to
+``query_shapes`` and runs ``explain`` (query planner only; nothing is
+executed) on the top shapes by total time, as a ``find`` of the shape's
+last filter and sort. Filters hold tokens, emails and reference numbers,
+so only a redacted sample filter (see :func:`redact`) leaves the process. It flags collection scans,
+blocking in-memory sorts and regexes that cannot use an index bound
+(unanchored or case-insensitive), and recommends an index ordered
+equality, sort, range. Findings are stored on the shape documents so
+``scripts/audit_queries.py`` can report them from another process.
+"""
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+from bson.regex import Regex
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Commands grouped into shapes; others (inserts, getMore, handshakes) are ignored
+PROFILED_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+IGNORED_COLLECTIONS = {"query_shapes"}
+MAX_SHAPES = 2000
+SLOW_QUERY_SAMPLES = 200
+QUERY_AUDIT_MINUTES = 15
+QUERY_AUDIT_TOP_SHAPES = 25
+
+# Filter operators an index can answer as point lookups; any other operator is a range
+_EQUALITY_OPERATORS = {"$eq", "$in"}
+
+
+def _shape(value: Any) -> Any:
+    """Replace literal values with 1, keeping field names and operators."""
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        nested = [_shape(v) for v in value if isinstance(v, dict)]
+        return nested or 1
+    return 1
+
+
+def redact(value: Any) -> Any:
+    """Replace literal values with placeholders of the same type.
+
+    Field names and operators are kept, as are a regex's anchor and
+    case-insensitive flag, so a redacted filter explains to the same plan
+    and gets the same regex flags. Lists of plain values keep one
+    placeholder.
+    """
+    if isinstance(value, dict):
+        redacted = {k: redact(v) for k, v in value.items()}
+        if isinstance(value.get("$regex"), str):
+            redacted["$regex"] = "^" if value["$regex"].startswith("^") else ""
+            if "$options" in value:
+                redacted["$options"] = value["$options"]
+        return redacted
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(v, dict) for v in value):
+            return [redact(v) for v in value]
+        return [redact(value[0])] if value else []
+    if isinstance(value, (Regex, re.Pattern)):
+        flags = regex_flags(value)
+        anchored = "unanchored_regex" not in flags
+        return Regex("^" if anchored else "", "i" if "case_insensitive_regex" in flags else "")
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return type(value)()
+    if isinstance(value, str):
+        return ""
+    if isinstance(value, ObjectId):
+        return ObjectId(b"\x00" * 12)
+    if isinstance(value, datetime):
+        return datetime(1970, 1, 1)
+    return None
+
+
+def describe_command(command_name: str, command: dict) -> Optional[dict]:
+    """Collection, filter and sort of a profiled command; None if not profiled."""
+    if command_name not in PROFILED_COMMANDS:
+        return None
+    collection = command.get(command_name)
+    if not isinstance(collection, str) or collection in IGNORED_COLLECTIONS or collection.startswith("system."):
+        return None
+    stages: List[str] = []
+    sort = None
+    if command_name == "find":
+        query, sort = command.get("filter") or {}, command.get("sort")
+    elif command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        stages = [next(iter(stage), "") for stage in pipeline]
+        leading = pipeline[:2] if stages[:1] == ["$match"] else pipeline[:1]
+        query = leading[0]["$match"] if stages[:1] == ["$match"] else {}
+        sort = leading[-1].get("$sort") if leading else None
+    elif command_name in ("count", "distinct"):
+        query = command.get("query") or {}
+    elif command_name == "findAndModify":
+        query, sort = command.get("query") or {}, command.get("sort")
+    else:
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        query = statements[0].get("q") or {}
+    sort = dict(sort) if sort else None
+    shape = {"filter": _shape(query), "sort": list(sort) if sort else None, "stages": stages}
+    key = json.dumps([collection, command_name, shape], sort_keys=True)
+    return {
+        "key": key,
+        "collection": collection,
+        "command": command_name,
+        "shape": shape,
+        "filter": query,
+        "sort": sort,
+    }
+
+
+def regex_flags(query: Any) -> List[str]:
+    """Flags for regex conditions an index cannot bound."""
+    flags = set()
+
+    def visit(value: Any) -> None:
+        if isinstance(value, dict):
+            if "$regex" in value:
+                pattern, options = value["$regex"], value.get("$options", "")
+                if isinstance(pattern, (Regex, re.Pattern)):
+                    check(pattern)
+                else:
+                    check_text(str(pattern), str(options))
+            for v in value.values():
+                visit(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                visit(v)
+        elif isinstance(value, (Regex, re.Pattern)):
+            check(value)
+
+    def check(regex) -> None:
+        if isinstance(regex, Regex):
+            flags_value = regex.flags
+            insensitive = "i" in flags_value if isinstance(flags_value, str) else bool(flags_value & re.I)
+        else:
+            insensitive = bool(regex.flags & re.I)
+        check_text(regex.pattern, "i" if insensitive else "")
+
+    def check_text(pattern: str, options: str) -> None:
+        if not pattern.startswith("^"):
+            flags.add("unanchored_regex")
+        if "i" in options:
+            flags.add("case_insensitive_regex")
+
+    visit(query)
+    return sorted(flags)
+
+
+def recommend_index(query: dict, sort: Optional[dict]) -> List[Tuple[str, int]]:
+    """Index keys for a filter and sort: equality fields, then sort, then ranges."""
+    equality: List[str] = []
+    ranges: List[str] = []
+    for name, condition in query.items():
+        if name.startswith("$"):
+            # $or/$and/$expr/$text need per-branch or special indexes
+            continue
+        if isinstance(condition, (Regex, re.Pattern)):
+            ranges.append(name)
+        elif isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            (equality if set(condition) <= _EQUALITY_OPERATORS else ranges).append(name)
+        else:
+            equality.append(name)
+    keys = [(name, 1) for name in equality]
+    for name, direction in (sort or {}).items():
+        if name not in equality:
+            keys.append((name, direction if direction in (1, -1) else 1))
+    used = {name for name, _ in keys}
+    keys += [(name, 1) for name in ranges if name not in used]
+    return keys
+
+
+def plan_findings(explain: dict) -> dict:
+    """Stages, indexes used and flags from an ``explain`` result."""
+    stages: List[str] = []
+    indexes: List[str] = []
+
+    def visit(node: Any) -> None:
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+                if node.get("indexName"):
+                    indexes.append(node["indexName"])
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value)
+
+    planner = explain.get("queryPlanner", {})
+    visit(planner.get("winningPlan", {}))
+    flags = []
+    if "COLLSCAN" in stages:
+        flags.append("collscan")
+    if "SORT" in stages:
+        flags.append("in_memory_sort")
+    return {"stages": sorted(set(stages)), "indexes": sorted(set(indexes)), "flags": flags}
+
+
+@dataclass
+class ShapeStats:
+    """Timings for one query shape in this process."""
+    collection: str
+    command: str
+    shape: dict
+    sample: dict
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    slow_count: int = 0
+    flushed_count: int = 0
+    flushed_ms: float = 0.0
+    flushed_slow: int = 0
+    last_seen: datetime = field(default_factory=datetime.utcnow)
+
+    def summary(self) -> dict:
+        return {
+            "collection": self.collection,
+            "command": self.command,
+            "shape": self.shape,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 1),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 1),
+            "slow_count": self.slow_count,
+            "last_seen": self.last_seen,
+        }
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """Times every command on the client it is registered with, by shape.
+
+    Listener callbacks run on PyMongo's I/O threads, so state is guarded
+    by a lock and kept small.
+    """
+
+    def __init__(self, slow_query_ms: float = 100) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.shapes: Dict[str, ShapeStats] = {}
+        self.slow: deque = deque(maxlen=SLOW_QUERY_SAMPLES)
+        self.dropped = 0
+        self.started_at = datetime.utcnow()
+        self._pending: Dict[Tuple[Any, int], Tuple[str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in PROFILED_COMMANDS:
+            with self._lock:
+                self._pending[(event.connection_id, event.request_id)] = (event.command_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event)
+
+    def _finish(self, event) -> None:
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending:
+            try:
+                self.record(pending[0], pending[1], event.duration_micros / 1000)
+            except Exception as e:
+                logger.debug(f"Query profiler could not record {pending[0]}: {e}")
+
+    def record(self, command_name: str, command: dict, duration_ms: float) -> None:
+        """Add one completed command to its shape's statistics."""
+        info = describe_command(command_name, command)
+        if not info:
+            return
+        sample = {"filter": info["filter"], "sort": info["sort"]}
+        with self._lock:
+            stats = self.shapes.get(info["key"])
+            if stats is None:
+                if len(self.shapes) >= MAX_SHAPES:
+                    self.dropped += 1
+                    return
+                stats = self.shapes[info["key"]] = ShapeStats(
+                    info["collection"], info["command"], info["shape"], sample
+                )
+            stats.count += 1
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.sample = sample
+            stats.last_seen = datetime.utcnow()
+            if duration_ms >= self.slow_query_ms:
+                stats.slow_count += 1
+                self.slow.append({
+                    "collection": info["collection"],
+                    "command": command_name,
+                    "shape": info["shape"],
+                    "duration_ms": round(duration_ms, 1),
+                    "at": stats.last_seen,
+                })
+
+    def top(self, limit: int = QUERY_AUDIT_TOP_SHAPES) -> List[dict]:
+        """Shapes with the most total time in this process."""
+        with self._lock:
+            ranked = sorted(self.shapes.values(), key=lambda s: s.total_ms, reverse=True)[:limit]
+            return [s.summary() for s in ranked]
+
+    def slow_samples(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            return list(self.slow)[-limit:][::-1]
+
+    def take_unflushed(self) -> List[Tuple[str, ShapeStats, int, float, int]]:
+        """Per-shape deltas since the last flush, marking them flushed."""
+        deltas = []
+        with self._lock:
+            for key, stats in self.shapes.items():
+                count = stats.count - stats.flushed_count
+                if not count:
+                    continue
+                deltas.append((key, stats, count, stats.total_ms - stats.flushed_ms, stats.slow_count - stats.flushed_slow))
+                stats.flushed_count, stats.flushed_ms, stats.flushed_slow = stats.count, stats.total_ms, stats.slow_count
+        return deltas
+
+    def reset(self) -> None:
+        with self._lock:
+            self.shapes.clear()
+            self.slow.clear()
+            self.dropped = 0
+            self.started_at = datetime.utcnow()
+
+
+async def explain_shape(db, collection: str, sample: dict) -> dict:
+    """Planner findings for a shape's sample filter and sort, plus a recommendation."""
+    command = {"find": collection, "filter": sample.get("filter") or {}}
+    if sample.get("sort"):
+        command["sort"] = sample["sort"]
+    explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+    findings = plan_findings(explain)
+    findings["flags"] += regex_flags(sample.get("filter") or {})
+    keys = recommend_index(sample.get("filter") or {}, sample.get("sort"))
+    scans = {"collscan", "in_memory_sort"} & set(findings["flags"])
+    findings["recommended_index"] = [list(k) for k in keys] if scans and keys else None
+    return findings
+
+
+class QueryAuditor:
+    """Flushes profiled shapes to ``query_shapes`` and explains the top ones."""
+
+    def __init__(self, profiler: QueryProfiler) -> None:
+        self.profiler = profiler
+        self._task: Optional[asyncio.Task] = None
+
+    async def flush(self) -> int:
+        """Add this process's statistics since the last flush; returns shapes written."""
+        from app.database import get_database
+
+        deltas = self.profiler.take_unflushed()
+        db = get_database()
+        for key, stats, count, total_ms, slow_count in deltas:
+            await db.query_shapes.update_one(
+                {"_id": key},
+                {
+                    "$inc": {"count": count, "total_ms": round(total_ms, 3), "slow_count": slow_count},
+                    "$max": {"max_ms": round(stats.max_ms, 3)},
+                    "$set": {
+                        "collection": stats.collection,
+                        "command": stats.command,
+                        # As JSON text: shapes and filters are keyed by $ operators
+                        "shape": json.dumps(stats.shape, sort_keys=True),
+                        "sample": json_util.dumps({"filter": redact(stats.sample["filter"]), "sort": stats.sample["sort"]}),
+                        "last_seen": stats.last_seen,
+                    },
+                },
+                upsert=True,
+            )
+        return len(deltas)
+
+    @staticmethod
+    async def audit(limit: int = QUERY_AUDIT_TOP_SHAPES) -> List[dict]:
+        """Explain the top shapes by total time and store their findings."""
+        from app.database import get_database
+
+        db = get_database()
+        results = []
+        shapes = await db.query_shapes.find({}).sort("total_ms", -1).to_list(limit)
+        for doc in shapes:
+            try:
+                sample = json_util.loads(doc["sample"]) if doc.get("sample") else {}
+                findings = await explain_shape(db, doc["collection"], sample)
+            except Exception as e:
+                findings = {"error": str(e), "flags": [], "recommended_index": None}
+            findings["audited_at"] = datetime.utcnow()
+            await db.query_shapes.update_one({"_id": doc["_id"]}, {"$set": {"audit": findings}})
+            results.append({
+                "collection": doc["collection"],
+                "command": doc["command"],
+                "shape": json.loads(doc["shape"]),
+                "count": doc.get("count", 0),
+                "total_ms": round(doc.get("total_ms", 0), 1),
+                "avg_ms": round(doc.get("total_ms", 0) / doc["count"], 2) if doc.get("count") else 0.0,
+                "max_ms": round(doc.get("max_ms", 0), 1),
+                **findings,
+            })
+        return results
+
+    async def run_once(self) -> List[dict]:
+        await self.flush()
+        return await self.audit()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(QUERY_AUDIT_MINUTES * 60)
+            try:
+                started = time.perf_counter()
+                results = await self.run_once()
+                flagged = sum(1 for r in results if r.get("flags"))
+                logger.info(
+                    f"Query audit: {len(results)} shapes explained, {flagged} flagged "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+                )
+            except Exception as e:
+                logger.error(f"Query audit failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"Final query profile flush failed: {e}")
+
+
+query_profiler = QueryProfiler()
+query_auditor = QueryAuditor(query_profiler)
@@ -0,0 +1,204 @@
+"""In-memory lane index over active rate tables.
+
+Rate lookups used to load every active rate table, fetch each table's
+customer and scan every lane. The index compiles all lanes of active tables
+once into buckets keyed by (origin state, destination state, equipment),
+each sorted by minimum weight so a weight narrows the bucket with a bisect.
+Customer names are joined in at build time.
+
+Effective and expiry dates are checked at lookup time, so a table that
+becomes effective or expires needs no rebuild. The rate table endpoints call
+:meth:`RateLaneIndex.invalidate` on every write; the TTL bounds staleness
+from writes made by other processes (and customer renames).
+"""
+import asyncio
+import bisect
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.database import get_database
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the index is rebuilt even without an invalidation
+RATE_INDEX_TTL_SECONDS = 60
+
+LaneKey = Tuple[str, str, str]
+
+_RATE_TABLE_FIELDS = {
+    "customer_id": 1,
+    "name": 1,
+    "effective_date": 1,
+    "expiry_date": 1,
+    "lanes": 1,
+}
+
+
+def lane_key(origin_state: str, dest_state: str, equipment_type: Optional[str]) -> LaneKey:
+    return (origin_state.upper(), dest_state.upper(), (equipment_type or "van").lower())
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Datetimes from Mongo are naive UTC; make aware values comparable."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@dataclass
+class IndexedLane:
+    """One lane of one rate table, with the lookup result fields prebuilt."""
+    seq: int
+    min_weight: Optional[int]
+    max_weight: Optional[int]
+    customer_id: str
+    effective_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    result: Dict[str, Any]
+
+    def is_current(self, now: datetime) -> bool:
+        if self.effective_at is not None and self.effective_at > now:
+            return False
+        return self.expires_at is None or self.expires_at >= now
+
+
+@dataclass
+class _Bucket:
+    lanes: List[IndexedLane] = field(default_factory=list)
+    # Ascending minimum weight; lanes without one sort first
+    mins: List[float] = field(default_factory=list)
+
+
+class LaneIndex:
+    """Compiled lanes of a set of rate tables."""
+
+    def __init__(self, tables: List[dict], customer_names: Dict[Any, str]):
+        buckets: Dict[LaneKey, List[IndexedLane]] = {}
+        seq = 0
+        for table in tables:
+            customer_id = table["customer_id"]
+            expiry_date = table.get("expiry_date")
+            for lane in table.get("lanes") or []:
+                equipment_type = lane.get("equipment_type", "van")
+                entry = IndexedLane(
+                    seq=seq,
+                    min_weight=lane.get("min_weight"),
+                    max_weight=lane.get("max_weight"),
+                    customer_id=str(customer_id),
+                    effective_at=_naive_utc(table.get("effective_date")),
+                    expires_at=_naive_utc(expiry_date),
+                    result={
+                        "rate_table_id": str(table["_id"]),
+                        "rate_table_name": table["name"],
+                        "customer_id": str(customer_id),
+                        "customer_name": customer_names.get(customer_id),
+                        "origin_state": lane["origin_state"],
+                        "dest_state": lane["dest_state"],
+                        "equipment_type": equipment_type,
+                        "rate_per_mile": lane.get("rate_per_mile"),
+                        "flat_rate": lane.get("flat_rate"),
+                        "fuel_surcharge_pct": lane.get("fuel_surcharge_pct", 0.0),
+                        "min_charge": lane.get("min_charge"),
+                        "effective_date": table["effective_date"],
+                        "expiry_date": expiry_date,
+                        "notes": lane.get("notes"),
+                    },
+                )
+                seq += 1
+                key = lane_key(lane["origin_state"], lane["dest_state"], equipment_type)
+                buckets.setdefault(key, []).append(entry)
+
+        self.buckets: Dict[LaneKey, _Bucket] = {}
+        for key, lanes in buckets.items():
+            lanes.sort(key=lambda e: (float("-inf") if e.min_weight is None else e.min_weight, e.seq))
+            self.buckets[key] = _Bucket(
+                lanes=lanes,
+                mins=[float("-inf") if e.min_weight is None else e.min_weight for e in lanes],
+            )
+        self.lane_count = seq
+
+    def lookup(
+        self,
+        origin_state: str,
+        dest_state: str,
+        equipment_type: str,
+        weight_lbs: Optional[int] = None,
+        customer_id: Optional[str] = None,
+        now: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """Result fields of matching current lanes, in rate table order."""
+        bucket = self.buckets.get(lane_key(origin_state, dest_state, equipment_type))
+        if not bucket:
+            return []
+        now = _naive_utc(now or datetime.now(timezone.utc))
+
+        if weight_lbs is None:
+            candidates = bucket.lanes
+        else:
+            # Only lanes whose minimum is at or below the weight can match
+            candidates = bucket.lanes[:bisect.bisect_right(bucket.mins, weight_lbs)]
+
+        matches = [
+            e for e in candidates
+            if (weight_lbs is None or e.max_weight is None or weight_lbs <= e.max_weight)
+            and (customer_id is None or e.customer_id == customer_id)
+            and e.is_current(now)
+        ]
+        matches.sort(key=lambda e: e.seq)
+        return [e.result for e in matches]
+
+
+_index: Optional[LaneIndex] = None
+_index_expires = 0.0
+_generation = 0
+_build_lock = asyncio.Lock()
+
+
+class RateLaneIndex:
+    """Process-wide lane index over active rate tables."""
+
+    @staticmethod
+    async def get() -> LaneIndex:
+        """The current index, rebuilt when invalidated or past its TTL."""
+        global _index, _index_expires
+        if _index is not None and _index_expires > time.monotonic():
+            return _index
+        async with _build_lock:
+            if _index is not None and _index_expires > time.monotonic():
+                return _index
+            generation = _generation
+            index = await RateLaneIndex.build()
+            # A write during the build may not be reflected; serve it once
+            # but don't keep it.
+            if generation == _generation:
+                _index, _index_expires = index, time.monotonic() + RATE_INDEX_TTL_SECONDS
+            return index
+
+    @staticmethod
+    async def build() -> LaneIndex:
+        """Compile the index from all active rate tables."""
+        db = get_database()
+        tables = await db.rate_tables.find({"is_active": True}, _RATE_TABLE_FIELDS).to_list(None)
+
+        customer_ids = list({t["customer_id"] for t in tables})
+        customer_names = {}
+        if customer_ids:
+            async for customer in db.customers.find({"_id": {"$in": customer_ids}}, {"name": 1}):
+                customer_names[customer["_id"]] = customer.get("name")
+
+        index = LaneIndex(tables, customer_names)
+        logger.info(
+            f"Built rate lane index: {len(tables)} tables, {index.lane_count} lanes, "
+            f"{len(index.buckets)} lane keys"
+        )
+        return index
+
+    @staticmethod
+    def invalidate() -> None:
+        """Drop the index; the next lookup rebuilds it."""
+        global _index, _generation
+        _index = None
+        _generation += 1
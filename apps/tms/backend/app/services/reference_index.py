@@ -0,0 +1,337 @@
+"""Normalized reference-number index for matching emails and documents.
+
+Shipment, quote, PO, BOL and PRO numbers, customer references and carrier
+MC/DOT numbers are indexed in ``reference_index`` under a normalized key
+(upper case, punctuation removed; MC/DOT numbers as bare digits), one
+document per (key, entity) pair. Several entities can share a key (a PO
+or customer reference repeated across shipments), and
+:meth:`ReferenceIndexService.resolve` returns every entry under it.
+Inbound emails and processed documents resolve every candidate reference
+with a single ``$in`` on the key index instead of a case-insensitive
+``$regex`` query per reference and field.
+
+Entries are replaced whenever the entity is written: shipments through
+:data:`app.services.shipment_changes.shipment_changes` (which every
+shipment write path notifies), quotes and carriers from their create and
+update endpoints. :meth:`ReferenceIndexService.rebuild` regenerates the index from
+source data.
+
+:class:`ReferenceScanner` finds candidates in free text in one pass: an
+Aho-Corasick automaton over the labels people put in front of numbers
+("Load #", "PRO", "PO", "MC#", ...) and the shipment and quote number
+prefixes, reading the number that follows each match.
+"""
+import logging
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Union
+
+from bson import ObjectId
+
+from app.database import get_database
+from app.services.shipment_changes import shipment_changes
+
+logger = logging.getLogger(__name__)
+
+# Reference kinds indexed for each entity type, by source field
+REFERENCE_FIELDS: Dict[str, Dict[str, str]] = {
+    "shipment": {
+        "shipment_number": "shipment",
+        "pro_number": "pro",
+        "bol_number": "bol",
+        "customer_ref": "ref",
+        "po_number": "po",
+        "po_numbers": "po",
+        "reference_numbers": "ref",
+    },
+    "quote": {"quote_number": "quote"},
+    "carrier": {"mc_number": "mc", "dot_number": "dot"},
+}
+COLLECTIONS = {"shipment": "shipments", "quote": "quotes", "carrier": "carriers"}
+
+# Carrier numbers are bare digits, so they only match candidates labelled as such
+CARRIER_KINDS = {"mc", "dot"}
+
+# Text labels (lower case) and the kind of reference that follows them
+REFERENCE_LABELS = {
+    "load": "shipment",
+    "shipment": "shipment",
+    "ship": "shipment",
+    "shp": "shipment",
+    "order": "shipment",
+    "pro": "pro",
+    "bol": "bol",
+    "b/l": "bol",
+    "bill of lading": "bol",
+    "po": "po",
+    "p.o.": "po",
+    "purchase order": "po",
+    "quote": "quote",
+    "qt": "quote",
+    "ref": "ref",
+    "reference": "ref",
+    "mc": "mc",
+    "dot": "dot",
+    "usdot": "dot",
+}
+# Number prefixes (see NumberGenerator.PREFIXES) matched as part of the reference
+REFERENCE_PREFIXES = {"s-": "shipment", "q-": "quote"}
+
+# Words allowed between a label and its number ("PO No. 123", "Load number 55")
+_FILLER_WORDS = ("number", "num", "nbr", "no")
+_SEPARATORS = " \t#:.-/="
+_TOKEN_CHARS = set("abcdefghijklmnopqrstuvwxyz0123456789-")
+MIN_KEY_LENGTH = 3
+MAX_KEY_LENGTH = 30
+# Emails are scanned up to this many characters (quoted threads add little)
+SCAN_MAX_CHARS = 20_000
+
+
+def normalize_reference(value: Any, kind: Optional[str] = None) -> str:
+    """Index key for a reference: upper-case alphanumerics; carrier numbers as digits."""
+    key = re.sub(r"[^0-9A-Za-z]", "", str(value)).upper()
+    if kind in CARRIER_KINDS:
+        key = re.sub(r"^(MC|USDOT|DOT)", "", key).lstrip("0")
+    return key
+
+
+class ReferenceCandidate(NamedTuple):
+    """A reference found in text or extracted by the model; ``kind`` None if unlabelled."""
+    kind: Optional[str]
+    value: str
+    key: str
+
+
+def candidate(value: Any, kind: Optional[str] = None) -> Optional[ReferenceCandidate]:
+    """A candidate for a raw value, or None if it cannot be a reference."""
+    if value is None:
+        return None
+    key = normalize_reference(value, kind)
+    if not MIN_KEY_LENGTH <= len(key) <= MAX_KEY_LENGTH or not any(c.isdigit() for c in key):
+        return None
+    return ReferenceCandidate(kind, str(value).strip(), key)
+
+
+class ReferenceScanner:
+    """Aho-Corasick scanner for reference labels and number prefixes."""
+
+    def __init__(self, labels: Dict[str, str], prefixes: Dict[str, str]) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[tuple]] = [[]]
+        for pattern, kind in labels.items():
+            self._add(pattern, (pattern, kind, False))
+        for pattern, kind in prefixes.items():
+            self._add(pattern, (pattern, kind, True))
+        self._link()
+
+    def _add(self, pattern: str, output: tuple) -> None:
+        state = 0
+        for ch in pattern:
+            if ch not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][ch] = len(self._goto) - 1
+            state = self._goto[state][ch]
+        self._out[state].append(output)
+
+    def _link(self) -> None:
+        # Breadth first, so every failure link points at a state already linked
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def scan(self, text: str) -> List[ReferenceCandidate]:
+        """Candidates in ``text``, in order of appearance, without duplicates."""
+        text = text.lower()
+        found: Dict[tuple, ReferenceCandidate] = {}
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for pattern, kind, inline in self._out[state]:
+                start = i - len(pattern) + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                following = text[i + 1] if i + 1 < len(text) else ""
+                if inline:
+                    if not following.isdigit():
+                        continue
+                    value = self._token(text, start)
+                else:
+                    if following.isalpha():
+                        continue
+                    value = self._token(text, self._skip_filler(text, i + 1))
+                found_candidate = candidate(value, kind) if value else None
+                if found_candidate:
+                    found.setdefault((found_candidate.kind, found_candidate.key), found_candidate)
+        return list(found.values())
+
+    @staticmethod
+    def _skip_filler(text: str, pos: int) -> int:
+        while pos < len(text):
+            if text[pos] in _SEPARATORS:
+                pos += 1
+                continue
+            word = next((w for w in _FILLER_WORDS if text.startswith(w, pos)), None)
+            end = pos + len(word) if word else pos
+            if word and (end == len(text) or not text[end].isalnum()):
+                pos = end
+                continue
+            break
+        return pos
+
+    @staticmethod
+    def _token(text: str, pos: int) -> str:
+        end = pos
+        while end < len(text) and text[end] in _TOKEN_CHARS and end - pos <= MAX_KEY_LENGTH * 2:
+            end += 1
+        return text[pos:end].strip("-")
+
+
+reference_scanner = ReferenceScanner(REFERENCE_LABELS, REFERENCE_PREFIXES)
+
+
+def _values(value: Any) -> Iterable[Any]:
+    """Reference values in a field: scalars, lists, or EDI-style {"value": ...} entries."""
+    for item in value if isinstance(value, list) else [value]:
+        yield item.get("value") if isinstance(item, dict) else item
+
+
+def reference_entries(entity_type: str, doc: dict) -> List[dict]:
+    """Index entries for an entity document."""
+    entries: Dict[tuple, dict] = {}
+    for field, kind in REFERENCE_FIELDS[entity_type].items():
+        for value in _values(doc.get(field)):
+            found = candidate(value, kind)
+            if found:
+                entries.setdefault((found.key, kind), {
+                    "key": found.key,
+                    "kind": kind,
+                    "value": found.value,
+                    "entity_type": entity_type,
+                    "entity_id": doc["_id"],
+                })
+    return list(entries.values())
+
+
+def accepts(found: ReferenceCandidate, entry: dict) -> bool:
+    """Whether an index entry answers a candidate: carrier numbers only match their own label."""
+    if found.kind in CARRIER_KINDS or entry["kind"] in CARRIER_KINDS:
+        return found.kind == entry["kind"]
+    return True
+
+
+class ReferenceIndexService:
+    """Maintenance and lookup of the reference-number index."""
+
+    @staticmethod
+    async def apply(entity_type: str, entity_id: Union[str, ObjectId], doc: Optional[dict] = None) -> None:
+        """Replace an entity's entries with its current references.
+
+        A deleted entity has its entries removed. Failures are logged rather
+        than raised: the index is derived data and is repaired by
+        :meth:`rebuild`.
+        """
+        db = get_database()
+        entity_oid = ObjectId(entity_id) if isinstance(entity_id, str) else entity_id
+        try:
+            if doc is None:
+                projection = {field: 1 for field in REFERENCE_FIELDS[entity_type]}
+                doc = await db[COLLECTIONS[entity_type]].find_one({"_id": entity_oid}, projection)
+            await db.reference_index.delete_many({"entity_type": entity_type, "entity_id": entity_oid})
+            entries = reference_entries(entity_type, doc) if doc else []
+            if entries:
+                await db.reference_index.insert_many(entries, ordered=False)
+        except Exception as e:
+            logger.warning(f"Reference index update failed for {entity_type} {entity_oid}: {e}")
+
+    @staticmethod
+    async def apply_shipment(shipment_id: Union[str, ObjectId], shipment: Optional[dict] = None) -> None:
+        await ReferenceIndexService.apply("shipment", shipment_id, shipment)
+
+    @staticmethod
+    async def apply_shipments(shipment_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Replace the entries of several shipments with one ``$in`` read and delete."""
+        db = get_database()
+        oids = list({ObjectId(i) if isinstance(i, str) else i for i in shipment_ids})
+        if not oids:
+            return
+        try:
+            projection = {field: 1 for field in REFERENCE_FIELDS["shipment"]}
+            shipments = await db.shipments.find({"_id": {"$in": oids}}, projection).to_list(None)
+            await db.reference_index.delete_many({"entity_type": "shipment", "entity_id": {"$in": oids}})
+            entries = [e for shipment in shipments for e in reference_entries("shipment", shipment)]
+            if entries:
+                await db.reference_index.insert_many(entries, ordered=False)
+        except Exception as e:
+            logger.warning(f"Reference index update failed for {len(oids)} shipments: {e}")
+
+    @staticmethod
+    async def apply_quote(quote_id: Union[str, ObjectId]) -> None:
+        await ReferenceIndexService.apply("quote", quote_id)
+
+    @staticmethod
+    async def apply_carrier(carrier_id: Union[str, ObjectId]) -> None:
+        await ReferenceIndexService.apply("carrier", carrier_id)
+
+    @staticmethod
+    async def apply_new_shipments(shipments: List[dict]) -> None:
+        """Add the entries of freshly inserted shipments in one insert."""
+        entries = [e for shipment in shipments for e in reference_entries("shipment", shipment)]
+        if not entries:
+            return
+        try:
+            await get_database().reference_index.insert_many(entries, ordered=False)
+        except Exception as e:
+            logger.warning(f"Reference index bulk update failed for {len(shipments)} shipments: {e}")
+
+    @staticmethod
+    async def resolve(candidates: List[ReferenceCandidate]) -> List[List[dict]]:
+        """Index entries for each candidate, from one ``$in`` query on the key."""
+        keys = sorted({c.key for c in candidates})
+        if not keys:
+            return [[] for _ in candidates]
+        by_key: Dict[str, List[dict]] = {}
+        async for entry in get_database().reference_index.find({"key": {"$in": keys}}):
+            by_key.setdefault(entry["key"], []).append(entry)
+        return [[e for e in by_key.get(c.key, []) if accepts(c, e)] for c in candidates]
+
+    @staticmethod
+    async def rebuild() -> Dict[str, int]:
+        """Regenerate the index from shipments, quotes and carriers."""
+        db = get_database()
+        await db.reference_index.delete_many({})
+        counts: Dict[str, int] = {}
+        for entity_type, fields in REFERENCE_FIELDS.items():
+            projection = {field: 1 for field in fields}
+            batch: List[dict] = []
+            counts[entity_type] = 0
+            async for doc in db[COLLECTIONS[entity_type]].find({}, projection).batch_size(1000):
+                batch.extend(reference_entries(entity_type, doc))
+                if len(batch) >= 1000:
+                    await db.reference_index.insert_many(batch, ordered=False)
+                    counts[entity_type] += len(batch)
+                    batch = []
+            if batch:
+                await db.reference_index.insert_many(batch, ordered=False)
+                counts[entity_type] += len(batch)
+        logger.info(f"Rebuilt reference index: {counts}")
+        return counts
+
+
+shipment_changes.subscribe(
+    "Reference index",
+    shipment=ReferenceIndexService.apply_shipment,
+    shipments=ReferenceIndexService.apply_shipments,
+    new_shipments=ReferenceIndexService.apply_new_shipments,
+)
@@ -0,0 +1,326 @@
+"""Scheduled report execution.
+
+Each active schedule has a ``scheduled_report`` timer (see
+:mod:`app.services.timer_service`) at its ``next_run_at``; when it fires, the
+scheduler claims due schedules by advancing ``next_run_at`` with a
+conditional update (so several API processes never run the same schedule
+twice), executes them and moves the timer to the next run. A background
+poll of ``scheduled_reports`` remains as a backstop for schedules without
+a timer.
+
+Execution streams the custom-report pipeline (see
+:mod:`app.services.custom_reports`) through an aggregation cursor and hands
+rows to a streaming writer (:mod:`app.services.report_writers`) in chunks of
+``REPORT_CHUNK_ROWS``, rendering each chunk in a worker thread. Memory stays
+bounded by one chunk and the event loop stays free however many rows the
+report has. The artifact's path, size, row count and timing are recorded on
+the ``report_history`` row.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from bson import ObjectId
+
+from app.config import get_settings
+from app.database import get_database
+from app.services.custom_reports import (
+    REPORT_TYPE_CONFIGS,
+    build_report_pipeline,
+    clean_report_row,
+    primary_source,
+)
+from app.services.report_writers import ReportWriter, open_report_writer, report_extension
+from app.services.timer_service import register_timer_handler, timer_scheduler
+
+logger = logging.getLogger(__name__)
+
+REPORT_CHUNK_ROWS = 5000
+# Backstop only; schedules normally start from their timers
+REPORT_POLL_SECONDS = 300
+SCHEDULED_REPORT_TIMER = "scheduled_report"
+REPORT_RETRY_SECONDS = 30
+MAX_CONCURRENT_REPORTS = 2
+# A running report whose heartbeat is older than this was interrupted
+STALE_REPORT_MINUTES = 15
+
+
+def calculate_next_run(
+    frequency: str, time_of_day: str, day_of_week: Optional[int], day_of_month: Optional[int]
+) -> datetime:
+    """Calculate the next run time for a scheduled report."""
+    now = datetime.utcnow()
+    hour, minute = int(time_of_day.split(":")[0]), int(time_of_day.split(":")[1])
+
+    if frequency == "daily":
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+    elif frequency == "weekly":
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        days_ahead = (day_of_week or 0) - now.weekday()
+        if days_ahead <= 0:
+            days_ahead += 7
+        next_run += timedelta(days=days_ahead)
+    elif frequency == "monthly":
+        dom = day_of_month or 1
+        next_run = now.replace(day=min(dom, 28), hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            if now.month == 12:
+                next_run = next_run.replace(year=now.year + 1, month=1)
+            else:
+                next_run = next_run.replace(month=now.month + 1)
+    else:
+        next_run = now + timedelta(days=1)
+
+    return next_run
+
+
+def schedule_next_run(report: dict) -> datetime:
+    return calculate_next_run(
+        report.get("frequency", "daily"),
+        report.get("time_of_day", "08:00"),
+        report.get("day_of_week"),
+        report.get("day_of_month"),
+    )
+
+
+async def schedule_report_timer(report: dict) -> None:
+    """Keep a schedule's timer at its next run; inactive schedules have none."""
+    if report.get("is_active", True) and report.get("next_run_at"):
+        await timer_scheduler.schedule(SCHEDULED_REPORT_TIMER, str(report["_id"]), report["next_run_at"])
+    else:
+        await timer_scheduler.cancel(SCHEDULED_REPORT_TIMER, str(report["_id"]))
+
+
+async def report_config(report: dict) -> dict:
+    """The custom report config a schedule runs: its saved report, else its type's."""
+    if report.get("saved_report_id"):
+        saved = await get_database().saved_reports.find_one({"_id": ObjectId(report["saved_report_id"])})
+        if not saved:
+            raise ValueError("Saved report not found")
+        return saved.get("config", {})
+    config = REPORT_TYPE_CONFIGS.get(report.get("report_type", ""))
+    if config is None:
+        raise ValueError(f"Unknown report type: {report.get('report_type')}")
+    return config
+
+
+async def start_report_run(report: dict) -> ObjectId:
+    """Record a pending run of a schedule and advance its next run time."""
+    db = get_database()
+    now = datetime.utcnow()
+    result = await db.report_history.insert_one({
+        "scheduled_report_id": report["_id"],
+        "report_name": report.get("report_name", ""),
+        "generated_at": now,
+        "format": report.get("format", "pdf"),
+        "recipients": report.get("recipients", []),
+        "status": "pending",
+        "download_url": None,
+        "file_size_bytes": None,
+        "error_message": None,
+    })
+    next_run = schedule_next_run(report)
+    await db.scheduled_reports.update_one(
+        {"_id": report["_id"]},
+        {"$set": {"last_sent_at": now, "next_run_at": next_run, "updated_at": now}},
+    )
+    await schedule_report_timer({**report, "next_run_at": next_run})
+    return result.inserted_id
+
+
+def artifact_path(history_id: ObjectId, fmt: str) -> str:
+    return os.path.join(get_settings().report_artifact_dir, f"{history_id}.{report_extension(fmt)}")
+
+
+async def execute_report(history_id: ObjectId) -> None:
+    """Render a pending report run to its artifact, streaming rows in chunks."""
+    db = get_database()
+    history = await db.report_history.find_one({"_id": history_id})
+    report = await db.scheduled_reports.find_one({"_id": history["scheduled_report_id"]})
+    path = artifact_path(history_id, history.get("format", "pdf"))
+    started = time.perf_counter()
+    await db.report_history.update_one(
+        {"_id": history_id},
+        {"$set": {"status": "running", "started_at": datetime.utcnow(), "heartbeat_at": datetime.utcnow()}},
+    )
+
+    writer = None
+    size = None
+    try:
+        if not report:
+            raise ValueError("Scheduled report was deleted")
+        config = await report_config(report)
+        grouping = config.get("grouping")
+        columns: Optional[List[str]] = None if grouping else list(config.get("columns") or []) or None
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        writer = await asyncio.to_thread(open_report_writer, history.get("format", "pdf"), path, history["report_name"])
+        cursor = db[primary_source(config)].aggregate(
+            build_report_pipeline(config), allowDiskUse=True, batchSize=REPORT_CHUNK_ROWS
+        )
+
+        chunk: List[list] = []
+        async for raw in cursor:
+            row = clean_report_row(raw, grouping)
+            if columns is None:
+                columns = list(row)
+            if writer.rows_written == 0 and not chunk:
+                await asyncio.to_thread(writer.write_header, columns)
+            chunk.append([row.get(c) for c in columns])
+            if len(chunk) >= REPORT_CHUNK_ROWS:
+                await asyncio.to_thread(writer.write_rows, chunk)
+                chunk = []
+                await db.report_history.update_one(
+                    {"_id": history_id},
+                    {"$set": {"heartbeat_at": datetime.utcnow(), "row_count": writer.rows_written}},
+                )
+        if writer.rows_written == 0 and not chunk:
+            await asyncio.to_thread(writer.write_header, columns or [])
+        if chunk:
+            await asyncio.to_thread(writer.write_rows, chunk)
+        size = await asyncio.to_thread(writer.close)
+
+        await db.report_history.update_one({"_id": history_id}, {"$set": {
+            "status": "completed",
+            "completed_at": datetime.utcnow(),
+            "duration_ms": round((time.perf_counter() - started) * 1000),
+            "row_count": writer.rows_written,
+            "truncated": writer.truncated,
+            "file_size_bytes": size,
+            "storage_path": path,
+            "download_url": f"/api/v1/analytics/scheduled-reports/history/{history_id}/download",
+        }})
+        logger.info(f"Report {history_id} completed: {writer.rows_written} rows, {size} bytes")
+    except BaseException as e:
+        # Includes cancellation at shutdown, so no run is left "running"
+        error = "Interrupted" if isinstance(e, asyncio.CancelledError) else str(e)
+        # A writer that already closed has released its file
+        await asyncio.shield(_fail_run(history_id, path, started, error, writer if size is None else None))
+        if not isinstance(e, Exception):
+            raise
+        logger.error(f"Report {history_id} failed: {e}")
+
+
+async def _fail_run(
+    history_id: ObjectId, path: str, started: float, error: str, writer: Optional[ReportWriter] = None
+) -> None:
+    if writer is not None:
+        # Release the file handle before removing the partial artifact
+        try:
+            await asyncio.to_thread(writer.close)
+        except Exception as e:
+            logger.warning(f"Closing report writer for {history_id} failed: {e}")
+    if os.path.exists(path):
+        os.remove(path)
+    await get_database().report_history.update_one({"_id": history_id}, {"$set": {
+        "status": "failed",
+        "completed_at": datetime.utcnow(),
+        "duration_ms": round((time.perf_counter() - started) * 1000),
+        "error_message": error,
+    }})
+
+
+class ReportScheduler:
+    """Background worker that runs due scheduled reports."""
+
+    def __init__(self) -> None:
+        self._loop_task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        # Held while a run is being started, so slots are never over-committed
+        self._starting = asyncio.Lock()
+
+    async def claim_due(self) -> Optional[dict]:
+        """Claim one due schedule by advancing its ``next_run_at``; None when nothing is due."""
+        db = get_database()
+        while True:
+            report = await db.scheduled_reports.find_one(
+                {"is_active": True, "next_run_at": {"$lte": datetime.utcnow()}}, sort=[("next_run_at", 1)]
+            )
+            if not report:
+                return None
+            # Another process may claim it first; only the matching update wins
+            result = await db.scheduled_reports.update_one(
+                {"_id": report["_id"], "next_run_at": report["next_run_at"]},
+                {"$set": {"next_run_at": schedule_next_run(report)}},
+            )
+            if result.modified_count:
+                return report
+
+    def _execute(self, history_id: ObjectId) -> None:
+        task = asyncio.create_task(execute_report(history_id))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def tick(self) -> int:
+        """Start due reports up to the concurrency limit; returns how many started."""
+        started = 0
+        async with self._starting:
+            while len(self._running) < MAX_CONCURRENT_REPORTS:
+                report = await self.claim_due()
+                if not report:
+                    break
+                self._execute(await start_report_run(report))
+                started += 1
+        return started
+
+    async def run_now(self, report: dict) -> Optional[ObjectId]:
+        """Start a schedule immediately; its history id, or None at the concurrency limit."""
+        async with self._starting:
+            if len(self._running) >= MAX_CONCURRENT_REPORTS:
+                return None
+            history_id = await start_report_run(report)
+            self._execute(history_id)
+        return history_id
+
+    async def _run(self) -> None:
+        await get_database().report_history.update_many(
+            {
+                "status": {"$in": ["pending", "running"]},
+                "$or": [
+                    {"heartbeat_at": {"$lt": datetime.utcnow() - timedelta(minutes=STALE_REPORT_MINUTES)}},
+                    {"heartbeat_at": {"$exists": False}, "generated_at": {"$lt": datetime.utcnow() - timedelta(minutes=STALE_REPORT_MINUTES)}},
+                ],
+            },
+            {"$set": {"status": "failed", "error_message": "Interrupted"}},
+        )
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Report scheduler tick failed: {e}")
+            await asyncio.sleep(REPORT_POLL_SECONDS)
+
+    def start(self) -> None:
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop polling and cancel running reports (they are marked failed)."""
+        tasks = [t for t in [self._loop_task, *self._running] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+
+
+report_scheduler = ReportScheduler()
+
+
+async def _run_due_reports(payload: dict) -> None:
+    await report_scheduler.tick()
+    # At the concurrency limit, schedules still due are retried shortly
+    waiting = await get_database().scheduled_reports.find_one(
+        {"is_active": True, "next_run_at": {"$lte": datetime.utcnow()}}, {"_id": 1}
+    )
+    if waiting:
+        await timer_scheduler.schedule(
+            SCHEDULED_REPORT_TIMER, str(waiting["_id"]), datetime.utcnow() + timedelta(seconds=REPORT_RETRY_SECONDS)
+        )
+
+
+register_timer_handler(SCHEDULED_REPORT_TIMER, _run_due_reports)
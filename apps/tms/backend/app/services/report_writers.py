@@ -0,0 +1,269 @@
+"""Streaming CSV, XLSX and PDF writers for report artifacts.
+
+Each writer takes a header and then chunks of rows (lists of cell values in
+column order) and writes them straight to disk, so memory stays bounded by
+one chunk whatever the row count. Writers are synchronous; callers run
+``write_rows`` in a worker thread to keep the event loop free.
+
+XLSX is written with the standard library like the import reader in
+:mod:`app.services.shipment_import`: the sheet is streamed into a zip entry
+with inline strings, so no shared-string table is built. PDF output is a
+plain monospaced table, one page object per ``PDF_LINES_PER_PAGE`` rows;
+only object offsets are kept until the cross-reference table is written.
+"""
+import csv
+import math
+import os
+import re
+import zipfile
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import Any, List, Sequence
+from xml.sax.saxutils import escape
+
+# Excel's sheet limit is 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1_048_575
+PDF_LINES_PER_PAGE = 60
+PDF_FONT_SIZE = 7
+PDF_MAX_COLUMN_WIDTH = 24
+PDF_MAX_LINE_CHARS = 190
+
+FORMAT_EXTENSIONS = {"csv": "csv", "excel": "xlsx", "xlsx": "xlsx", "pdf": "pdf"}
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class ReportWriter(ABC):
+    """Base class: header once, then any number of row chunks, then close."""
+
+    extension = ""
+
+    def __init__(self, path: str, title: str = ""):
+        self.path = path
+        self.title = title
+        self.rows_written = 0
+        self.truncated = False
+
+    @abstractmethod
+    def write_header(self, columns: Sequence[str]) -> None:
+        ...
+
+    @abstractmethod
+    def write_rows(self, rows: List[Sequence[Any]]) -> None:
+        ...
+
+    def close(self) -> int:
+        """Finish the file and return its size in bytes."""
+        return os.path.getsize(self.path)
+
+
+class CsvReportWriter(ReportWriter):
+    extension = "csv"
+
+    def __init__(self, path: str, title: str = ""):
+        super().__init__(path, title)
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._file)
+
+    def write_header(self, columns: Sequence[str]) -> None:
+        self._csv.writerow(columns)
+
+    def write_rows(self, rows: List[Sequence[Any]]) -> None:
+        self._csv.writerows([[_text(v) for v in row] for row in rows])
+        self.rows_written += len(rows)
+
+    def close(self) -> int:
+        self._file.close()
+        return super().close()
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+# Characters XML 1.0 does not allow, even escaped
+_XML_INVALID_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_cell(value: Any) -> str:
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    # NaN and infinity are not valid numeric cells; they are written as text
+    if isinstance(value, int) or (isinstance(value, float) and math.isfinite(value)):
+        return f"<c><v>{value}</v></c>"
+    if value is None:
+        return "<c/>"
+    text = _XML_INVALID_CHARS.sub("", _text(value))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+class XlsxReportWriter(ReportWriter):
+    extension = "xlsx"
+
+    def __init__(self, path: str, title: str = ""):
+        super().__init__(path, title)
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        for name, content in _XLSX_PARTS.items():
+            self._zip.writestr(name, content)
+        # The sheet is the last entry, streamed until close
+        self._sheet = self._zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self._sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+        )
+
+    def _write(self, rows: List[Sequence[Any]]) -> None:
+        self._sheet.write("".join(
+            "<row>" + "".join(_xlsx_cell(v) for v in row) + "</row>" for row in rows
+        ).encode("utf-8"))
+
+    def write_header(self, columns: Sequence[str]) -> None:
+        self._write([columns])
+
+    def write_rows(self, rows: List[Sequence[Any]]) -> None:
+        room = XLSX_MAX_ROWS - self.rows_written
+        if len(rows) > room:
+            rows = rows[:room]
+            self.truncated = True
+        self._write(rows)
+        self.rows_written += len(rows)
+
+    def close(self) -> int:
+        self._sheet.write(b"</sheetData></worksheet>")
+        self._sheet.close()
+        self._zip.close()
+        return super().close()
+
+
+def _pdf_string(text: str) -> bytes:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + escaped.encode("latin-1", "replace") + b")"
+
+
+class PdfReportWriter(ReportWriter):
+    """A landscape, monospaced table split across pages."""
+
+    extension = "pdf"
+    # Fixed object numbers; pages start at 4
+    _CATALOG, _PAGES, _FONT = 1, 2, 3
+
+    def __init__(self, path: str, title: str = ""):
+        super().__init__(path, title)
+        self._file = open(path, "wb")
+        self._offsets = {}
+        self._next_obj = 4
+        self._page_ids: List[int] = []
+        self._widths: List[int] = []
+        self._header_line = ""
+        self._lines: List[str] = []
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(self._FONT, b"<< /Type /Font /Subtype /Type1 /Name /F1 /BaseFont /Courier >>")
+
+    def _object(self, number: int, body: bytes) -> None:
+        self._offsets[number] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def _format(self, values: Sequence[Any]) -> str:
+        cells = [_text(v)[:w].ljust(w) for v, w in zip(values, self._widths)]
+        return " ".join(cells)[:PDF_MAX_LINE_CHARS]
+
+    def _flush_page(self) -> None:
+        leading = PDF_FONT_SIZE + 2
+        lines = ([self.title] if self.title else []) + [self._header_line, ""] + self._lines
+        stream = b"BT /F1 %d Tf %d TL 24 588 Td " % (PDF_FONT_SIZE, leading)
+        stream += b" ".join(_pdf_string(line) + b" '" for line in lines) + b" ET"
+        content_id, page_id = self._next_obj, self._next_obj + 1
+        self._next_obj += 2
+        self._object(content_id, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        self._object(page_id, (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 792 612] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+        ) % (self._PAGES, self._FONT, content_id))
+        self._page_ids.append(page_id)
+        self._lines = []
+
+    def write_header(self, columns: Sequence[str]) -> None:
+        self._widths = [min(max(len(c), 10), PDF_MAX_COLUMN_WIDTH) for c in columns]
+        self._header_line = self._format(columns)
+
+    def write_rows(self, rows: List[Sequence[Any]]) -> None:
+        for row in rows:
+            self._lines.append(self._format(row))
+            if len(self._lines) >= PDF_LINES_PER_PAGE:
+                self._flush_page()
+        self.rows_written += len(rows)
+
+    def close(self) -> int:
+        if self._lines or not self._page_ids:
+            self._flush_page()
+        kids = b" ".join(b"%d 0 R" % p for p in self._page_ids)
+        self._object(self._PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._page_ids)))
+        self._object(self._CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % self._PAGES)
+
+        xref_at = self._file.tell()
+        count = self._next_obj
+        self._file.write(b"xref\n0 %d\n0000000000 65535 f \n" % count)
+        for number in range(1, count):
+            self._file.write(b"%010d 00000 n \n" % self._offsets[number])
+        self._file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            count, self._CATALOG, xref_at
+        ))
+        self._file.close()
+        return super().close()
+
+
+_WRITERS = {"csv": CsvReportWriter, "xlsx": XlsxReportWriter, "pdf": PdfReportWriter}
+
+
+def report_extension(fmt: str) -> str:
+    """File extension for a scheduled report format (pdf, csv, excel)."""
+    return FORMAT_EXTENSIONS.get((fmt or "").lower(), "csv")
+
+
+def open_report_writer(fmt: str, path: str, title: str = "") -> ReportWriter:
+    return _WRITERS[report_extension(fmt)](path, title)
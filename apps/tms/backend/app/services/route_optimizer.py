@@ -0,0 +1,243 @@
+"""Multi-stop route optimization.
+
+Stop sequences are open paths: the first and/or last stop can be pinned
+(origin and final destination) and everything in between is reordered.
+The distance matrix is computed once per stop set and cached; a
+nearest-neighbour tour is then improved with 2-opt (segment reversal) and
+Or-opt (moving runs of 1-3 stops) local search until neither finds an
+improving move or the time budget runs out.
+
+Batches of loads, and any single route above ``ROUTE_INLINE_MAX_STOPS``,
+are solved on a process pool so large requests don't hold the event loop or
+a single core.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_MILES = 3959
+
+# Distance matrices kept per process, keyed by the rounded stop coordinates
+MATRIX_CACHE_SIZE = 256
+# Local search stops improving after this many seconds per route
+MAX_SEARCH_SECONDS = 2.0
+# Longest run of consecutive stops Or-opt relocates
+OR_OPT_MAX_SEGMENT = 3
+ROUTE_POOL_WORKERS = min(4, os.cpu_count() or 1)
+# Routes with more stops than this always run in the pool, even alone
+ROUTE_INLINE_MAX_STOPS = 60
+
+Coordinate = Tuple[float, float]
+Matrix = List[List[float]]
+
+_matrix_cache: "OrderedDict[Tuple[Coordinate, ...], Matrix]" = OrderedDict()
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def haversine_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in miles between two GPS coordinates."""
+    lat1_r = math.radians(lat1)
+    lat2_r = math.radians(lat2)
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_MILES * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _compute_matrix(coords: Sequence[Coordinate]) -> Matrix:
+    # Precompute per-stop trig once; each pair is then a few multiplications
+    lat = [math.radians(c[0]) for c in coords]
+    lon = [math.radians(c[1]) for c in coords]
+    cos_lat = [math.cos(v) for v in lat]
+    n = len(coords)
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        row = matrix[i]
+        lat_i, lon_i, cos_i = lat[i], lon[i], cos_lat[i]
+        for j in range(i + 1, n):
+            a = (math.sin((lat[j] - lat_i) / 2) ** 2
+                 + cos_i * cos_lat[j] * math.sin((lon[j] - lon_i) / 2) ** 2)
+            d = EARTH_RADIUS_MILES * 2 * math.asin(math.sqrt(min(1.0, a)))
+            row[j] = d
+            matrix[j][i] = d
+    return matrix
+
+
+def distance_matrix(coords: Sequence[Coordinate]) -> Matrix:
+    """Pairwise distances in miles, cached for repeated stop sets."""
+    key = tuple((round(lat, 5), round(lon, 5)) for lat, lon in coords)
+    matrix = _matrix_cache.get(key)
+    if matrix is not None:
+        _matrix_cache.move_to_end(key)
+        return matrix
+    matrix = _compute_matrix(coords)
+    _matrix_cache[key] = matrix
+    if len(_matrix_cache) > MATRIX_CACHE_SIZE:
+        _matrix_cache.popitem(last=False)
+    return matrix
+
+
+def route_distance(matrix: Matrix, order: Sequence[int]) -> float:
+    return sum(matrix[order[i]][order[i + 1]] for i in range(len(order) - 1))
+
+
+def _nearest_neighbor(matrix: Matrix, fixed_first: bool, fixed_last: bool) -> List[int]:
+    n = len(matrix)
+    end = n - 1 if fixed_last else None
+    current = 0
+    order = [current]
+    remaining = set(range(1, n)) - {end}
+    while remaining:
+        row = matrix[current]
+        current = min(remaining, key=row.__getitem__)
+        order.append(current)
+        remaining.remove(current)
+    if end is not None:
+        order.append(end)
+    return order
+
+
+def _two_opt(matrix: Matrix, order: List[int], lo: int, hi: int, deadline: float) -> bool:
+    """Reverse segments ``order[i..j]`` (``lo <= i < j <= hi``) while it helps.
+
+    Positions outside ``lo..hi`` are pinned. A segment touching an open end
+    of the path has no edge to replace on that side.
+    """
+    n = len(order)
+    improved_any = False
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for i in range(lo, hi):
+            a = order[i - 1] if i > 0 else None
+            b = order[i]
+            row_a = matrix[a] if a is not None else None
+            row_b = matrix[b]
+            for j in range(i + 1, hi + 1):
+                c = order[j]
+                d = order[j + 1] if j + 1 < n else None
+                removed = (row_a[b] if a is not None else 0.0) + (matrix[c][d] if d is not None else 0.0)
+                added = (row_a[c] if a is not None else 0.0) + (row_b[d] if d is not None else 0.0)
+                if added < removed - 1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = improved_any = True
+                    b = order[i]
+                    row_b = matrix[b]
+    return improved_any
+
+
+def _or_opt(matrix: Matrix, order: List[int], lo: int, hi: int, deadline: float) -> bool:
+    """Move runs of up to ``OR_OPT_MAX_SEGMENT`` stops (optionally reversed)."""
+    def dist(x, y):
+        return matrix[x][y] if x is not None and y is not None else 0.0
+
+    improved_any = False
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            i = lo
+            while i + length - 1 <= hi:
+                n = len(order)
+                j = i + length - 1
+                first, last = order[i], order[j]
+                prev = order[i - 1] if i > 0 else None
+                nxt = order[j + 1] if j + 1 < n else None
+                gain = dist(prev, first) + dist(last, nxt) - dist(prev, nxt)
+                rest = order[:i] + order[j + 1:]
+                best = None
+                # Insert between rest[p-1] and rest[p]; p in the movable range
+                for p in range(lo, hi - length + 2):
+                    if p == i:
+                        continue
+                    left = rest[p - 1] if p > 0 else None
+                    right = rest[p] if p < len(rest) else None
+                    base = dist(left, right)
+                    forward = dist(left, first) + dist(last, right) - base
+                    backward = dist(left, last) + dist(first, right) - base
+                    cost, reverse = (forward, False) if forward <= backward else (backward, True)
+                    if cost < gain - 1e-9 and (best is None or cost < best[0]):
+                        best = (cost, p, reverse)
+                if best:
+                    _, p, reverse = best
+                    segment = order[i:j + 1]
+                    if reverse:
+                        segment.reverse()
+                    order[:] = rest[:p] + segment + rest[p:]
+                    improved = improved_any = True
+                i += 1
+    return improved_any
+
+
+def optimize_stop_order(
+    coords: Sequence[Coordinate],
+    fixed_first: bool = True,
+    fixed_last: bool = True,
+    max_seconds: float = MAX_SEARCH_SECONDS,
+) -> List[int]:
+    """Visit order (indexes into ``coords``) for a short path through all stops."""
+    n = len(coords)
+    if n < 3 or (n == 3 and fixed_first and fixed_last):
+        return list(range(n))
+
+    matrix = distance_matrix(coords)
+    order = _nearest_neighbor(matrix, fixed_first, fixed_last)
+    lo = 1 if fixed_first else 0
+    hi = n - 2 if fixed_last else n - 1
+
+    deadline = time.monotonic() + max_seconds
+    while time.monotonic() < deadline:
+        changed = _two_opt(matrix, order, lo, hi, deadline)
+        changed = _or_opt(matrix, order, lo, hi, deadline) or changed
+        if not changed:
+            break
+    return order
+
+
+def _optimize_job(job: Tuple[List[Coordinate], bool, bool]) -> List[int]:
+    coords, fixed_first, fixed_last = job
+    return optimize_stop_order(coords, fixed_first, fixed_last)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=ROUTE_POOL_WORKERS)
+    return _pool
+
+
+async def optimize_many(jobs: List[Tuple[List[Coordinate], bool, bool]]) -> List[List[int]]:
+    """Optimize several routes, in parallel worker processes when worthwhile.
+
+    Routes above ``ROUTE_INLINE_MAX_STOPS`` always go to the pool so their
+    search never runs on the event loop; small routes run inline unless
+    there are several to spread over the workers.
+    """
+    parallel = len(jobs) > 1 and ROUTE_POOL_WORKERS > 1
+    loop = asyncio.get_running_loop()
+
+    async def run(job):
+        if parallel or len(job[0]) > ROUTE_INLINE_MAX_STOPS:
+            return await loop.run_in_executor(_get_pool(), _optimize_job, job)
+        return _optimize_job(job)
+
+    return list(await asyncio.gather(*(run(job) for job in jobs)))
+
+
+async def run_in_pool(func, *args):
+    """Run a picklable, CPU-bound ``func(*args)`` in the worker processes."""
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), func, *args)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
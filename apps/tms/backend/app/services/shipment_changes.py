@@ -0,0 +1,166 @@
+"""Change notifications from shipment and tender writes to derived read models.
+
+Write paths report what they touched to :data:`shipment_changes` instead of
+calling each read model: a changed shipment, a batch of changed shipments,
+shipments inserted in bulk, or changed tenders. Read models (analytics rollups, lane statistics, the
+open-exception index, the reference index and the portal read model)
+register their own handlers with :meth:`ShipmentChangeDispatcher.subscribe`
+when their module is imported, so none of them depends on another.
+
+Subscribers run one after another in registration order. A failing
+subscriber is logged and the rest still run: read models are derived data
+and each is repaired by its own rebuild.
+"""
+import importlib
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, List, Optional, Union
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# Modules whose import registers a subscriber; loaded before the first
+# notification so scripts that only write shipments still update every model
+SUBSCRIBER_MODULES = (
+    "app.services.analytics_rollups",
+    "app.services.lane_stats",
+    "app.services.exception_detection",
+    "app.services.reference_index",
+    "app.services.portal_read_model",
+)
+
+ShipmentHandler = Callable[[ObjectId], Awaitable[None]]
+ShipmentsHandler = Callable[[List[ObjectId]], Awaitable[None]]
+NewShipmentsHandler = Callable[[List[dict]], Awaitable[None]]
+TenderHandler = Callable[[ObjectId], Awaitable[None]]
+TendersHandler = Callable[[List[ObjectId]], Awaitable[None]]
+
+
+def _oid(value: Union[str, ObjectId]) -> ObjectId:
+    return ObjectId(value) if isinstance(value, str) else value
+
+
+@dataclass
+class Subscriber:
+    """A read model's handlers; any of them may be omitted."""
+    name: str
+    shipment: Optional[ShipmentHandler] = None
+    shipments: Optional[ShipmentsHandler] = None
+    new_shipments: Optional[NewShipmentsHandler] = None
+    tender: Optional[TenderHandler] = None
+    tenders: Optional[TendersHandler] = None
+
+
+class ShipmentChangeDispatcher:
+    """Fans shipment and tender changes out to the registered read models."""
+
+    def __init__(self, subscriber_modules: Iterable[str] = SUBSCRIBER_MODULES) -> None:
+        self._subscribers: List[Subscriber] = []
+        self._modules = tuple(subscriber_modules)
+        self._loaded = False
+
+    def subscribe(
+        self,
+        name: str,
+        shipment: Optional[ShipmentHandler] = None,
+        shipments: Optional[ShipmentsHandler] = None,
+        new_shipments: Optional[NewShipmentsHandler] = None,
+        tender: Optional[TenderHandler] = None,
+        tenders: Optional[TendersHandler] = None,
+    ) -> None:
+        """Register a read model's handlers, replacing any under the same name.
+
+        A subscriber without a ``shipments`` (``new_shipments``) handler has
+        its ``shipment`` handler called for each changed (inserted) shipment,
+        and one without a ``tenders`` handler its ``tender`` handler for each
+        changed tender.
+        """
+        self._subscribers = [s for s in self._subscribers if s.name != name]
+        self._subscribers.append(Subscriber(name, shipment, shipments, new_shipments, tender, tenders))
+
+    @property
+    def subscribers(self) -> List[Subscriber]:
+        if not self._loaded:
+            for module in self._modules:
+                importlib.import_module(module)
+            self._loaded = True
+        return list(self._subscribers)
+
+    @staticmethod
+    async def _notify(subscriber: Subscriber, source: str, update: Awaitable) -> None:
+        """Run one subscriber's handler; its failure never skips the others."""
+        try:
+            await update
+        except Exception as e:
+            logger.warning(f"{subscriber.name} update failed for {source}: {e}")
+
+    async def shipment_changed(self, shipment_id: Union[str, ObjectId]) -> None:
+        """Notify every read model of a written (or deleted) shipment.
+
+        Call after any write that changes pricing, carrier, customer, stops,
+        dates, references or status.
+        """
+        shipment_oid = _oid(shipment_id)
+        source = f"shipment {shipment_oid}"
+        for subscriber in self.subscribers:
+            if subscriber.shipment:
+                await self._notify(subscriber, source, subscriber.shipment(shipment_oid))
+
+    async def shipments_changed(self, shipment_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Notify read models of several shipments (bulk updates, splits, consolidations).
+
+        Each subscriber gets the whole batch at once through its ``shipments``
+        handler, so it can refresh them with ``$in`` queries.
+        """
+        oids = list(dict.fromkeys(_oid(i) for i in shipment_ids if i))
+        if not oids:
+            return
+        source = f"{len(oids)} shipments"
+        for subscriber in self.subscribers:
+            if subscriber.shipments:
+                await self._notify(subscriber, source, subscriber.shipments(oids))
+            elif subscriber.shipment:
+                for shipment_oid in oids:
+                    await self._notify(subscriber, f"shipment {shipment_oid}", subscriber.shipment(shipment_oid))
+
+    async def shipments_created(self, shipments: List[dict]) -> None:
+        """Notify read models of freshly inserted shipments, passed as full documents."""
+        if not shipments:
+            return
+        source = f"{len(shipments)} new shipments"
+        for subscriber in self.subscribers:
+            if subscriber.new_shipments:
+                await self._notify(subscriber, source, subscriber.new_shipments(shipments))
+            elif subscriber.shipment:
+                for shipment in shipments:
+                    await self._notify(subscriber, source, subscriber.shipment(shipment["_id"]))
+
+    async def tender_changed(self, tender_id: Union[str, ObjectId]) -> None:
+        """Notify read models of a created tender or a tender status change."""
+        tender_oid = _oid(tender_id)
+        source = f"tender {tender_oid}"
+        for subscriber in self.subscribers:
+            if subscriber.tender:
+                await self._notify(subscriber, source, subscriber.tender(tender_oid))
+
+    async def tenders_changed(self, tender_ids: Iterable[Union[str, ObjectId]]) -> None:
+        """Notify read models of several tenders changed together.
+
+        Used when accepting a tender cancels the shipment's other open
+        tenders; each subscriber gets the whole batch through its ``tenders``
+        handler.
+        """
+        oids = list(dict.fromkeys(_oid(i) for i in tender_ids if i))
+        if not oids:
+            return
+        source = f"{len(oids)} tenders"
+        for subscriber in self.subscribers:
+            if subscriber.tenders:
+                await self._notify(subscriber, source, subscriber.tenders(oids))
+            elif subscriber.tender:
+                for tender_oid in oids:
+                    await self._notify(subscriber, f"tender {tender_oid}", subscriber.tender(tender_oid))
+
+
+shipment_changes = ShipmentChangeDispatcher()
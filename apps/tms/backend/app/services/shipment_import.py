@@ -0,0 +1,456 @@
+"""Streaming bulk shipment import.
+
+Spreadsheet rows are read lazily (CSV/TSV through ``csv``, XLSX by
+streaming the sheet XML out of the zip) and processed in chunks: each chunk
+is mapped and validated, gets a block of shipment numbers from one atomic
+``$inc``, and is written with a single unordered ``insert_many``. File
+imports run as background jobs recorded in ``import_jobs`` so the request
+returns as soon as the upload is on disk; progress is written to the job
+document after every chunk and broadcast over WebSockets. The upload only
+lives on the importing process's disk, so a job whose process died (no
+heartbeat for ``STALE_IMPORT_MINUTES``) is failed by
+:func:`fail_stale_import_jobs` rather than resumed.
+"""
+import csv
+import logging
+import os
+import re
+import zipfile
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.database import get_database
+from app.models.base import utc_now
+from app.models.shipment import Shipment, Stop, StopType
+from app.services.shipment_changes import shipment_changes
+from app.services.number_generator import NumberGenerator
+from app.services.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+# Rows validated, numbered and inserted together
+IMPORT_CHUNK_SIZE = 1000
+# Row errors kept on a job / returned from an import
+MAX_IMPORT_ERRORS = 100
+# A pending or running job without a heartbeat for this long was interrupted
+STALE_IMPORT_MINUTES = 15
+
+REQUIRED_FIELDS = {
+    "origin_city": "Missing origin city",
+    "origin_state": "Missing origin state",
+    "destination_city": "Missing destination city",
+    "destination_state": "Missing destination state",
+}
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_CELL_REF = re.compile(r"([A-Z]+)")
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+
+# ============================================================================
+# Readers
+# ============================================================================
+
+def _sniff_encoding(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(65536)
+    try:
+        head.decode("utf-8-sig")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is fine
+        if e.start < len(head) - 3:
+            return "latin-1"
+    return "utf-8-sig"
+
+
+def iter_csv_rows(path: str, delimiter: str = ",") -> Tuple[List[str], Iterator[Dict[str, str]]]:
+    """Header and a lazy row iterator for a CSV/TSV file."""
+    f = open(path, encoding=_sniff_encoding(path), newline="")
+    reader = csv.DictReader(f, delimiter=delimiter)
+    columns = reader.fieldnames or []
+
+    def rows():
+        with f:
+            yield from reader
+
+    return list(columns), rows()
+
+
+def _column_index(ref: str) -> int:
+    letters = _CELL_REF.match(ref).group(1)
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - 64
+    return index - 1
+
+
+def _first_sheet_path(archive: zipfile.ZipFile) -> str:
+    try:
+        with archive.open("xl/workbook.xml") as f:
+            sheet = next(el for _, el in iterparse(f) if el.tag == f"{_XLSX_NS}sheet")
+        rel_id = sheet.get(f"{_XLSX_REL_NS}id")
+        with archive.open("xl/_rels/workbook.xml.rels") as f:
+            for _, el in iterparse(f):
+                if el.tag == f"{_PKG_REL_NS}Relationship" and el.get("Id") == rel_id:
+                    target = el.get("Target").lstrip("/")
+                    return target if target.startswith("xl/") else f"xl/{target}"
+    except (KeyError, StopIteration):
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+
+def _shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as f:
+        for _, el in iterparse(f):
+            if el.tag == f"{_XLSX_NS}si":
+                strings.append("".join(t.text or "" for t in el.iter(f"{_XLSX_NS}t")))
+                el.clear()
+    return strings
+
+
+def _iter_sheet_values(path: str) -> Iterator[List[str]]:
+    with zipfile.ZipFile(path) as archive:
+        strings = _shared_strings(archive)
+        with archive.open(_first_sheet_path(archive)) as f:
+            for _, row in iterparse(f):
+                if row.tag != f"{_XLSX_NS}row":
+                    continue
+                values: List[str] = []
+                for cell in row.iter(f"{_XLSX_NS}c"):
+                    kind = cell.get("t")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in cell.iter(f"{_XLSX_NS}t"))
+                    else:
+                        v = cell.find(f"{_XLSX_NS}v")
+                        value = v.text if v is not None and v.text is not None else ""
+                        if kind == "s" and value:
+                            value = strings[int(value)]
+                    ref = cell.get("r")
+                    index = _column_index(ref) if ref else len(values)
+                    values.extend([""] * (index - len(values) + 1))
+                    values[index] = value
+                # Rows are the only large elements; drop them once read
+                row.clear()
+                yield values
+
+
+def iter_xlsx_rows(path: str) -> Tuple[List[str], Iterator[Dict[str, str]]]:
+    """Header and a lazy row iterator for the first sheet of an XLSX file."""
+    values = _iter_sheet_values(path)
+    columns = [c.strip() for c in next(values, [])]
+
+    def rows():
+        for row in values:
+            if any(row):
+                yield {col: row[i] if i < len(row) else "" for i, col in enumerate(columns) if col}
+
+    return [c for c in columns if c], rows()
+
+
+def open_import_file(path: str, ext: str) -> Tuple[List[str], Iterator[Dict[str, str]]]:
+    """Header and lazy rows for an uploaded spreadsheet, by file extension."""
+    if ext == "xlsx":
+        return iter_xlsx_rows(path)
+    return iter_csv_rows(path, "\t" if ext == "tsv" else ",")
+
+
+def read_import_columns(path: str, ext: str) -> List[str]:
+    """Just the header row of an uploaded spreadsheet."""
+    if ext == "xlsx":
+        values = _iter_sheet_values(path)
+        try:
+            return [c.strip() for c in next(values, []) if c.strip()]
+        finally:
+            values.close()
+    with open(path, encoding=_sniff_encoding(path), newline="") as f:
+        return csv.DictReader(f, delimiter="\t" if ext == "tsv" else ",").fieldnames or []
+
+
+# ============================================================================
+# Row mapping
+# ============================================================================
+
+def map_row(row: Dict[str, Any], column_mapping: Dict[str, str]) -> Dict[str, Any]:
+    """Apply a source column -> shipment field mapping to a row."""
+    mapped = {}
+    for source_col, target_field in column_mapping.items():
+        value = row.get(source_col)
+        if isinstance(value, str):
+            value = value.strip()
+        if value:
+            mapped[target_field] = value
+    return mapped
+
+
+def row_errors(mapped: Dict[str, Any]) -> List[str]:
+    return [message for field, message in REQUIRED_FIELDS.items() if not mapped.get(field)]
+
+
+def _parse_date(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text)
+    except (ValueError, TypeError):
+        pass
+    try:
+        return datetime.strptime(text, "%m/%d/%Y")
+    except (ValueError, TypeError):
+        pass
+    # XLSX dates arrive as day serials
+    try:
+        serial = float(text)
+    except ValueError:
+        return None
+    if 20000 < serial < 80000:
+        return _EXCEL_EPOCH + timedelta(days=serial)
+    return None
+
+
+def build_shipment(mapped: Dict[str, Any], customer_oid: ObjectId, row_number: int) -> Shipment:
+    """Shipment for a mapped row; ``shipment_number`` is assigned later."""
+    stops = []
+    if mapped.get("origin_city"):
+        stops.append(Stop(
+            stop_number=1,
+            stop_type=StopType.PICKUP,
+            address=mapped.get("origin_address", ""),
+            city=mapped["origin_city"],
+            state=mapped.get("origin_state", ""),
+            zip_code=mapped.get("origin_zip", ""),
+        ))
+    if mapped.get("destination_city"):
+        stops.append(Stop(
+            stop_number=2,
+            stop_type=StopType.DELIVERY,
+            address=mapped.get("destination_address", ""),
+            city=mapped["destination_city"],
+            state=mapped.get("destination_state", ""),
+            zip_code=mapped.get("destination_zip", ""),
+        ))
+
+    # Parse numeric fields
+    weight = None
+    if mapped.get("weight_lbs"):
+        try:
+            weight = int(float(str(mapped["weight_lbs"]).replace(",", "")))
+        except (ValueError, TypeError):
+            pass
+
+    price = 0
+    if mapped.get("customer_price"):
+        try:
+            price = int(float(str(mapped["customer_price"]).replace(",", "").replace("$", "")) * 100)
+        except (ValueError, TypeError):
+            pass
+
+    return Shipment(
+        shipment_number="",
+        customer_id=customer_oid,
+        stops=stops,
+        equipment_type=mapped.get("equipment_type", "van"),
+        weight_lbs=weight,
+        commodity=mapped.get("commodity"),
+        piece_count=int(float(mapped["piece_count"])) if mapped.get("piece_count") else None,
+        pallet_count=int(float(mapped["pallet_count"])) if mapped.get("pallet_count") else None,
+        special_requirements=mapped.get("special_requirements"),
+        customer_price=price,
+        pickup_date=_parse_date(mapped.get("pickup_date")),
+        delivery_date=_parse_date(mapped.get("delivery_date")),
+        bol_number=mapped.get("reference_number"),
+        internal_notes=f"Bulk imported row {row_number}",
+    )
+
+
+# ============================================================================
+# Import pipeline
+# ============================================================================
+
+class ShipmentImporter:
+    """Imports rows for one customer in chunks, accumulating results."""
+
+    def __init__(self, customer_oid: ObjectId, column_mapping: Dict[str, str], validate: bool = True):
+        self.customer_oid = customer_oid
+        self.column_mapping = column_mapping
+        self.validate = validate
+        self.processed = 0
+        self.successful = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.shipment_ids: List[str] = []
+
+    def _error(self, row_number: int, error: str, data: Optional[dict] = None) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            entry = {"row": row_number, "error": error}
+            if data is not None:
+                entry["data"] = data
+            self.errors.append(entry)
+
+    async def import_chunk(self, rows: List[Dict[str, Any]], first_row_number: int) -> None:
+        """Validate, number and insert one chunk of rows."""
+        db = get_database()
+        docs = []
+        row_numbers = []
+        for offset, row in enumerate(rows):
+            row_number = first_row_number + offset
+            mapped = map_row(row, self.column_mapping)
+            if self.validate:
+                errors = row_errors(mapped)
+                if errors:
+                    self._error(row_number, "; ".join(errors), row)
+                    continue
+            try:
+                docs.append(build_shipment(mapped, self.customer_oid, row_number).model_dump_mongo())
+                row_numbers.append(row_number)
+            except Exception as e:
+                self._error(row_number, str(e))
+        self.processed += len(rows)
+        if not docs:
+            return
+
+        numbers = await NumberGenerator.reserve_shipment_numbers(len(docs))
+        for doc, number in zip(docs, numbers):
+            doc["shipment_number"] = number
+
+        inserted = docs
+        try:
+            await db.shipments.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "insert failed") for err in e.details.get("writeErrors", [])}
+            for index, message in failed.items():
+                self._error(row_numbers[index], message)
+            inserted = [doc for i, doc in enumerate(docs) if i not in failed]
+
+        self.successful += len(inserted)
+        self.shipment_ids.extend(str(doc["_id"]) for doc in inserted)
+        await shipment_changes.shipments_created(inserted)
+
+    async def import_rows(self, rows, on_chunk=None) -> None:
+        """Import an iterable of rows chunk by chunk.
+
+        ``on_chunk`` is awaited after every chunk (progress reporting).
+        """
+        chunk: List[Dict[str, Any]] = []
+        first_row_number = 1
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await self.import_chunk(chunk, first_row_number)
+                first_row_number += len(chunk)
+                chunk = []
+                if on_chunk:
+                    await on_chunk(self)
+        if chunk:
+            await self.import_chunk(chunk, first_row_number)
+            if on_chunk:
+                await on_chunk(self)
+
+
+# ============================================================================
+# Background jobs
+# ============================================================================
+
+def _job_progress(importer: ShipmentImporter) -> dict:
+    return {
+        "processed": importer.processed,
+        "successful": importer.successful,
+        "failed": importer.failed,
+        "errors": importer.errors,
+    }
+
+
+async def create_import_job(customer_id: str, filename: str, column_mapping: Dict[str, str]) -> str:
+    db = get_database()
+    job_id = ObjectId()
+    await db.import_jobs.insert_one({
+        "_id": job_id,
+        "job_type": "shipment_import",
+        "status": "pending",
+        "customer_id": ObjectId(customer_id),
+        "filename": filename,
+        "column_mapping": column_mapping,
+        "processed": 0,
+        "successful": 0,
+        "failed": 0,
+        "errors": [],
+        "created_at": utc_now(),
+    })
+    return str(job_id)
+
+
+async def fail_stale_import_jobs() -> int:
+    """Fail jobs left pending or running by a process that stopped; returns how many."""
+    cutoff = utc_now() - timedelta(minutes=STALE_IMPORT_MINUTES)
+    result = await get_database().import_jobs.update_many(
+        {
+            "status": {"$in": ["pending", "running"]},
+            "$or": [
+                {"heartbeat_at": {"$lt": cutoff}},
+                {"heartbeat_at": {"$exists": False}, "created_at": {"$lt": cutoff}},
+            ],
+        },
+        {"$set": {"status": "failed", "error": "Interrupted", "completed_at": utc_now()}},
+    )
+    return result.modified_count
+
+
+async def run_import_job(job_id: str, path: str, ext: str) -> None:
+    """Import a spooled upload for a job, then delete the file."""
+    db = get_database()
+    job_oid = ObjectId(job_id)
+    try:
+        job = await db.import_jobs.find_one_and_update(
+            {"_id": job_oid},
+            {"$set": {"status": "running", "started_at": utc_now(), "heartbeat_at": utc_now()}},
+            return_document=True,
+        )
+        customer_id = str(job["customer_id"])
+        importer = ShipmentImporter(job["customer_id"], job["column_mapping"])
+
+        async def report(progress: ShipmentImporter):
+            await db.import_jobs.update_one(
+                {"_id": job_oid}, {"$set": {**_job_progress(progress), "heartbeat_at": utc_now()}}
+            )
+            await manager.broadcast("bulk_import_progress", {
+                "job_id": job_id,
+                "customer_id": customer_id,
+                "processed": progress.processed,
+                "successful": progress.successful,
+                "failed": progress.failed,
+            })
+
+        _, rows = open_import_file(path, ext)
+        await importer.import_rows(rows, on_chunk=report)
+
+        await db.import_jobs.update_one(
+            {"_id": job_oid},
+            {"$set": {**_job_progress(importer), "status": "completed", "completed_at": utc_now()}},
+        )
+        if importer.successful:
+            await manager.broadcast("bulk_import_complete", {
+                "job_id": job_id,
+                "count": importer.successful,
+                "customer_id": customer_id,
+            })
+    except Exception as e:
+        logger.error(f"Bulk import job {job_id} failed: {e}")
+        await db.import_jobs.update_one(
+            {"_id": job_oid},
+            {"$set": {"status": "failed", "error": str(e), "completed_at": utc_now()}},
+        )
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
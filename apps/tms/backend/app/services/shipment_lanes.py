@@ -0,0 +1,47 @@
+"""Backfill of the denormalized lane fields on shipments.
+
+Shipments carry their origin and destination city, state and zip3 plus a
+``lane_key`` (see :func:`app.models.shipment.lane_fields`), refreshed from
+the stops whenever they are written through the ``Shipment`` model. Lane
+queries match those fields against the ``lane_key`` compound indexes
+instead of computing states from ``stops`` in an ``$addFields`` stage
+ahead of the match. Shipments written before the fields existed are filled
+in by :meth:`ShipmentLaneService.backfill`.
+"""
+import logging
+
+from pymongo import UpdateOne
+
+from app.database import get_database
+from app.models.shipment import lane_fields
+
+logger = logging.getLogger(__name__)
+
+_BATCH_SIZE = 1000
+
+_STOP_FIELDS = {"stops.city": 1, "stops.state": 1, "stops.zip_code": 1}
+
+
+class ShipmentLaneService:
+    """Maintenance of the materialized lane fields."""
+
+    @staticmethod
+    async def backfill(only_missing: bool = True) -> int:
+        """Set lane fields from stops; returns the number of shipments updated.
+
+        With ``only_missing`` false every shipment is recomputed, which
+        repairs fields changed by raw updates to ``stops``.
+        """
+        db = get_database()
+        query = {"lane_key": {"$exists": False}} if only_missing else {}
+        batch = []
+        updated = 0
+        async for doc in db.shipments.find(query, _STOP_FIELDS).batch_size(_BATCH_SIZE):
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": lane_fields(doc.get("stops") or [])}))
+            if len(batch) >= _BATCH_SIZE:
+                updated += (await db.shipments.bulk_write(batch, ordered=False)).modified_count
+                batch = []
+        if batch:
+            updated += (await db.shipments.bulk_write(batch, ordered=False)).modified_count
+        logger.info(f"Backfilled lane fields on {updated} shipments")
+        return updated
@@ -0,0 +1,253 @@
+"""Durable timers fired at their deadlines by any API process.
+
+A timer is a document in ``timers`` keyed by ``<kind>:<key>`` with a
+``due_at`` time and a payload; scheduling the same key again moves it, so
+callers never need to look up what they scheduled before. Handlers are
+registered per kind by the modules that own them (tender expiry in
+:mod:`app.services.waterfall_service`, scheduled reports in
+:mod:`app.services.report_scheduler`, the time-driven exception sweep that
+opens overdue check-call exceptions in
+:mod:`app.services.exception_detection`, deferred removal of released
+document objects in :mod:`app.services.document_storage`).
+
+Every process runs a :class:`TimerScheduler` loop. Due timers are claimed
+with an atomic ``find_one_and_update`` that takes a lease, so each firing
+happens in exactly one process; a lease left behind by a dead process
+expires after ``TIMER_LEASE_SECONDS`` and the timer is claimed again.
+Between firings the loop sleeps until the next due time, at most
+``TIMER_POLL_SECONDS``, and is woken at once when this process schedules an
+earlier timer. Failed handlers are retried with exponential backoff up to
+``TIMER_MAX_ATTEMPTS``.
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.database import get_database
+
+logger = logging.getLogger(__name__)
+
+TIMER_POLL_SECONDS = 5
+TIMER_LEASE_SECONDS = 120
+TIMER_MAX_ATTEMPTS = 5
+TIMER_RETRY_SECONDS = 10  # doubled after each failed attempt
+MAX_CONCURRENT_TIMERS = 8
+
+TimerHandler = Callable[[dict], Awaitable[Any]]
+
+_handlers: Dict[str, TimerHandler] = {}
+
+
+def register_timer_handler(kind: str, handler: TimerHandler) -> None:
+    """Set the coroutine run with a timer's payload when a timer of ``kind`` fires."""
+    _handlers[kind] = handler
+
+
+def _naive(value: datetime) -> datetime:
+    """Naive UTC, the form Mongo returns; aware values are converted."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class TimerScheduler:
+    """Schedules timers and fires the due ones in this process."""
+
+    def __init__(self) -> None:
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._loop_task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._next_wake: Optional[datetime] = None
+
+    def _notify(self, due_at: datetime) -> None:
+        if self._wakeup is not None and (self._next_wake is None or due_at < self._next_wake):
+            self._wakeup.set()
+
+    async def schedule(
+        self,
+        kind: str,
+        key: str,
+        due_at: datetime,
+        payload: Optional[dict] = None,
+        earliest: bool = False,
+    ) -> None:
+        """Schedule (or move) the timer ``kind:key`` to fire at ``due_at``.
+
+        With ``earliest`` a timer already scheduled sooner is left alone, for
+        timers that stand for "the next time anything of this kind is due".
+        """
+        db = get_database()
+        due_at = _naive(due_at)
+        timer_id = f"{kind}:{key}"
+        query: Dict[str, Any] = {"_id": timer_id}
+        if earliest:
+            query["$or"] = [{"status": {"$ne": "scheduled"}}, {"due_at": {"$gt": due_at}}]
+        try:
+            await db.timers.update_one(
+                query,
+                {
+                    "$set": {
+                        "kind": kind,
+                        "key": key,
+                        "due_at": due_at,
+                        "payload": payload or {},
+                        "status": "scheduled",
+                        "attempts": 0,
+                        "updated_at": datetime.utcnow(),
+                    },
+                    "$unset": {"lease_owner": "", "lease_token": "", "lease_until": "", "fired_at": "", "error": ""},
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Only with ``earliest``: the timer exists and is already due sooner
+            return
+        self._notify(due_at)
+
+    async def cancel(self, kind: str, key: str) -> bool:
+        """Remove a scheduled timer; False if it was not scheduled."""
+        result = await get_database().timers.delete_one({"_id": f"{kind}:{key}", "status": "scheduled"})
+        return bool(result.deleted_count)
+
+    async def claim(self) -> Optional[dict]:
+        """Lease the earliest due timer, or one whose lease has expired; None if none is due."""
+        now = datetime.utcnow()
+        return await get_database().timers.find_one_and_update(
+            {"$or": [
+                {"status": "scheduled", "due_at": {"$lte": now}},
+                {"status": "running", "lease_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "lease_owner": self.owner,
+                    "lease_token": ObjectId(),
+                    "lease_until": now + timedelta(seconds=TIMER_LEASE_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("due_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def fire(self, timer: dict) -> None:
+        """Run a claimed timer's handler and record the outcome.
+
+        Outcomes are written only while this claim's lease is current, so a
+        timer rescheduled by its handler (or by anyone meanwhile) keeps its
+        new due time.
+        """
+        db = get_database()
+        lease = {"_id": timer["_id"], "lease_token": timer["lease_token"]}
+        handler = _handlers.get(timer["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for timer kind {timer['kind']!r}")
+            await handler(timer.get("payload") or {})
+        except asyncio.CancelledError:
+            # Shutting down; release the lease without counting the attempt
+            await asyncio.shield(db.timers.update_one(lease, {
+                "$set": {"status": "scheduled"},
+                "$unset": {"lease_owner": "", "lease_token": "", "lease_until": ""},
+                "$inc": {"attempts": -1},
+            }))
+            raise
+        except Exception as e:
+            update: Dict[str, Any] = {"error": str(e)}
+            if timer["attempts"] < TIMER_MAX_ATTEMPTS:
+                delay = TIMER_RETRY_SECONDS * 2 ** (timer["attempts"] - 1)
+                update.update(status="scheduled", due_at=datetime.utcnow() + timedelta(seconds=delay))
+            else:
+                update.update(status="failed", fired_at=datetime.utcnow())
+            await db.timers.update_one(lease, {"$set": update})
+            logger.warning(f"Timer {timer['_id']} attempt {timer['attempts']} failed: {e}")
+            return
+
+        await db.timers.update_one(lease, {
+            "$set": {"status": "fired", "fired_at": datetime.utcnow()},
+            "$unset": {"lease_until": ""},
+        })
+
+    async def process_due(self) -> int:
+        """Claim and start due timers up to the concurrency limit; returns how many started."""
+        started = 0
+        while len(self._running) < MAX_CONCURRENT_TIMERS:
+            timer = await self.claim()
+            if not timer:
+                break
+            task = asyncio.create_task(self.fire(timer))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            started += 1
+        return started
+
+    async def _sleep_seconds(self) -> float:
+        """Seconds until the next scheduled timer, capped at ``TIMER_POLL_SECONDS``."""
+        if len(self._running) >= MAX_CONCURRENT_TIMERS:
+            return 1
+        upcoming = await get_database().timers.find_one(
+            {"status": "scheduled"}, {"due_at": 1}, sort=[("due_at", 1)]
+        )
+        now = datetime.utcnow()
+        self._next_wake = now + timedelta(seconds=TIMER_POLL_SECONDS)
+        if upcoming and upcoming["due_at"] < self._next_wake:
+            self._next_wake = upcoming["due_at"]
+        return max((self._next_wake - now).total_seconds(), 0)
+
+    async def _run(self) -> None:
+        while True:
+            # Cleared before claiming, so a timer scheduled meanwhile wakes us again
+            self._wakeup.clear()
+            delay: float = TIMER_POLL_SECONDS
+            try:
+                await self.process_due()
+                delay = await self._sleep_seconds()
+            except Exception as e:
+                logger.error(f"Timer scheduler tick failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._loop_task is None:
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop firing timers; handlers still running release their leases."""
+        tasks = [t for t in [self._loop_task, *self._running] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+        self._wakeup = None
+        self._next_wake = None
+
+    async def stats(self) -> dict:
+        """Timer counts by kind and status, and how late the most overdue timer is."""
+        db = get_database()
+        counts: Dict[str, Dict[str, int]] = {}
+        async for row in db.timers.aggregate([
+            {"$group": {"_id": {"kind": "$kind", "status": "$status"}, "count": {"$sum": 1}}},
+        ]):
+            counts.setdefault(row["_id"]["kind"], {})[row["_id"]["status"]] = row["count"]
+        overdue = await db.timers.find_one(
+            {"status": "scheduled", "due_at": {"$lte": datetime.utcnow()}}, {"due_at": 1}, sort=[("due_at", 1)]
+        )
+        return {
+            "timers": counts,
+            "max_lateness_seconds": round((datetime.utcnow() - overdue["due_at"]).total_seconds(), 1) if overdue else 0,
+            "firing": len(self._running),
+        }
+
+
+timer_scheduler = TimerScheduler()
@@ -8,10 +8,15 @@ from bson import ObjectId
 from app.database import get_database
 from app.models.base import utc_now
 from app.models.geofence import (
-    Geofence, GeofenceEvent, GeofenceTrigger, TrackingLink, PODCapture
+    GeofenceEvent, TrackingLink, PODCapture
 )
 from app.models.tracking import TrackingEvent, TrackingEventType
 from app.models.shipment import ShipmentStatus
+from app.services.geofence_index import GeofenceIndex
+from app.services.live_position_service import LivePositionService
+from app.services.shipment_changes import shipment_changes
+from app.services.exception_detection import ExceptionDetectionService
+from app.services.portal_read_model import PortalReadModelService
 
 
 class TrackingService:
@@ -70,10 +75,16 @@ class TrackingService:
         longitude: float,
         city: Optional[str] = None,
         state: Optional[str] = None,
-        source: str = "gps"
+        source: str = "gps",
+        driver_id: Optional[str] = None,
+        heading: Optional[float] = None,
+        speed_mph: Optional[float] = None,
+        eta: Optional[datetime] = None,
     ) -> dict:
         """
         Update shipment location and check geofences.
+        ``eta``, when given, is stored with the location so the portal read
+        model picks it up in the same refresh.
         Returns dict with location update and any triggered alerts.
         """
         db = get_database()
@@ -106,11 +117,30 @@ class TrackingService:
         }
         if location_str:
             update_data["last_known_location"] = location_str
+        if eta is not None:
+            update_data["eta"] = eta
 
         await db.shipments.update_one(
             {"_id": shipment_oid},
             {"$set": update_data}
         )
+        await ExceptionDetectionService.apply_shipment(shipment_oid)
+        await PortalReadModelService.apply_shipment(shipment_oid)
+
+        # Keep the live map's latest-position row current
+        await LivePositionService.record_position(
+            shipment_oid,
+            latitude,
+            longitude,
+            city=city,
+            state=state,
+            source=source,
+            driver_id=driver_id,
+            carrier_id=shipment.get("carrier_id"),
+            heading=heading,
+            speed_mph=speed_mph,
+            reported_at=event.reported_at,
+        )
 
         # Check geofences
         triggered_geofences = await TrackingService.check_geofences(
@@ -145,74 +175,43 @@ class TrackingService:
         latitude: float,
         longitude: float
     ) -> List[dict]:
-        """Check if location triggers any geofences for this shipment."""
+        """Check if location triggers any geofences for this shipment.
+
+        Only nearby fences from the spatial index are tested, and events are
+        written only for real enter/exit transitions.
+        """
         db = get_database()
         shipment_oid = ObjectId(shipment_id)
 
-        # Get active geofences for this shipment
-        geofences = await db.geofences.find({
-            "$or": [
-                {"shipment_id": shipment_oid},
-                {"shipment_id": None}  # Global geofences
-            ],
-            "is_active": True
-        }).to_list(100)
-
-        triggered = []
-
-        for gf_doc in geofences:
-            gf = Geofence(**gf_doc)
-
-            # Calculate distance from geofence center
-            distance_meters = TrackingService.calculate_distance(
-                latitude, longitude, gf.latitude, gf.longitude
-            ) * 1609.34  # Convert miles to meters
-
-            is_inside = distance_meters <= gf.radius_meters
+        transitions = await GeofenceIndex.transitions(shipment_oid, latitude, longitude)
+        if not transitions:
+            return []
 
-            # Check if we have a previous event to determine enter/exit
-            last_event = await db.geofence_events.find_one(
-                {
-                    "geofence_id": gf.id,
-                    "shipment_id": shipment_oid
-                },
-                sort=[("event_timestamp", -1)]
+        now = utc_now()
+        events = [
+            GeofenceEvent(
+                geofence_id=gf.id,
+                shipment_id=shipment_oid,
+                event_type=trigger_event,
+                event_timestamp=now,
+                latitude=latitude,
+                longitude=longitude,
             )
+            for gf, trigger_event in transitions
+        ]
+        await db.geofence_events.insert_many([e.model_dump_mongo() for e in events])
 
-            was_inside = last_event and last_event.get("event_type") == "enter"
-
-            # Determine if trigger should fire
-            trigger_event = None
-            if is_inside and not was_inside:
-                if gf.trigger in [GeofenceTrigger.ENTER, GeofenceTrigger.BOTH]:
-                    trigger_event = GeofenceTrigger.ENTER
-            elif not is_inside and was_inside:
-                if gf.trigger in [GeofenceTrigger.EXIT, GeofenceTrigger.BOTH]:
-                    trigger_event = GeofenceTrigger.EXIT
-
-            if trigger_event:
-                # Create geofence event
-                gf_event = GeofenceEvent(
-                    geofence_id=gf.id,
-                    shipment_id=shipment_oid,
-                    event_type=trigger_event,
-                    event_timestamp=utc_now(),
-                    latitude=latitude,
-                    longitude=longitude,
-                )
-                await db.geofence_events.insert_one(gf_event.model_dump_mongo())
-
-                triggered.append({
-                    "geofence_id": str(gf.id),
-                    "geofence_name": gf.name,
-                    "geofence_type": gf.geofence_type,
-                    "trigger_type": trigger_event,
-                    "event_id": str(gf_event.id),
-                })
-
-                # TODO: Send alerts (email, push, webhook)
-
-        return triggered
+        # TODO: Send alerts (email, push, webhook)
+        return [
+            {
+                "geofence_id": str(gf.id),
+                "geofence_name": gf.name,
+                "geofence_type": gf.geofence_type,
+                "trigger_type": trigger_event,
+                "event_id": str(gf_event.id),
+            }
+            for (gf, trigger_event), gf_event in zip(transitions, events)
+        ]
 
     @staticmethod
     async def create_tracking_link(
@@ -430,6 +429,11 @@ class TrackingService:
                     }
                 }
             )
+            await shipment_changes.shipment_changed(shipment_oid)
+        else:
+            # The POD may close a missing-documents exception
+            await ExceptionDetectionService.apply_shipment(shipment_oid)
+            await PortalReadModelService.apply_shipment(shipment_oid)
 
         # Auto-generate invoice from POD (Feature: e07899c0)
         try:
@@ -1,12 +1,23 @@
-"""Automated tender waterfall service for sequential carrier tendering."""
+"""Automated tender waterfall service for sequential carrier tendering.
+
+Each tender sent by an auto-escalating waterfall schedules a
+``tender_expiry`` timer (see :mod:`app.services.timer_service`) at its
+``expires_at``, so the waterfall moves to the next carrier within seconds
+of the deadline. :meth:`WaterfallService.check_expired_tenders` remains as a
+manual sweep over expired tenders.
+"""
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import List, Optional, Union
 from bson import ObjectId
 
 from app.database import get_database
 from app.models.base import utc_now
 from app.models.tender import TenderStatus
 from app.models.work_item import WorkItemType, WorkItemStatus
+from app.services.shipment_changes import shipment_changes
+from app.services.timer_service import register_timer_handler, timer_scheduler
+
+TENDER_EXPIRY_TIMER = "tender_expiry"
 
 
 class WaterfallConfig:
@@ -228,7 +239,12 @@ class WaterfallService:
         }
 
         tender_result = await db.tenders.insert_one(tender)
+        await shipment_changes.tender_changed(tender_result.inserted_id)
         tender_id = tender_result.inserted_id
+        if waterfall.get("auto_escalate"):
+            await timer_scheduler.schedule(
+                TENDER_EXPIRY_TIMER, str(tender_id), tender["expires_at"], {"tender_id": str(tender_id)}
+            )
 
         # Update waterfall
         history_entry = {
@@ -285,6 +301,7 @@ class WaterfallService:
             raise ValueError("Tender not found")
 
         waterfall_id = tender.get("waterfall_id")
+        await timer_scheduler.cancel(TENDER_EXPIRY_TIMER, str(tender["_id"]))
 
         if accepted:
             # Update tender
@@ -298,6 +315,7 @@ class WaterfallService:
                     }
                 }
             )
+            await shipment_changes.tender_changed(tender_id)
 
             # Update shipment
             await db.shipments.update_one(
@@ -310,6 +328,7 @@ class WaterfallService:
                     }
                 }
             )
+            await shipment_changes.shipment_changed(tender["shipment_id"])
 
             # Complete waterfall if exists
             if waterfall_id:
@@ -333,14 +352,17 @@ class WaterfallService:
                 )
 
             # Cancel other pending tenders
+            sibling_filter = {
+                "shipment_id": tender["shipment_id"],
+                "_id": {"$ne": ObjectId(tender_id)},
+                "status": TenderStatus.SENT.value
+            }
+            cancelled_ids = await db.tenders.distinct("_id", sibling_filter)
             await db.tenders.update_many(
-                {
-                    "shipment_id": tender["shipment_id"],
-                    "_id": {"$ne": ObjectId(tender_id)},
-                    "status": TenderStatus.SENT.value
-                },
+                sibling_filter,
                 {"$set": {"status": TenderStatus.CANCELLED.value, "updated_at": utc_now()}}
             )
+            await shipment_changes.tenders_changed(cancelled_ids)
 
             return {"status": "accepted", "waterfall_completed": True}
 
@@ -358,6 +380,7 @@ class WaterfallService:
                 {"_id": ObjectId(tender_id)},
                 {"$set": update}
             )
+            await shipment_changes.tender_changed(tender_id)
 
             # Update history entry
             if waterfall_id:
@@ -393,61 +416,84 @@ class WaterfallService:
             return {"status": "declined", "escalated": False}
 
     @staticmethod
-    async def check_expired_tenders():
-        """
-        Check for expired tenders and auto-escalate.
-        Should be called periodically (e.g., every minute).
+    async def expire_tender(tender_id: Union[str, ObjectId]) -> Optional[dict]:
+        """Expire a waterfall's current tender past its deadline and escalate.
+
+        Run by the tender's expiry timer. Nothing happens unless the tender
+        is still sent and is the current tender of an active auto-escalating
+        waterfall; the status change is conditional on the tender still being
+        sent, so a tender answered meanwhile is left alone. Returns the
+        escalation, if any.
         """
         db = get_database()
+        tender_oid = ObjectId(tender_id) if isinstance(tender_id, str) else tender_id
+        now = utc_now()
 
-        # Find active waterfalls with expired current tenders
-        waterfalls = await db.tender_waterfalls.find({
+        tender = await db.tenders.find_one({"_id": tender_oid}, {"waterfall_id": 1})
+        if not tender or not tender.get("waterfall_id"):
+            return None
+        waterfall = await db.tender_waterfalls.find_one({
+            "_id": tender["waterfall_id"],
             "status": "active",
-            "current_tender_id": {"$ne": None},
-            "auto_escalate": True
-        }).to_list(100)
+            "auto_escalate": True,
+            "current_tender_id": tender_oid,
+        })
+        if not waterfall:
+            return None
 
-        escalated = []
+        result = await db.tenders.update_one(
+            {"_id": tender_oid, "status": TenderStatus.SENT.value, "expires_at": {"$lte": now}},
+            {"$set": {"status": TenderStatus.EXPIRED.value, "updated_at": now}},
+        )
+        if not result.modified_count:
+            return None
+        await shipment_changes.tender_changed(tender_oid)
 
-        for waterfall in waterfalls:
-            tender = await db.tenders.find_one({"_id": waterfall["current_tender_id"]})
-            if not tender:
-                continue
-
-            # Check if expired
-            expires_at = tender.get("expires_at")
-            if expires_at and expires_at < utc_now() and tender["status"] == TenderStatus.SENT.value:
-                # Mark as expired
-                await db.tenders.update_one(
-                    {"_id": tender["_id"]},
-                    {
-                        "$set": {
-                            "status": TenderStatus.EXPIRED.value,
-                            "updated_at": utc_now()
-                        }
-                    }
-                )
+        # Update history
+        await db.tender_waterfalls.update_one(
+            {"_id": waterfall["_id"], "history.tender_id": tender_oid},
+            {"$set": {"history.$.status": "expired", "history.$.expired_at": now}}
+        )
 
-                # Update history
-                await db.tender_waterfalls.update_one(
-                    {"_id": waterfall["_id"], "history.tender_id": tender["_id"]},
-                    {"$set": {"history.$.status": "expired", "history.$.expired_at": utc_now()}}
-                )
+        # Move to next step
+        next_step = waterfall["current_step"] + 1
+        await db.tender_waterfalls.update_one(
+            {"_id": waterfall["_id"]},
+            {"$set": {"current_step": next_step, "updated_at": now}}
+        )
 
-                # Move to next step
-                next_step = waterfall["current_step"] + 1
-                await db.tender_waterfalls.update_one(
-                    {"_id": waterfall["_id"]},
-                    {"$set": {"current_step": next_step, "updated_at": utc_now()}}
-                )
+        # Send next tender
+        next_tender_id = await WaterfallService._send_next_tender(str(waterfall["_id"]))
+        return {
+            "waterfall_id": str(waterfall["_id"]),
+            "next_tender_id": next_tender_id,
+            "reason": "timeout"
+        }
 
-                # Send next tender
-                next_tender_id = await WaterfallService._send_next_tender(str(waterfall["_id"]))
-                escalated.append({
-                    "waterfall_id": str(waterfall["_id"]),
-                    "next_tender_id": next_tender_id,
-                    "reason": "timeout"
-                })
+    @staticmethod
+    async def check_expired_tenders():
+        """
+        Expire and escalate every waterfall tender past its deadline.
+
+        Expiry timers normally do this at each deadline; this sweep catches
+        tenders sent before timers existed.
+        """
+        db = get_database()
+
+        expired = await db.tenders.find(
+            {
+                "status": TenderStatus.SENT.value,
+                "expires_at": {"$lte": utc_now()},
+                "waterfall_id": {"$ne": None},
+            },
+            {"_id": 1},
+        ).sort("expires_at", 1).to_list(None)
+
+        escalated = []
+        for tender in expired:
+            escalation = await WaterfallService.expire_tender(tender["_id"])
+            if escalation:
+                escalated.append(escalation)
 
         return {"escalated_count": len(escalated), "escalations": escalated}
 
@@ -465,10 +511,12 @@ class WaterfallService:
 
         # Cancel current tender
         if waterfall.get("current_tender_id"):
+            await timer_scheduler.cancel(TENDER_EXPIRY_TIMER, str(waterfall["current_tender_id"]))
             await db.tenders.update_one(
                 {"_id": waterfall["current_tender_id"]},
                 {"$set": {"status": TenderStatus.CANCELLED.value, "updated_at": utc_now()}}
             )
+            await shipment_changes.tender_changed(waterfall["current_tender_id"])
 
         # Update waterfall
         await db.tender_waterfalls.update_one(
@@ -520,3 +568,6 @@ class WaterfallService:
             "completed_at": waterfall.get("completed_at"),
             "winning_carrier_id": str(waterfall["winning_carrier_id"]) if waterfall.get("winning_carrier_id") else None,
         }
+
+
+register_timer_handler(TENDER_EXPIRY_TIMER, lambda payload: WaterfallService.expire_tender(payload["tender_id"]))
@@ -1,57 +1,187 @@
-"""WebSocket connection manager for real-time updates."""
+"""WebSocket connection manager for real-time updates.
 
+Events are published to topics and fanned out to the connections subscribed
+to them:
+
+- ``global``: every event (the default subscription, so existing clients
+  keep receiving everything)
+- ``shipment:<id>``, ``customer:<id>``, ``desk:<id>``: derived from the event
+  payload (``shipment_id``/``customer_id``/``desk_id``, or ``id`` for
+  ``shipment_*`` events)
+
+``broadcast`` serializes each event once and only enqueues it; every
+connection has its own bounded send queue drained by a writer task, so a
+slow client never delays delivery to the others. When a queue is full the
+oldest message is dropped, and "latest state" events (see
+``COALESCED_EVENTS``) replace an undelivered message for the same entity
+instead of queueing behind it.
+"""
+
+import asyncio
 import logging
 import json
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any
+from itertools import count
+from typing import Any, Iterable, Optional
 from fastapi import WebSocket
 
 logger = logging.getLogger(__name__)
 
+GLOBAL_TOPIC = "global"
+
+# Events where only the newest undelivered message per entity matters
+COALESCED_EVENTS = {
+    "shipment_updated",
+    "shipment_status_changed",
+    "tracking_update",
+    "dashboard_refresh",
+}
+
+# Payload keys that map to entity topics
+_TOPIC_KEYS = {
+    "shipment_id": "shipment",
+    "customer_id": "customer",
+    "desk_id": "desk",
+}
+
+MAX_QUEUE_SIZE = 256
+SEND_TIMEOUT_SECONDS = 10.0
+
+_message_ids = count()
+
+
+def event_topics(event_type: str, data: dict[str, Any]) -> set[str]:
+    """Topics an event is published to, besides ``global``."""
+    topics = set()
+    for key, prefix in _TOPIC_KEYS.items():
+        if data.get(key):
+            topics.add(f"{prefix}:{data[key]}")
+    if event_type.startswith("shipment_") and data.get("id"):
+        topics.add(f"shipment:{data['id']}")
+    return topics
+
+
+def _coalesce_key(event_type: str, data: dict[str, Any]) -> Any:
+    if event_type in COALESCED_EVENTS:
+        return (event_type, data.get("shipment_id") or data.get("id"))
+    return next(_message_ids)
+
+
+class _Connection:
+    """A connected client: its subscriptions and bounded send queue."""
+
+    def __init__(self, websocket: WebSocket, topics: set[str], max_queue: int):
+        self.websocket = websocket
+        self.topics = topics
+        self.max_queue = max_queue
+        self.pending: OrderedDict[Any, str] = OrderedDict()
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.writer: Optional[asyncio.Task] = None
+
+    def enqueue(self, key: Any, message: str) -> None:
+        if key in self.pending:
+            # Coalesce: newest state replaces the undelivered one, keeping
+            # the original queue position.
+            self.pending[key] = message
+            return
+        if len(self.pending) >= self.max_queue:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+        self.pending[key] = message
+        self.ready.set()
+
 
 class ConnectionManager:
     """Manages active WebSocket connections and broadcasts events."""
 
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    def __init__(self, max_queue: int = MAX_QUEUE_SIZE, send_timeout: float = SEND_TIMEOUT_SECONDS):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.connections: dict[WebSocket, _Connection] = {}
+        self.subscribers: dict[str, set[_Connection]] = {}
+
+    @property
+    def active_connections(self) -> list[WebSocket]:
+        return list(self.connections)
+
+    async def connect(self, websocket: WebSocket, topics: Optional[Iterable[str]] = None):
+        """Accept and track a new WebSocket connection.
 
-    async def connect(self, websocket: WebSocket):
-        """Accept and track a new WebSocket connection."""
+        ``topics`` defaults to ``global`` (every event).
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
+        conn = _Connection(websocket, set(), self.max_queue)
+        self.connections[websocket] = conn
+        self.subscribe(websocket, topics or [GLOBAL_TOPIC])
+        conn.writer = asyncio.create_task(self._writer(conn))
         logger.info(
             "WebSocket connected. Total connections: %d",
-            len(self.active_connections),
+            len(self.connections),
         )
 
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection from tracking."""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        conn = self.connections.pop(websocket, None)
+        if conn:
+            self.unsubscribe(websocket, list(conn.topics), _conn=conn)
+            if conn.writer and conn.writer is not asyncio.current_task():
+                conn.writer.cancel()
         logger.info(
             "WebSocket disconnected. Total connections: %d",
-            len(self.active_connections),
+            len(self.connections),
         )
 
-    async def broadcast(self, event_type: str, data: dict[str, Any] | None = None):
-        """Broadcast an event to all connected clients."""
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> set[str]:
+        """Add topics to a connection; returns its current subscriptions."""
+        conn = self.connections.get(websocket)
+        if not conn:
+            return set()
+        for topic in topics:
+            conn.topics.add(topic)
+            self.subscribers.setdefault(topic, set()).add(conn)
+        return set(conn.topics)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str], _conn: Optional[_Connection] = None) -> set[str]:
+        """Remove topics from a connection; returns its current subscriptions."""
+        conn = _conn or self.connections.get(websocket)
+        if not conn:
+            return set()
+        for topic in topics:
+            conn.topics.discard(topic)
+            subs = self.subscribers.get(topic)
+            if subs:
+                subs.discard(conn)
+                if not subs:
+                    del self.subscribers[topic]
+        return set(conn.topics)
+
+    async def broadcast(
+        self,
+        event_type: str,
+        data: dict[str, Any] | None = None,
+        topics: Iterable[str] | None = None,
+    ):
+        """Publish an event to ``global`` and its entity topics.
+
+        Returns immediately after queueing; delivery happens in each
+        connection's writer task.
+        """
+        data = data or {}
         message = json.dumps({
             "event": event_type,
-            "data": data or {},
+            "data": data,
             "timestamp": datetime.utcnow().isoformat(),
         }, default=str)
 
-        disconnected: list[WebSocket] = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception:
-                logger.warning("Failed to send to WebSocket, marking for removal")
-                disconnected.append(connection)
+        targets: set[_Connection] = set()
+        for topic in {GLOBAL_TOPIC, *event_topics(event_type, data), *(topics or ())}:
+            targets |= self.subscribers.get(topic, set())
 
-        # Clean up broken connections
-        for conn in disconnected:
-            self.disconnect(conn)
+        key = _coalesce_key(event_type, data)
+        for conn in targets:
+            conn.enqueue(key, message)
 
     async def send_to_connection(self, websocket: WebSocket, event_type: str, data: dict[str, Any] | None = None):
         """Send an event to a specific connection."""
@@ -60,17 +190,52 @@ class ConnectionManager:
             "data": data or {},
             "timestamp": datetime.utcnow().isoformat(),
         }, default=str)
+        self.send_text(websocket, message)
+
+    def send_text(self, websocket: WebSocket, message: str):
+        """Queue a raw message for one connection.
+
+        All sends go through the connection's writer task, which is the only
+        coroutine allowed to write to the socket.
+        """
+        conn = self.connections.get(websocket)
+        if conn:
+            conn.enqueue(next(_message_ids), message)
 
+    async def _writer(self, conn: _Connection):
+        """Drain one connection's queue; drop and close the connection on send failure."""
         try:
-            await websocket.send_text(message)
+            while True:
+                await conn.ready.wait()
+                while conn.pending:
+                    _, message = conn.pending.popitem(last=False)
+                    await asyncio.wait_for(conn.websocket.send_text(message), self.send_timeout)
+                conn.ready.clear()
+        except asyncio.CancelledError:
+            raise
         except Exception:
-            logger.warning("Failed to send to specific WebSocket")
-            self.disconnect(websocket)
+            logger.warning("Failed to send to WebSocket, removing connection")
+            self.disconnect(conn.websocket)
+            # Close the socket too, so the client reconnects instead of
+            # waiting on a connection nobody writes to
+            try:
+                await asyncio.wait_for(conn.websocket.close(), self.send_timeout)
+            except Exception:
+                pass
 
     @property
     def connection_count(self) -> int:
         """Return the number of active connections."""
-        return len(self.active_connections)
+        return len(self.connections)
+
+    def stats(self) -> dict[str, Any]:
+        """Connection, topic and backpressure counters."""
+        return {
+            "connections": len(self.connections),
+            "topics": len(self.subscribers),
+            "queued": sum(len(c.pending) for c in self.connections.values()),
+            "dropped": sum(c.dropped for c in self.connections.values()),
+        }
 
 
 # Singleton instance used across the application
@@ -4,9 +4,13 @@ from datetime import datetime, timezone, timedelta
 from app.database import get_database
 from app.models.customer import Customer, CustomerStatus, CustomerContact
 from app.models.carrier import Carrier, CarrierStatus, EquipmentType, CarrierContact
+from app.services.performance import INDEXES
 
 logger = logging.getLogger(__name__)
 
+# Text indexes behind unified search, defined in app.services.performance
+SEARCH_TEXT_INDEXES = {"shipments": "shipments_text", "customers": "customers_text", "carriers": "carriers_text"}
+
 
 async def ensure_indexes():
     """Create database indexes."""
@@ -45,25 +49,81 @@ async def ensure_indexes():
     await db.shipments.create_index("carrier_id", sparse=True)
     await db.shipments.create_index("pickup_date")
     await db.shipments.create_index("delivery_date")
+    # Open book of unassigned loads for consolidation
+    await db.shipments.create_index([("status", 1), ("carrier_id", 1), ("pickup_date", 1)])
+    # Lane queries on the materialized lane fields (see shipment_lanes)
+    await db.shipments.create_index([("lane_key", 1), ("equipment_type", 1), ("status", 1), ("created_at", 1)])
+    await db.shipments.create_index([("lane_key", 1), ("status", 1), ("carrier_id", 1)])
+    await db.shipments.create_index([("lane_key", 1), ("created_at", 1)])
+
+    # Unified search
+    for collection, name in SEARCH_TEXT_INDEXES.items():
+        await db[collection].create_indexes([m for m in INDEXES[collection] if m.document["name"] == name])
 
     # Tenders
     await db.tenders.create_index("shipment_id")
     await db.tenders.create_index("carrier_id")
     await db.tenders.create_index("status")
+    # Expired waterfall tenders (backstop sweep)
+    await db.tenders.create_index([("status", 1), ("expires_at", 1)])
 
     # Tracking Events
     await db.tracking_events.create_index("shipment_id")
     await db.tracking_events.create_index("event_timestamp")
+    # Shipment timelines (newest first) and the live-position rebuild window
+    await db.tracking_events.create_index([("shipment_id", 1), ("event_timestamp", -1)])
+    await db.tracking_events.create_index([("reported_at", -1)])
+    # Latest auto-GPS event per shipment for batch auto-tracking
+    await db.tracking_events.create_index([("shipment_id", 1), ("source", 1), ("event_timestamp", -1)])
+
+    # Geofences: backfill GeoJSON locations for the 2dsphere index
+    await db.geofences.update_many(
+        {
+            "location": {"$exists": False},
+            "latitude": {"$gte": -90, "$lte": 90},
+            "longitude": {"$gte": -180, "$lte": 180},
+        },
+        [{"$set": {"location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}],
+    )
+    await db.geofences.create_index([("location", "2dsphere")])
+    await db.geofences.create_index("is_active")
+    await db.geofence_events.create_index([("shipment_id", 1), ("event_timestamp", -1)])
+    await db.geofence_states.create_index("shipment_id")
 
     # Documents
     await db.documents.create_index("shipment_id", sparse=True)
     await db.documents.create_index("carrier_id", sparse=True)
     await db.documents.create_index("customer_id", sparse=True)
+    await db.documents.create_index("content_hash", sparse=True)
+    await db.shipment_photos.create_index("content_hash", sparse=True)
+    await db.document_jobs.create_index([("status", 1), ("available_at", 1)])
+    # At most one queued job per document; enqueue upserts rely on it
+    await db.document_jobs.create_index(
+        "document_id", unique=True, partialFilterExpression={"status": "queued"},
+        name="document_id_queued_unique",
+    )
+    await db.document_jobs.create_index([("status", 1), ("completed_at", 1)])
+    # Finished jobs are kept for a week of queue stats and troubleshooting
+    await db.document_jobs.create_index("completed_at", expireAfterSeconds=7 * 24 * 3600)
 
     # Invoices
     await db.invoices.create_index("invoice_number", unique=True)
     await db.invoices.create_index("customer_id")
     await db.invoices.create_index("status")
+    # Anti-join lookups for batch invoicing and "already invoiced" checks
+    await db.invoices.create_index("shipment_ids")
+    await db.invoice_batch_jobs.create_index([("status", 1), ("heartbeat_at", 1)])
+    await db.import_jobs.create_index([("status", 1), ("heartbeat_at", 1)])
+
+    # Aging reports: open items by status, and month-end snapshots
+    await db.carrier_bills.create_index("status")
+    await db.aging_snapshots.create_index([("report_type", 1), ("as_of_date", -1)], unique=True)
+    await db.aging_snapshot_entities.create_index([("snapshot_id", 1), ("position", 1)])
+
+    # Exception engine index
+    await db.exceptions_open.create_index("source")
+    await db.exceptions_open.create_index([("detected_at", -1)])
+    await db.exception_watch.create_index("next_check_at")
 
     # Work Items
     await db.work_items.create_index("status")
@@ -71,9 +131,46 @@ async def ensure_indexes():
     await db.work_items.create_index("assigned_to", sparse=True)
     await db.work_items.create_index([("priority", -1), ("created_at", 1)])
 
+    # Latest positions (live driver map)
+    await db.latest_positions.create_index([("last_updated", -1)])
+    # Recent check-ins of drivers without a shipment are merged into the map
+    await db.driver_checkins.create_index([("shipment_id", 1), ("created_at", -1)])
+
+    # Analytics rollups
+    await db.analytics_rollups.create_index([("dimension", 1), ("day", 1), ("key", 1)])
+    await db.analytics_rollup_contributions.create_index("day")
+
+    # Scheduled reports: due schedules and run history
+    await db.scheduled_reports.create_index([("is_active", 1), ("next_run_at", 1)])
+    await db.report_history.create_index([("generated_at", -1)])
+    await db.report_history.create_index([("status", 1), ("heartbeat_at", 1)])
+
+    # Carrier lane statistics
+    await db.lane_stats.create_index([("origin_state", 1), ("destination_state", 1)])
+
+    # Durable timers: due and lease-expired timers in due order; fired ones kept a week
+    await db.timers.create_index([("status", 1), ("due_at", 1)])
+    await db.timers.create_index([("status", 1), ("lease_until", 1)])
+    await db.timers.create_index("fired_at", expireAfterSeconds=7 * 24 * 3600)
+
+    # Reference-number index for email and document matching
+    await db.reference_index.create_index("key")
+    await db.reference_index.create_index([("entity_type", 1), ("entity_id", 1)])
+
+    # Portal read model: carrier and customer portal pages
+    await db.portal_shipments.create_index([("customer_id", 1), ("created_at", -1)])
+    await db.portal_shipments.create_index([("customer_id", 1), ("status", 1), ("created_at", -1)])
+    await db.portal_shipments.create_index([("customer_id", 1), ("status", 1), ("actual_delivery_date", -1)])
+    await db.portal_shipments.create_index([("carrier_id", 1), ("pickup_date", 1)])
+    await db.portal_shipments.create_index([("carrier_id", 1), ("status", 1), ("pickup_date", 1)])
+    await db.portal_shipments.create_index("open_tenders.carrier_id")
+
     # Sequences
     await db.sequences.create_index([("type", 1), ("year", 1)], unique=True)
 
+    # Query profiler: top shapes by total time for the audit
+    await db.query_shapes.create_index([("total_ms", -1)])
+
     logger.info("Database indexes created")
 
 
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Audit the query shapes recorded by the API's query profiler.
+
+Runs ``explain`` on the top shapes in ``query_shapes`` by total time and
+prints each shape's timings, the planner's stages and any flags (COLLSCAN,
+in-memory SORT, unanchored or case-insensitive regex), followed by a
+``create_index`` call for every shape with a recommended index.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/audit_queries.py [--top 25] [--all]
+
+Environment variables (set via .env or export):
+    MONGODB_URL, DATABASE_NAME: same settings the API uses
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import connect_to_mongo, close_mongo_connection  # noqa: E402
+from app.services.query_profiler import QueryAuditor  # noqa: E402
+
+
+async def main(top: int, show_all: bool) -> None:
+    await connect_to_mongo()
+    try:
+        findings = await QueryAuditor.audit(top)
+        shown = [f for f in findings if show_all or f.get("flags") or f.get("error")]
+        print(f"Explained {len(findings)} shapes, {len(shown)} {'shown' if show_all else 'flagged'}\n")
+
+        for f in shown:
+            print(f"{f['collection']}.{f['command']}  count={f['count']}  total={f['total_ms']} ms  "
+                  f"avg={f['avg_ms']} ms  max={f['max_ms']} ms")
+            print(f"  shape:  {json.dumps(f['shape'], sort_keys=True)}")
+            if f.get("error"):
+                print(f"  error:  {f['error']}")
+            else:
+                print(f"  plan:   {', '.join(f['stages'])}  indexes: {', '.join(f['indexes']) or '-'}")
+                print(f"  flags:  {', '.join(f['flags']) or '-'}")
+            print()
+
+        recommended = {
+            (f["collection"], tuple(map(tuple, f["recommended_index"])))
+            for f in findings if f.get("recommended_index")
+        }
+        if recommended:
+            print("Recommended indexes:")
+            for collection, keys in sorted(recommended):
+                print(f"  db.{collection}.create_index({list(keys)})")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25, help="number of shapes to explain, by total time")
+    parser.add_argument("--all", action="store_true", help="print every explained shape, not only flagged ones")
+    args = parser.parse_args()
+    asyncio.run(main(args.top, args.all))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Backfill the denormalized lane fields (origin/destination city, state, zip3
+and lane_key) on shipments.
+
+New and updated shipments get them on write; run this once after deploying
+them. Pass --all to recompute every shipment, e.g. after raw edits to stops.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/backfill_shipment_lanes.py [--all]
+
+Environment variables (set via .env or export):
+    MONGODB_URL, DATABASE_NAME: same settings the API uses
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import connect_to_mongo, close_mongo_connection  # noqa: E402
+from app.services.shipment_lanes import ShipmentLaneService  # noqa: E402
+
+
+async def main(recompute_all: bool) -> None:
+    await connect_to_mongo()
+    try:
+        updated = await ShipmentLaneService.backfill(only_missing=not recompute_all)
+        print(f"Backfilled lane fields on {updated} shipments")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--all", action="store_true", help="recompute every shipment, not only missing ones")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    asyncio.run(main(args.all))
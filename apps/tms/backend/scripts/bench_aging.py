@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark AR and AP aging reports over large open balances.
+
+Seeds open invoices spread over customers and due dates (and a tenth as many
+carrier bills) and times:
+
+- legacy AR: the previous path (fetch up to 5,000 invoices, build an
+  ``Invoice`` model for each and bucket them in Python); its totals only
+  cover the first 5,000 invoices
+- AR: ``AgingService.ar_report``, bucketed and grouped in one aggregation
+- AP: ``AgingService.ap_report`` including the cash flow projection
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_aging.py [--invoices 500000] [--customers 2000] [--iterations 5]
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from bench_common import fresh_database, report, time_async
+
+from app.models.invoice import Invoice
+from app.services.aging import AgingService
+from app.utils.seed import ensure_indexes
+
+SEED_BATCH = 10_000
+
+
+async def seed(db, invoices: int, customers: int) -> None:
+    now = datetime.utcnow()
+    customer_ids = [ObjectId() for _ in range(customers)]
+    carrier_ids = [ObjectId() for _ in range(max(1, customers // 10))]
+    await db.carriers.insert_many([{"_id": c, "name": f"Carrier {i}"} for i, c in enumerate(carrier_ids)])
+
+    for start in range(0, invoices, SEED_BATCH):
+        await db.invoices.insert_many([
+            {
+                "invoice_number": f"INV-{i:08d}",
+                "customer_id": random.choice(customer_ids),
+                "billing_name": "Bench Customer",
+                "status": random.choice(["sent", "sent", "partial"]),
+                "invoice_date": now - timedelta(days=random.randint(0, 200)),
+                "due_date": now - timedelta(days=random.randint(-30, 170)),
+                "total": 250000,
+                "amount_paid": random.choice([0, 0, 100000]),
+            }
+            for i in range(start, min(start + SEED_BATCH, invoices))
+        ])
+    bills = invoices // 10
+    for start in range(0, bills, SEED_BATCH):
+        await db.carrier_bills.insert_many([
+            {
+                "bill_number": f"BILL-{i:08d}",
+                "carrier_id": random.choice(carrier_ids),
+                "status": random.choice(["received", "matched", "approved"]),
+                "amount": 180000,
+                "received_date": now - timedelta(days=random.randint(0, 90)),
+                "due_date": now + timedelta(days=random.randint(-60, 60)),
+            }
+            for i in range(start, min(start + SEED_BATCH, bills))
+        ])
+
+
+async def legacy_ar(db) -> None:
+    """The previous implementation's read and Python bucketing (capped at 5,000)."""
+    now = datetime.utcnow()
+    invoices = await db.invoices.find({"status": {"$in": ["sent", "partial"]}}).sort("due_date", 1).to_list(5000)
+    totals: dict = {}
+    for doc in invoices:
+        inv = Invoice(**doc)
+        due = inv.due_date or inv.invoice_date
+        days = (now - due).days if due else 0
+        key = "current" if days <= 0 else min(days // 30, 4)
+        totals[key] = totals.get(key, 0) + inv.amount_due
+
+
+async def main(invoices: int, customers: int, iterations: int) -> None:
+    random.seed(17)
+    db = await fresh_database()
+    await ensure_indexes()
+    await seed(db, invoices, customers)
+    print(f"Seeded {invoices} open invoices over {customers} customers, {invoices // 10} carrier bills\n")
+
+    try:
+        report("legacy AR (5k cap)", await time_async(lambda: legacy_ar(db), iterations))
+        report("AR aging", await time_async(AgingService.ar_report, iterations))
+        report("AP aging", await time_async(AgingService.ap_report, iterations))
+        ar = await AgingService.ar_report()
+        print(f"\n  AR covers {ar['total_count']} invoices, {len(ar['by_entity'])} customers")
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=500_000)
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.invoices, args.customers, args.iterations))
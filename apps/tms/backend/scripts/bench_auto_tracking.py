@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark GPS auto-tracking batches before and after the batch state machine.
+
+Seeds in-transit shipments and times:
+
+- legacy: the previous per-point loop (an auto-GPS event lookup per moving
+  point, an insert per event) for one shipment's batch
+- single: ``AutoTrackingService.process`` for the same batch
+- bulk: one telematics batch carrying points for many shipments
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_auto_tracking.py [--points 500] [--shipments 200] [--iterations 20]
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from bench_common import fresh_database, report, time_async
+
+from app.models.tracking import TrackingEvent, TrackingEventType
+from app.services.auto_tracking import AutoTrackingService
+from app.utils.seed import ensure_indexes
+
+PICKUP = {"stop_type": "pickup", "latitude": 41.88, "longitude": -87.63}
+DELIVERY = {"stop_type": "delivery", "latitude": 32.78, "longitude": -96.80}
+
+
+def batch(points: int) -> list:
+    """A truck moving between the stops, one point a minute."""
+    start = datetime.utcnow()
+    return [
+        {
+            "latitude": 41.0 - i * 0.001,
+            "longitude": -88.0 - i * 0.001,
+            "speed_mph": random.uniform(45, 65),
+            "timestamp": (start + timedelta(minutes=i * 5)).isoformat(),
+        }
+        for i in range(points)
+    ]
+
+
+async def legacy_update(db, shipment_oid: ObjectId, gps_points: list) -> None:
+    """The moving-truck path of the previous endpoint: one lookup per point."""
+    for point in gps_points:
+        timestamp = datetime.fromisoformat(point["timestamp"])
+        last_event = await db.tracking_events.find_one(
+            {"shipment_id": shipment_oid, "source": "auto_gps"}, sort=[("event_timestamp", -1)]
+        )
+        if not last_event or (timestamp - last_event["event_timestamp"]).total_seconds() > 7200:
+            event = TrackingEvent(
+                shipment_id=shipment_oid, event_type=TrackingEventType.CHECK_CALL,
+                event_timestamp=timestamp, reported_at=datetime.utcnow(),
+                latitude=point["latitude"], longitude=point["longitude"], source="auto_gps",
+            )
+            await db.tracking_events.insert_one(event.model_dump_mongo())
+
+
+async def main(points: int, shipments: int, iterations: int) -> None:
+    random.seed(15)
+    db = await fresh_database()
+    await ensure_indexes()
+    ids = [ObjectId() for _ in range(shipments)]
+    await db.shipments.insert_many([
+        {"_id": oid, "shipment_number": f"S-2026-{i:05d}", "status": "in_transit", "stops": [PICKUP, DELIVERY]}
+        for i, oid in enumerate(ids)
+    ])
+    print(f"Seeded {shipments} in-transit shipments\n")
+
+    try:
+        gps = batch(points)
+        report(f"legacy ({points} points)", await time_async(
+            lambda: legacy_update(db, random.choice(ids), gps), iterations
+        ))
+        report(f"single ({points} points)", await time_async(
+            lambda: AutoTrackingService.process({random.choice(ids): gps}), iterations
+        ))
+        per_shipment = max(points // 10, 1)
+        report(f"bulk ({shipments} x {per_shipment} points)", await time_async(
+            lambda: AutoTrackingService.process({oid: batch(per_shipment) for oid in ids}), iterations
+        ))
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--shipments", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.points, args.shipments, args.iterations))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark automation trigger processing before and after compiled rules.
+
+Seeds enabled rules on ``shipment_status_changed`` (a mix of full and shadow
+rollouts with one to three conditions each) and times one trigger with:
+
+- legacy: the previous path (a rules ``find`` per trigger, model parsing,
+  interpreted conditions and an ``update_one`` per fired rule)
+- compiled: ``process_trigger`` over the cached per-trigger index, with
+  trigger statistics buffered and flushed in bulk
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_automation_rules.py [--rules 300] [--iterations 500]
+"""
+
+import argparse
+import asyncio
+import random
+
+from bench_common import fresh_database, report, time_async
+
+from app.models.automation import AutomationAction, AutomationRule, AutomationTrigger, RolloutStage
+from app.models.base import utc_now
+from app.services.automation_engine import evaluate_conditions, flush_trigger_stats, process_trigger
+
+TRIGGER = AutomationTrigger.SHIPMENT_STATUS_CHANGED
+STATUSES = ["booked", "pending_pickup", "in_transit", "delivered"]
+EQUIPMENT = ["van", "reefer", "flatbed"]
+
+
+def random_conditions() -> list:
+    pool = [
+        {"field": "shipment.status", "operator": "equals", "value": random.choice(STATUSES)},
+        {"field": "shipment.equipment_type", "operator": "in", "value": random.sample(EQUIPMENT, 2)},
+        {"field": "shipment.customer_price", "operator": "greater_than", "value": random.randint(1000, 4000)},
+        {"field": "shipment.origin_state", "operator": "starts_with", "value": random.choice("ACNT")},
+    ]
+    return random.sample(pool, random.randint(1, 3))
+
+
+async def seed(db, rules: int) -> None:
+    await db.automation_rules.insert_many([
+        AutomationRule(
+            name=f"Rule {i}",
+            trigger=TRIGGER,
+            conditions=random_conditions(),
+            action=AutomationAction.AUTO_APPROVE,
+            rollout_stage=random.choice([RolloutStage.FULL, RolloutStage.SHADOW]),
+            priority=random.randint(0, 100),
+            enabled=True,
+        ).model_dump_mongo()
+        for i in range(rules)
+    ])
+
+
+def random_entity() -> dict:
+    return {
+        "shipment": {
+            "status": random.choice(STATUSES),
+            "equipment_type": random.choice(EQUIPMENT),
+            "customer_price": random.randint(500, 5000),
+            "origin_state": random.choice(["CA", "IL", "NY", "TX"]),
+        }
+    }
+
+
+async def legacy_trigger(db, entity: dict) -> None:
+    """The previous implementation: read, parse and interpret every rule per trigger."""
+    cursor = db.automation_rules.find({"trigger": TRIGGER, "enabled": True}).sort("priority", -1)
+    async for doc in cursor:
+        rule = AutomationRule(**doc)
+        met, _ = evaluate_conditions(rule.conditions, entity)
+        if met and rule.rollout_stage != RolloutStage.DISABLED:
+            await db.automation_rules.update_one(
+                {"_id": rule.id},
+                {"$inc": {"trigger_count": 1}, "$set": {"last_triggered_at": utc_now()}},
+            )
+
+
+async def main(rules: int, iterations: int) -> None:
+    random.seed(12)
+    db = await fresh_database()
+    await seed(db, rules)
+    print(f"Seeded {rules} enabled rules on {TRIGGER.value}\n")
+
+    try:
+        report("legacy trigger", await time_async(lambda: legacy_trigger(db, random_entity()), iterations))
+        report("compiled process_trigger", await time_async(
+            lambda: process_trigger(TRIGGER, random_entity()), iterations
+        ))
+        report("flush_trigger_stats", await time_async(flush_trigger_stats, 1, warmup=0))
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.rules, args.iterations))
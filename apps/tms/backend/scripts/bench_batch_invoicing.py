@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark month-end batch invoicing before and after the set-based engine.
+
+Seeds delivered shipments across a set of customers (plus existing invoices
+for a share of them) and times:
+
+- legacy: the previous per-shipment loop (``find_one`` for the "already
+  invoiced" check, then ``generate_invoice_from_shipment``), on a sample
+- batch: ``invoice_all`` (anti-join aggregation per chunk, one customers
+  ``$in``, one number reservation and one ``insert_many`` per chunk)
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_batch_invoicing.py [--shipments 10000] [--customers 200] [--legacy-shipments 500]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from bson import ObjectId
+
+from bench_common import fresh_database
+
+from app.services.batch_invoicing import BatchInvoicer, invoice_all
+from app.services.billing_service import generate_invoice_from_shipment
+from app.utils.seed import ensure_indexes
+
+INVOICED_SHARE = 0.2
+
+
+async def seed(db, shipments: int, customers: int) -> list:
+    customer_ids = [ObjectId() for _ in range(customers)]
+    await db.customers.insert_many([
+        {"_id": cid, "name": f"Customer {i}", "billing_email": f"ap{i}@example.com", "payment_terms": 30}
+        for i, cid in enumerate(customer_ids)
+    ])
+    docs = [
+        {
+            "_id": ObjectId(),
+            "shipment_number": f"S-2026-{i:05d}",
+            "customer_id": random.choice(customer_ids),
+            "status": "delivered",
+            "customer_price": random.randint(80000, 400000),
+            "stops": [{"city": "Chicago", "state": "IL"}, {"city": "Dallas", "state": "TX"}],
+        }
+        for i in range(shipments)
+    ]
+    await db.shipments.insert_many(docs)
+    invoiced = random.sample(docs, int(shipments * INVOICED_SHARE))
+    await db.invoices.insert_many([
+        {"invoice_number": f"OLD-{i:06d}", "customer_id": s["customer_id"], "shipment_ids": [s["_id"]], "status": "paid"}
+        for i, s in enumerate(invoiced)
+    ])
+    invoiced_ids = {s["_id"] for s in invoiced}
+    return [str(s["_id"]) for s in docs if s["_id"] not in invoiced_ids]
+
+
+async def legacy_run(db, shipment_ids) -> int:
+    """The previous implementation: an invoice check and a generate per shipment."""
+    created = 0
+    for sid in shipment_ids:
+        if await db.invoices.find_one({"shipment_ids": ObjectId(sid)}):
+            continue
+        await generate_invoice_from_shipment(sid)
+        created += 1
+    return created
+
+
+async def main(shipments: int, customers: int, legacy_shipments: int) -> None:
+    random.seed(11)
+    db = await fresh_database()
+    await ensure_indexes()
+    uninvoiced = await seed(db, shipments, customers)
+    print(f"Seeded {shipments} delivered shipments, {len(uninvoiced)} uninvoiced\n")
+
+    try:
+        sample = uninvoiced[:legacy_shipments]
+        start = time.perf_counter()
+        await legacy_run(db, sample)
+        legacy = time.perf_counter() - start
+        print(f"  legacy        {len(sample):>6} shipments in {legacy:6.2f}s  "
+              f"(~{legacy * len(uninvoiced) / max(len(sample), 1):.0f}s for {len(uninvoiced)})")
+
+        for consolidate in (False, True):
+            # Undo the previous run so both modes invoice the same shipments
+            await db.invoices.delete_many({"invoice_number": {"$regex": "^INV-"}})
+            invoicer = BatchInvoicer(consolidate=consolidate, keep_results=False)
+            start = time.perf_counter()
+            await invoice_all(invoicer)
+            elapsed = time.perf_counter() - start
+            label = "consolidated" if consolidate else "batch"
+            print(f"  {label:<13} {invoicer.created:>6} shipments in {elapsed:6.2f}s  "
+                  f"({invoicer.invoices} invoices, {invoicer.errors} errors)")
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shipments", type=int, default=10000)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--legacy-shipments", type=int, default=500, help="Shipments for the (slow) legacy run")
+    args = parser.parse_args()
+    asyncio.run(main(args.shipments, args.customers, args.legacy_shipments))
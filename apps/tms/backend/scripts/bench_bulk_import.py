@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk shipment import before and after the chunked pipeline.
+
+Writes a 20,000-row customer spreadsheet (CSV) and times:
+
+- legacy: the previous per-row loop (``get_next_shipment_number``,
+  ``insert_one`` and a rollup update per row), on a sample of rows
+- pipeline: ``ShipmentImporter`` streaming the whole file (block number
+  reservation, unordered ``insert_many`` per chunk, bulk rollups)
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_bulk_import.py [--rows 20000] [--legacy-rows 1000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from bson import ObjectId
+
+from bench_common import fresh_database
+
+from app.services.shipment_changes import shipment_changes
+from app.services.number_generator import NumberGenerator
+from app.services.shipment_import import ShipmentImporter, build_shipment, iter_csv_rows, map_row
+
+CITIES = [("Chicago", "IL"), ("Dallas", "TX"), ("Atlanta", "GA"), ("Denver", "CO"), ("Phoenix", "AZ"), ("Columbus", "OH")]
+HEADER = ["Origin City", "Origin State", "Destination City", "Destination State",
+          "Pickup Date", "Weight (lbs)", "Commodity", "Customer Price", "Reference Number"]
+MAPPING = {
+    "Origin City": "origin_city",
+    "Origin State": "origin_state",
+    "Destination City": "destination_city",
+    "Destination State": "destination_state",
+    "Pickup Date": "pickup_date",
+    "Weight (lbs)": "weight_lbs",
+    "Commodity": "commodity",
+    "Customer Price": "customer_price",
+    "Reference Number": "reference_number",
+}
+
+
+def write_csv(rows: int) -> str:
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    with os.fdopen(fd, "w") as f:
+        f.write(",".join(HEADER) + "\n")
+        for i in range(rows):
+            (oc, os_), (dc, ds) = random.sample(CITIES, 2)
+            f.write(f"{oc},{os_},{dc},{ds},2026-03-{random.randint(1, 28):02d},"
+                    f"{random.randint(1000, 44000)},General Merchandise,{random.randint(800, 4000)}.00,PO-{i}\n")
+    return path
+
+
+async def legacy_import(db, customer_oid: ObjectId, rows) -> int:
+    """The previous implementation: one number, insert and rollup per row."""
+    count = 0
+    for i, row in enumerate(rows):
+        shipment = build_shipment(map_row(row, MAPPING), customer_oid, i + 1)
+        shipment.shipment_number = await NumberGenerator.get_next_shipment_number()
+        await db.shipments.insert_one(shipment.model_dump_mongo())
+        await shipment_changes.shipment_changed(shipment.id)
+        count += 1
+    return count
+
+
+async def main(rows: int, legacy_rows: int) -> None:
+    random.seed(3)
+    db = await fresh_database()
+    customer_oid = ObjectId()
+    await db.customers.insert_one({"_id": customer_oid, "name": "Bench Customer"})
+    path = write_csv(rows)
+    print(f"Wrote {rows} rows ({os.path.getsize(path) / 1e6:.1f} MB)\n")
+
+    try:
+        _, sample = iter_csv_rows(path)
+        sample_rows = [row for _, row in zip(range(legacy_rows), sample)]
+        start = time.perf_counter()
+        await legacy_import(db, customer_oid, sample_rows)
+        legacy = time.perf_counter() - start
+        print(f"  legacy     {legacy_rows:>6} rows in {legacy:6.2f}s  "
+              f"({legacy_rows / legacy:8.0f} rows/s, ~{legacy * rows / legacy_rows:.0f}s for {rows})")
+
+        importer = ShipmentImporter(customer_oid, MAPPING)
+        _, all_rows = iter_csv_rows(path)
+        start = time.perf_counter()
+        await importer.import_rows(all_rows)
+        pipeline = time.perf_counter() - start
+        print(f"  pipeline   {importer.successful:>6} rows in {pipeline:6.2f}s  "
+              f"({importer.successful / pipeline:8.0f} rows/s, {importer.failed} failed)")
+    finally:
+        os.remove(path)
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--legacy-rows", type=int, default=1000, help="Rows for the (slow) legacy run")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.legacy_rows))
@@ -0,0 +1,65 @@
+"""
+Shared helpers for the TMS benchmark scripts in this directory.
+
+Benchmarks run against a throwaway database (``expertly_tms_bench`` by
+default) which is dropped before seeding, never against the app database.
+
+Environment variables:
+    MONGODB_URL: MongoDB connection string (default: mongodb://localhost:27017)
+    BENCH_DATABASE: Database name to seed and drop (default: expertly_tms_bench)
+"""
+
+import os
+import statistics
+import sys
+import time
+from typing import Awaitable, Callable, List
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import set_database  # noqa: E402
+
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+BENCH_DATABASE = os.getenv("BENCH_DATABASE", "expertly_tms_bench")
+
+
+async def fresh_database() -> AsyncIOMotorDatabase:
+    """Drop and return the benchmark database, wired into ``app.database``."""
+    client = AsyncIOMotorClient(MONGODB_URL)
+    await client.drop_database(BENCH_DATABASE)
+    db = client[BENCH_DATABASE]
+    set_database(db)
+    print(f"Connected to MongoDB: {MONGODB_URL}/{BENCH_DATABASE}")
+    return db
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[k]
+
+
+async def time_async(fn: Callable[[], Awaitable], iterations: int, warmup: int = 1) -> List[float]:
+    """Run ``fn`` repeatedly and return per-call latencies in milliseconds."""
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: List[float]) -> None:
+    """Print p50/p99/mean for a set of millisecond samples."""
+    print(
+        f"  {label:<28} p50={percentile(samples, 50):9.2f} ms  "
+        f"p99={percentile(samples, 99):9.2f} ms  "
+        f"mean={statistics.fmean(samples):9.2f} ms  (n={len(samples)})"
+    )
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark consolidation suggestions over the open book.
+
+Seeds unassigned booked shipments on a set of state lanes (with stop
+coordinates jittered around each lane's cities) and times:
+
+- legacy: the previous pairwise comparison per lane over the first 500
+- sweep: ``find_consolidations`` over every open load, by state lane
+- proximity: the same with a 75-mile proximity radius
+- endpoint path: ``ConsolidationService.suggestions`` including the read
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_consolidation.py [--loads 50000] [--lanes 400] [--iterations 5]
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from bench_common import fresh_database, report, time_async
+
+from app.services.consolidation import ConsolidationService, find_consolidations
+from app.utils.seed import ensure_indexes
+
+STATES = ["IL", "TX", "CA", "GA", "OH", "PA", "NY", "FL", "WA", "CO", "AZ", "TN", "MI", "NC", "NJ", "MO"]
+SEED_BATCH = 10_000
+
+
+def random_point() -> tuple:
+    return (random.uniform(30, 47), random.uniform(-120, -75))
+
+
+async def seed(db, loads: int, lanes: int) -> None:
+    now = datetime.utcnow()
+    lane_defs = [
+        (random.choice(STATES), random.choice(STATES), random_point(), random_point())
+        for _ in range(lanes)
+    ]
+    for start in range(0, loads, SEED_BATCH):
+        docs = []
+        for i in range(start, min(start + SEED_BATCH, loads)):
+            o_state, d_state, o, d = random.choice(lane_defs)
+            docs.append({
+                "shipment_number": f"S-2026-{i:07d}",
+                "status": "booked",
+                "carrier_id": None,
+                "equipment_type": random.choice(["van", "van", "reefer", "flatbed"]),
+                "pickup_date": now + timedelta(hours=random.randint(0, 24 * 30)),
+                "weight_lbs": random.randint(2000, 24000),
+                "pallet_count": random.randint(1, 12),
+                "customer_price": random.randint(50000, 300000),
+                "stops": [
+                    {"stop_type": "pickup", "state": o_state,
+                     "latitude": o[0] + random.uniform(-0.5, 0.5), "longitude": o[1] + random.uniform(-0.5, 0.5)},
+                    {"stop_type": "delivery", "state": d_state,
+                     "latitude": d[0] + random.uniform(-0.5, 0.5), "longitude": d[1] + random.uniform(-0.5, 0.5)},
+                ],
+            })
+        await db.shipments.insert_many(docs)
+
+
+async def legacy(db) -> None:
+    """The previous implementation, capped at 500 shipments."""
+    shipments = await db.shipments.find({"status": "booked", "carrier_id": None}).sort("pickup_date", 1).to_list(500)
+    lane_groups: dict = {}
+    for s in shipments:
+        stops = s.get("stops", [])
+        lane_groups.setdefault(f"{stops[0].get('state')}_{stops[-1].get('state')}", []).append(s)
+    for group in lane_groups.values():
+        compatible = []
+        for i, s1 in enumerate(group):
+            for s2 in group[i + 1:]:
+                if abs((s1["pickup_date"] - s2["pickup_date"]).total_seconds()) <= 48 * 3600:
+                    if s1 not in compatible:
+                        compatible.append(s1)
+                    if s2 not in compatible:
+                        compatible.append(s2)
+
+
+async def main(loads: int, lanes: int, iterations: int) -> None:
+    random.seed(18)
+    db = await fresh_database()
+    await ensure_indexes()
+    await seed(db, loads, lanes)
+    print(f"Seeded {loads} unassigned booked shipments on {lanes} lanes\n")
+
+    try:
+        open_loads = await ConsolidationService.open_loads()
+
+        async def sweep(proximity):
+            find_consolidations(open_loads, proximity_miles=proximity)
+
+        report("legacy (500 loads)", await time_async(lambda: legacy(db), iterations))
+        report("sweep by state lane", await time_async(lambda: sweep(0), iterations))
+        report("sweep, 75 mi proximity", await time_async(lambda: sweep(75), iterations))
+        report("suggestions endpoint path", await time_async(ConsolidationService.suggestions, iterations))
+
+        groups = find_consolidations(open_loads)
+        grouped = sum(len(g) for g in groups)
+        print(f"\n  {len(groups)} groups covering {grouped} of {len(open_loads)} loads")
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loads", type=int, default=50_000)
+    parser.add_argument("--lanes", type=int, default=400)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.loads, args.lanes, args.iterations))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark draining a burst of document processing jobs.
+
+Enqueues a burst of documents (1,000 emailed PODs) and drains them with the
+worker pool against a simulated provider: each model call sleeps for
+``--call-ms`` under the ``anthropic`` provider limiter, two calls per
+document. While the pool drains, a probe times a small documents query to
+show the API stays responsive. Reports drain time, the provider's peak
+concurrency and probe latency.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_document_queue.py [--documents 1000] [--workers 4] [--call-ms 200]
+"""
+
+import argparse
+import asyncio
+import time
+
+from bench_common import fresh_database, report
+
+from app.services import document_queue as queue_module
+from app.services.document_queue import DocumentQueue
+from app.services.provider_limits import provider_limiter
+from app.utils.seed import ensure_indexes
+
+
+class SimulatedProcessor:
+    """Two rate-limited provider calls per document, as classify then extract."""
+
+    def __init__(self, call_ms: int):
+        self.call_seconds = call_ms / 1000
+        self.peak = 0
+
+    async def process_document(self, document_id: str) -> None:
+        limiter = provider_limiter("anthropic")
+        for _ in range(2):
+            async with limiter:
+                self.peak = max(self.peak, limiter.in_flight)
+                await asyncio.sleep(self.call_seconds)
+
+
+async def main(documents: int, workers: int, call_ms: int) -> None:
+    db = await fresh_database()
+    await ensure_indexes()
+    result = await db.documents.insert_many([
+        {"document_type": "pod", "storage_path": f"/tmp/pod-{i}.pdf", "extraction_status": "pending"}
+        for i in range(documents)
+    ])
+    processor = SimulatedProcessor(call_ms)
+    queue_module.get_document_processor = lambda: processor
+    queue = DocumentQueue()
+
+    try:
+        started = time.perf_counter()
+        await queue.enqueue_many([str(i) for i in result.inserted_ids], source="email")
+        enqueue_ms = (time.perf_counter() - started) * 1000
+        print(f"Enqueued {documents} documents in {enqueue_ms:.0f} ms\n")
+
+        queue.start(workers)
+        probes = []
+        while (await queue.stats())["queued"] or queue.busy:
+            probe = time.perf_counter()
+            await db.documents.find({"extraction_status": "pending"}).limit(20).to_list(20)
+            probes.append((time.perf_counter() - probe) * 1000)
+            await asyncio.sleep(0.05)
+        drained = time.perf_counter() - started
+        await queue.stop()
+
+        limiter = provider_limiter("anthropic")
+        print(f"  drained in {drained:.1f} s ({documents / drained:.1f} documents/s)")
+        print(f"  provider peak in flight: {processor.peak} (limit {limiter.max_concurrent}, "
+              f"{limiter.requests_per_minute}/min)")
+        report("API probe while draining", probes)
+        stats = await queue.stats()
+        print(f"\n  avg wait {stats['avg_wait_ms']} ms, avg processing {stats['avg_duration_ms']} ms")
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--call-ms", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.documents, args.workers, args.call_ms))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark document upload storage.
+
+Uploads files of a given size through ``DocumentStorage`` into a temporary
+directory and times:
+
+- legacy: the previous path (read the whole upload into memory, then write it)
+- streamed: ``DocumentStorage.save_upload``, chunked with SHA-256
+- duplicate: the same upload again, discarded as already stored
+
+and reports peak memory for the legacy and streamed paths.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_document_upload.py [--size-mb 25] [--iterations 5]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import tracemalloc
+import uuid
+
+import aiofiles
+from starlette.datastructures import UploadFile
+
+from bench_common import report, time_async
+
+from app.services import document_storage
+from app.services.document_storage import DocumentStorage
+
+
+def make_upload(data: bytes) -> UploadFile:
+    """An upload spooled to disk past 1 MB, as Starlette receives multipart files."""
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(data)
+    spool.seek(0)
+    return UploadFile(spool, filename="scan.pdf")
+
+
+async def legacy(upload_dir: str, upload: UploadFile) -> None:
+    async with aiofiles.open(os.path.join(upload_dir, f"{uuid.uuid4()}.pdf"), "wb") as f:
+        content = await upload.read()
+        await f.write(content)
+
+
+async def streamed(upload: UploadFile) -> None:
+    await DocumentStorage.save_upload(upload)
+
+
+async def peak_mb(fn, data: bytes) -> float:
+    """Peak memory allocated by ``fn`` while storing an already received upload."""
+    upload = make_upload(data)
+    tracemalloc.start()
+    await fn(upload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+async def main(size_mb: int, iterations: int) -> None:
+    data = os.urandom(size_mb * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as upload_dir:
+        document_storage.UPLOAD_DIR = upload_dir
+        print(f"Uploading {size_mb} MB files\n")
+
+        # A fresh prefix per upload so each one stores a new object
+        report("legacy (read whole file)", await time_async(lambda: legacy(upload_dir, make_upload(data)), iterations))
+        report("streamed + hashed", await time_async(lambda: streamed(make_upload(os.urandom(16) + data)), iterations))
+        await streamed(make_upload(data))
+        report("duplicate upload", await time_async(lambda: streamed(make_upload(data)), iterations))
+
+        print(f"\n  peak memory legacy:   {await peak_mb(lambda u: legacy(upload_dir, u), data):.1f} MB")
+        print(f"  peak memory streamed: {await peak_mb(streamed, data):.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=25)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.size_mb, args.iterations))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark EDI X12 parsing and bulk ingest on a synthetic interchange.
+
+Builds one interchange with 10,000 transaction sets (a mix of 204, 214, 210
+and 990, spread over several GS groups), then measures:
+
+- per-message: splitting the file by ST/SE and calling ``parse_edi_message``
+  on each set, as clients had to do before bulk ingest
+- streaming: ``iter_transaction_sets`` + ``parse_transaction_set`` over the
+  file fed in 64 KB chunks
+
+with wall time and (in a second run) peak traced memory for each. With ``--ingest`` it also
+posts the file to ``POST /api/v1/edi/messages/bulk`` against the benchmark
+database and reports end-to-end time.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_edi_ingest.py [--transactions 10000] [--ingest]
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from bench_common import fresh_database
+
+from app.services.edi_parser import iter_transaction_sets, parse_edi_message, parse_transaction_set
+
+ISA = (
+    "ISA*00*          *00*          *ZZ*SHIPPERCO      *ZZ*BROKERCO       "
+    "*260314*1200*U*00401*{ctrl:09d}*0*P*:~"
+)
+
+BODIES = {
+    "204": (
+        "B2**SCAC**SHIP{n}*~B2A*00~L11*PO{n}*PO~NTE*GEN*Handle with care~"
+        "N1*SH*Acme Foods*93*111~N3*100 Main St~N4*Chicago*IL*60601*US~"
+        "N1*CN*Lone Star Grocers~N3*9 Elm St~N4*Dallas*TX*75001*US~"
+        "S5*1*LD*42000*L~G62*10*20260315*U*0830~S5*2*UL~G62*70*20260317*U*1400~"
+        "N7**TRL{n}****TL*53~AT8*G*L*42000**24~"
+    ),
+    "214": "B10*REF{n}*SHIP{n}*SCAC~L11*BOL{n}*BM~AT7*X6*NS***20260315*1015~MS1*Joplin*MO*US~",
+    "210": (
+        "B3**INV{n}*SHIP{n}*PP**1500.00*20260314**1500.00*~N9*BM*BOL{n}~"
+        "N1*RE*Carrier Co~N3*5 Road~N4*Tulsa*OK*74101~L5*1*Freight*FAK~"
+        "L0*1***42000*G~L1*1*1500.00*FR*1500.00~L3*42000*G***1500.00~"
+    ),
+    "990": "B1*SCAC*SHIP{n}*20260314~N9*2I*A~",
+}
+FUNCTIONAL_IDS = {"204": "SM", "214": "QM", "210": "IM", "990": "GF"}
+
+
+def build_interchange(transactions: int, per_group: int = 500) -> str:
+    parts = [ISA.format(ctrl=1)]
+    types = list(BODIES)
+    n = 0
+    group = 0
+    while n < transactions:
+        group += 1
+        set_type = types[group % len(types)]
+        parts.append(f"GS*{FUNCTIONAL_IDS[set_type]}*SHIPPERCO*BROKERCO*20260314*1200*{group}*X*004010~")
+        count = min(per_group, transactions - n)
+        for _ in range(count):
+            n += 1
+            body = BODIES[set_type].format(n=n)
+            segments = body.count("~") + 2
+            parts.append(f"ST*{set_type}*{n:04d}~{body}SE*{segments}*{n:04d}~")
+        parts.append(f"GE*{count}*{group}~")
+    parts.append("IEA*1*000000001~")
+    return "".join(parts)
+
+
+def per_message(content: str) -> int:
+    """Split by ST..SE, then parse every set on its own."""
+    header = content[:content.index("ST*")]
+    count = 0
+    for chunk in content.split("~ST*")[1:]:
+        set_text = "ST*" + chunk.split("~GE*")[0]
+        parse_edi_message(header + set_text)
+        count += 1
+    return count
+
+
+def streaming(content: str) -> int:
+    chunks = (content[i:i + 65536] for i in range(0, len(content), 65536))
+    count = 0
+    for ts in iter_transaction_sets(chunks):
+        parse_transaction_set(ts)
+        count += 1
+    return count
+
+
+def measure(label: str, fn, content: str) -> None:
+    start = time.perf_counter()
+    count = fn(content)
+    elapsed = time.perf_counter() - start
+    # Separate run for memory: tracing slows parsing down several times
+    tracemalloc.start()
+    fn(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"  {label:<14} {count:>6} sets in {elapsed * 1000:8.1f} ms "
+        f"({count / elapsed:9.0f} sets/s), peak traced memory {peak / 1e6:6.1f} MB"
+    )
+
+
+async def ingest(content: str) -> None:
+    from httpx import ASGITransport, AsyncClient
+    from app.main import app
+
+    db = await fresh_database()
+    body = content.encode()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=600) as client:
+        start = time.perf_counter()
+        response = await client.post(
+            "/api/v1/edi/messages/bulk",
+            content=body,
+            headers={"Content-Type": "application/edi-x12"},
+        )
+        elapsed = time.perf_counter() - start
+    result = response.json()
+    print(
+        f"  bulk ingest    {result['stored']:>6} stored in {elapsed * 1000:8.1f} ms "
+        f"({result['stored'] / elapsed:9.0f} msgs/s), {len(body) / 1e6:.1f} MB body, by type {result['by_type']}"
+    )
+    await db.client.drop_database(db.name)
+
+
+def main(transactions: int, run_ingest: bool) -> None:
+    content = build_interchange(transactions)
+    print(f"Synthetic interchange: {transactions} transaction sets, {len(content) / 1e6:.1f} MB\n")
+    measure("per-message", per_message, content)
+    measure("streaming", streaming, content)
+    if run_ingest:
+        asyncio.run(ingest(content))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--ingest", action="store_true", help="Also time POST /edi/messages/bulk (needs MongoDB)")
+    args = parser.parse_args()
+    main(args.transactions, args.ingest)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark the exception engine at 50,000 active shipments.
+
+Seeds active shipments (a share late, unassigned, low-margin or missing
+check calls), carriers with expiring insurance, sent invoices and open
+tenders, then times:
+
+- rebuild: a full evaluation of every detector (what each summary request
+  cost before the open-exception index, minus the old row caps)
+- apply: re-evaluating one shipment after a write
+- summary: ``get_exception_summary`` reading the index (with its due sweep)
+
+Per-detector timings from the rebuild are printed at the end.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_exception_engine.py [--shipments 50000] [--iterations 200]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import timedelta
+
+from bson import ObjectId
+
+from bench_common import fresh_database, report, time_async
+
+from app.models.base import utc_now
+from app.services.exception_detection import ExceptionDetectionService
+from app.utils.seed import ensure_indexes
+
+STATUSES = ["booked", "pending_pickup", "in_transit", "out_for_delivery"]
+
+
+async def seed(db, shipments: int) -> list:
+    now = utc_now().replace(tzinfo=None)
+    carriers = [
+        {
+            "_id": ObjectId(),
+            "name": f"Carrier {i}",
+            "status": "active",
+            "insurance_expiration": now + timedelta(days=random.randint(1, 400)),
+        }
+        for i in range(500)
+    ]
+    await db.carriers.insert_many(carriers)
+
+    ids = []
+    batch = []
+    for i in range(shipments):
+        status = random.choice(STATUSES)
+        price = random.randint(80000, 400000)
+        doc = {
+            "_id": ObjectId(),
+            "shipment_number": f"S-2026-{i:05d}",
+            "status": status,
+            "carrier_id": None if random.random() < 0.05 else random.choice(carriers)["_id"],
+            "customer_price": price,
+            "carrier_cost": int(price * random.uniform(0.75, 0.97)),
+            "pickup_date": now + timedelta(hours=random.randint(-48, 96)),
+            "delivery_date": now + timedelta(hours=random.randint(-24, 144)),
+            "last_check_call": now - timedelta(hours=random.randint(0, 12)) if random.random() < 0.9 else None,
+        }
+        ids.append(doc["_id"])
+        batch.append(doc)
+        if len(batch) == 5000:
+            await db.shipments.insert_many(batch)
+            batch = []
+    if batch:
+        await db.shipments.insert_many(batch)
+
+    await db.invoices.insert_many([
+        {
+            "invoice_number": f"INV-2026-{i:05d}",
+            "customer_id": ObjectId(),
+            "status": "sent",
+            "due_date": now + timedelta(days=random.randint(-60, 30)),
+            "total": 150000,
+            "amount_paid": 0,
+        }
+        for i in range(shipments // 5)
+    ])
+    await db.tenders.insert_many([
+        {
+            "shipment_id": random.choice(ids),
+            "carrier_id": random.choice(carriers)["_id"],
+            "status": "sent",
+            "sent_at": now - timedelta(hours=random.randint(0, 12)),
+        }
+        for _ in range(shipments // 10)
+    ])
+    return ids
+
+
+async def main(shipments: int, iterations: int) -> None:
+    random.seed(5)
+    db = await fresh_database()
+    await ensure_indexes()
+    ids = await seed(db, shipments)
+    print(f"Seeded {shipments} active shipments\n")
+
+    try:
+        start = time.perf_counter()
+        counts = await ExceptionDetectionService.rebuild()
+        rebuild = time.perf_counter() - start
+        print(f"  rebuild (all detectors)      {rebuild * 1000:9.0f} ms  open: {counts}")
+        detector_metrics = ExceptionDetectionService.metrics()
+
+        sample = iter(random.choices(ids, k=iterations + 1))
+        report("apply_shipment", await time_async(
+            lambda: ExceptionDetectionService.apply_shipment(next(sample)), iterations
+        ))
+        report("get_exception_summary", await time_async(
+            ExceptionDetectionService.get_exception_summary, max(iterations // 20, 5)
+        ))
+
+        print("\n  Per-detector (rebuild):")
+        for name, m in detector_metrics.items():
+            print(f"    {name:<24} {m['total_ms']:9.1f} ms over {m['entities']} entities")
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shipments", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.shipments, args.iterations))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Replay synthetic GPS pings through ``update_shipment_location``.
+
+Seeds facility geofences across the continental US plus a pickup and a
+delivery fence per shipment, then drives each shipment's truck along a
+straight line from its pickup fence to its delivery fence. Reports:
+
+- legacy: the previous ``check_geofences`` (up to 100 fences per ping, a
+  haversine each and a ``geofence_events.find_one`` per fence) on a sample
+- check_geofences: the spatial index with cached inside/outside state
+- replay: end-to-end ``update_shipment_location`` throughput over all pings
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_geofences.py [--pings 1000000] [--shipments 2000] [--fences 20000] [--concurrency 64]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from bson import ObjectId
+
+from bench_common import fresh_database, report, time_async
+
+from app.models.base import utc_now
+from app.models.geofence import Geofence, GeofenceEvent, GeofenceTrigger, GeofenceType
+from app.services.geofence_index import GeofenceIndex
+from app.services.tracking_service import TrackingService
+from app.utils.seed import ensure_indexes
+
+
+def random_point() -> tuple:
+    return random.uniform(30, 48), random.uniform(-120, -75)
+
+
+async def seed(db, shipments: int, fences: int) -> list:
+    docs = [
+        Geofence(name=f"Facility {i}", geofence_type=GeofenceType.FACILITY, latitude=lat, longitude=lon,
+                 radius_meters=random.choice([300, 500, 1500])).model_dump_mongo()
+        for i, (lat, lon) in enumerate(random_point() for _ in range(fences))
+    ]
+    routes = []
+    for i in range(shipments):
+        oid = ObjectId()
+        origin, destination = random_point(), random_point()
+        routes.append((oid, origin, destination))
+        for kind, (lat, lon) in ((GeofenceType.PICKUP, origin), (GeofenceType.DELIVERY, destination)):
+            docs.append(Geofence(name=f"{kind.value} {i}", geofence_type=kind, latitude=lat, longitude=lon,
+                                 radius_meters=2000, shipment_id=oid).model_dump_mongo())
+    await db.geofences.insert_many(docs)
+    await db.shipments.insert_many([
+        {"_id": oid, "shipment_number": f"S-2026-{i:05d}", "status": "in_transit", "customer_id": ObjectId()}
+        for i, (oid, _, _) in enumerate(routes)
+    ])
+    return routes
+
+
+def pings_for(routes: list, total: int):
+    """Round-robin pings advancing each truck along its route."""
+    steps = max(total // len(routes), 1)
+    for step in range(steps):
+        t = step / max(steps - 1, 1)
+        for oid, (lat1, lon1), (lat2, lon2) in routes:
+            yield str(oid), lat1 + (lat2 - lat1) * t, lon1 + (lon2 - lon1) * t
+
+
+async def legacy_check(db, shipment_id: str, latitude: float, longitude: float) -> None:
+    """The previous implementation of ``check_geofences``."""
+    shipment_oid = ObjectId(shipment_id)
+    geofences = await db.geofences.find({
+        "$or": [{"shipment_id": shipment_oid}, {"shipment_id": None}],
+        "is_active": True,
+    }).to_list(100)
+    for gf_doc in geofences:
+        gf = Geofence(**gf_doc)
+        distance = TrackingService.calculate_distance(latitude, longitude, gf.latitude, gf.longitude) * 1609.34
+        is_inside = distance <= gf.radius_meters
+        last_event = await db.geofence_events.find_one(
+            {"geofence_id": gf.id, "shipment_id": shipment_oid}, sort=[("event_timestamp", -1)]
+        )
+        was_inside = last_event and last_event.get("event_type") == "enter"
+        if is_inside != bool(was_inside):
+            await db.geofence_events.insert_one(GeofenceEvent(
+                geofence_id=gf.id, shipment_id=shipment_oid,
+                event_type=GeofenceTrigger.ENTER if is_inside else GeofenceTrigger.EXIT,
+                event_timestamp=utc_now(), latitude=latitude, longitude=longitude,
+            ).model_dump_mongo())
+
+
+async def main(pings: int, shipments: int, fences: int, concurrency: int) -> None:
+    random.seed(14)
+    db = await fresh_database()
+    await ensure_indexes()
+    routes = await seed(db, shipments, fences)
+    print(f"Seeded {fences} facility fences and {shipments} shipments with pickup/delivery fences\n")
+
+    try:
+        sample = iter(list(pings_for(routes, 2000)))
+        report("legacy check_geofences", await time_async(lambda: legacy_check(db, *next(sample)), 500))
+        await db.geofence_events.delete_many({})
+
+        sample = iter(list(pings_for(routes, 2000)))
+        report("check_geofences", await time_async(lambda: TrackingService.check_geofences(*next(sample)), 500))
+        await db.geofence_events.delete_many({})
+        GeofenceIndex.reset_states()
+
+        # Each worker owns a slice of shipments so one truck's pings stay in order
+        queues = [[] for _ in range(concurrency)]
+        for ping in pings_for(routes, pings):
+            queues[hash(ping[0]) % concurrency].append(ping)
+
+        async def worker(queue):
+            for shipment_id, lat, lon in queue:
+                await TrackingService.update_shipment_location(shipment_id, lat, lon)
+
+        total = sum(len(q) for q in queues)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(q) for q in queues))
+        elapsed = time.perf_counter() - start
+        events = await db.geofence_events.count_documents({})
+        print(f"\n  replay  {total} pings in {elapsed:.1f}s ({total / elapsed:,.0f} pings/s), {events} geofence events")
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pings", type=int, default=1_000_000)
+    parser.add_argument("--shipments", type=int, default=2000)
+    parser.add_argument("--fences", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(main(args.pings, args.shipments, args.fences, args.concurrency))
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark lane queries on materialized lane fields.
+
+Seeds shipments over many state lanes and the last year, with the lane
+fields set as they are on write, and times a lane rate-trend aggregation:
+
+- legacy: ``$addFields`` of origin/destination state from ``stops`` ahead of
+  the lane ``$match`` (every shipment in the date range is read)
+- indexed: the same aggregation matching ``lane_key``, and
+  ``PredictiveService.forecast_rate_trend`` end to end
+
+For each it prints the winning plan and the documents and keys examined,
+from ``explain`` with execution stats.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_lane_queries.py [--shipments 1000000] [--iterations 5]
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from bench_common import fresh_database, report, time_async
+
+from app.models.shipment import lane_fields
+from app.services.predictive_service import PredictiveService
+from app.utils.seed import ensure_indexes
+
+STATES = ["IL", "TX", "CA", "GA", "OH", "PA", "NY", "FL", "WA", "CO", "AZ", "TN", "MI", "NC", "NJ", "MO"]
+SEED_BATCH = 10_000
+
+
+async def seed(db, shipments: int) -> None:
+    now = datetime.utcnow()
+    for start in range(0, shipments, SEED_BATCH):
+        docs = []
+        for _ in range(start, min(start + SEED_BATCH, shipments)):
+            stops = [
+                {"stop_type": "pickup", "city": "Origin", "state": random.choice(STATES), "zip_code": "60601"},
+                {"stop_type": "delivery", "city": "Destination", "state": random.choice(STATES), "zip_code": "75201"},
+            ]
+            docs.append({
+                "status": random.choice(["delivered", "delivered", "in_transit", "booked"]),
+                "equipment_type": random.choice(["van", "van", "reefer", "flatbed"]),
+                "carrier_cost": random.randint(100000, 400000),
+                "created_at": now - timedelta(minutes=random.randint(0, 365 * 24 * 60)),
+                "stops": stops,
+                **lane_fields(stops),
+            })
+        await db.shipments.insert_many(docs, ordered=False)
+
+
+def legacy_pipeline(origin: str, destination: str, since: datetime) -> list:
+    return [
+        {"$match": {"created_at": {"$gte": since}, "carrier_cost": {"$gt": 0}, "equipment_type": "van"}},
+        {"$addFields": {
+            "o_state": {"$arrayElemAt": ["$stops.state", 0]},
+            "d_state": {"$arrayElemAt": ["$stops.state", -1]},
+            "month": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+        }},
+        {"$match": {"o_state": origin, "d_state": destination}},
+        {"$group": {"_id": "$month", "avg_rate": {"$avg": "$carrier_cost"}, "volume": {"$sum": 1}}},
+    ]
+
+
+def indexed_pipeline(origin: str, destination: str, since: datetime) -> list:
+    return [
+        {"$match": {
+            "lane_key": f"{origin}-{destination}", "created_at": {"$gte": since},
+            "carrier_cost": {"$gt": 0}, "equipment_type": "van",
+        }},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+            "avg_rate": {"$avg": "$carrier_cost"}, "volume": {"$sum": 1},
+        }},
+    ]
+
+
+def _find_stage(node, names):
+    if isinstance(node, dict):
+        if node.get("stage") in names:
+            return node["stage"]
+        for value in node.values():
+            found = _find_stage(value, names)
+            if found:
+                return found
+    elif isinstance(node, list):
+        for value in node:
+            found = _find_stage(value, names)
+            if found:
+                return found
+    return None
+
+
+def _total(node, key) -> int:
+    if isinstance(node, dict):
+        own = node[key] if isinstance(node.get(key), int) else 0
+        return own + sum(_total(v, key) for v in node.values())
+    if isinstance(node, list):
+        return sum(_total(v, key) for v in node)
+    return 0
+
+
+async def explain(db, label: str, pipeline: list) -> None:
+    plan = await db.command({
+        "explain": {"aggregate": "shipments", "pipeline": pipeline, "cursor": {}},
+        "verbosity": "executionStats",
+    })
+    stage = _find_stage(plan, {"IXSCAN", "COLLSCAN"})
+    print(f"  {label:<10} plan={stage}  docsExamined={_total(plan, 'totalDocsExamined')}  "
+          f"keysExamined={_total(plan, 'totalKeysExamined')}")
+
+
+async def main(shipments: int, iterations: int) -> None:
+    random.seed(21)
+    db = await fresh_database()
+    await ensure_indexes()
+    await seed(db, shipments)
+    print(f"Seeded {shipments} shipments over {len(STATES) ** 2} lanes\n")
+
+    try:
+        since = datetime.utcnow() - timedelta(days=180)
+        legacy = legacy_pipeline("IL", "TX", since)
+        indexed = indexed_pipeline("IL", "TX", since)
+
+        report("legacy $addFields match", await time_async(lambda: db.shipments.aggregate(legacy).to_list(None), iterations))
+        report("lane_key match", await time_async(lambda: db.shipments.aggregate(indexed).to_list(None), iterations))
+        report("forecast_rate_trend", await time_async(lambda: PredictiveService.forecast_rate_trend("IL", "TX"), iterations))
+        print()
+        await explain(db, "legacy", legacy)
+        await explain(db, "indexed", indexed)
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shipments", type=int, default=1_000_000)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.shipments, args.iterations))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark the live driver map before and after the latest-position read model.
+
+Seeds 5,000 active drivers (each with a carrier, an in-transit shipment, a
+recent check-in and a GPS tracking event), then times:
+
+- legacy: the previous per-row ``find_one`` implementation of
+  ``/tracking/driver-locations`` (driver, carrier and shipment per check-in)
+- current: ``LivePositionService.get_live_positions``
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_live_map.py [--drivers 5000] [--iterations 20]
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from bench_common import fresh_database, report, time_async
+
+from app.services.live_position_service import LivePositionService
+
+
+async def seed(db, drivers: int) -> None:
+    now = datetime.utcnow()
+    carriers = [{"_id": ObjectId(), "name": f"Carrier {i}", "status": "active"} for i in range(max(1, drivers // 25))]
+    await db.carriers.insert_many(carriers)
+
+    driver_docs, shipment_docs, checkins, events = [], [], [], []
+    for i in range(drivers):
+        carrier = random.choice(carriers)
+        driver_id, shipment_id = ObjectId(), ObjectId()
+        lat, lon = random.uniform(25, 48), random.uniform(-123, -70)
+        driver_docs.append({"_id": driver_id, "name": f"Driver {i}", "carrier_id": carrier["_id"], "phone": "555-0000"})
+        shipment_docs.append({
+            "_id": shipment_id,
+            "shipment_number": f"S-BENCH-{i:06d}",
+            "status": "in_transit",
+            "carrier_id": carrier["_id"],
+            "stops": [
+                {"stop_type": "pickup", "city": "Chicago", "state": "IL"},
+                {"stop_type": "delivery", "city": "Dallas", "state": "TX"},
+            ],
+        })
+        reported = now - timedelta(minutes=random.randint(0, 600))
+        checkins.append({
+            "driver_id": driver_id, "shipment_id": shipment_id,
+            "latitude": lat, "longitude": lon, "city": "Somewhere", "state": "MO",
+            "heading": 90.0, "speed_mph": 60.0, "source": "driver_app", "created_at": reported,
+        })
+        events.append({
+            "shipment_id": shipment_id, "event_type": "in_transit",
+            "event_timestamp": reported, "reported_at": reported,
+            "latitude": lat, "longitude": lon, "source": "gps",
+        })
+
+    await db.drivers.insert_many(driver_docs)
+    await db.shipments.insert_many(shipment_docs)
+    await db.driver_checkins.insert_many(checkins)
+    await db.tracking_events.insert_many(events)
+    await db.driver_checkins.create_index("created_at")
+    await db.tracking_events.create_index("reported_at")
+    await db.latest_positions.create_index([("last_updated", -1)])
+
+
+async def legacy_driver_locations(db) -> int:
+    """The previous implementation: one find_one per driver, carrier and shipment."""
+    cutoff = datetime.utcnow() - timedelta(hours=24)
+    checkins = await db.driver_checkins.aggregate([
+        {"$match": {"created_at": {"$gte": cutoff}, "latitude": {"$exists": True, "$ne": None}}},
+        {"$sort": {"created_at": -1}},
+        {"$group": {
+            "_id": "$driver_id",
+            "latitude": {"$first": "$latitude"},
+            "longitude": {"$first": "$longitude"},
+            "last_updated": {"$first": "$created_at"},
+            "shipment_id": {"$first": "$shipment_id"},
+        }},
+    ]).to_list(500)
+    tracking_positions = await db.tracking_events.aggregate([
+        {"$match": {
+            "reported_at": {"$gte": cutoff},
+            "latitude": {"$exists": True, "$ne": None},
+            "source": {"$in": ["gps", "driver_app", "auto_gps"]},
+        }},
+        {"$sort": {"reported_at": -1}},
+        {"$group": {"_id": "$shipment_id", "latitude": {"$first": "$latitude"}}},
+    ]).to_list(500)
+
+    rows = 0
+    seen = set()
+    for checkin in checkins:
+        driver = await db.drivers.find_one({"_id": checkin["_id"]})
+        if not driver:
+            continue
+        if driver.get("carrier_id"):
+            await db.carriers.find_one({"_id": driver["carrier_id"]})
+        if checkin.get("shipment_id"):
+            seen.add(str(checkin["shipment_id"]))
+            await db.shipments.find_one({"_id": checkin["shipment_id"]})
+        rows += 1
+    for tp in tracking_positions:
+        if str(tp["_id"]) in seen:
+            continue
+        shipment = await db.shipments.find_one({"_id": tp["_id"]})
+        if shipment and shipment.get("carrier_id"):
+            await db.carriers.find_one({"_id": shipment["carrier_id"]})
+        rows += 1
+    return rows
+
+
+async def main(drivers: int, iterations: int) -> None:
+    db = await fresh_database()
+    print(f"Seeding {drivers} active drivers...")
+    await seed(db, drivers)
+    written = await LivePositionService.rebuild_from_history()
+    print(f"Built latest_positions for {written} shipments\n")
+
+    legacy_rows = await legacy_driver_locations(db)
+    current_rows = len(await LivePositionService.get_live_positions())
+    print(f"Rows returned: legacy={legacy_rows} (capped at 500 by the old pipeline), current={current_rows}\n")
+
+    report("legacy (per-row find_one)", await time_async(lambda: legacy_driver_locations(db), iterations))
+    report("latest_positions + $in", await time_async(LivePositionService.get_live_positions, iterations))
+
+    await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.drivers, args.iterations))
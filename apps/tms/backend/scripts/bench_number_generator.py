@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for NumberGenerator.
+
+Spawns 8 worker processes (standing in for uvicorn workers), each with its
+own event loop and MongoDB client, that together allocate 10,000 shipment
+numbers with many concurrent tasks per worker. Runs the allocator in:
+
+- gapless: one ``$inc`` per number (the previous behaviour, minus the
+  process-local lock)
+- leased: blocks of ``LEASE_SIZE`` per worker, handed out from memory
+
+and checks that every number is unique across all workers.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_number_generator.py [--allocations 10000] [--workers 8] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from bench_common import BENCH_DATABASE, MONGODB_URL, fresh_database
+
+from app.database import set_database
+from app.services.number_generator import NumberGenerator
+
+
+async def _allocate(count: int, concurrency: int, gapless: bool) -> list[str]:
+    client = AsyncIOMotorClient(MONGODB_URL)
+    set_database(client[BENCH_DATABASE])
+    if gapless:
+        NumberGenerator.GAPLESS_SEQUENCES = {"shipment"}
+
+    numbers: list[str] = []
+
+    async def task(n: int):
+        for _ in range(n):
+            numbers.append(await NumberGenerator.get_next_shipment_number())
+
+    per_task = [count // concurrency + (1 if i < count % concurrency else 0) for i in range(concurrency)]
+    await asyncio.gather(*(task(n) for n in per_task))
+    client.close()
+    return numbers
+
+
+def worker(args) -> list[str]:
+    count, concurrency, gapless = args
+    return asyncio.run(_allocate(count, concurrency, gapless))
+
+
+def run(mode: str, allocations: int, workers: int, concurrency: int) -> None:
+    per_worker = [allocations // workers + (1 if i < allocations % workers else 0) for i in range(workers)]
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        # Warm up the processes (imports, connections) before timing
+        pool.map(worker, [(1, 1, mode == "gapless")] * workers)
+        start = time.perf_counter()
+        results = pool.map(worker, [(n, concurrency, mode == "gapless") for n in per_worker])
+        elapsed = time.perf_counter() - start
+
+    numbers = [n for chunk in results for n in chunk]
+    unique = len(set(numbers))
+    status = "OK" if unique == len(numbers) == allocations else "DUPLICATES"
+    print(f"  {mode:<8} {len(numbers)} numbers in {elapsed:6.2f}s  "
+          f"({len(numbers) / elapsed:9.0f}/s)  unique={unique}  {status}")
+
+
+async def reset() -> None:
+    db = await fresh_database()
+    db.client.close()
+
+
+def main(allocations: int, workers: int, concurrency: int) -> None:
+    print(f"{allocations} allocations across {workers} workers x {concurrency} tasks\n")
+    for mode in ("gapless", "leased"):
+        asyncio.run(reset())
+        run(mode, allocations, workers, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--allocations", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent tasks per worker")
+    args = parser.parse_args()
+    main(args.allocations, args.workers, args.concurrency)
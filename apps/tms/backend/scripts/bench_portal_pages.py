@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark the portal list pages before and after the portal read model.
+
+Seeds one customer with 100 active shipments (each with 20 tracking events)
+among 20,000 other shipments, and one carrier with 100 sent tenders, then
+times:
+
+- legacy: the previous loops of ``/customer-portal/tracking-dashboard``
+  (latest tracking event per shipment) and ``/carrier-portal/loads/available``
+  (``shipments.find_one`` per tender)
+- current: the single ``portal_shipments`` query each page now makes
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_portal_pages.py [--shipments 20000] [--iterations 20]
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from bench_common import fresh_database, report, time_async
+
+from app.services.portal_read_model import PortalReadModelService, eta_confidence
+from app.utils.seed import ensure_indexes
+
+ACTIVE_STATUSES = ["booked", "pending_pickup", "in_transit", "out_for_delivery"]
+STOPS = [
+    {"stop_type": "pickup", "city": "Chicago", "state": "IL"},
+    {"stop_type": "delivery", "city": "Dallas", "state": "TX"},
+]
+
+
+async def seed(db, shipments: int) -> tuple:
+    now = datetime.utcnow()
+    customer_id, carrier_id = ObjectId(), ObjectId()
+    customers = [ObjectId() for _ in range(200)]
+
+    shipment_docs, events, tenders = [], [], []
+    for i in range(shipments):
+        mine = i < 100
+        shipment_id = ObjectId()
+        shipment_docs.append({
+            "_id": shipment_id,
+            "shipment_number": f"S-BENCH-{i:06d}",
+            "status": random.choice(ACTIVE_STATUSES) if mine else random.choice(ACTIVE_STATUSES + ["delivered"] * 4),
+            "customer_id": customer_id if mine else random.choice(customers),
+            "stops": STOPS,
+            "equipment_type": "van",
+            "eta": now + timedelta(hours=10),
+            "delivery_date": now + timedelta(hours=12),
+            "last_check_call": now - timedelta(hours=random.randint(0, 10)),
+            "created_at": now - timedelta(minutes=i),
+        })
+        for j in range(20 if mine else 2):
+            events.append({
+                "shipment_id": shipment_id, "event_type": "check_call",
+                "event_timestamp": now - timedelta(hours=j), "location_city": "Tulsa", "location_state": "OK",
+            })
+        if i % 200 == 0 or i < 100:
+            tenders.append({
+                "shipment_id": shipment_id,
+                "carrier_id": carrier_id if i % 2 == 0 else ObjectId(),
+                "status": "sent",
+                "offered_rate": 150000,
+                "created_at": now - timedelta(minutes=i),
+            })
+
+    await db.shipments.insert_many(shipment_docs)
+    for k in range(0, len(events), 10000):
+        await db.tracking_events.insert_many(events[k:k + 10000])
+    await db.tenders.insert_many(tenders)
+    await ensure_indexes()
+    return customer_id, carrier_id
+
+
+async def legacy_tracking_dashboard(db, customer_id) -> int:
+    shipments = await db.shipments.find(
+        {"customer_id": customer_id, "status": {"$in": ACTIVE_STATUSES}}
+    ).sort("created_at", -1).to_list(100)
+    for s in shipments:
+        await db.tracking_events.find_one({"shipment_id": s["_id"]}, sort=[("event_timestamp", -1)])
+    return len(shipments)
+
+
+async def current_tracking_dashboard(db, customer_id) -> int:
+    shipments = await db.portal_shipments.find(
+        {"customer_id": customer_id, "status": {"$in": ACTIVE_STATUSES}}
+    ).sort("created_at", -1).to_list(100)
+    for s in shipments:
+        eta_confidence(s)
+    return len(shipments)
+
+
+async def legacy_available_loads(db, carrier_id) -> int:
+    tenders = await db.tenders.find({"carrier_id": carrier_id, "status": "sent"}).sort("created_at", -1).to_list(100)
+    for tender in tenders:
+        await db.shipments.find_one({"_id": tender["shipment_id"]})
+    return len(tenders)
+
+
+async def current_available_loads(db, carrier_id) -> int:
+    shipments = await db.portal_shipments.find({"open_tenders.carrier_id": carrier_id}).to_list(None)
+    return sum(1 for s in shipments for t in s["open_tenders"] if t["carrier_id"] == carrier_id)
+
+
+async def main(shipments: int, iterations: int) -> None:
+    db = await fresh_database()
+    print(f"Seeding {shipments} shipments...")
+    customer_id, carrier_id = await seed(db, shipments)
+    written = await PortalReadModelService.rebuild()
+    print(f"Built portal_shipments for {written} shipments\n")
+
+    print(f"Rows: dashboard legacy={await legacy_tracking_dashboard(db, customer_id)} "
+          f"current={await current_tracking_dashboard(db, customer_id)}; "
+          f"available loads legacy={await legacy_available_loads(db, carrier_id)} "
+          f"current={await current_available_loads(db, carrier_id)}\n")
+
+    report("dashboard legacy", await time_async(lambda: legacy_tracking_dashboard(db, customer_id), iterations))
+    report("dashboard read model", await time_async(lambda: current_tracking_dashboard(db, customer_id), iterations))
+    report("available loads legacy", await time_async(lambda: legacy_available_loads(db, carrier_id), iterations))
+    report("available loads read model", await time_async(lambda: current_available_loads(db, carrier_id), iterations))
+
+    await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shipments", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.shipments, args.iterations))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark rate lookups before and after the compiled lane index.
+
+Seeds 1,000 active rate tables (one per customer, 50 lanes each with
+weight breaks), then times:
+
+- legacy: the previous ``/rate-tables/lookup`` implementation (load up to
+  1,000 tables, ``customers.find_one`` per table, linear lane scan)
+- index build: ``RateLaneIndex.build`` (paid once per invalidation)
+- index lookup: ``LaneIndex.lookup`` on the built index
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_rate_lookup.py [--tables 1000] [--lanes 50] [--iterations 20]
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from bench_common import fresh_database, report, time_async
+
+from app.services.rate_lane_index import RateLaneIndex
+
+STATES = ["IL", "TX", "CA", "GA", "OH", "PA", "NY", "FL", "WA", "AZ", "CO", "TN"]
+EQUIPMENT = ["van", "reefer", "flatbed"]
+
+
+async def seed(db, tables: int, lanes: int) -> None:
+    now = datetime.utcnow()
+    customers = [{"_id": ObjectId(), "name": f"Customer {i}"} for i in range(tables)]
+    await db.customers.insert_many(customers)
+
+    docs = []
+    for customer in customers:
+        table_lanes = []
+        for _ in range(lanes // 2):
+            origin, dest = random.sample(STATES, 2)
+            equipment = random.choice(EQUIPMENT)
+            table_lanes.append({"origin_state": origin, "dest_state": dest, "equipment_type": equipment,
+                                "max_weight": 19999, "rate_per_mile": random.randint(180, 320)})
+            table_lanes.append({"origin_state": origin, "dest_state": dest, "equipment_type": equipment,
+                                "min_weight": 20000, "rate_per_mile": random.randint(200, 350)})
+        docs.append({
+            "_id": ObjectId(),
+            "customer_id": customer["_id"],
+            "name": f"{customer['name']} contract",
+            "effective_date": now - timedelta(days=30),
+            "expiry_date": now + timedelta(days=random.randint(-10, 365)),
+            "is_active": True,
+            "lanes": table_lanes,
+        })
+    await db.rate_tables.insert_many(docs)
+
+
+async def legacy_lookup(db, origin: str, dest: str, equipment: str, weight: int) -> int:
+    """The previous implementation: every table, one customer find_one each."""
+    now = datetime.utcnow()
+    tables = await db.rate_tables.find({
+        "is_active": True,
+        "$or": [{"expiry_date": None}, {"expiry_date": {"$gte": now}}],
+        "effective_date": {"$lte": now},
+    }).to_list(1000)
+    matches = 0
+    for table in tables:
+        await db.customers.find_one({"_id": table["customer_id"]})
+        for lane in table.get("lanes", []):
+            if lane["origin_state"].upper() != origin.upper():
+                continue
+            if lane["dest_state"].upper() != dest.upper():
+                continue
+            if lane.get("equipment_type", "van").lower() != equipment.lower():
+                continue
+            if lane.get("min_weight") is not None and weight < lane["min_weight"]:
+                continue
+            if lane.get("max_weight") is not None and weight > lane["max_weight"]:
+                continue
+            matches += 1
+    return matches
+
+
+async def main(tables: int, lanes: int, iterations: int) -> None:
+    random.seed(11)
+    db = await fresh_database()
+    print(f"Seeding {tables} rate tables x {lanes} lanes...")
+    await seed(db, tables, lanes)
+
+    queries = [(*random.sample(STATES, 2), random.choice(EQUIPMENT), random.randint(5000, 45000)) for _ in range(200)]
+    index = await RateLaneIndex.get()
+    legacy = sum([await legacy_lookup(db, *q) for q in queries[:5]])
+    current = sum(len(index.lookup(*q)) for q in queries[:5])
+    print(f"Matches on 5 sample queries: legacy={legacy}, index={current}\n")
+
+    def next_query():
+        return random.choice(queries)
+
+    report("legacy (scan + find_one)", await time_async(lambda: legacy_lookup(db, *next_query()), iterations))
+    report("index build", await time_async(RateLaneIndex.build, max(3, iterations // 4)))
+
+    async def indexed():
+        (await RateLaneIndex.get()).lookup(*next_query())
+    report("index lookup", await time_async(indexed, iterations * 100))
+
+    await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=1000)
+    parser.add_argument("--lanes", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.tables, args.lanes, args.iterations))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark multi-stop route optimization: route quality and runtime.
+
+For 10, 50 and 200 random continental-US stops (first and last fixed),
+compares:
+
+- legacy: the previous nearest-neighbour loop recomputing haversine
+  distances pairwise on every step
+- current: ``optimize_stop_order`` (cached distance matrix, nearest
+  neighbour, 2-opt and Or-opt)
+
+then times a batch of loads through ``optimize_many`` (process pool)
+against solving the same batch serially. No database is needed.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_route_optimizer.py [--sizes 10 50 200] [--routes 5] [--batch 32]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import bench_common  # noqa: F401  (puts the backend on sys.path)
+
+from app.services import route_optimizer
+from app.services.route_optimizer import (
+    distance_matrix,
+    haversine_miles,
+    optimize_many,
+    optimize_stop_order,
+    route_distance,
+)
+
+
+def random_stops(n: int) -> list[tuple[float, float]]:
+    return [(random.uniform(29, 47), random.uniform(-122, -72)) for _ in range(n)]
+
+
+def legacy_order(coords: list[tuple[float, float]]) -> list[int]:
+    """The previous implementation: nearest neighbour, first and last fixed."""
+    end = len(coords) - 1
+    current = 0
+    order = [current]
+    remaining = set(range(1, end))
+    while remaining:
+        nearest = min(remaining, key=lambda idx: haversine_miles(*coords[current], *coords[idx]))
+        order.append(nearest)
+        remaining.remove(nearest)
+        current = nearest
+    order.append(end)
+    return order
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+async def main(sizes: list[int], routes: int, batch: int) -> None:
+    random.seed(42)
+    print(f"{'stops':>6} {'legacy miles':>13} {'new miles':>10} {'saved':>7} {'legacy ms':>10} {'new ms':>9} {'cached ms':>10}")
+    for n in sizes:
+        legacy_miles = new_miles = legacy_ms = new_ms = cached_ms = 0.0
+        for _ in range(routes):
+            coords = random_stops(n)
+            route_optimizer._matrix_cache.clear()
+            old, ms = timed(lambda: legacy_order(coords))
+            legacy_ms += ms
+            new, ms = timed(lambda: optimize_stop_order(coords))
+            new_ms += ms
+            _, ms = timed(lambda: distance_matrix(coords))
+            cached_ms += ms
+            matrix = distance_matrix(coords)
+            legacy_miles += route_distance(matrix, old)
+            new_miles += route_distance(matrix, new)
+        print(
+            f"{n:>6} {legacy_miles / routes:>13.0f} {new_miles / routes:>10.0f} "
+            f"{1 - new_miles / legacy_miles:>7.1%} {legacy_ms / routes:>10.2f} {new_ms / routes:>9.2f} "
+            f"{cached_ms / routes:>10.3f}"
+        )
+
+    jobs = [(random_stops(random.choice(sizes)), True, True) for _ in range(batch)]
+    route_optimizer._matrix_cache.clear()
+    _, serial_ms = timed(lambda: [optimize_stop_order(*job) for job in jobs])
+    route_optimizer._matrix_cache.clear()
+    await optimize_many(jobs[:route_optimizer.ROUTE_POOL_WORKERS])  # start the workers
+    start = time.perf_counter()
+    await optimize_many(jobs)
+    pool_ms = (time.perf_counter() - start) * 1000
+    route_optimizer.shutdown_pool()
+    print(f"\nbatch of {batch} loads: serial {serial_ms:.0f} ms, "
+          f"process pool ({route_optimizer.ROUTE_POOL_WORKERS} workers) {pool_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--routes", type=int, default=5, help="Random routes per size")
+    parser.add_argument("--batch", type=int, default=32, help="Loads in the batch run")
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.routes, args.batch))
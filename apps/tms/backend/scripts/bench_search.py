@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark unified search and identifier typeahead.
+
+Seeds shipments, customers and carriers with overlapping search terms and
+times:
+
+- legacy: the previous sequential search (per collection: a ``count_documents``
+  with ``$text`` plus a ``find``)
+- federated: ``unified_search`` (collections concurrently, one ``$facet``
+  aggregation each, totals cached per query), first page and a later page
+- typeahead: anchored prefix lookups on shipment numbers, MC/DOT numbers and
+  customer codes
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_search.py [--shipments 50000] [--iterations 200]
+"""
+
+import argparse
+import asyncio
+import random
+
+from bson import ObjectId
+
+from bench_common import fresh_database, report, time_async
+
+from app.api.v1.search import _SEARCHABLE_COLLECTIONS, _total_cache, typeahead, unified_search
+from app.utils.seed import ensure_indexes
+
+CITIES = ["Chicago", "Dallas", "Atlanta", "Denver", "Memphis", "Phoenix", "Columbus", "Reno"]
+WORDS = ["Acme", "Summit", "Prairie", "Harbor", "Eagle", "Pioneer", "Keystone", "Frontier"]
+
+
+async def seed(db, shipments: int) -> None:
+    await db.customers.insert_many([
+        {"name": f"{random.choice(WORDS)} {random.choice(CITIES)} Foods", "code": f"C{i:05d}", "city": random.choice(CITIES)}
+        for i in range(shipments // 20)
+    ])
+    await db.carriers.insert_many([
+        {"name": f"{random.choice(WORDS)} Freight {i}", "mc_number": f"MC-{100000 + i}", "dot_number": f"{2000000 + i}"}
+        for i in range(shipments // 10)
+    ])
+    for start in range(0, shipments, 5000):
+        await db.shipments.insert_many([
+            {
+                "_id": ObjectId(),
+                "shipment_number": f"S-2026-{i:05d}",
+                "commodity": f"{random.choice(WORDS)} goods",
+                "stops": [{"city": random.choice(CITIES)}, {"city": random.choice(CITIES)}],
+            }
+            for i in range(start, min(start + 5000, shipments))
+        ])
+
+
+async def legacy_search(db, q: str, limit: int = 30) -> None:
+    """The previous implementation: a count and a find per collection, one after another."""
+    for meta in _SEARCHABLE_COLLECTIONS.values():
+        collection = db[meta["collection"]]
+        await collection.count_documents({"$text": {"$search": q}})
+        await collection.find(
+            {"$text": {"$search": q}}, {"score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(limit)
+
+
+async def main(shipments: int, iterations: int) -> None:
+    random.seed(13)
+    db = await fresh_database()
+    await ensure_indexes()
+    await seed(db, shipments)
+    print(f"Seeded {shipments} shipments plus customers and carriers\n")
+
+    try:
+        queries = [random.choice(WORDS + CITIES).lower() for _ in range(iterations + 1)]
+        sample = iter(queries)
+        report("legacy search", await time_async(lambda: legacy_search(db, next(sample)), iterations))
+
+        _total_cache.clear()
+        sample = iter(queries)
+        report("federated (cold counts)", await time_async(
+            lambda: unified_search(q=next(sample), type="all", limit=30, cursor=None), iterations
+        ))
+        first = await unified_search(q="acme", type="all", limit=30, cursor=None)
+        report("federated page 2", await time_async(
+            lambda: unified_search(q="acme", type="all", limit=30, cursor=first.next_cursor), iterations
+        ))
+
+        prefixes = iter(random.choice(["S-2026-0", "S-2026-12", "MC-1001", "20001", "C000"]) for _ in range(iterations + 1))
+        report("typeahead", await time_async(lambda: typeahead(q=next(prefixes), limit=8), iterations))
+    finally:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shipments", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.shipments, args.iterations))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Load test WebSocket fan-out with 2,000 simulated clients.
+
+Each simulated client is an in-process socket whose ``send_text`` takes a
+small random delay (a configurable fraction are "slow" clients, e.g. on a
+bad mobile link). Events carry their publish time, and every delivery
+records end-to-end latency (publish -> client receive). Compares:
+
+- legacy: the previous broadcast, awaiting each socket in turn, every
+  client receiving every event
+- topics: ``ConnectionManager`` with per-connection queues; 10% of clients
+  stay on ``global``, the rest subscribe to one shipment topic
+
+No database is needed.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/bench_websocket_fanout.py [--clients 2000] [--events 200] [--legacy-events 10] [--slow 0.02]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+
+from bench_common import report
+
+from app.services.websocket_manager import ConnectionManager
+
+
+class SimulatedClient:
+    """Stands in for a Starlette WebSocket."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.latencies: list[float] = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(self.delay)
+        published = json.loads(message)["data"]["published"]
+        self.latencies.append((time.perf_counter() - published) * 1000)
+
+
+def make_clients(n: int, slow_fraction: float) -> list[SimulatedClient]:
+    return [
+        SimulatedClient(0.05 if random.random() < slow_fraction else random.uniform(0, 0.001))
+        for _ in range(n)
+    ]
+
+
+async def legacy_broadcast(clients: list[SimulatedClient], event_type: str, data: dict):
+    """The previous implementation: serialize, then await every socket in turn."""
+    message = json.dumps({"event": event_type, "data": data, "timestamp": datetime.utcnow().isoformat()}, default=str)
+    for client in clients:
+        await client.send_text(message)
+
+
+async def run_legacy(clients, shipments: list[str], events: int, interval: float) -> float:
+    start = time.perf_counter()
+    for _ in range(events):
+        data = {"shipment_id": random.choice(shipments), "published": time.perf_counter()}
+        await legacy_broadcast(clients, "tracking_update", data)
+        await asyncio.sleep(interval)
+    return time.perf_counter() - start
+
+
+async def run_topics(clients, shipments: list[str], events: int, interval: float) -> tuple[float, dict]:
+    manager = ConnectionManager()
+    for i, client in enumerate(clients):
+        topics = None if i % 10 == 0 else [f"shipment:{random.choice(shipments)}"]
+        await manager.connect(client, topics)
+
+    start = time.perf_counter()
+    for _ in range(events):
+        data = {"shipment_id": random.choice(shipments), "published": time.perf_counter()}
+        await manager.broadcast("tracking_update", data)
+        await asyncio.sleep(interval)
+    publish_time = time.perf_counter() - start
+
+    # Let writers drain before reading latencies
+    while any(c.pending for c in manager.connections.values()):
+        await asyncio.sleep(0.01)
+    stats = manager.stats()
+    for client in clients:
+        manager.disconnect(client)
+    return publish_time, stats
+
+
+def summarize(label: str, clients: list[SimulatedClient]) -> None:
+    fast = [lat for c in clients if c.delay < 0.05 for lat in c.latencies]
+    every = [lat for c in clients for lat in c.latencies]
+    if every:
+        report(f"{label} (all clients)", every)
+    if fast:
+        report(f"{label} (fast clients)", fast)
+
+
+async def main(n_clients: int, events: int, legacy_events: int, slow: float, interval_ms: float) -> None:
+    random.seed(7)
+    shipments = [f"{i:024x}" for i in range(n_clients // 4)]
+    interval = interval_ms / 1000
+
+    print(f"{n_clients} clients, {events} events, {slow:.0%} slow clients (50 ms/send)\n")
+
+    legacy_clients = make_clients(n_clients, slow)
+    legacy_elapsed = await run_legacy(legacy_clients, shipments, legacy_events, interval)
+    print(f"legacy: published {legacy_events} events in {legacy_elapsed:.2f}s")
+    summarize("legacy", legacy_clients)
+
+    topic_clients = make_clients(n_clients, slow)
+    topic_elapsed, stats = await run_topics(topic_clients, shipments, events, interval)
+    print(f"\ntopics: published {events} events in {topic_elapsed:.2f}s, manager stats {stats}")
+    summarize("topics", topic_clients)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--legacy-events", type=int, default=10, help="Events for the (slow) legacy run")
+    parser.add_argument("--slow", type=float, default=0.02, help="Fraction of slow clients")
+    parser.add_argument("--interval-ms", type=float, default=5.0, help="Delay between published events")
+    args = parser.parse_args()
+    asyncio.run(main(args.clients, args.events, args.legacy_events, args.slow, args.interval_ms))
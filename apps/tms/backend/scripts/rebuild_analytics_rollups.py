@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Backfill or rebuild the daily analytics rollups from shipments and tenders.
+
+Rollups are kept current on every shipment/tender write; run this once after
+deploying them, or to repair drift (e.g. after a bulk data fix applied
+directly in MongoDB).
+
+Usage:
+    cd apps/tms/backend
+    python scripts/rebuild_analytics_rollups.py            # full rebuild
+    python scripts/rebuild_analytics_rollups.py --days 35  # last 35 days only
+
+Environment variables (set via .env or export):
+    MONGODB_URL, DATABASE_NAME: same settings the API uses
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import connect_to_mongo, close_mongo_connection  # noqa: E402
+from app.services.analytics_rollups import AnalyticsRollupService  # noqa: E402
+
+
+async def main(days: int | None) -> None:
+    await connect_to_mongo()
+    try:
+        since = datetime.utcnow() - timedelta(days=days) if days else None
+        counts = await AnalyticsRollupService.rebuild(since=since)
+        scope = f"last {days} days" if days else "all history"
+        print(
+            f"Rebuilt rollups for {scope}: {counts['shipments']} shipments, "
+            f"{counts['tenders']} tenders -> {counts['rows']} rows"
+        )
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=None, help="Only rebuild this many trailing days")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    asyncio.run(main(args.days))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Backfill or rebuild the open-exception index from source data.
+
+The index is kept current on every shipment, tender, invoice and carrier
+write and built automatically on first read; run this to repair drift.
+Exits with status 1 if another rebuild is already running.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/rebuild_exception_index.py
+
+Environment variables (set via .env or export):
+    MONGODB_URL, DATABASE_NAME: same settings the API uses
+"""
+
+import asyncio
+import logging
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import connect_to_mongo, close_mongo_connection  # noqa: E402
+from app.services.exception_detection import ExceptionDetectionService  # noqa: E402
+
+
+async def main() -> None:
+    await connect_to_mongo()
+    try:
+        counts = await ExceptionDetectionService.rebuild()
+        if counts is None:
+            print("Another exception index rebuild is already running", file=sys.stderr)
+            sys.exit(1)
+        print("Rebuilt exception index: " + ", ".join(f"{kind}={n}" for kind, n in counts.items()))
+        for name, m in ExceptionDetectionService.metrics().items():
+            print(f"  {name:<24} {m['total_ms']:9.1f} ms over {m['entities']} entities")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
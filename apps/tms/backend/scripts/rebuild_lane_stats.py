@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Backfill or rebuild carrier lane statistics from shipments.
+
+Lane statistics are kept current on every shipment write; run this once after
+deploying them, or to repair drift.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/rebuild_lane_stats.py
+
+Environment variables (set via .env or export):
+    MONGODB_URL, DATABASE_NAME: same settings the API uses
+"""
+
+import asyncio
+import logging
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import connect_to_mongo, close_mongo_connection  # noqa: E402
+from app.services.lane_stats import LaneStatsService  # noqa: E402
+
+
+async def main() -> None:
+    await connect_to_mongo()
+    try:
+        counts = await LaneStatsService.rebuild()
+        print(f"Rebuilt lane stats: {counts['shipments']} shipments -> {counts['rows']} rows")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
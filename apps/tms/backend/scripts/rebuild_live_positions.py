@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Backfill the live-map positions (``latest_positions``) from recent tracking
+events and driver check-ins.
+
+Positions are kept current as they are reported; run this once after
+deploying the collection, or to repair drift.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/rebuild_live_positions.py [--max-age-hours 24]
+
+Environment variables (set via .env or export):
+    MONGODB_URL, DATABASE_NAME: same settings the API uses
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import connect_to_mongo, close_mongo_connection  # noqa: E402
+from app.services.live_position_service import LivePositionService  # noqa: E402
+
+
+async def main(max_age_hours: int) -> None:
+    await connect_to_mongo()
+    try:
+        written = await LivePositionService.rebuild_from_history(max_age_hours=max_age_hours)
+        print(f"Rebuilt live positions for {written} shipments")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-age-hours", type=int, default=24, help="ignore positions older than this")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    asyncio.run(main(args.max_age_hours))
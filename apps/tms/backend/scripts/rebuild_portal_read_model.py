@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Backfill or rebuild the portal read model (``portal_shipments``) from
+shipments, tracking events and tenders.
+
+The read model is kept current on every shipment, tender and tracking event
+write; run this once after deploying it, or to repair drift.
+
+Usage:
+    cd apps/tms/backend
+    python scripts/rebuild_portal_read_model.py
+
+Environment variables (set via .env or export):
+    MONGODB_URL, DATABASE_NAME: same settings the API uses
+"""
+
+import asyncio
+import logging
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import connect_to_mongo, close_mongo_connection  # noqa: E402
+from app.services.portal_read_model import PortalReadModelService  # noqa: E402
+
+
+async def main() -> None:
+    await connect_to_mongo()
+    try:
+        count = await PortalReadModelService.rebuild()
+        print(f"Rebuilt portal read model: {count} shipments")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""Tests for server-side AR/AP aging and aging snapshots."""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.services.aging import AR_BUCKETS, AgingService, _assemble
+
+
+def _invoice(customer_id, days_past, total=10000, paid=0, status="sent"):
+    return {
+        "invoice_number": f"INV-{ObjectId()}",
+        "customer_id": customer_id,
+        "billing_name": "Acme",
+        "status": status,
+        "total": total,
+        "amount_paid": paid,
+        "invoice_date": datetime.utcnow() - timedelta(days=days_past + 30),
+        "due_date": datetime.utcnow() - timedelta(days=days_past, hours=1),
+    }
+
+
+class TestAssemble:
+    """Tests for turning facet rows into report buckets and entity totals."""
+
+    def test_entities_merge_buckets_and_sort(self):
+        a, b = ObjectId(), ObjectId()
+        facets = {
+            "buckets": [{"_id": "current", "total_amount": 500, "count": 2, "items": []}],
+            "entities": [
+                {"_id": {"entity": a, "bucket": "current"}, "total": 100, "count": 1, "name": "A"},
+                {"_id": {"entity": b, "bucket": "current"}, "total": 300, "count": 1, "name": "B"},
+                {"_id": {"entity": a, "bucket": "120_plus"}, "total": 400, "count": 2, "name": "A"},
+            ],
+        }
+        buckets, entities = _assemble(facets, AR_BUCKETS, "invoice_count", {}, "")
+
+        assert [b["bucket"] for b in buckets] == [key for key, _, _ in AR_BUCKETS]
+        assert buckets[-1]["count"] == 0
+        assert entities[0]["entity_id"] == str(a)
+        assert entities[0]["total_outstanding"] == 500
+        assert entities[0]["invoice_count"] == 3
+        assert entities[0]["past_due_120_plus"] == 400
+
+
+class TestAgingReports:
+    """Tests for the aging endpoints against the database."""
+
+    @pytest.mark.asyncio
+    async def test_ar_buckets_and_entities(self, client: AsyncClient, test_db):
+        acme, globex = ObjectId(), ObjectId()
+        await test_db.invoices.insert_many([
+            _invoice(acme, -5),
+            _invoice(acme, 10, total=20000, paid=5000, status="partial"),
+            _invoice(acme, 45),
+            _invoice(globex, 200),
+            _invoice(globex, 30, total=100, paid=100),   # nothing due
+            _invoice(globex, 30, status="paid"),         # not open
+        ])
+
+        response = await client.get("/api/v1/billing/aging-report")
+        assert response.status_code == 200
+        body = response.json()
+        buckets = {b["bucket"]: b for b in body["buckets"]}
+
+        assert body["total_count"] == 4
+        assert body["total_outstanding"] == 45000
+        assert buckets["current"]["count"] == 1
+        assert buckets["1_30"]["total_amount"] == 15000
+        assert buckets["31_60"]["items"][0]["days_past_due"] == 45
+        assert buckets["120_plus"]["count"] == 1
+        assert body["by_entity"][0]["entity_id"] == str(acme)
+        assert body["by_entity"][0]["invoice_count"] == 3
+
+    @pytest.mark.asyncio
+    async def test_ap_cash_flow_and_carrier_names(self, client: AsyncClient, test_db):
+        carrier_id = ObjectId()
+        await test_db.carriers.insert_one({"_id": carrier_id, "name": "Fast Freight"})
+        now = datetime.utcnow()
+        await test_db.carrier_bills.insert_many([
+            {"carrier_id": carrier_id, "bill_number": "B1", "amount": 1000, "status": "approved",
+             "received_date": now, "due_date": now + timedelta(days=2)},
+            {"carrier_id": carrier_id, "bill_number": "B2", "amount": 2000, "status": "received",
+             "received_date": now, "due_date": now + timedelta(days=9)},
+            {"carrier_id": carrier_id, "bill_number": "B3", "amount": 4000, "status": "matched",
+             "received_date": now - timedelta(days=70), "due_date": now - timedelta(days=40)},
+        ])
+
+        response = await client.get("/api/v1/carrier-payables/aging-report")
+        assert response.status_code == 200
+        body = response.json()
+
+        assert body["total_outstanding"] == 7000
+        assert body["by_carrier"][0]["entity_name"] == "Fast Freight"
+        assert body["by_carrier"][0]["past_due_31_60"] == 4000
+        assert [w["expected_outflow"] for w in body["cash_flow_projection"][:3]] == [1000, 2000, 0]
+
+    @pytest.mark.asyncio
+    async def test_snapshot_round_trip(self, client: AsyncClient, test_db):
+        await test_db.invoices.insert_one(_invoice(ObjectId(), 10))
+
+        taken = await client.post("/api/v1/billing/aging-snapshots", params={"report_type": "ar"})
+        assert taken.status_code == 200
+        as_of = taken.json()["as_of_date"]
+
+        # Paid after the snapshot; the snapshot keeps month-end figures
+        await test_db.invoices.update_many({}, {"$set": {"status": "paid"}})
+        snapshot = await client.get("/api/v1/billing/aging-report", params={"as_of": as_of})
+        assert snapshot.status_code == 200
+        assert snapshot.json()["total_outstanding"] == 10000
+
+        missing = await client.get("/api/v1/billing/aging-report", params={"as_of": "2001-01-31"})
+        assert missing.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_snapshot_stores_entities_separately(self, test_db):
+        acme, globex = ObjectId(), ObjectId()
+        await test_db.invoices.insert_many([_invoice(acme, 10), _invoice(acme, 40), _invoice(globex, 5, total=5000)])
+
+        await AgingService.take_snapshot("ar")
+        taken = await AgingService.take_snapshot("ar")
+
+        stored = await test_db.aging_snapshots.find_one({"_id": taken["_id"]})
+        assert "by_entity" not in stored["report"] and stored["entity_count"] == 2
+        assert await test_db.aging_snapshot_entities.count_documents({"snapshot_id": taken["_id"]}) == 2
+
+        report = await AgingService.get_snapshot("ar", datetime.fromisoformat(taken["as_of_date"]).date())
+        assert [e["entity_id"] for e in report["by_entity"]] == [str(acme), str(globex)]
+        assert report["by_entity"][0]["invoice_count"] == 2
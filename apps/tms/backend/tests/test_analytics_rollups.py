@@ -0,0 +1,100 @@
+"""Tests for the daily analytics rollups behind the margin and carrier dashboards."""
+import pytest
+from datetime import datetime
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.services.analytics_rollups import _row_deltas, shipment_rows, tender_rows
+
+
+def _shipment(**overrides):
+    doc = {
+        "_id": ObjectId(),
+        "customer_id": ObjectId(),
+        "carrier_id": ObjectId(),
+        "status": "booked",
+        "customer_price": 100000,
+        "carrier_cost": 85000,
+        "stops": [{"city": "Chicago", "state": "IL"}, {"city": "Dallas", "state": "TX"}],
+        "created_at": datetime(2026, 3, 14, 15, 30),
+    }
+    doc.update(overrides)
+    return doc
+
+
+class TestShipmentRows:
+    """Tests for shipment_rows contribution math."""
+
+    def test_priced_shipment_feeds_customer_lane_and_carrier(self):
+        rows = {r["dimension"]: r for r in shipment_rows(_shipment())}
+        assert set(rows) == {"customer", "lane", "carrier"}
+        assert rows["lane"]["key"] == "Chicago, IL|Dallas, TX"
+        assert all(r["day"] == "2026-03-14" for r in rows.values())
+        assert rows["customer"]["metrics"]["revenue"] == 100000
+        assert rows["carrier"]["metrics"]["priced_cost"] == 85000
+
+    def test_low_margin_flagged_from_price_and_cost(self):
+        rows = shipment_rows(_shipment(customer_price=100000, carrier_cost=95000))
+        assert rows[0]["metrics"]["low_margin_count"] == 1
+        rows = shipment_rows(_shipment(customer_price=100000, carrier_cost=80000))
+        assert rows[0]["metrics"]["low_margin_count"] == 0
+
+    def test_unpriced_shipment_only_counts_for_carrier(self):
+        rows = shipment_rows(_shipment(customer_price=0))
+        assert [r["dimension"] for r in rows] == ["carrier"]
+        assert rows[0]["metrics"]["priced_count"] == 0
+
+    def test_late_delivery(self):
+        rows = shipment_rows(_shipment(
+            status="delivered",
+            actual_delivery_date=datetime(2026, 3, 16),
+            delivery_date=datetime(2026, 3, 15),
+        ))
+        carrier = next(r for r in rows if r["dimension"] == "carrier")
+        assert carrier["metrics"]["late_count"] == 1
+        assert carrier["metrics"]["on_time_count"] == 0
+
+    def test_tender_rows_count_acceptance(self):
+        rows = tender_rows({"carrier_id": ObjectId(), "status": "accepted", "created_at": datetime(2026, 3, 14)})
+        assert rows[0]["metrics"] == {"tender_count": 1, "tender_accepted": 1, "tender_declined": 0}
+
+
+class TestRowDeltas:
+    """Tests for incremental delta computation."""
+
+    def test_unchanged_contribution_produces_no_writes(self):
+        rows = shipment_rows(_shipment())
+        assert _row_deltas(rows, rows) == {}
+
+    def test_price_change_only_increments_difference(self):
+        doc = _shipment()
+        old = shipment_rows(doc)
+        new = shipment_rows({**doc, "customer_price": 120000})
+        deltas = _row_deltas(old, new)
+        assert {d["metrics"].get("revenue") for d in deltas.values()} == {20000}
+
+    def test_carrier_reassignment_moves_totals(self):
+        doc = _shipment()
+        new_carrier = ObjectId()
+        deltas = _row_deltas(shipment_rows(doc), shipment_rows({**doc, "carrier_id": new_carrier}))
+        assert deltas[f"carrier:{doc['carrier_id']}:2026-03-14"]["metrics"]["shipment_count"] == -1
+        assert deltas[f"carrier:{new_carrier}:2026-03-14"]["metrics"]["shipment_count"] == 1
+
+
+class TestMarginDashboard:
+    """Tests for GET /api/v1/analytics/margins backed by rollups."""
+
+    @pytest.mark.asyncio
+    async def test_margins_reflect_updates(self, client: AsyncClient, created_shipment):
+        response = await client.get("/api/v1/analytics/margins")
+        assert response.status_code == 200
+        summary = response.json()["summary"]
+        assert summary["shipment_count"] == 1
+        assert summary["total_revenue"] == 280000
+
+        await client.patch(f"/api/v1/shipments/{created_shipment['id']}", json={"customer_price": 300000})
+
+        summary = (await client.get("/api/v1/analytics/margins")).json()["summary"]
+        assert summary["shipment_count"] == 1
+        assert summary["total_revenue"] == 300000
+        assert summary["total_margin"] == 100000
@@ -0,0 +1,115 @@
+"""Tests for batch GPS auto-tracking."""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.models.tracking import TrackingEventType
+from app.services.auto_tracking import walk_points
+
+NOW = datetime(2026, 5, 4, 12, 0)
+PICKUP = {"stop_type": "pickup", "latitude": 41.88, "longitude": -87.63}
+DELIVERY = {"stop_type": "delivery", "latitude": 32.78, "longitude": -96.80}
+
+
+def _point(lat, lon, speed, minutes):
+    return {"latitude": lat, "longitude": lon, "speed_mph": speed, "timestamp": (NOW + timedelta(minutes=minutes)).isoformat()}
+
+
+class TestWalkPoints:
+    """Tests for the in-memory auto-tracking state machine."""
+
+    def test_full_journey(self):
+        points = [
+            _point(41.88, -87.63, 0, 0),      # at pickup
+            _point(41.95, -87.70, 45, 30),    # departed
+            _point(38.00, -90.00, 60, 200),   # check call (first auto event was 170 min ago)
+            _point(37.00, -91.00, 60, 260),   # too soon for another
+            _point(32.78, -96.80, 2, 600),    # at delivery
+        ]
+        walk = walk_points(points, "booked", PICKUP, DELIVERY, None, NOW)
+
+        assert [e.event_type for e in walk.events] == [
+            TrackingEventType.ARRIVED_AT_PICKUP,
+            TrackingEventType.DEPARTED_PICKUP,
+            TrackingEventType.CHECK_CALL,
+            TrackingEventType.ARRIVED_AT_DELIVERY,
+        ]
+        assert walk.status == "out_for_delivery"
+        assert walk.status_changed
+
+    def test_check_calls_respect_stored_and_batch_events(self):
+        points = [_point(38.0, -90.0, 60, m) for m in (0, 60, 121, 180, 250)]
+        walk = walk_points(points, "in_transit", PICKUP, DELIVERY, NOW - timedelta(minutes=30), NOW)
+        assert [e.timestamp for e in walk.events] == [NOW + timedelta(minutes=121), NOW + timedelta(minutes=250)]
+        assert not walk.status_changed
+
+    def test_aware_timestamps_compare_as_utc(self):
+        point = {"latitude": 38.0, "longitude": -90.0, "speed_mph": 60, "timestamp": "2026-05-04T13:00:00+02:00"}
+        walk = walk_points([point], "in_transit", PICKUP, DELIVERY, NOW - timedelta(hours=2), NOW)
+        assert walk.events == []
+
+
+class TestAutoTrackingEndpoints:
+    """Tests for the single-shipment and bulk auto-update endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_bulk_update_commits_all_shipments(self, client: AsyncClient, test_db):
+        booked = {"_id": ObjectId(), "shipment_number": "S-2026-00001", "status": "booked", "stops": [PICKUP, DELIVERY]}
+        moving = {"_id": ObjectId(), "shipment_number": "S-2026-00002", "status": "in_transit", "stops": [PICKUP, DELIVERY]}
+        await test_db.shipments.insert_many([booked, moving])
+
+        points = [
+            {"shipment_id": str(booked["_id"]), **_point(41.88, -87.63, 0, 0)},
+            {"shipment_id": str(moving["_id"]), **_point(38.0, -90.0, 60, 0)},
+            {"shipment_id": str(booked["_id"]), **_point(41.95, -87.70, 45, 30)},
+            {"shipment_id": "not-an-id", **_point(38.0, -90.0, 60, 0)},
+        ]
+        response = await client.post("/api/v1/tracking/auto-update/bulk", json={"points": points})
+        assert response.status_code == 200
+        body = response.json()
+
+        by_id = {r["shipment_id"]: r for r in body["results"]}
+        assert by_id[str(booked["_id"])]["detected_states"] == ["arrived_at_pickup", "departed_pickup"]
+        assert by_id[str(moving["_id"])]["events_generated"] == 1
+        assert body["unknown_shipment_ids"] == ["not-an-id"]
+
+        assert (await test_db.shipments.find_one({"_id": booked["_id"]}))["status"] == "in_transit"
+        assert await test_db.tracking_events.count_documents({"source": "auto_gps"}) == 3
+        assert await test_db.latest_positions.count_documents({}) == 2
+
+    @pytest.mark.asyncio
+    async def test_bulk_update_reports_malformed_points(self, client: AsyncClient, test_db):
+        moving = {"_id": ObjectId(), "shipment_number": "S-2026-00003", "status": "in_transit", "stops": [PICKUP, DELIVERY]}
+        await test_db.shipments.insert_one(moving)
+
+        shipment_id = str(moving["_id"])
+        points = [
+            {"shipment_id": shipment_id, **_point(38.0, -90.0, 60, 0), "timestamp": "yesterday"},
+            {"shipment_id": shipment_id, **_point(38.0, -90.0, 60, 0), "speed_mph": "fast"},
+            {"shipment_id": shipment_id, **_point(38.0, -90.0, 60, 0)},
+        ]
+        response = await client.post("/api/v1/tracking/auto-update/bulk", json={"points": points})
+        assert response.status_code == 200
+        body = response.json()
+
+        assert body["points_rejected"] == 2
+        assert [r["index"] for r in body["rejected_points"]] == [0, 1]
+        assert body["rejected_points"][1]["error"].startswith("speed_mph")
+        assert body["results"][0]["events_generated"] == 1
+
+    @pytest.mark.asyncio
+    async def test_single_update_rejects_malformed_points(self, client: AsyncClient):
+        point = {**_point(38.0, -90.0, 60, 0), "timestamp": "yesterday"}
+        response = await client.post(
+            "/api/v1/tracking/auto-update", json={"shipment_id": str(ObjectId()), "gps_points": [point]}
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_single_update_unknown_shipment(self, client: AsyncClient):
+        response = await client.post(
+            "/api/v1/tracking/auto-update", json={"shipment_id": str(ObjectId()), "gps_points": []}
+        )
+        assert response.status_code == 404
@@ -0,0 +1,105 @@
+"""Tests for compiled automation rules and buffered trigger statistics."""
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from app.models.automation import AutomationRule, AutomationTrigger, RolloutStage
+from app.services import automation_engine
+from app.services.automation_engine import (
+    AutomationRuleCache,
+    compile_condition,
+    evaluate_condition,
+    flush_trigger_stats,
+    process_trigger,
+    record_rule_trigger,
+)
+
+ENTITIES = [
+    {},
+    {"shipment": {"equipment_type": "van", "weight": "2.5", "count": 0}},
+    {"shipment": "not-a-dict"},
+    {"name": "ABCdef", "count": 1},
+]
+FIELDS = ["shipment.equipment_type", "shipment.weight", "shipment.count", "name", "count", "shipment.missing.deep"]
+OPERATORS = ["equals", "not_equals", "greater_than", "less_than", "contains", "in", "starts_with", "unknown"]
+VALUES = [None, 0, 2.5, "2.5", "abc", "van, reefer", ["van", "1"], True]
+
+
+class TestCompiledConditions:
+    """Compiled closures must agree with the interpreted evaluator."""
+
+    def test_matches_evaluate_condition(self):
+        for field, operator, value, entity in itertools.product(FIELDS, OPERATORS, VALUES, ENTITIES):
+            condition = {"field": field, "operator": operator, "value": value}
+            assert compile_condition(condition)(entity) == evaluate_condition(condition, entity)[0], condition
+
+
+class TestTriggerStatsBuffer:
+    """Tests for flushing buffered trigger stats."""
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_the_stats(self, monkeypatch):
+        class _Rules:
+            async def bulk_write(self, ops, ordered=True):
+                raise ConnectionError("primary stepped down")
+
+        monkeypatch.setattr(automation_engine, "get_database", lambda: SimpleNamespace(automation_rules=_Rules()))
+        monkeypatch.setattr(automation_engine, "_pending_stats", {})
+        monkeypatch.setattr(automation_engine, "_pending_events", 0)
+        rule_id = ObjectId()
+
+        record_rule_trigger(rule_id, {"entity_id": "a"})
+        record_rule_trigger(rule_id, {"entity_id": "b"})
+        assert await flush_trigger_stats() == 0
+        record_rule_trigger(rule_id, {"entity_id": "c"})
+
+        stats = automation_engine._pending_stats[rule_id]
+        assert stats["count"] == 3
+        assert [entry["entity_id"] for entry in stats["shadow_log"]] == ["a", "b", "c"]
+        assert automation_engine._pending_events == 3
+
+
+async def _insert_rule(db, **overrides) -> AutomationRule:
+    rule = AutomationRule(
+        name="Notify on delivery",
+        trigger=AutomationTrigger.SHIPMENT_STATUS_CHANGED,
+        conditions=[{"field": "shipment.status", "operator": "equals", "value": "delivered"}],
+        action="auto_approve",
+        enabled=True,
+        **overrides,
+    )
+    await db.automation_rules.insert_one(rule.model_dump_mongo())
+    AutomationRuleCache.invalidate()
+    return rule
+
+
+class TestProcessTrigger:
+    """Tests for process_trigger over the compiled rule cache."""
+
+    @pytest.mark.asyncio
+    async def test_shadow_results_are_flushed_in_bulk(self, test_db):
+        rule = await _insert_rule(test_db, rollout_stage=RolloutStage.SHADOW)
+        entity = {"_id": "abc", "shipment": {"status": "delivered"}}
+
+        for _ in range(3):
+            results = await process_trigger(AutomationTrigger.SHIPMENT_STATUS_CHANGED, entity)
+            assert results[0]["shadow"] is True
+        results = await process_trigger(AutomationTrigger.SHIPMENT_STATUS_CHANGED, {"shipment": {"status": "booked"}})
+        assert results[0]["skipped"] is True
+
+        assert await flush_trigger_stats() == 1
+        doc = await test_db.automation_rules.find_one({"_id": rule.id})
+        assert doc["trigger_count"] == 3
+        assert [entry["entity_id"] for entry in doc["shadow_log"]] == ["abc"] * 3
+
+    @pytest.mark.asyncio
+    async def test_rule_changes_invalidate_the_cache(self, client, test_db):
+        await _insert_rule(test_db, rollout_stage=RolloutStage.FULL)
+        entity = {"shipment": {"status": "delivered"}}
+        assert len(await process_trigger(AutomationTrigger.SHIPMENT_STATUS_CHANGED, entity)) == 1
+
+        rule = (await client.get("/api/v1/automations")).json()[0]
+        await client.post(f"/api/v1/automations/{rule['id']}/toggle")
+        assert await process_trigger(AutomationTrigger.SHIPMENT_STATUS_CHANGED, entity) == []
@@ -0,0 +1,146 @@
+"""Tests for set-based batch invoice generation."""
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.services import batch_invoicing
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _insert_shipments(db, customer_id: str, count: int, status: str = "delivered") -> list:
+    docs = [
+        {
+            "_id": ObjectId(),
+            "shipment_number": f"S-2026-{i:05d}",
+            "customer_id": ObjectId(customer_id),
+            "status": status,
+            "customer_price": 100000 + i,
+            "stops": [{"city": "Chicago", "state": "IL"}, {"city": "Dallas", "state": "TX"}],
+        }
+        for i in range(count)
+    ]
+    await db.shipments.insert_many(docs)
+    return [str(d["_id"]) for d in docs]
+
+
+class TestBatchGenerate:
+    """Tests for POST /api/v1/billing/batch-generate."""
+
+    async def test_classifies_requested_shipments(self, client: AsyncClient, created_customer, test_db):
+        delivered = await _insert_shipments(test_db, created_customer["id"], 2)
+        in_transit = await _insert_shipments(test_db, created_customer["id"], 1, status="in_transit")
+        missing = str(ObjectId())
+
+        response = await client.post("/api/v1/billing/batch-generate", json={
+            "shipment_ids": delivered + in_transit + [missing],
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["created"], data["skipped"], data["errors"]) == (2, 1, 1)
+        assert data["total_processed"] == 4
+
+        numbers = sorted(int(r["invoice_number"].rsplit("-", 1)[1]) for r in data["results"] if r["status"] == "created")
+        assert numbers == [numbers[0], numbers[0] + 1]
+
+        again = (await client.post("/api/v1/billing/batch-generate", json={"shipment_ids": delivered})).json()
+        assert again["created"] == 0
+        assert again["skipped"] == 2
+        assert again["results"][0]["message"].startswith("Already invoiced")
+
+    async def test_consolidates_by_customer(self, client: AsyncClient, created_customer, test_db):
+        await _insert_shipments(test_db, created_customer["id"], 3)
+
+        response = await client.post("/api/v1/billing/batch-generate", json={
+            "customer_id": created_customer["id"],
+            "consolidate_by_customer": True,
+        })
+        data = response.json()
+        assert data["created"] == 3
+        assert len({r["invoice_id"] for r in data["results"]}) == 1
+        assert await test_db.invoices.count_documents({}) == 1
+
+
+class TestBatchJobs:
+    """Tests for background batch invoicing jobs."""
+
+    async def test_job_invoices_every_delivered_shipment(
+        self, client: AsyncClient, created_customer, test_db, monkeypatch
+    ):
+        monkeypatch.setattr(batch_invoicing, "BATCH_CHUNK_SIZE", 2)
+        await _insert_shipments(test_db, created_customer["id"], 5)
+        await _insert_shipments(test_db, created_customer["id"], 1, status="booked")
+
+        response = await client.post("/api/v1/billing/batch-jobs", json={})
+        assert response.status_code == 200
+        job_id = response.json()["id"]
+
+        job = (await client.get(f"/api/v1/billing/batch-jobs/{job_id}")).json()
+        assert job["status"] == "completed"
+        assert (job["created"], job["invoice_count"]) == (5, 5)
+        assert await test_db.invoices.count_documents({}) == 5
+
+    async def test_resume_continues_without_duplicates(
+        self, client: AsyncClient, created_customer, test_db, monkeypatch
+    ):
+        monkeypatch.setattr(batch_invoicing, "BATCH_CHUNK_SIZE", 2)
+        ids = await _insert_shipments(test_db, created_customer["id"], 5)
+        job_id = await batch_invoicing.create_batch_job(None, None, False, False)
+
+        # Simulate a run that stopped after the first chunk
+        await test_db.invoice_batch_jobs.update_one(
+            {"_id": ObjectId(job_id)},
+            {"$set": {"status": "failed", "checkpoint": ObjectId(sorted(ids)[1])}},
+        )
+        await client.post("/api/v1/billing/batch-generate", json={"shipment_ids": sorted(ids)[:2]})
+
+        response = await client.post(f"/api/v1/billing/batch-jobs/{job_id}/resume")
+        assert response.status_code == 200
+
+        job = await test_db.invoice_batch_jobs.find_one({"_id": ObjectId(job_id)})
+        assert job["status"] == "completed"
+        assert job["created"] == 3
+        assert await test_db.invoices.count_documents({}) == 5
+
+    async def test_second_run_is_refused_while_one_holds_the_lease(
+        self, client: AsyncClient, created_customer, test_db
+    ):
+        await _insert_shipments(test_db, created_customer["id"], 2)
+        assert await batch_invoicing.claim_batch_run("other-run")
+
+        response = await client.post("/api/v1/billing/batch-jobs", json={})
+        assert response.status_code == 409
+        assert await test_db.invoice_batch_jobs.count_documents({}) == 0
+        response = await client.post("/api/v1/billing/batch-generate", json={"customer_id": created_customer["id"]})
+        assert response.status_code == 409
+
+        await batch_invoicing.release_batch_run("other-run")
+        response = await client.post("/api/v1/billing/batch-generate", json={"customer_id": created_customer["id"]})
+        assert response.json()["created"] == 2
+        assert await test_db.invoice_batch_locks.count_documents({}) == 0
+
+    async def test_inline_run_stops_when_lease_is_taken_over(
+        self, client: AsyncClient, created_customer, test_db, monkeypatch
+    ):
+        monkeypatch.setattr(batch_invoicing, "BATCH_CHUNK_SIZE", 2)
+        await _insert_shipments(test_db, created_customer["id"], 5)
+        invoice_chunk = batch_invoicing.BatchInvoicer.invoice_chunk
+
+        async def chunk_then_lose_lease(self, shipments):
+            await invoice_chunk(self, shipments)
+            await test_db.invoice_batch_locks.update_one({}, {"$set": {"owner": "other-run"}})
+
+        monkeypatch.setattr(batch_invoicing.BatchInvoicer, "invoice_chunk", chunk_then_lose_lease)
+        response = await client.post("/api/v1/billing/batch-generate", json={"customer_id": created_customer["id"]})
+        assert response.status_code == 409
+        assert await test_db.invoices.count_documents({}) == 2
+
+    async def test_leftover_placeholders_are_numbered(self, test_db):
+        ids = [ObjectId(), ObjectId()]
+        await test_db.invoices.insert_many([
+            {"_id": oid, "invoice_number": f"{batch_invoicing.PENDING_NUMBER_PREFIX}{oid}"} for oid in ids
+        ])
+
+        numbers = await batch_invoicing.number_pending_invoices()
+        assert list(numbers) == ids
+        assert await test_db.invoices.count_documents({"invoice_number": {"$regex": "^INV-"}}) == 2
@@ -0,0 +1,95 @@
+"""Tests for the consolidation suggestion engine."""
+from datetime import datetime, timedelta
+from itertools import count
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.services.consolidation import Load, find_consolidations, ranked_suggestions
+from app.services.route_optimizer import run_in_pool, shutdown_pool
+
+T0 = datetime(2026, 6, 1, 8, 0)
+_numbers = count(1)
+
+
+def _load(hours=0, weight=5000, pallets=4, equipment="van", lane=("IL", "TX"), origin=None, dest=None):
+    n = next(_numbers)
+    return Load(
+        id=ObjectId(), shipment_number=f"S-2026-{n:05d}", equipment_type=equipment,
+        pickup=T0 + timedelta(hours=hours), weight_lbs=weight, pallets=pallets, revenue=100000,
+        origin_state=lane[0], dest_state=lane[1], origin=origin, dest=dest,
+    )
+
+
+def _numbers_of(groups):
+    return [[x.shipment_number for x in g] for g in groups]
+
+
+class TestFindConsolidations:
+    """Tests for bucketing, the pickup window and capacity."""
+
+    def test_window_lane_and_equipment(self):
+        a, b, late = _load(0), _load(30), _load(60)
+        other_lane, reefer = _load(1, lane=("IL", "OH")), _load(2, equipment="reefer")
+        groups = find_consolidations([late, reefer, b, other_lane, a])
+        # late is 60h after a, and reefer/other lane never mix with vans on IL->TX
+        assert _numbers_of(groups) == [[a.shipment_number, b.shipment_number]]
+
+    def test_capacity_splits_groups(self):
+        loads = [_load(h, weight=20000, pallets=8) for h in range(4)]
+        groups = find_consolidations(loads)
+        assert [len(g) for g in groups] == [2, 2]
+
+        pallets = [_load(h, weight=1000, pallets=10) for h in range(3)]
+        assert [len(g) for g in find_consolidations(pallets)] == [2]
+
+    def test_proximity_crosses_state_lines(self):
+        # Gary, IN and Chicago, IL to Dallas and Fort Worth
+        chicago = _load(0, lane=("IL", "TX"), origin=(41.88, -87.63), dest=(32.78, -96.80))
+        gary = _load(5, lane=("IN", "TX"), origin=(41.59, -87.35), dest=(32.75, -97.33))
+        denver = _load(6, lane=("CO", "TX"), origin=(39.74, -104.99), dest=(32.78, -96.80))
+
+        assert find_consolidations([chicago, gary, denver]) == []
+        groups = find_consolidations([chicago, gary, denver], proximity_miles=50)
+        assert _numbers_of(groups) == [[chicago.shipment_number, gary.shipment_number]]
+
+    def test_every_load_grouped_once(self):
+        loads = [_load(h % 100, weight=3000 + h % 7 * 1000) for h in range(2000)]
+        groups = find_consolidations(loads)
+        members = [x.shipment_number for g in groups for x in g]
+        assert len(members) == len(set(members))
+        for group in groups:
+            assert sum(x.weight_lbs for x in group) <= 44000
+            assert (group[-1].pickup - group[0].pickup) <= timedelta(hours=48)
+
+
+    @pytest.mark.asyncio
+    async def test_pool_matches_inline(self):
+        loads = [_load(h % 100, weight=3000 + h % 7 * 1000) for h in range(1500)]
+        try:
+            pooled = await run_in_pool(ranked_suggestions, loads, 48, 0.0, 20)
+        finally:
+            shutdown_pool()
+        assert pooled == ranked_suggestions(loads, 48, 0.0, 20)
+
+
+class TestConsolidationSuggestions:
+    """Tests for the suggestions endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_suggestions_cover_unassigned_booked(self, client: AsyncClient, test_db):
+        stops = [{"stop_type": "pickup", "state": "IL"}, {"stop_type": "delivery", "state": "TX"}]
+        base = {"status": "booked", "carrier_id": None, "stops": stops, "weight_lbs": 8000, "customer_price": 150000}
+        await test_db.shipments.insert_many([
+            {**base, "shipment_number": "S-2026-00001", "pickup_date": T0},
+            {**base, "shipment_number": "S-2026-00002", "pickup_date": T0 + timedelta(hours=20)},
+            {**base, "shipment_number": "S-2026-00003", "pickup_date": T0, "carrier_id": ObjectId()},
+        ])
+
+        response = await client.get("/api/v1/shipments/consolidation-suggestions")
+        assert response.status_code == 200
+        suggestions = response.json()["suggestions"]
+        assert len(suggestions) == 1
+        assert suggestions[0]["shipment_numbers"] == ["S-2026-00001", "S-2026-00002"]
+        assert suggestions[0]["estimated_savings"] == 45000
@@ -0,0 +1,165 @@
+"""Tests for the document processing queue and provider limits."""
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.services import document_queue as queue_module
+from app.services.document_queue import DocumentQueue
+from app.services.provider_limits import ProviderLimiter
+
+
+class TestProviderLimiter:
+    """Tests for concurrency and rate limits."""
+
+    @pytest.mark.asyncio
+    async def test_caps_requests_in_flight(self):
+        limiter = ProviderLimiter(max_concurrent=2, requests_per_minute=0)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with limiter:
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call() for _ in range(8)))
+        assert peak == 2
+        assert limiter.requests == 8
+        assert (limiter.in_flight, limiter.waiting) == (0, 0)
+
+    @pytest.mark.asyncio
+    async def test_spaces_request_starts(self):
+        limiter = ProviderLimiter(max_concurrent=10, requests_per_minute=1200)  # one per 50ms
+        started = time.monotonic()
+        for _ in range(4):
+            async with limiter:
+                pass
+        assert time.monotonic() - started >= 0.14
+
+
+class _Processor:
+    """Fails the first ``failures`` calls."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    async def process_document(self, document_id):
+        self.calls.append(document_id)
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("provider overloaded")
+
+
+class TestDocumentQueue:
+    """Tests for enqueueing, retries and stats."""
+
+    @pytest.fixture
+    def processor(self, monkeypatch):
+        processor = _Processor(failures=1)
+        monkeypatch.setattr(queue_module, "get_document_processor", lambda: processor)
+        monkeypatch.setattr(queue_module, "DOCUMENT_JOB_RETRY_SECONDS", 0)
+        return processor
+
+    @pytest.mark.asyncio
+    async def test_retry_then_done(self, test_db, processor):
+        doc_id = (await test_db.documents.insert_one({"document_type": "pod", "storage_path": "/tmp/x"})).inserted_id
+        queue = DocumentQueue()
+
+        await queue.enqueue(str(doc_id))
+        await queue.enqueue(str(doc_id))
+        assert await test_db.document_jobs.count_documents({"status": "queued"}) == 1
+        doc = await test_db.documents.find_one({"_id": doc_id})
+        assert doc["extraction_status"] == "pending"
+
+        assert await queue.process_next()
+        job = await test_db.document_jobs.find_one({})
+        assert (job["status"], job["attempts"], job["error"]) == ("queued", 1, "provider overloaded")
+
+        assert await queue.process_next()
+        assert not await queue.process_next()
+        job = await test_db.document_jobs.find_one({})
+        assert (job["status"], job["attempts"]) == ("done", 2)
+        assert processor.calls == [str(doc_id), str(doc_id)]
+
+        stats = await queue.stats()
+        assert (stats["queued"], stats["running"], stats["completed"]) == (0, 0, 1)
+
+    @pytest.mark.asyncio
+    async def test_deleted_document_is_cancelled(self, test_db, processor):
+        queue = DocumentQueue()
+        await queue.enqueue(str(ObjectId()))
+        assert await queue.process_next()
+        job = await test_db.document_jobs.find_one({})
+        assert job["status"] == "cancelled"
+        assert processor.calls == []
+
+    @pytest.mark.asyncio
+    async def test_stale_running_job_is_requeued(self, test_db):
+        await test_db.document_jobs.insert_one({
+            "document_id": ObjectId(), "status": "running", "attempts": 1,
+            "enqueued_at": datetime(2026, 1, 1), "started_at": datetime(2026, 1, 1),
+        })
+        assert await DocumentQueue().requeue_stale() == 1
+        assert await test_db.document_jobs.count_documents({"status": "queued"}) == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_job_is_superseded_by_a_queued_one(self, test_db):
+        await test_db.document_jobs.create_index(
+            "document_id", unique=True, partialFilterExpression={"status": "queued"}
+        )
+        doc_id = ObjectId()
+        stale = (await test_db.document_jobs.insert_one({
+            "document_id": doc_id, "status": "running", "attempts": 1,
+            "enqueued_at": datetime(2026, 1, 1), "started_at": datetime(2026, 1, 1),
+        })).inserted_id
+        queue = DocumentQueue()
+        await asyncio.gather(queue.enqueue(str(doc_id)), queue.enqueue(str(doc_id)))
+
+        assert await queue.requeue_stale() == 0
+        assert await test_db.document_jobs.count_documents({"status": "queued"}) == 1
+        assert (await test_db.document_jobs.find_one({"_id": stale}))["status"] == "cancelled"
+
+    @pytest.mark.asyncio
+    async def test_stale_job_out_of_attempts_fails(self, test_db):
+        doc_id = (await test_db.documents.insert_one({"extraction_status": "processing"})).inserted_id
+        await test_db.document_jobs.insert_one({
+            "document_id": doc_id, "status": "running", "attempts": queue_module.DOCUMENT_JOB_MAX_ATTEMPTS,
+            "enqueued_at": datetime(2026, 1, 1), "started_at": datetime(2026, 1, 1),
+        })
+        assert await DocumentQueue().requeue_stale() == 0
+        assert (await test_db.document_jobs.find_one({}))["status"] == "failed"
+        doc = await test_db.documents.find_one({"_id": doc_id})
+        assert (doc["extraction_status"], doc["extraction_error"]) == ("failed", "Interrupted")
+
+    @pytest.mark.asyncio
+    async def test_timeout_marks_document(self, test_db, monkeypatch):
+        class _Slow:
+            async def process_document(self, document_id):
+                await asyncio.sleep(10)
+
+        monkeypatch.setattr(queue_module, "get_document_processor", lambda: _Slow())
+        monkeypatch.setattr(queue_module, "DOCUMENT_JOB_TIMEOUT_SECONDS", 0.01)
+        monkeypatch.setattr(queue_module, "DOCUMENT_JOB_MAX_ATTEMPTS", 1)
+        doc_id = (await test_db.documents.insert_one({"document_type": "pod"})).inserted_id
+        queue = DocumentQueue()
+        await queue.enqueue(str(doc_id))
+
+        assert await queue.process_next()
+        doc = await test_db.documents.find_one({"_id": doc_id})
+        assert (doc["extraction_status"], doc["extraction_error"]) == ("failed", "Timed out")
+
+    @pytest.mark.asyncio
+    async def test_stats_endpoint(self, client: AsyncClient, test_db):
+        await test_db.document_jobs.insert_one({
+            "document_id": ObjectId(), "status": "queued", "attempts": 0,
+            "enqueued_at": datetime.utcnow(), "available_at": datetime.utcnow(),
+        })
+        response = await client.get("/api/v1/documents/processing-queue")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["queued"] == 1
+        assert data["provider"]["max_concurrent"] >= 1
@@ -0,0 +1,118 @@
+"""Tests for content-addressed document storage."""
+import hashlib
+import io
+import os
+import time
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+from starlette.datastructures import UploadFile
+
+from app.models.base import utc_now
+from app.services import document_storage
+from app.services.document_storage import DocumentStorage
+from app.services.exception_detection import ExceptionDetectionService, ExceptionType
+
+POD = b"%PDF-1.4 proof of delivery " * 5000
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_storage, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(document_storage, "STORAGE_CHUNK_BYTES", 4096)
+    return tmp_path
+
+
+class TestDocumentStorage:
+    """Tests for streaming, hashing and deduplication."""
+
+    @pytest.mark.asyncio
+    async def test_identical_uploads_share_one_object(self, upload_dir):
+        first = await DocumentStorage.save_upload(UploadFile(io.BytesIO(POD), filename="pod.pdf"))
+        second = await DocumentStorage.save_upload(UploadFile(io.BytesIO(POD), filename="copy.pdf"))
+        scanned = await DocumentStorage.save_bytes(POD)
+
+        assert first.content_hash == hashlib.sha256(POD).hexdigest()
+        assert first.size_bytes == len(POD)
+        assert (first.deduplicated, second.deduplicated, scanned.deduplicated) == (False, True, True)
+        assert first.path == second.path == scanned.path
+        with open(first.path, "rb") as f:
+            assert f.read() == POD
+        assert os.listdir(upload_dir / "tmp") == []
+
+    @pytest.mark.asyncio
+    async def test_different_content_is_stored_separately(self, upload_dir):
+        a = await DocumentStorage.save_bytes(b"bol")
+        b = await DocumentStorage.save_bytes(b"pod")
+        assert a.path != b.path
+        assert os.path.exists(a.path) and os.path.exists(b.path)
+
+
+class TestDocumentEndpoints:
+    """Tests for upload, ranged download and delete."""
+
+    async def _upload(self, client: AsyncClient, name: str) -> dict:
+        response = await client.post(
+            "/api/v1/documents/upload",
+            files={"file": (name, POD, "application/pdf")},
+            data={"document_type": "pod", "auto_process": "false"},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    @pytest.mark.asyncio
+    async def test_duplicate_upload_download_and_delete(self, client: AsyncClient, test_db, upload_dir):
+        first = await self._upload(client, "pod.pdf")
+        second = await self._upload(client, "pod-again.pdf")
+        assert first["content_hash"] == second["content_hash"] == hashlib.sha256(POD).hexdigest()
+
+        docs = await test_db.documents.find({}).to_list(None)
+        assert len({d["storage_path"] for d in docs}) == 1
+        path = docs[0]["storage_path"]
+
+        response = await client.get(
+            f"/api/v1/documents/{first['id']}/download", headers={"Range": "bytes=0-99"}
+        )
+        assert response.status_code == 206
+        assert response.content == POD[:100]
+        assert response.headers["etag"] == f'"{first["content_hash"]}"'
+
+        # The file survives until the last document referencing it is gone
+        await client.delete(f"/api/v1/documents/{first['id']}")
+        assert os.path.exists(path)
+        assert await test_db.timers.count_documents({}) == 0
+        await client.delete(f"/api/v1/documents/{second['id']}")
+        assert os.path.exists(path)
+
+        # ...and then for the grace period, in case an upload deduped against it
+        timer = await test_db.timers.find_one({"kind": "storage_release"})
+        await DocumentStorage.remove_if_unreferenced(timer["payload"])
+        assert os.path.exists(path)
+        stale = time.time() - document_storage.STORAGE_RELEASE_GRACE_SECONDS - 1
+        os.utime(path, (stale, stale))
+        await DocumentStorage.remove_if_unreferenced(timer["payload"])
+        assert not os.path.exists(path)
+
+    @pytest.mark.asyncio
+    async def test_batch_upload_reevaluates_the_shipment(self, client: AsyncClient, test_db, upload_dir):
+        shipment_id = ObjectId()
+        await test_db.shipments.insert_one({
+            "_id": shipment_id,
+            "shipment_number": "S-2026-00001",
+            "status": "delivered",
+            "carrier_id": ObjectId(),
+            "actual_delivery_date": utc_now(),
+        })
+        await ExceptionDetectionService.rebuild()
+
+        response = await client.post(
+            "/api/v1/documents/batch-upload",
+            files=[("files", ("bol.pdf", b"bill of lading", "application/pdf"))],
+            data={"document_type": "bol", "shipment_id": str(shipment_id), "auto_classify": "false"},
+        )
+        assert response.status_code == 200
+
+        exceptions = await ExceptionDetectionService.detect_all_exceptions()
+        missing = [e for e in exceptions if e["type"] == ExceptionType.DOCUMENT_MISSING]
+        assert [e["data"]["missing_documents"] for e in missing] == [["POD"]]
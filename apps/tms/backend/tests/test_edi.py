@@ -0,0 +1,89 @@
+"""Tests for the streaming EDI X12 parser and bulk ingest."""
+import pytest
+from httpx import AsyncClient
+
+from app.services.edi_parser import (
+    detect_delimiters,
+    iter_transaction_sets,
+    parse_edi_message,
+    parse_transaction_set,
+)
+
+ISA = "ISA*00*          *00*          *ZZ*SENDERID       *ZZ*RECEIVERID     *260314*1200*U*00401*000000123*0*P*:~"
+TENDER_204 = (
+    "ST*204*0001~B2**SCAC**SHIP123*~B2A*00~N1*SH*Acme~N4*Chicago*IL*60601*US~"
+    "S5*1*LD~G62*10*20260315*U*0830~S5*2*UL~SE*9*0001~"
+)
+STATUS_214 = "ST*214*0002~B10*REF1*SHIP123*SCAC~AT7*X6*NS***20260315*1015~MS1*Joplin*MO*US~SE*5*0002~"
+INTERCHANGE = (
+    ISA
+    + "GS*SM*SENDER*RECV*20260314*1200*55*X*004010~" + TENDER_204 + "GE*1*55~"
+    + "GS*QM*SENDER*RECV*20260314*1200*56*X*004010~" + STATUS_214 + "GE*1*56~"
+    + "IEA*2*000000123~"
+)
+
+
+class TestStreamingParser:
+    """Tests for delimiter detection and lazy transaction sets."""
+
+    def test_detects_delimiters_from_isa(self):
+        assert detect_delimiters(ISA) == ("*", "~")
+        assert detect_delimiters(ISA.replace("*", "|").replace("~", "\n")) == ("|", "\n")
+        assert detect_delimiters("ST*204*0001~") is None
+
+    def test_yields_each_set_with_its_envelope(self):
+        sets = list(iter_transaction_sets(INTERCHANGE))
+        assert [ts.transaction_type for ts in sets] == ["204", "214"]
+        assert [ts.envelope["gs_control_number"] for ts in sets] == ["55", "56"]
+        assert all(ts.envelope["isa_control_number"] == "000000123" for ts in sets)
+        assert sets[0].find("S5")[1][2] == "UL"
+
+    def test_chunk_boundaries_do_not_matter(self):
+        chunks = [INTERCHANGE[i:i + 7] for i in range(0, len(INTERCHANGE), 7)]
+        streamed = [parse_transaction_set(ts) for ts in iter_transaction_sets(chunks)]
+        whole = [parse_transaction_set(ts) for ts in iter_transaction_sets(INTERCHANGE)]
+        assert streamed == whole
+
+    def test_set_matches_single_message_parse(self):
+        ts = next(iter_transaction_sets(INTERCHANGE))
+        assert parse_transaction_set(ts) == parse_edi_message(ts.to_raw())
+        parsed = parse_transaction_set(ts)
+        assert parsed["shipment_id"] == "SHIP123"
+        assert [s["reason"] for s in parsed["stops"]] == ["pickup", "delivery"]
+
+    def test_newline_terminated_interchange(self):
+        content = INTERCHANGE.replace("~", "\n")
+        assert [ts.transaction_type for ts in iter_transaction_sets(content)] == ["204", "214"]
+
+
+class TestBulkIngest:
+    """Tests for POST /api/v1/edi/messages/bulk."""
+
+    @pytest.mark.asyncio
+    async def test_stores_one_message_per_set(self, client: AsyncClient):
+        response = await client.post(
+            "/api/v1/edi/messages/bulk",
+            content=INTERCHANGE.encode(),
+            headers={"Content-Type": "application/edi-x12"},
+        )
+        assert response.status_code == 200
+        result = response.json()
+        assert result["stored"] == 2
+        assert result["by_type"] == {"204": 1, "214": 1}
+
+        messages = (await client.get("/api/v1/edi/messages")).json()
+        assert sorted(m["st_control_number"] for m in messages) == ["0001", "0002"]
+
+    @pytest.mark.asyncio
+    async def test_empty_body_rejected(self, client: AsyncClient):
+        response = await client.post("/api/v1/edi/messages/bulk", content=b"")
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_unknown_direction_rejected(self, client: AsyncClient):
+        response = await client.post(
+            "/api/v1/edi/messages/bulk?direction=sideways",
+            content=INTERCHANGE.encode(),
+            headers={"Content-Type": "application/edi-x12"},
+        )
+        assert response.status_code == 422
@@ -0,0 +1,175 @@
+"""Tests for the incremental exception engine."""
+import pytest
+from datetime import datetime, timedelta
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.models.base import utc_now
+from app.services import exception_detection
+from app.services.exception_detection import (
+    ExceptionDetectionService,
+    ExceptionSeverity,
+    ExceptionType,
+    _arm_sweep,
+    _detect_no_carrier,
+    _detect_overdue_check_call,
+)
+
+NOW = datetime(2026, 3, 14, 12, 0)
+
+
+def _shipment(**overrides):
+    doc = {
+        "_id": ObjectId(),
+        "shipment_number": "S-2026-00001",
+        "status": "booked",
+        "carrier_id": None,
+        "customer_price": 100000,
+        "carrier_cost": 80000,
+    }
+    doc.update(overrides)
+    return doc
+
+
+class TestDetectors:
+    """Tests for detector findings and next check times."""
+
+    def test_no_carrier_watches_the_24h_window(self):
+        exc, next_check = _detect_no_carrier(_shipment(pickup_date=NOW + timedelta(hours=30)), NOW, {})
+        assert exc is None
+        assert next_check == NOW + timedelta(hours=6)
+
+        exc, next_check = _detect_no_carrier(_shipment(pickup_date=NOW + timedelta(hours=18)), NOW, {})
+        assert exc["severity"] == ExceptionSeverity.MEDIUM
+        assert next_check == NOW + timedelta(hours=1)
+
+        exc, _ = _detect_no_carrier(_shipment(pickup_date=NOW + timedelta(hours=5)), NOW, {})
+        assert exc["severity"] == ExceptionSeverity.HIGH
+
+    def test_overdue_check_call_escalates(self):
+        recent = _shipment(status="in_transit", last_check_call=NOW - timedelta(hours=1))
+        assert _detect_overdue_check_call(recent, NOW, {}) == (None, NOW + timedelta(hours=3))
+
+        stale = _shipment(status="in_transit", last_check_call=NOW - timedelta(hours=5))
+        exc, _ = _detect_overdue_check_call(stale, NOW, {})
+        assert exc["severity"] == ExceptionSeverity.MEDIUM
+
+        never = _shipment(status="in_transit")
+        exc, _ = _detect_overdue_check_call(never, NOW, {})
+        assert exc["severity"] == ExceptionSeverity.HIGH
+        assert exc["data"]["hours_since_check"] is None
+
+    def test_evaluate_runs_every_detector_and_records_metrics(self):
+        low_margin = _shipment(carrier_cost=95000, carrier_id=ObjectId())
+        exceptions, next_checks = ExceptionDetectionService.evaluate(
+            "shipment", [low_margin], {"pod": set(), "bol": set()}, NOW
+        )
+        assert [e["type"] for e in exceptions] == [ExceptionType.LOW_MARGIN]
+        assert exceptions[0]["source"] == f"shipment:{low_margin['_id']}"
+        assert next_checks == {low_margin["_id"]: None}
+        assert ExceptionDetectionService.metrics()["low_margin"]["entities"] >= 1
+
+
+class TestSweepTimer:
+    """Tests for arming the shared sweep timer."""
+
+    @pytest.mark.asyncio
+    async def test_only_earlier_checks_are_written(self, monkeypatch):
+        scheduled = []
+
+        async def schedule(kind, key, due_at, payload=None, earliest=False):
+            scheduled.append(due_at)
+
+        monkeypatch.setattr(exception_detection.timer_scheduler, "schedule", schedule)
+        monkeypatch.setattr(exception_detection, "_sweep_armed", None)
+        soon = datetime.utcnow() + timedelta(hours=1)
+
+        await _arm_sweep(soon)
+        await _arm_sweep(soon + timedelta(minutes=5))
+        await _arm_sweep(soon)
+        await _arm_sweep(soon - timedelta(minutes=5))
+        await _arm_sweep(soon + timedelta(minutes=5), force=True)
+        assert scheduled == [soon, soon - timedelta(minutes=5), soon + timedelta(minutes=5)]
+
+
+class TestExceptionIndex:
+    """Tests for the persistent open-exception index."""
+
+    @pytest.mark.asyncio
+    async def test_writes_open_and_close_exceptions(self, test_db):
+        shipment = _shipment(carrier_cost=95000, carrier_id=ObjectId(), status="pending_pickup")
+        await test_db.shipments.insert_one(shipment)
+        await ExceptionDetectionService.rebuild()
+
+        summary = await ExceptionDetectionService.get_exception_summary()
+        assert summary["by_type"] == {ExceptionType.LOW_MARGIN: 1}
+
+        await test_db.shipments.update_one({"_id": shipment["_id"]}, {"$set": {"carrier_cost": 50000}})
+        await ExceptionDetectionService.apply_shipment(shipment["_id"])
+        assert (await ExceptionDetectionService.get_exception_summary())["total"] == 0
+
+    @pytest.mark.asyncio
+    async def test_sweep_opens_time_driven_exceptions(self, test_db):
+        shipment = _shipment(status="pending_pickup", carrier_id=ObjectId(), pickup_date=utc_now() + timedelta(hours=2))
+        await test_db.shipments.insert_one(shipment)
+        await ExceptionDetectionService.rebuild()
+        assert await test_db.exceptions_open.count_documents({}) == 0
+
+        # Pretend the pickup time has passed
+        await test_db.shipments.update_one(
+            {"_id": shipment["_id"]}, {"$set": {"pickup_date": utc_now() - timedelta(hours=1)}}
+        )
+        await test_db.exception_watch.update_one(
+            {"_id": f"shipment:{shipment['_id']}"}, {"$set": {"next_check_at": utc_now() - timedelta(minutes=1)}}
+        )
+        exceptions = await ExceptionDetectionService.detect_all_exceptions()
+        assert [e["type"] for e in exceptions] == [ExceptionType.LATE_PICKUP]
+
+    @pytest.mark.asyncio
+    async def test_first_read_does_not_rebuild_while_another_rebuild_runs(self, test_db):
+        kept = {"_id": "low_margin:shipment:1", "type": ExceptionType.LOW_MARGIN, "source": "shipment:1", "detected_at": NOW}
+        await test_db.exceptions_open.insert_one(kept)
+        await test_db.exception_engine_state.insert_one(
+            {"_id": "rebuild_lock", "owner": "other", "lease_until": utc_now() + timedelta(minutes=5)}
+        )
+
+        assert await ExceptionDetectionService.rebuild() is None
+        exceptions = await ExceptionDetectionService.detect_all_exceptions()
+        assert [e["type"] for e in exceptions] == [ExceptionType.LOW_MARGIN]
+        assert await test_db.exception_engine_state.find_one({"_id": "state"}) is None
+
+    @pytest.mark.asyncio
+    async def test_accepting_a_tender_reevaluates_the_cancelled_ones(self, client: AsyncClient, test_db):
+        shipment = _shipment()
+        await test_db.shipments.insert_one(shipment)
+        tenders = [
+            {
+                "_id": ObjectId(),
+                "shipment_id": shipment["_id"],
+                "carrier_id": ObjectId(),
+                "status": "sent",
+                "offered_rate": 80000,
+                "sent_at": utc_now() - timedelta(hours=6),
+            }
+            for _ in range(3)
+        ]
+        await test_db.tenders.insert_many(tenders)
+        await ExceptionDetectionService.rebuild()
+        assert (await ExceptionDetectionService.get_exception_summary())["by_type"] == {
+            ExceptionType.TENDER_NO_RESPONSE: 3
+        }
+
+        response = await client.post(f"/api/v1/tenders/{tenders[0]['_id']}/accept", json={})
+        assert response.status_code == 200
+
+        exceptions = await ExceptionDetectionService.detect_all_exceptions()
+        assert [e for e in exceptions if e["type"] == ExceptionType.TENDER_NO_RESPONSE] == []
+
+    @pytest.mark.asyncio
+    async def test_create_work_items_once_per_entity(self, client: AsyncClient, test_db):
+        await test_db.shipments.insert_one(_shipment(status="in_transit", carrier_id=ObjectId()))
+
+        first = (await client.post("/api/v1/ai/exceptions/create-work-items", json={})).json()
+        second = (await client.post("/api/v1/ai/exceptions/create-work-items", json={})).json()
+        assert first["work_items_created"] == 1
+        assert second["work_items_created"] == 0
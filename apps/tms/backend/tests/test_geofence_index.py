@@ -0,0 +1,101 @@
+"""Tests for the geofence spatial index and transition detection."""
+import random
+
+import pytest
+from bson import ObjectId
+
+from app.models.geofence import Geofence, GeofenceTrigger
+from app.services.geofence_index import GeofenceIndex, IndexedGeofence, SpatialIndex
+from app.services.tracking_service import TrackingService
+
+
+def _fence(lat, lon, radius=500, shipment_id=None, trigger="both"):
+    return IndexedGeofence(
+        id=ObjectId(), shipment_id=shipment_id, name="Dock", geofence_type="facility",
+        trigger=trigger, latitude=lat, longitude=lon, radius_meters=radius,
+    )
+
+
+class TestSpatialIndex:
+    """Tests for grid candidates against a brute-force scan."""
+
+    @pytest.mark.asyncio
+    async def test_grid_finds_every_containing_fence(self):
+        random.seed(14)
+        shipment = ObjectId()
+        fences = [
+            _fence(
+                random.uniform(30, 48), random.uniform(-120, -75), random.choice([200, 2000, 40000]),
+                shipment_id=random.choice([None, None, shipment, ObjectId()]),
+            )
+            for _ in range(2000)
+        ]
+        index = SpatialIndex(fences)
+
+        for _ in range(2000):
+            # Pings near a fence so most tests land inside something
+            near = random.choice(fences)
+            lat = near.latitude + random.uniform(-0.3, 0.3)
+            lon = near.longitude + random.uniform(-0.3, 0.3)
+            expected = {
+                f.id for f in fences
+                if f.shipment_id in (None, shipment) and f.contains(lat, lon)
+            }
+            found = {f.id for f in await index.candidates(shipment, lat, lon) if f.contains(lat, lon)}
+            assert found == expected
+
+    def test_contains_matches_tracking_distance(self):
+        fence = _fence(41.88, -87.63, radius=1000)
+        for lat, lon in [(41.88, -87.63), (41.888, -87.63), (41.8891, -87.63), (41.9, -87.6)]:
+            meters = TrackingService.calculate_distance(lat, lon, 41.88, -87.63) * 1609.34
+            assert fence.contains(lat, lon) == (meters <= 1000)
+
+    def test_model_sets_geojson_location(self):
+        gf = Geofence(name="Dock", latitude=41.88, longitude=-87.63)
+        assert gf.location == {"type": "Point", "coordinates": [-87.63, 41.88]}
+
+
+class TestGeofenceTransitions:
+    """Tests for enter/exit events written by check_geofences."""
+
+    @pytest.fixture(autouse=True)
+    def _reset(self, clean_database):
+        GeofenceIndex.invalidate()
+        GeofenceIndex.reset_states()
+
+    @pytest.mark.asyncio
+    async def test_writes_only_real_transitions(self, test_db):
+        shipment_id = str(ObjectId())
+        gf = Geofence(name="Consignee", latitude=41.88, longitude=-87.63, radius_meters=1000)
+        await test_db.geofences.insert_one(gf.model_dump_mongo())
+
+        pings = [(41.95, -87.63), (41.881, -87.63), (41.882, -87.631), (41.95, -87.63), (41.95, -87.64)]
+        triggered = [await TrackingService.check_geofences(shipment_id, lat, lon) for lat, lon in pings]
+
+        assert [[t["trigger_type"] for t in ts] for ts in triggered] == [[], ["enter"], [], ["exit"], []]
+        assert await test_db.geofence_events.count_documents({}) == 2
+
+    @pytest.mark.asyncio
+    async def test_state_survives_a_restart(self, test_db):
+        shipment_id = str(ObjectId())
+        gf = Geofence(name="Shipper", latitude=33.75, longitude=-84.39, trigger=GeofenceTrigger.EXIT)
+        await test_db.geofences.insert_one(gf.model_dump_mongo())
+
+        assert await TrackingService.check_geofences(shipment_id, 33.75, -84.39) == []
+        # A restart forgets in-memory state; the stored state still has the entry
+        GeofenceIndex.reset_states()
+        exited = await TrackingService.check_geofences(shipment_id, 33.9, -84.39)
+        assert [t["trigger_type"] for t in exited] == ["exit"]
+
+    @pytest.mark.asyncio
+    async def test_stale_process_does_not_repeat_a_transition(self, test_db):
+        shipment_id = str(ObjectId())
+        gf = Geofence(name="Consignee", latitude=41.88, longitude=-87.63, radius_meters=1000)
+        await test_db.geofences.insert_one(gf.model_dump_mongo())
+
+        entered = await TrackingService.check_geofences(shipment_id, 41.881, -87.63)
+        assert [t["trigger_type"] for t in entered] == ["enter"]
+        # Another process still believes the shipment is outside
+        GeofenceIndex.set_inside(ObjectId(shipment_id), set())
+        assert await TrackingService.check_geofences(shipment_id, 41.881, -87.63) == []
+        assert await test_db.geofence_events.count_documents({}) == 1
@@ -0,0 +1,82 @@
+"""Tests for the carrier lane statistics used by carrier matching."""
+from datetime import datetime
+from bson import ObjectId
+
+from app.models.carrier import EquipmentType
+from app.services.lane_stats import LaneTable, _lane_updates, lane_stat_row
+
+
+def _shipment(**overrides):
+    doc = {
+        "_id": ObjectId(),
+        "carrier_id": ObjectId(),
+        "status": "delivered",
+        "equipment_type": "van",
+        "carrier_cost": 200000,
+        "stops": [{"state": "IL"}, {"state": "TX"}],
+        "delivered_at": datetime(2026, 3, 16),
+        "scheduled_delivery": datetime(2026, 3, 17),
+        "created_at": datetime(2026, 3, 14),
+    }
+    doc.update(overrides)
+    return doc
+
+
+class TestLaneStatRow:
+    """Tests for lane_stat_row contribution."""
+
+    def test_delivered_shipment(self):
+        row = lane_stat_row(_shipment())
+        assert (row["origin_state"], row["destination_state"], row["equipment_type"]) == ("IL", "TX", "van")
+        assert row["metrics"] == {
+            "delivered_count": 1,
+            "in_transit_count": 0,
+            "cost_total": 200000,
+            "cost_count": 1,
+            "on_time_count": 1,
+        }
+
+    def test_in_transit_counts_as_experience_only(self):
+        row = lane_stat_row(_shipment(status="in_transit"))
+        assert row["metrics"]["in_transit_count"] == 1
+        assert row["metrics"]["cost_count"] == 0
+        assert row["last_load_date"] is None
+
+    def test_other_statuses_and_unassigned_have_no_row(self):
+        assert lane_stat_row(_shipment(status="booked")) is None
+        assert lane_stat_row(_shipment(carrier_id=None)) is None
+
+
+class TestLaneUpdates:
+    """Tests for incremental lane stat updates."""
+
+    def test_delivery_moves_load_from_in_transit(self):
+        doc = _shipment(status="in_transit")
+        updates = _lane_updates(lane_stat_row(doc), lane_stat_row({**doc, "status": "delivered"}))
+        (update,) = updates.values()
+        assert update._doc["$inc"]["metrics.in_transit_count"] == -1
+        assert update._doc["$inc"]["metrics.delivered_count"] == 1
+
+    def test_unchanged_shipment_writes_nothing(self):
+        row = lane_stat_row(_shipment())
+        assert _lane_updates(row, row) == {}
+
+
+class TestLaneTable:
+    """Tests for scoring lookups over a lane table."""
+
+    def test_sums_carrier_across_equipment_and_averages_rate(self):
+        carrier_id = str(ObjectId())
+        rows = [
+            {"carrier_id": carrier_id, "equipment_type": "van",
+             "metrics": {"delivered_count": 2, "in_transit_count": 1, "cost_total": 400000, "cost_count": 2}},
+            {"carrier_id": carrier_id, "equipment_type": "reefer",
+             "metrics": {"delivered_count": 1, "cost_total": 300000, "cost_count": 1}},
+            {"carrier_id": str(ObjectId()), "equipment_type": "van",
+             "metrics": {"delivered_count": 1, "cost_total": 200000, "cost_count": 1}},
+        ]
+        table = LaneTable.from_rows(rows)
+        assert table.carrier(carrier_id).loads == 4
+        assert table.carrier(str(ObjectId())).loads == 0
+        assert table.avg_rate_per_mile(EquipmentType.VAN) == 200000 / 100 / 500
+        assert table.avg_rate_per_mile("reefer") is None  # fewer than 3 priced loads
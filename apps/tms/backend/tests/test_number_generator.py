@@ -0,0 +1,48 @@
+"""Tests for the leasing sequence allocator."""
+import asyncio
+
+import pytest
+
+from app.services.number_generator import NumberGenerator
+
+
+@pytest.fixture(autouse=True)
+def fresh_leases():
+    NumberGenerator.reset_leases()
+    yield
+    NumberGenerator.reset_leases()
+
+
+class TestNumberGenerator:
+    """Tests for NumberGenerator allocation modes."""
+
+    @pytest.mark.asyncio
+    async def test_leased_numbers_are_unique_and_cost_one_inc_per_block(self, test_db):
+        numbers = await asyncio.gather(*(
+            NumberGenerator.get_next_shipment_number() for _ in range(250)
+        ))
+        assert len(set(numbers)) == 250
+        sequence = await test_db.sequences.find_one({"type": "shipment"})
+        # Three leases of LEASE_SIZE cover 250 numbers
+        assert sequence["current"] == 3 * NumberGenerator.LEASE_SIZE
+
+    @pytest.mark.asyncio
+    async def test_separate_processes_get_disjoint_blocks(self, test_db):
+        first = await NumberGenerator.get_next_quote_number()
+        # A second worker has its own (empty) lease table
+        NumberGenerator.reset_leases()
+        second = await NumberGenerator.get_next_quote_number()
+        assert int(second.rsplit("-", 1)[1]) == int(first.rsplit("-", 1)[1]) + NumberGenerator.LEASE_SIZE
+
+    @pytest.mark.asyncio
+    async def test_invoice_numbers_are_gapless(self, test_db):
+        numbers = await asyncio.gather(*(NumberGenerator.generate("invoice") for _ in range(20)))
+        NumberGenerator.reset_leases()
+        numbers.append(await NumberGenerator.get_next_invoice_number())
+        assert sorted(int(n.rsplit("-", 1)[1]) for n in numbers) == list(range(1, 22))
+
+    @pytest.mark.asyncio
+    async def test_reserve_numbers_is_contiguous(self, test_db):
+        numbers = await NumberGenerator.reserve_shipment_numbers(5)
+        suffixes = [int(n.rsplit("-", 1)[1]) for n in numbers]
+        assert suffixes == list(range(suffixes[0], suffixes[0] + 5))
@@ -0,0 +1,116 @@
+"""Tests for the carrier and customer portal read model."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.models.portal import CarrierPortalSession, CustomerPortalSession
+from app.services.portal_read_model import PortalReadModelService, eta_confidence, portal_document
+
+STOPS = [
+    {"stop_number": 1, "stop_type": "pickup", "address": "1 Main St", "city": "Chicago", "state": "IL", "zip_code": "60601"},
+    {"stop_number": 2, "stop_type": "delivery", "address": "2 Elm St", "city": "Dallas", "state": "TX", "zip_code": "75201"},
+]
+
+
+async def _session(test_db, collection: str, model, **owner) -> dict:
+    session = model(email="portal@example.com", token=str(ObjectId()), token_expires_at=datetime.utcnow() + timedelta(days=1), **owner)
+    await test_db[collection].insert_one(session.model_dump_mongo())
+    return {"Authorization": f"Bearer {session.token}"}
+
+
+class TestPortalDocument:
+    """Tests for building read-model documents."""
+
+    def test_document_from_shipment_event_and_tenders(self):
+        now = datetime(2026, 5, 1, 12)
+        shipment = {"_id": ObjectId(), "shipment_number": "S-2026-00001", "status": "in_transit", "stops": STOPS}
+        event = {"event_type": "check_call", "event_timestamp": now, "location_city": "Tulsa", "location_state": None}
+        tenders = [
+            {"_id": ObjectId(), "carrier_id": ObjectId(), "offered_rate": 100000, "status": "sent", "created_at": now - timedelta(hours=2)},
+            {"_id": ObjectId(), "carrier_id": ObjectId(), "status": "sent", "created_at": now},
+        ]
+
+        doc = portal_document(shipment, event, tenders)
+        assert (doc["origin_city"], doc["destination_state"]) == ("Chicago", "TX")
+        assert doc["latest_event"]["location"] == "Tulsa"
+        assert [t["tender_id"] for t in doc["open_tenders"]] == [tenders[1]["_id"], tenders[0]["_id"]]
+        assert doc["open_tenders"][0]["offered_rate"] == 0
+        assert portal_document({"_id": ObjectId()})["latest_event"] is None
+
+    def test_eta_confidence_decays(self):
+        now = datetime(2026, 5, 1, 12)
+        doc = {"eta": now, "delivery_date": now, "last_check_call": now - timedelta(minutes=30)}
+        assert eta_confidence(doc, now) == 0.95
+        assert eta_confidence({**doc, "last_check_call": now - timedelta(hours=5)}, now) == 0.60
+        assert eta_confidence(doc, (now + timedelta(days=1)).replace(tzinfo=timezone.utc)) == 0.40
+        assert eta_confidence({**doc, "eta": None}, now) is None
+
+
+class TestPortalPages:
+    """Tests for the portal pages served from the read model."""
+
+    @pytest.mark.asyncio
+    async def test_customer_pages_follow_check_calls(self, client: AsyncClient, created_customer, test_db):
+        shipment = (await client.post("/api/v1/shipments", json={"customer_id": created_customer["id"], "stops": STOPS})).json()
+        await client.post(f"/api/v1/shipments/{shipment['id']}/tracking", json={"location_city": "Tulsa", "location_state": "OK"})
+        headers = await _session(test_db, "customer_portal_sessions", CustomerPortalSession, customer_id=ObjectId(created_customer["id"]))
+
+        response = await client.get("/api/v1/customer-portal/tracking-dashboard", headers=headers)
+        assert response.status_code == 200
+        [row] = response.json()["active_shipments"]
+        assert (row["origin_city"], row["destination_city"]) == ("Chicago", "Dallas")
+        assert (row["latest_event"]["event_type"], row["latest_event"]["location"]) == ("check_call", "Tulsa, OK")
+
+        [listed] = (await client.get("/api/v1/customer-portal/shipments", headers=headers)).json()
+        assert (listed["id"], listed["last_location"]) == (shipment["id"], "Tulsa, OK")
+
+    @pytest.mark.asyncio
+    async def test_portal_eta_follows_driver_location_update(self, client: AsyncClient, created_customer, test_db):
+        shipment = (await client.post("/api/v1/shipments", json={"customer_id": created_customer["id"], "stops": STOPS})).json()
+        await test_db.shipments.update_one(
+            {"_id": ObjectId(shipment["id"])},
+            {"$set": {"stops.1.latitude": 32.78, "stops.1.longitude": -96.80}},
+        )
+
+        response = await client.post("/api/v1/tracking/location-update", json={
+            "shipment_id": shipment["id"], "latitude": 36.15, "longitude": -95.99, "city": "Tulsa", "state": "OK",
+        })
+        assert response.status_code == 200
+        eta = datetime.fromisoformat(response.json()["eta"]).replace(tzinfo=None)
+
+        doc = await test_db.portal_shipments.find_one({"_id": ObjectId(shipment["id"])})
+        # Mongo keeps millisecond precision
+        assert abs(doc["eta"] - eta) < timedelta(milliseconds=1)
+        assert doc["last_known_location"] == "Tulsa, OK"
+
+    @pytest.mark.asyncio
+    async def test_available_loads_follow_tenders(self, client: AsyncClient, created_customer, created_carrier, test_db):
+        shipment = (await client.post("/api/v1/shipments", json={"customer_id": created_customer["id"], "stops": STOPS})).json()
+        tender = (await client.post("/api/v1/tenders", json={
+            "shipment_id": shipment["id"], "carrier_id": created_carrier["id"], "offered_rate": 150000,
+        })).json()
+        headers = await _session(test_db, "carrier_portal_sessions", CarrierPortalSession, carrier_id=ObjectId(created_carrier["id"]))
+        assert (await client.get("/api/v1/carrier-portal/loads/available", headers=headers)).json() == []
+
+        await client.post(f"/api/v1/tenders/{tender['id']}/send", json={"via": "email"})
+        [load] = (await client.get("/api/v1/carrier-portal/loads/available", headers=headers)).json()
+        assert (load["tender_id"], load["offered_rate"], load["origin_state"]) == (tender["id"], 150000, "IL")
+
+        await client.post(f"/api/v1/tenders/{tender['id']}/accept", json={})
+        assert (await client.get("/api/v1/carrier-portal/loads/available", headers=headers)).json() == []
+        [mine] = (await client.get("/api/v1/carrier-portal/loads/my-loads", headers=headers)).json()
+        assert (mine["id"], mine["rate"]) == (shipment["id"], 150000)
+
+    @pytest.mark.asyncio
+    async def test_rebuild_and_delete(self, client: AsyncClient, created_customer, test_db):
+        shipment = (await client.post("/api/v1/shipments", json={"customer_id": created_customer["id"], "stops": STOPS})).json()
+        await test_db.portal_shipments.delete_many({})
+
+        assert await PortalReadModelService.rebuild() == 1
+        assert (await test_db.portal_shipments.find_one({"_id": ObjectId(shipment["id"])}))["origin_state"] == "IL"
+
+        await test_db.shipments.delete_one({"_id": ObjectId(shipment["id"])})
+        await PortalReadModelService.apply_shipment(shipment["id"])
+        assert await test_db.portal_shipments.count_documents({}) == 0
@@ -0,0 +1,119 @@
+"""Tests for the query profiler and query plan audit."""
+import re
+from datetime import datetime
+
+import pytest
+from bson import ObjectId, json_util
+from httpx import AsyncClient
+
+from app.services.query_profiler import (
+    QueryAuditor,
+    QueryProfiler,
+    describe_command,
+    plan_findings,
+    query_profiler,
+    recommend_index,
+    redact,
+    regex_flags,
+)
+
+
+class TestQueryShapes:
+    """Tests for grouping commands by shape and analysing them."""
+
+    def test_shape_ignores_values(self):
+        first = describe_command("find", {"find": "shipments", "filter": {"status": "booked", "customer_id": ObjectId()}, "sort": {"created_at": -1}})
+        second = describe_command("find", {"find": "shipments", "filter": {"customer_id": ObjectId(), "status": "delivered"}, "sort": {"created_at": -1}})
+        other = describe_command("find", {"find": "shipments", "filter": {"status": {"$in": ["booked"]}}})
+        assert first["key"] == second["key"] != other["key"]
+        assert other["shape"]["filter"] == {"status": {"$in": 1}}
+
+    def test_aggregate_and_ignored_commands(self):
+        info = describe_command("aggregate", {
+            "aggregate": "tracking_events",
+            "pipeline": [{"$match": {"shipment_id": 1}}, {"$sort": {"event_timestamp": -1}}, {"$limit": 1}],
+        })
+        assert info["filter"] == {"shipment_id": 1}
+        assert info["sort"] == {"event_timestamp": -1}
+        assert info["shape"]["stages"] == ["$match", "$sort", "$limit"]
+        assert describe_command("insert", {"insert": "shipments"}) is None
+        assert describe_command("find", {"find": "query_shapes", "filter": {}}) is None
+
+    def test_regex_flags(self):
+        assert regex_flags({"subject": {"$regex": "pod", "$options": "i"}}) == ["case_insensitive_regex", "unanchored_regex"]
+        assert regex_flags({"shipment_number": {"$regex": "^S-2026"}}) == []
+        assert regex_flags({"$or": [{"name": re.compile("acme", re.I)}]}) == ["case_insensitive_regex", "unanchored_regex"]
+
+    def test_recommend_index_orders_equality_sort_range(self):
+        keys = recommend_index(
+            {"created_at": {"$gte": datetime(2026, 1, 1)}, "status": {"$in": ["booked"]}, "customer_id": 1, "$or": []},
+            {"pickup_date": -1},
+        )
+        assert keys == [("status", 1), ("customer_id", 1), ("pickup_date", -1), ("created_at", 1)]
+
+    def test_plan_findings(self):
+        explain = {"queryPlanner": {"winningPlan": {
+            "stage": "SORT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "status_1"}},
+        }}}
+        assert plan_findings(explain) == {"stages": ["FETCH", "IXSCAN", "SORT"], "indexes": ["status_1"], "flags": ["in_memory_sort"]}
+        assert plan_findings({"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}})["flags"] == ["collscan"]
+
+    def test_record_keeps_slow_samples(self):
+        profiler = QueryProfiler(slow_query_ms=50)
+        command = {"find": "carriers", "filter": {"mc_number": "123"}}
+        profiler.record("find", command, 10)
+        profiler.record("find", command, 80)
+        [top] = profiler.top()
+        assert (top["count"], top["max_ms"], top["slow_count"]) == (2, 80, 1)
+        assert [s["duration_ms"] for s in profiler.slow_samples()] == [80]
+        assert len(profiler.take_unflushed()) == 1
+        assert profiler.take_unflushed() == []
+
+    def test_redact_keeps_structure_not_values(self):
+        query = {
+            "token": "secret-token",
+            "customer_id": ObjectId(),
+            "created_at": {"$gte": datetime(2026, 1, 1)},
+            "reference": {"$in": ["PO-1", "PO-2"]},
+            "$or": [{"email": {"$regex": "bob@example.com", "$options": "i"}}, {"name": re.compile("^Acme")}],
+        }
+        redacted = redact(query)
+        assert "secret-token" not in json_util.dumps(redacted) and "PO-1" not in json_util.dumps(redacted)
+        assert redacted["token"] == "" and redacted["reference"] == {"$in": [""]}
+        assert recommend_index(redacted, None) == recommend_index(query, None)
+        assert regex_flags(redacted) == regex_flags(query) == ["case_insensitive_regex", "unanchored_regex"]
+
+
+class TestQueryAudit:
+    """Tests for the audit endpoints against the database."""
+
+    @pytest.mark.asyncio
+    async def test_audit_flags_collscan(self, client: AsyncClient, test_db):
+        await test_db.emails.insert_many([{"subject": f"POD {i}", "from_address": "a@b.com", "received_at": datetime(2026, 5, i + 1)} for i in range(5)])
+        query_profiler.reset()
+        query_profiler.record(
+            "find",
+            {"find": "emails", "filter": {"from_address": "a@b.com", "subject": {"$regex": "pod", "$options": "i"}}, "sort": {"received_at": -1}},
+            250,
+        )
+
+        response = await client.post("/api/v1/admin/query-profile/audit")
+        assert response.status_code == 200
+        [finding] = response.json()["findings"]
+        assert {"collscan", "unanchored_regex", "case_insensitive_regex"} <= set(finding["flags"])
+        assert finding["recommended_index"] == [["from_address", 1], ["received_at", -1], ["subject", 1]]
+
+        response = await client.get("/api/v1/admin/query-profile")
+        data = response.json()
+        assert data["top_shapes"][0]["collection"] == "emails"
+        assert data["slow_queries"][0]["duration_ms"] == 250
+        assert data["flagged"][0]["audit"]["flags"]
+
+    @pytest.mark.asyncio
+    async def test_flush_stores_redacted_sample(self, test_db):
+        profiler = QueryProfiler()
+        profiler.record("find", {"find": "customer_portal_sessions", "filter": {"token": "secret-token"}, "sort": {"created_at": -1}}, 5)
+
+        assert await QueryAuditor(profiler).flush() == 1
+        doc = await test_db.query_shapes.find_one({})
+        assert json_util.loads(doc["sample"]) == {"filter": {"token": ""}, "sort": {"created_at": -1}}
@@ -0,0 +1,76 @@
+"""Tests for the compiled rate table lane index."""
+from datetime import datetime, timezone
+from bson import ObjectId
+
+from app.services.rate_lane_index import LaneIndex
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+def _table(lanes, customer_id=None, **overrides):
+    doc = {
+        "_id": ObjectId(),
+        "customer_id": customer_id or ObjectId(),
+        "name": "Contract",
+        "effective_date": datetime(2026, 1, 1),
+        "expiry_date": None,
+        "lanes": lanes,
+    }
+    doc.update(overrides)
+    return doc
+
+
+def _lane(**overrides):
+    lane = {"origin_state": "IL", "dest_state": "TX", "equipment_type": "van", "rate_per_mile": 250}
+    lane.update(overrides)
+    return lane
+
+
+class TestLaneIndexLookup:
+    """Tests for LaneIndex.lookup."""
+
+    def test_match_is_case_insensitive_and_joins_customer_name(self):
+        table = _table([_lane(origin_state="il", equipment_type="Van")])
+        index = LaneIndex([table], {table["customer_id"]: "Acme"})
+        (result,) = index.lookup("IL", "tx", "VAN", now=NOW)
+        assert result["customer_name"] == "Acme"
+        assert result["rate_table_id"] == str(table["_id"])
+        assert result["origin_state"] == "il"
+
+    def test_other_lanes_and_equipment_do_not_match(self):
+        index = LaneIndex([_table([_lane(dest_state="CA"), _lane(equipment_type="reefer")])], {})
+        assert index.lookup("IL", "TX", "van", now=NOW) == []
+
+    def test_weight_ranges(self):
+        lanes = [
+            _lane(min_weight=20000, max_weight=45000, notes="heavy"),
+            _lane(max_weight=19999, notes="light"),
+            _lane(notes="any"),
+            _lane(min_weight=45001, notes="over"),
+        ]
+        index = LaneIndex([_table(lanes)], {})
+
+        def notes(weight):
+            return [r["notes"] for r in index.lookup("IL", "TX", "van", weight_lbs=weight, now=NOW)]
+
+        assert notes(10000) == ["light", "any"]
+        assert notes(20000) == ["heavy", "any"]
+        assert notes(50000) == ["any", "over"]
+        assert notes(None) == ["heavy", "light", "any", "over"]
+
+    def test_effective_and_expiry_dates_checked_at_lookup(self):
+        tables = [
+            _table([_lane(notes="future")], effective_date=datetime(2026, 7, 1)),
+            _table([_lane(notes="expired")], expiry_date=datetime(2026, 5, 31)),
+            _table([_lane(notes="current")], expiry_date=datetime(2026, 12, 31)),
+        ]
+        index = LaneIndex(tables, {})
+        assert [r["notes"] for r in index.lookup("IL", "TX", "van", now=NOW)] == ["current"]
+        later = datetime(2026, 8, 1, tzinfo=timezone.utc)
+        assert [r["notes"] for r in index.lookup("IL", "TX", "van", now=later)] == ["future", "current"]
+
+    def test_customer_filter(self):
+        mine, theirs = ObjectId(), ObjectId()
+        index = LaneIndex([_table([_lane()], customer_id=mine), _table([_lane()], customer_id=theirs)], {})
+        results = index.lookup("IL", "TX", "van", customer_id=str(mine), now=NOW)
+        assert [r["customer_id"] for r in results] == [str(mine)]
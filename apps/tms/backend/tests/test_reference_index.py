@@ -0,0 +1,82 @@
+"""Tests for the reference-number index and text scanner."""
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.services.email_classification import email_classifier
+from app.services.reference_index import (
+    ReferenceIndexService,
+    accepts,
+    candidate,
+    normalize_reference,
+    reference_entries,
+    reference_scanner,
+)
+
+STOPS = [
+    {"stop_number": 1, "stop_type": "pickup", "address": "1 Main St", "city": "Chicago", "state": "IL", "zip_code": "60601"},
+    {"stop_number": 2, "stop_type": "delivery", "address": "2 Elm St", "city": "Dallas", "state": "TX", "zip_code": "75201"},
+]
+
+
+class TestReferenceScanner:
+    """Tests for normalizing and finding references in text."""
+
+    def test_normalize(self):
+        assert normalize_reference("s-2026-00012") == "S202600012"
+        assert normalize_reference("MC-012345", "mc") == normalize_reference("12345", "mc") == "12345"
+        assert normalize_reference("USDOT 3456789", "dot") == "3456789"
+
+    def test_scan_labels_and_prefixes(self):
+        text = "RE: Load #12345 / PRO: 998877, BOL No. 55-6677, PO# A1234; MC# 012345. Shipment S-2026-00012"
+        found = {(c.kind, c.key) for c in reference_scanner.scan(text)}
+        assert found == {
+            ("shipment", "12345"), ("pro", "998877"), ("bol", "556677"), ("po", "A1234"),
+            ("mc", "12345"), ("shipment", "S202600012"),
+        }
+
+    def test_scan_ignores_words_and_embedded_labels(self):
+        assert reference_scanner.scan("Product shipped, POD attached. Reference: see below; dot the i's") == []
+
+    def test_entries_and_accepts(self):
+        carrier = {"_id": ObjectId(), "mc_number": "MC-012345", "dot_number": None}
+        [entry] = reference_entries("carrier", carrier)
+        assert (entry["key"], entry["kind"]) == ("12345", "mc")
+        assert accepts(candidate("MC 12345", "mc"), entry)
+        assert not accepts(candidate("12345"), entry)
+        shipment = {"_id": ObjectId(), "shipment_number": "S-2026-00001", "reference_numbers": [{"value": "PO-77812"}, "x"]}
+        assert {e["key"] for e in reference_entries("shipment", shipment)} == {"S202600001", "PO77812"}
+
+
+class TestReferenceMatching:
+    """Tests for index maintenance and email matching."""
+
+    @pytest.mark.asyncio
+    async def test_email_matches_through_index(self, client: AsyncClient, created_customer, test_db):
+        response = await client.post("/api/v1/shipments", json={"customer_id": created_customer["id"], "stops": STOPS})
+        shipment = response.json()
+        carrier = (await client.post("/api/v1/carriers", json={"name": "Swift", "mc_number": "MC-0445566"})).json()
+        assert await test_db.reference_index.count_documents({}) == 2
+
+        matches = await email_classifier.match_email_to_entities(
+            db=test_db,
+            reference_numbers={"mc_numbers": ["445566"]},
+            from_email="dispatch@unknown.example",
+            subject=f"Re: shipment {shipment['shipment_number'].lower()}",
+            body="Truck is loaded.",
+        )
+        assert matches["shipment_id"] == shipment["id"]
+        assert matches["carrier_id"] == carrier["id"]
+        assert (matches["match_confidence"], matches["auto_matched"]) == (0.75, True)
+
+    @pytest.mark.asyncio
+    async def test_rebuild_and_delete(self, client: AsyncClient, test_db):
+        carrier = (await client.post("/api/v1/carriers", json={"name": "Swift", "mc_number": "MC-1", "dot_number": "9988776"})).json()
+        await test_db.reference_index.delete_many({})
+
+        assert await ReferenceIndexService.rebuild() == {"shipment": 0, "quote": 0, "carrier": 1}
+        [found] = await ReferenceIndexService.resolve([candidate("USDOT 9988776", "dot")])
+        assert [str(e["entity_id"]) for e in found] == [carrier["id"]]
+
+        await client.delete(f"/api/v1/carriers/{carrier['id']}")
+        assert await test_db.reference_index.count_documents({}) == 0
@@ -0,0 +1,92 @@
+"""Tests for the multi-stop route optimizer."""
+import asyncio
+import itertools
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services import route_optimizer
+from app.services.route_optimizer import (
+    _nearest_neighbor,
+    distance_matrix,
+    haversine_miles,
+    optimize_many,
+    optimize_stop_order,
+    route_distance,
+)
+
+
+def _coords(n, seed=5):
+    rng = random.Random(seed)
+    return [(rng.uniform(30, 45), rng.uniform(-110, -75)) for _ in range(n)]
+
+
+def _brute_force(matrix, n, fixed_first, fixed_last):
+    middle = [i for i in range(n) if not (fixed_first and i == 0) and not (fixed_last and i == n - 1)]
+    best = None
+    for perm in itertools.permutations(middle):
+        order = ([0] if fixed_first else []) + list(perm) + ([n - 1] if fixed_last else [])
+        distance = route_distance(matrix, order)
+        best = distance if best is None else min(best, distance)
+    return best
+
+
+class TestDistanceMatrix:
+    """Tests for distance_matrix."""
+
+    def test_matches_haversine(self):
+        coords = _coords(6)
+        matrix = distance_matrix(coords)
+        for i, j in itertools.product(range(6), repeat=2):
+            expected = haversine_miles(*coords[i], *coords[j])
+            assert abs(matrix[i][j] - expected) < 1e-6
+
+    def test_repeated_stop_sets_are_cached(self):
+        coords = _coords(8, seed=9)
+        assert distance_matrix(coords) is distance_matrix(list(coords))
+
+
+class TestOptimizeStopOrder:
+    """Tests for optimize_stop_order."""
+
+    def test_fixed_ends_stay_in_place(self):
+        order = optimize_stop_order(_coords(30))
+        assert order[0] == 0 and order[-1] == 29
+        assert sorted(order) == list(range(30))
+
+    def test_small_routes_are_optimal(self):
+        for fixed_first, fixed_last in [(True, True), (True, False), (False, False)]:
+            coords = _coords(7, seed=11)
+            matrix = distance_matrix(coords)
+            order = optimize_stop_order(coords, fixed_first, fixed_last)
+            assert sorted(order) == list(range(7))
+            best = _brute_force(matrix, 7, fixed_first, fixed_last)
+            assert route_distance(matrix, order) <= best + 1e-6
+
+    def test_improves_on_nearest_neighbor(self):
+        coords = _coords(80)
+        matrix = distance_matrix(coords)
+        order = optimize_stop_order(coords)
+        assert route_distance(matrix, order) < route_distance(matrix, _nearest_neighbor(matrix, True, True))
+
+    def test_two_and_three_stop_routes_unchanged(self):
+        assert optimize_stop_order(_coords(2)) == [0, 1]
+        assert optimize_stop_order(_coords(3)) == [0, 1, 2]
+
+
+class TestOptimizeMany:
+    """Tests for choosing between inline and pooled searches."""
+
+    def test_single_large_route_uses_the_pool(self, monkeypatch):
+        pools = []
+
+        def get_pool():
+            pools.append(ThreadPoolExecutor(max_workers=1))
+            return pools[-1]
+
+        monkeypatch.setattr(route_optimizer, "_get_pool", get_pool)
+        small, large = _coords(5), _coords(route_optimizer.ROUTE_INLINE_MAX_STOPS + 1)
+
+        [order] = asyncio.run(optimize_many([(small, True, True)]))
+        assert sorted(order) == list(range(5)) and not pools
+        [order] = asyncio.run(optimize_many([(large, True, True)]))
+        assert sorted(order) == list(range(len(large))) and len(pools) == 1
@@ -0,0 +1,211 @@
+"""Tests for streaming report writers and scheduled report execution."""
+import asyncio
+import csv
+import os
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.config import get_settings
+from app.services import report_scheduler as scheduler_module
+from app.services import report_writers
+from app.services.custom_reports import clean_report_row
+from app.services.report_scheduler import ReportScheduler, execute_report, start_report_run
+from app.services.report_writers import open_report_writer
+from app.services.shipment_import import iter_xlsx_rows
+
+COLUMNS = ["shipment_number", "status", "customer_price"]
+
+
+def _rows(count):
+    return [[f"S-2026-{i:05d}", "delivered", 1000 + i] for i in range(count)]
+
+
+async def _finish_runs():
+    """Wait for the reports the shared scheduler is running."""
+    await asyncio.gather(*scheduler_module.report_scheduler._running)
+
+
+class TestReportWriters:
+    """Tests for the chunked CSV, XLSX and PDF writers."""
+
+    def test_csv_round_trip(self, tmp_path):
+        writer = open_report_writer("csv", str(tmp_path / "r.csv"))
+        writer.write_header(COLUMNS)
+        writer.write_rows(_rows(3))
+        writer.write_rows(_rows(2))
+        assert writer.close() == (tmp_path / "r.csv").stat().st_size
+
+        with open(tmp_path / "r.csv", newline="") as f:
+            rows = list(csv.reader(f))
+        assert rows[0] == COLUMNS
+        assert len(rows) == 6
+
+    def test_xlsx_is_readable_and_truncates(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(report_writers, "XLSX_MAX_ROWS", 4)
+        writer = open_report_writer("excel", str(tmp_path / "r.xlsx"))
+        writer.write_header(COLUMNS)
+        writer.write_rows(_rows(3) + [["S-2026-<&>", None, 1.5]])
+        writer.write_rows(_rows(3))
+        writer.close()
+
+        assert writer.rows_written == 4
+        assert writer.truncated
+        columns, rows = iter_xlsx_rows(str(tmp_path / "r.xlsx"))
+        rows = list(rows)
+        assert columns == COLUMNS
+        assert len(rows) == 4
+        assert rows[3]["shipment_number"] == "S-2026-<&>"
+
+    def test_xlsx_cells_are_valid_xml(self, tmp_path):
+        writer = open_report_writer("xlsx", str(tmp_path / "r.xlsx"))
+        writer.write_header(COLUMNS)
+        writer.write_rows([["S-2026-\x0100001", "in\ttransit", float("nan")], ["S-2026-00002", None, float("-inf")]])
+        writer.close()
+
+        _, rows = iter_xlsx_rows(str(tmp_path / "r.xlsx"))
+        rows = list(rows)
+        assert rows[0]["shipment_number"] == "S-2026-00001"
+        assert rows[0]["status"] == "in\ttransit"
+        assert [r["customer_price"] for r in rows] == ["nan", "-inf"]
+
+    def test_pdf_pages_and_xref(self, tmp_path):
+        writer = open_report_writer("pdf", str(tmp_path / "r.pdf"), "Shipments (daily)")
+        writer.write_header(COLUMNS)
+        writer.write_rows(_rows(report_writers.PDF_LINES_PER_PAGE * 2 + 1))
+        writer.close()
+
+        data = (tmp_path / "r.pdf").read_bytes()
+        assert data.startswith(b"%PDF-1.4")
+        assert b"/Count 3" in data
+        # Every xref entry points at its object
+        xref_at = int(re.search(rb"startxref\n(\d+)", data).group(1))
+        entries = data[xref_at:].split(b"\n")[3:]
+        for number, entry in enumerate(entries[: data.count(b" 0 obj\n")], start=1):
+            offset = int(entry[:10])
+            assert data[offset:].startswith(b"%d 0 obj" % number)
+
+    def test_grouped_rows_are_flattened(self):
+        row = {"_id": {"carrier_name": "Fast Freight"}, "count": 3, "_carrier": []}
+        assert clean_report_row(row, ["carrier_name"]) == {"carrier_name": "Fast Freight", "count": 3}
+
+
+class TestScheduledReportExecution:
+    """Tests for streaming execution, run-now and the scheduler's claim."""
+
+    @pytest.fixture(autouse=True)
+    def artifact_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(get_settings(), "report_artifact_dir", str(tmp_path))
+
+    async def _schedule(self, test_db, **fields) -> dict:
+        report = {
+            "_id": ObjectId(),
+            "report_type": "shipment_summary",
+            "report_name": "Daily shipments",
+            "recipients": [],
+            "frequency": "daily",
+            "format": "csv",
+            "time_of_day": "08:00",
+            "is_active": True,
+            "next_run_at": datetime.utcnow() - timedelta(minutes=1),
+            **fields,
+        }
+        await test_db.scheduled_reports.insert_one(report)
+        return report
+
+    @pytest.mark.asyncio
+    async def test_execute_streams_in_chunks(self, test_db, monkeypatch):
+        monkeypatch.setattr("app.services.report_scheduler.REPORT_CHUNK_ROWS", 7)
+        await test_db.shipments.insert_many([
+            {"shipment_number": f"S-2026-{i:05d}", "status": "delivered", "customer_price": i,
+             "created_at": datetime.utcnow()}
+            for i in range(25)
+        ])
+        report = await self._schedule(test_db)
+
+        history_id = await start_report_run(report)
+        await execute_report(history_id)
+
+        entry = await test_db.report_history.find_one({"_id": history_id})
+        assert entry["status"] == "completed"
+        assert entry["row_count"] == 25
+        assert entry["file_size_bytes"] > 0
+        with open(entry["storage_path"], newline="") as f:
+            rows = list(csv.reader(f))
+        assert rows[0][0] == "shipment_number"
+        assert len(rows) == 26
+
+    @pytest.mark.asyncio
+    async def test_failed_run_is_recorded(self, test_db):
+        report = await self._schedule(test_db, report_type="unknown")
+        history_id = await start_report_run(report)
+        await execute_report(history_id)
+
+        entry = await test_db.report_history.find_one({"_id": history_id})
+        assert entry["status"] == "failed"
+        assert "Unknown report type" in entry["error_message"]
+
+    @pytest.mark.asyncio
+    async def test_failed_run_closes_its_writer(self, test_db, monkeypatch):
+        await test_db.shipments.insert_one(
+            {"shipment_number": "S-2026-00001", "status": "delivered", "created_at": datetime.utcnow()}
+        )
+        writers = []
+
+        def open_recorded_writer(fmt, path, title=""):
+            writer = open_report_writer(fmt, path, title)
+            writers.append(writer)
+            return writer
+
+        def write_rows(self, rows):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(scheduler_module, "open_report_writer", open_recorded_writer)
+        monkeypatch.setattr(report_writers.CsvReportWriter, "write_rows", write_rows)
+        report = await self._schedule(test_db)
+        history_id = await start_report_run(report)
+        await execute_report(history_id)
+
+        entry = await test_db.report_history.find_one({"_id": history_id})
+        assert entry["status"] == "failed"
+        assert writers[0]._file.closed
+        assert not os.path.exists(writers[0].path)
+
+    @pytest.mark.asyncio
+    async def test_claim_due_claims_once(self, test_db):
+        report = await self._schedule(test_db)
+        scheduler = ReportScheduler()
+
+        claimed = await scheduler.claim_due()
+        assert claimed["_id"] == report["_id"]
+        assert await scheduler.claim_due() is None
+
+    @pytest.mark.asyncio
+    async def test_run_now_and_download(self, client: AsyncClient, test_db):
+        await test_db.shipments.insert_one({"shipment_number": "S-2026-00001", "created_at": datetime.utcnow()})
+        report = await self._schedule(test_db)
+
+        response = await client.post(f"/api/v1/analytics/scheduled-reports/{report['_id']}/run-now")
+        assert response.status_code == 200
+        history_id = response.json()["history_id"]
+        await _finish_runs()
+
+        history = (await client.get("/api/v1/analytics/scheduled-reports/history")).json()
+        assert history[0]["status"] == "completed"
+        assert history[0]["row_count"] == 1
+
+        download = await client.get(f"/api/v1/analytics/scheduled-reports/history/{history_id}/download")
+        assert download.status_code == 200
+        assert download.text.startswith("shipment_number")
+
+    @pytest.mark.asyncio
+    async def test_run_now_respects_concurrency_limit(self, client: AsyncClient, test_db, monkeypatch):
+        monkeypatch.setattr(scheduler_module, "MAX_CONCURRENT_REPORTS", 0)
+        report = await self._schedule(test_db)
+
+        response = await client.post(f"/api/v1/analytics/scheduled-reports/{report['_id']}/run-now")
+        assert response.status_code == 429
+        assert await test_db.report_history.count_documents({}) == 0
@@ -0,0 +1,69 @@
+"""Tests for unified search and typeahead."""
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.api.v1.search import SearchResultItem, _after_cursor, _decode_cursor, _encode_cursor, _total_cache
+from app.utils.seed import ensure_indexes
+
+
+class TestCursor:
+    """Tests for the cross-collection cursor."""
+
+    def test_round_trip(self):
+        doc_id = ObjectId()
+        item = SearchResultItem(id=str(doc_id), type="carrier", title="", subtitle="", score=1.25, data={})
+        assert _decode_cursor(_encode_cursor(item)) == (1.25, "carrier", doc_id)
+
+    def test_invalid_cursor_starts_from_the_top(self):
+        assert _decode_cursor("not-a-cursor") is None
+        assert _decode_cursor(None) is None
+
+    def test_ties_break_on_type_then_id(self):
+        doc_id = ObjectId()
+        after = (2.0, "customer", doc_id)
+        assert _after_cursor("carrier", after) == {"score": {"$lt": 2.0}}
+        assert _after_cursor("shipment", after) == {"score": {"$lte": 2.0}}
+        assert _after_cursor("customer", after)["$or"][1] == {"score": 2.0, "_id": {"$gt": doc_id}}
+
+
+class TestUnifiedSearch:
+    """Tests for federated search and typeahead endpoints."""
+
+    @pytest.fixture(autouse=True)
+    async def _indexes(self, clean_database):
+        await ensure_indexes()
+        _total_cache.clear()
+
+    @pytest.mark.asyncio
+    async def test_type_all_paginates_without_duplicates(self, client: AsyncClient, test_db):
+        await test_db.customers.insert_many([{"name": f"Acme Foods {i}", "status": "active"} for i in range(4)])
+        await test_db.carriers.insert_many([{"name": f"Acme Freight {i}", "mc_number": f"MC-{i}"} for i in range(3)])
+
+        seen, cursor = [], None
+        while True:
+            params = {"q": "acme", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            body = (await client.get("/api/v1/search", params=params)).json()
+            assert body["total"] == 7
+            seen += [r["id"] for r in body["results"]]
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+        assert len(seen) == len(set(seen)) == 7
+
+    @pytest.mark.asyncio
+    async def test_typeahead_matches_identifier_prefixes(self, client: AsyncClient, test_db):
+        await test_db.shipments.insert_one({"shipment_number": "S-2026-00042", "status": "booked"})
+        await test_db.carriers.insert_one({"name": "Blue Line", "mc_number": "MC-123456", "dot_number": "7654321"})
+        await test_db.customers.insert_one({"name": "Acme", "code": "ACM"})
+
+        async def titles(q):
+            body = (await client.get("/api/v1/search/typeahead", params={"q": q})).json()
+            return {(r["type"], r["title"]) for r in body["results"]}
+
+        assert await titles("s-2026") == {("shipment", "S-2026-00042")}
+        assert await titles("1234") == {("carrier", "Blue Line")}
+        assert await titles("765") == {("carrier", "Blue Line")}
+        assert await titles("ac") == {("customer", "Acme")}
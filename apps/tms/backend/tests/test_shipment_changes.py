@@ -0,0 +1,78 @@
+"""Tests for fanning shipment and tender changes out to the read models."""
+import pytest
+from bson import ObjectId
+
+from app.services.shipment_changes import ShipmentChangeDispatcher, shipment_changes
+
+
+def _recorder(calls, name, fail=False):
+    async def record(arg):
+        calls.append((name, arg))
+        if fail:
+            raise RuntimeError(f"{name} failed")
+    return record
+
+
+class TestShipmentChangeDispatcher:
+    """Tests for ShipmentChangeDispatcher."""
+
+    def test_every_read_model_is_subscribed(self):
+        assert {s.name for s in shipment_changes.subscribers} == {
+            "Analytics rollups", "Lane stats", "Exception detection", "Reference index", "Portal read model",
+        }
+
+    @pytest.mark.asyncio
+    async def test_failing_subscriber_does_not_skip_the_others(self):
+        dispatcher = ShipmentChangeDispatcher(subscriber_modules=())
+        calls = []
+        dispatcher.subscribe("rollups", shipment=_recorder(calls, "rollups", fail=True))
+        dispatcher.subscribe("portal", shipment=_recorder(calls, "portal"), tender=_recorder(calls, "portal tender"))
+
+        shipment_id = ObjectId()
+        await dispatcher.shipment_changed(str(shipment_id))
+        assert calls == [("rollups", shipment_id), ("portal", shipment_id)]
+
+        calls.clear()
+        tender_id = ObjectId()
+        await dispatcher.tender_changed(tender_id)
+        assert calls == [("portal tender", tender_id)]
+
+    @pytest.mark.asyncio
+    async def test_new_shipments_fall_back_to_per_shipment_handler(self):
+        dispatcher = ShipmentChangeDispatcher(subscriber_modules=())
+        calls = []
+        dispatcher.subscribe("bulk", shipment=_recorder(calls, "bulk one"), new_shipments=_recorder(calls, "bulk"))
+        dispatcher.subscribe("single", shipment=_recorder(calls, "single"))
+
+        shipments = [{"_id": ObjectId()}, {"_id": ObjectId()}]
+        await dispatcher.shipments_created(shipments)
+        assert calls == [("bulk", shipments), ("single", shipments[0]["_id"]), ("single", shipments[1]["_id"])]
+
+    @pytest.mark.asyncio
+    async def test_changed_shipments_are_passed_as_one_batch(self):
+        dispatcher = ShipmentChangeDispatcher(subscriber_modules=())
+        calls = []
+        dispatcher.subscribe("batched", shipment=_recorder(calls, "batched one"), shipments=_recorder(calls, "batched"))
+        dispatcher.subscribe("single", shipment=_recorder(calls, "single"))
+
+        first, second = ObjectId(), ObjectId()
+        await dispatcher.shipments_changed([str(first), second, first])
+        assert calls == [("batched", [first, second]), ("single", first), ("single", second)]
+
+    @pytest.mark.asyncio
+    async def test_changed_tenders_are_passed_as_one_batch(self):
+        dispatcher = ShipmentChangeDispatcher(subscriber_modules=())
+        calls = []
+        dispatcher.subscribe("batched", tender=_recorder(calls, "batched one"), tenders=_recorder(calls, "batched"))
+        dispatcher.subscribe("single", tender=_recorder(calls, "single"))
+
+        first, second = ObjectId(), ObjectId()
+        await dispatcher.tenders_changed([first, str(second)])
+        assert calls == [("batched", [first, second]), ("single", first), ("single", second)]
+
+        calls.clear()
+        await dispatcher.tenders_changed([])
+        assert calls == []
+
+    def test_read_models_subscribe_batched_handlers(self):
+        assert all(s.shipments for s in shipment_changes.subscribers)
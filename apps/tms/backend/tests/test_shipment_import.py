@@ -0,0 +1,162 @@
+"""Tests for the streaming bulk shipment import."""
+import zipfile
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.models.base import utc_now
+from app.services.shipment_import import (
+    STALE_IMPORT_MINUTES,
+    _parse_date,
+    iter_csv_rows,
+    iter_xlsx_rows,
+    map_row,
+    row_errors,
+)
+
+CSV_CONTENT = (
+    "Origin City,Origin State,Destination City,Destination State,Weight (lbs),Customer Price\n"
+    "Chicago,IL,Dallas,TX,\"42,000\",3500.00\n"
+    "Atlanta,GA,,FL,1000,900\n"
+    "Denver,CO,Phoenix,AZ,20000,2100\n"
+)
+
+MAPPING = {
+    "Origin City": "origin_city",
+    "Origin State": "origin_state",
+    "Destination City": "destination_city",
+    "Destination State": "destination_state",
+    "Weight (lbs)": "weight_lbs",
+    "Customer Price": "customer_price",
+}
+
+
+def _write_xlsx(path):
+    """Minimal workbook: shared strings for text, an inline string and numbers."""
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    shared = ["Origin City", "Origin State", "Destination City", "Destination State", "Chicago", "IL"]
+    strings = "".join(f"<si><t>{s}</t></si>" for s in shared)
+    sheet = (
+        f'<worksheet {ns}><sheetData>'
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c>'
+        '<c r="C1" t="s"><v>2</v></c><c r="D1" t="s"><v>3</v></c></row>'
+        '<row r="2"><c r="A2" t="s"><v>4</v></c><c r="B2" t="s"><v>5</v></c>'
+        '<c r="D2" t="inlineStr"><is><t>TX</t></is></c></row>'
+        '</sheetData></worksheet>'
+    )
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("xl/sharedStrings.xml", f"<sst {ns}>{strings}</sst>")
+        archive.writestr("xl/worksheets/sheet1.xml", sheet)
+
+
+class TestReaders:
+    """Tests for the CSV and XLSX row readers."""
+
+    def test_csv_rows_are_lazy_dicts(self, tmp_path):
+        path = tmp_path / "loads.csv"
+        path.write_text(CSV_CONTENT)
+        columns, rows = iter_csv_rows(str(path))
+        assert columns[:2] == ["Origin City", "Origin State"]
+        first = next(rows)
+        assert first["Weight (lbs)"] == "42,000"
+        assert len(list(rows)) == 2
+
+    def test_xlsx_shared_inline_and_sparse_cells(self, tmp_path):
+        path = tmp_path / "loads.xlsx"
+        _write_xlsx(path)
+        columns, rows = iter_xlsx_rows(str(path))
+        assert columns == ["Origin City", "Origin State", "Destination City", "Destination State"]
+        assert list(rows) == [{
+            "Origin City": "Chicago",
+            "Origin State": "IL",
+            "Destination City": "",
+            "Destination State": "TX",
+        }]
+
+
+class TestRowMapping:
+    """Tests for row mapping, validation and date parsing."""
+
+    def test_missing_required_fields(self):
+        mapped = map_row({"Origin City": " Atlanta ", "Origin State": "GA", "Destination State": "FL"}, MAPPING)
+        assert mapped["origin_city"] == "Atlanta"
+        assert row_errors(mapped) == ["Missing destination city"]
+
+    def test_date_formats(self):
+        assert _parse_date("2026-03-01") == datetime(2026, 3, 1)
+        assert _parse_date("03/01/2026") == datetime(2026, 3, 1)
+        assert _parse_date("46082") == datetime(2026, 3, 1)
+        assert _parse_date("soon") is None
+
+
+class TestBulkImport:
+    """Tests for the bulk import endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_json_import_reserves_consecutive_numbers(self, client: AsyncClient, created_customer):
+        rows = [
+            {"Origin City": "Chicago", "Origin State": "IL", "Destination City": "Dallas", "Destination State": "TX"}
+            for _ in range(3)
+        ]
+        response = await client.post("/api/v1/shipments/bulk-import", json={
+            "rows": rows,
+            "customer_id": created_customer["id"],
+            "column_mapping": MAPPING,
+        })
+        assert response.status_code == 200
+        result = response.json()
+        assert result["successful"] == 3
+
+        numbers = []
+        for shipment_id in result["shipment_ids"]:
+            shipment = (await client.get(f"/api/v1/shipments/{shipment_id}")).json()
+            numbers.append(int(shipment["shipment_number"].rsplit("-", 1)[1]))
+        assert numbers == list(range(numbers[0], numbers[0] + 3))
+
+    @pytest.mark.asyncio
+    async def test_file_import_job(self, client: AsyncClient, created_customer):
+        response = await client.post(
+            "/api/v1/shipments/bulk-import/file",
+            files={"file": ("loads.csv", CSV_CONTENT.encode(), "text/csv")},
+            data={"customer_id": created_customer["id"]},
+        )
+        assert response.status_code == 200
+        job_id = response.json()["job_id"]
+
+        job = (await client.get(f"/api/v1/shipments/bulk-import/jobs/{job_id}")).json()
+        assert job["status"] == "completed"
+        assert (job["processed"], job["successful"], job["failed"]) == (3, 2, 1)
+        assert job["errors"][0]["row"] == 2
+
+    @pytest.mark.asyncio
+    async def test_file_import_rejects_other_types(self, client: AsyncClient, created_customer):
+        response = await client.post(
+            "/api/v1/shipments/bulk-import/file",
+            files={"file": ("loads.pdf", b"%PDF", "application/pdf")},
+            data={"customer_id": created_customer["id"]},
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_file_import_rejects_bad_column_mapping(self, client: AsyncClient, created_customer):
+        for mapping in ('["Origin City"]', '{"Origin City": 1}', "not json"):
+            response = await client.post(
+                "/api/v1/shipments/bulk-import/file",
+                files={"file": ("loads.csv", CSV_CONTENT.encode(), "text/csv")},
+                data={"customer_id": created_customer["id"], "column_mapping": mapping},
+            )
+            assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_interrupted_job_is_failed(self, client: AsyncClient, test_db):
+        job_id = ObjectId()
+        await test_db.import_jobs.insert_one({
+            "_id": job_id, "status": "running", "customer_id": ObjectId(),
+            "created_at": utc_now() - timedelta(hours=1),
+            "heartbeat_at": utc_now() - timedelta(minutes=STALE_IMPORT_MINUTES + 1),
+        })
+
+        job = (await client.get(f"/api/v1/shipments/bulk-import/jobs/{job_id}")).json()
+        assert (job["status"], job["error"]) == ("failed", "Interrupted")
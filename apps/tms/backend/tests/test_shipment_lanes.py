@@ -0,0 +1,66 @@
+"""Tests for the materialized lane fields on shipments."""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.models.shipment import Shipment, Stop, lane_fields, lane_key
+from app.services.predictive_service import PredictiveService
+from app.services.shipment_lanes import ShipmentLaneService
+
+CHICAGO = {"stop_number": 1, "stop_type": "pickup", "address": "1 Main St", "city": "Chicago", "state": "il", "zip_code": "60601"}
+DALLAS = {"stop_number": 2, "stop_type": "delivery", "address": "2 Elm St", "city": "Dallas", "state": "TX", "zip_code": "75201"}
+DENVER = {"stop_number": 2, "stop_type": "delivery", "address": "3 Oak St", "city": "Denver", "state": "CO", "zip_code": "80202"}
+
+
+class TestLaneFields:
+    """Tests for computing lane fields from stops."""
+
+    def test_first_and_last_stops(self):
+        fields = lane_fields([CHICAGO, {**DENVER, "stop_type": "stop"}, DALLAS])
+        assert fields == {
+            "origin_city": "Chicago", "origin_state": "IL", "origin_zip3": "606",
+            "destination_city": "Dallas", "destination_state": "TX", "destination_zip3": "752",
+            "lane_key": "IL-TX",
+        }
+        assert lane_fields([Stop(**CHICAGO), Stop(**DALLAS)]) == fields
+        assert lane_key(" il", "tx") == "IL-TX"
+
+    def test_no_stops(self):
+        assert set(lane_fields([]).values()) == {None}
+
+    def test_model_dump_refreshes_lane(self):
+        shipment = Shipment(shipment_number="S-2026-00001", customer_id=ObjectId(), stops=[CHICAGO, DALLAS])
+        assert shipment.model_dump_mongo()["lane_key"] == "IL-TX"
+        shipment.stops = [Stop(**CHICAGO), Stop(**DENVER)]
+        doc = shipment.model_dump_mongo()
+        assert (doc["lane_key"], doc["destination_city"]) == ("IL-CO", "Denver")
+
+
+class TestLaneQueries:
+    """Tests for writes, the backfill and indexed lane queries."""
+
+    @pytest.mark.asyncio
+    async def test_created_shipment_has_lane(self, client: AsyncClient, created_customer, test_db):
+        response = await client.post(
+            "/api/v1/shipments", json={"customer_id": created_customer["id"], "stops": [CHICAGO, DALLAS]}
+        )
+        doc = await test_db.shipments.find_one({"_id": ObjectId(response.json()["id"])})
+        assert (doc["lane_key"], doc["origin_zip3"]) == ("IL-TX", "606")
+
+    @pytest.mark.asyncio
+    async def test_backfill_and_lane_delay_rate(self, test_db):
+        due = datetime(2026, 5, 1)
+        await test_db.shipments.insert_many([
+            {"status": "delivered", "stops": [CHICAGO, DALLAS], "delivery_date": due, "delivered_at": due},
+            {"status": "delivered", "stops": [CHICAGO, DALLAS], "delivery_date": due, "delivered_at": datetime(2026, 5, 2)},
+            {"status": "delivered", "stops": [CHICAGO, DENVER], "delivery_date": due, "delivered_at": datetime(2026, 5, 2)},
+        ])
+
+        assert await ShipmentLaneService.backfill() == 3
+        assert await ShipmentLaneService.backfill() == 0
+        assert await test_db.shipments.count_documents({"lane_key": "IL-TX"}) == 2
+
+        result = await PredictiveService._get_lane_delay_rate("IL", "TX")
+        assert result == {"delay_rate": 50.0, "total_loads": 2}
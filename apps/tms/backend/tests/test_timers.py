@@ -0,0 +1,114 @@
+"""Tests for durable timers and the tender expiry timer."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.services import timer_service
+from app.services.timer_service import TimerScheduler, register_timer_handler
+from app.services.waterfall_service import TENDER_EXPIRY_TIMER, WaterfallConfig, WaterfallService
+
+fired = []
+
+
+async def _record(payload: dict) -> None:
+    fired.append(payload)
+
+
+async def _broken(payload: dict) -> None:
+    raise RuntimeError("provider down")
+
+
+register_timer_handler("test_record", _record)
+register_timer_handler("test_broken", _broken)
+
+
+class TestTimerScheduler:
+    """Tests for scheduling, leasing and firing timers."""
+
+    @pytest.mark.asyncio
+    async def test_due_timer_fires_once(self, test_db):
+        fired.clear()
+        first, second = TimerScheduler(), TimerScheduler()
+        await first.schedule("test_record", "a", datetime.utcnow() - timedelta(seconds=1), {"n": 1})
+        await first.schedule("test_record", "b", datetime.utcnow() + timedelta(hours=1))
+
+        claims = await asyncio.gather(first.claim(), second.claim())
+        [timer] = [c for c in claims if c]
+        await first.fire(timer)
+
+        assert fired == [{"n": 1}]
+        doc = await test_db.timers.find_one({"_id": "test_record:a"})
+        assert (doc["status"], doc["attempts"]) == ("fired", 1)
+        assert await first.claim() is None
+
+    @pytest.mark.asyncio
+    async def test_earliest_and_cancel(self, test_db):
+        timers = TimerScheduler()
+        soon = datetime.utcnow() + timedelta(minutes=10)
+        await timers.schedule("test_record", "next", soon, earliest=True)
+        await timers.schedule("test_record", "next", soon + timedelta(minutes=10), earliest=True)
+        assert abs((await test_db.timers.find_one({"_id": "test_record:next"}))["due_at"] - soon) < timedelta(seconds=1)
+
+        await timers.schedule("test_record", "next", soon - timedelta(minutes=5), earliest=True)
+        assert (await test_db.timers.find_one({"_id": "test_record:next"}))["due_at"] < soon
+        assert await timers.cancel("test_record", "next")
+        assert not await timers.cancel("test_record", "next")
+
+    @pytest.mark.asyncio
+    async def test_failures_retry_then_fail(self, test_db, monkeypatch):
+        monkeypatch.setattr(timer_service, "TIMER_MAX_ATTEMPTS", 2)
+        timers = TimerScheduler()
+        await timers.schedule("test_broken", "x", datetime.utcnow())
+
+        await timers.fire(await timers.claim())
+        doc = await test_db.timers.find_one({"_id": "test_broken:x"})
+        assert (doc["status"], doc["error"]) == ("scheduled", "provider down")
+        assert doc["due_at"] > datetime.utcnow()
+
+        await test_db.timers.update_one({"_id": "test_broken:x"}, {"$set": {"due_at": datetime.utcnow()}})
+        await timers.fire(await timers.claim())
+        assert (await test_db.timers.find_one({"_id": "test_broken:x"}))["status"] == "failed"
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_reclaimed(self, test_db):
+        timers = TimerScheduler()
+        await timers.schedule("test_record", "stuck", datetime.utcnow())
+        stale = await timers.claim()
+        await test_db.timers.update_one(
+            {"_id": stale["_id"]}, {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+
+        reclaimed = await TimerScheduler().claim()
+        assert reclaimed["_id"] == stale["_id"]
+        assert reclaimed["lease_token"] != stale["lease_token"]
+
+
+class TestTenderExpiryTimer:
+    """Tests for waterfall escalation driven by the expiry timer."""
+
+    @pytest.mark.asyncio
+    async def test_expiry_escalates_to_next_carrier(self, test_db):
+        shipment_id = (await test_db.shipments.insert_one({"shipment_number": "S-2026-00001", "stops": []})).inserted_id
+        carrier_ids = [str(ObjectId()), str(ObjectId())]
+        result = await WaterfallService.create_waterfall(
+            WaterfallConfig(carrier_ids=carrier_ids, shipment_id=str(shipment_id), offered_rate=150000)
+        )
+        waterfall = await test_db.tender_waterfalls.find_one({"_id": ObjectId(result["waterfall_id"])})
+        first_tender = waterfall["current_tender_id"]
+        timer_id = f"{TENDER_EXPIRY_TIMER}:{first_tender}"
+        assert (await test_db.timers.find_one({"_id": timer_id}))["status"] == "scheduled"
+
+        past = datetime.utcnow() - timedelta(seconds=1)
+        await test_db.tenders.update_one({"_id": first_tender}, {"$set": {"expires_at": past}})
+        await test_db.timers.update_one({"_id": timer_id}, {"$set": {"due_at": past}})
+        timers = TimerScheduler()
+        await timers.fire(await timers.claim())
+
+        assert (await test_db.tenders.find_one({"_id": first_tender}))["status"] == "expired"
+        waterfall = await test_db.tender_waterfalls.find_one({"_id": waterfall["_id"]})
+        assert waterfall["current_step"] == 1
+        assert waterfall["current_tender_id"] != first_tender
+        assert (await test_db.timers.find_one({"_id": f"{TENDER_EXPIRY_TIMER}:{waterfall['current_tender_id']}"}))["status"] == "scheduled"
+        assert await WaterfallService.expire_tender(first_tender) is None
@@ -0,0 +1,110 @@
+"""API tests for GPS tracking and the live driver map."""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.services.live_position_service import LivePositionService
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _move_to_in_transit(client: AsyncClient, shipment_id: str) -> None:
+    for status in ("pending_pickup", "in_transit"):
+        response = await client.post(
+            f"/api/v1/shipments/{shipment_id}/transition",
+            json={"status": status},
+        )
+        assert response.status_code == 200
+
+
+class TestLiveMap:
+    """Tests for GET /api/v1/tracking/live-map and /driver-locations."""
+
+    async def test_gps_update_appears_on_live_map(self, client: AsyncClient, created_shipment):
+        """A GPS ping for an in-transit shipment shows up on the live map."""
+        sid = created_shipment["id"]
+        await _move_to_in_transit(client, sid)
+
+        response = await client.post("/api/v1/tracking/gps-update", json={
+            "shipment_id": sid, "latitude": 39.1, "longitude": -94.6, "city": "Kansas City", "state": "MO",
+        })
+        assert response.status_code == 200
+
+        response = await client.get("/api/v1/tracking/live-map")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_active"] == 1
+        assert data["in_transit_count"] == 1
+        location = data["locations"][0]
+        assert location["current_shipment_id"] == sid
+        assert location["latitude"] == 39.1
+        assert location["city"] == "Kansas City"
+
+    async def test_latest_ping_wins(self, client: AsyncClient, created_shipment):
+        """Repeated pings keep a single row holding the newest position."""
+        sid = created_shipment["id"]
+        await _move_to_in_transit(client, sid)
+
+        for lat in (39.1, 38.6):
+            await client.post("/api/v1/tracking/location-update", json={
+                "shipment_id": sid, "latitude": lat, "longitude": -94.6, "speed_mph": 61.0,
+            })
+
+        response = await client.get("/api/v1/tracking/driver-locations")
+        assert response.status_code == 200
+        rows = response.json()
+        assert len(rows) == 1
+        assert rows[0]["latitude"] == 38.6
+        assert rows[0]["speed_mph"] == 61.0
+
+    async def test_driver_checkin_without_shipment_is_mapped(self, client: AsyncClient, test_db):
+        """A driver who checks in with no shipment still shows on the driver map."""
+        driver_id = ObjectId()
+        await test_db.drivers.insert_one({"_id": driver_id, "name": "Pat Driver"})
+        await test_db.driver_checkins.insert_one({
+            "driver_id": driver_id, "latitude": 41.9, "longitude": -87.6, "city": "Chicago", "state": "IL",
+            "created_at": datetime.utcnow(),
+        })
+
+        response = await client.get("/api/v1/tracking/driver-locations")
+        assert response.status_code == 200
+        [row] = response.json()
+        assert (row["driver_id"], row["driver_name"], row["city"]) == (str(driver_id), "Pat Driver", "Chicago")
+        assert row["current_shipment_id"] is None
+
+    async def test_booked_shipment_without_driver_is_hidden(self, client: AsyncClient, created_shipment):
+        """Pings for shipments that are not moving and have no driver are not mapped."""
+        await client.post("/api/v1/tracking/gps-update", json={
+            "shipment_id": created_shipment["id"], "latitude": 39.1, "longitude": -94.6,
+        })
+
+        response = await client.get("/api/v1/tracking/driver-locations")
+        assert response.status_code == 200
+        assert response.json() == []
+
+
+class TestLatestPositions:
+    """Tests for the ``latest_positions`` upserts behind the live map."""
+
+    async def test_ping_without_location_keeps_city(self, test_db):
+        shipment_id = ObjectId()
+        now = datetime.utcnow()
+        await LivePositionService.record_position(shipment_id, 39.1, -94.6, city="Kansas City", state="MO", reported_at=now)
+        await LivePositionService.record_position(shipment_id, 38.9, -94.4, reported_at=now + timedelta(minutes=1))
+
+        row = await test_db.latest_positions.find_one({"_id": shipment_id})
+        assert (row["latitude"], row["city"], row["state"]) == (38.9, "Kansas City", "MO")
+
+    async def test_out_of_order_ping_is_ignored(self, test_db):
+        shipment_id = ObjectId()
+        now = datetime.utcnow()
+        await LivePositionService.record_position(shipment_id, 38.6, -94.6, reported_at=now)
+        await LivePositionService.record_position(shipment_id, 39.1, -94.6, reported_at=now - timedelta(minutes=5))
+        await LivePositionService.record_positions([
+            {"shipment_id": shipment_id, "latitude": 39.5, "longitude": -94.6, "reported_at": now - timedelta(minutes=1)},
+        ])
+
+        row = await test_db.latest_positions.find_one({"_id": shipment_id})
+        assert row["latitude"] == 38.6
@@ -0,0 +1,124 @@
+"""Tests for topic fan-out and backpressure in the WebSocket ConnectionManager."""
+import asyncio
+import json
+
+import pytest
+
+from app.services.websocket_manager import ConnectionManager, event_topics
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeWebSocket:
+    def __init__(self, block: asyncio.Event | None = None):
+        self.sent: list[dict] = []
+        self.block = block
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.block:
+            await self.block.wait()
+        self.sent.append(json.loads(message))
+
+    async def close(self):
+        self.closed = True
+
+
+async def _drain():
+    """Let writer tasks run until they block or run out of messages."""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+class TestTopics:
+    """Tests for topic derivation and subscriptions."""
+
+    async def test_event_topics_from_payload(self):
+        assert event_topics("shipment_updated", {"id": "s1"}) == {"shipment:s1"}
+        assert event_topics("tender_accepted", {"id": "t1", "shipment_id": "s1"}) == {"shipment:s1"}
+        assert event_topics("work_item_created", {"id": "w1", "desk_id": "d1"}) == {"desk:d1"}
+
+    async def test_topic_subscriber_only_gets_its_events(self):
+        manager = ConnectionManager()
+        dispatcher, watcher = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(dispatcher)
+        await manager.connect(watcher, ["shipment:s1"])
+
+        await manager.broadcast("shipment_updated", {"id": "s1"})
+        await manager.broadcast("shipment_updated", {"id": "s2"})
+        await _drain()
+
+        assert [m["data"]["id"] for m in dispatcher.sent] == ["s1", "s2"]
+        assert [m["data"]["id"] for m in watcher.sent] == ["s1"]
+
+    async def test_disconnect_removes_subscriptions(self):
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, ["desk:d1"])
+        manager.disconnect(ws)
+        assert manager.connection_count == 0
+        assert manager.subscribers == {}
+
+
+class TestBackpressure:
+    """Tests for per-connection queues."""
+
+    async def test_slow_client_does_not_block_others(self):
+        manager = ConnectionManager()
+        gate = asyncio.Event()
+        slow, fast = FakeWebSocket(block=gate), FakeWebSocket()
+        await manager.connect(slow)
+        await manager.connect(fast)
+
+        await manager.broadcast("tender_created", {"id": "t1"})
+        await _drain()
+
+        assert len(fast.sent) == 1
+        assert slow.sent == []
+        gate.set()
+        await _drain()
+        assert len(slow.sent) == 1
+
+    async def test_full_queue_drops_oldest(self):
+        manager = ConnectionManager(max_queue=2)
+        gate = asyncio.Event()
+        ws = FakeWebSocket(block=gate)
+        await manager.connect(ws)
+        await asyncio.sleep(0)
+
+        for i in range(4):
+            await manager.broadcast("tender_created", {"id": f"t{i}"})
+        gate.set()
+        await _drain()
+
+        assert [m["data"]["id"] for m in ws.sent] == ["t2", "t3"]
+        assert manager.stats()["dropped"] == 2
+
+    async def test_latest_state_events_coalesce(self):
+        manager = ConnectionManager()
+        gate = asyncio.Event()
+        ws = FakeWebSocket(block=gate)
+        await manager.connect(ws)
+        await asyncio.sleep(0)
+
+        await manager.broadcast("tender_created", {"id": "t0"})
+        for status in ("dispatched", "in_transit", "delivered"):
+            await manager.broadcast("shipment_status_changed", {"id": "s1", "status": status})
+        gate.set()
+        await _drain()
+
+        assert [m["data"].get("status") for m in ws.sent] == [None, "delivered"]
+
+    async def test_timed_out_client_is_closed(self):
+        manager = ConnectionManager(send_timeout=0.01)
+        ws = FakeWebSocket(block=asyncio.Event())
+        await manager.connect(ws)
+
+        await manager.broadcast("tender_created", {"id": "t0"})
+        await asyncio.sleep(0.05)
+
+        assert ws.closed
+        assert manager.connection_count == 0